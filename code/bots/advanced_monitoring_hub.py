@@ -10,8 +10,9 @@ import sys
 import json
 import asyncio
 import logging
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, List, Optional, Any, Set, Tuple
 from dataclasses import dataclass, field
 from enum import Enum
 import sqlite3
@@ -59,6 +60,20 @@ ANOMALY_THRESHOLD = 0.95  # 95th percentile
 PREDICTION_CONFIDENCE_MIN = 0.70
 ALERT_COOLDOWN_SECONDS = 300
 
+# Metric ingestion (write-behind)
+METRIC_FLUSH_BATCH_SIZE = 1000
+METRIC_FLUSH_INTERVAL_SECONDS = 5
+
+# Rollups: resolution (seconds) -> retention (seconds)
+RAW_RETENTION_SECONDS = 24 * 3600
+ROLLUP_RETENTION_SECONDS = {
+    60: 7 * 24 * 3600,
+    300: 30 * 24 * 3600,
+    3600: 365 * 24 * 3600,
+}
+MAX_QUERY_POINTS = 1500
+SCHEMA_VERSION = 2
+
 # Create directories
 for directory in [os.path.dirname(MONITORING_DB),
                   os.path.dirname(MONITORING_CONFIG),
@@ -154,21 +169,37 @@ class MonitoringDatabase:
     def __init__(self, db_path: str = MONITORING_DB):
         self.db_path = db_path
         self.conn = None
+        
+        # Write-behind buffer for metrics
+        self.pending_metrics: List[Metric] = []
+        self.last_flush = time.monotonic()
+        self.metrics_flushed = 0
+        self.flushes = 0
+        
         self._init_db()
     
     def _init_db(self):
         """Initialize database schema"""
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5.0)
         cursor = self.conn.cursor()
         
-        # Metrics table (time-series data)
+        # WAL: readers don't block the writer, commits fsync only the log
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        cursor.execute('PRAGMA cache_size=-32000')
+        cursor.execute('PRAGMA mmap_size=268435456')
+        
+        schema_version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        
+        # Metrics table (time-series data, timestamp = unix epoch seconds)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS metrics (
                 metric_id TEXT PRIMARY KEY,
                 name TEXT NOT NULL,
                 metric_type TEXT NOT NULL,
                 value REAL NOT NULL,
-                timestamp TIMESTAMP NOT NULL,
+                timestamp INTEGER NOT NULL,
                 labels_json TEXT,
                 source TEXT,
                 component TEXT,
@@ -176,23 +207,20 @@ class MonitoringDatabase:
             )
         ''')
         
-        # Aggregated metrics (pre-computed for performance)
+        # Multi-resolution rollups (1m/5m/1h), maintained on insert
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS metrics_aggregated (
-                agg_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            CREATE TABLE IF NOT EXISTS metrics_rollups (
+                resolution INTEGER NOT NULL,
                 metric_name TEXT NOT NULL,
                 component TEXT NOT NULL,
                 namespace TEXT NOT NULL,
-                time_bucket TIMESTAMP NOT NULL,
-                avg_value REAL,
-                min_value REAL,
-                max_value REAL,
-                p50_value REAL,
-                p95_value REAL,
-                p99_value REAL,
-                sample_count INTEGER,
-                UNIQUE(metric_name, component, namespace, time_bucket)
-            )
+                bucket INTEGER NOT NULL,
+                sample_count INTEGER NOT NULL,
+                sum_value REAL NOT NULL,
+                min_value REAL NOT NULL,
+                max_value REAL NOT NULL,
+                PRIMARY KEY (resolution, metric_name, component, bucket, namespace)
+            ) WITHOUT ROWID
         ''')
         
         # Alerts table
@@ -282,36 +310,166 @@ class MonitoringDatabase:
         
         # Create indexes
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_metrics_timestamp ON metrics(timestamp DESC)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_metrics_name ON metrics(name)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_metrics_component ON metrics(component)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_metrics_series ON metrics(name, component, timestamp)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_severity ON alerts(severity, resolved)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_timestamp ON alerts(timestamp DESC)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_anomalies_timestamp ON anomalies(timestamp DESC)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_predictions_timestamp ON predictions(timestamp DESC)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_agg_bucket ON metrics_aggregated(time_bucket DESC)')
+        
+        if schema_version < SCHEMA_VERSION:
+            self._migrate_metrics(cursor)
+            cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
         
         self.conn.commit()
-        logger.info(f"Monitoring database initialized: {db_path}")
+        logger.info(f"Monitoring database initialized: {self.db_path}")
+    
+    def _migrate_metrics(self, cursor: sqlite3.Cursor):
+        """Convert ISO timestamps to epochs and rebuild rollups from raw data"""
+        rows = cursor.execute(
+            "SELECT metric_id, timestamp FROM metrics WHERE typeof(timestamp) = 'text'"
+        ).fetchall()
+        if rows:
+            cursor.executemany(
+                'UPDATE metrics SET timestamp = ? WHERE metric_id = ?',
+                [(int(datetime.fromisoformat(ts).timestamp()), metric_id) for metric_id, ts in rows]
+            )
+            logger.info(f"Migrated {len(rows)} metric timestamps to epoch seconds")
+        
+        # Superseded by metrics_rollups
+        cursor.execute('DROP INDEX IF EXISTS idx_metrics_name')
+        cursor.execute('DROP INDEX IF EXISTS idx_metrics_component')
+        cursor.execute('DROP TABLE IF EXISTS metrics_aggregated')
+        
+        cursor.execute('DELETE FROM metrics_rollups')
+        for resolution in ROLLUP_RETENTION_SECONDS:
+            cursor.execute('''
+                INSERT INTO metrics_rollups
+                (resolution, metric_name, component, namespace, bucket,
+                 sample_count, sum_value, min_value, max_value)
+                SELECT ?, name, COALESCE(component, 'unknown'), COALESCE(namespace, 'default'),
+                       timestamp - timestamp % ?, COUNT(*), SUM(value), MIN(value), MAX(value)
+                FROM metrics
+                GROUP BY 2, 3, 4, 5
+            ''', (resolution, resolution))
     
     def save_metric(self, metric: Metric):
-        """Save metric to database"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            INSERT INTO metrics 
-            (metric_id, name, metric_type, value, timestamp, labels_json, source, component, namespace)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            metric.metric_id,
-            metric.name,
-            metric.metric_type.value,
-            metric.value,
-            metric.timestamp.isoformat(),
-            json.dumps(metric.labels),
-            metric.source,
-            metric.labels.get('component', 'unknown'),
-            metric.labels.get('namespace', 'default')
-        ))
-        self.conn.commit()
+        """Queue metric for the next batched write"""
+        self.pending_metrics.append(metric)
+        if len(self.pending_metrics) >= METRIC_FLUSH_BATCH_SIZE:
+            self.flush_metrics()
+    
+    def save_metrics(self, metrics: List[Metric]):
+        """Queue a batch of metrics for the next batched write"""
+        self.pending_metrics.extend(metrics)
+        if len(self.pending_metrics) >= METRIC_FLUSH_BATCH_SIZE:
+            self.flush_metrics()
+    
+    def flush_metrics(self) -> int:
+        """Write buffered metrics and their rollups in a single transaction"""
+        self.last_flush = time.monotonic()
+        if not self.pending_metrics:
+            return 0
+        
+        batch, self.pending_metrics = self.pending_metrics, []
+        
+        try:
+            with self.conn:
+                cursor = self.conn.cursor()
+                seen = self._existing_metric_ids(cursor, [metric.metric_id for metric in batch])
+                
+                rows = []
+                rollups: Dict[Tuple[int, str, str, str, int], List[float]] = {}
+                for metric in batch:
+                    # Re-sent samples are already stored and already rolled up
+                    if metric.metric_id in seen:
+                        continue
+                    seen.add(metric.metric_id)
+                    
+                    ts = int(metric.timestamp.timestamp())
+                    component = metric.labels.get('component', 'unknown')
+                    namespace = metric.labels.get('namespace', 'default')
+                    value = metric.value
+                    rows.append((
+                        metric.metric_id,
+                        metric.name,
+                        metric.metric_type.value,
+                        value,
+                        ts,
+                        json.dumps(metric.labels),
+                        metric.source,
+                        component,
+                        namespace
+                    ))
+                    
+                    for resolution in ROLLUP_RETENTION_SECONDS:
+                        key = (resolution, metric.name, component, namespace, ts - ts % resolution)
+                        agg = rollups.get(key)
+                        if agg is None:
+                            rollups[key] = [1, value, value, value]
+                        else:
+                            agg[0] += 1
+                            agg[1] += value
+                            if value < agg[2]:
+                                agg[2] = value
+                            if value > agg[3]:
+                                agg[3] = value
+                
+                cursor.executemany('''
+                    INSERT INTO metrics 
+                    (metric_id, name, metric_type, value, timestamp, labels_json, source, component, namespace)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+                cursor.executemany('''
+                    INSERT INTO metrics_rollups
+                    (resolution, metric_name, component, namespace, bucket,
+                     sample_count, sum_value, min_value, max_value)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (resolution, metric_name, component, bucket, namespace) DO UPDATE SET
+                        sample_count = sample_count + excluded.sample_count,
+                        sum_value = sum_value + excluded.sum_value,
+                        min_value = MIN(min_value, excluded.min_value),
+                        max_value = MAX(max_value, excluded.max_value)
+                ''', [key + tuple(agg) for key, agg in rollups.items()])
+        except Exception:
+            # Keep the batch for the next flush, ahead of metrics queued meanwhile
+            self.pending_metrics[:0] = batch
+            raise
+        
+        self.metrics_flushed += len(rows)
+        self.flushes += 1
+        return len(rows)
+    
+    @staticmethod
+    def _existing_metric_ids(cursor: sqlite3.Cursor, metric_ids: List[str]) -> Set[str]:
+        """IDs from metric_ids that are already stored"""
+        existing = set()
+        for i in range(0, len(metric_ids), 500):
+            chunk = metric_ids[i:i + 500]
+            existing.update(row[0] for row in cursor.execute(
+                f"SELECT metric_id FROM metrics WHERE metric_id IN ({', '.join('?' * len(chunk))})",
+                chunk
+            ))
+        return existing
+    
+    def prune_metrics(self, now: Optional[datetime] = None) -> int:
+        """Apply downsampled retention: raw data first, then each rollup level"""
+        self.flush_metrics()
+        now_ts = int((now or datetime.now()).timestamp())
+        
+        with self.conn:
+            cursor = self.conn.cursor()
+            cursor.execute('DELETE FROM metrics WHERE timestamp < ?', (now_ts - RAW_RETENTION_SECONDS,))
+            deleted = cursor.rowcount
+            for resolution, retention in ROLLUP_RETENTION_SECONDS.items():
+                cursor.execute(
+                    'DELETE FROM metrics_rollups WHERE resolution = ? AND bucket < ?',
+                    (resolution, now_ts - retention)
+                )
+                deleted += cursor.rowcount
+        
+        if deleted:
+            logger.info(f"Pruned {deleted} expired metric rows")
+        return deleted
     
     def save_alert(self, alert: Alert):
         """Save alert to database"""
@@ -378,27 +536,84 @@ class MonitoringDatabase:
         ))
         self.conn.commit()
     
+    def select_resolution(self, start_time: datetime, end_time: datetime) -> int:
+        """Pick the finest resolution (0 = raw) that covers the range within MAX_QUERY_POINTS"""
+        now_ts = time.time()
+        start_ts = start_time.timestamp()
+        span = max(end_time.timestamp() - start_ts, 1)
+        
+        if start_ts >= now_ts - RAW_RETENTION_SECONDS and span <= MAX_QUERY_POINTS * 60:
+            return 0
+        
+        for resolution, retention in sorted(ROLLUP_RETENTION_SECONDS.items()):
+            if start_ts >= now_ts - retention and span / resolution <= MAX_QUERY_POINTS:
+                return resolution
+        
+        return max(ROLLUP_RETENTION_SECONDS)
+    
     def get_metrics(self, metric_name: str, component: str, 
-                   start_time: datetime, end_time: datetime) -> List[Metric]:
-        """Query metrics by name and time range"""
+                   start_time: datetime, end_time: datetime,
+                   resolution: Optional[int] = None) -> List[Metric]:
+        """Query metrics by name and time range
+        
+        Reads raw samples for short recent ranges and the matching rollup
+        otherwise (one averaged point per bucket). Pass resolution=0 to force
+        raw data or a ROLLUP_RETENTION_SECONDS key to force a rollup level.
+        """
+        self.flush_metrics()
+        
+        if resolution is None:
+            resolution = self.select_resolution(start_time, end_time)
+        start_ts = int(start_time.timestamp())
+        end_ts = int(end_time.timestamp())
+        
         cursor = self.conn.cursor()
+        metrics = []
+        
+        if not resolution:
+            cursor.execute('''
+                SELECT metric_id, name, metric_type, value, timestamp, labels_json, source
+                FROM metrics
+                WHERE name = ? AND component = ? AND timestamp >= ? AND timestamp <= ?
+                ORDER BY timestamp ASC
+            ''', (metric_name, component, start_ts, end_ts))
+            
+            for row in cursor.fetchall():
+                metrics.append(Metric(
+                    metric_id=row[0],
+                    name=row[1],
+                    metric_type=MetricType(row[2]),
+                    value=row[3],
+                    timestamp=datetime.fromtimestamp(row[4]),
+                    labels=json.loads(row[5]) if row[5] else {},
+                    source=row[6]
+                ))
+            return metrics
+        
         cursor.execute('''
-            SELECT metric_id, name, metric_type, value, timestamp, labels_json, source
-            FROM metrics
-            WHERE name = ? AND component = ? AND timestamp BETWEEN ? AND ?
-            ORDER BY timestamp ASC
-        ''', (metric_name, component, start_time.isoformat(), end_time.isoformat()))
+            SELECT bucket, namespace, sample_count, sum_value, min_value, max_value
+            FROM metrics_rollups
+            WHERE resolution = ? AND metric_name = ? AND component = ?
+              AND bucket >= ? AND bucket <= ?
+            ORDER BY bucket ASC
+        ''', (resolution, metric_name, component, start_ts - start_ts % resolution, end_ts))
         
-        metrics = []
-        for row in cursor.fetchall():
+        for bucket, namespace, count, total, min_value, max_value in cursor.fetchall():
             metrics.append(Metric(
-                metric_id=row[0],
-                name=row[1],
-                metric_type=MetricType(row[2]),
-                value=row[3],
-                timestamp=datetime.fromisoformat(row[4]),
-                labels=json.loads(row[5]) if row[5] else {},
-                source=row[6]
+                metric_id=f"rollup-{resolution}-{metric_name}-{component}-{namespace}-{bucket}",
+                name=metric_name,
+                metric_type=MetricType.GAUGE,
+                value=total / count,
+                timestamp=datetime.fromtimestamp(bucket),
+                labels={
+                    'component': component,
+                    'namespace': namespace,
+                    'resolution_seconds': str(resolution),
+                    'sample_count': str(count),
+                    'min': str(min_value),
+                    'max': str(max_value)
+                },
+                source='rollup'
             ))
         
         return metrics
@@ -437,54 +652,10 @@ class MonitoringDatabase:
         
         return alerts
     
-    def aggregate_metrics(self, time_bucket_minutes: int = 5):
-        """Pre-aggregate metrics for performance"""
-        cursor = self.conn.cursor()
-        
-        # Get time range for aggregation
-        cursor.execute('''
-            SELECT MIN(timestamp), MAX(timestamp)
-            FROM metrics
-            WHERE timestamp > (
-                SELECT COALESCE(MAX(time_bucket), '2020-01-01')
-                FROM metrics_aggregated
-            )
-        ''')
-        
-        row = cursor.fetchone()
-        if not row[0] or not row[1]:
-            return
-        
-        start_time = datetime.fromisoformat(row[0])
-        end_time = datetime.fromisoformat(row[1])
-        
-        # Aggregate by time buckets
-        current_time = start_time
-        while current_time <= end_time:
-            bucket_end = current_time + timedelta(minutes=time_bucket_minutes)
-            
-            cursor.execute('''
-                INSERT OR REPLACE INTO metrics_aggregated
-                (metric_name, component, namespace, time_bucket, 
-                 avg_value, min_value, max_value, sample_count)
-                SELECT 
-                    name,
-                    component,
-                    namespace,
-                    ?,
-                    AVG(value),
-                    MIN(value),
-                    MAX(value),
-                    COUNT(*)
-                FROM metrics
-                WHERE timestamp BETWEEN ? AND ?
-                GROUP BY name, component, namespace
-            ''', (current_time.isoformat(), current_time.isoformat(), bucket_end.isoformat()))
-            
-            current_time = bucket_end
-        
-        self.conn.commit()
-        logger.info("Metrics aggregated successfully")
+    def close(self):
+        """Flush pending metrics and close the connection"""
+        self.flush_metrics()
+        self.conn.close()
 
 ################################################################################
 # Data Collectors
@@ -895,7 +1066,8 @@ class AdvancedMonitoringHub:
             self._metrics_collection_loop(),
             self._anomaly_detection_loop(),
             self._prediction_loop(),
-            self._aggregation_loop()
+            self._aggregation_loop(),
+            self._flush_loop()
         ]
         
         await asyncio.gather(*tasks)
@@ -912,11 +1084,10 @@ class AdvancedMonitoringHub:
                 # Collect from Elasticsearch
                 es_metrics = await self.elasticsearch.collect_log_metrics()
                 
-                # Combine and save
+                # Combine and queue for batched write
                 all_metrics = prometheus_metrics + es_metrics
                 
-                for metric in all_metrics:
-                    self.db.save_metric(metric)
+                self.db.save_metrics(all_metrics)
                 
                 logger.info(f"Collected {len(all_metrics)} metrics")
                 
@@ -1014,12 +1185,10 @@ class AdvancedMonitoringHub:
                 await asyncio.sleep(600)
     
     async def _aggregation_loop(self):
-        """Aggregate metrics for performance"""
+        """Apply retention to raw metrics and rollups (rollups are built on insert)"""
         while self.running:
             try:
-                self.db.aggregate_metrics(
-                    time_bucket_minutes=self.config['aggregation_interval_minutes']
-                )
+                self.db.prune_metrics()
                 
                 await asyncio.sleep(self.config['aggregation_interval_minutes'] * 60)
             
@@ -1027,10 +1196,22 @@ class AdvancedMonitoringHub:
                 logger.error(f"Aggregation error: {e}")
                 await asyncio.sleep(300)
     
+    async def _flush_loop(self):
+        """Flush the write-behind metric buffer"""
+        while self.running:
+            try:
+                await asyncio.sleep(METRIC_FLUSH_INTERVAL_SECONDS)
+                if time.monotonic() - self.db.last_flush >= METRIC_FLUSH_INTERVAL_SECONDS:
+                    self.db.flush_metrics()
+            
+            except Exception as e:
+                logger.error(f"Metric flush error: {e}")
+    
     def stop(self):
         """Stop monitoring hub"""
         logger.info("Stopping monitoring hub")
         self.running = False
+        self.db.flush_metrics()
 
 ################################################################################
 # CLI Interface
@@ -15,14 +15,19 @@ Server Init - Iteration 238: Caching Platform
 """
 
 import asyncio
+import fnmatch
+import heapq
+import itertools
 import random
+import re
 import hashlib
+import sys
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Set, Callable
+from typing import Dict, List, Optional, Any, Set, Callable, Tuple
 from enum import Enum
 import uuid
-import json
 
 
 class CacheType(Enum):
@@ -127,9 +132,11 @@ class CacheRegion:
     
     # Stats
     entry_count: int = 0
+    memory_used_bytes: int = 0
     memory_used_mb: float = 0
     hits: int = 0
     misses: int = 0
+    evictions: int = 0
 
 
 @dataclass
@@ -174,6 +181,170 @@ class WarmingTask:
     completed_at: Optional[datetime] = None
 
 
+# Region indexes
+WILDCARD_CHARS = "*?["
+SIZE_SAMPLE_ITEMS = 16
+SIZE_MAX_DEPTH = 3
+
+
+def estimate_size(value: Any, depth: int = 0) -> int:
+    """Оценка размера значения без json.dumps (большие контейнеры — по выборке)"""
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value)
+    if value is None or isinstance(value, (int, float)):
+        return 8
+    if depth >= SIZE_MAX_DEPTH:
+        return sys.getsizeof(value)
+        
+    if isinstance(value, dict):
+        sample = list(itertools.islice(value.items(), SIZE_SAMPLE_ITEMS))
+        sampled = sum(estimate_size(k, depth + 1) + estimate_size(v, depth + 1) for k, v in sample)
+        return sampled * len(value) // max(1, len(sample))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        sample = list(itertools.islice(value, SIZE_SAMPLE_ITEMS))
+        return sum(estimate_size(v, depth + 1) for v in sample) * len(value) // max(1, len(sample))
+    return sys.getsizeof(value)
+
+
+class KeyTrie:
+    """Префиксное дерево ключей (терминальный узел хранит ключ под None)"""
+    
+    def __init__(self):
+        self.root: Dict[Optional[str], Any] = {}
+        
+    def insert(self, key: str):
+        node = self.root
+        for char in key:
+            node = node.setdefault(char, {})
+        node[None] = key
+        
+    def remove(self, key: str):
+        path = []
+        node = self.root
+        for char in key:
+            child = node.get(char)
+            if child is None:
+                return
+            path.append((node, char))
+            node = child
+        node.pop(None, None)
+        
+        # Prune empty branches
+        while path and not node:
+            parent, char = path.pop()
+            del parent[char]
+            node = parent
+            
+    def iter_prefix(self, prefix: str):
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for char, child in node.items():
+                if char is None:
+                    yield child
+                else:
+                    stack.append(child)
+
+
+class RegionIndex:
+    """Индексы региона: порядок доступа, кучи TTL/LFU, теги, префиксы ключей"""
+    
+    def __init__(self, eviction_policy: EvictionPolicy):
+        self.eviction_policy = eviction_policy
+        self.order: OrderedDict = OrderedDict()  # LRU (move_to_end) / FIFO
+        self.expiry_heap: List[Tuple[datetime, str]] = []
+        self.lfu_heap: List[Tuple[int, int, str]] = []  # (access_count, seq, key)
+        self.tag_keys: Dict[str, Set[str]] = {}
+        self.trie = KeyTrie()
+        self.used_bytes = 0
+        self._seq = itertools.count()
+        
+    def add(self, entry: CacheEntry, entries: Dict[str, CacheEntry]):
+        key = entry.key
+        self.order[key] = None
+        self.used_bytes += entry.size_bytes
+        self.trie.insert(key)
+        for tag in entry.tags:
+            self.tag_keys.setdefault(tag, set()).add(key)
+            
+        heapq.heappush(self.expiry_heap, (entry.expires_at, key))
+        if self.eviction_policy == EvictionPolicy.LFU:
+            heapq.heappush(self.lfu_heap, (entry.access_count, next(self._seq), key))
+            
+        # Удалённые и перезаписанные ключи оставляют устаревшие элементы в кучах
+        limit = 2 * len(entries) + 64
+        if len(self.expiry_heap) > limit:
+            self.expiry_heap = [(e.expires_at, k) for k, e in entries.items()]
+            heapq.heapify(self.expiry_heap)
+        if len(self.lfu_heap) > limit:
+            self.lfu_heap = [(e.access_count, next(self._seq), k) for k, e in entries.items()]
+            heapq.heapify(self.lfu_heap)
+            
+    def remove(self, entry: CacheEntry):
+        key = entry.key
+        self.order.pop(key, None)
+        self.used_bytes -= entry.size_bytes
+        self.trie.remove(key)
+        for tag in entry.tags:
+            keys = self.tag_keys.get(tag)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self.tag_keys[tag]
+                    
+    def touch(self, key: str):
+        if self.eviction_policy == EvictionPolicy.LRU:
+            self.order.move_to_end(key)
+            
+    def expired_victim(self, entries: Dict[str, CacheEntry], now: datetime) -> Optional[str]:
+        """Ключ с истёкшим TTL (если есть) — вытесняется раньше любой политики"""
+        heap = self.expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, key = heap[0]
+            entry = entries.get(key)
+            if entry is not None and entry.expires_at == expires_at:
+                return key
+            heapq.heappop(heap)
+        return None
+        
+    def victim(self, entries: Dict[str, CacheEntry]) -> Optional[str]:
+        """Выбор жертвы по политике вытеснения"""
+        if not entries:
+            return None
+            
+        if self.eviction_policy == EvictionPolicy.TTL:
+            heap = self.expiry_heap
+            while heap:
+                expires_at, key = heap[0]
+                entry = entries.get(key)
+                if entry is not None and entry.expires_at == expires_at:
+                    return key
+                heapq.heappop(heap)
+                
+        elif self.eviction_policy == EvictionPolicy.LFU:
+            heap = self.lfu_heap
+            while heap:
+                count, _, key = heap[0]
+                entry = entries.get(key)
+                if entry is None or entry.access_count < count:
+                    heapq.heappop(heap)
+                elif entry.access_count > count:
+                    # Счётчики только растут: обновляем устаревший элемент лениво
+                    heapq.heapreplace(heap, (entry.access_count, next(self._seq), key))
+                else:
+                    return key
+                    
+        elif self.eviction_policy == EvictionPolicy.RANDOM:
+            return random.choice(list(entries))
+            
+        return next(iter(self.order), None)
+
+
 class CachePlatform:
     """Платформа кэширования"""
     
@@ -181,6 +352,7 @@ class CachePlatform:
         self.nodes: Dict[str, CacheNode] = {}
         self.regions: Dict[str, CacheRegion] = {}
         self.entries: Dict[str, Dict[str, CacheEntry]] = {}  # region_id -> key -> entry
+        self.region_indexes: Dict[str, RegionIndex] = {}
         self.invalidation_rules: Dict[str, InvalidationRule] = {}
         self.warming_tasks: List[WarmingTask] = []
         
@@ -218,6 +390,7 @@ class CachePlatform:
         
         self.regions[region.region_id] = region
         self.entries[region.region_id] = {}
+        self.region_indexes[region.region_id] = RegionIndex(eviction_policy)
         
         return region
         
@@ -229,16 +402,28 @@ class CachePlatform:
         if not region:
             return False
             
-        # Check capacity
-        if region.entry_count >= region.max_entries:
-            self._evict(region_id)
+        region_entries = self.entries[region_id]
+        index = self.region_indexes[region_id]
+        
+        # Replace existing entry
+        existing = region_entries.pop(key, None)
+        if existing:
+            index.remove(existing)
             
         ttl = ttl_seconds or region.default_ttl_seconds
         
         # Calculate size
-        value_str = json.dumps(value) if not isinstance(value, str) else value
-        size = len(value_str.encode())
-        
+        size = estimate_size(value)
+        
+        # Check capacity (entries and byte budget)
+        max_bytes = region.max_memory_mb * 1024 * 1024
+        while region_entries and (
+            len(region_entries) >= region.max_entries
+            or (max_bytes and index.used_bytes + size > max_bytes)
+        ):
+            if not self._evict(region_id):
+                break
+                
         entry = CacheEntry(
             key=key,
             value=value,
@@ -248,9 +433,9 @@ class CachePlatform:
             tags=tags or []
         )
         
-        self.entries[region_id][key] = entry
-        region.entry_count = len(self.entries[region_id])
-        region.memory_used_mb = sum(e.size_bytes for e in self.entries[region_id].values()) / (1024**2)
+        region_entries[key] = entry
+        index.add(entry, region_entries)
+        self._update_region_usage(region, region_entries, index)
         
         return True
         
@@ -268,96 +453,99 @@ class CachePlatform:
             return None
             
         # Check expiration
-        if datetime.now() > entry.expires_at:
-            del region_entries[key]
+        now = datetime.now()
+        if now > entry.expires_at:
+            self._remove_entry(region_id, key)
             region.misses += 1
-            region.entry_count = len(region_entries)
             return None
             
         # Update stats
         entry.access_count += 1
-        entry.last_accessed = datetime.now()
+        entry.last_accessed = now
+        self.region_indexes[region_id].touch(key)
         region.hits += 1
         
         return entry.value
         
     def delete(self, region_id: str, key: str) -> bool:
         """Удаление из кэша"""
+        return self._remove_entry(region_id, key)
+        
+    def _remove_entry(self, region_id: str, key: str) -> bool:
+        """Удаление записи с обновлением индексов и счётчиков региона"""
         region = self.regions.get(region_id)
         if not region:
             return False
             
-        region_entries = self.entries.get(region_id, {})
-        if key in region_entries:
-            del region_entries[key]
-            region.entry_count = len(region_entries)
-            return True
+        region_entries = self.entries[region_id]
+        entry = region_entries.pop(key, None)
+        if not entry:
+            return False
             
-        return False
+        index = self.region_indexes[region_id]
+        index.remove(entry)
+        self._update_region_usage(region, region_entries, index)
+        return True
+        
+    def _update_region_usage(self, region: CacheRegion,
+                             region_entries: Dict[str, CacheEntry],
+                             index: RegionIndex):
+        region.entry_count = len(region_entries)
+        region.memory_used_bytes = index.used_bytes
+        region.memory_used_mb = index.used_bytes / (1024**2)
         
-    def _evict(self, region_id: str):
+    def _evict(self, region_id: str) -> bool:
         """Вытеснение записей"""
         region = self.regions.get(region_id)
         if not region:
-            return
+            return False
             
         region_entries = self.entries.get(region_id, {})
-        if not region_entries:
-            return
-            
-        # Select entry to evict based on policy
-        entries_list = list(region_entries.values())
-        
-        if region.eviction_policy == EvictionPolicy.LRU:
-            victim = min(entries_list, key=lambda e: e.last_accessed)
-        elif region.eviction_policy == EvictionPolicy.LFU:
-            victim = min(entries_list, key=lambda e: e.access_count)
-        elif region.eviction_policy == EvictionPolicy.FIFO:
-            victim = min(entries_list, key=lambda e: e.created_at)
-        elif region.eviction_policy == EvictionPolicy.TTL:
-            victim = min(entries_list, key=lambda e: e.expires_at)
-        else:
-            victim = random.choice(entries_list)
+        index = self.region_indexes[region_id]
+        
+        # Expired entries go first, then the region policy
+        victim = index.expired_victim(region_entries, datetime.now()) or index.victim(region_entries)
+        if victim is None:
+            return False
             
-        del region_entries[victim.key]
-        region.entry_count = len(region_entries)
+        self._remove_entry(region_id, victim)
+        region.evictions += 1
+        return True
         
     def invalidate_by_pattern(self, region_id: str, pattern: str) -> int:
         """Инвалидация по паттерну"""
-        region_entries = self.entries.get(region_id, {})
-        
-        # Simple pattern matching (supports *)
-        import fnmatch
-        
-        keys_to_delete = [
-            key for key in region_entries.keys()
-            if fnmatch.fnmatch(key, pattern)
-        ]
-        
-        for key in keys_to_delete:
-            del region_entries[key]
+        index = self.region_indexes.get(region_id)
+        if not index:
+            return 0
             
-        region = self.regions.get(region_id)
-        if region:
-            region.entry_count = len(region_entries)
+        # Literal prefix narrows candidates through the trie
+        cut = min((pattern.find(c) for c in WILDCARD_CHARS if c in pattern), default=len(pattern))
+        prefix, rest = pattern[:cut], pattern[cut:]
+        
+        candidates = index.trie.iter_prefix(prefix)
+        if rest == "*":
+            keys_to_delete = list(candidates)
+        elif not rest:
+            keys_to_delete = [key for key in candidates if key == prefix]
+        else:
+            matcher = re.compile(fnmatch.translate(pattern)).match
+            keys_to_delete = [key for key in candidates if matcher(key)]
+            
+        for key in keys_to_delete:
+            self._remove_entry(region_id, key)
             
         return len(keys_to_delete)
         
     def invalidate_by_tag(self, region_id: str, tag: str) -> int:
         """Инвалидация по тегу"""
-        region_entries = self.entries.get(region_id, {})
-        
-        keys_to_delete = [
-            key for key, entry in region_entries.items()
-            if tag in entry.tags
-        ]
+        index = self.region_indexes.get(region_id)
+        if not index:
+            return 0
+            
+        keys_to_delete = list(index.tag_keys.get(tag, ()))
         
         for key in keys_to_delete:
-            del region_entries[key]
-            
-        region = self.regions.get(region_id)
-        if region:
-            region.entry_count = len(region_entries)
+            self._remove_entry(region_id, key)
             
         return len(keys_to_delete)
         
@@ -370,7 +558,9 @@ class CachePlatform:
         
         region = self.regions.get(region_id)
         if region:
+            self.region_indexes[region_id] = RegionIndex(region.eviction_policy)
             region.entry_count = 0
+            region.memory_used_bytes = 0
             region.memory_used_mb = 0
             
         return count
@@ -427,9 +617,11 @@ class CachePlatform:
             "name": region.name,
             "entry_count": region.entry_count,
             "memory_used_mb": region.memory_used_mb,
+            "memory_used_bytes": region.memory_used_bytes,
             "max_memory_mb": region.max_memory_mb,
             "hits": region.hits,
             "misses": region.misses,
+            "evictions": region.evictions,
             "hit_rate": hit_rate,
             "eviction_policy": region.eviction_policy.value
         }
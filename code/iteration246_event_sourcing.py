@@ -15,10 +15,21 @@ Server Init - Iteration 246: Event Sourcing Platform
 """
 
 import asyncio
+import bisect
+import copy
+import mmap
+import os
 import random
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from array import array
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Callable
+from typing import Dict, List, Optional, Any, Callable, Iterable, Tuple
 from enum import Enum
 import uuid
 import json
@@ -88,7 +99,6 @@ class EventStream:
     aggregate_id: str = ""
     
     # Events
-    events: List[Event] = field(default_factory=list)
     current_version: int = 0
     
     # State
@@ -172,23 +182,373 @@ class Subscription:
     messages_acknowledged: int = 0
 
 
+# Storage
+RECORD_HEADER = struct.Struct("<IIQ")  # payload length, crc32, global position
+ENVELOPE_LENGTH = struct.Struct("<I")
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+SPARSE_INDEX_INTERVAL = 64
+GROUP_COMMIT_EVENTS = 256
+GROUP_COMMIT_INTERVAL_MS = 10
+SNAPSHOT_EVERY_EVENTS = 100
+
+_json_decode = json.JSONDecoder().decode
+
+
+class LogSegment:
+    """Сегмент лога: файл записей и разреженный индекс позиция -> смещение"""
+    
+    def __init__(self, path: str, base_position: int):
+        self.path = path
+        self.base_position = base_position
+        self.last_position = base_position - 1
+        self.size = 0
+        
+        # Sparse index: каждая SPARSE_INDEX_INTERVAL-я запись
+        self.index_positions = array('q')
+        self.index_offsets = array('q')
+        
+        self._map: Optional[mmap.mmap] = None
+        self._mapped_size = 0
+        
+    def note(self, position: int, offset: int, record_size: int):
+        if (position - self.base_position) % SPARSE_INDEX_INTERVAL == 0:
+            self.index_positions.append(position)
+            self.index_offsets.append(offset)
+        self.last_position = position
+        self.size = offset + record_size
+        
+    def floor_offset(self, position: int) -> int:
+        """Смещение ближайшей проиндексированной записи не правее position"""
+        i = bisect.bisect_right(self.index_positions, position) - 1
+        return self.index_offsets[i] if i >= 0 else 0
+        
+    def view(self, end: int) -> mmap.mmap:
+        """Отображение файла, покрывающее байты [0, end)"""
+        if self._map is None or self._mapped_size < end:
+            if self._map is not None:
+                self._map.close()
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped_size = len(self._map)
+        return self._map
+        
+    def seek(self, position: int) -> int:
+        """Смещение записи position: разреженный индекс + проход по заголовкам"""
+        offset = self.floor_offset(position)
+        view = self.view(self.size)
+        while offset < self.size:
+            length, _, current = RECORD_HEADER.unpack_from(view, offset)
+            if current >= position:
+                break
+            offset += RECORD_HEADER.size + length
+        return offset
+        
+    def read_at(self, offset: int) -> Tuple[int, bytes, int]:
+        """Запись по смещению: (позиция, payload, смещение следующей)"""
+        view = self.view(offset + RECORD_HEADER.size)
+        length, _, position = RECORD_HEADER.unpack_from(view, offset)
+        start = offset + RECORD_HEADER.size
+        view = self.view(start + length)
+        return position, view[start:start + length], start + length
+        
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+            self._mapped_size = 0
+
+
+class SegmentedEventLog:
+    """Append-only лог на диске из сегментов с записями [length|crc32|position|payload]
+    
+    Каждая запись сразу уходит в ОС одним write (переживает падение процесса),
+    fsync выполняется группой: после group_commit_events записей или фоновым
+    потоком не позже чем через group_commit_interval_ms после первой
+    несинхронизированной.
+    """
+    
+    def __init__(self, directory: str,
+                 segment_max_bytes: int = SEGMENT_MAX_BYTES,
+                 group_commit_events: int = GROUP_COMMIT_EVENTS,
+                 group_commit_interval_ms: int = GROUP_COMMIT_INTERVAL_MS):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.group_commit_events = group_commit_events
+        self.group_commit_interval = group_commit_interval_ms / 1000
+        
+        self.segments: List[LogSegment] = []
+        self.segment_bases: List[int] = []
+        self.last_position = 0
+        self.durable_position = 0
+        
+        self._file = None
+        self._unsynced = 0
+        self._first_unsynced_at = 0.0
+        self.fsyncs = 0
+        
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        
+        os.makedirs(directory, exist_ok=True)
+        
+    def recover(self) -> Iterable[Tuple[int, LogSegment, int, bytes]]:
+        """Последовательный проход по сегментам: (позиция, сегмент, смещение, payload)
+        
+        Проверяет CRC, обрезает недописанный хвост последнего сегмента и
+        восстанавливает разреженные индексы.
+        """
+        names = sorted(n for n in os.listdir(self.directory) if n.endswith(".log"))
+        for n, name in enumerate(names):
+            segment = LogSegment(os.path.join(self.directory, name), int(name[:-4]))
+            file_size = os.path.getsize(segment.path)
+            self.segments.append(segment)
+            self.segment_bases.append(segment.base_position)
+            if not file_size:
+                continue
+                
+            view = segment.view(file_size)
+            offset = 0
+            while offset + RECORD_HEADER.size <= file_size:
+                length, crc, position = RECORD_HEADER.unpack_from(view, offset)
+                start = offset + RECORD_HEADER.size
+                if start + length > file_size:
+                    break
+                payload = view[start:start + length]
+                if zlib.crc32(payload) != crc:
+                    break
+                segment.note(position, offset, RECORD_HEADER.size + length)
+                yield position, segment, offset, payload
+                offset = start + length
+                
+            if offset != file_size:
+                if n != len(names) - 1:
+                    raise ValueError(f"Corrupted event log segment: {segment.path}")
+                segment.close()
+                with open(segment.path, "r+b") as f:
+                    f.truncate(offset)
+                    
+            self.last_position = max(self.last_position, segment.last_position)
+            
+        self.durable_position = self.last_position
+        
+    def _roll_segment(self, base_position: int) -> LogSegment:
+        if self._file:
+            self.commit()
+            self._file.close()
+        segment = LogSegment(os.path.join(self.directory, f"{base_position:020d}.log"), base_position)
+        self.segments.append(segment)
+        self.segment_bases.append(base_position)
+        self._file = open(segment.path, "ab", buffering=0)
+        return segment
+        
+    def append(self, position: int, payload: bytes) -> Tuple[LogSegment, int]:
+        """Добавление записи, возвращает (сегмент, смещение)"""
+        with self._lock:
+            segment = self.segments[-1] if self.segments else None
+            if segment is None or segment.size >= self.segment_max_bytes:
+                segment = self._roll_segment(position)
+            elif self._file is None:
+                self._file = open(segment.path, "ab", buffering=0)
+                
+            offset = segment.size
+            self._file.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload), position) + payload)
+            segment.note(position, offset, RECORD_HEADER.size + len(payload))
+            self.last_position = position
+            
+            if not self._unsynced:
+                self._first_unsynced_at = time.monotonic()
+            self._unsynced += 1
+            if self._unsynced >= self.group_commit_events:
+                self.commit()
+            elif self._flusher is None:
+                self._start_flusher()
+        return segment, offset
+        
+    def _start_flusher(self):
+        self._flusher = threading.Thread(target=self._flush_loop, name="event-log-flusher", daemon=True)
+        self._flusher.start()
+        
+    def _flush_loop(self):
+        """Фоновый group commit: fsync не позже group_commit_interval после первой записи"""
+        interval = self.group_commit_interval
+        wait = interval
+        while not self._closed.wait(wait):
+            with self._lock:
+                wait = interval
+                if self._unsynced:
+                    due = self._first_unsynced_at + interval - time.monotonic()
+                    if due > 0:
+                        wait = due
+                    else:
+                        self.commit()
+                        
+    def commit(self):
+        """Group commit: fsync накопленных записей"""
+        with self._lock:
+            if not self._file or not self._unsynced:
+                return
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+            self.durable_position = self.last_position
+            self.fsyncs += 1
+        
+    def segment_for(self, position: int) -> Optional[LogSegment]:
+        i = bisect.bisect_right(self.segment_bases, position) - 1
+        return self.segments[i] if i >= 0 else None
+        
+    def read_at(self, segment: LogSegment, offset: int) -> bytes:
+        return segment.read_at(offset)[1]
+        
+    def scan(self, from_position: int, max_count: int) -> Iterable[bytes]:
+        """Чтение до max_count записей начиная с from_position: O(log n + k)"""
+        if from_position < 1:
+            from_position = 1
+        i = bisect.bisect_right(self.segment_bases, from_position) - 1
+        i = max(i, 0)
+        count = 0
+        
+        while i < len(self.segments) and count < max_count:
+            segment = self.segments[i]
+            if segment.last_position >= from_position:
+                offset = segment.seek(from_position)
+                while offset < segment.size and count < max_count:
+                    _, payload, offset = segment.read_at(offset)
+                    count += 1
+                    yield payload
+            i += 1
+            
+    def close(self):
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        self._closed.clear()
+        self.commit()
+        if self._file:
+            self._file.close()
+            self._file = None
+        for segment in self.segments:
+            segment.close()
+            
+    def size_bytes(self) -> int:
+        return sum(segment.size for segment in self.segments)
+
+
 class EventSourcingPlatform:
     """Платформа Event Sourcing"""
     
-    def __init__(self):
+    def __init__(self, data_dir: str,
+                 segment_max_bytes: int = SEGMENT_MAX_BYTES,
+                 group_commit_events: int = GROUP_COMMIT_EVENTS,
+                 group_commit_interval_ms: int = GROUP_COMMIT_INTERVAL_MS,
+                 snapshot_every: int = SNAPSHOT_EVERY_EVENTS):
+        # The caller owns the directory: the store is durable only on a real path
+        self.data_dir = data_dir
+        self.snapshot_every = snapshot_every
+        
         self.streams: Dict[str, EventStream] = {}
-        self.events: List[Event] = []
         self.snapshots: Dict[str, List[Snapshot]] = {}
         self.projections: Dict[str, Projection] = {}
         self.subscriptions: Dict[str, Subscription] = {}
         
+        # Per-stream index: stream_position - 1 -> global position / offset in segment
+        self.stream_positions: Dict[str, array] = {}
+        self.stream_offsets: Dict[str, array] = {}
+        
         self._global_position = 0
         self._projection_handlers: Dict[str, Callable] = {}
         
-    def _compute_hash(self, data: Dict) -> str:
-        """Вычисление хеша данных"""
-        json_str = json.dumps(data, sort_keys=True, default=str)
-        return hashlib.sha256(json_str.encode()).hexdigest()[:16]
+        self._snapshot_dir = os.path.join(self.data_dir, "snapshots")
+        self._streams_path = os.path.join(self.data_dir, "streams.jsonl")
+        os.makedirs(self._snapshot_dir, exist_ok=True)
+        self.log = SegmentedEventLog(
+            os.path.join(self.data_dir, "log"),
+            segment_max_bytes=segment_max_bytes,
+            group_commit_events=group_commit_events,
+            group_commit_interval_ms=group_commit_interval_ms
+        )
+        self._open()
+        
+    def _open(self):
+        """Восстановление потоков, снапшотов и индексов с диска"""
+        if os.path.exists(self._streams_path):
+            with open(self._streams_path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    stream_id, name, category, aggregate_type, aggregate_id, metadata, created = json.loads(line)
+                    self._register_stream(EventStream(
+                        stream_id=stream_id,
+                        stream_name=name,
+                        category=category,
+                        aggregate_type=aggregate_type,
+                        aggregate_id=aggregate_id,
+                        metadata=metadata,
+                        created_at=datetime.fromtimestamp(created)
+                    ))
+                    
+        for name in os.listdir(self._snapshot_dir):
+            if name.endswith(".json"):
+                with open(os.path.join(self._snapshot_dir, name), encoding="utf-8") as f:
+                    raw = json.load(f)
+                self.snapshots[raw["stream_id"]] = [Snapshot(
+                    snapshot_id=raw["snapshot_id"],
+                    stream_id=raw["stream_id"],
+                    version=raw["version"],
+                    state=raw["state"],
+                    created_at=datetime.fromtimestamp(raw["created_at"])
+                )]
+                
+        for position, _, offset, payload in self.log.recover():
+            (length,) = ENVELOPE_LENGTH.unpack_from(payload)
+            envelope = json.loads(payload[ENVELOPE_LENGTH.size:ENVELOPE_LENGTH.size + length])
+            stream = self.streams.get(envelope[3])
+            if stream:
+                stream.current_version = envelope[4]
+                stream.last_event_at = datetime.fromtimestamp(envelope[6])
+                self.stream_positions[stream.stream_id].append(position)
+                self.stream_offsets[stream.stream_id].append(offset)
+                
+        self._global_position = self.log.last_position
+        
+    def _compute_hash(self, data_bytes: bytes) -> str:
+        """Вычисление хеша данных (по уже сериализованным байтам)"""
+        return hashlib.blake2b(data_bytes, digest_size=8).hexdigest()
+        
+    def _encode_event(self, event: Event, data_bytes: bytes) -> bytes:
+        envelope = json.dumps([
+            event.event_id, event.event_type, event.event_category.value,
+            event.stream_id, event.stream_position, event.global_position,
+            event.timestamp.timestamp(), event.metadata,
+            event.correlation_id, event.causation_id, event.data_hash
+        ], separators=(",", ":"), default=str).encode()
+        return ENVELOPE_LENGTH.pack(len(envelope)) + envelope + data_bytes
+        
+    def _decode_event(self, payload: bytes) -> Event:
+        (length,) = ENVELOPE_LENGTH.unpack_from(payload)
+        start = ENVELOPE_LENGTH.size
+        (event_id, event_type, category, stream_id, stream_position, global_position,
+         timestamp, metadata, correlation_id, causation_id, data_hash) = _json_decode(payload[start:start + length].decode())
+        return Event(
+            event_id=event_id,
+            event_type=event_type,
+            event_category=EventType(category),
+            stream_id=stream_id,
+            stream_position=stream_position,
+            global_position=global_position,
+            data=_json_decode(payload[start + length:].decode()),
+            metadata=metadata,
+            causation_id=causation_id,
+            correlation_id=correlation_id,
+            timestamp=datetime.fromtimestamp(timestamp),
+            data_hash=data_hash
+        )
+        
+    def _register_stream(self, stream: EventStream):
+        self.streams[stream.stream_id] = stream
+        self.stream_positions[stream.stream_id] = array('q')
+        self.stream_offsets[stream.stream_id] = array('q')
         
     def create_stream(self, category: str, aggregate_type: str,
                      aggregate_id: str, metadata: Dict[str, Any] = None) -> EventStream:
@@ -204,7 +564,15 @@ class EventSourcingPlatform:
             metadata=metadata or {}
         )
         
-        self.streams[stream.stream_id] = stream
+        with open(self._streams_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps([
+                stream.stream_id, stream_name, category, aggregate_type, aggregate_id,
+                stream.metadata, stream.created_at.timestamp()
+            ], default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+            
+        self._register_stream(stream)
         return stream
         
     def append_event(self, stream_id: str, event_type: str,
@@ -228,6 +596,7 @@ class EventSourcingPlatform:
         self._global_position += 1
         stream.current_version += 1
         
+        data_bytes = json.dumps(data, separators=(",", ":"), default=str).encode()
         event = Event(
             event_id=f"evt_{uuid.uuid4().hex[:8]}",
             event_type=event_type,
@@ -238,52 +607,100 @@ class EventSourcingPlatform:
             metadata=metadata or {},
             correlation_id=correlation_id or str(uuid.uuid4()),
             causation_id=causation_id or "",
-            data_hash=self._compute_hash(data)
+            data_hash=self._compute_hash(data_bytes)
         )
         
-        stream.events.append(event)
+        _, offset = self.log.append(event.global_position, self._encode_event(event, data_bytes))
+        self.stream_positions[stream_id].append(event.global_position)
+        self.stream_offsets[stream_id].append(offset)
         stream.last_event_at = event.timestamp
-        self.events.append(event)
         
         # Process projections
         self._process_event_for_projections(event)
         
         return event
         
+    def append_events(self, stream_id: str,
+                     events: List[Tuple[str, Dict[str, Any]]],
+                     expected_version: int = None,
+                     correlation_id: str = None) -> List[Event]:
+        """Пакетное добавление событий с одним fsync в конце"""
+        appended = []
+        for event_type, data in events:
+            event = self.append_event(stream_id, event_type, data,
+                                      expected_version=expected_version,
+                                      correlation_id=correlation_id)
+            if not event:
+                break
+            appended.append(event)
+            expected_version = None
+        self.log.commit()
+        return appended
+        
+    def commit(self):
+        """Принудительный group commit"""
+        self.log.commit()
+        
+    def close(self):
+        """Сброс буферов и закрытие сегментов"""
+        self.log.close()
+        
     def read_stream(self, stream_id: str, from_version: int = 0,
                    max_count: int = 100) -> List[Event]:
         """Чтение событий из потока"""
-        stream = self.streams.get(stream_id)
-        if not stream:
+        positions = self.stream_positions.get(stream_id)
+        if positions is None:
             return []
             
-        events = [e for e in stream.events if e.stream_position > from_version]
-        return events[:max_count]
+        offsets = self.stream_offsets[stream_id]
+        start = max(0, from_version)
+        end = min(len(positions), start + max_count)
+        log = self.log
+        return [
+            self._decode_event(log.read_at(log.segment_for(positions[i]), offsets[i]))
+            for i in range(start, end)
+        ]
         
     def read_all(self, from_position: int = 0, max_count: int = 100) -> List[Event]:
         """Чтение всех событий"""
-        events = [e for e in self.events if e.global_position > from_position]
-        return events[:max_count]
+        return [self._decode_event(payload) for payload in self.log.scan(from_position + 1, max_count)]
         
-    def create_snapshot(self, stream_id: str, state: Dict[str, Any]) -> Optional[Snapshot]:
-        """Создание снапшота"""
-        stream = self.streams.get(stream_id)
-        if not stream:
-            return None
-            
+    def _store_snapshot(self, stream_id: str, state: Dict[str, Any], version: int) -> Snapshot:
+        """Сохранение снапшота на диск (атомарная замена файла)"""
         snapshot = Snapshot(
             snapshot_id=f"snap_{uuid.uuid4().hex[:8]}",
             stream_id=stream_id,
-            version=stream.current_version,
-            state=state
+            version=version
         )
         
-        if stream_id not in self.snapshots:
-            self.snapshots[stream_id] = []
-            
-        self.snapshots[stream_id].append(snapshot)
+        encoded = json.dumps({
+            "snapshot_id": snapshot.snapshot_id,
+            "stream_id": stream_id,
+            "version": version,
+            "state": state,
+            "created_at": snapshot.created_at.timestamp()
+        }, default=str)
+        # Снапшот хранит собственную копию состояния, как после перезапуска
+        snapshot.state = json.loads(encoded)["state"]
+        
+        path = os.path.join(self._snapshot_dir, f"{stream_id}.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(encoded)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        
+        self.snapshots.setdefault(stream_id, []).append(snapshot)
         return snapshot
         
+    def create_snapshot(self, stream_id: str, state: Dict[str, Any]) -> Optional[Snapshot]:
+        """Создание снапшота"""
+        stream = self.streams.get(stream_id)
+        if not stream:
+            return None
+            
+        return self._store_snapshot(stream_id, state, stream.current_version)
+        
     def get_latest_snapshot(self, stream_id: str) -> Optional[Snapshot]:
         """Получение последнего снапшота"""
         snapshots = self.snapshots.get(stream_id, [])
@@ -296,17 +713,25 @@ class EventSourcingPlatform:
         snapshot = self.get_latest_snapshot(stream_id)
         
         if snapshot:
-            state = snapshot.state.copy()
+            state = copy.deepcopy(snapshot.state)
             from_version = snapshot.version
         else:
             state = {}
             from_version = 0
             
         # Apply events
-        events = self.read_stream(stream_id, from_version)
-        
-        for event in events:
-            state = reducer(state, event)
+        version = from_version
+        while True:
+            events = self.read_stream(stream_id, version, 1000)
+            if not events:
+                break
+            for event in events:
+                state = reducer(state, event)
+            version = events[-1].stream_position
+            
+        # Long replays leave a snapshot behind for the next rebuild
+        if self.snapshot_every and version - from_version >= self.snapshot_every:
+            self._store_snapshot(stream_id, state, version)
             
         return state
         
@@ -378,8 +803,12 @@ class EventSourcingPlatform:
         
         return {
             "total_streams": len(self.streams),
-            "total_events": len(self.events),
+            "total_events": self._global_position,
             "global_position": self._global_position,
+            "durable_position": self.log.durable_position,
+            "log_segments": len(self.log.segments),
+            "log_bytes": self.log.size_bytes(),
+            "fsyncs": self.log.fsyncs,
             "total_snapshots": total_snapshots,
             "total_projections": len(self.projections),
             "running_projections": running_projections,
@@ -393,8 +822,9 @@ async def main():
     print("Server Init - Iteration 246: Event Sourcing Platform")
     print("=" * 60)
     
-    platform = EventSourcingPlatform()
-    print("✓ Event Sourcing Platform created")
+    data_dir = tempfile.mkdtemp(prefix="event_store_")
+    platform = EventSourcingPlatform(data_dir)
+    print(f"✓ Event Sourcing Platform created ({data_dir})")
     
     # Create streams for different aggregates
     print("\n📊 Creating Event Streams...")
@@ -508,7 +938,7 @@ async def main():
     
     for stream in platform.streams.values():
         name = stream.stream_name[:28].ljust(28)
-        events = str(len(stream.events))[:8].ljust(8)
+        events = str(stream.current_version)[:8].ljust(8)
         version = str(stream.current_version)[:9].ljust(9)
         status = "🟢" if stream.state == StreamState.ACTIVE else "🔴"
         
@@ -556,7 +986,8 @@ async def main():
     
     print(f"\n  Correlation ID: {correlation_id[:8]}...")
     
-    correlated = [e for e in platform.events if e.correlation_id == correlation_id]
+    all_events = platform.read_all(0, platform.get_statistics()["total_events"])
+    correlated = [e for e in all_events if e.correlation_id == correlation_id]
     print(f"  Related Events: {len(correlated)}")
     
     # Statistics
@@ -569,13 +1000,26 @@ async def main():
     print(f"  Global Position: {stats['global_position']}")
     print(f"  Total Snapshots: {stats['total_snapshots']}")
     print(f"  Running Projections: {stats['running_projections']}/{stats['total_projections']}")
+    print(f"  Log: {stats['log_segments']} segment(s), {stats['log_bytes']} bytes, {stats['fsyncs']} fsync(s)")
     
     # Events per stream
     print("\n  Events per Stream:")
     for stream in platform.streams.values():
-        bar = "█" * len(stream.events) + "░" * (10 - len(stream.events))
-        print(f"    {stream.stream_name[:20]:20s} [{bar}] {len(stream.events)}")
+        bar = "█" * stream.current_version + "░" * (10 - stream.current_version)
+        print(f"    {stream.stream_name[:20]:20s} [{bar}] {stream.current_version}")
         
+    # Restart from disk
+    print("\n💾 Reopening Event Store...")
+    
+    platform.close()
+    platform = EventSourcingPlatform(data_dir)
+    restored_state = platform.rebuild_state(account_stream.stream_id, account_reducer)
+    snapshot = platform.get_latest_snapshot(account_stream.stream_id)
+    print(f"  Streams: {len(platform.streams)}, Events: {platform.get_statistics()['total_events']}")
+    print(f"  Balance from snapshot v{snapshot.version}: ${restored_state.get('balance', 0):.2f}")
+    platform.close()
+    shutil.rmtree(data_dir, ignore_errors=True)
+    
     # Dashboard
     print("\n┌────────────────────────────────────────────────────────────────────┐")
     print("│                   Event Sourcing Dashboard                          │")
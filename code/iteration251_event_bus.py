@@ -16,14 +16,26 @@ Server Init - Iteration 251: Event Bus Platform
 
 import asyncio
 import random
+import sys
+import time
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Callable, Set
+from functools import lru_cache
+from typing import Dict, List, Optional, Any, Callable, Set, Tuple
 from enum import Enum
 import uuid
 import json
 
 
+# Delivery
+DELIVERY_QUEUE_SIZE = 10000
+KEY_HASH_CACHE_SIZE = 65536
+
+# Kafka-compatible murmur2
+MURMUR2_SEED = 0x9747B28C
+MURMUR2_M = 0x5BD1E995
+
+
 class TopicState(Enum):
     """Состояние топика"""
     ACTIVE = "active"
@@ -163,6 +175,7 @@ class Subscription:
     ack_mode: AckMode = AckMode.MANUAL
     max_retries: int = 3
     retry_delay_ms: int = 1000
+    concurrency: int = 1
     
     # Filter
     event_type_filter: List[str] = field(default_factory=list)
@@ -226,6 +239,113 @@ class DeadLetterEntry:
     last_retry_at: Optional[datetime] = None
 
 
+@lru_cache(maxsize=KEY_HASH_CACHE_SIZE)
+def murmur2(key: str) -> int:
+    """Murmur2 ключа (совместим с DefaultPartitioner Kafka)"""
+    data = key.encode()
+    length = len(data)
+    h = (MURMUR2_SEED ^ length) & 0xFFFFFFFF
+    
+    tail = length & ~3
+    for i in range(0, tail, 4):
+        k = int.from_bytes(data[i:i + 4], "little")
+        k = (k * MURMUR2_M) & 0xFFFFFFFF
+        k ^= k >> 24
+        k = (k * MURMUR2_M) & 0xFFFFFFFF
+        h = (h * MURMUR2_M) & 0xFFFFFFFF
+        h ^= k
+        
+    remaining = length & 3
+    if remaining == 3:
+        h ^= data[tail + 2] << 16
+    if remaining >= 2:
+        h ^= data[tail + 1] << 8
+    if remaining >= 1:
+        h ^= data[tail]
+        h = (h * MURMUR2_M) & 0xFFFFFFFF
+        
+    h ^= h >> 13
+    h = (h * MURMUR2_M) & 0xFFFFFFFF
+    h ^= h >> 15
+    return h
+
+
+def partition_for_key(key: str, partitions: int) -> int:
+    """Стабильный выбор партиции по ключу"""
+    if not key or partitions <= 1:
+        return 0
+    return (murmur2(key) & 0x7FFFFFFF) % partitions
+
+
+def estimate_size(value: Any) -> int:
+    """Приблизительный размер JSON-представления без сериализации"""
+    if value is None or isinstance(value, bool):
+        return 5
+    if isinstance(value, str):
+        return len(value) + 2
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (int, float)):
+        return 8
+    if isinstance(value, dict):
+        return 2 + sum(len(str(k)) + 4 + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return 2 + sum(estimate_size(v) + 1 for v in value)
+    return len(str(value))
+
+
+class SubscriptionDispatcher:
+    """Очереди доставки подписки и их воркеры"""
+    
+    def __init__(self, subscription: Subscription, deliver: Callable,
+                 lanes: int, ordered: bool,
+                 queue_size: int = DELIVERY_QUEUE_SIZE):
+        self.subscription = subscription
+        self.deliver = deliver
+        self.ordered = ordered
+        self.queues: List[asyncio.Queue] = [asyncio.Queue(maxsize=queue_size) for _ in range(max(1, lanes))]
+        self.workers = [asyncio.ensure_future(self._run(q)) for q in self.queues]
+        self._next_lane = 0
+        
+    def _lane(self, event: Event) -> asyncio.Queue:
+        # Ordered topics pin a partition to one lane to keep in-partition order
+        if self.ordered:
+            return self.queues[event.partition % len(self.queues)]
+        self._next_lane = (self._next_lane + 1) % len(self.queues)
+        return self.queues[self._next_lane]
+        
+    def offer(self, event: Event) -> bool:
+        """Постановка в очередь без ожидания"""
+        queue = self._lane(event)
+        if queue.full():
+            return False
+        queue.put_nowait(event)
+        return True
+        
+    async def put(self, event: Event):
+        """Постановка в очередь с backpressure"""
+        await self._lane(event).put(event)
+        
+    async def _run(self, queue: asyncio.Queue):
+        while True:
+            event = await queue.get()
+            try:
+                await self.deliver(self.subscription, event)
+            finally:
+                queue.task_done()
+                
+    def pending(self) -> int:
+        return sum(q.qsize() for q in self.queues)
+        
+    async def join(self):
+        for queue in self.queues:
+            await queue.join()
+            
+    def close(self):
+        for worker in self.workers:
+            worker.cancel()
+
+
 class EventBus:
     """Распределённая шина событий"""
     
@@ -237,6 +357,15 @@ class EventBus:
         self.consumer_groups: Dict[str, ConsumerGroup] = {}
         self.dead_letter_queue: List[DeadLetterEntry] = []
         
+        # Indexes
+        self.topics_by_name: Dict[str, str] = {}  # name -> topic_id
+        self.topic_partitions: Dict[str, List[Partition]] = {}  # topic_id -> partitions by number
+        self.partition_events: Dict[Tuple[str, int], List[Event]] = {}  # (topic_id, partition) -> events by offset
+        self.topic_subscriptions: Dict[str, List[Subscription]] = {}  # topic_id -> subscriptions
+        
+        # Delivery
+        self.dispatchers: Dict[str, SubscriptionDispatcher] = {}
+        
         # Counters
         self._total_published = 0
         self._total_delivered = 0
@@ -255,6 +384,9 @@ class EventBus:
         
         self.topics[topic.topic_id] = topic
         self.events[topic.topic_id] = []
+        self.topics_by_name[name] = topic.topic_id
+        self.topic_partitions[topic.topic_id] = []
+        self.topic_subscriptions[topic.topic_id] = []
         
         # Create partitions
         for i in range(partitions):
@@ -265,124 +397,168 @@ class EventBus:
                 leader_broker=f"broker-{i % 3}"
             )
             self.partitions[partition.partition_id] = partition
+            self.topic_partitions[topic.topic_id].append(partition)
+            self.partition_events[(topic.topic_id, i)] = []
             
         return topic
         
+    def _get_topic(self, name: str) -> Optional[Topic]:
+        """Поиск топика по имени"""
+        topic_id = self.topics_by_name.get(name)
+        return self.topics.get(topic_id) if topic_id else None
+        
     async def publish(self, topic_name: str, event_type: str,
                      value: Any, key: str = "",
                      headers: Dict[str, str] = None,
                      priority: EventPriority = EventPriority.NORMAL) -> Optional[Event]:
         """Публикация события"""
-        # Find topic
-        topic = None
-        for t in self.topics.values():
-            if t.name == topic_name and t.state == TopicState.ACTIVE:
-                topic = t
-                break
-                
-        if not topic:
-            return None
+        events = await self.publish_batch(topic_name, [{
+            "event_type": event_type,
+            "value": value,
+            "key": key,
+            "headers": headers,
+            "priority": priority
+        }])
+        return events[0] if events else None
+        
+    async def publish_batch(self, topic_name: str,
+                           items: List[Dict[str, Any]]) -> List[Event]:
+        """Пакетная публикация событий"""
+        topic = self._get_topic(topic_name)
+        if not topic or topic.state != TopicState.ACTIVE:
+            return []
             
-        # Calculate partition
-        partition_num = 0
-        if key:
-            partition_num = hash(key) % topic.partitions
-            
-        # Get partition
-        partition = None
-        for p in self.partitions.values():
-            if p.topic_id == topic.topic_id and p.partition_number == partition_num:
-                partition = p
-                break
-                
-        if not partition:
-            return None
+        partitions = self.topic_partitions[topic.topic_id]
+        topic_events = self.events[topic.topic_id]
+        now = datetime.now()
+        batch_bytes = 0
+        
+        events = []
+        for item in items:
+            key = item.get("key") or ""
+            partition_num = partition_for_key(key, topic.partitions)
+            partition = partitions[partition_num]
+            value = item.get("value")
+            
+            event = Event(
+                event_id=f"evt_{uuid.uuid4().hex[:8]}",
+                topic_id=topic.topic_id,
+                partition=partition_num,
+                offset=partition.high_watermark,
+                event_type=item.get("event_type", ""),
+                key=key,
+                value=value,
+                headers=item.get("headers") or {},
+                priority=item.get("priority", EventPriority.NORMAL),
+                size_bytes=estimate_size(value),
+                timestamp=now
+            )
+            
+            # Update partition
+            partition.high_watermark += 1
+            partition.message_count += 1
+            partition.bytes_total += event.size_bytes
+            batch_bytes += event.size_bytes
+            
+            self.partition_events[(topic.topic_id, partition_num)].append(event)
+            events.append(event)
             
-        # Create event
-        event = Event(
-            event_id=f"evt_{uuid.uuid4().hex[:8]}",
-            topic_id=topic.topic_id,
-            partition=partition_num,
-            offset=partition.high_watermark,
-            event_type=event_type,
-            key=key,
-            value=value,
-            headers=headers or {},
-            priority=priority,
-            size_bytes=len(json.dumps(value, default=str))
-        )
-        
-        # Update partition
-        partition.high_watermark += 1
-        partition.message_count += 1
-        partition.bytes_total += event.size_bytes
-        
         # Update topic
-        topic.message_count += 1
-        topic.bytes_total += event.size_bytes
+        topic.message_count += len(events)
+        topic.bytes_total += batch_bytes
         
-        # Store event
-        self.events[topic.topic_id].append(event)
-        self._total_published += 1
+        # Store events
+        topic_events.extend(events)
+        self._total_published += len(events)
         
-        # Deliver to subscribers
-        await self._deliver_event(event)
+        # Hand over to subscription queues
+        await self._enqueue(topic, events)
         
-        return event
+        return events
         
-    async def _deliver_event(self, event: Event):
-        """Доставка события подписчикам"""
-        for sub in self.subscriptions.values():
-            if sub.topic_id != event.topic_id:
-                continue
-                
+    def _matches(self, sub: Subscription, event: Event,
+                 assigned_partitions: Optional[List[int]]) -> bool:
+        """Проверка фильтров и назначения партиций"""
+        if sub.event_type_filter and event.event_type not in sub.event_type_filter:
+            return False
+            
+        if sub.key_filter and sub.key_filter not in event.key:
+            return False
+            
+        if assigned_partitions is not None and event.partition not in assigned_partitions:
+            return False
+            
+        return True
+        
+    async def _enqueue(self, topic: Topic, events: List[Event]):
+        """Раскладка событий по очередям подписок"""
+        for sub in self.topic_subscriptions.get(topic.topic_id, []):
             if sub.state != SubscriptionState.ACTIVE:
                 continue
                 
-            # Check filter
-            if sub.event_type_filter and event.event_type not in sub.event_type_filter:
-                continue
-                
-            if sub.key_filter and sub.key_filter not in event.key:
-                continue
-                
             # Check consumer group partition assignment
+            assigned_partitions = None
             if sub.consumer_group:
                 group = self.consumer_groups.get(sub.consumer_group)
                 if group:
                     assigned_partitions = group.assignments.get(sub.subscription_id, [])
-                    if event.partition not in assigned_partitions:
-                        continue
-                        
-            # Deliver
-            try:
-                if sub.handler:
-                    await sub.handler(event)
                     
-                sub.messages_received += 1
-                self._total_delivered += 1
-                
-                # Auto ack
-                if sub.ack_mode == AckMode.AUTO:
-                    await self.acknowledge(sub.subscription_id, event.partition, event.offset)
+            dispatcher = self._get_dispatcher(sub, topic)
+            for event in events:
+                if not self._matches(sub, event, assigned_partitions):
+                    continue
+                if not dispatcher.offer(event):
+                    await dispatcher.put(event)
                     
-            except Exception as e:
-                sub.messages_rejected += 1
-                await self._send_to_dlq(event, sub.subscription_id, str(e))
+    def _get_dispatcher(self, sub: Subscription, topic: Topic) -> SubscriptionDispatcher:
+        """Ленивый запуск воркеров подписки"""
+        dispatcher = self.dispatchers.get(sub.subscription_id)
+        if dispatcher is None:
+            lanes = min(sub.concurrency, topic.partitions) if topic.ordered else sub.concurrency
+            dispatcher = SubscriptionDispatcher(sub, self._deliver_event, lanes, topic.ordered)
+            self.dispatchers[sub.subscription_id] = dispatcher
+        return dispatcher
+        
+    async def _deliver_event(self, sub: Subscription, event: Event):
+        """Доставка события подписчику"""
+        if sub.state != SubscriptionState.ACTIVE:
+            return
+            
+        try:
+            if sub.handler:
+                await sub.handler(event)
+                
+            sub.messages_received += 1
+            self._total_delivered += 1
+            
+            # Auto ack
+            if sub.ack_mode == AckMode.AUTO:
+                await self.acknowledge(sub.subscription_id, event.partition, event.offset)
                 
+        except Exception as e:
+            sub.messages_rejected += 1
+            await self._send_to_dlq(event, sub.subscription_id, str(e))
+            
+    async def drain(self):
+        """Ожидание доставки всех поставленных в очередь событий"""
+        for dispatcher in list(self.dispatchers.values()):
+            await dispatcher.join()
+            
+    async def close(self):
+        """Остановка воркеров доставки"""
+        await self.drain()
+        for dispatcher in self.dispatchers.values():
+            dispatcher.close()
+        self.dispatchers.clear()
+        
     def subscribe(self, topic_name: str, name: str,
                  consumer_group: str = "",
                  delivery_mode: DeliveryMode = DeliveryMode.AT_LEAST_ONCE,
                  event_type_filter: List[str] = None,
-                 handler: Callable = None) -> Optional[Subscription]:
+                 handler: Callable = None,
+                 concurrency: int = 1) -> Optional[Subscription]:
         """Подписка на топик"""
-        # Find topic
-        topic = None
-        for t in self.topics.values():
-            if t.name == topic_name:
-                topic = t
-                break
-                
+        topic = self._get_topic(topic_name)
         if not topic:
             return None
             
@@ -393,15 +569,16 @@ class EventBus:
             consumer_group=consumer_group,
             delivery_mode=delivery_mode,
             event_type_filter=event_type_filter or [],
-            handler=handler
+            handler=handler,
+            concurrency=max(1, concurrency)
         )
         
         # Initialize offsets for all partitions
-        for p in self.partitions.values():
-            if p.topic_id == topic.topic_id:
-                subscription.committed_offsets[p.partition_number] = p.high_watermark
-                
+        for p in self.topic_partitions[topic.topic_id]:
+            subscription.committed_offsets[p.partition_number] = p.high_watermark
+            
         self.subscriptions[subscription.subscription_id] = subscription
+        self.topic_subscriptions[topic.topic_id].append(subscription)
         
         # Add to consumer group
         if consumer_group:
@@ -420,10 +597,7 @@ class EventBus:
         
     def _rebalance_group(self, group: ConsumerGroup, topic_id: str):
         """Ребалансировка партиций в группе"""
-        partitions = [
-            p.partition_number for p in self.partitions.values()
-            if p.topic_id == topic_id
-        ]
+        partitions = [p.partition_number for p in self.topic_partitions.get(topic_id, [])]
         
         members = list(group.members)
         if not members:
@@ -477,23 +651,16 @@ class EventBus:
                     to_offset: Optional[int] = None,
                     partition: int = 0) -> List[Event]:
         """Воспроизведение событий из топика"""
-        topic = None
-        for t in self.topics.values():
-            if t.name == topic_name:
-                topic = t
-                break
-                
+        topic = self._get_topic(topic_name)
         if not topic:
             return []
             
-        events = self.events.get(topic.topic_id, [])
+        events = self.partition_events.get((topic.topic_id, partition), [])
         
-        return [
-            e for e in events
-            if e.partition == partition
-            and e.offset >= from_offset
-            and (to_offset is None or e.offset <= to_offset)
-        ]
+        # Offsets are contiguous within a partition, so the range is a slice
+        start = max(from_offset, 0)
+        end = len(events) if to_offset is None else min(to_offset + 1, len(events))
+        return events[start:end]
         
     def get_topic_stats(self, topic_id: str) -> Dict[str, Any]:
         """Статистика топика"""
@@ -501,15 +668,8 @@ class EventBus:
         if not topic:
             return {}
             
-        subscriptions = [
-            s for s in self.subscriptions.values()
-            if s.topic_id == topic_id
-        ]
-        
-        partitions = [
-            p for p in self.partitions.values()
-            if p.topic_id == topic_id
-        ]
+        subscriptions = self.topic_subscriptions.get(topic_id, [])
+        partitions = self.topic_partitions.get(topic_id, [])
         
         return {
             "topic_id": topic_id,
@@ -535,14 +695,11 @@ class EventBus:
             if not sub:
                 continue
                 
+            partitions = self.topic_partitions.get(sub.topic_id, [])
             for partition, committed in sub.committed_offsets.items():
-                # Get partition high watermark
-                for p in self.partitions.values():
-                    if p.topic_id == sub.topic_id and p.partition_number == partition:
-                        lag = p.high_watermark - committed
-                        lag_by_partition[f"p{partition}"] = lag
-                        break
-                        
+                if partition < len(partitions):
+                    lag_by_partition[f"p{partition}"] = partitions[partition].high_watermark - committed
+                    
         return lag_by_partition
         
     def get_statistics(self) -> Dict[str, Any]:
@@ -561,6 +718,7 @@ class EventBus:
             "consumer_groups": len(self.consumer_groups),
             "total_published": self._total_published,
             "total_delivered": self._total_delivered,
+            "pending_deliveries": sum(d.pending() for d in self.dispatchers.values()),
             "total_messages": total_messages,
             "total_bytes": total_bytes,
             "dlq_size": len(self.dead_letter_queue)
@@ -640,6 +798,16 @@ async def main():
             published_events.append(event)
             print(f"  📤 {event_type} -> {topic_name} (partition: {event.partition}, offset: {event.offset})")
             
+    # Batch publish
+    batch = await bus.publish_batch("order-events", [
+        {"event_type": "order.created", "value": {"order_id": f"o{i}", "amount": 10.0 * i}, "key": f"o{i}"}
+        for i in range(2, 12)
+    ])
+    print(f"  📦 Batch: {len(batch)} events -> order-events")
+    
+    await bus.drain()
+    print(f"  ✓ Delivered: {len(received_events)} events")
+    
     # Display topics
     print("\n📊 Topics:")
     
@@ -776,5 +944,63 @@ async def main():
     print("=" * 60)
 
 
+def benchmark_event_bus(events: int = 20000, partitions: int = 8,
+                        subscribers: int = 4, handler_latency_ms: float = 1.0,
+                        batch_size: int = 500) -> Dict[str, Any]:
+    """Бенчмарк пропускной способности публикации и доставки"""
+    
+    async def run(batched: bool) -> Dict[str, Any]:
+        bus = EventBus()
+        bus.create_topic("bench", partitions)
+        
+        async def handler(event: Event):
+            await asyncio.sleep(handler_latency_ms / 1000)
+            
+        for i in range(subscribers):
+            bus.subscribe("bench", f"consumer-{i}", handler=handler, concurrency=partitions)
+            
+        latencies = []
+        start = time.perf_counter()
+        if batched:
+            for offset in range(0, events, batch_size):
+                items = [
+                    {"event_type": "bench.event", "value": {"seq": i}, "key": f"k{i % 1000}"}
+                    for i in range(offset, min(offset + batch_size, events))
+                ]
+                t0 = time.perf_counter()
+                await bus.publish_batch("bench", items)
+                latencies.append((time.perf_counter() - t0) * 1000 / len(items))
+        else:
+            for i in range(events):
+                t0 = time.perf_counter()
+                await bus.publish("bench", "bench.event", {"seq": i}, f"k{i % 1000}")
+                latencies.append((time.perf_counter() - t0) * 1000)
+        publish_seconds = time.perf_counter() - start
+        
+        await bus.close()
+        total_seconds = time.perf_counter() - start
+        
+        latencies.sort()
+        return {
+            "publish_per_sec": round(events / publish_seconds),
+            "publish_latency_ms_p50": round(latencies[len(latencies) // 2], 4),
+            "publish_latency_ms_p99": round(latencies[int(len(latencies) * 0.99)], 4),
+            "end_to_end_per_sec": round(events / total_seconds),
+            "delivered": bus.get_statistics()["total_delivered"]
+        }
+        
+    return {
+        "events": events,
+        "partitions": partitions,
+        "subscribers": subscribers,
+        "handler_latency_ms": handler_latency_ms,
+        "publish": asyncio.run(run(False)),
+        "publish_batch": asyncio.run(run(True))
+    }
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    if "--benchmark" in sys.argv:
+        print(json.dumps(benchmark_event_bus(), indent=2))
+    else:
+        asyncio.run(main())
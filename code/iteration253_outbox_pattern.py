@@ -15,14 +15,34 @@ Server Init - Iteration 253: Outbox Pattern Platform
 """
 
 import asyncio
+import heapq
+import itertools
 import random
+import sqlite3
+import sys
+import time
+from collections import deque
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Set
+from typing import Dict, List, Optional, Any, Set, Callable, Tuple
 from enum import Enum
 import uuid
 import json
 import hashlib
+import os
+import shutil
+import tempfile
+
+
+# Relay
+RELAY_CONCURRENCY = 32
+
+# Storage
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY"
+)
 
 
 class OutboxEntryState(Enum):
@@ -154,15 +174,183 @@ class CleanupConfig:
     schedule_cron: str = "0 0 * * *"  # Daily at midnight
 
 
+class OutboxStore:
+    """Долговременное хранилище outbox на SQLite (WAL)"""
+    
+    COLUMNS = (
+        "entry_id", "aggregate_type", "aggregate_id", "event_type", "event_payload",
+        "state", "topic", "partition_key", "idempotency_key", "payload_hash",
+        "sequence_number", "attempts", "max_attempts", "last_error", "next_retry_at",
+        "metadata", "created_at", "processed_at", "published_at"
+    )
+    
+    def __init__(self, db_path: str):
+        # Путь к файлу обязателен: ":memory:" не переживает перезапуск и не поддерживает WAL
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        for pragma in SQLITE_PRAGMAS:
+            self.conn.execute(pragma)
+            
+        columns = ", ".join(f"{c} {'TEXT PRIMARY KEY' if c == 'entry_id' else ''}" for c in self.COLUMNS)
+        has_sequences = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'outbox_sequences'"
+        ).fetchone()
+        with self.conn:
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS outbox ({columns})")
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS outbox_archive ({columns})")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS outbox_state ON outbox (state, published_at)")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS outbox_aggregate ON outbox (aggregate_type, aggregate_id, sequence_number)"
+            )
+            # High-water mark per aggregate: survives cleanup of published rows
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox_sequences (aggregate_type TEXT, aggregate_id TEXT, "
+                "last_sequence INTEGER, PRIMARY KEY (aggregate_type, aggregate_id))"
+            )
+            if not has_sequences:
+                # Store created before the sequences table: seed from the rows still on disk
+                for table in ("outbox", "outbox_archive"):
+                    self.conn.execute(
+                        f"INSERT INTO outbox_sequences SELECT aggregate_type, aggregate_id, MAX(sequence_number) "
+                        f"FROM {table} WHERE true GROUP BY aggregate_type, aggregate_id "
+                        "ON CONFLICT (aggregate_type, aggregate_id) "
+                        "DO UPDATE SET last_sequence = MAX(last_sequence, excluded.last_sequence)"
+                    )
+            
+    @property
+    def journal_mode(self) -> str:
+        return self.conn.execute("PRAGMA journal_mode").fetchone()[0]
+        
+    @staticmethod
+    def _ts(value: Optional[datetime]) -> Optional[float]:
+        return value.timestamp() if value else None
+        
+    @staticmethod
+    def _dt(value: Optional[float]) -> Optional[datetime]:
+        return datetime.fromtimestamp(value) if value is not None else None
+        
+    def insert(self, entry: OutboxEntry, payload_json: str):
+        """Запись новой строки (транзакция захвата события)"""
+        with self.conn:
+            self.conn.execute(
+                f"INSERT INTO outbox VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                (
+                    entry.entry_id, entry.aggregate_type.value, entry.aggregate_id,
+                    entry.event_type, payload_json, entry.state.value, entry.topic,
+                    entry.partition_key, entry.idempotency_key, entry.payload_hash,
+                    entry.sequence_number, entry.attempts, entry.max_attempts,
+                    entry.last_error, self._ts(entry.next_retry_at),
+                    json.dumps(entry.metadata, default=str), self._ts(entry.created_at),
+                    self._ts(entry.processed_at), self._ts(entry.published_at)
+                )
+            )
+            self.conn.execute(
+                "INSERT INTO outbox_sequences VALUES (?, ?, ?) "
+                "ON CONFLICT (aggregate_type, aggregate_id) DO UPDATE SET last_sequence = excluded.last_sequence",
+                (entry.aggregate_type.value, entry.aggregate_id, entry.sequence_number)
+            )
+            
+    def update_entries(self, entries: List[OutboxEntry]):
+        """Пакетное обновление состояния записей"""
+        if not entries:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE outbox SET state = ?, attempts = ?, last_error = ?, next_retry_at = ?, "
+                "processed_at = ?, published_at = ? WHERE entry_id = ?",
+                [
+                    (
+                        e.state.value, e.attempts, e.last_error, self._ts(e.next_retry_at),
+                        self._ts(e.processed_at), self._ts(e.published_at), e.entry_id
+                    )
+                    for e in entries
+                ]
+            )
+            
+    def purge_published(self, cutoff: datetime, archive: bool) -> int:
+        """Пакетное удаление (с архивацией) опубликованных записей"""
+        where = "state = ? AND published_at < ?"
+        params = (OutboxEntryState.PUBLISHED.value, cutoff.timestamp())
+        with self.conn:
+            if archive:
+                self.conn.execute(
+                    f"INSERT INTO outbox_archive SELECT * FROM outbox WHERE {where}", params
+                )
+                self.conn.execute(
+                    "UPDATE outbox_archive SET state = ? WHERE state = ?",
+                    (OutboxEntryState.ARCHIVED.value, OutboxEntryState.PUBLISHED.value)
+                )
+            return self.conn.execute(f"DELETE FROM outbox WHERE {where}", params).rowcount
+            
+    def _to_entry(self, row: tuple) -> OutboxEntry:
+        data = dict(zip(self.COLUMNS, row))
+        return OutboxEntry(
+            entry_id=data["entry_id"],
+            aggregate_type=AggregateType(data["aggregate_type"]),
+            aggregate_id=data["aggregate_id"],
+            event_type=data["event_type"],
+            event_payload=json.loads(data["event_payload"]),
+            state=OutboxEntryState(data["state"]),
+            topic=data["topic"],
+            partition_key=data["partition_key"],
+            idempotency_key=data["idempotency_key"],
+            payload_hash=data["payload_hash"],
+            sequence_number=data["sequence_number"],
+            attempts=data["attempts"],
+            max_attempts=data["max_attempts"],
+            last_error=data["last_error"],
+            next_retry_at=self._dt(data["next_retry_at"]),
+            metadata=json.loads(data["metadata"]),
+            created_at=self._dt(data["created_at"]),
+            processed_at=self._dt(data["processed_at"]),
+            published_at=self._dt(data["published_at"])
+        )
+        
+    def query(self, where: str = "", params: tuple = (),
+              order_by: str = "rowid", limit: Optional[int] = None) -> List[OutboxEntry]:
+        """Выборка записей"""
+        sql = f"SELECT {', '.join(self.COLUMNS)} FROM outbox"
+        if where:
+            sql += f" WHERE {where}"
+        sql += f" ORDER BY {order_by}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [self._to_entry(row) for row in self.conn.execute(sql, params)]
+        
+    def state_counts(self) -> Dict[OutboxEntryState, int]:
+        return {
+            OutboxEntryState(state): count
+            for state, count in self.conn.execute("SELECT state, COUNT(*) FROM outbox GROUP BY state")
+        }
+        
+    def count(self, table: str = "outbox") -> int:
+        return self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        
+    def max_sequences(self) -> Dict[str, int]:
+        return {
+            f"{agg_type}:{agg_id}": seq
+            for agg_type, agg_id, seq in self.conn.execute(
+                "SELECT aggregate_type, aggregate_id, last_sequence FROM outbox_sequences"
+            )
+        }
+        
+    def close(self):
+        self.conn.close()
+
+
 class OutboxManager:
     """Менеджер Outbox паттерна"""
     
-    def __init__(self):
-        self.entries: Dict[str, OutboxEntry] = {}
+    def __init__(self, db_path: str,
+                 publisher: Optional[Callable] = None):
+        self.store = OutboxStore(db_path)
+        self.entries: Dict[str, OutboxEntry] = {}  # live (unpublished) entries
         self.batches: Dict[str, OutboxBatch] = {}
         self.dedup_records: Dict[str, DeduplicationRecord] = {}
         self.metrics: Dict[str, PublishMetrics] = {}
-        self.archived_entries: List[OutboxEntry] = []
+        
+        # Publisher: async (entry) -> None, raises on failure
+        self.publisher = publisher
         
         # Sequence counters per aggregate
         self._sequences: Dict[str, int] = {}
@@ -170,9 +358,94 @@ class OutboxManager:
         # Processing lock
         self._processing_entries: Set[str] = set()
         
+        # Relay queues: per-aggregate FIFO, ready aggregates, retry min-heap
+        self.aggregate_queues: Dict[str, deque] = {}
+        self.ready_aggregates: deque = deque()
+        self._ready_set: Set[str] = set()
+        self._blocked: Set[str] = set()  # in flight or waiting for retry
+        self.retry_heap: List[Tuple[float, int, str]] = []
+        self._retry_seq = itertools.count()
+        self._relay_semaphore: Optional[asyncio.Semaphore] = None
+        
+        # State changes waiting for a bulk write
+        self._dirty: List[OutboxEntry] = []
+        
+        # Relay counters
+        self.relay_stats: Dict[str, float] = {
+            "polls": 0,
+            "published": 0,
+            "failed": 0,
+            "retried": 0,
+            "busy_seconds": 0.0,
+            "lag_ms_total": 0.0,
+            "lag_ms_max": 0.0,
+            "last_lag_ms": 0.0
+        }
+        
         # Config
         self.cleanup_config = CleanupConfig()
         
+        self._recover()
+        
+    def _recover(self):
+        """Восстановление очередей из хранилища после рестарта"""
+        self._sequences.update(self.store.max_sequences())
+        
+        live = self.store.query(
+            "state IN (?, ?)",
+            (OutboxEntryState.PENDING.value, OutboxEntryState.PROCESSING.value),
+            order_by="aggregate_type, aggregate_id, sequence_number"
+        )
+        for entry in live:
+            # Interrupted publishes are retried (at-least-once)
+            entry.state = OutboxEntryState.PENDING
+            self._enqueue(entry)
+            
+            if entry.topic not in self.metrics:
+                self.metrics[entry.topic] = PublishMetrics(topic=entry.topic)
+                
+        for agg_key, queue in self.aggregate_queues.items():
+            head = self.entries[queue[0]]
+            if head.next_retry_at and head.next_retry_at > datetime.now():
+                self._ready_set.discard(agg_key)
+                self._block_until(agg_key, head.next_retry_at)
+        self.ready_aggregates = deque(a for a in self.ready_aggregates if a in self._ready_set)
+        
+    def _enqueue(self, entry: OutboxEntry):
+        """Добавление записи в FIFO агрегата"""
+        agg_key = f"{entry.aggregate_type.value}:{entry.aggregate_id}"
+        self.entries[entry.entry_id] = entry
+        
+        queue = self.aggregate_queues.get(agg_key)
+        if queue is None:
+            queue = deque()
+            self.aggregate_queues[agg_key] = queue
+        queue.append(entry.entry_id)
+        
+        if agg_key not in self._ready_set and agg_key not in self._blocked:
+            self._ready_set.add(agg_key)
+            self.ready_aggregates.append(agg_key)
+            
+    def _block_until(self, agg_key: str, retry_at: datetime):
+        self._blocked.add(agg_key)
+        heapq.heappush(self.retry_heap, (retry_at.timestamp(), next(self._retry_seq), agg_key))
+        
+    def _release_due_retries(self):
+        """Возврат агрегатов, у которых наступило время повтора"""
+        now = time.time()
+        while self.retry_heap and self.retry_heap[0][0] <= now:
+            _, _, agg_key = heapq.heappop(self.retry_heap)
+            self._blocked.discard(agg_key)
+            if self.aggregate_queues.get(agg_key) and agg_key not in self._ready_set:
+                self._ready_set.add(agg_key)
+                self.ready_aggregates.append(agg_key)
+                
+    def _flush(self):
+        """Пакетная запись накопленных изменений состояния"""
+        if self._dirty:
+            dirty, self._dirty = self._dirty, []
+            self.store.update_entries(dirty)
+            
     def capture_event(self, aggregate_type: AggregateType,
                      aggregate_id: str, event_type: str,
                      payload: Dict[str, Any],
@@ -183,9 +456,8 @@ class OutboxManager:
         if not idempotency_key:
             idempotency_key = f"{aggregate_type.value}:{aggregate_id}:{event_type}:{uuid.uuid4().hex[:8]}"
             
-        payload_hash = hashlib.md5(
-            json.dumps(payload, sort_keys=True, default=str).encode()
-        ).hexdigest()
+        payload_json = json.dumps(payload, sort_keys=True, default=str)
+        payload_hash = hashlib.md5(payload_json.encode()).hexdigest()
         
         # Get sequence
         seq_key = f"{aggregate_type.value}:{aggregate_id}"
@@ -206,7 +478,8 @@ class OutboxManager:
             sequence_number=sequence
         )
         
-        self.entries[entry.entry_id] = entry
+        self.store.insert(entry, payload_json)
+        self._enqueue(entry)
         
         # Initialize topic metrics
         if entry.topic not in self.metrics:
@@ -226,6 +499,9 @@ class OutboxManager:
         # Check deduplication
         if entry.idempotency_key in self.dedup_records:
             entry.state = OutboxEntryState.PUBLISHED
+            entry.published_at = entry.processed_at = datetime.now()
+            self._dirty.append(entry)
+            self.entries.pop(entry_id, None)
             self.metrics[entry.topic].total_duplicates += 1
             return PublishResult.DUPLICATE
             
@@ -237,40 +513,44 @@ class OutboxManager:
         start_time = datetime.now()
         
         try:
-            # Simulate publishing
-            await asyncio.sleep(random.uniform(0.01, 0.1))
-            
-            if random.random() < 0.9:  # 90% success rate
-                # Success
-                entry.state = OutboxEntryState.PUBLISHED
-                entry.published_at = datetime.now()
-                entry.processed_at = datetime.now()
-                
-                # Record for deduplication
-                self.dedup_records[entry.idempotency_key] = DeduplicationRecord(
-                    record_id=f"dedup_{uuid.uuid4().hex[:8]}",
-                    idempotency_key=entry.idempotency_key,
-                    payload_hash=entry.payload_hash
-                )
-                
-                # Update metrics
-                metrics = self.metrics[entry.topic]
-                latency = (datetime.now() - start_time).total_seconds() * 1000
-                metrics.total_published += 1
-                metrics.total_latency_ms += latency
-                metrics.min_latency_ms = min(metrics.min_latency_ms, latency)
-                metrics.max_latency_ms = max(metrics.max_latency_ms, latency)
-                metrics.last_published_at = datetime.now()
-                
-                return PublishResult.SUCCESS
+            if self.publisher:
+                await self.publisher(entry)
             else:
-                raise Exception("Simulated publish failure")
-                
+                # Simulate publishing
+                await asyncio.sleep(random.uniform(0.01, 0.1))
+                if random.random() >= 0.9:  # 90% success rate
+                    raise Exception("Simulated publish failure")
+                    
+            # Success
+            entry.state = OutboxEntryState.PUBLISHED
+            entry.published_at = datetime.now()
+            entry.processed_at = datetime.now()
+            
+            # Record for deduplication
+            self.dedup_records[entry.idempotency_key] = DeduplicationRecord(
+                record_id=f"dedup_{uuid.uuid4().hex[:8]}",
+                idempotency_key=entry.idempotency_key,
+                payload_hash=entry.payload_hash
+            )
+            
+            # Update metrics
+            metrics = self.metrics[entry.topic]
+            latency = (datetime.now() - start_time).total_seconds() * 1000
+            metrics.total_published += 1
+            metrics.total_latency_ms += latency
+            metrics.min_latency_ms = min(metrics.min_latency_ms, latency)
+            metrics.max_latency_ms = max(metrics.max_latency_ms, latency)
+            metrics.last_published_at = datetime.now()
+            
+            self.entries.pop(entry_id, None)
+            return PublishResult.SUCCESS
+            
         except Exception as e:
             entry.last_error = str(e)
             
             if entry.attempts >= entry.max_attempts:
                 entry.state = OutboxEntryState.FAILED
+                self.entries.pop(entry_id, None)
                 self.metrics[entry.topic].total_failed += 1
                 return PublishResult.FAILED
             else:
@@ -283,6 +563,7 @@ class OutboxManager:
                 
         finally:
             self._processing_entries.discard(entry_id)
+            self._dirty.append(entry)
             
     async def process_pending(self, batch_size: int = 100) -> OutboxBatch:
         """Обработка pending записей"""
@@ -290,100 +571,173 @@ class OutboxManager:
             batch_id=f"batch_{uuid.uuid4().hex[:8]}",
             started_at=datetime.now()
         )
+        started = time.perf_counter()
+        self.relay_stats["polls"] += 1
         
-        # Get pending entries
-        pending = [
-            e for e in self.entries.values()
-            if e.state == OutboxEntryState.PENDING
-            and e.entry_id not in self._processing_entries
-            and (e.next_retry_at is None or e.next_retry_at <= datetime.now())
-        ]
-        
-        # Sort by sequence for ordering guarantee
-        pending.sort(key=lambda e: (e.aggregate_id, e.sequence_number))
+        if self._relay_semaphore is None:
+            self._relay_semaphore = asyncio.Semaphore(RELAY_CONCURRENCY)
+            
+        self._release_due_retries()
         
-        # Process batch
-        for entry in pending[:batch_size]:
-            batch.entries.append(entry.entry_id)
-            batch.total += 1
+        # Take up to batch_size entries as in-order prefixes of ready aggregates
+        work: List[Tuple[str, List[str]]] = []
+        taken = 0
+        while self.ready_aggregates and taken < batch_size:
+            agg_key = self.ready_aggregates.popleft()
+            self._ready_set.discard(agg_key)
+            queue = self.aggregate_queues.get(agg_key)
+            if not queue:
+                continue
+                
+            chunk = list(itertools.islice(queue, batch_size - taken))
+            taken += len(chunk)
+            self._blocked.add(agg_key)
+            work.append((agg_key, chunk))
             
-            result = await self.publish_entry(entry.entry_id)
+        # Aggregates are published concurrently, entries of one aggregate strictly in order
+        if work:
+            await asyncio.gather(*(
+                self._publish_aggregate(agg_key, chunk, batch) for agg_key, chunk in work
+            ))
             
-            if result == PublishResult.SUCCESS:
-                batch.published += 1
-            elif result == PublishResult.FAILED:
-                batch.failed += 1
-                
+        self._flush()
+        
         batch.completed_at = datetime.now()
         self.batches[batch.batch_id] = batch
+        self.relay_stats["busy_seconds"] += time.perf_counter() - started
         
         return batch
         
+    async def _publish_aggregate(self, agg_key: str, chunk: List[str],
+                                 batch: OutboxBatch):
+        """Последовательная публикация записей одного агрегата"""
+        queue = self.aggregate_queues[agg_key]
+        retry_at = None
+        
+        async with self._relay_semaphore:
+            for entry_id in chunk:
+                entry = self.entries.get(entry_id)
+                if entry and entry.state == OutboxEntryState.PENDING:
+                    batch.entries.append(entry.entry_id)
+                    batch.total += 1
+                    
+                    result = await self.publish_entry(entry.entry_id)
+                    
+                    if result == PublishResult.RETRY:
+                        # Later entries of this aggregate wait for the head
+                        self.relay_stats["retried"] += 1
+                        retry_at = entry.next_retry_at
+                        break
+                    if result == PublishResult.SUCCESS:
+                        batch.published += 1
+                        self._record_lag(entry)
+                    elif result == PublishResult.FAILED:
+                        batch.failed += 1
+                        self.relay_stats["failed"] += 1
+                        
+                # Published, duplicate or parked as failed: leaves the ready queue
+                queue.popleft()
+                
+        self._blocked.discard(agg_key)
+        if retry_at is not None:
+            self._block_until(agg_key, retry_at)
+        elif queue:
+            self._ready_set.add(agg_key)
+            self.ready_aggregates.append(agg_key)
+        else:
+            del self.aggregate_queues[agg_key]
+            
+    def _record_lag(self, entry: OutboxEntry):
+        """Учёт задержки от захвата до публикации"""
+        lag_ms = (entry.published_at - entry.created_at).total_seconds() * 1000
+        self.relay_stats["published"] += 1
+        self.relay_stats["lag_ms_total"] += lag_ms
+        self.relay_stats["lag_ms_max"] = max(self.relay_stats["lag_ms_max"], lag_ms)
+        self.relay_stats["last_lag_ms"] = lag_ms
+        
     async def cleanup_old_entries(self) -> Dict[str, int]:
         """Очистка старых записей"""
+        self._flush()
         cutoff = datetime.now() - timedelta(days=self.cleanup_config.retention_days)
         
-        archived = 0
-        deleted = 0
+        archive = self.cleanup_config.archive_enabled
+        removed = self.store.purge_published(cutoff, archive)
         
-        entries_to_process = [
-            e for e in self.entries.values()
-            if e.state == OutboxEntryState.PUBLISHED
-            and e.published_at and e.published_at < cutoff
-        ]
-        
-        for entry in entries_to_process:
-            if self.cleanup_config.archive_enabled:
-                entry.state = OutboxEntryState.ARCHIVED
-                self.archived_entries.append(entry)
-                archived += 1
-            else:
-                deleted += 1
-                
-            del self.entries[entry.entry_id]
+        # Dedup records share one TTL, so insertion order is expiry order
+        now = datetime.now()
+        dedup_expired = []
+        for key, record in self.dedup_records.items():
+            if record.expires_at >= now:
+                break
+            dedup_expired.append(key)
             
-        # Cleanup dedup records
-        dedup_expired = [
-            key for key, record in self.dedup_records.items()
-            if record.expires_at < datetime.now()
-        ]
-        
         for key in dedup_expired:
             del self.dedup_records[key]
             
         return {
-            "archived": archived,
-            "deleted": deleted,
+            "archived": removed if archive else 0,
+            "deleted": 0 if archive else removed,
             "dedup_cleaned": len(dedup_expired)
         }
         
     def get_pending_count(self) -> int:
         """Количество pending записей"""
-        return sum(1 for e in self.entries.values() if e.state == OutboxEntryState.PENDING)
+        return len(self.entries)
         
     def get_failed_entries(self) -> List[OutboxEntry]:
         """Получение failed записей"""
-        return [e for e in self.entries.values() if e.state == OutboxEntryState.FAILED]
+        self._flush()
+        return self.store.query("state = ?", (OutboxEntryState.FAILED.value,))
+        
+    def get_entries(self, limit: int = 100) -> List[OutboxEntry]:
+        """Получение записей в порядке захвата"""
+        self._flush()
+        return [self.entries.get(e.entry_id, e) for e in self.store.query(limit=limit)]
         
     def get_entries_by_aggregate(self, aggregate_type: AggregateType,
                                 aggregate_id: str) -> List[OutboxEntry]:
         """Получение записей по агрегату"""
+        self._flush()
         return [
-            e for e in self.entries.values()
-            if e.aggregate_type == aggregate_type
-            and e.aggregate_id == aggregate_id
+            self.entries.get(e.entry_id, e)
+            for e in self.store.query(
+                "aggregate_type = ? AND aggregate_id = ?",
+                (aggregate_type.value, aggregate_id),
+                order_by="sequence_number"
+            )
         ]
         
+    def get_relay_metrics(self) -> Dict[str, Any]:
+        """Метрики relay: лаг и пропускная способность"""
+        now = datetime.now()
+        heads = [self.entries[q[0]] for q in self.aggregate_queues.values() if q and q[0] in self.entries]
+        oldest_ms = max(((now - e.created_at).total_seconds() * 1000 for e in heads), default=0.0)
+        published = self.relay_stats["published"]
+        busy = self.relay_stats["busy_seconds"]
+        
+        return {
+            "polls": int(self.relay_stats["polls"]),
+            "published": int(published),
+            "failed": int(self.relay_stats["failed"]),
+            "retried": int(self.relay_stats["retried"]),
+            "throughput_per_sec": published / busy if busy > 0 else 0.0,
+            "avg_lag_ms": self.relay_stats["lag_ms_total"] / published if published else 0.0,
+            "max_lag_ms": self.relay_stats["lag_ms_max"],
+            "last_lag_ms": self.relay_stats["last_lag_ms"],
+            "oldest_pending_ms": oldest_ms,
+            "ready_aggregates": len(self.ready_aggregates),
+            "retry_waiting": len(self.retry_heap)
+        }
+        
     def get_topic_metrics(self, topic: str) -> Optional[PublishMetrics]:
         """Метрики по топику"""
         return self.metrics.get(topic)
         
     def get_statistics(self) -> Dict[str, Any]:
         """Общая статистика"""
-        state_counts: Dict[OutboxEntryState, int] = {}
-        for entry in self.entries.values():
-            state_counts[entry.state] = state_counts.get(entry.state, 0) + 1
-            
+        self._flush()
+        state_counts = self.store.state_counts()
+        
         total_published = sum(m.total_published for m in self.metrics.values())
         total_failed = sum(m.total_failed for m in self.metrics.values())
         total_latency = sum(m.total_latency_ms for m in self.metrics.values())
@@ -391,18 +745,20 @@ class OutboxManager:
         avg_latency = (total_latency / total_published) if total_published > 0 else 0
         
         return {
-            "entries_total": len(self.entries),
+            "entries_total": sum(state_counts.values()),
             "entries_pending": state_counts.get(OutboxEntryState.PENDING, 0),
             "entries_processing": state_counts.get(OutboxEntryState.PROCESSING, 0),
             "entries_published": state_counts.get(OutboxEntryState.PUBLISHED, 0),
             "entries_failed": state_counts.get(OutboxEntryState.FAILED, 0),
             "batches_processed": len(self.batches),
             "dedup_records": len(self.dedup_records),
-            "archived_entries": len(self.archived_entries),
+            "archived_entries": self.store.count("outbox_archive"),
             "total_published": total_published,
             "total_failed": total_failed,
             "avg_latency_ms": avg_latency,
-            "topics_count": len(self.metrics)
+            "topics_count": len(self.metrics),
+            "relay_lag_ms": self.get_relay_metrics()["oldest_pending_ms"],
+            "journal_mode": self.store.journal_mode
         }
 
 
@@ -412,8 +768,11 @@ async def main():
     print("Server Init - Iteration 253: Outbox Pattern Platform")
     print("=" * 60)
     
-    manager = OutboxManager()
-    print("✓ Outbox Manager created")
+    db_dir = tempfile.mkdtemp(prefix="outbox_")
+    db_path = os.path.join(db_dir, "outbox.db")
+    
+    manager = OutboxManager(db_path)
+    print(f"✓ Outbox Manager created (SQLite, journal: {manager.store.journal_mode})")
     
     # Capture events
     print("\n📤 Capturing Events to Outbox...")
@@ -455,7 +814,7 @@ async def main():
     print("  │ Entry            │ Aggregate     │ Event Type      │ State     │ Attempts │")
     print("  ├──────────────────┼───────────────┼─────────────────┼───────────┼──────────┤")
     
-    for entry in list(manager.entries.values())[:8]:
+    for entry in manager.get_entries(limit=8):
         entry_id = entry.entry_id[:16].ljust(16)
         agg = f"{entry.aggregate_type.value[:4]}:{entry.aggregate_id[-4:]}"[:13].ljust(13)
         event = entry.event_type[:15].ljust(15)
@@ -535,10 +894,8 @@ async def main():
     # State distribution
     print("\n📊 Entry State Distribution:")
     
-    state_counts: Dict[OutboxEntryState, int] = {}
-    for entry in manager.entries.values():
-        state_counts[entry.state] = state_counts.get(entry.state, 0) + 1
-        
+    state_counts = manager.store.state_counts()
+    
     for state in OutboxEntryState:
         count = state_counts.get(state, 0)
         bar = "█" * min(count, 10) + "░" * (10 - min(count, 10))
@@ -551,6 +908,22 @@ async def main():
         }.get(state, "?")
         print(f"  {icon} {state.value:12s} [{bar}] {count}")
         
+    # Relay metrics
+    print("\n🚚 Relay Metrics:")
+    
+    relay = manager.get_relay_metrics()
+    print(f"  Polls: {relay['polls']}, Published: {relay['published']}, Retried: {relay['retried']}")
+    print(f"  Throughput: {relay['throughput_per_sec']:.1f}/s")
+    print(f"  Avg Lag: {relay['avg_lag_ms']:.1f}ms, Max Lag: {relay['max_lag_ms']:.1f}ms")
+    print(f"  Waiting for retry: {relay['retry_waiting']} aggregates")
+    
+    # Restart recovery
+    print("\n🔁 Restart Recovery...")
+    
+    recovered = OutboxManager(db_path)
+    print(f"  Recovered pending entries: {recovered.get_pending_count()}")
+    recovered.store.close()
+    
     # Statistics
     print("\n📊 Outbox Statistics:")
     
@@ -580,10 +953,82 @@ async def main():
     print(f"│ Avg Latency:                   {stats['avg_latency_ms']:>10.1f}ms                        │")
     print("└────────────────────────────────────────────────────────────────────┘")
     
+    manager.store.close()
+    shutil.rmtree(db_dir, ignore_errors=True)
+    
     print("\n" + "=" * 60)
     print("Outbox Pattern Platform initialized!")
     print("=" * 60)
 
 
+def benchmark_outbox(entries: int = 50000, aggregates: int = 5000,
+                     batch_size: int = 500, publish_latency_ms: float = 1.0) -> Dict[str, Any]:
+    """Бенчмарк relay: стоимость опроса и пропускная способность на глубоком outbox"""
+    
+    last_published: Dict[str, int] = {}
+    violations = {"count": 0}
+    
+    async def publisher(entry: OutboxEntry):
+        await asyncio.sleep(publish_latency_ms / 1000)
+        if entry.sequence_number <= last_published.get(entry.aggregate_id, 0):
+            violations["count"] += 1
+        last_published[entry.aggregate_id] = entry.sequence_number
+        
+    async def run(db_path: str) -> Dict[str, Any]:
+        manager = OutboxManager(db_path, publisher=publisher)
+        
+        start = time.perf_counter()
+        for i in range(entries):
+            manager.capture_event(
+                AggregateType.ORDER, f"ORD-{i % aggregates}", "order.updated", {"seq": i}
+            )
+        capture_seconds = time.perf_counter() - start
+        
+        poll_ms = []
+        while manager.get_pending_count() > 0:
+            t0 = time.perf_counter()
+            batch = await manager.process_pending(batch_size)
+            poll_ms.append((time.perf_counter() - t0) * 1000)
+            if batch.total == 0:
+                break
+                
+        relay = manager.get_relay_metrics()
+        cleanup_start = time.perf_counter()
+        manager.cleanup_config.retention_days = -1
+        cleaned = await manager.cleanup_old_entries()
+        cleanup_ms = (time.perf_counter() - cleanup_start) * 1000
+        manager.store.close()
+        
+        poll_ms.sort()
+        return {
+            "capture_per_sec": round(entries / capture_seconds),
+            "relay_per_sec": round(relay["throughput_per_sec"]),
+            "poll_ms_p50": round(poll_ms[len(poll_ms) // 2], 2),
+            "poll_ms_max": round(poll_ms[-1], 2),
+            "avg_lag_ms": round(relay["avg_lag_ms"], 1),
+            "max_lag_ms": round(relay["max_lag_ms"], 1),
+            "order_violations": violations["count"],
+            "bulk_cleanup_ms": round(cleanup_ms, 2),
+            "archived": cleaned["archived"]
+        }
+        
+    db_dir = tempfile.mkdtemp(prefix="outbox_bench_")
+    try:
+        result = asyncio.run(run(os.path.join(db_dir, "outbox.db")))
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+        
+    return {
+        "entries": entries,
+        "aggregates": aggregates,
+        "batch_size": batch_size,
+        "publish_latency_ms": publish_latency_ms,
+        **result
+    }
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    if "--benchmark" in sys.argv:
+        print(json.dumps(benchmark_outbox(), indent=2))
+    else:
+        asyncio.run(main())
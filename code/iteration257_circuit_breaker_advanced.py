@@ -15,11 +15,14 @@ Server Init - Iteration 257: Circuit Breaker Advanced Platform
 """
 
 import asyncio
+import json
 import random
-from datetime import datetime, timedelta
+import sys
+import time
+from array import array
+from datetime import datetime
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Callable, Awaitable, Deque
-from collections import deque
+from typing import Dict, List, Optional, Any, Callable, Awaitable
 from enum import Enum
 import uuid
 
@@ -57,39 +60,118 @@ class TransitionReason(Enum):
     MANUAL_CLOSE = "manual_close"
 
 
-@dataclass
-class CallRecord:
-    """Запись о вызове"""
-    record_id: str
-    
-    # Result
-    success: bool = True
-    duration_ms: float = 0
-    slow_call: bool = False
-    
-    # Error
-    error: str = ""
-    
-    # Time
-    timestamp: datetime = field(default_factory=datetime.now)
+# Window clock
+NS_PER_SECOND = 1_000_000_000
+NS_PER_MS = 1_000_000
+
+FAILED = 1
+SLOW = 2
 
 
-@dataclass
 class SlidingWindow:
-    """Скользящее окно"""
-    window_type: WindowType = WindowType.COUNT_BASED
-    
-    # Size
-    size: int = 100  # count or seconds
-    
-    # Records
-    records: Deque[CallRecord] = field(default_factory=deque)
-    
-    # Aggregated metrics
-    total_calls: int = 0
-    failed_calls: int = 0
-    slow_calls: int = 0
-    total_duration_ms: float = 0
+    """Скользящее окно на кольцевых буферах примитивных счётчиков
+    
+    COUNT_BASED: кольцо из size последних вызовов, исход каждого хранится
+    битовой маской (FAILED | SLOW) в bytearray.
+    TIME_BASED: size посекундных бакетов, агрегированных по монотонным
+    секундам; устаревшие бакеты обнуляются при сдвиге окна.
+    Итоговые счётчики поддерживаются инкрементально, проверка порогов O(1).
+    """
+    __slots__ = ("window_type", "size", "total_calls", "failed_calls", "slow_calls",
+                 "total_duration_ns", "outcomes", "durations", "position", "filled",
+                 "bucket_calls", "bucket_failed", "bucket_slow", "bucket_duration",
+                 "last_second")
+    
+    def __init__(self, window_type: WindowType = WindowType.COUNT_BASED, size: int = 100):
+        self.window_type = window_type
+        self.size = max(1, size)  # count or seconds
+        
+        if window_type == WindowType.COUNT_BASED:
+            self.outcomes = bytearray(self.size)
+            self.durations = array('q', bytes(8 * self.size))
+        else:
+            self.bucket_calls = array('q', bytes(8 * self.size))
+            self.bucket_failed = array('q', bytes(8 * self.size))
+            self.bucket_slow = array('q', bytes(8 * self.size))
+            self.bucket_duration = array('q', bytes(8 * self.size))
+            
+        self.reset()
+        
+    def reset(self):
+        """Очистка окна без перевыделения буферов"""
+        self.total_calls = 0
+        self.failed_calls = 0
+        self.slow_calls = 0
+        self.total_duration_ns = 0
+        self.position = 0
+        self.filled = 0
+        self.last_second = time.monotonic_ns() // NS_PER_SECOND
+        
+        if self.window_type == WindowType.COUNT_BASED:
+            self.outcomes[:] = bytes(self.size)
+            self.durations[:] = array('q', bytes(8 * self.size))
+        else:
+            for buffer in (self.bucket_calls, self.bucket_failed, self.bucket_slow, self.bucket_duration):
+                buffer[:] = array('q', bytes(8 * self.size))
+                
+    @property
+    def total_duration_ms(self) -> float:
+        return self.total_duration_ns / NS_PER_MS
+        
+    def record(self, outcome: int, duration_ns: int, now_ns: int):
+        """Учёт вызова: outcome — маска FAILED | SLOW"""
+        if self.window_type == WindowType.COUNT_BASED:
+            i = self.position
+            if self.filled == self.size:
+                old = self.outcomes[i]
+                self.total_calls -= 1
+                self.failed_calls -= old & FAILED
+                self.slow_calls -= old >> 1
+                self.total_duration_ns -= self.durations[i]
+            else:
+                self.filled += 1
+                
+            self.outcomes[i] = outcome
+            self.durations[i] = duration_ns
+            i += 1
+            self.position = 0 if i == self.size else i
+        else:
+            second = now_ns // NS_PER_SECOND
+            if second != self.last_second:
+                self.advance(second)
+            i = second % self.size
+            self.bucket_calls[i] += 1
+            self.bucket_failed[i] += outcome & FAILED
+            self.bucket_slow[i] += outcome >> 1
+            self.bucket_duration[i] += duration_ns
+            
+        self.total_calls += 1
+        self.failed_calls += outcome & FAILED
+        self.slow_calls += outcome >> 1
+        self.total_duration_ns += duration_ns
+        
+    def advance(self, second: int):
+        """Сдвиг временного окна до указанной монотонной секунды"""
+        if self.window_type != WindowType.TIME_BASED or second <= self.last_second:
+            return
+            
+        if second - self.last_second >= self.size:
+            self.reset()
+            self.last_second = second
+            return
+            
+        for s in range(self.last_second + 1, second + 1):
+            i = s % self.size
+            if self.bucket_calls[i]:
+                self.total_calls -= self.bucket_calls[i]
+                self.failed_calls -= self.bucket_failed[i]
+                self.slow_calls -= self.bucket_slow[i]
+                self.total_duration_ns -= self.bucket_duration[i]
+                self.bucket_calls[i] = 0
+                self.bucket_failed[i] = 0
+                self.bucket_slow[i] = 0
+                self.bucket_duration[i] = 0
+        self.last_second = second
 
 
 @dataclass
@@ -145,6 +227,7 @@ class CircuitBreaker:
     # Timing
     last_state_change: datetime = field(default_factory=datetime.now)
     opened_at: Optional[datetime] = None
+    opened_at_ns: int = 0  # monotonic
     
     # Half-open tracking
     half_open_calls: int = 0
@@ -236,49 +319,14 @@ class CircuitBreakerManager:
         return breaker
         
     def _record_call(self, breaker: CircuitBreaker, success: bool,
-                    duration_ms: float, error: str = ""):
+                    duration_ns: int, now_ns: int):
         """Запись вызова"""
-        slow = duration_ms > breaker.config.slow_call_duration_ms
-        
-        record = CallRecord(
-            record_id=f"rec_{uuid.uuid4().hex[:8]}",
-            success=success,
-            duration_ms=duration_ms,
-            slow_call=slow,
-            error=error
-        )
+        outcome = 0 if success else FAILED
+        if duration_ns > breaker.config.slow_call_duration_ms * NS_PER_MS:
+            outcome |= SLOW
+            
+        breaker.window.record(outcome, duration_ns, now_ns)
         
-        window = breaker.window
-        window.records.append(record)
-        window.total_calls += 1
-        window.total_duration_ms += duration_ms
-        
-        if not success:
-            window.failed_calls += 1
-        if slow:
-            window.slow_calls += 1
-            
-        # Trim window
-        if window.window_type == WindowType.COUNT_BASED:
-            while len(window.records) > window.size:
-                old = window.records.popleft()
-                window.total_calls -= 1
-                window.total_duration_ms -= old.duration_ms
-                if not old.success:
-                    window.failed_calls -= 1
-                if old.slow_call:
-                    window.slow_calls -= 1
-        else:
-            cutoff = datetime.now() - timedelta(seconds=window.size)
-            while window.records and window.records[0].timestamp < cutoff:
-                old = window.records.popleft()
-                window.total_calls -= 1
-                window.total_duration_ms -= old.duration_ms
-                if not old.success:
-                    window.failed_calls -= 1
-                if old.slow_call:
-                    window.slow_calls -= 1
-                    
         # Update breaker stats
         breaker.total_calls += 1
         if success:
@@ -286,30 +334,32 @@ class CircuitBreakerManager:
         else:
             breaker.total_failures += 1
             
-    def _check_thresholds(self, breaker: CircuitBreaker) -> Optional[TransitionReason]:
+    def _check_thresholds(self, breaker: CircuitBreaker, now_ns: int = None) -> Optional[TransitionReason]:
         """Проверка порогов"""
         window = breaker.window
         config = breaker.config
         
-        if window.total_calls < config.minimum_calls:
+        if window.window_type == WindowType.TIME_BASED:
+            window.advance((now_ns or time.monotonic_ns()) // NS_PER_SECOND)
+            
+        total = window.total_calls
+        if total < config.minimum_calls:
             return None
             
-        failure_rate = (window.failed_calls / window.total_calls) * 100
-        slow_rate = (window.slow_calls / window.total_calls) * 100
-        
         # Update metrics
         metrics = self.metrics.get(breaker.name)
         if metrics:
-            metrics.current_failure_rate = failure_rate
-            metrics.current_slow_call_rate = slow_rate
-            metrics.calls_in_window = window.total_calls
+            metrics.current_failure_rate = window.failed_calls * 100 / total
+            metrics.current_slow_call_rate = window.slow_calls * 100 / total
+            metrics.calls_in_window = total
             metrics.failed_in_window = window.failed_calls
             metrics.slow_in_window = window.slow_calls
             
-        if failure_rate >= config.failure_rate_threshold:
+        # Cross-multiplied: rate% >= threshold  <=>  count * 100 >= threshold * total
+        if window.failed_calls * 100 >= config.failure_rate_threshold * total:
             return TransitionReason.FAILURE_RATE_EXCEEDED
             
-        if slow_rate >= config.slow_call_rate_threshold:
+        if window.slow_calls * 100 >= config.slow_call_rate_threshold * total:
             return TransitionReason.SLOW_CALL_RATE_EXCEEDED
             
         return None
@@ -323,6 +373,7 @@ class CircuitBreakerManager:
         
         if new_state == CircuitState.OPEN:
             breaker.opened_at = datetime.now()
+            breaker.opened_at_ns = time.monotonic_ns()
             breaker.half_open_calls = 0
             breaker.half_open_successes = 0
         elif new_state == CircuitState.HALF_OPEN:
@@ -330,10 +381,7 @@ class CircuitBreakerManager:
             breaker.half_open_successes = 0
         elif new_state == CircuitState.CLOSED:
             # Reset window
-            breaker.window = SlidingWindow(
-                window_type=breaker.config.window_type,
-                size=breaker.config.window_size
-            )
+            breaker.window.reset()
             
         breaker.state_transitions.append({
             "from": old_state.value,
@@ -349,9 +397,9 @@ class CircuitBreakerManager:
             
         if breaker.state == CircuitState.OPEN:
             # Check if wait duration elapsed
-            if breaker.opened_at:
-                elapsed = (datetime.now() - breaker.opened_at).total_seconds() * 1000
-                if elapsed >= breaker.config.wait_duration_ms:
+            if breaker.opened_at_ns:
+                elapsed_ns = time.monotonic_ns() - breaker.opened_at_ns
+                if elapsed_ns >= breaker.config.wait_duration_ms * NS_PER_MS:
                     self._transition_to(breaker, CircuitState.HALF_OPEN,
                                        TransitionReason.WAIT_DURATION_ELAPSED)
                     return True
@@ -406,14 +454,14 @@ class CircuitBreakerManager:
         if breaker.state == CircuitState.HALF_OPEN:
             breaker.half_open_calls += 1
             
-        start_time = datetime.now()
+        start_ns = time.monotonic_ns()
         
         try:
             result = await operation(*args, **kwargs)
-            duration_ms = (datetime.now() - start_time).total_seconds() * 1000
+            now_ns = time.monotonic_ns()
             
             # Record success
-            self._record_call(breaker, True, duration_ms)
+            self._record_call(breaker, True, now_ns - start_ns, now_ns)
             breaker.last_successful_response = result
             
             # Handle half-open success
@@ -426,14 +474,14 @@ class CircuitBreakerManager:
             return result
             
         except Exception as e:
-            duration_ms = (datetime.now() - start_time).total_seconds() * 1000
+            now_ns = time.monotonic_ns()
             
             # Record failure
-            self._record_call(breaker, False, duration_ms, str(e))
+            self._record_call(breaker, False, now_ns - start_ns, now_ns)
             
             # Handle state transitions
             if breaker.state == CircuitState.CLOSED:
-                reason = self._check_thresholds(breaker)
+                reason = self._check_thresholds(breaker, now_ns)
                 if reason:
                     self._transition_to(breaker, CircuitState.OPEN, reason)
                     
@@ -484,6 +532,50 @@ class CircuitBreakerManager:
         }
 
 
+async def benchmark_circuit_breaker(calls: int = 200_000, coroutines: int = 1000,
+                                    breakers: int = 10) -> Dict[str, Any]:
+    """Бенчмарк: накладные расходы execute на вызов (нс), общие breaker'ы"""
+    async def operation():
+        await asyncio.sleep(0)
+        return 1
+        
+    per_worker = calls // coroutines
+    
+    async def run(call: Callable[[int], Awaitable[Any]]) -> float:
+        async def worker(w: int):
+            for _ in range(per_worker):
+                await call(w)
+                
+        started = time.perf_counter_ns()
+        await asyncio.gather(*(worker(w) for w in range(coroutines)))
+        return (time.perf_counter_ns() - started) / (per_worker * coroutines)
+        
+    baseline_ns = await run(lambda w: operation())
+    results: Dict[str, Any] = {
+        "calls": per_worker * coroutines,
+        "coroutines": coroutines,
+        "breakers": breakers,
+        "baseline_ns_per_call": round(baseline_ns)
+    }
+    
+    for window_type in WindowType:
+        manager = CircuitBreakerManager()
+        for b in range(breakers):
+            config = manager.create_config(f"svc-{b}", window_size=100 if window_type == WindowType.COUNT_BASED else 10)
+            config.window_type = window_type
+            manager.create_breaker(f"svc-{b}", f"svc-{b}")
+        names = [f"svc-{b}" for b in range(breakers)]
+        execute = manager.execute
+        
+        elapsed_ns = await run(lambda w: execute(names[w % breakers], operation))
+        results[window_type.value] = {
+            "ns_per_call": round(elapsed_ns),
+            "overhead_ns_per_call": round(elapsed_ns - baseline_ns)
+        }
+        
+    return results
+
+
 # Демонстрация
 async def main():
     print("=" * 60)
@@ -613,7 +705,7 @@ async def main():
     window = api_breaker.window
     print(f"  Type: {window.window_type.value}")
     print(f"  Size: {window.size}")
-    print(f"  Records: {len(window.records)}")
+    print(f"  Buffer: {window.size} slots")
     print(f"  Total Calls: {window.total_calls}")
     print(f"  Failed: {window.failed_calls}")
     print(f"  Slow: {window.slow_calls}")
@@ -681,4 +773,7 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if '--benchmark' in sys.argv:
+        print(json.dumps(asyncio.run(benchmark_circuit_breaker()), indent=2))
+    else:
+        asyncio.run(main())
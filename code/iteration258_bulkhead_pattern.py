@@ -15,14 +15,31 @@ Server Init - Iteration 258: Bulkhead Pattern Platform
 """
 
 import asyncio
+import functools
+import heapq
+import inspect
+import itertools
+import math
 import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Callable, Awaitable
+from typing import Dict, List, Optional, Any, Callable, Tuple
 from enum import Enum
 import uuid
 
 
+# Adaptive limits
+AIMD_BACKOFF_RATIO = 0.9
+GRADIENT_SMOOTHING = 0.2
+GRADIENT_TOLERANCE = 1.2
+GRADIENT_SHORT_WINDOW = 5
+GRADIENT_PROBE_SAMPLES = 1000
+
+
 class BulkheadType(Enum):
     """Тип bulkhead"""
     SEMAPHORE = "semaphore"
@@ -54,6 +71,13 @@ class FairnessPolicy(Enum):
     WEIGHTED = "weighted"
 
 
+class LimitMode(Enum):
+    """Режим лимита параллелизма"""
+    FIXED = "fixed"
+    AIMD = "aimd"
+    GRADIENT = "gradient"
+
+
 @dataclass
 class BulkheadConfig:
     """Конфигурация bulkhead"""
@@ -82,6 +106,12 @@ class BulkheadConfig:
     
     # Timeout
     execution_timeout_ms: int = 30000
+    
+    # Adaptive limit
+    limit_mode: LimitMode = LimitMode.FIXED
+    min_concurrent: int = 1
+    max_concurrent_limit: int = 100
+    latency_target_ms: float = 0  # AIMD: slower calls count as drops (0 = timeouts only)
 
 
 @dataclass
@@ -105,8 +135,12 @@ class BulkheadMetrics:
     total_wait_time_ms: float = 0
     total_execution_time_ms: float = 0
     
+    # Discarded by DISCARD_OLDEST
+    total_discarded: int = 0
+    
     # State tracking
     state_changes: int = 0
+    limit_changes: int = 0
 
 
 @dataclass
@@ -122,10 +156,139 @@ class QueuedTask:
     # State
     started: bool = False
     completed: bool = False
+    cancelled: bool = False
     
     # Result
     result: Any = None
     error: Optional[str] = None
+    
+    # Slot grant (resolved with True when a slot is handed over)
+    future: Optional[asyncio.Future] = field(default=None, repr=False)
+
+
+class PriorityWaitQueue:
+    """Очередь ожидания слотов в порядке политики справедливости"""
+    
+    def __init__(self, fairness: FairnessPolicy = FairnessPolicy.FIFO):
+        self.fairness = fairness
+        self._heap: List[Tuple[Any, int, QueuedTask]] = []
+        self._arrivals: deque = deque()  # oldest first, for DISCARD_OLDEST
+        self._seq = itertools.count()
+        self._size = 0
+        
+        # Weighted fair queueing: virtual time and last finish per priority
+        self._virtual_time = 0.0
+        self._last_finish: Dict[int, float] = {}
+        
+    def __len__(self) -> int:
+        return self._size
+        
+    def _key(self, task: QueuedTask, seq: int) -> Any:
+        if self.fairness == FairnessPolicy.LIFO:
+            return -seq
+        if self.fairness == FairnessPolicy.PRIORITY:
+            return (-task.priority, seq)
+        if self.fairness == FairnessPolicy.WEIGHTED:
+            start = max(self._virtual_time, self._last_finish.get(task.priority, 0.0))
+            finish = start + 1.0 / (max(task.priority, 0) + 1)
+            self._last_finish[task.priority] = finish
+            return (finish, seq)
+        return seq
+        
+    def push(self, task: QueuedTask):
+        seq = next(self._seq)
+        heapq.heappush(self._heap, (self._key(task, seq), seq, task))
+        self._arrivals.append(task)
+        self._size += 1
+        
+    @staticmethod
+    def _waiting(task: QueuedTask) -> bool:
+        return not task.cancelled and not task.started
+        
+    def pop(self) -> Optional[QueuedTask]:
+        """Следующая ожидающая задача"""
+        while self._heap:
+            key, _, task = heapq.heappop(self._heap)
+            if self._waiting(task):
+                self._size -= 1
+                if self.fairness == FairnessPolicy.WEIGHTED:
+                    self._virtual_time = key[0]
+                return task
+        return None
+        
+    def pop_oldest(self) -> Optional[QueuedTask]:
+        """Самая старая ожидающая задача"""
+        while self._arrivals:
+            task = self._arrivals.popleft()
+            if self._waiting(task):
+                self.remove(task)
+                return task
+        return None
+        
+    def remove(self, task: QueuedTask):
+        """Ленивое удаление (отмена или истечение дедлайна)"""
+        if not self._waiting(task):
+            return
+        task.cancelled = True
+        self._size -= 1
+        
+        # Compact once cancelled entries dominate
+        if len(self._heap) > 2 * self._size + 64:
+            self._heap = [item for item in self._heap if self._waiting(item[2])]
+            heapq.heapify(self._heap)
+            self._arrivals = deque(t for t in self._arrivals if self._waiting(t))
+
+
+class AdaptiveLimit:
+    """Адаптивный лимит параллелизма по наблюдаемой задержке"""
+    
+    def __init__(self, config: BulkheadConfig):
+        self.config = config
+        self.limit = float(config.max_concurrent)
+        self.noload_rtt_ms = 0.0
+        self.short_rtt_ms = 0.0
+        self.samples = 0
+        self.since_backoff = 0
+        
+    def on_sample(self, rtt_ms: float, in_flight: int, dropped: bool) -> int:
+        """Обновление лимита по завершённому вызову"""
+        config = self.config
+        self.samples += 1
+        self.since_backoff += 1
+        
+        if config.limit_mode == LimitMode.AIMD:
+            if dropped or (config.latency_target_ms and rtt_ms > config.latency_target_ms):
+                # At most one backoff per window of in-flight calls
+                if self.since_backoff >= self.limit:
+                    self.limit *= AIMD_BACKOFF_RATIO
+                    self.since_backoff = 0
+            elif in_flight * 2 >= self.limit:
+                # About +1 per window of completions
+                self.limit += 1.0 / self.limit
+                
+        elif config.limit_mode == LimitMode.GRADIENT:
+            if self.samples == 1:
+                self.noload_rtt_ms = self.short_rtt_ms = rtt_ms
+            else:
+                self.short_rtt_ms += (rtt_ms - self.short_rtt_ms) / GRADIENT_SHORT_WINDOW
+                self.noload_rtt_ms = min(self.noload_rtt_ms, rtt_ms)
+                
+            # Periodically re-probe the no-load RTT in case the baseline drifted
+            if self.samples % GRADIENT_PROBE_SAMPLES == 0:
+                self.noload_rtt_ms = self.short_rtt_ms
+                
+            if dropped:
+                if self.since_backoff >= self.limit:
+                    self.limit *= AIMD_BACKOFF_RATIO
+                    self.since_backoff = 0
+            elif in_flight * 2 >= self.limit:
+                # Vegas-style: shrink by noload/observed RTT, keep a sqrt(limit) queue allowance
+                gradient = max(0.5, min(1.0, GRADIENT_TOLERANCE * self.noload_rtt_ms / max(self.short_rtt_ms, 1e-6)))
+                target = self.limit * gradient + math.sqrt(self.limit)
+                self.limit = self.limit * (1 - GRADIENT_SMOOTHING) + target * GRADIENT_SMOOTHING
+                
+        self.limit = max(float(config.min_concurrent), min(float(config.max_concurrent_limit), self.limit))
+        return max(config.min_concurrent, int(self.limit))
 
 
 @dataclass
@@ -143,14 +306,15 @@ class Bulkhead:
     # State
     state: BulkheadState = BulkheadState.NORMAL
     
-    # Semaphore (real asyncio semaphore created in manager)
-    semaphore: Optional[asyncio.Semaphore] = None
-    
     # Current state
     current_concurrent: int = 0
     
     # Queue
-    queue: List[QueuedTask] = field(default_factory=list)
+    queue: PriorityWaitQueue = field(default_factory=PriorityWaitQueue)
+    
+    # Thread pool (THREAD_POOL bulkheads) and adaptive limit
+    executor: Optional[ThreadPoolExecutor] = None
+    adaptive: Optional[AdaptiveLimit] = None
     
     # Metrics
     metrics: BulkheadMetrics = field(default_factory=BulkheadMetrics)
@@ -191,7 +355,10 @@ class BulkheadManager:
                      bulkhead_type: BulkheadType = BulkheadType.SEMAPHORE,
                      max_concurrent: int = 10,
                      max_wait_duration_ms: int = 5000,
-                     queue_size: int = 100) -> BulkheadConfig:
+                     queue_size: int = 100,
+                     rejection_policy: RejectionPolicy = RejectionPolicy.REJECT,
+                     fairness_policy: FairnessPolicy = FairnessPolicy.FIFO,
+                     limit_mode: LimitMode = LimitMode.FIXED) -> BulkheadConfig:
         """Создание конфигурации"""
         config = BulkheadConfig(
             config_id=f"cfg_{uuid.uuid4().hex[:8]}",
@@ -199,7 +366,10 @@ class BulkheadManager:
             bulkhead_type=bulkhead_type,
             max_concurrent=max_concurrent,
             max_wait_duration_ms=max_wait_duration_ms,
-            queue_size=queue_size
+            queue_size=queue_size,
+            rejection_policy=rejection_policy,
+            fairness_policy=fairness_policy,
+            limit_mode=limit_mode
         )
         
         self.configs[name] = config
@@ -218,9 +388,20 @@ class BulkheadManager:
             bulkhead_id=f"bh_{uuid.uuid4().hex[:8]}",
             name=name,
             config=config,
-            semaphore=asyncio.Semaphore(config.max_concurrent)
+            queue=PriorityWaitQueue(config.fairness_policy)
         )
         
+        if config.limit_mode != LimitMode.FIXED:
+            bulkhead.adaptive = AdaptiveLimit(config)
+            
+        if config.bulkhead_type == BulkheadType.THREAD_POOL:
+            # Sized for the largest limit the bulkhead may grow to
+            workers = config.max_concurrent_limit if bulkhead.adaptive else config.max_concurrent
+            bulkhead.executor = ThreadPoolExecutor(
+                max_workers=max(workers, config.max_concurrent),
+                thread_name_prefix=f"bulkhead-{name}"
+            )
+        
         self.bulkheads[name] = bulkhead
         return bulkhead
         
@@ -260,7 +441,7 @@ class BulkheadManager:
         return False
         
     async def execute(self, bulkhead_name: str,
-                     operation: Callable[..., Awaitable[Any]],
+                     operation: Callable[..., Any],
                      priority: int = 0,
                      *args, **kwargs) -> ExecutionResult:
         """Выполнение операции через bulkhead"""
@@ -274,10 +455,11 @@ class BulkheadManager:
             bulkhead_name=bulkhead_name
         )
         
-        start_time = datetime.now()
+        start_time = time.perf_counter()
+        granted = False
         
         # Check if we can accept
-        if bulkhead.current_concurrent >= config.max_concurrent:
+        if bulkhead.current_concurrent >= config.max_concurrent or len(bulkhead.queue):
             if config.rejection_policy == RejectionPolicy.REJECT:
                 result.was_rejected = True
                 result.success = False
@@ -285,13 +467,22 @@ class BulkheadManager:
                 bulkhead.metrics.total_rejected += 1
                 return result
                 
-            elif config.rejection_policy == RejectionPolicy.QUEUE:
+            elif config.rejection_policy in [RejectionPolicy.QUEUE, RejectionPolicy.DISCARD_OLDEST]:
                 if len(bulkhead.queue) >= config.queue_size:
-                    result.was_rejected = True
-                    result.success = False
-                    result.error = "Queue full"
-                    bulkhead.metrics.total_rejected += 1
-                    return result
+                    oldest = None
+                    if config.rejection_policy == RejectionPolicy.DISCARD_OLDEST:
+                        oldest = bulkhead.queue.pop_oldest()
+                        
+                    if oldest is None:
+                        result.was_rejected = True
+                        result.success = False
+                        result.error = "Queue full"
+                        bulkhead.metrics.total_rejected += 1
+                        return result
+                        
+                    oldest.error = "Discarded from queue"
+                    oldest.future.set_result(False)
+                    bulkhead.metrics.total_discarded += 1
                     
                 # Queue the task
                 task = QueuedTask(
@@ -299,29 +490,23 @@ class BulkheadManager:
                     priority=priority,
                     deadline=datetime.now() + timedelta(milliseconds=config.max_wait_duration_ms)
                 )
-                bulkhead.queue.append(task)
                 result.was_queued = True
                 
-                # Wait for slot
-                waited = 0
-                while bulkhead.current_concurrent >= config.max_concurrent:
-                    if waited >= config.max_wait_duration_ms:
-                        bulkhead.queue.remove(task)
-                        result.success = False
-                        result.error = "Wait timeout"
+                # Wait for a slot hand-off, a deadline or a discard
+                if not await self._wait_for_slot(bulkhead, task):
+                    result.success = False
+                    result.error = task.error or "Wait timeout"
+                    if task.error == "Wait timeout":
                         bulkhead.metrics.total_timed_out += 1
-                        return result
-                    await asyncio.sleep(0.01)
-                    waited += 10
-                    
-                bulkhead.queue.remove(task)
+                    return result
+                granted = True
                 
-        # Acquire slot
-        wait_end = datetime.now()
-        result.wait_time_ms = (wait_end - start_time).total_seconds() * 1000
+        # Acquire slot (queued callers were handed one already)
+        result.wait_time_ms = (time.perf_counter() - start_time) * 1000
         bulkhead.metrics.total_wait_time_ms += result.wait_time_ms
         
-        bulkhead.current_concurrent += 1
+        if not granted:
+            bulkhead.current_concurrent += 1
         bulkhead.metrics.total_accepted += 1
         
         if bulkhead.current_concurrent > bulkhead.metrics.max_concurrent_reached:
@@ -332,15 +517,28 @@ class BulkheadManager:
         
         self._update_state(bulkhead)
         
+        exec_start = time.perf_counter()
+        timeout = config.execution_timeout_ms / 1000
+        release_now = True
+        dropped = False
+        pending = None
+        threaded = bulkhead.executor is not None and not asyncio.iscoroutinefunction(operation)
+        
         try:
-            exec_start = datetime.now()
-            
-            # Execute with timeout
-            operation_result = await asyncio.wait_for(
-                operation(*args, **kwargs),
-                timeout=config.execution_timeout_ms / 1000
-            )
-            
+            if threaded:
+                # Blocking call: run on the bulkhead's own pool
+                pending = asyncio.get_running_loop().run_in_executor(
+                    bulkhead.executor, functools.partial(operation, *args, **kwargs)
+                )
+                operation_result = await asyncio.wait_for(asyncio.shield(pending), timeout=timeout)
+            else:
+                operation_result = operation(*args, **kwargs)
+                
+            # Sync wrappers (lambda: coro()) hand back an awaitable
+            if inspect.isawaitable(operation_result):
+                remaining = timeout - (time.perf_counter() - exec_start)
+                operation_result = await asyncio.wait_for(operation_result, timeout=max(remaining, 0))
+                
             result.result = operation_result
             result.success = True
             
@@ -348,23 +546,90 @@ class BulkheadManager:
             result.success = False
             result.error = "Execution timeout"
             bulkhead.metrics.total_timed_out += 1
+            dropped = True
             
+            if threaded and not pending.done():
+                # A thread cannot be interrupted: keep its slot until it actually finishes
+                release_now = False
+                pending.add_done_callback(
+                    lambda _: self._release(bulkhead, (time.perf_counter() - exec_start) * 1000, True)
+                )
+                
         except Exception as e:
             result.success = False
             result.error = str(e)
             
         finally:
-            bulkhead.current_concurrent -= 1
-            bulkhead.metrics.current_concurrent = bulkhead.current_concurrent
-            bulkhead.metrics.total_completed += 1
+            result.execution_time_ms = (time.perf_counter() - exec_start) * 1000
+            if release_now:
+                self._release(bulkhead, result.execution_time_ms, dropped)
+                
+        return result
+        
+    async def _wait_for_slot(self, bulkhead: Bulkhead, task: QueuedTask) -> bool:
+        """Ожидание слота без опроса: передача слота или дедлайн"""
+        loop = asyncio.get_running_loop()
+        task.future = loop.create_future()
+        bulkhead.queue.push(task)
+        
+        bulkhead.metrics.queue_size = len(bulkhead.queue)
+        if len(bulkhead.queue) > bulkhead.metrics.max_queue_reached:
+            bulkhead.metrics.max_queue_reached = len(bulkhead.queue)
             
-            exec_end = datetime.now()
-            result.execution_time_ms = (exec_end - wait_end).total_seconds() * 1000
-            bulkhead.metrics.total_execution_time_ms += result.execution_time_ms
+        timer = loop.call_later(
+            bulkhead.config.max_wait_duration_ms / 1000, self._expire, bulkhead, task
+        )
+        
+        try:
+            return await task.future
+        except asyncio.CancelledError:
+            if task.future.done() and not task.future.cancelled() and task.future.result():
+                # Slot was handed over just before cancellation
+                self._release(bulkhead, 0.0, False, sample=False)
+            else:
+                bulkhead.queue.remove(task)
+            raise
+        finally:
+            timer.cancel()
+            bulkhead.metrics.queue_size = len(bulkhead.queue)
             
-            self._update_state(bulkhead)
+    def _expire(self, bulkhead: Bulkhead, task: QueuedTask):
+        """Истечение дедлайна ожидания"""
+        if task.future.done():
+            return
+        bulkhead.queue.remove(task)
+        task.error = "Wait timeout"
+        task.future.set_result(False)
+        
+    def _grant(self, bulkhead: Bulkhead):
+        """Передача свободных слотов ожидающим"""
+        while bulkhead.current_concurrent < bulkhead.config.max_concurrent:
+            task = bulkhead.queue.pop()
+            if task is None:
+                break
+            task.started = True
+            bulkhead.current_concurrent += 1
+            task.future.set_result(True)
             
-        return result
+    def _release(self, bulkhead: Bulkhead, execution_ms: float,
+                 dropped: bool, sample: bool = True):
+        """Освобождение слота"""
+        in_flight = bulkhead.current_concurrent
+        bulkhead.current_concurrent -= 1
+        bulkhead.metrics.current_concurrent = bulkhead.current_concurrent
+        
+        if sample:
+            bulkhead.metrics.total_completed += 1
+            bulkhead.metrics.total_execution_time_ms += execution_ms
+            
+            if bulkhead.adaptive:
+                new_limit = bulkhead.adaptive.on_sample(execution_ms, in_flight, dropped)
+                if new_limit != bulkhead.config.max_concurrent:
+                    bulkhead.config.max_concurrent = new_limit
+                    bulkhead.metrics.limit_changes += 1
+                    
+        self._update_state(bulkhead)
+        self._grant(bulkhead)
         
     def get_utilization(self, bulkhead_name: str) -> float:
         """Получение утилизации"""
@@ -379,12 +644,20 @@ class BulkheadManager:
         return bulkhead.metrics if bulkhead else None
         
     def resize(self, bulkhead_name: str, new_max_concurrent: int):
-        """Изменение размера"""
+        """Изменение размера (для адаптивных bulkhead - новая стартовая точка)"""
         bulkhead = self.bulkheads.get(bulkhead_name)
         if bulkhead:
             bulkhead.config.max_concurrent = new_max_concurrent
-            bulkhead.semaphore = asyncio.Semaphore(new_max_concurrent)
+            if bulkhead.adaptive:
+                bulkhead.adaptive.limit = float(new_max_concurrent)
+            self._grant(bulkhead)
             
+    def shutdown(self):
+        """Остановка пулов потоков"""
+        for bulkhead in self.bulkheads.values():
+            if bulkhead.executor:
+                bulkhead.executor.shutdown(wait=False)
+                
     def get_statistics(self) -> Dict[str, Any]:
         """Общая статистика"""
         total_accepted = 0
@@ -420,19 +693,22 @@ async def main():
     print("\n⚙️ Creating Configurations...")
     
     configs_data = [
-        ("api-gateway", BulkheadType.SEMAPHORE, 5, 3000, 20),
-        ("database-pool", BulkheadType.THREAD_POOL, 10, 5000, 50),
-        ("external-service", BulkheadType.QUEUE, 3, 10000, 100),
+        ("api-gateway", BulkheadType.SEMAPHORE, 5, 3000, 20, RejectionPolicy.REJECT, FairnessPolicy.FIFO, LimitMode.FIXED),
+        ("database-pool", BulkheadType.THREAD_POOL, 10, 5000, 50, RejectionPolicy.QUEUE, FairnessPolicy.FIFO, LimitMode.FIXED),
+        ("external-service", BulkheadType.QUEUE, 3, 10000, 100, RejectionPolicy.QUEUE, FairnessPolicy.PRIORITY, LimitMode.FIXED),
+        ("adaptive-api", BulkheadType.SEMAPHORE, 4, 5000, 500, RejectionPolicy.QUEUE, FairnessPolicy.FIFO, LimitMode.GRADIENT),
     ]
     
-    for name, bh_type, max_conc, max_wait, queue_size in configs_data:
-        config = manager.create_config(name, bh_type, max_conc, max_wait, queue_size)
-        print(f"  ⚙️ {name}: type={bh_type.value}, max={max_conc}, queue={queue_size}")
+    for name, bh_type, max_conc, max_wait, queue_size, rejection, fairness, limit_mode in configs_data:
+        config = manager.create_config(name, bh_type, max_conc, max_wait, queue_size,
+                                       rejection, fairness, limit_mode)
+        print(f"  ⚙️ {name}: type={bh_type.value}, max={max_conc}, queue={queue_size}, "
+              f"fairness={fairness.value}, limit={limit_mode.value}")
         
     # Create bulkheads
     print("\n🛡️ Creating Bulkheads...")
     
-    for config_name in ["api-gateway", "database-pool", "external-service"]:
+    for config_name in ["api-gateway", "database-pool", "external-service", "adaptive-api"]:
         bulkhead = manager.create_bulkhead(config_name, config_name)
         print(f"  🛡️ {bulkhead.name}: state={bulkhead.state.value}")
         
@@ -482,6 +758,54 @@ async def main():
     avg_exec = sum(r.execution_time_ms for r in db_results) / len(db_results)
     print(f"    Completed: {accepted}, Avg Execution: {avg_exec:.1f}ms")
     
+    # Blocking calls run on the bulkhead's own thread pool
+    def blocking_query(query_id: int):
+        time.sleep(random.uniform(0.02, 0.05))
+        return {"query_id": query_id, "thread": threading.current_thread().name}
+        
+    blocking_results = await asyncio.gather(*[
+        manager.execute("database-pool", blocking_query, 0, i) for i in range(12)
+    ])
+    threads = {r.result["thread"] for r in blocking_results if r.success}
+    print(f"    Blocking calls: {sum(1 for r in blocking_results if r.success)} on {len(threads)} pool threads")
+    
+    # Priority wait queue
+    print("\n  External Service (3 max concurrent, priority queue):")
+    
+    grant_order = []
+    
+    async def external_call(call_id: str):
+        grant_order.append(call_id)
+        await asyncio.sleep(0.05)
+        return call_id
+        
+    ext_tasks = [
+        asyncio.create_task(manager.execute("external-service", external_call, i % 3, f"p{i % 3}#{i}"))
+        for i in range(12)
+    ]
+    await asyncio.gather(*ext_tasks)
+    print(f"    Grant order: {' '.join(grant_order)}")
+    
+    # Adaptive limit
+    print("\n  Adaptive API (gradient limit, backend saturates at 8):")
+    
+    backend = {"in_flight": 0}
+    
+    async def saturating_call():
+        backend["in_flight"] += 1
+        try:
+            await asyncio.sleep(0.01 * max(1.0, backend["in_flight"] / 8))
+        finally:
+            backend["in_flight"] -= 1
+            
+    async def adaptive_client():
+        for _ in range(25):
+            await manager.execute("adaptive-api", saturating_call)
+            
+    await asyncio.gather(*[adaptive_client() for _ in range(30)])
+    adaptive_bh = manager.bulkheads["adaptive-api"]
+    print(f"    Limit: 4 -> {adaptive_bh.config.max_concurrent} ({adaptive_bh.metrics.limit_changes} adjustments)")
+    
     # Display bulkheads
     print("\n🛡️ Bulkhead Status:")
     
@@ -589,6 +913,8 @@ async def main():
         
     print("└────────────────────────────────────────────────────────────────────┘")
     
+    manager.shutdown()
+    
     print("\n" + "=" * 60)
     print("Bulkhead Pattern Platform initialized!")
     print("=" * 60)
@@ -15,11 +15,16 @@ Server Init - Iteration 259: Rate Limiter Advanced Platform
 """
 
 import asyncio
+import itertools
+import json
 import random
+import sys
+import time
+from array import array
 from datetime import datetime, timedelta
-from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Deque
-from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Any, Deque, Iterable
+from collections import OrderedDict, deque
 from enum import Enum
 import uuid
 
@@ -50,46 +55,10 @@ class RateLimitResponse(Enum):
     THROTTLED = "throttled"
 
 
-@dataclass
-class TokenBucket:
-    """Токенное ведро"""
-    capacity: int = 100
-    tokens: float = 100
-    refill_rate: float = 10  # tokens per second
-    last_refill: datetime = field(default_factory=datetime.now)
-
-
-@dataclass
-class SlidingWindowLog:
-    """Лог скользящего окна"""
-    window_size_ms: int = 60000  # 1 minute
-    requests: Deque[datetime] = field(default_factory=deque)
-
-
-@dataclass
-class SlidingWindowCounter:
-    """Счётчик скользящего окна"""
-    window_size_ms: int = 60000
-    current_window_start: datetime = field(default_factory=datetime.now)
-    current_count: int = 0
-    previous_count: int = 0
-
-
-@dataclass
-class FixedWindowCounter:
-    """Счётчик фиксированного окна"""
-    window_size_ms: int = 60000
-    window_start: datetime = field(default_factory=datetime.now)
-    count: int = 0
-
-
-@dataclass
-class LeakyBucket:
-    """Протекающее ведро"""
-    capacity: int = 100
-    queue: Deque[datetime] = field(default_factory=deque)
-    leak_rate: float = 10  # requests per second
-    last_leak: datetime = field(default_factory=datetime.now)
+# Limiter state
+NS_PER_SECOND = 1_000_000_000
+NS_PER_MS = 1_000_000
+DEFAULT_MAX_IDENTIFIERS = 100_000
 
 
 @dataclass
@@ -118,20 +87,20 @@ class RateLimitConfig:
     # Response
     queue_excess: bool = False
     max_queue_wait_ms: int = 5000
+    
+    # Idle identifiers (0 = state lifetime of the algorithm)
+    idle_ttl_ms: int = 0
+    max_identifiers: int = DEFAULT_MAX_IDENTIFIERS
 
 
 @dataclass
 class RateLimitEntry:
-    """Запись rate limit"""
+    """Запись rate limit (снимок состояния идентификатора)"""
     entry_id: str
     identifier: str  # user_id, ip, api_key, etc.
     
-    # Buckets/Windows
-    token_bucket: Optional[TokenBucket] = None
-    sliding_log: Optional[SlidingWindowLog] = None
-    sliding_counter: Optional[SlidingWindowCounter] = None
-    fixed_counter: Optional[FixedWindowCounter] = None
-    leaky_bucket: Optional[LeakyBucket] = None
+    # State
+    remaining: int = 0
     
     # Stats
     total_requests: int = 0
@@ -139,8 +108,7 @@ class RateLimitEntry:
     denied_requests: int = 0
     
     # Timing
-    created_at: datetime = field(default_factory=datetime.now)
-    last_request: datetime = field(default_factory=datetime.now)
+    idle_ms: int = 0
 
 
 @dataclass
@@ -178,6 +146,272 @@ class RateLimitMetrics:
     # Identifiers
     unique_identifiers: int = 0
     identifiers_at_limit: int = 0
+    
+    # Eviction
+    idle_evictions: int = 0
+    pressure_evictions: int = 0
+    memory_bytes: int = 0
+
+
+class LimiterState:
+    """Состояние лимитера: идентификатор -> слот в массивах int64
+    
+    Время — целые наносекунды time.monotonic_ns(). Token bucket и leaky bucket
+    считаются через GCRA (одно число на идентификатор — теоретическое время
+    прибытия), окна — через начало окна и счётчики. Порядок slots совпадает
+    с порядком последних обращений, поэтому простаивающие идентификаторы
+    снимаются с головы словаря за O(1) на каждое вытеснение.
+    """
+    
+    __slots__ = (
+        "algorithm", "gcra", "limit", "interval_ns", "burst_ns", "window_ns",
+        "idle_ttl_ns", "max_identifiers",
+        "slots", "free_slots", "clock", "current", "previous", "last_seen",
+        "allowed", "denied", "logs", "remaining",
+        "total_requests", "total_denied", "idle_evictions", "pressure_evictions",
+        "_decide",
+    )
+    
+    def __init__(self, config: RateLimitConfig):
+        self.algorithm = config.algorithm
+        self.gcra = self.algorithm in (RateLimitAlgorithm.TOKEN_BUCKET, RateLimitAlgorithm.LEAKY_BUCKET)
+        self.window_ns = config.window_size_ms * NS_PER_MS
+        self.interval_ns = max(1, round(NS_PER_SECOND / config.requests_per_second))
+        
+        if self.gcra:
+            self.limit = config.burst_capacity
+            self._decide = self._decide_gcra
+            lifetime_ns = self.interval_ns * self.limit
+        elif self.algorithm == RateLimitAlgorithm.SLIDING_WINDOW_LOG:
+            self.limit = config.requests_per_minute
+            self._decide = self._decide_sliding_log
+            lifetime_ns = self.window_ns
+        elif self.algorithm == RateLimitAlgorithm.SLIDING_WINDOW_COUNTER:
+            self.limit = config.requests_per_minute
+            self._decide = self._decide_sliding_counter
+            lifetime_ns = 2 * self.window_ns
+        else:
+            self.limit = config.requests_per_minute
+            self._decide = self._decide_fixed_window
+            lifetime_ns = self.window_ns
+            
+        self.burst_ns = self.interval_ns * self.limit
+        # Идентификатор, простоявший дольше lifetime_ns, неотличим от нового
+        self.idle_ttl_ns = max(config.idle_ttl_ms * NS_PER_MS, lifetime_ns)
+        self.max_identifiers = config.max_identifiers or DEFAULT_MAX_IDENTIFIERS
+        
+        self.slots: OrderedDict = OrderedDict()
+        self.free_slots: List[int] = []
+        self.clock = array('q')      # GCRA TAT or window start
+        self.current = array('q')    # requests in current window
+        self.previous = array('q')   # requests in previous window
+        self.last_seen = array('q')
+        self.allowed = array('q')
+        self.denied = array('q')
+        self.logs: List[Optional[Deque[int]]] = []
+        self.remaining = 0
+        
+        self.total_requests = 0
+        self.total_denied = 0
+        self.idle_evictions = 0
+        self.pressure_evictions = 0
+        
+    def check(self, identifier: str, now: int) -> int:
+        """Проверка запроса: 0 — разрешён, иначе retry-after в наносекундах"""
+        slots = self.slots
+        slot = slots.get(identifier)
+        if slot is None:
+            slot = self._allocate(identifier, now)
+        else:
+            slots.move_to_end(identifier)
+        self.last_seen[slot] = now
+        
+        retry_after = self._decide(slot, now)
+        self.total_requests += 1
+        if retry_after:
+            self.denied[slot] += 1
+            self.total_denied += 1
+        else:
+            self.allowed[slot] += 1
+        return retry_after
+        
+    def _decide_gcra(self, slot: int, now: int) -> int:
+        tat = self.clock[slot]
+        if tat < now:
+            tat = now
+        tat += self.interval_ns
+        backlog = tat - now
+        if backlog > self.burst_ns:
+            self.remaining = 0
+            return backlog - self.burst_ns
+        self.clock[slot] = tat
+        self.remaining = (self.burst_ns - backlog) // self.interval_ns
+        return 0
+        
+    def _decide_sliding_log(self, slot: int, now: int) -> int:
+        log = self.logs[slot]
+        cutoff = now - self.window_ns
+        while log and log[0] <= cutoff:
+            log.popleft()
+        if len(log) >= self.limit:
+            self.remaining = 0
+            return max(1, log[0] - cutoff)
+        log.append(now)
+        self.remaining = self.limit - len(log)
+        return 0
+        
+    def _roll_window(self, slot: int, now: int) -> int:
+        """Сдвиг окна к текущему моменту, возвращает прошедшее в окне время"""
+        window = self.window_ns
+        elapsed = now - self.clock[slot]
+        if elapsed >= window:
+            windows = elapsed // window
+            self.previous[slot] = self.current[slot] if windows == 1 else 0
+            self.current[slot] = 0
+            self.clock[slot] += windows * window
+            elapsed -= windows * window
+        return elapsed
+        
+    def _decide_sliding_counter(self, slot: int, now: int) -> int:
+        elapsed = self._roll_window(slot, now)
+        window = self.window_ns
+        # weighted = previous * (1 - elapsed / window) + current, умноженное на window
+        carried = self.previous[slot] * (window - elapsed)
+        count = self.current[slot]
+        if carried + count * window >= self.limit * window:
+            self.remaining = 0
+            return window - elapsed
+        self.current[slot] = count + 1
+        self.remaining = max(0, (self.limit * window - carried) // window - count - 1)
+        return 0
+        
+    def _decide_fixed_window(self, slot: int, now: int) -> int:
+        elapsed = self._roll_window(slot, now)
+        count = self.current[slot]
+        if count >= self.limit:
+            self.remaining = 0
+            return self.window_ns - elapsed
+        self.current[slot] = count + 1
+        self.remaining = self.limit - count - 1
+        return 0
+        
+    def peek_remaining(self, identifier: str, now: int) -> int:
+        """Оставшийся лимит без расходования запроса"""
+        slot = self.slots.get(identifier)
+        if slot is None:
+            return self.limit
+        if self.gcra:
+            backlog = max(0, self.clock[slot] - now)
+            return max(0, (self.burst_ns - backlog) // self.interval_ns)
+        if self.algorithm == RateLimitAlgorithm.SLIDING_WINDOW_LOG:
+            cutoff = now - self.window_ns
+            return max(0, self.limit - sum(1 for t in self.logs[slot] if t > cutoff))
+        elapsed = self._roll_window(slot, now)
+        if self.algorithm == RateLimitAlgorithm.SLIDING_WINDOW_COUNTER:
+            window = self.window_ns
+            carried = self.previous[slot] * (window - elapsed)
+            return max(0, (self.limit * window - carried) // window - self.current[slot])
+        return max(0, self.limit - self.current[slot])
+        
+    def reset_after_ns(self, identifier: str, now: int) -> int:
+        """Время до полного восстановления лимита"""
+        slot = self.slots.get(identifier)
+        if slot is None:
+            return 0
+        if self.gcra:
+            return max(0, self.clock[slot] - now)
+        if self.algorithm == RateLimitAlgorithm.SLIDING_WINDOW_LOG:
+            log = self.logs[slot]
+            return max(0, log[-1] + self.window_ns - now) if log else 0
+        return max(0, self.clock[slot] + self.window_ns - now)
+        
+    def current_rate(self, identifier: str, now: int) -> float:
+        """Текущая скорость запросов идентификатора (в секунду)"""
+        slot = self.slots.get(identifier)
+        if slot is None:
+            return 0.0
+        window_s = self.window_ns / NS_PER_SECOND
+        if self.gcra:
+            return NS_PER_SECOND / self.interval_ns
+        if self.algorithm == RateLimitAlgorithm.SLIDING_WINDOW_LOG:
+            return len(self.logs[slot]) / window_s
+        elapsed = max(0, now - self.clock[slot])
+        if self.algorithm == RateLimitAlgorithm.SLIDING_WINDOW_COUNTER:
+            weight = max(0.0, 1 - elapsed / self.window_ns)
+            return (self.previous[slot] * weight + self.current[slot]) / window_s
+        return self.current[slot] / (max(elapsed, NS_PER_MS) / NS_PER_SECOND)
+        
+    def _allocate(self, identifier: str, now: int) -> int:
+        self.evict_idle(now)
+        if len(self.slots) >= self.max_identifiers:
+            _, slot = self.slots.popitem(last=False)
+            self._free(slot)
+            self.pressure_evictions += 1
+            
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.clock[slot] = now
+            self.current[slot] = 0
+            self.previous[slot] = 0
+            self.allowed[slot] = 0
+            self.denied[slot] = 0
+        else:
+            slot = len(self.clock)
+            self.clock.append(now)
+            self.current.append(0)
+            self.previous.append(0)
+            self.last_seen.append(now)
+            self.allowed.append(0)
+            self.denied.append(0)
+            self.logs.append(None)
+            
+        if self.algorithm == RateLimitAlgorithm.SLIDING_WINDOW_LOG:
+            self.logs[slot] = deque()
+        self.slots[identifier] = slot
+        return slot
+        
+    def _free(self, slot: int):
+        self.logs[slot] = None
+        self.free_slots.append(slot)
+        
+    def evict_idle(self, now: int) -> int:
+        """Удаление идентификаторов, простаивающих дольше idle_ttl"""
+        slots = self.slots
+        cutoff = now - self.idle_ttl_ns
+        last_seen = self.last_seen
+        evicted = 0
+        while slots:
+            identifier = next(iter(slots))
+            slot = slots[identifier]
+            if last_seen[slot] > cutoff:
+                break
+            del slots[identifier]
+            self._free(slot)
+            evicted += 1
+        self.idle_evictions += evicted
+        return evicted
+        
+    def remove(self, identifier: str) -> bool:
+        slot = self.slots.pop(identifier, None)
+        if slot is None:
+            return False
+        self._free(slot)
+        return True
+        
+    def clear(self):
+        for slot in self.slots.values():
+            self._free(slot)
+        self.slots.clear()
+        
+    def memory_bytes(self) -> int:
+        """Оценка занимаемой памяти"""
+        arrays = (self.clock, self.current, self.previous, self.last_seen, self.allowed, self.denied)
+        size = sum(a.itemsize * len(a) for a in arrays)
+        size += sys.getsizeof(self.slots) + sys.getsizeof(self.logs)
+        size += sum(sys.getsizeof(identifier) for identifier in self.slots)
+        if self.algorithm == RateLimitAlgorithm.SLIDING_WINDOW_LOG:
+            size += sum(sys.getsizeof(log) for log in self.logs if log is not None)
+        return size
 
 
 class RateLimiterManager:
@@ -185,14 +419,17 @@ class RateLimiterManager:
     
     def __init__(self):
         self.configs: Dict[str, RateLimitConfig] = {}
-        self.entries: Dict[str, Dict[str, RateLimitEntry]] = {}  # limiter_name -> identifier -> entry
+        self.states: Dict[str, LimiterState] = {}  # limiter_name -> state
         self.metrics: Dict[str, RateLimitMetrics] = {}
+        self._result_seq = itertools.count(1)
         
     def create_config(self, name: str,
                      algorithm: RateLimitAlgorithm = RateLimitAlgorithm.TOKEN_BUCKET,
                      requests_per_second: float = 10,
                      burst_capacity: int = 100,
-                     scope: RateLimitScope = RateLimitScope.GLOBAL) -> RateLimitConfig:
+                     scope: RateLimitScope = RateLimitScope.GLOBAL,
+                     idle_ttl_ms: int = 0,
+                     max_identifiers: int = DEFAULT_MAX_IDENTIFIERS) -> RateLimitConfig:
         """Создание конфигурации"""
         config = RateLimitConfig(
             config_id=f"cfg_{uuid.uuid4().hex[:8]}",
@@ -202,312 +439,200 @@ class RateLimiterManager:
             burst_capacity=burst_capacity,
             scope=scope,
             requests_per_minute=int(requests_per_second * 60),
-            requests_per_hour=int(requests_per_second * 3600)
+            requests_per_hour=int(requests_per_second * 3600),
+            idle_ttl_ms=idle_ttl_ms,
+            max_identifiers=max_identifiers
         )
         
         self.configs[name] = config
-        self.entries[name] = {}
+        self.states[name] = LimiterState(config)
         self.metrics[name] = RateLimitMetrics(limiter_name=name)
         
         return config
         
-    def _get_or_create_entry(self, limiter_name: str, identifier: str) -> RateLimitEntry:
-        """Получение или создание записи"""
-        if limiter_name not in self.entries:
-            self.entries[limiter_name] = {}
-            
-        if identifier not in self.entries[limiter_name]:
-            config = self.configs.get(limiter_name)
-            entry = RateLimitEntry(
-                entry_id=f"ent_{uuid.uuid4().hex[:8]}",
-                identifier=identifier
-            )
-            
-            if config:
-                if config.algorithm == RateLimitAlgorithm.TOKEN_BUCKET:
-                    entry.token_bucket = TokenBucket(
-                        capacity=config.burst_capacity,
-                        tokens=config.burst_capacity,
-                        refill_rate=config.requests_per_second
-                    )
-                elif config.algorithm == RateLimitAlgorithm.SLIDING_WINDOW_LOG:
-                    entry.sliding_log = SlidingWindowLog(
-                        window_size_ms=config.window_size_ms
-                    )
-                elif config.algorithm == RateLimitAlgorithm.SLIDING_WINDOW_COUNTER:
-                    entry.sliding_counter = SlidingWindowCounter(
-                        window_size_ms=config.window_size_ms
-                    )
-                elif config.algorithm == RateLimitAlgorithm.FIXED_WINDOW_COUNTER:
-                    entry.fixed_counter = FixedWindowCounter(
-                        window_size_ms=config.window_size_ms
-                    )
-                elif config.algorithm == RateLimitAlgorithm.LEAKY_BUCKET:
-                    entry.leaky_bucket = LeakyBucket(
-                        capacity=config.burst_capacity,
-                        leak_rate=config.requests_per_second
-                    )
-                    
-            self.entries[limiter_name][identifier] = entry
-            
-        return self.entries[limiter_name][identifier]
-        
-    def _check_token_bucket(self, entry: RateLimitEntry, config: RateLimitConfig) -> RateLimitResult:
-        """Проверка token bucket"""
-        bucket = entry.token_bucket
-        now = datetime.now()
-        
-        # Refill tokens
-        elapsed = (now - bucket.last_refill).total_seconds()
-        bucket.tokens = min(
-            bucket.capacity,
-            bucket.tokens + elapsed * bucket.refill_rate
-        )
-        bucket.last_refill = now
-        
-        result = RateLimitResult(
-            result_id=f"res_{uuid.uuid4().hex[:8]}",
-            identifier=entry.identifier,
-            remaining=int(bucket.tokens),
-            current_rate=config.requests_per_second
-        )
-        
-        if bucket.tokens >= 1:
-            bucket.tokens -= 1
-            result.response = RateLimitResponse.ALLOWED
-            result.remaining = int(bucket.tokens)
-        else:
-            result.response = RateLimitResponse.DENIED
-            result.retry_after_ms = int((1 - bucket.tokens) / bucket.refill_rate * 1000)
-            
-        return result
-        
-    def _check_sliding_window_log(self, entry: RateLimitEntry, config: RateLimitConfig) -> RateLimitResult:
-        """Проверка sliding window log"""
-        log = entry.sliding_log
-        now = datetime.now()
-        cutoff = now - timedelta(milliseconds=log.window_size_ms)
-        
-        # Remove old requests
-        while log.requests and log.requests[0] < cutoff:
-            log.requests.popleft()
-            
-        result = RateLimitResult(
-            result_id=f"res_{uuid.uuid4().hex[:8]}",
-            identifier=entry.identifier,
-            remaining=max(0, config.requests_per_minute - len(log.requests)),
-            reset_at=now + timedelta(milliseconds=log.window_size_ms)
-        )
-        
-        if len(log.requests) < config.requests_per_minute:
-            log.requests.append(now)
-            result.response = RateLimitResponse.ALLOWED
-        else:
-            result.response = RateLimitResponse.DENIED
-            if log.requests:
-                oldest = log.requests[0]
-                result.retry_after_ms = int((oldest - cutoff).total_seconds() * 1000)
-                
-        result.current_rate = len(log.requests) / (log.window_size_ms / 1000)
-        
-        return result
-        
-    def _check_sliding_window_counter(self, entry: RateLimitEntry, config: RateLimitConfig) -> RateLimitResult:
-        """Проверка sliding window counter"""
-        counter = entry.sliding_counter
-        now = datetime.now()
-        window_ms = counter.window_size_ms
-        
-        # Check if we need new window
-        elapsed = (now - counter.current_window_start).total_seconds() * 1000
-        if elapsed >= window_ms:
-            counter.previous_count = counter.current_count
-            counter.current_count = 0
-            counter.current_window_start = now
-            elapsed = 0
-            
-        # Calculate weighted count
-        weight = 1 - (elapsed / window_ms)
-        weighted_count = counter.previous_count * weight + counter.current_count
-        
-        result = RateLimitResult(
-            result_id=f"res_{uuid.uuid4().hex[:8]}",
-            identifier=entry.identifier,
-            remaining=max(0, int(config.requests_per_minute - weighted_count)),
-            reset_at=counter.current_window_start + timedelta(milliseconds=window_ms)
-        )
-        
-        if weighted_count < config.requests_per_minute:
-            counter.current_count += 1
-            result.response = RateLimitResponse.ALLOWED
-        else:
-            result.response = RateLimitResponse.DENIED
-            result.retry_after_ms = int(window_ms - elapsed)
-            
-        result.current_rate = weighted_count / (window_ms / 1000)
-        
-        return result
-        
-    def _check_fixed_window_counter(self, entry: RateLimitEntry, config: RateLimitConfig) -> RateLimitResult:
-        """Проверка fixed window counter"""
-        counter = entry.fixed_counter
-        now = datetime.now()
-        
-        # Check if window expired
-        elapsed = (now - counter.window_start).total_seconds() * 1000
-        if elapsed >= counter.window_size_ms:
-            counter.window_start = now
-            counter.count = 0
-            elapsed = 0
+    def allow(self, limiter_name: str, identifier: str = "global") -> bool:
+        """Быстрая проверка без построения результата"""
+        state = self.states.get(limiter_name)
+        if not state:
+            return True
+        return not state.check(identifier, time.monotonic_ns())
+        
+    def check_many(self, limiter_name: str, identifiers: Iterable[str]) -> List[RateLimitResponse]:
+        """Пакетная проверка (одно чтение часов на пакет)"""
+        state = self.states.get(limiter_name)
+        if not state:
+            return [RateLimitResponse.ALLOWED for _ in identifiers]
             
-        result = RateLimitResult(
-            result_id=f"res_{uuid.uuid4().hex[:8]}",
-            identifier=entry.identifier,
-            remaining=max(0, config.requests_per_minute - counter.count),
-            reset_at=counter.window_start + timedelta(milliseconds=counter.window_size_ms)
-        )
-        
-        if counter.count < config.requests_per_minute:
-            counter.count += 1
-            result.response = RateLimitResponse.ALLOWED
-        else:
-            result.response = RateLimitResponse.DENIED
-            result.retry_after_ms = int(counter.window_size_ms - elapsed)
-            
-        result.current_rate = counter.count / ((elapsed or 1) / 1000)
-        
-        return result
-        
-    def _check_leaky_bucket(self, entry: RateLimitEntry, config: RateLimitConfig) -> RateLimitResult:
-        """Проверка leaky bucket"""
-        bucket = entry.leaky_bucket
-        now = datetime.now()
-        
-        # Leak requests
-        elapsed = (now - bucket.last_leak).total_seconds()
-        leak_count = int(elapsed * bucket.leak_rate)
-        for _ in range(min(leak_count, len(bucket.queue))):
-            bucket.queue.popleft()
-        bucket.last_leak = now
-        
-        result = RateLimitResult(
-            result_id=f"res_{uuid.uuid4().hex[:8]}",
-            identifier=entry.identifier,
-            remaining=max(0, bucket.capacity - len(bucket.queue))
-        )
-        
-        if len(bucket.queue) < bucket.capacity:
-            bucket.queue.append(now)
-            result.response = RateLimitResponse.ALLOWED
-        else:
-            result.response = RateLimitResponse.DENIED
-            result.retry_after_ms = int(1000 / bucket.leak_rate)
-            
-        result.current_rate = len(bucket.queue) * bucket.leak_rate / bucket.capacity if bucket.capacity > 0 else 0
-        
-        return result
+        now = time.monotonic_ns()
+        check = state.check
+        allowed, denied = RateLimitResponse.ALLOWED, RateLimitResponse.DENIED
+        return [denied if check(identifier, now) else allowed for identifier in identifiers]
         
     def check_rate_limit(self, limiter_name: str, identifier: str = "global") -> RateLimitResult:
         """Проверка rate limit"""
-        config = self.configs.get(limiter_name)
-        if not config:
+        state = self.states.get(limiter_name)
+        if not state:
             return RateLimitResult(
-                result_id=f"res_{uuid.uuid4().hex[:8]}",
+                result_id=f"res_{next(self._result_seq):x}",
                 identifier=identifier,
                 response=RateLimitResponse.ALLOWED
             )
             
-        entry = self._get_or_create_entry(limiter_name, identifier)
-        entry.total_requests += 1
-        entry.last_request = datetime.now()
-        
-        # Check based on algorithm
-        if config.algorithm == RateLimitAlgorithm.TOKEN_BUCKET:
-            result = self._check_token_bucket(entry, config)
-        elif config.algorithm == RateLimitAlgorithm.SLIDING_WINDOW_LOG:
-            result = self._check_sliding_window_log(entry, config)
-        elif config.algorithm == RateLimitAlgorithm.SLIDING_WINDOW_COUNTER:
-            result = self._check_sliding_window_counter(entry, config)
-        elif config.algorithm == RateLimitAlgorithm.FIXED_WINDOW_COUNTER:
-            result = self._check_fixed_window_counter(entry, config)
-        elif config.algorithm == RateLimitAlgorithm.LEAKY_BUCKET:
-            result = self._check_leaky_bucket(entry, config)
-        else:
-            result = RateLimitResult(
-                result_id=f"res_{uuid.uuid4().hex[:8]}",
-                identifier=identifier,
-                response=RateLimitResponse.ALLOWED
-            )
-            
-        # Update stats
-        if result.response == RateLimitResponse.ALLOWED:
-            entry.allowed_requests += 1
-        else:
-            entry.denied_requests += 1
-            
-        # Update metrics
-        metrics = self.metrics.get(limiter_name)
-        if metrics:
-            metrics.total_requests += 1
-            if result.response == RateLimitResponse.ALLOWED:
-                metrics.total_allowed += 1
-            else:
-                metrics.total_denied += 1
-            metrics.unique_identifiers = len(self.entries.get(limiter_name, {}))
-            
-        return result
+        now = time.monotonic_ns()
+        retry_after = state.check(identifier, now)
+        reset_after = state.reset_after_ns(identifier, now)
+        
+        return RateLimitResult(
+            result_id=f"res_{next(self._result_seq):x}",
+            identifier=identifier,
+            response=RateLimitResponse.DENIED if retry_after else RateLimitResponse.ALLOWED,
+            remaining=state.remaining,
+            reset_at=datetime.now() + timedelta(microseconds=reset_after // 1000) if reset_after else None,
+            retry_after_ms=-(-retry_after // NS_PER_MS),
+            current_rate=state.current_rate(identifier, now)
+        )
         
     def get_remaining(self, limiter_name: str, identifier: str = "global") -> int:
         """Получение оставшегося лимита"""
-        entry = self.entries.get(limiter_name, {}).get(identifier)
-        if not entry:
-            config = self.configs.get(limiter_name)
-            return config.burst_capacity if config else 0
+        state = self.states.get(limiter_name)
+        if not state:
+            return 0
+        return state.peek_remaining(identifier, time.monotonic_ns())
+        
+    def get_entries(self, limiter_name: str, limit: int = 0) -> List[RateLimitEntry]:
+        """Снимки состояния идентификаторов (от давно простаивающих к активным)"""
+        state = self.states.get(limiter_name)
+        if not state:
+            return []
             
-        if entry.token_bucket:
-            return int(entry.token_bucket.tokens)
-        elif entry.sliding_log:
-            config = self.configs.get(limiter_name)
-            return max(0, config.requests_per_minute - len(entry.sliding_log.requests)) if config else 0
-        elif entry.sliding_counter:
-            config = self.configs.get(limiter_name)
-            return max(0, config.requests_per_minute - entry.sliding_counter.current_count) if config else 0
-        elif entry.fixed_counter:
-            config = self.configs.get(limiter_name)
-            return max(0, config.requests_per_minute - entry.fixed_counter.count) if config else 0
-        elif entry.leaky_bucket:
-            return entry.leaky_bucket.capacity - len(entry.leaky_bucket.queue)
+        now = time.monotonic_ns()
+        entries = []
+        for identifier, slot in state.slots.items():
+            allowed, denied = state.allowed[slot], state.denied[slot]
+            entries.append(RateLimitEntry(
+                entry_id=f"ent_{slot}",
+                identifier=identifier,
+                remaining=state.peek_remaining(identifier, now),
+                total_requests=allowed + denied,
+                allowed_requests=allowed,
+                denied_requests=denied,
+                idle_ms=(now - state.last_seen[slot]) // NS_PER_MS
+            ))
+            if limit and len(entries) >= limit:
+                break
+        return entries
+        
+    def evict_idle(self, limiter_name: str = None) -> int:
+        """Принудительное удаление простаивающих идентификаторов"""
+        now = time.monotonic_ns()
+        names = [limiter_name] if limiter_name else list(self.states)
+        return sum(self.states[name].evict_idle(now) for name in names if name in self.states)
+        
+    def get_metrics(self, limiter_name: str) -> Optional[RateLimitMetrics]:
+        """Метрики лимитера (счётчики переносятся из состояния)"""
+        metrics = self.metrics.get(limiter_name)
+        state = self.states.get(limiter_name)
+        if not metrics or not state:
+            return metrics
             
-        return 0
+        metrics.total_requests = state.total_requests
+        metrics.total_denied = state.total_denied
+        metrics.total_allowed = state.total_requests - state.total_denied
+        metrics.unique_identifiers = len(state.slots)
+        metrics.idle_evictions = state.idle_evictions
+        metrics.pressure_evictions = state.pressure_evictions
+        metrics.memory_bytes = state.memory_bytes()
+        return metrics
         
     def reset(self, limiter_name: str, identifier: str = None):
         """Сброс лимита"""
+        state = self.states.get(limiter_name)
+        if not state:
+            return
         if identifier:
-            if limiter_name in self.entries and identifier in self.entries[limiter_name]:
-                del self.entries[limiter_name][identifier]
+            state.remove(identifier)
         else:
-            self.entries[limiter_name] = {}
+            state.clear()
             
     def get_statistics(self) -> Dict[str, Any]:
         """Общая статистика"""
         total_requests = 0
         total_allowed = 0
         total_denied = 0
+        identifiers = 0
+        memory_bytes = 0
         
-        for metrics in self.metrics.values():
+        for name in self.metrics:
+            metrics = self.get_metrics(name)
             total_requests += metrics.total_requests
             total_allowed += metrics.total_allowed
             total_denied += metrics.total_denied
+            identifiers += metrics.unique_identifiers
+            memory_bytes += metrics.memory_bytes
             
         return {
             "limiters_total": len(self.configs),
             "total_requests": total_requests,
             "total_allowed": total_allowed,
             "total_denied": total_denied,
-            "denial_rate": (total_denied / max(1, total_requests)) * 100
+            "denial_rate": (total_denied / max(1, total_requests)) * 100,
+            "identifiers_tracked": identifiers,
+            "memory_bytes": memory_bytes
         }
 
 
+def benchmark_rate_limiter(checks: int = 500_000, identifiers: int = 10_000) -> Dict[str, Any]:
+    """Микро-бенчмарк: стоимость одной проверки в наносекундах"""
+    manager = RateLimiterManager()
+    keys = [f"10.0.{i // 256}.{i % 256}" for i in range(identifiers)]
+    stream = [keys[i % identifiers] for i in range(checks)]
+    results: Dict[str, Any] = {"checks": checks, "identifiers": identifiers}
+    
+    for algorithm in RateLimitAlgorithm:
+        name = f"bench-{algorithm.value}"
+        manager.create_config(name, algorithm, requests_per_second=1000, burst_capacity=1000)
+        
+        allow = manager.allow
+        started = time.perf_counter_ns()
+        for identifier in stream:
+            allow(name, identifier)
+        allow_ns = (time.perf_counter_ns() - started) / checks
+        
+        started = time.perf_counter_ns()
+        for offset in range(0, checks, 1000):
+            manager.check_many(name, stream[offset:offset + 1000])
+        batch_ns = (time.perf_counter_ns() - started) / checks
+        
+        started = time.perf_counter_ns()
+        for identifier in stream[:checks // 10]:
+            manager.check_rate_limit(name, identifier)
+        result_ns = (time.perf_counter_ns() - started) / (checks // 10)
+        
+        results[algorithm.value] = {
+            "allow_ns": round(allow_ns),
+            "check_many_ns": round(batch_ns),
+            "check_rate_limit_ns": round(result_ns),
+        }
+        
+    # Idle eviction under a bounded identifier budget
+    manager.create_config("bench-eviction", requests_per_second=1000, burst_capacity=1,
+                          idle_ttl_ms=1, max_identifiers=identifiers)
+    started = time.perf_counter_ns()
+    for i in range(checks):
+        manager.allow("bench-eviction", f"ip_{i}")
+    eviction_ns = (time.perf_counter_ns() - started) / checks
+    metrics = manager.get_metrics("bench-eviction")
+    results["eviction"] = {
+        "allow_ns": round(eviction_ns),
+        "identifiers_tracked": metrics.unique_identifiers,
+        "idle_evictions": metrics.idle_evictions,
+        "pressure_evictions": metrics.pressure_evictions,
+        "memory_bytes": metrics.memory_bytes,
+    }
+    
+    return results
+
+
 # Демонстрация
 async def main():
     print("=" * 60)
@@ -585,7 +710,8 @@ async def main():
     print("  │ Limiter             │ Total    │ Allowed  │ Denied   │ Deny(%)  │ Entries  │")
     print("  ├─────────────────────┼──────────┼──────────┼──────────┼──────────┼──────────┤")
     
-    for name, metrics in manager.metrics.items():
+    for name in manager.metrics:
+        metrics = manager.get_metrics(name)
         limiter_name = name[:19].ljust(19)
         total = str(metrics.total_requests)[:8].ljust(8)
         allowed = str(metrics.total_allowed)[:8].ljust(8)
@@ -600,12 +726,12 @@ async def main():
     # Per-identifier stats
     print("\n📊 Per-Identifier Statistics:")
     
-    for limiter_name, entries in manager.entries.items():
+    for limiter_name in manager.states:
+        entries = manager.get_entries(limiter_name, limit=5)
         if entries:
             print(f"\n  {limiter_name}:")
-            for identifier, entry in list(entries.items())[:5]:
-                remaining = manager.get_remaining(limiter_name, identifier)
-                print(f"    {identifier}: {entry.allowed_requests} allowed, {entry.denied_requests} denied, {remaining} remaining")
+            for entry in entries:
+                print(f"    {entry.identifier}: {entry.allowed_requests} allowed, {entry.denied_requests} denied, {entry.remaining} remaining")
                 
     # Algorithm comparison
     print("\n📊 Algorithm Comparison:")
@@ -635,6 +761,7 @@ async def main():
     print(f"  Total Allowed: {stats['total_allowed']}")
     print(f"  Total Denied: {stats['total_denied']}")
     print(f"  Denial Rate: {stats['denial_rate']:.1f}%")
+    print(f"  Identifiers Tracked: {stats['identifiers_tracked']} ({stats['memory_bytes']} bytes)")
     
     # Dashboard
     print("\n┌────────────────────────────────────────────────────────────────────┐")
@@ -654,4 +781,7 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if '--benchmark' in sys.argv:
+        print(json.dumps(benchmark_rate_limiter(), indent=2))
+    else:
+        asyncio.run(main())
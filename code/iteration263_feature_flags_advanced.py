@@ -15,13 +15,18 @@ Server Init - Iteration 263: Feature Flags Advanced Platform
 """
 
 import asyncio
+import bisect
+import itertools
+import json
 import random
+import re
+import sys
+import time
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Set
+from typing import Dict, List, Optional, Any, Set, Callable, Iterable, Tuple
 from enum import Enum
 import uuid
-import hashlib
 
 
 class FlagType(Enum):
@@ -208,6 +213,74 @@ class AuditLogEntry:
     timestamp: datetime = field(default_factory=datetime.now)
 
 
+# Hashing (stable across processes; SDKs implement the same scheme)
+FNV64_OFFSET = 0xCBF29CE484222325
+FNV64_PRIME = 0x100000001B3
+MASK64 = 0xFFFFFFFFFFFFFFFF
+HASH_ALGORITHM = "fnv1a64+splitmix64"
+
+
+def fnv1a_64(text: str) -> int:
+    """FNV-1a 64-бит"""
+    h = FNV64_OFFSET
+    for byte in text.encode():
+        h = ((h ^ byte) * FNV64_PRIME) & MASK64
+    return h
+
+
+def bucket_of(user_hash: int, salt: int) -> int:
+    """Бакет 0..99 для пользователя и соли флага (финализатор splitmix64)"""
+    z = ((user_hash ^ salt) + 0x9E3779B97F4A7C15) & MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return (z ^ (z >> 31)) % 100
+
+
+def _compile_predicate(operator: RuleOperator, expected: Any) -> Callable[[Any], bool]:
+    """Предикат правила таргетинга"""
+    if operator == RuleOperator.EQUALS:
+        return lambda value: value == expected
+    if operator == RuleOperator.NOT_EQUALS:
+        return lambda value: value != expected
+    if operator == RuleOperator.CONTAINS:
+        return lambda value: expected in str(value)
+    if operator == RuleOperator.STARTS_WITH:
+        prefix = str(expected)
+        return lambda value: str(value).startswith(prefix)
+    if operator == RuleOperator.ENDS_WITH:
+        suffix = str(expected)
+        return lambda value: str(value).endswith(suffix)
+    if operator in (RuleOperator.IN, RuleOperator.NOT_IN):
+        try:
+            members = frozenset(expected)
+        except TypeError:
+            members = list(expected)
+        if operator == RuleOperator.IN:
+            return lambda value: value in members
+        return lambda value: value not in members
+    if operator in (RuleOperator.GREATER_THAN, RuleOperator.LESS_THAN):
+        threshold = float(expected)
+        greater = operator == RuleOperator.GREATER_THAN
+        
+        def compare(value: Any) -> bool:
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                return False
+            return number > threshold if greater else number < threshold
+        return compare
+    if operator == RuleOperator.MATCHES_REGEX:
+        pattern = re.compile(expected)
+        return lambda value: pattern.search(str(value)) is not None
+    return lambda value: False
+
+
+# Evaluation outcome: (value, variant, reason, matched_rule_id)
+Outcome = Tuple[Any, Optional[str], str, Optional[str]]
+FLAG_NOT_FOUND: Outcome = (False, None, "flag_not_found", None)
+DEPENDENCY_CYCLE: Outcome = (False, None, "dependency_cycle", None)
+
+
 class FeatureFlagManager:
     """Менеджер флагов функций"""
     
@@ -216,6 +289,12 @@ class FeatureFlagManager:
         self.audit_log: List[AuditLogEntry] = []
         self.evaluation_cache: Dict[str, EvaluationResult] = {}
         
+        # Compiled evaluators (rebuilt lazily after a flag changes)
+        self.compiled: Dict[str, Callable] = {}
+        self.version = 0
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._result_ids = itertools.count(1)
+        
     def create_flag(self, key: str, name: str,
                    flag_type: FlagType = FlagType.BOOLEAN,
                    default_value: Any = False,
@@ -231,6 +310,7 @@ class FeatureFlagManager:
         )
         
         self.flags[key] = flag
+        self._touch(flag)
         
         self._log_audit(key, "created", None, {"state": "disabled", "default": default_value})
         
@@ -251,13 +331,20 @@ class FeatureFlagManager:
         
         self.audit_log.append(entry)
         
+    def _touch(self, flag: FeatureFlag):
+        """Отметка изменения флага: сброс скомпилированной версии и снапшота"""
+        flag.updated_at = datetime.now()
+        self.compiled.pop(flag.key, None)
+        self.version += 1
+        self._snapshot = None
+        
     def enable_flag(self, key: str, changed_by: str = "system"):
         """Включение флага"""
         flag = self.flags.get(key)
         if flag:
             old_state = flag.state
             flag.state = FlagState.ENABLED
-            flag.updated_at = datetime.now()
+            self._touch(flag)
             self._log_audit(key, "enabled", old_state.value, FlagState.ENABLED.value, changed_by)
             
     def disable_flag(self, key: str, changed_by: str = "system"):
@@ -266,7 +353,7 @@ class FeatureFlagManager:
         if flag:
             old_state = flag.state
             flag.state = FlagState.DISABLED
-            flag.updated_at = datetime.now()
+            self._touch(flag)
             self._log_audit(key, "disabled", old_state.value, FlagState.DISABLED.value, changed_by)
             
     def add_targeting_rule(self, flag_key: str, name: str,
@@ -290,7 +377,7 @@ class FeatureFlagManager:
         
         flag.targeting_rules.append(rule)
         flag.targeting_rules.sort(key=lambda r: r.priority)
-        flag.updated_at = datetime.now()
+        self._touch(flag)
         
         self._log_audit(flag_key, "rule_added", None, {"rule": name})
         
@@ -311,7 +398,7 @@ class FeatureFlagManager:
         )
         
         flag.variants.append(variant)
-        flag.updated_at = datetime.now()
+        self._touch(flag)
         
         return variant
         
@@ -322,9 +409,40 @@ class FeatureFlagManager:
             old_pct = flag.rollout_percentage
             flag.rollout_percentage = max(0, min(100, percentage))
             flag.rollout_strategy = RolloutStrategy.PERCENTAGE
-            flag.updated_at = datetime.now()
+            self._touch(flag)
             self._log_audit(flag_key, "rollout_changed", old_pct, percentage)
             
+    def set_rollout_targets(self, flag_key: str,
+                           user_ids: Optional[Iterable[str]] = None,
+                           groups: Optional[Iterable[str]] = None):
+        """Раскатывание на список пользователей или групп"""
+        flag = self.flags.get(flag_key)
+        if flag:
+            if user_ids is not None:
+                flag.rollout_user_ids = set(user_ids)
+                flag.rollout_strategy = RolloutStrategy.USER_IDS
+            if groups is not None:
+                flag.rollout_groups = set(groups)
+                flag.rollout_strategy = RolloutStrategy.GROUPS
+            self._touch(flag)
+            self._log_audit(flag_key, "rollout_targets_changed", None,
+                            {"user_ids": len(flag.rollout_user_ids), "groups": sorted(flag.rollout_groups)})
+            
+    def set_dependencies(self, flag_key: str, depends_on: List[str]):
+        """Установка флагов-предпосылок"""
+        flag = self.flags.get(flag_key)
+        if flag:
+            old_deps = list(flag.depends_on)
+            flag.depends_on = list(depends_on)
+            self._touch(flag)
+            self._log_audit(flag_key, "dependencies_changed", old_deps, list(depends_on))
+            
+    def invalidate_flag(self, flag_key: str):
+        """Перекомпиляция после прямого изменения полей флага"""
+        flag = self.flags.get(flag_key)
+        if flag:
+            self._touch(flag)
+            
     def add_schedule(self, flag_key: str,
                     start_at: datetime = None,
                     end_at: datetime = None) -> Optional[Schedule]:
@@ -341,183 +459,219 @@ class FeatureFlagManager:
         
         flag.schedules.append(schedule)
         flag.state = FlagState.SCHEDULED
-        flag.updated_at = datetime.now()
+        self._touch(flag)
         
         return schedule
         
-    def _check_schedule(self, flag: FeatureFlag) -> bool:
-        """Проверка расписания"""
-        now = datetime.now()
+    def _compile_flag(self, flag: FeatureFlag) -> Callable:
+        """Компиляция флага в замыкание run(context, user_hash, now, memo) -> Outcome"""
+        default = flag.default_value
         
-        for schedule in flag.schedules:
-            if schedule.start_at and now < schedule.start_at:
-                continue
-            if schedule.end_at and now > schedule.end_at:
-                continue
-            return schedule.enabled_value
+        if flag.state in (FlagState.DISABLED, FlagState.ARCHIVED):
+            disabled = flag.state == FlagState.DISABLED
+            outcome = (default, None, "flag_disabled" if disabled else "flag_archived", None)
             
-        return False
-        
-    def _check_targeting_rules(self, flag: FeatureFlag,
-                              context: EvaluationContext) -> Optional[TargetingRule]:
-        """Проверка правил таргетинга"""
-        for rule in flag.targeting_rules:
-            attr_value = context.attributes.get(rule.attribute)
-            
-            if attr_value is None:
-                continue
-                
-            matched = False
+            def run_off(context, user_hash, now, memo) -> Outcome:
+                flag.evaluations += 1
+                if disabled:
+                    flag.disabled_count += 1
+                return outcome
+            return run_off
             
-            if rule.operator == RuleOperator.EQUALS:
-                matched = attr_value == rule.value
-            elif rule.operator == RuleOperator.NOT_EQUALS:
-                matched = attr_value != rule.value
-            elif rule.operator == RuleOperator.CONTAINS:
-                matched = rule.value in str(attr_value)
-            elif rule.operator == RuleOperator.STARTS_WITH:
-                matched = str(attr_value).startswith(str(rule.value))
-            elif rule.operator == RuleOperator.IN:
-                matched = attr_value in rule.value
-            elif rule.operator == RuleOperator.GREATER_THAN:
-                matched = float(attr_value) > float(rule.value)
-            elif rule.operator == RuleOperator.LESS_THAN:
-                matched = float(attr_value) < float(rule.value)
-                
-            if matched:
-                return rule
-                
-        return None
+        evaluate_compiled = self._evaluate_compiled
+        depends_on = tuple(flag.depends_on)
+        windows = tuple(
+            (s.start_at, s.end_at, s.enabled_value) for s in flag.schedules
+        ) if flag.state == FlagState.SCHEDULED else None
+        rules = tuple(
+            (rule.attribute, _compile_predicate(rule.operator, rule.value),
+             rule.enabled, rule.rule_id, f"rule_matched:{rule.name}")
+            for rule in flag.targeting_rules
+        )
         
-    def _check_rollout(self, flag: FeatureFlag, context: EvaluationContext) -> bool:
-        """Проверка раскатывания"""
-        if flag.rollout_strategy == RolloutStrategy.ALL:
-            return True
+        strategy = flag.rollout_strategy
+        percentage = flag.rollout_percentage
+        rollout_salt = fnv1a_64(flag.key)
+        user_ids = frozenset(flag.rollout_user_ids)
+        groups = frozenset(flag.rollout_groups)
+        
+        variant_salt = fnv1a_64(f"{flag.key}:variant")
+        cumulative = list(itertools.accumulate(v.weight for v in flag.variants))
+        variants = [(v.value, v.name, f"variant_selected:{v.name}") for v in flag.variants]
+        enabled_outcome = (True if flag.flag_type == FlagType.BOOLEAN else default,
+                           None, "flag_enabled", None)
+        
+        def run(context: EvaluationContext, user_hash: Optional[int],
+                now: datetime, memo: Dict[str, Outcome]) -> Outcome:
+            flag.evaluations += 1
             
-        if flag.rollout_strategy == RolloutStrategy.USER_IDS:
-            return context.user_id in flag.rollout_user_ids
+            # Dependencies (memoized within the pass)
+            for dep_key in depends_on:
+                if not evaluate_compiled(dep_key, context, user_hash, now, memo)[0]:
+                    return (default, None, "dependency_not_met", None)
+                    
+            # Schedule
+            if windows is not None:
+                active = False
+                for start_at, end_at, enabled_value in windows:
+                    if start_at and now < start_at:
+                        continue
+                    if end_at and now > end_at:
+                        continue
+                    active = enabled_value
+                    break
+                if not active:
+                    return (default, None, "outside_schedule", None)
+                    
+            # Targeting rules
+            if rules:
+                attributes = context.attributes
+                for attribute, predicate, enabled, rule_id, reason in rules:
+                    value = attributes.get(attribute)
+                    if value is not None and predicate(value):
+                        if enabled:
+                            flag.enabled_count += 1
+                        else:
+                            flag.disabled_count += 1
+                        return (enabled, None, reason, rule_id)
+                        
+            # Rollout
+            if strategy != RolloutStrategy.ALL:
+                if strategy == RolloutStrategy.PERCENTAGE:
+                    if user_hash is not None:
+                        included = bucket_of(user_hash, rollout_salt) < percentage
+                    else:
+                        included = random.randint(0, 99) < percentage
+                elif strategy == RolloutStrategy.USER_IDS:
+                    included = context.user_id in user_ids
+                elif strategy == RolloutStrategy.GROUPS:
+                    included = any(g in groups for g in context.groups)
+                else:
+                    included = False
+                if not included:
+                    flag.disabled_count += 1
+                    return (default, None, "rollout_excluded", None)
+                    
+            flag.enabled_count += 1
             
-        if flag.rollout_strategy == RolloutStrategy.GROUPS:
-            return any(g in flag.rollout_groups for g in context.groups)
-            
-        if flag.rollout_strategy == RolloutStrategy.PERCENTAGE:
-            if context.user_id:
-                # Consistent hash for user
-                hash_input = f"{flag.key}:{context.user_id}"
-                hash_value = int(hashlib.md5(hash_input.encode()).hexdigest(), 16)
-                bucket = hash_value % 100
-                return bucket < flag.rollout_percentage
-            return random.randint(0, 99) < flag.rollout_percentage
+            # Variant
+            if variants:
+                bucket = (bucket_of(user_hash, variant_salt) if user_hash is not None
+                          else random.randint(0, 99))
+                index = bisect.bisect_right(cumulative, bucket)
+                value, name, reason = variants[min(index, len(variants) - 1)]
+                return (value, name, reason, None)
+                
+            return enabled_outcome
             
-        return False
-        
-    def _select_variant(self, flag: FeatureFlag, context: EvaluationContext) -> Optional[Variant]:
-        """Выбор варианта"""
-        if not flag.variants:
-            return None
+        return run
+        
+    def _evaluate_compiled(self, flag_key: str, context: EvaluationContext,
+                           user_hash: Optional[int], now: datetime,
+                           memo: Dict[str, Outcome]) -> Outcome:
+        """Оценка флага с мемоизацией в рамках одного прохода"""
+        outcome = memo.get(flag_key)
+        if outcome is not None:
+            return outcome
             
-        if context.user_id:
-            # Consistent variant selection
-            hash_input = f"{flag.key}:variant:{context.user_id}"
-            hash_value = int(hashlib.md5(hash_input.encode()).hexdigest(), 16)
-            bucket = hash_value % 100
-        else:
-            bucket = random.randint(0, 99)
+        run = self.compiled.get(flag_key)
+        if run is None:
+            flag = self.flags.get(flag_key)
+            if flag is None:
+                memo[flag_key] = FLAG_NOT_FOUND
+                return FLAG_NOT_FOUND
+            run = self.compiled[flag_key] = self._compile_flag(flag)
             
-        cumulative = 0
-        for variant in flag.variants:
-            cumulative += variant.weight
-            if bucket < cumulative:
-                return variant
-                
-        return flag.variants[-1] if flag.variants else None
-        
-    def _check_dependencies(self, flag: FeatureFlag, context: EvaluationContext) -> bool:
-        """Проверка зависимостей"""
-        for dep_key in flag.depends_on:
-            dep_result = self.evaluate(dep_key, context)
-            if not dep_result.value:
-                return False
-        return True
+        memo[flag_key] = DEPENDENCY_CYCLE
+        outcome = memo[flag_key] = run(context, user_hash, now, memo)
+        return outcome
         
     def evaluate(self, flag_key: str, context: EvaluationContext = None) -> EvaluationResult:
         """Оценка флага"""
         context = context or EvaluationContext()
+        user_hash = fnv1a_64(context.user_id) if context.user_id else None
         
-        result = EvaluationResult(
-            result_id=f"eval_{uuid.uuid4().hex[:8]}",
-            flag_key=flag_key
+        value, variant, reason, rule_id = self._evaluate_compiled(
+            flag_key, context, user_hash, datetime.now(), {}
         )
         
-        flag = self.flags.get(flag_key)
-        if not flag:
-            result.value = False
-            result.reason = "flag_not_found"
-            return result
-            
-        # Update stats
-        flag.evaluations += 1
-        
-        # Check state
-        if flag.state == FlagState.DISABLED:
-            result.value = flag.default_value
-            result.reason = "flag_disabled"
-            flag.disabled_count += 1
-            return result
-            
-        if flag.state == FlagState.ARCHIVED:
-            result.value = flag.default_value
-            result.reason = "flag_archived"
-            return result
-            
-        # Check dependencies
-        if flag.depends_on and not self._check_dependencies(flag, context):
-            result.value = flag.default_value
-            result.reason = "dependency_not_met"
-            return result
-            
-        # Check schedule
-        if flag.state == FlagState.SCHEDULED:
-            if not self._check_schedule(flag):
-                result.value = flag.default_value
-                result.reason = "outside_schedule"
-                return result
-                
-        # Check targeting rules
-        matched_rule = self._check_targeting_rules(flag, context)
-        if matched_rule:
-            result.value = matched_rule.enabled
-            result.matched_rule_id = matched_rule.rule_id
-            result.reason = f"rule_matched:{matched_rule.name}"
-            if matched_rule.enabled:
-                flag.enabled_count += 1
-            else:
-                flag.disabled_count += 1
-            return result
+        return EvaluationResult(
+            result_id=f"eval_{next(self._result_ids)}",
+            flag_key=flag_key,
+            value=value,
+            variant=variant,
+            reason=reason,
+            matched_rule_id=rule_id
+        )
+        
+    def evaluate_all(self, context: EvaluationContext = None) -> Dict[str, Any]:
+        """Оценка всех флагов для пользователя за один проход"""
+        context = context or EvaluationContext()
+        user_hash = fnv1a_64(context.user_id) if context.user_id else None
+        now = datetime.now()
+        memo: Dict[str, Outcome] = {}
+        
+        evaluate_compiled = self._evaluate_compiled
+        return {
+            key: evaluate_compiled(key, context, user_hash, now, memo)[0]
+            for key in self.flags
+        }
+        
+    def get_snapshot(self) -> Dict[str, Any]:
+        """Снапшот конфигурации для локальной оценки на стороне SDK"""
+        if self._snapshot is not None:
+            return self._snapshot
             
-        # Check rollout
-        if not self._check_rollout(flag, context):
-            result.value = flag.default_value
-            result.reason = "rollout_excluded"
-            flag.disabled_count += 1
-            return result
+        def encode(value: Any) -> Any:
+            if isinstance(value, (set, frozenset)):
+                return sorted(value, key=str)
+            if isinstance(value, datetime):
+                return value.timestamp()
+            return value
             
-        # Select variant if multivariate
-        if flag.variants:
-            variant = self._select_variant(flag, context)
-            if variant:
-                result.value = variant.value
-                result.variant = variant.name
-                result.reason = f"variant_selected:{variant.name}"
-            else:
-                result.value = flag.default_value
-                result.reason = "default_value"
-        else:
-            result.value = True if flag.flag_type == FlagType.BOOLEAN else flag.default_value
-            result.reason = "flag_enabled"
+        flags = {}
+        for flag in self.flags.values():
+            flags[flag.key] = {
+                "type": flag.flag_type.value,
+                "state": flag.state.value,
+                "default": flag.default_value,
+                "depends_on": list(flag.depends_on),
+                "schedules": [
+                    [encode(s.start_at), encode(s.end_at), s.enabled_value]
+                    for s in flag.schedules
+                ],
+                "rules": [
+                    {
+                        "id": rule.rule_id,
+                        "name": rule.name,
+                        "attribute": rule.attribute,
+                        "operator": rule.operator.value,
+                        "value": encode(rule.value),
+                        "enabled": rule.enabled
+                    }
+                    for rule in flag.targeting_rules
+                ],
+                "rollout": {
+                    "strategy": flag.rollout_strategy.value,
+                    "percentage": flag.rollout_percentage,
+                    "user_ids": encode(flag.rollout_user_ids),
+                    "groups": encode(flag.rollout_groups),
+                    "salt": fnv1a_64(flag.key)
+                },
+                "variants": [
+                    {"name": v.name, "value": v.value, "weight": v.weight}
+                    for v in flag.variants
+                ],
+                "variant_salt": fnv1a_64(f"{flag.key}:variant")
+            }
             
-        flag.enabled_count += 1
-        return result
+        self._snapshot = {
+            "version": self.version,
+            "generated_at": datetime.now().timestamp(),
+            "hash_algorithm": HASH_ALGORITHM,
+            "flags": flags
+        }
+        return self._snapshot
         
     def get_statistics(self) -> Dict[str, Any]:
         """Статистика флагов"""
@@ -539,6 +693,68 @@ class FeatureFlagManager:
         }
 
 
+def benchmark_feature_flags(flag_count: int = 200, users: int = 2000) -> Dict[str, Any]:
+    """Бенчмарк: флагов в секунду для evaluate() и evaluate_all()"""
+    manager = FeatureFlagManager()
+    rng = random.Random(42)
+    
+    for i in range(flag_count):
+        kind = i % 5
+        flag = manager.create_flag(f"flag_{i}", f"Flag {i}",
+                                   FlagType.STRING if kind == 3 else FlagType.BOOLEAN,
+                                   "control" if kind == 3 else False)
+        if i % 10 != 9:
+            manager.enable_flag(flag.key)
+        if kind == 1:
+            manager.set_rollout_percentage(flag.key, rng.randint(5, 95))
+        elif kind == 2:
+            manager.add_targeting_rule(flag.key, "plan", "plan", RuleOperator.IN, ["pro", "enterprise"])
+            manager.add_targeting_rule(flag.key, "staff", "email", RuleOperator.ENDS_WITH, "@company.com",
+                                       priority=1)
+            manager.add_targeting_rule(flag.key, "age", "age", RuleOperator.GREATER_THAN, 30, priority=2)
+        elif kind == 3:
+            manager.add_variant(flag.key, "control", "control", 50)
+            manager.add_variant(flag.key, "treatment", "treatment", 50)
+        elif kind == 4 and i >= 5:
+            manager.set_dependencies(flag.key, [f"flag_{i - 3}", f"flag_{i - 4}"])
+            
+    contexts = [
+        EvaluationContext(
+            user_id=f"user_{n}",
+            attributes={"plan": rng.choice(["free", "pro", "enterprise"]),
+                        "email": f"u{n}@{rng.choice(['mail.com', 'company.com'])}",
+                        "age": rng.randint(18, 70)}
+        )
+        for n in range(users)
+    ]
+    keys = list(manager.flags)
+    
+    sample = contexts[:max(1, users // 10)]
+    started = time.perf_counter()
+    for context in sample:
+        for key in keys:
+            manager.evaluate(key, context)
+    single_elapsed = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    for context in contexts:
+        manager.evaluate_all(context)
+    bulk_elapsed = time.perf_counter() - started
+    
+    single_rate = len(sample) * len(keys) / single_elapsed
+    bulk_rate = users * len(keys) / bulk_elapsed
+    
+    return {
+        "flags": flag_count,
+        "users": users,
+        "evaluate_flags_per_sec": round(single_rate),
+        "evaluate_all_flags_per_sec": round(bulk_rate),
+        "evaluate_all_us_per_user": round(bulk_elapsed / users * 1e6, 1),
+        "speedup": round(bulk_rate / single_rate, 2),
+        "snapshot_bytes": len(json.dumps(manager.get_snapshot()))
+    }
+
+
 # Демонстрация
 async def main():
     print("=" * 60)
@@ -671,6 +887,17 @@ async def main():
             result = manager.evaluate(flag_key, ctx)
             print(f"    {flag_key}: {result.value} ({result.reason})")
             
+    # Bulk evaluation
+    print("\n⚡ Bulk Evaluation (evaluate_all)...")
+    
+    for ctx in contexts[:2]:
+        values = manager.evaluate_all(ctx)
+        print(f"  {ctx.user_id}: {values}")
+        
+    snapshot = manager.get_snapshot()
+    print(f"  Snapshot v{snapshot['version']}: {len(snapshot['flags'])} flags, "
+          f"{len(json.dumps(snapshot))} bytes ({snapshot['hash_algorithm']})")
+            
     # Targeting rules
     print("\n🎯 Targeting Rules:")
     
@@ -732,4 +959,7 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if '--benchmark' in sys.argv:
+        print(json.dumps(benchmark_feature_flags(), indent=2))
+    else:
+        asyncio.run(main())
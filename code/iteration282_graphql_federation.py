@@ -15,15 +15,29 @@ Server Init - Iteration 282: GraphQL Federation Platform
 """
 
 import asyncio
+import hashlib
+import json
 import random
+import sys
 import time
+from collections import OrderedDict, deque
 from datetime import datetime
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Set
+from typing import Dict, List, Optional, Any, Tuple, Callable
 from enum import Enum
 import uuid
 
 
+# Query planning
+PLAN_CACHE_SIZE = 1024
+
+# Subgraph transport (simulated)
+SUBGRAPH_MAX_CONNECTIONS = 32
+SIMULATED_CONNECT_MS = 3.0
+SIMULATED_LATENCY_MS = (5.0, 50.0)
+SIMULATED_ERROR_RATE = 0.02
+
+
 class ServiceStatus(Enum):
     """Статус сервиса"""
     HEALTHY = "healthy"
@@ -154,6 +168,10 @@ class QueryPlan:
     # Dependencies
     parallel_fetches: List[List[int]] = field(default_factory=list)
     
+    # Cache
+    cache_key: str = ""
+    supergraph_version: int = 0
+    
     # Timing
     created_at: datetime = field(default_factory=datetime.now)
     estimated_ms: float = 0
@@ -219,6 +237,125 @@ class EntityReference:
     key_values: Dict[str, Any] = field(default_factory=dict)
 
 
+class SubgraphConnectionPool:
+    """Пул соединений к подграфу (keep-alive)"""
+    
+    def __init__(self, service_name: str, max_connections: int = SUBGRAPH_MAX_CONNECTIONS):
+        self.service_name = service_name
+        self.semaphore = asyncio.Semaphore(max_connections)
+        self.idle: deque = deque()
+        
+        # Stats
+        self.opened = 0
+        self.reused = 0
+        self.calls = 0
+        self.total_ms = 0.0
+        
+    async def acquire(self) -> Tuple[str, bool]:
+        """Соединение и признак повторного использования"""
+        await self.semaphore.acquire()
+        if self.idle:
+            self.reused += 1
+            return self.idle.pop(), True
+            
+        # New connection: TCP/TLS handshake
+        await asyncio.sleep(SIMULATED_CONNECT_MS / 1000)
+        self.opened += 1
+        return f"conn_{self.service_name}_{self.opened}", False
+        
+    def release(self, connection: str, healthy: bool = True):
+        if healthy:
+            self.idle.append(connection)
+        self.semaphore.release()
+
+
+class EntityBatchLoader:
+    """DataLoader: объединение _entities запросов по (подграф, тип) в пределах тика"""
+    
+    def __init__(self, batch_fn: Callable):
+        self.batch_fn = batch_fn
+        self.pending: Dict[Tuple[str, str], List[Tuple[List[Dict[str, Any]], asyncio.Future]]] = {}
+        self.background_tasks: set = set()
+        
+        # Stats
+        self.loads = 0
+        self.batches = 0
+        self.representations = 0
+        self.deduplicated = 0
+        
+    async def load_many(self, service_name: str, typename: str,
+                        representations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Постановка представлений в пакет"""
+        if not representations:
+            return []
+            
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (service_name, typename)
+        
+        if key not in self.pending:
+            self.pending[key] = []
+            loop.call_soon(self._dispatch, key)
+        self.pending[key].append((representations, future))
+        self.loads += 1
+        
+        return await future
+        
+    def _dispatch(self, key: Tuple[str, str]):
+        """Отправка накопленного пакета"""
+        callers = self.pending.pop(key, [])
+        if not callers:
+            return
+            
+        # Deduplicate representations across callers
+        unique: Dict[str, int] = {}
+        batch: List[Dict[str, Any]] = []
+        positions: List[List[int]] = []
+        for representations, _ in callers:
+            indexes = []
+            for representation in representations:
+                rep_key = json.dumps(representation, sort_keys=True, default=str)
+                if rep_key not in unique:
+                    unique[rep_key] = len(batch)
+                    batch.append(representation)
+                else:
+                    self.deduplicated += 1
+                indexes.append(unique[rep_key])
+            positions.append(indexes)
+            
+        self.batches += 1
+        self.representations += len(batch)
+        task = asyncio.ensure_future(self._run(key, batch, callers, positions))
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        
+    async def _run(self, key: Tuple[str, str], batch: List[Dict[str, Any]],
+                   callers: List[Tuple[List[Dict[str, Any]], asyncio.Future]],
+                   positions: List[List[int]]):
+        try:
+            entities = await self.batch_fn(key[0], key[1], batch)
+            if len(entities) != len(batch):
+                raise Exception(f"Entities count mismatch for {key[1]} in {key[0]}: "
+                                f"expected {len(batch)}, got {len(entities)}")
+            results = [[entities[i] for i in indexes] for indexes in positions]
+            for (_, future), result in zip(callers, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in callers:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            # Отменённый пакет не должен оставлять вызывающих ждать вечно
+            for _, future in callers:
+                if not future.done():
+                    future.cancel()
+
+    @property
+    def avg_batch_size(self) -> float:
+        return self.representations / self.batches if self.batches else 0.0
+
+
 class GraphQLFederationManager:
     """Менеджер GraphQL Federation"""
     
@@ -232,6 +369,16 @@ class GraphQLFederationManager:
         self.queries_success: int = 0
         self.queries_failed: int = 0
         
+        # Plan cache: "version:operation hash" -> plan
+        self.supergraph_version: int = 0
+        self.plan_cache: OrderedDict = OrderedDict()
+        self.plan_cache_hits: int = 0
+        self.plan_cache_misses: int = 0
+        
+        # Transport
+        self.connection_pools: Dict[str, SubgraphConnectionPool] = {}
+        self.entity_loader = EntityBatchLoader(self._resolve_entities_batch)
+        
     def register_service(self, name: str, url: str) -> SubgraphService:
         """Регистрация сервиса"""
         service = SubgraphService(
@@ -324,8 +471,43 @@ class GraphQLFederationManager:
             )
             self.supergraph_schema[type_name] = merged_type
             
+        # New supergraph: cached plans are stale
+        self.supergraph_version += 1
+        self.plan_cache.clear()
+        
         return self.supergraph_schema
         
+    def operation_hash(self, request: QueryRequest) -> str:
+        """Хэш нормализованной операции"""
+        normalized = {
+            "type": request.operation_type.value,
+            "name": request.operation_name,
+            "query": " ".join(request.query.split()),
+            "fields": {t: sorted(f) for t, f in sorted(request.requested_fields.items())}
+        }
+        return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+        
+    def get_query_plan(self, request: QueryRequest) -> Tuple[QueryPlan, bool]:
+        """План из кэша или новый"""
+        cache_key = f"{self.supergraph_version}:{self.operation_hash(request)}"
+        
+        plan = self.plan_cache.get(cache_key)
+        if plan is not None:
+            self.plan_cache.move_to_end(cache_key)
+            self.plan_cache_hits += 1
+            return plan, True
+            
+        self.plan_cache_misses += 1
+        plan = self.create_query_plan(request)
+        plan.cache_key = cache_key
+        plan.supergraph_version = self.supergraph_version
+        
+        self.plan_cache[cache_key] = plan
+        if len(self.plan_cache) > PLAN_CACHE_SIZE:
+            self.plan_cache.popitem(last=False)
+            
+        return plan, False
+        
     def create_query_plan(self, request: QueryRequest) -> QueryPlan:
         """Создание плана запроса"""
         plan = QueryPlan(
@@ -352,6 +534,12 @@ class GraphQLFederationManager:
                         service_fields[source_service] = []
                     service_fields[source_service].append(field_name)
                     
+            # Entity fetches need keys from the owner: owner goes first
+            owner = fed_type.owner_service
+            if owner and any(s != owner for s in service_fields):
+                owner_fields = service_fields.pop(owner, None) or list(fed_type.key_fields or ["id"])
+                service_fields = {owner: owner_fields, **service_fields}
+            
             # Create fetch nodes
             first_node_id = None
             
@@ -359,13 +547,13 @@ class GraphQLFederationManager:
                 node = FetchNode(
                     node_id=node_id,
                     service_name=service_name,
-                    fields=svc_fields
+                    fields=svc_fields,
+                    entity_type=type_name
                 )
                 
                 # Check dependencies
                 if service_name != fed_type.owner_service and fed_type.owner_service:
                     node.requires_entities = True
-                    node.entity_type = type_name
                     # Add dependency on owner service
                     owner_node = type_to_node.get(type_name)
                     if owner_node is not None:
@@ -385,97 +573,138 @@ class GraphQLFederationManager:
         return plan
         
     def _build_parallel_groups(self, nodes: List[FetchNode]) -> List[List[int]]:
-        """Построение групп параллельного выполнения"""
+        """Построение групп параллельного выполнения (уровни по Кану)"""
+        indegree = {node.node_id: 0 for node in nodes}
+        dependents: Dict[int, List[int]] = {node.node_id: [] for node in nodes}
+        for node in nodes:
+            for dep in node.depends_on:
+                if dep in dependents:
+                    dependents[dep].append(node.node_id)
+                    indegree[node.node_id] += 1
+                    
         groups: List[List[int]] = []
-        executed: Set[int] = set()
+        level = [node_id for node_id, degree in indegree.items() if degree == 0]
+        placed = 0
         
-        while len(executed) < len(nodes):
-            group = []
+        while level:
+            groups.append(level)
+            placed += len(level)
+            next_level = []
+            for node_id in level:
+                for dependent in dependents[node_id]:
+                    indegree[dependent] -= 1
+                    if indegree[dependent] == 0:
+                        next_level.append(dependent)
+            level = next_level
             
-            for node in nodes:
-                if node.node_id in executed:
-                    continue
-                    
-                # Check if all dependencies are executed
-                deps_met = all(dep in executed for dep in node.depends_on)
-                
-                if deps_met:
-                    group.append(node.node_id)
-                    
-            if not group:
-                # Deadlock prevention
-                remaining = [n.node_id for n in nodes if n.node_id not in executed]
-                groups.append(remaining)
-                break
-                
-            executed.update(group)
-            groups.append(group)
+        if placed < len(nodes):
+            # Deadlock prevention
+            groups.append([node_id for node_id, degree in indegree.items() if degree > 0])
             
         return groups
         
     async def execute_query(self, request: QueryRequest) -> QueryResult:
         """Выполнение запроса"""
         self.queries_total += 1
-        start_time = time.time()
+        start_time = time.perf_counter()
         
         result = QueryResult(
             result_id=f"result_{uuid.uuid4().hex[:8]}"
         )
         
-        # Create query plan
-        plan = self.create_query_plan(request)
+        # Cached or new query plan
+        plan, plan_cached = self.get_query_plan(request)
         
-        # Execute plan
         data: Dict[str, Any] = {}
         entities: Dict[str, List[Dict[str, Any]]] = {}
+        tracing: List[Dict[str, Any]] = []
+        subgraphs: Dict[str, Dict[str, Any]] = {}
+        node_tasks: Dict[int, asyncio.Task] = {}
         
-        for group in plan.parallel_fetches:
-            # Execute nodes in parallel
-            fetch_tasks = []
+        async def run_node(node: FetchNode) -> Dict[str, Any]:
+            # Start as soon as this node's own inputs are ready
+            deps = [node_tasks[dep] for dep in node.depends_on if dep in node_tasks]
+            dep_results = await asyncio.gather(*deps, return_exceptions=True)
             
-            for node_id in group:
-                node = plan.fetch_nodes[node_id]
-                entity_refs = entities.get(node.entity_type) if node.requires_entities else None
-                fetch_tasks.append(
-                    self._fetch_from_service(node, entity_refs)
-                )
+            failed = [r for r in dep_results if isinstance(r, Exception)]
+            if failed:
+                raise Exception(f"Dependency failed for {node.service_name}: {failed[0]}")
                 
-            group_results = await asyncio.gather(*fetch_tasks, return_exceptions=True)
+            started = time.perf_counter()
+            call_stats: Dict[str, Any] = {}
             
-            # Process results
-            for node_id, fetch_result in zip(group, group_results):
-                node = plan.fetch_nodes[node_id]
+            if node.requires_entities:
+                representations = self._collect_representations(node.entity_type, dep_results)
+                resolved = await self.entity_loader.load_many(node.service_name, node.entity_type, representations)
+                fetch_result = {
+                    field_name: [{field_name: entity.get(field_name)} for entity in resolved]
+                    for field_name in node.fields
+                }
+                call_stats["entities"] = len(representations)
+            else:
+                fetch_result = await self._fetch_from_service(node, None, call_stats)
                 
-                if isinstance(fetch_result, Exception):
-                    result.errors.append({
-                        "message": str(fetch_result),
-                        "path": node.fields
-                    })
-                    continue
+            duration_ms = (time.perf_counter() - started) * 1000
+            tracing.append({
+                "node": node.node_id,
+                "service": node.service_name,
+                "startMs": round((started - start_time) * 1000, 3),
+                "durationMs": round(duration_ms, 3),
+                **call_stats
+            })
+            
+            subgraph = subgraphs.setdefault(node.service_name, {"fetches": 0, "totalMs": 0.0, "connectionReused": 0})
+            subgraph["fetches"] += 1
+            subgraph["totalMs"] = round(subgraph["totalMs"] + duration_ms, 3)
+            subgraph["connectionReused"] += int(call_stats.get("connectionReused", False))
+            
+            # Merge data
+            for key, value in fetch_result.items():
+                if key not in data:
+                    data[key] = value
+                elif isinstance(value, list):
+                    # Merge entity data
+                    if key not in entities:
+                        entities[key] = []
+                    entities[key].extend(value)
+                    data[key] = entities[key]
+                elif isinstance(value, dict):
+                    data[key].update(value)
                     
-                # Merge data
-                for key, value in fetch_result.items():
-                    if key not in data:
-                        data[key] = value
-                    elif isinstance(value, list):
-                        # Merge entity data
-                        if key not in entities:
-                            entities[key] = []
-                        entities[key].extend(value)
-                        data[key] = entities[key]
-                    elif isinstance(value, dict):
-                        data[key].update(value)
-                        
+            return fetch_result
+            
+        # Dependencies always point at earlier stages
+        for group in plan.parallel_fetches:
+            for node_id in group:
+                node = plan.fetch_nodes[node_id]
+                node_tasks[node_id] = asyncio.ensure_future(run_node(node))
+                
+        node_ids = list(node_tasks)
+        outcomes = await asyncio.gather(*node_tasks.values(), return_exceptions=True)
+        for node_id, outcome in zip(node_ids, outcomes):
+            if isinstance(outcome, Exception):
+                result.errors.append({
+                    "message": str(outcome),
+                    "path": plan.fetch_nodes[node_id].fields
+                })
+                
         result.data = data
-        result.latency_ms = (time.time() - start_time) * 1000
+        result.latency_ms = (time.perf_counter() - start_time) * 1000
         
         # Extensions
         result.extensions = {
             "queryPlan": {
+                "planId": plan.plan_id,
+                "cached": plan_cached,
                 "nodes": len(plan.fetch_nodes),
                 "parallelGroups": len(plan.parallel_fetches)
             },
-            "services": list({n.service_name for n in plan.fetch_nodes})
+            "services": list({n.service_name for n in plan.fetch_nodes}),
+            "tracing": {
+                "durationMs": round(result.latency_ms, 3),
+                "fetches": sorted(tracing, key=lambda t: t["startMs"]),
+                "subgraphs": subgraphs
+            }
         }
         
         if result.errors:
@@ -485,28 +714,67 @@ class GraphQLFederationManager:
             
         return result
         
+    def _collect_representations(self, typename: str,
+                                 dep_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Представления сущностей из результатов зависимостей"""
+        fed_type = self.federated_types.get(typename)
+        key_fields = fed_type.key_fields if fed_type and fed_type.key_fields else ["id"]
+        
+        representations = []
+        for dep_result in dep_results:
+            for value in dep_result.values():
+                for item in value if isinstance(value, list) else [value]:
+                    if isinstance(item, dict) and all(k in item for k in key_fields):
+                        representations.append({"__typename": typename, **{k: item[k] for k in key_fields}})
+        return representations
+        
+    def _get_pool(self, service_name: str) -> SubgraphConnectionPool:
+        pool = self.connection_pools.get(service_name)
+        if pool is None:
+            pool = SubgraphConnectionPool(service_name)
+            self.connection_pools[service_name] = pool
+        return pool
+        
+    async def _service_call(self, service: SubgraphService,
+                           call_stats: Dict[str, Any] = None):
+        """Один HTTP-запрос к подграфу через пул соединений"""
+        pool = self._get_pool(service.name)
+        connection, reused = await pool.acquire()
+        
+        started = time.perf_counter()
+        healthy = True
+        try:
+            # Update service stats
+            service.requests_count += 1
+            
+            # Simulate network latency
+            await asyncio.sleep(random.uniform(*SIMULATED_LATENCY_MS) / 1000)
+            
+            if random.random() < SIMULATED_ERROR_RATE:
+                service.errors_count += 1
+                healthy = False
+                raise Exception(f"Service error: {service.name}")
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            pool.calls += 1
+            pool.total_ms += elapsed_ms
+            service.avg_latency_ms += (elapsed_ms - service.avg_latency_ms) / service.requests_count
+            pool.release(connection, healthy)
+            
+            if call_stats is not None:
+                call_stats["connectionReused"] = reused
+                
     async def _fetch_from_service(self, node: FetchNode,
-                                 entity_refs: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+                                 entity_refs: List[Dict[str, Any]] = None,
+                                 call_stats: Dict[str, Any] = None) -> Dict[str, Any]:
         """Выборка данных из сервиса"""
         service = self.services.get(node.service_name)
         if not service:
             raise Exception(f"Service not found: {node.service_name}")
             
-        # Update service stats
-        service.requests_count += 1
-        
-        # Simulate network latency
-        latency = random.uniform(5, 50)
-        await asyncio.sleep(latency / 1000)
+        await self._service_call(service, call_stats)
+        return self._generate_mock_data(node, entity_refs)
         
-        # Simulate response
-        if random.random() < 0.98:  # 98% success rate
-            # Generate mock data
-            return self._generate_mock_data(node, entity_refs)
-        else:
-            service.errors_count += 1
-            raise Exception(f"Service error: {node.service_name}")
-            
     def _generate_mock_data(self, node: FetchNode,
                            entity_refs: List[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Генерация mock данных"""
@@ -529,17 +797,33 @@ class GraphQLFederationManager:
         return data
         
     async def resolve_entities(self, typename: str,
-                              representations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+                              representations: List[Dict[str, Any]],
+                              service_name: str = "") -> List[Dict[str, Any]]:
         """Разрешение сущностей"""
         fed_type = self.federated_types.get(typename)
         if not fed_type:
             return []
             
-        owner_service = self.services.get(fed_type.owner_service)
-        if not owner_service:
+        service_name = service_name or fed_type.owner_service
+        if service_name not in self.services:
             return []
             
-        # Fetch entities from owner service
+        return await self.entity_loader.load_many(service_name, typename, representations)
+        
+    async def _resolve_entities_batch(self, service_name: str, typename: str,
+                                     representations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Один _entities запрос к подграфу на пакет"""
+        service = self.services.get(service_name)
+        fed_type = self.federated_types.get(typename)
+        if not service or not fed_type:
+            raise Exception(f"Cannot resolve {typename} in {service_name}")
+            
+        await self._service_call(service)
+        
+        # Fields this subgraph contributes to the type
+        owned = [f for f, source in fed_type.field_sources.items()
+                 if source == service_name or service_name == fed_type.owner_service]
+        
         resolved = []
         for rep in representations:
             entity = {
@@ -547,7 +831,7 @@ class GraphQLFederationManager:
                 **rep
             }
             # Add mock resolved fields
-            for field_name in fed_type.all_fields:
+            for field_name in owned:
                 if field_name not in entity:
                     entity[field_name] = f"resolved_{field_name}"
             resolved.append(entity)
@@ -593,11 +877,15 @@ class GraphQLFederationManager:
                 
             service.status = status
             
+            pool = self.connection_pools.get(name)
             health[name] = {
                 "status": status.value,
                 "requests": service.requests_count,
                 "errors": service.errors_count,
                 "error_rate": error_rate,
+                "avg_latency_ms": service.avg_latency_ms,
+                "connections_opened": pool.opened if pool else 0,
+                "connections_reused": pool.reused if pool else 0,
                 "types": len(service.types),
                 "queries": len(service.queries)
             }
@@ -612,7 +900,14 @@ class GraphQLFederationManager:
             "queries_total": self.queries_total,
             "queries_success": self.queries_success,
             "queries_failed": self.queries_failed,
-            "success_rate": self.queries_success / max(self.queries_total, 1) * 100
+            "success_rate": self.queries_success / max(self.queries_total, 1) * 100,
+            "supergraph_version": self.supergraph_version,
+            "cached_plans": len(self.plan_cache),
+            "plan_cache_hits": self.plan_cache_hits,
+            "plan_cache_misses": self.plan_cache_misses,
+            "entity_loads": self.entity_loader.loads,
+            "entity_batches": self.entity_loader.batches,
+            "entity_avg_batch_size": self.entity_loader.avg_batch_size
         }
 
 
@@ -782,21 +1077,32 @@ async def main():
     print(f"    Latency: {result3.latency_ms:.1f}ms")
     print(f"    Parallel Groups: {result3.extensions.get('queryPlan', {}).get('parallelGroups', 0)}")
     print(f"    Services: {result3.extensions.get('services', [])}")
+    for fetch in result3.extensions.get("tracing", {}).get("fetches", []):
+        print(f"      ⏱️ node {fetch['node']} {fetch['service']}: +{fetch['startMs']:.1f}ms for {fetch['durationMs']:.1f}ms")
     
     # Bulk queries
     print("\n📦 Executing bulk queries...")
     
+    bulk_queries = []
     for i in range(30):
-        query = QueryRequest(
+        bulk_queries.append(QueryRequest(
             request_id=f"bulk_{i}",
             operation_type=QueryOperationType.QUERY,
-            requested_fields={
-                random.choice(["User", "Product", "Review", "Order"]): ["id", "name"]
-            }
-        )
-        await manager.execute_query(query)
+            requested_fields=random.choice([
+                {"User": ["id", "username", "reviews"]},
+                {"Product": ["id", "name", "inStock", "reviews"]},
+                {"Review": ["id", "rating"]},
+                {"Order": ["id", "total"]}
+            ])
+        ))
         
+    # Concurrent queries share cached plans and batched _entities fetches
+    await asyncio.gather(*(manager.execute_query(q) for q in bulk_queries))
+    
+    bulk_stats = manager.get_statistics()
     print(f"  ✓ Processed 30 bulk queries")
+    print(f"  🗂️ Plan cache: {bulk_stats['plan_cache_hits']} hits / {bulk_stats['plan_cache_misses']} misses")
+    print(f"  📦 Entity loads: {bulk_stats['entity_loads']} in {bulk_stats['entity_batches']} batches")
     
     # Display federated types
     print("\n📋 Federated Types:")
@@ -840,6 +1146,7 @@ async def main():
         print(f"\n  {status_icon} {name}:")
         print(f"    Requests: {info['requests']}")
         print(f"    Errors: {info['errors']} ({info['error_rate']:.1f}%)")
+        print(f"    Connections: {info['connections_opened']} opened, {info['connections_reused']} reused")
         print(f"    Types: {info['types']}, Queries: {info['queries']}")
         
     # Query plan visualization
@@ -898,5 +1205,89 @@ async def main():
     print("=" * 60)
 
 
+def benchmark_graphql_federation(queries: int = 2000, concurrency: int = 100) -> Dict[str, Any]:
+    """Бенчмарк: кэш планов, пакетирование сущностей и переиспользование соединений"""
+    
+    async def run() -> Dict[str, Any]:
+        random.seed(5)
+        manager = GraphQLFederationManager()
+        for name in ("users", "products", "reviews", "inventory"):
+            manager.register_service(name, f"http://{name}:4000/graphql")
+            
+        manager.add_type_to_service("users", "User", {
+            "id": FieldDefinition("id", FieldType.ID, nullable=False),
+            "username": FieldDefinition("username", FieldType.STRING)
+        }, key_fields=["id"])
+        manager.add_type_to_service("products", "Product", {
+            "id": FieldDefinition("id", FieldType.ID, nullable=False),
+            "name": FieldDefinition("name", FieldType.STRING)
+        }, key_fields=["id"])
+        manager.add_type_to_service("reviews", "Product", {
+            "reviews": FieldDefinition("reviews", FieldType.OBJECT, type_name="Review", is_list=True)
+        }, key_fields=["id"], extends=True)
+        manager.add_type_to_service("inventory", "Product", {
+            "inStock": FieldDefinition("inStock", FieldType.BOOLEAN)
+        }, key_fields=["id"], extends=True)
+        manager.add_type_to_service("reviews", "User", {
+            "reviews": FieldDefinition("reviews", FieldType.OBJECT, type_name="Review", is_list=True)
+        }, key_fields=["id"], extends=True)
+        manager.compose_supergraph()
+        
+        shapes = [
+            {"Product": ["id", "name", "inStock", "reviews"]},
+            {"User": ["id", "username", "reviews"]},
+            {"Product": ["id", "name"], "User": ["id", "username"]}
+        ]
+        requests = [QueryRequest(request_id=f"bench_{i}", requested_fields=shapes[i % len(shapes)])
+                    for i in range(queries)]
+        
+        # Plan build cost: cold vs cached
+        started = time.perf_counter()
+        for request in requests[:len(shapes)]:
+            manager.create_query_plan(request)
+        cold_plan_us = (time.perf_counter() - started) * 1e6 / len(shapes)
+        
+        started = time.perf_counter()
+        for request in requests:
+            manager.get_query_plan(request)
+        cached_plan_us = (time.perf_counter() - started) * 1e6 / len(requests)
+        
+        latencies: List[float] = []
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def one(request: QueryRequest):
+            async with semaphore:
+                result = await manager.execute_query(request)
+                latencies.append(result.latency_ms)
+                
+        started = time.perf_counter()
+        await asyncio.gather(*(one(r) for r in requests))
+        elapsed = time.perf_counter() - started
+        
+        latencies.sort()
+        stats = manager.get_statistics()
+        health = manager.get_service_health()
+        return {
+            "queries": queries,
+            "queries_per_second": round(queries / elapsed, 1),
+            "p50_latency_ms": round(latencies[len(latencies) // 2], 2),
+            "p99_latency_ms": round(latencies[int(len(latencies) * 0.99)], 2),
+            "plan_build_us": round(cold_plan_us, 2),
+            "plan_cache_lookup_us": round(cached_plan_us, 2),
+            "plan_cache_hit_rate": round(stats["plan_cache_hits"] / max(stats["plan_cache_hits"] + stats["plan_cache_misses"], 1) * 100, 2),
+            "entity_loads": stats["entity_loads"],
+            "entity_batches": stats["entity_batches"],
+            "entity_avg_batch_size": round(stats["entity_avg_batch_size"], 2),
+            "connections_opened": sum(h["connections_opened"] for h in health.values()),
+            "connections_reused": sum(h["connections_reused"] for h in health.values()),
+            "success_rate": round(stats["success_rate"], 2)
+        }
+        
+    return asyncio.run(run())
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    if "--benchmark" in sys.argv:
+        print(json.dumps(benchmark_graphql_federation(), indent=2))
+    else:
+        asyncio.run(main())
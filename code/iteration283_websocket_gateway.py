@@ -15,15 +15,28 @@ Server Init - Iteration 283: WebSocket Gateway Platform
 """
 
 import asyncio
+import gc
+import json
 import random
+import struct
+import sys
 import time
+from collections import deque
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Set, Callable
+from typing import Dict, List, Optional, Any, Set, Callable, Tuple
 from enum import Enum
 import uuid
 
 
+# Outbound delivery
+OUTBOUND_QUEUE_SIZE = 256
+FANOUT_YIELD_EVERY = 2048
+OFFLINE_BACKLOG_LIMIT = 100
+SLOW_CONSUMER_CLOSE_CODE = 1008
+ABNORMAL_CLOSE_CODE = 1006
+
+
 class ConnectionState(Enum):
     """Состояние соединения"""
     CONNECTING = "connecting"
@@ -61,6 +74,22 @@ class AuthMethod(Enum):
     SESSION = "session"
 
 
+class SlowConsumerPolicy(Enum):
+    """Политика для медленных потребителей"""
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    DISCONNECT = "disconnect"
+
+
+# RFC 6455 opcodes
+WS_OPCODES = {
+    MessageType.BINARY: 0x2,
+    MessageType.CLOSE: 0x8,
+    MessageType.PING: 0x9,
+    MessageType.PONG: 0xA
+}
+
+
 @dataclass
 class WebSocketConnection:
     """WebSocket соединение"""
@@ -145,6 +174,9 @@ class Message:
     # Meta
     timestamp: datetime = field(default_factory=datetime.now)
     size_bytes: int = 0
+    
+    # Encoded frame (shared by all recipients)
+    frame: Optional[bytes] = field(default=None, repr=False)
 
 
 @dataclass
@@ -174,6 +206,11 @@ class GatewayConfig:
     # Auth
     auth_required: bool = False
     auth_method: AuthMethod = AuthMethod.TOKEN
+    
+    # Outbound
+    outbound_queue_size: int = OUTBOUND_QUEUE_SIZE
+    slow_consumer_policy: SlowConsumerPolicy = SlowConsumerPolicy.DROP_OLDEST
+    offline_backlog_limit: int = OFFLINE_BACKLOG_LIMIT
 
 
 @dataclass
@@ -188,6 +225,128 @@ class Subscription:
     receive_presence: bool = True
 
 
+def encode_frame(message: Message) -> bytes:
+    """Кодирование сообщения в WebSocket-кадр (один раз на сообщение)"""
+    if message.frame is not None:
+        return message.frame
+        
+    if isinstance(message.data, (bytes, bytearray)):
+        payload = bytes(message.data)
+    else:
+        payload = json.dumps({
+            "id": message.message_id,
+            "type": message.message_type.value,
+            "channel": message.channel,
+            "from": message.from_user,
+            "data": message.data,
+            "ts": message.timestamp.isoformat()
+        }, separators=(",", ":"), default=str).encode()
+        
+    opcode = WS_OPCODES.get(message.message_type, 0x2 if isinstance(message.data, (bytes, bytearray)) else 0x1)
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+        
+    message.frame = header + payload
+    return message.frame
+
+
+async def discard_transport(frame: bytes):
+    """Транспорт по умолчанию (без реального сокета)"""
+    return None
+
+
+class ConnectionWriter:
+    """Ограниченная очередь исходящих кадров и задача-писатель соединения"""
+    
+    def __init__(self, connection: WebSocketConnection,
+                 transport: Callable,
+                 max_queue: int,
+                 policy: SlowConsumerPolicy,
+                 on_slow_consumer: Callable,
+                 on_transport_error: Callable):
+        self.connection = connection
+        self.transport = transport
+        self.max_queue = max_queue
+        self.policy = policy
+        self.on_slow_consumer = on_slow_consumer
+        self.on_transport_error = on_transport_error
+        
+        self.queue: deque = deque()
+        self.waiter: Optional[asyncio.Future] = None
+        self.idle = asyncio.Event()  # queue empty and no write in flight
+        self.idle.set()
+        self.closed = False
+        self.task = asyncio.ensure_future(self._run())
+        
+        # Stats
+        self.dropped = 0
+        
+    def offer(self, frame: bytes) -> bool:
+        """Постановка кадра в очередь без ожидания"""
+        if self.closed:
+            return False
+            
+        if len(self.queue) >= self.max_queue:
+            if self.policy == SlowConsumerPolicy.DROP_NEWEST:
+                self.dropped += 1
+                return False
+            if self.policy == SlowConsumerPolicy.DISCONNECT:
+                self.closed = True
+                self.on_slow_consumer(self.connection.connection_id)
+                return False
+            self.queue.popleft()
+            self.dropped += 1
+            
+        self.queue.append(frame)
+        self.idle.clear()
+        waiter = self.waiter
+        if waiter is not None:
+            self.waiter = None
+            if not waiter.done():
+                waiter.set_result(None)
+        return True
+        
+    async def _run(self):
+        """Запись кадров в сокет по порядку"""
+        connection = self.connection
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.queue:
+                self.waiter = loop.create_future()
+                await self.waiter
+                
+            while self.queue:
+                frame = self.queue.popleft()
+                try:
+                    await self.transport(frame)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Сокет потерян: дальнейшие кадры не принимаются
+                    self.closed = True
+                    self.dropped += len(self.queue) + 1
+                    self.queue.clear()
+                    self.idle.set()
+                    self.on_transport_error(connection.connection_id, e)
+                    return
+                connection.messages_sent += 1
+                connection.bytes_sent += len(frame)
+                
+            connection.last_activity = datetime.now()
+            self.idle.set()
+            
+    def close(self):
+        self.closed = True
+        self.queue.clear()
+        self.idle.set()
+        self.task.cancel()
+
+
 class WebSocketGatewayManager:
     """Менеджер WebSocket Gateway"""
     
@@ -200,6 +359,10 @@ class WebSocketGatewayManager:
         
         # Indexes
         self.user_connections: Dict[str, Set[str]] = {}  # user_id -> connection_ids
+        self.subscription_index: Dict[Tuple[str, str], str] = {}  # (connection_id, channel) -> subscription_id
+        
+        # Outbound writers
+        self.writers: Dict[str, ConnectionWriter] = {}
         
         # Message handlers
         self.handlers: Dict[str, Callable] = {}
@@ -209,12 +372,22 @@ class WebSocketGatewayManager:
         self.messages_broadcast: int = 0
         self.messages_direct: int = 0
         self.connections_total: int = 0
+        self.slow_consumer_disconnects: int = 0
+        self.transport_errors: int = 0
+        self.frames_dropped: int = 0
+        self.offline_dropped: int = 0
+        self.presence_coalesced: int = 0
         
-        # Pending messages (for offline users)
-        self.pending_messages: Dict[str, List[Message]] = {}
+        # Deferred closes started from writer callbacks
+        self.background_tasks: Set[asyncio.Task] = set()
+        
+        # Pending messages (for offline users): capped backlog + latest presence per channel
+        self.pending_messages: Dict[str, deque] = {}
+        self.pending_presence: Dict[str, Dict[str, Message]] = {}
         
     async def accept_connection(self, client_id: str,
-                               auth_token: str = None) -> WebSocketConnection:
+                               auth_token: str = None,
+                               transport: Callable = None) -> WebSocketConnection:
         """Принятие соединения"""
         # Check limits
         if len(self.connections) >= self.config.max_connections:
@@ -240,6 +413,15 @@ class WebSocketGatewayManager:
         self.connections[connection.connection_id] = connection
         self.connections_total += 1
         
+        self.writers[connection.connection_id] = ConnectionWriter(
+            connection,
+            transport or discard_transport,
+            self.config.outbound_queue_size,
+            self.config.slow_consumer_policy,
+            self._on_slow_consumer,
+            self._on_transport_error
+        )
+        
         # Index by user
         if connection.user_id:
             if connection.user_id not in self.user_connections:
@@ -271,26 +453,66 @@ class WebSocketGatewayManager:
             if not self.user_connections[connection.user_id]:
                 del self.user_connections[connection.user_id]
                 
+        writer = self.writers.pop(connection_id, None)
+        if writer:
+            self.frames_dropped += writer.dropped
+            writer.close()
+            
         connection.state = ConnectionState.CLOSED
         del self.connections[connection_id]
         
+    def _on_slow_consumer(self, connection_id: str):
+        """Отключение медленного потребителя"""
+        self.slow_consumer_disconnects += 1
+        self._spawn(self.close_connection(connection_id, SLOW_CONSUMER_CLOSE_CODE, "Slow consumer"))
+        
+    def _on_transport_error(self, connection_id: str, error: Exception):
+        """Закрытие соединения после ошибки записи в сокет"""
+        self.transport_errors += 1
+        connection = self.connections.get(connection_id)
+        if connection and connection.state == ConnectionState.OPEN:
+            connection.state = ConnectionState.CLOSING
+        self._spawn(self.close_connection(connection_id, ABNORMAL_CLOSE_CODE, str(error)))
+        
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        
+    def _enqueue(self, connection_id: str, frame: bytes) -> bool:
+        """Неблокирующая постановка кадра в очередь соединения"""
+        writer = self.writers.get(connection_id)
+        if writer is None or writer.connection.state != ConnectionState.OPEN:
+            return False
+        return writer.offer(frame)
+        
     async def send_message(self, connection_id: str, message: Message) -> bool:
         """Отправка сообщения"""
         connection = self.connections.get(connection_id)
         if not connection or connection.state != ConnectionState.OPEN:
             return False
             
+        frame = encode_frame(message)
+        
         # Check message size
-        if message.size_bytes > self.config.max_message_size_bytes:
+        if max(message.size_bytes, len(frame)) > self.config.max_message_size_bytes:
+            return False
+            
+        if not self._enqueue(connection_id, frame):
             return False
             
-        # Update stats
-        connection.messages_sent += 1
-        connection.bytes_sent += message.size_bytes
-        connection.last_activity = datetime.now()
-        
         self.messages_total += 1
+        return True
         
+    async def flush(self, timeout: float = 5.0) -> bool:
+        """Ожидание опустошения исходящих очередей"""
+        pending = [w.idle.wait() for w in self.writers.values() if not w.idle.is_set()]
+        if not pending:
+            return True
+        try:
+            await asyncio.wait_for(asyncio.gather(*pending), timeout)
+        except asyncio.TimeoutError:
+            return False
         return True
         
     async def receive_message(self, connection_id: str, message: Message) -> bool:
@@ -400,6 +622,7 @@ class WebSocketGatewayManager:
         )
         
         self.subscriptions[subscription.subscription_id] = subscription
+        self.subscription_index[(connection_id, channel_name)] = subscription.subscription_id
         channel.subscribers.add(connection_id)
         connection.subscribed_channels.add(channel_name)
         
@@ -422,14 +645,9 @@ class WebSocketGatewayManager:
             return False
             
         # Remove subscription
-        sub_to_remove = None
-        for sub_id, sub in self.subscriptions.items():
-            if sub.connection_id == connection_id and sub.channel_name == channel_name:
-                sub_to_remove = sub_id
-                break
-                
+        sub_to_remove = self.subscription_index.pop((connection_id, channel_name), None)
         if sub_to_remove:
-            del self.subscriptions[sub_to_remove]
+            self.subscriptions.pop(sub_to_remove, None)
             
         channel.subscribers.discard(connection_id)
         connection.subscribed_channels.discard(channel_name)
@@ -447,26 +665,40 @@ class WebSocketGatewayManager:
         if not channel:
             return 0
             
-        delivered = 0
+        delivered = await self._fan_out(list(channel.subscribers), message)
         
-        for conn_id in channel.subscribers:
-            if await self.send_message(conn_id, message):
-                delivered += 1
-                
         channel.messages_count += 1
         self.messages_broadcast += 1
         
         return delivered
         
+    async def _fan_out(self, connection_ids: List[str], message: Message) -> int:
+        """Рассылка одного закодированного кадра: только постановка в очереди, запись делают писатели"""
+        frame = encode_frame(message)
+        if max(message.size_bytes, len(frame)) > self.config.max_message_size_bytes:
+            return 0
+            
+        delivered = 0
+        for i, connection_id in enumerate(connection_ids, 1):
+            if self._enqueue(connection_id, frame):
+                delivered += 1
+            # Long fan-outs yield so writers and other coroutines keep running
+            if i % FANOUT_YIELD_EVERY == 0:
+                await asyncio.sleep(0)
+                
+        self.messages_total += delivered
+        
+        # Let writers pick up the frame before the next broadcast
+        await asyncio.sleep(0)
+        return delivered
+        
     async def send_direct(self, user_id: str, message: Message) -> bool:
         """Прямое сообщение пользователю"""
         connections = self.user_connections.get(user_id, set())
         
         if not connections:
             # Store for later delivery
-            if user_id not in self.pending_messages:
-                self.pending_messages[user_id] = []
-            self.pending_messages[user_id].append(message)
+            self._queue_offline(user_id, message)
             return False
             
         for conn_id in connections:
@@ -475,15 +707,27 @@ class WebSocketGatewayManager:
         self.messages_direct += 1
         return True
         
+    def _queue_offline(self, user_id: str, message: Message):
+        """Отложенная доставка: ограниченный backlog, presence схлопывается"""
+        data = message.data if isinstance(message.data, dict) else {}
+        if data.get("type") == "presence":
+            latest = self.pending_presence.setdefault(user_id, {})
+            if data.get("channel", message.channel) in latest:
+                self.presence_coalesced += 1
+            latest[data.get("channel", message.channel)] = message
+            return
+            
+        backlog = self.pending_messages.get(user_id)
+        if backlog is None:
+            backlog = deque(maxlen=self.config.offline_backlog_limit)
+            self.pending_messages[user_id] = backlog
+        if len(backlog) == backlog.maxlen:
+            self.offline_dropped += 1
+        backlog.append(message)
+        
     async def broadcast_all(self, message: Message) -> int:
         """Широковещание всем"""
-        delivered = 0
-        
-        for conn_id in self.connections:
-            if await self.send_message(conn_id, message):
-                delivered += 1
-                
-        return delivered
+        return await self._fan_out(list(self.connections), message)
         
     async def _broadcast_presence_update(self, channel: Channel,
                                         event: str,
@@ -530,13 +774,11 @@ class WebSocketGatewayManager:
         
     async def _deliver_pending_messages(self, connection: WebSocketConnection):
         """Доставка отложенных сообщений"""
-        if connection.user_id not in self.pending_messages:
-            return
-            
-        for message in self.pending_messages[connection.user_id]:
+        for message in self.pending_messages.pop(connection.user_id, ()):
             await self.send_message(connection.connection_id, message)
             
-        del self.pending_messages[connection.user_id]
+        for message in self.pending_presence.pop(connection.user_id, {}).values():
+            await self.send_message(connection.connection_id, message)
         
     async def check_connections_health(self):
         """Проверка здоровья соединений"""
@@ -603,7 +845,14 @@ class WebSocketGatewayManager:
             "messages_total": self.messages_total,
             "messages_broadcast": self.messages_broadcast,
             "messages_direct": self.messages_direct,
-            "pending_messages": sum(len(msgs) for msgs in self.pending_messages.values())
+            "pending_messages": sum(len(msgs) for msgs in self.pending_messages.values()) +
+                                sum(len(p) for p in self.pending_presence.values()),
+            "queued_frames": sum(len(w.queue) for w in self.writers.values()),
+            "dropped_frames": self.frames_dropped + sum(w.dropped for w in self.writers.values()),
+            "slow_consumer_disconnects": self.slow_consumer_disconnects,
+            "transport_errors": self.transport_errors,
+            "offline_dropped": self.offline_dropped,
+            "presence_coalesced": self.presence_coalesced
         }
 
 
@@ -728,6 +977,44 @@ async def main():
         
     print(f"  ✓ Processed 50 messages")
     
+    # Slow consumers and offline backlog
+    print("\n🐢 Slow Consumers & Offline Backlog...")
+    
+    async def slow_transport(frame: bytes):
+        await asyncio.sleep(0.01)
+        
+    slow_conn = await manager.accept_connection("client_slow", transport=slow_transport)
+    await manager.subscribe(slow_conn.connection_id, "general")
+    
+    for i in range(config.outbound_queue_size * 2):
+        await manager.broadcast_to_channel("general", Message(
+            message_id=f"msg_{uuid.uuid4().hex[:8]}",
+            message_type=MessageType.BROADCAST,
+            channel="general",
+            data={"text": f"Burst {i}", "seq": i}
+        ))
+        
+    slow_writer = manager.writers[slow_conn.connection_id]
+    print(f"  🐢 Slow consumer queue: {len(slow_writer.queue)}/{config.outbound_queue_size}, dropped {slow_writer.dropped}")
+    await manager.close_connection(slow_conn.connection_id, 1000, "Demo done")
+    
+    for i in range(config.offline_backlog_limit + 20):
+        await manager.send_direct("user_offline", Message(
+            message_id=f"msg_{uuid.uuid4().hex[:8]}",
+            message_type=MessageType.DIRECT,
+            data={"text": f"Missed {i}", "type": "direct"}
+        ))
+        await manager.send_direct("user_offline", Message(
+            message_id=f"msg_{uuid.uuid4().hex[:8]}",
+            message_type=MessageType.DIRECT,
+            data={"type": "presence", "event": "update", "channel": "lobby", "members": i}
+        ))
+        
+    print(f"  📭 Offline backlog: {len(manager.pending_messages['user_offline'])} (dropped {manager.offline_dropped})")
+    print(f"  👥 Presence coalesced: {manager.presence_coalesced}")
+    
+    await manager.flush()
+    
     # Presence info
     print("\n👥 Presence in Lobby:")
     
@@ -831,6 +1118,8 @@ async def main():
     print(f"│ Messages Total:                {stats['messages_total']:>12}                        │")
     print(f"│ Broadcast Messages:            {stats['messages_broadcast']:>12}                        │")
     print(f"│ Direct Messages:               {stats['messages_direct']:>12}                        │")
+    print(f"│ Dropped Frames:                {stats['dropped_frames']:>12}                        │")
+    print(f"│ Slow Consumer Disconnects:     {stats['slow_consumer_disconnects']:>12}                        │")
     print("└────────────────────────────────────────────────────────────────────┘")
     
     print("\n" + "=" * 60)
@@ -838,5 +1127,92 @@ async def main():
     print("=" * 60)
 
 
+def benchmark_websocket_gateway(subscriber_counts: Tuple[int, ...] = (10000, 50000, 100000),
+                                broadcasts: int = 5,
+                                slow_ratio: float = 0.01) -> Dict[str, Any]:
+    """Бенчмарк задержки широковещания по числу подписчиков"""
+    
+    async def run(subscribers: int) -> Dict[str, Any]:
+        config = GatewayConfig(max_connections=subscribers + 1)
+        manager = WebSocketGatewayManager(config)
+        await manager.create_channel("bench", ChannelType.PUBLIC)
+        
+        received = {"count": 0}
+        done = asyncio.Event()
+        target = {"count": 0}
+        
+        async def fast_transport(frame: bytes):
+            received["count"] += 1
+            if received["count"] >= target["count"]:
+                done.set()
+                
+        # Slow consumers stay stalled for the whole run, so their backlog is
+        # the same at every size: one frame in flight, the rest queued
+        stalled = asyncio.Event()
+        
+        async def slow_transport(frame: bytes):
+            await stalled.wait()
+            
+        slow_every = int(1 / slow_ratio) if slow_ratio else 0
+        fast = 0
+        for i in range(subscribers):
+            is_slow = slow_every and i % slow_every == 0
+            conn = await manager.accept_connection(
+                f"bench_{i}", transport=slow_transport if is_slow else fast_transport
+            )
+            await manager.subscribe(conn.connection_id, "bench")
+            fast += 0 if is_slow else 1
+            
+        # Long-lived connection state should not be rescanned by every GC pass
+        gc.collect()
+        gc.freeze()
+        
+        enqueue_ms = []
+        delivery_ms = []
+        for i in range(broadcasts):
+            received["count"] = 0
+            target["count"] = fast
+            done.clear()
+            
+            message = Message(
+                message_id=f"msg_{uuid.uuid4().hex[:8]}",
+                message_type=MessageType.BROADCAST,
+                channel="bench",
+                data={"text": "tick", "seq": i}
+            )
+            
+            start = time.perf_counter()
+            await manager.broadcast_to_channel("bench", message)
+            enqueue_ms.append((time.perf_counter() - start) * 1000)
+            await asyncio.wait_for(done.wait(), timeout=60)
+            delivery_ms.append((time.perf_counter() - start) * 1000)
+            
+        # Fast writers are idle once done fires; sample after they have settled
+        await asyncio.sleep(0)
+        stats = manager.get_statistics()
+        stalled.set()
+        for conn_id in list(manager.writers):
+            manager.writers.pop(conn_id).close()
+        gc.unfreeze()
+        
+        return {
+            "subscribers": subscribers,
+            "slow_consumers": subscribers - fast,
+            "fanout_enqueue_ms_p50": round(sorted(enqueue_ms)[len(enqueue_ms) // 2], 2),
+            "delivery_ms_p50": round(sorted(delivery_ms)[len(delivery_ms) // 2], 2),
+            "delivery_ms_max": round(max(delivery_ms), 2),
+            "queued_frames": stats["queued_frames"],
+            "queued_frames_per_slow_consumer": round(stats["queued_frames"] / max(subscribers - fast, 1), 2)
+        }
+        
+    return {
+        "broadcasts": broadcasts,
+        "results": [asyncio.run(run(n)) for n in subscriber_counts]
+    }
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    if "--benchmark" in sys.argv:
+        print(json.dumps(benchmark_websocket_gateway(), indent=2))
+    else:
+        asyncio.run(main())
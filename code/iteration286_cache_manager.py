@@ -15,12 +15,15 @@ Server Init - Iteration 286: Cache Manager Platform
 """
 
 import asyncio
+import heapq
+import itertools
 import random
+import sys
 import time
 import hashlib
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Callable
+from typing import Dict, List, Optional, Any, Callable, Tuple
 from enum import Enum
 import uuid
 from collections import OrderedDict
@@ -68,6 +71,7 @@ class CacheEntry:
     updated_at: datetime = field(default_factory=datetime.now)
     accessed_at: datetime = field(default_factory=datetime.now)
     expires_at: Optional[datetime] = None
+    deadline: float = 0.0  # time.monotonic(), 0 = no expiry
     
     # TTL
     ttl_seconds: int = 0
@@ -105,6 +109,9 @@ class CacheConfig:
     
     # Write
     write_policy: WritePolicy = WritePolicy.WRITE_THROUGH
+    
+    # Admission (TinyLFU)
+    admission_filter: bool = False
 
 
 @dataclass
@@ -114,6 +121,8 @@ class CacheStats:
     misses: int = 0
     writes: int = 0
     evictions: int = 0
+    expirations: int = 0
+    admissions_rejected: int = 0
     invalidations: int = 0
     
     # Bytes
@@ -128,6 +137,155 @@ class CacheStats:
     started_at: datetime = field(default_factory=datetime.now)
 
 
+# Size estimation / expiry
+SIZE_SAMPLE_ITEMS = 16
+SIZE_MAX_DEPTH = 3
+EXPIRE_BATCH = 64
+HALVE_TABLE = bytes(i >> 1 for i in range(256))
+
+
+def estimate_size(value: Any, depth: int = 0) -> int:
+    """Оценка размера значения без сериализации (крупные контейнеры — по выборке)"""
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value)
+    if value is None or isinstance(value, (int, float)):
+        return 8
+    if depth >= SIZE_MAX_DEPTH:
+        return sys.getsizeof(value)
+        
+    if isinstance(value, dict):
+        items = value.items()
+        if len(value) > SIZE_SAMPLE_ITEMS:
+            sample = itertools.islice(items, SIZE_SAMPLE_ITEMS)
+            sampled = sum(estimate_size(k, depth + 1) + estimate_size(v, depth + 1) for k, v in sample)
+            return sampled * len(value) // SIZE_SAMPLE_ITEMS
+        return sum(estimate_size(k, depth + 1) + estimate_size(v, depth + 1) for k, v in items)
+        
+    if isinstance(value, (list, tuple, set, frozenset)):
+        if len(value) > SIZE_SAMPLE_ITEMS:
+            sample = itertools.islice(value, SIZE_SAMPLE_ITEMS)
+            return sum(estimate_size(v, depth + 1) for v in sample) * len(value) // SIZE_SAMPLE_ITEMS
+        return sum(estimate_size(v, depth + 1) for v in value)
+        
+    return sys.getsizeof(value)
+
+
+class _FrequencyNode:
+    """Узел списка частот: ключи с одинаковой частотой в порядке LRU"""
+    __slots__ = ("frequency", "keys", "prev", "next")
+    
+    def __init__(self, frequency: int):
+        self.frequency = frequency
+        self.keys: OrderedDict = OrderedDict()
+        self.prev: "_FrequencyNode" = self
+        self.next: "_FrequencyNode" = self
+
+
+class FrequencyList:
+    """Двусвязный список частот для LFU: touch, add, remove и victim за O(1)"""
+    __slots__ = ("head", "nodes")
+    
+    def __init__(self):
+        self.head = _FrequencyNode(0)
+        self.nodes: Dict[str, _FrequencyNode] = {}
+        
+    def __len__(self) -> int:
+        return len(self.nodes)
+        
+    def _insert_after(self, node: _FrequencyNode, frequency: int) -> _FrequencyNode:
+        new = _FrequencyNode(frequency)
+        new.prev, new.next = node, node.next
+        node.next.prev = new
+        node.next = new
+        return new
+        
+    def _unlink(self, node: _FrequencyNode):
+        node.prev.next = node.next
+        node.next.prev = node.prev
+        
+    def add(self, key: str):
+        first = self.head.next
+        if first.frequency != 1:
+            first = self._insert_after(self.head, 1)
+        first.keys[key] = None
+        self.nodes[key] = first
+        
+    def touch(self, key: str):
+        node = self.nodes[key]
+        target = node.next
+        if target.frequency != node.frequency + 1:
+            target = self._insert_after(node, node.frequency + 1)
+        del node.keys[key]
+        target.keys[key] = None
+        self.nodes[key] = target
+        if not node.keys:
+            self._unlink(node)
+            
+    def remove(self, key: str):
+        node = self.nodes.pop(key, None)
+        if node is None:
+            return
+        del node.keys[key]
+        if not node.keys:
+            self._unlink(node)
+            
+    def victim(self, exclude: Optional[str] = None) -> Optional[str]:
+        node = self.head.next
+        while node is not self.head:
+            for key in node.keys:
+                if key != exclude:
+                    return key
+            node = node.next
+        return None
+        
+    def frequency(self, key: str) -> int:
+        node = self.nodes.get(key)
+        return node.frequency if node else 0
+
+
+class CountMinSketch:
+    """Count-min sketch с 4-битными по смыслу счётчиками и периодическим старением (TinyLFU)"""
+    __slots__ = ("mask", "rows", "additions", "sample_size")
+    
+    DEPTH = 4
+    MAX_COUNT = 15
+    
+    def __init__(self, capacity: int):
+        width = 64
+        while width < capacity:
+            width <<= 1
+        self.mask = width - 1
+        self.rows = [bytearray(width) for _ in range(self.DEPTH)]
+        self.additions = 0
+        self.sample_size = 10 * width
+        
+    def _indexes(self, key: str):
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        mask = self.mask
+        return [(h1 + i * h2) & mask for i in range(self.DEPTH)]
+        
+    def increment(self, key: str):
+        indexes = self._indexes(key)
+        rows = self.rows
+        current = min(row[i] for row, i in zip(rows, indexes))
+        if current >= self.MAX_COUNT:
+            return
+        # Conservative update: растут только минимальные счётчики
+        for row, i in zip(rows, indexes):
+            if row[i] == current:
+                row[i] = current + 1
+                
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            for row in self.rows:
+                row[:] = row.translate(HALVE_TABLE)
+            self.additions //= 2
+            
+    def estimate(self, key: str) -> int:
+        return min(row[i] for row, i in zip(self.rows, self._indexes(key)))
+
+
 class CacheStore:
     """Хранилище кэша"""
     
@@ -137,26 +295,42 @@ class CacheStore:
         self.stats = CacheStats()
         
         # LFU tracking
-        self.frequency: Dict[str, int] = {}
+        self.frequency = FrequencyList()
+        
+        # TTL tracking: (deadline, key), устаревшие элементы отбрасываются при извлечении
+        self.expiry_heap: List[Tuple[float, str]] = []
+        
+        # Admission filter
+        self.sketch: Optional[CountMinSketch] = (
+            CountMinSketch(config.max_entries or 10000) if config.admission_filter else None
+        )
         
         # Size tracking
         self.current_bytes: int = 0
         
     async def get(self, key: str) -> Optional[CacheEntry]:
         """Получение записи"""
-        start = time.time()
+        start = time.perf_counter()
+        now = time.monotonic()
         
-        if key not in self.entries:
+        heap = self.expiry_heap
+        if heap and heap[0][0] <= now:
+            self.expire(now, EXPIRE_BATCH)
+            
+        if self.sketch:
+            self.sketch.increment(key)
+            
+        entry = self.entries.get(key)
+        if entry is None:
             self.stats.misses += 1
             return None
             
-        entry = self.entries[key]
-        
         # Check expiration
-        if entry.expires_at and entry.expires_at < datetime.now():
+        if entry.deadline and entry.deadline <= now:
             entry.state = CacheState.EXPIRED
+            self._remove(key)
+            self.stats.expirations += 1
             self.stats.misses += 1
-            del self.entries[key]
             return None
             
         # Update access
@@ -168,29 +342,39 @@ class CacheStore:
             self.entries.move_to_end(key)
             
         # Update LFU
-        if self.config.eviction_policy == EvictionPolicy.LFU:
-            self.frequency[key] = self.frequency.get(key, 0) + 1
+        elif self.config.eviction_policy == EvictionPolicy.LFU:
+            self.frequency.touch(key)
             
         self.stats.hits += 1
         self.stats.bytes_read += entry.size_bytes
         
         # Update latency
-        latency = (time.time() - start) * 1000
+        latency = (time.perf_counter() - start) * 1000
         self._update_read_latency(latency)
         
         return entry
         
     async def set(self, key: str, value: Any,
                  ttl_seconds: int = 0,
-                 tags: List[str] = None) -> CacheEntry:
-        """Установка записи"""
-        start = time.time()
+                 tags: List[str] = None) -> Optional[CacheEntry]:
+        """Установка записи (None — запись не допущена фильтром)"""
+        start = time.perf_counter()
+        now = time.monotonic()
         
-        size = len(str(value))
+        heap = self.expiry_heap
+        if heap and heap[0][0] <= now:
+            self.expire(now, EXPIRE_BATCH)
+            
+        size = estimate_size(value)
+        entry = self.entries.get(key)
         
+        if self.sketch and entry is None:
+            self.sketch.increment(key)
+            
         # Check capacity
-        while self._needs_eviction(size):
-            await self._evict()
+        if not self._make_room(key, size, entry):
+            self.stats.admissions_rejected += 1
+            return None
             
         # Calculate TTL
         effective_ttl = ttl_seconds or self.config.default_ttl_seconds
@@ -198,18 +382,19 @@ class CacheStore:
             effective_ttl = self.config.max_ttl_seconds
             
         expires_at = datetime.now() + timedelta(seconds=effective_ttl) if effective_ttl > 0 else None
+        deadline = now + effective_ttl if effective_ttl > 0 else 0.0
         
         # Create or update entry
-        if key in self.entries:
-            entry = self.entries[key]
+        if entry is not None:
             entry.value = value
             entry.updated_at = datetime.now()
             entry.expires_at = expires_at
+            entry.deadline = deadline
             entry.version += 1
             entry.state = CacheState.VALID
-            
-            self.current_bytes -= entry.size_bytes
             entry.size_bytes = size
+            
+            self.entries[key] = entry
             self.current_bytes += size
         else:
             entry = CacheEntry(
@@ -217,17 +402,23 @@ class CacheStore:
                 value=value,
                 ttl_seconds=effective_ttl,
                 expires_at=expires_at,
+                deadline=deadline,
                 size_bytes=size,
                 tags=tags or []
             )
             self.entries[key] = entry
             self.current_bytes += size
+            if self.config.eviction_policy == EvictionPolicy.LFU:
+                self.frequency.add(key)
+                
+        if deadline:
+            self._schedule(deadline, key)
             
         self.stats.writes += 1
         self.stats.bytes_written += size
         
         # Update latency
-        latency = (time.time() - start) * 1000
+        latency = (time.perf_counter() - start) * 1000
         self._update_write_latency(latency)
         
         return entry
@@ -237,13 +428,7 @@ class CacheStore:
         if key not in self.entries:
             return False
             
-        entry = self.entries[key]
-        self.current_bytes -= entry.size_bytes
-        del self.entries[key]
-        
-        if key in self.frequency:
-            del self.frequency[key]
-            
+        self._remove(key)
         self.stats.invalidations += 1
         return True
         
@@ -282,9 +467,9 @@ class CacheStore:
         import fnmatch
         return fnmatch.fnmatch(key, pattern)
         
-    def _needs_eviction(self, new_size: int) -> bool:
+    def _needs_eviction(self, new_size: int, new_entry: bool = True) -> bool:
         """Проверка необходимости вытеснения"""
-        if self.config.max_entries > 0 and len(self.entries) >= self.config.max_entries:
+        if new_entry and self.config.max_entries > 0 and len(self.entries) >= self.config.max_entries:
             return True
             
         if self.config.max_bytes > 0 and self.current_bytes + new_size > self.config.max_bytes:
@@ -292,52 +477,101 @@ class CacheStore:
             
         return False
         
-    async def _evict(self):
-        """Вытеснение записи"""
-        if not self.entries:
-            return
+    def _make_room(self, key: str, size: int, existing: Optional[CacheEntry]) -> bool:
+        """Вытеснение под новую запись; False, если фильтр допуска отклонил ключ
+        
+        Старая версия перезаписываемого ключа снимается заранее: она не занимает
+        место и не может стать жертвой, set() вставляет запись заново.
+        """
+        new_entry = existing is None
+        if existing is not None:
+            del self.entries[key]
+            self.current_bytes -= existing.size_bytes
+        checked_admission = False
+        
+        while self._needs_eviction(size):
+            victim = self._select_victim(exclude=key)
+            if victim is None:
+                break
+            # TinyLFU: новый ключ вытесняет жертву, только если встречается чаще
+            if self.sketch and new_entry and not checked_admission:
+                if self.sketch.estimate(key) <= self.sketch.estimate(victim):
+                    return False
+                checked_admission = True
+            self._remove(victim)
+            self.stats.evictions += 1
             
-        key_to_evict = None
+        return True
         
-        if self.config.eviction_policy == EvictionPolicy.LRU:
-            # Remove oldest (first in OrderedDict)
-            key_to_evict = next(iter(self.entries))
+    def _select_victim(self, exclude: Optional[str] = None) -> Optional[str]:
+        """Выбор записи для вытеснения"""
+        if not self.entries:
+            return None
             
-        elif self.config.eviction_policy == EvictionPolicy.LFU:
-            # Remove least frequently used
-            min_freq = min(self.frequency.values()) if self.frequency else 0
-            for key, freq in self.frequency.items():
-                if freq == min_freq:
-                    key_to_evict = key
-                    break
-                    
-        elif self.config.eviction_policy == EvictionPolicy.FIFO:
-            key_to_evict = next(iter(self.entries))
-            
-        elif self.config.eviction_policy == EvictionPolicy.TTL:
-            # Remove entry closest to expiration
-            min_expires = None
-            for key, entry in self.entries.items():
-                if entry.expires_at:
-                    if min_expires is None or entry.expires_at < min_expires:
-                        min_expires = entry.expires_at
-                        key_to_evict = key
-            if not key_to_evict:
-                key_to_evict = next(iter(self.entries))
+        policy = self.config.eviction_policy
+        
+        if policy == EvictionPolicy.LFU:
+            # Частоты перезаписываемого ключа сохраняются в списке
+            return self.frequency.victim(exclude)
+            
+        if policy == EvictionPolicy.TTL:
+            # Entry closest to expiration
+            heap = self.expiry_heap
+            while heap:
+                deadline, key = heap[0]
+                entry = self.entries.get(key)
+                if entry is not None and entry.deadline == deadline:
+                    return key
+                heapq.heappop(heap)
                 
-        elif self.config.eviction_policy == EvictionPolicy.RANDOM:
-            key_to_evict = random.choice(list(self.entries.keys()))
+        elif policy == EvictionPolicy.RANDOM:
+            return random.choice(list(self.entries.keys()))
             
+        # LRU / FIFO / entries without TTL: oldest first
+        return next(iter(self.entries))
+        
+    async def _evict(self):
+        """Вытеснение записи"""
+        key_to_evict = self._select_victim()
         if key_to_evict:
-            entry = self.entries[key_to_evict]
-            self.current_bytes -= entry.size_bytes
-            del self.entries[key_to_evict]
-            
-            if key_to_evict in self.frequency:
-                del self.frequency[key_to_evict]
-                
+            self._remove(key_to_evict)
             self.stats.evictions += 1
             
+    def _remove(self, key: str):
+        entry = self.entries.pop(key)
+        self.current_bytes -= entry.size_bytes
+        if self.config.eviction_policy == EvictionPolicy.LFU:
+            self.frequency.remove(key)
+            
+    def _schedule(self, deadline: float, key: str):
+        heap = self.expiry_heap
+        heapq.heappush(heap, (deadline, key))
+        # Перезаписи оставляют устаревшие элементы — периодически пересобираем кучу
+        if len(heap) > 2 * len(self.entries) + 1024:
+            self.expiry_heap = [(e.deadline, k) for k, e in self.entries.items() if e.deadline]
+            heapq.heapify(self.expiry_heap)
+            
+    def expire(self, now: float = None, limit: int = 0) -> int:
+        """Удаление истёкших записей по куче сроков (limit — не больше N за вызов)"""
+        now = now or time.monotonic()
+        heap = self.expiry_heap
+        entries = self.entries
+        count = 0
+        
+        while heap and heap[0][0] <= now:
+            deadline, key = heapq.heappop(heap)
+            entry = entries.get(key)
+            if entry is None or entry.deadline != deadline:
+                continue
+            entry.state = CacheState.EXPIRED
+            self._remove(key)
+            count += 1
+            if limit and count >= limit:
+                break
+                
+        self.stats.expirations += count
+        return count
+        
     def _update_read_latency(self, latency: float):
         """Обновление latency чтения"""
         total_reads = self.stats.hits + self.stats.misses
@@ -353,17 +587,7 @@ class CacheStore:
         
     async def cleanup_expired(self) -> int:
         """Очистка истёкших записей"""
-        now = datetime.now()
-        keys_to_delete = []
-        
-        for key, entry in self.entries.items():
-            if entry.expires_at and entry.expires_at < now:
-                keys_to_delete.append(key)
-                
-        for key in keys_to_delete:
-            await self.delete(key)
-            
-        return len(keys_to_delete)
+        return self.expire()
         
     def get_stats(self) -> Dict[str, Any]:
         """Получение статистики"""
@@ -378,6 +602,8 @@ class CacheStore:
             "hit_rate": hit_rate,
             "writes": self.stats.writes,
             "evictions": self.stats.evictions,
+            "expirations": self.stats.expirations,
+            "admissions_rejected": self.stats.admissions_rejected,
             "invalidations": self.stats.invalidations,
             "avg_read_latency_ms": self.stats.avg_read_latency_ms,
             "avg_write_latency_ms": self.stats.avg_write_latency_ms
@@ -389,6 +615,7 @@ class CacheManager:
     
     def __init__(self):
         self.stores: Dict[CacheLevel, CacheStore] = {}
+        self.ordered_stores: List[Tuple[CacheLevel, CacheStore]] = []
         self.key_locations: Dict[str, List[CacheLevel]] = {}
         
         # Write-back queue
@@ -401,6 +628,7 @@ class CacheManager:
         """Добавление уровня кэша"""
         store = CacheStore(config)
         self.stores[config.level] = store
+        self.ordered_stores = sorted(self.stores.items(), key=lambda item: item[0].value)
         return store
         
     def set_origin_loader(self, loader: Callable):
@@ -411,8 +639,7 @@ class CacheManager:
                  load_from_origin: bool = True) -> Optional[Any]:
         """Получение значения"""
         # Check each level
-        for level in sorted(self.stores.keys(), key=lambda x: x.value):
-            store = self.stores[level]
+        for level, store in self.ordered_stores:
             entry = await store.get(key)
             
             if entry:
@@ -498,11 +725,10 @@ class CacheManager:
                                     entry: CacheEntry,
                                     found_level: CacheLevel):
         """Заполнение верхних уровней"""
-        for level in sorted(self.stores.keys(), key=lambda x: x.value):
+        for level, store in self.ordered_stores:
             if level.value >= found_level.value:
                 break
                 
-            store = self.stores[level]
             await store.set(key, entry.value, entry.ttl_seconds, entry.tags)
             
     async def flush_write_back(self):
@@ -15,11 +15,12 @@ Server Init - Iteration 287: Database Connection Pool Platform
 """
 
 import asyncio
+import bisect
 import random
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Callable
+from typing import Dict, List, Optional, Any, Callable, Tuple, Union
 from enum import Enum
 import uuid
 from collections import deque
@@ -174,6 +175,61 @@ class PoolConfig:
     # Retry
     max_retries: int = 3
     retry_delay_ms: int = 1000
+    
+    # Waiters
+    fair: bool = True  # FIFO: new callers never jump ahead of queued waiters
+    max_waiters: int = 1000  # 0 = unlimited
+    
+    # Background maintenance
+    min_idle: int = 2
+    maintenance_interval_ms: int = 1000
+
+
+# Acquire latency histogram
+ACQUIRE_LATENCY_BUCKETS_MS = [0.1, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+
+class LatencyHistogram:
+    """Гистограмма латентности с фиксированными бакетами"""
+    
+    def __init__(self, boundaries: List[float] = None):
+        self.boundaries = boundaries or ACQUIRE_LATENCY_BUCKETS_MS
+        self.counts = [0] * (len(self.boundaries) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+        
+    def record(self, value_ms: float):
+        self.counts[bisect.bisect_left(self.boundaries, value_ms)] += 1
+        self.count += 1
+        self.sum_ms += value_ms
+        if value_ms > self.max_ms:
+            self.max_ms = value_ms
+            
+    def percentile(self, q: float) -> float:
+        """Верхняя граница бакета, содержащего перцентиль"""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(self.count * q + 0.5))
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.boundaries[i], self.max_ms) if i < len(self.boundaries) else self.max_ms
+        return self.max_ms
+        
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg": self.sum_ms / self.count if self.count else 0.0,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": self.max_ms,
+            "buckets": {
+                f"le_{b}": c for b, c in zip(self.boundaries + ["inf"], self.counts)
+            }
+        }
 
 
 class ConnectionPool:
@@ -188,9 +244,16 @@ class ConnectionPool:
         # Connections
         self.idle_connections: deque[Connection] = deque()
         self.active_connections: Dict[str, Connection] = {}
+        self.validating_connections: Dict[str, Connection] = {}
+        self.pending_creates: int = 0
         
-        # Waiters
+        # Waiters (FIFO, completed directly by release)
         self.waiters: deque[asyncio.Future] = deque()
+        self.waiting: int = 0
+        
+        # Background tasks
+        self.maintenance_task: Optional[asyncio.Task] = None
+        self.background_tasks: set = set()
         
         # Stats
         self.connections_created: int = 0
@@ -198,24 +261,49 @@ class ConnectionPool:
         self.acquires_total: int = 0
         self.acquires_failed: int = 0
         self.timeouts: int = 0
+        self.rejections: int = 0
+        self.validations: int = 0
+        self.acquire_latency = LatencyHistogram()
         
         # Prepared statements
         self.prepared_statements: Dict[str, PreparedStatement] = {}
         
+    @property
+    def total_connections(self) -> int:
+        return (len(self.idle_connections) + len(self.active_connections) +
+                len(self.validating_connections) + self.pending_creates)
+        
     async def start(self):
         """Запуск пула"""
         self.state = PoolState.RUNNING
         
         # Create minimum connections
-        for _ in range(self.config.min_connections):
-            conn = await self._create_connection()
+        conns = await asyncio.gather(*(
+            self._create_connection() for _ in range(self.config.min_connections)
+        ))
+        for conn in conns:
             if conn:
                 self.idle_connections.append(conn)
                 
+        self.maintenance_task = asyncio.create_task(self._maintenance_loop())
+                
     async def stop(self):
         """Остановка пула"""
         self.state = PoolState.DRAINING
         
+        if self.maintenance_task:
+            self.maintenance_task.cancel()
+            self.maintenance_task = None
+        for task in list(self.background_tasks):
+            task.cancel()
+            
+        # Fail queued waiters
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+        self.waiting = 0
+        
         # Close all connections
         for conn in list(self.idle_connections):
             await self._close_connection(conn)
@@ -231,42 +319,50 @@ class ConnectionPool:
             return None
             
         timeout = timeout_ms or self.config.acquire_timeout_ms
-        deadline = datetime.now() + timedelta(milliseconds=timeout)
+        started = time.perf_counter()
         
         self.acquires_total += 1
         
-        while datetime.now() < deadline:
-            # Try to get idle connection
-            if self.idle_connections:
-                conn = self.idle_connections.popleft()
-                
-                # Validate if needed
-                if await self._should_validate(conn):
-                    if not await self._validate_connection(conn):
-                        await self._close_connection(conn)
-                        continue
-                        
-                conn.state = ConnectionState.ACTIVE
-                conn.last_used = datetime.now()
-                self.active_connections[conn.connection_id] = conn
-                
-                return conn
-                
-            # Try to create new connection
-            total = len(self.idle_connections) + len(self.active_connections)
-            if total < self.config.max_connections:
-                conn = await self._create_connection()
-                if conn:
-                    conn.state = ConnectionState.ACTIVE
-                    self.active_connections[conn.connection_id] = conn
-                    return conn
-                    
-            # Wait for connection
-            await asyncio.sleep(0.01)
+        # Fast path: idle connection, unless fairness requires queueing
+        if self.idle_connections and (not self.config.fair or not self.waiting):
+            conn = self.idle_connections.popleft()
+            self._activate(conn)
+            self.acquire_latency.record((time.perf_counter() - started) * 1000)
+            return conn
             
-        self.acquires_failed += 1
-        self.timeouts += 1
-        return None
+        # Fast rejection
+        if self.config.max_waiters and self.waiting >= self.config.max_waiters:
+            self.acquires_failed += 1
+            self.rejections += 1
+            return None
+            
+        # Queue as waiter; a new connection (if allowed) goes to the head waiter
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self.waiting += 1
+        self._ensure_capacity()
+        
+        try:
+            conn = await asyncio.wait_for(waiter, timeout / 1000)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # Handed a connection just as we gave up
+                if waiter.result() is not None:
+                    await self.release(waiter.result())
+            else:
+                self.waiting -= 1
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.acquires_failed += 1
+            self.timeouts += 1
+            return None
+            
+        if conn is None:
+            self.acquires_failed += 1
+            return None
+            
+        self.acquire_latency.record((time.perf_counter() - started) * 1000)
+        return conn
         
     async def release(self, conn: Connection):
         """Возврат соединения"""
@@ -274,17 +370,109 @@ class ConnectionPool:
             return
             
         del self.active_connections[conn.connection_id]
+        conn.in_transaction = False
         
         # Check if connection should be closed
-        if await self._should_close(conn):
+        if self.state != PoolState.RUNNING or await self._should_close(conn):
             await self._close_connection(conn)
+            self._ensure_capacity()
+            return
+            
+        self._hand_off(conn)
+        
+    def _activate(self, conn: Connection):
+        conn.state = ConnectionState.ACTIVE
+        conn.last_used = datetime.now()
+        self.active_connections[conn.connection_id] = conn
+        
+    def _hand_off(self, conn: Connection):
+        """Передача соединения первому ожидающему или возврат в idle"""
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if waiter.done():
+                continue
+            self.waiting -= 1
+            self._activate(conn)
+            waiter.set_result(conn)
             return
             
-        # Return to pool
         conn.state = ConnectionState.IDLE
-        conn.in_transaction = False
         self.idle_connections.append(conn)
         
+    def _ensure_capacity(self):
+        """Создание соединений для ожидающих в пределах max_connections"""
+        if self.state != PoolState.RUNNING:
+            return
+        while self.idle_connections and self.waiting:
+            self._hand_off(self.idle_connections.popleft())
+        while (self.pending_creates < self.waiting and
+               self.total_connections < self.config.max_connections):
+            self.pending_creates += 1
+            self._spawn(self._create_for_waiter())
+            
+    async def _create_for_waiter(self):
+        try:
+            conn = await self._create_connection()
+        finally:
+            self.pending_creates -= 1
+            
+        if conn is None:
+            self._ensure_capacity()
+        elif self.state == PoolState.RUNNING:
+            self._hand_off(conn)
+        else:
+            await self._close_connection(conn)
+            
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        
+    async def _maintenance_loop(self):
+        """Фоновая валидация, закрытие устаревших и прогрев min_idle"""
+        while self.state == PoolState.RUNNING:
+            await asyncio.sleep(self.config.maintenance_interval_ms / 1000)
+            await self.run_maintenance()
+            
+    async def run_maintenance(self):
+        """Один проход обслуживания пула вне пути acquire"""
+        # Validate / retire idle connections. A candidate leaves the idle deque
+        # before any await, so a concurrent acquire() cannot take it mid-check
+        for conn in list(self.idle_connections):
+            if conn not in self.idle_connections:
+                continue
+            self.idle_connections.remove(conn)
+            self.validating_connections[conn.connection_id] = conn
+            try:
+                if await self._should_close(conn):
+                    keep = False
+                elif await self._should_validate(conn):
+                    keep = await self._validate_connection(conn)
+                else:
+                    keep = True
+            finally:
+                del self.validating_connections[conn.connection_id]
+                
+            if keep and self.state == PoolState.RUNNING:
+                self._hand_off(conn)
+            else:
+                await self._close_connection(conn)
+                    
+        # Warm up to min_idle
+        shortfall = min(
+            self.config.min_idle - len(self.idle_connections) - self.pending_creates,
+            self.config.max_connections - self.total_connections
+        )
+        if shortfall > 0 and self.state == PoolState.RUNNING:
+            self.pending_creates += shortfall
+            conns = await asyncio.gather(*(self._create_connection() for _ in range(shortfall)))
+            self.pending_creates -= shortfall
+            for conn in conns:
+                if conn:
+                    self._hand_off(conn)
+                    
+        self._ensure_capacity()
+        
     async def _create_connection(self) -> Optional[Connection]:
         """Создание соединения"""
         # Simulate connection
@@ -313,13 +501,16 @@ class ConnectionPool:
             
     async def _validate_connection(self, conn: Connection) -> bool:
         """Валидация соединения"""
+        previous_state = conn.state
         conn.state = ConnectionState.VALIDATING
+        self.validations += 1
         
         # Simulate validation
         await asyncio.sleep(0.005)
         
         if random.random() < 0.98:  # 98% success
             conn.last_validated = datetime.now()
+            conn.state = previous_state
             return True
             
         conn.state = ConnectionState.BROKEN
@@ -332,6 +523,9 @@ class ConnectionPool:
         
     async def _should_close(self, conn: Connection) -> bool:
         """Проверка необходимости закрытия"""
+        if conn.state == ConnectionState.BROKEN:
+            return True
+            
         # Check max lifetime
         age = (datetime.now() - conn.created_at).total_seconds() * 1000
         if age > self.config.max_lifetime_ms:
@@ -341,8 +535,7 @@ class ConnectionPool:
         idle = (datetime.now() - conn.last_used).total_seconds() * 1000
         if idle > self.config.idle_timeout_ms:
             # Keep minimum connections
-            total = len(self.idle_connections) + len(self.active_connections)
-            if total > self.config.min_connections:
+            if self.total_connections > self.config.min_connections:
                 return True
                 
         return False
@@ -354,12 +547,17 @@ class ConnectionPool:
             "state": self.state.value,
             "idle": len(self.idle_connections),
             "active": len(self.active_connections),
-            "total": len(self.idle_connections) + len(self.active_connections),
+            "validating": len(self.validating_connections),
+            "total": self.total_connections,
+            "waiting": self.waiting,
             "created": self.connections_created,
             "closed": self.connections_closed,
             "acquires": self.acquires_total,
             "failures": self.acquires_failed,
-            "timeouts": self.timeouts
+            "timeouts": self.timeouts,
+            "rejections": self.rejections,
+            "validations": self.validations,
+            "acquire_latency_ms": self.acquire_latency.to_dict()
         }
 
 
@@ -457,19 +655,7 @@ class DatabaseConnectionManager:
                 query.rows_affected = random.randint(0, 100)
                 query.finished_at = datetime.now()
                 query.execution_time_ms = (time.time() - start_time) * 1000
-                
-                # Update stats
-                conn.queries_executed += 1
-                conn.total_time_ms += query.execution_time_ms
-                
-                pool.instance.queries_total += 1
-                self._update_instance_latency(pool.instance, query.execution_time_ms)
-                
-                self.queries_total += 1
-                if query_type == QueryType.READ:
-                    self.queries_read += 1
-                else:
-                    self.queries_write += 1
+                self._record_query(pool, conn, query)
             else:
                 raise Exception("Query execution failed")
                 
@@ -483,6 +669,71 @@ class DatabaseConnectionManager:
             
         return query
         
+    async def execute_pipeline(self, statements: List[Union[str, Tuple[str, List[Any]]]],
+                               query_type: QueryType = None) -> List[Query]:
+        """Конвейерное выполнение пакета запросов на одном соединении"""
+        queries = []
+        for statement in statements:
+            sql, params = (statement, []) if isinstance(statement, str) else statement
+            queries.append(Query(
+                query_id=f"query_{uuid.uuid4().hex[:8]}",
+                sql=sql,
+                query_type=query_type or self._detect_query_type(sql),
+                params=params or []
+            ))
+        if not queries:
+            return []
+            
+        # Reads-only pipelines may go to replicas
+        all_reads = all(q.query_type == QueryType.READ for q in queries)
+        pool = self._select_pool(QueryType.READ if all_reads else QueryType.WRITE)
+        if not pool:
+            raise Exception("No available database pool")
+            
+        conn = await pool.acquire()
+        if not conn:
+            raise Exception("Failed to acquire connection")
+            
+        try:
+            start_time = time.time()
+            
+            # Simulate one round trip for the whole pipeline plus server-side work
+            await asyncio.sleep(random.uniform(0.005, 0.05) + 0.0005 * len(queries))
+            
+            for query in queries:
+                if random.random() >= 0.98:
+                    # Remaining statements of the pipeline are aborted
+                    raise Exception(f"Query execution failed: {query.sql}")
+                    
+                query.rows_affected = random.randint(0, 100)
+                query.finished_at = datetime.now()
+                query.execution_time_ms = (time.time() - start_time) * 1000
+                self._record_query(pool, conn, query)
+                
+        except Exception as e:
+            pool.instance.queries_failed += 1
+            self.queries_failed += 1
+            raise
+            
+        finally:
+            await pool.release(conn)
+            
+        return queries
+        
+    def _record_query(self, pool: ConnectionPool, conn: Connection, query: Query):
+        """Учёт успешно выполненного запроса"""
+        conn.queries_executed += 1
+        conn.total_time_ms += query.execution_time_ms
+        
+        pool.instance.queries_total += 1
+        self._update_instance_latency(pool.instance, query.execution_time_ms)
+        
+        self.queries_total += 1
+        if query.query_type == QueryType.READ:
+            self.queries_read += 1
+        else:
+            self.queries_write += 1
+        
     async def execute_transaction(self, queries: List[str]) -> List[Query]:
         """Выполнение транзакции"""
         if not self.primary_pool:
@@ -609,10 +860,7 @@ class DatabaseConnectionManager:
                 
     def get_statistics(self) -> Dict[str, Any]:
         """Статистика менеджера"""
-        total_connections = sum(
-            len(p.idle_connections) + len(p.active_connections)
-            for p in self.pools.values()
-        )
+        total_connections = sum(p.total_connections for p in self.pools.values())
         
         healthy_instances = sum(1 for i in self.instances.values() if i.healthy)
         
@@ -725,10 +973,37 @@ async def main():
         else:
             sql = f"UPDATE products SET views = views + 1 WHERE id = {random.randint(1, 1000)}"
             
-        await manager.execute(sql, query_type=query_type)
+        try:
+            await manager.execute(sql, query_type=query_type)
+        except Exception:
+            pass
         
     print(f"  ✓ Executed 100 bulk queries")
     
+    # Pipelined batch on one connection
+    pipeline = [
+        (f"SELECT * FROM products WHERE id = {i}", []) for i in range(20)
+    ]
+    try:
+        results = await manager.execute_pipeline(pipeline)
+        print(f"  ✓ Pipelined {len(results)} queries in {results[-1].execution_time_ms:.1f}ms")
+    except Exception as e:
+        print(f"  ✗ Pipeline aborted: {e}")
+        
+    # Contention: many concurrent callers served FIFO
+    print("\n⏳ Concurrent Acquire (FIFO waiters)...")
+    
+    async def worker(i: int):
+        try:
+            await manager.execute(f"SELECT * FROM orders WHERE id = {i}", query_type=QueryType.WRITE)
+        except Exception:
+            pass
+            
+    await asyncio.gather(*(worker(i) for i in range(200)))
+    latency = manager.primary_pool.get_stats()["acquire_latency_ms"]
+    print(f"  ✓ 200 concurrent writes: acquire p50={latency['p50']}ms "
+          f"p99={latency['p99']}ms max={latency['max']:.1f}ms")
+    
     # Health check
     print("\n💚 Health Check...")
     
@@ -820,6 +1095,8 @@ async def main():
     print(f"  Idle Timeout: {pool_config.idle_timeout_ms}ms")
     print(f"  Max Lifetime: {pool_config.max_lifetime_ms}ms")
     print(f"  Validation Interval: {pool_config.validation_interval_ms}ms")
+    print(f"  Fair Queueing: {pool_config.fair}")
+    print(f"  Max Waiters: {pool_config.max_waiters}")
     
     # Overall statistics
     print("\n📈 Overall Statistics:")
@@ -849,6 +1126,9 @@ async def main():
     print(f"│ Read/Write Ratio:              {read_pct:.0f}%/{write_pct:.0f}%                           │")
     print("└────────────────────────────────────────────────────────────────────┘")
     
+    for pool in manager.pools.values():
+        await pool.stop()
+        
     print("\n" + "=" * 60)
     print("Database Connection Pool Platform initialized!")
     print("=" * 60)
@@ -16,9 +16,12 @@ Server Init - Iteration 341: Policy Engine Platform
 
 import asyncio
 import random
+import sys
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Set, Callable
+from typing import Dict, List, Optional, Any, Set, Callable, Tuple
 from enum import Enum
 import uuid
 import json
@@ -302,12 +305,15 @@ class EvaluationResult:
 @dataclass
 class CacheEntry:
     """Запись кэша"""
-    cache_key: str
+    cache_key: Any
     
     # Result
     decision: DecisionResult = DecisionResult.NOT_APPLICABLE
     policy_id: str = ""
     
+    # Policy epoch the decision was computed against
+    epoch: int = 0
+    
     # TTL
     expires_at: datetime = field(default_factory=lambda: datetime.now() + timedelta(minutes=5))
     
@@ -374,22 +380,267 @@ class PolicyVersion:
     created_at: datetime = field(default_factory=datetime.now)
 
 
+# Decision index / cache
+DEFAULT_INDEX_ATTRIBUTES = ("resource.resource_type", "action.action", "subject.user_role")
+DEFAULT_CACHE_MAX_ENTRIES = 10000
+MAX_INDEX_FANOUT = 64
+WILDCARD = object()
+CACHE_TTL_SECONDS = 300
+
+
+def attribute_getter(attribute_name: str) -> Callable[[EvaluationContext], Any]:
+    """Компиляция пути атрибута (category.name) в функцию чтения из контекста"""
+    parts = attribute_name.split(".", 1)
+    if len(parts) == 2:
+        category, name = parts
+    else:
+        category, name = "subject", parts[0]
+        
+    if category == "subject":
+        return lambda context: context.subject_attributes.get(name)
+    if category == "resource":
+        return lambda context: context.resource_attributes.get(name)
+    if category == "action":
+        return lambda context: context.action_attributes.get(name)
+    if category == "environment":
+        return lambda context: context.environment_attributes.get(name)
+    return lambda context: context.custom_attributes.get(attribute_name)
+
+
+def compile_condition(condition: Condition) -> Callable[[EvaluationContext], bool]:
+    """Компиляция условия в синхронный предикат"""
+    get = attribute_getter(condition.attribute_name)
+    op = condition.operator
+    value = condition.value
+    values = condition.values
+    
+    if op == Operator.EQUALS:
+        test = lambda v: v == value
+    elif op == Operator.NOT_EQUALS:
+        test = lambda v: v != value
+    elif op == Operator.GREATER_THAN:
+        test = lambda v: v is not None and v > value
+    elif op == Operator.LESS_THAN:
+        test = lambda v: v is not None and v < value
+    elif op == Operator.GREATER_OR_EQUAL:
+        test = lambda v: v is not None and v >= value
+    elif op == Operator.LESS_OR_EQUAL:
+        test = lambda v: v is not None and v <= value
+    elif op == Operator.CONTAINS:
+        test = lambda v: value in str(v) if v else False
+    elif op == Operator.NOT_CONTAINS:
+        test = lambda v: value not in str(v) if v else True
+    elif op == Operator.STARTS_WITH:
+        test = lambda v: str(v).startswith(value) if v else False
+    elif op == Operator.ENDS_WITH:
+        test = lambda v: str(v).endswith(value) if v else False
+    elif op in (Operator.IN, Operator.NOT_IN):
+        try:
+            members = frozenset(values)
+        except TypeError:
+            members = list(values)
+        test = (lambda v: v in members) if op == Operator.IN else (lambda v: v not in members)
+    elif op == Operator.MATCHES:
+        pattern = re.compile(value)
+        test = lambda v: pattern.match(str(v)) is not None if v else False
+    elif op == Operator.IS_NULL:
+        test = lambda v: v is None
+    elif op == Operator.IS_NOT_NULL:
+        test = lambda v: v is not None
+    elif op == Operator.IS_BETWEEN and isinstance(values, list) and len(values) == 2:
+        low, high = values
+        test = lambda v: v is not None and low <= v <= high
+    else:
+        test = lambda v: False
+        
+    if condition.negate:
+        return lambda context: not test(get(context))
+    return lambda context: test(get(context))
+
+
+def compile_conditions(conditions: List[Condition]) -> Callable[[EvaluationContext], bool]:
+    """Компиляция списка условий (AND логика)"""
+    predicates = tuple(compile_condition(c) for c in conditions)
+    if not predicates:
+        return lambda context: True
+    if len(predicates) == 1:
+        return predicates[0]
+        
+    def check(context: EvaluationContext) -> bool:
+        for predicate in predicates:
+            if not predicate(context):
+                return False
+        return True
+    return check
+
+
+def temporal_ok(rule: Rule, now: datetime) -> bool:
+    """Проверка временных ограничений правила"""
+    if rule.valid_from and now < rule.valid_from:
+        return False
+    if rule.valid_until and now > rule.valid_until:
+        return False
+    if rule.allowed_hours and now.hour not in rule.allowed_hours:
+        return False
+    if rule.allowed_days and now.weekday() not in rule.allowed_days:
+        return False
+    return True
+
+
+class CompiledPolicy:
+    """Скомпилированная политика: предикаты таргета и правил"""
+    __slots__ = ("policy", "target", "rules", "sort_key")
+    
+    def __init__(self, policy: Policy, rules: List[Rule], seq: int):
+        self.policy = policy
+        self.target = compile_conditions(policy.target_conditions)
+        self.rules = tuple((rule, compile_conditions(rule.conditions)) for rule in rules)
+        self.sort_key = (-policy.priority, seq)
+        
+        
+class PolicyIndex:
+    """Индекс активных политик по атрибутам таргета
+    
+    Ключ постинга — кортеж значений индексируемых атрибутов, взятых из
+    условий EQUALS/IN таргета; атрибут без такого условия даёт WILDCARD.
+    Политики без индексируемых условий хранятся в unindexed и проверяются
+    всегда.
+    """
+    
+    def __init__(self, attributes: Tuple[str, ...] = DEFAULT_INDEX_ATTRIBUTES):
+        self.attributes = tuple(attributes)
+        self.getters = tuple(attribute_getter(a) for a in self.attributes)
+        self.postings: Dict[Tuple[Any, ...], Dict[str, CompiledPolicy]] = {}
+        self.unindexed: Dict[str, CompiledPolicy] = {}
+        self.placement: Dict[str, List[Tuple[Any, ...]]] = {}
+        
+        # Wildcard masks in use -> policy count
+        self.masks: Dict[Tuple[bool, ...], int] = {}
+        
+    def _target_keys(self, policy: Policy) -> List[Optional[Tuple[Any, ...]]]:
+        keys: List[Optional[Tuple[Any, ...]]] = []
+        for attribute in self.attributes:
+            found = None
+            for condition in policy.target_conditions:
+                if condition.negate or condition.attribute_name != attribute:
+                    continue
+                if condition.operator == Operator.EQUALS:
+                    found = (condition.value,)
+                elif condition.operator == Operator.IN:
+                    found = tuple(dict.fromkeys(condition.values))
+                else:
+                    continue
+                try:
+                    for value in found:
+                        hash(value)
+                except TypeError:
+                    found = None
+                    continue
+                break
+            keys.append(found)
+            
+        # Bound cartesian fan-out of IN conditions
+        while True:
+            fanout = 1
+            for k in keys:
+                if k is not None:
+                    fanout *= len(k)
+            if fanout <= MAX_INDEX_FANOUT:
+                return keys
+            widest = max(range(len(keys)), key=lambda i: len(keys[i]) if keys[i] is not None else 0)
+            keys[widest] = None
+            
+    def add(self, compiled: CompiledPolicy):
+        policy_id = compiled.policy.policy_id
+        self.remove(policy_id)
+        
+        keys = self._target_keys(compiled.policy)
+        if all(k is None for k in keys):
+            self.unindexed[policy_id] = compiled
+            self.placement[policy_id] = []
+            return
+            
+        mask = tuple(k is not None for k in keys)
+        self.masks[mask] = self.masks.get(mask, 0) + 1
+        
+        posting_keys = [()]
+        for k in keys:
+            posting_keys = [prefix + (value,) for prefix in posting_keys for value in (k or (WILDCARD,))]
+        for posting_key in posting_keys:
+            self.postings.setdefault(posting_key, {})[policy_id] = compiled
+        self.placement[policy_id] = posting_keys
+        
+    def remove(self, policy_id: str):
+        posting_keys = self.placement.pop(policy_id, None)
+        if posting_keys is None:
+            return
+        if not posting_keys:
+            self.unindexed.pop(policy_id, None)
+            return
+            
+        mask = tuple(v is not WILDCARD for v in posting_keys[0])
+        self.masks[mask] -= 1
+        if not self.masks[mask]:
+            del self.masks[mask]
+            
+        for posting_key in posting_keys:
+            bucket = self.postings.get(posting_key)
+            if bucket is not None:
+                bucket.pop(policy_id, None)
+                if not bucket:
+                    del self.postings[posting_key]
+                    
+    def candidates(self, context: EvaluationContext) -> List[CompiledPolicy]:
+        found = list(self.unindexed.values())
+        values = [get(context) for get in self.getters]
+        postings = self.postings
+        
+        for mask in self.masks:
+            key = []
+            for used, value in zip(mask, values):
+                if not used:
+                    key.append(WILDCARD)
+                elif value is None:
+                    break
+                else:
+                    key.append(value)
+            else:
+                try:
+                    bucket = postings.get(tuple(key))
+                except TypeError:
+                    continue
+                if bucket:
+                    found.extend(bucket.values())
+        return found
+        
+    def __len__(self) -> int:
+        return len(self.placement)
+
+
 class PolicyEngine:
     """Движок политик"""
     
-    def __init__(self):
+    def __init__(self, index_attributes: Tuple[str, ...] = DEFAULT_INDEX_ATTRIBUTES,
+                 cache_max_entries: int = DEFAULT_CACHE_MAX_ENTRIES):
         self.attributes: Dict[str, AttributeDefinition] = {}
         self.rules: Dict[str, Rule] = {}
         self.policies: Dict[str, Policy] = {}
         self.policy_sets: Dict[str, PolicySet] = {}
-        self.cache: Dict[str, CacheEntry] = {}
+        self.cache: "OrderedDict[Any, CacheEntry]" = OrderedDict()
+        self.cache_max_entries = cache_max_entries
         self.audit_records: List[AuditRecord] = []
         self.versions: Dict[str, List[PolicyVersion]] = {}
         
+        # Compiled policies
+        self.index = PolicyIndex(index_attributes)
+        self.policy_order: Dict[str, int] = {}
+        self.policy_epoch = 0
+        
         # Stats
         self.total_evaluations = 0
         self.cache_hits = 0
         self.cache_misses = 0
+        self.cache_evictions = 0
         
     async def define_attribute(self, name: str,
                               attribute_type: AttributeType,
@@ -493,6 +744,7 @@ class PolicyEngine:
         )
         
         self.policies[policy.policy_id] = policy
+        self.policy_order[policy.policy_id] = len(self.policy_order)
         
         # Save version
         await self._save_version(policy, created_by, "Initial creation")
@@ -526,6 +778,9 @@ class PolicyEngine:
         policy.updated_by = activated_by
         policy.updated_at = datetime.now()
         
+        # Compile conditions and index the policy
+        self._compile_policy(policy)
+        
         # Clear cache for this policy
         await self._invalidate_cache()
         
@@ -542,15 +797,44 @@ class PolicyEngine:
         policy.updated_by = disabled_by
         policy.updated_at = datetime.now()
         
+        self.index.remove(policy_id)
+        
         # Clear cache
         await self._invalidate_cache()
         
         return True
         
+    def _compile_policy(self, policy: Policy) -> CompiledPolicy:
+        """Компиляция политики и добавление в индекс"""
+        rules = [self.rules[rule_id] for rule_id in policy.rule_ids if rule_id in self.rules]
+        compiled = CompiledPolicy(policy, rules, self.policy_order.get(policy.policy_id, 0))
+        self.index.add(compiled)
+        return compiled
+        
     async def evaluate(self, context: EvaluationContext,
                       use_cache: bool = True) -> EvaluationResult:
         """Оценка запроса"""
-        start_time = datetime.now()
+        result = self._evaluate_sync(context, use_cache)
+        
+        # Audit
+        await self._record_audit(context, result)
+        
+        return result
+        
+    async def evaluate_batch(self, contexts: List[EvaluationContext],
+                            use_cache: bool = True) -> List[EvaluationResult]:
+        """Пакетная оценка запросов (авторизация списков ресурсов)"""
+        results = [self._evaluate_sync(context, use_cache) for context in contexts]
+        
+        for context, result in zip(contexts, results):
+            await self._record_audit(context, result)
+            
+        return results
+        
+    def _evaluate_sync(self, context: EvaluationContext,
+                       use_cache: bool) -> EvaluationResult:
+        """Синхронное ядро оценки по скомпилированным политикам"""
+        start = time.perf_counter()
         self.total_evaluations += 1
         
         result = EvaluationResult(
@@ -558,213 +842,110 @@ class PolicyEngine:
         )
         
         # Check cache
+        cache_key = None
         if use_cache:
             cache_key = self._generate_cache_key(context)
             cached = self.cache.get(cache_key)
             
-            if cached and cached.expires_at > datetime.now():
+            if cached and cached.epoch == self.policy_epoch and cached.expires_at > datetime.now():
                 self.cache_hits += 1
                 cached.hit_count += 1
+                self.cache.move_to_end(cache_key)
                 
                 result.decision = cached.decision
                 result.policy_id = cached.policy_id
                 result.reason = "Cached decision"
-                result.evaluation_time_ms = (datetime.now() - start_time).total_seconds() * 1000
+                result.evaluation_time_ms = (time.perf_counter() - start) * 1000
                 
                 return result
             else:
                 self.cache_misses += 1
                 
         # Get applicable policies
-        applicable_policies = await self._get_applicable_policies(context)
-        result.evaluated_policies = len(applicable_policies)
+        applicable = [
+            compiled for compiled in self.index.candidates(context)
+            if compiled.policy.status == PolicyStatus.ACTIVE and compiled.target(context)
+        ]
+        result.evaluated_policies = len(applicable)
         
-        if not applicable_policies:
+        if not applicable:
             result.decision = DecisionResult.NOT_APPLICABLE
             result.reason = "No applicable policies"
         else:
-            # Sort by priority
-            applicable_policies.sort(key=lambda p: p.priority, reverse=True)
+            # Sort by priority, then creation order
+            applicable.sort(key=lambda c: c.sort_key)
             
-            # Evaluate policies
-            decisions = []
+            # Deny overrides: first deny wins, otherwise first permit
+            permit_policy = None
+            deny_policy = None
+            now = context.request_time
             
-            for policy in applicable_policies:
-                policy_result = await self._evaluate_policy(policy, context)
-                decisions.append((policy, policy_result))
-                result.evaluated_rules += 1
+            for compiled in applicable:
+                decision, evaluated = self._evaluate_compiled(compiled, context, now)
+                result.evaluated_rules += evaluated
                 
-            # Combine decisions
-            final_decision = await self._combine_decisions(decisions, CombiningAlgorithm.DENY_OVERRIDES)
-            result.decision = final_decision[0]
-            result.policy_id = final_decision[1].policy_id if final_decision[1] else ""
-            result.rule_id = final_decision[2]
-            
-            if result.decision == DecisionResult.PERMIT:
-                result.reason = f"Permitted by policy: {final_decision[1].name if final_decision[1] else 'N/A'}"
-            elif result.decision == DecisionResult.DENY:
-                result.reason = f"Denied by policy: {final_decision[1].name if final_decision[1] else 'N/A'}"
+                if decision == DecisionResult.DENY:
+                    deny_policy = compiled.policy
+                    break
+                if decision == DecisionResult.PERMIT and permit_policy is None:
+                    permit_policy = compiled.policy
+                    
+            if deny_policy:
+                result.decision = DecisionResult.DENY
+                result.policy_id = deny_policy.policy_id
+                result.reason = f"Denied by policy: {deny_policy.name}"
+            elif permit_policy:
+                result.decision = DecisionResult.PERMIT
+                result.policy_id = permit_policy.policy_id
+                result.reason = f"Permitted by policy: {permit_policy.name}"
                 
         # Calculate time
-        result.evaluation_time_ms = (datetime.now() - start_time).total_seconds() * 1000
+        result.evaluation_time_ms = (time.perf_counter() - start) * 1000
         
         # Cache result
         if use_cache:
-            cache_key = self._generate_cache_key(context)
             self.cache[cache_key] = CacheEntry(
                 cache_key=cache_key,
                 decision=result.decision,
-                policy_id=result.policy_id
+                policy_id=result.policy_id,
+                epoch=self.policy_epoch,
+                expires_at=datetime.now() + timedelta(seconds=CACHE_TTL_SECONDS)
             )
+            self.cache.move_to_end(cache_key)
             
-        # Audit
-        await self._record_audit(context, result)
-        
-        return result
-        
-    async def _get_applicable_policies(self, context: EvaluationContext) -> List[Policy]:
-        """Получение применимых политик"""
-        applicable = []
-        
-        for policy in self.policies.values():
-            if policy.status != PolicyStatus.ACTIVE:
-                continue
-                
-            # Check target conditions
-            if policy.target_conditions:
-                if await self._evaluate_conditions(policy.target_conditions, context):
-                    applicable.append(policy)
-            else:
-                applicable.append(policy)
+            while len(self.cache) > self.cache_max_entries:
+                self.cache.popitem(last=False)
+                self.cache_evictions += 1
                 
-        return applicable
+        return result
         
-    async def _evaluate_policy(self, policy: Policy, 
-                              context: EvaluationContext) -> DecisionResult:
-        """Оценка политики"""
+    def _evaluate_compiled(self, compiled: CompiledPolicy,
+                           context: EvaluationContext,
+                           now: datetime) -> Tuple[DecisionResult, int]:
+        """Оценка скомпилированной политики"""
         rule_results = []
+        evaluated = 0
         
-        for rule_id in policy.rule_ids:
-            rule = self.rules.get(rule_id)
-            if not rule or not rule.is_enabled:
+        for rule, predicate in compiled.rules:
+            if not rule.is_enabled:
                 continue
                 
             # Check temporal constraints
-            if not await self._check_temporal_constraints(rule, context):
+            if not temporal_ok(rule, now):
                 continue
                 
-            # Evaluate conditions
-            if await self._evaluate_conditions(rule.conditions, context):
+            evaluated += 1
+            if predicate(context):
                 rule_results.append((rule, rule.effect))
                 
         # Combine rule results
         if not rule_results:
-            return DecisionResult.NOT_APPLICABLE
+            return DecisionResult.NOT_APPLICABLE, evaluated
             
-        return await self._combine_rule_results(rule_results, policy.combining_algorithm)
-        
-    async def _evaluate_conditions(self, conditions: List[Condition],
-                                  context: EvaluationContext) -> bool:
-        """Оценка условий (AND логика)"""
-        for condition in conditions:
-            if not await self._evaluate_condition(condition, context):
-                return False
-        return True
+        return self._combine_rule_results(rule_results, compiled.policy.combining_algorithm), evaluated
         
-    async def _evaluate_condition(self, condition: Condition,
-                                 context: EvaluationContext) -> bool:
-        """Оценка отдельного условия"""
-        # Get attribute value from context
-        attr_value = await self._get_attribute_value(condition.attribute_name, context)
-        
-        result = False
-        
-        if condition.operator == Operator.EQUALS:
-            result = attr_value == condition.value
-        elif condition.operator == Operator.NOT_EQUALS:
-            result = attr_value != condition.value
-        elif condition.operator == Operator.GREATER_THAN:
-            result = attr_value is not None and attr_value > condition.value
-        elif condition.operator == Operator.LESS_THAN:
-            result = attr_value is not None and attr_value < condition.value
-        elif condition.operator == Operator.GREATER_OR_EQUAL:
-            result = attr_value is not None and attr_value >= condition.value
-        elif condition.operator == Operator.LESS_OR_EQUAL:
-            result = attr_value is not None and attr_value <= condition.value
-        elif condition.operator == Operator.CONTAINS:
-            result = condition.value in str(attr_value) if attr_value else False
-        elif condition.operator == Operator.NOT_CONTAINS:
-            result = condition.value not in str(attr_value) if attr_value else True
-        elif condition.operator == Operator.STARTS_WITH:
-            result = str(attr_value).startswith(condition.value) if attr_value else False
-        elif condition.operator == Operator.ENDS_WITH:
-            result = str(attr_value).endswith(condition.value) if attr_value else False
-        elif condition.operator == Operator.IN:
-            result = attr_value in condition.values
-        elif condition.operator == Operator.NOT_IN:
-            result = attr_value not in condition.values
-        elif condition.operator == Operator.MATCHES:
-            result = bool(re.match(condition.value, str(attr_value))) if attr_value else False
-        elif condition.operator == Operator.IS_NULL:
-            result = attr_value is None
-        elif condition.operator == Operator.IS_NOT_NULL:
-            result = attr_value is not None
-        elif condition.operator == Operator.IS_BETWEEN:
-            if isinstance(condition.values, list) and len(condition.values) == 2:
-                result = condition.values[0] <= attr_value <= condition.values[1]
-                
-        # Apply negation
-        if condition.negate:
-            result = not result
-            
-        return result
-        
-    async def _get_attribute_value(self, attribute_name: str,
-                                  context: EvaluationContext) -> Any:
-        """Получение значения атрибута из контекста"""
-        # Parse attribute name (format: category.name)
-        parts = attribute_name.split(".", 1)
-        
-        if len(parts) == 2:
-            category, name = parts
-        else:
-            category, name = "subject", parts[0]
-            
-        # Get from appropriate category
-        if category == "subject":
-            return context.subject_attributes.get(name)
-        elif category == "resource":
-            return context.resource_attributes.get(name)
-        elif category == "action":
-            return context.action_attributes.get(name)
-        elif category == "environment":
-            return context.environment_attributes.get(name)
-        else:
-            return context.custom_attributes.get(attribute_name)
-            
-    async def _check_temporal_constraints(self, rule: Rule,
-                                         context: EvaluationContext) -> bool:
-        """Проверка временных ограничений"""
-        now = context.request_time
-        
-        # Check validity period
-        if rule.valid_from and now < rule.valid_from:
-            return False
-        if rule.valid_until and now > rule.valid_until:
-            return False
-            
-        # Check allowed hours
-        if rule.allowed_hours and now.hour not in rule.allowed_hours:
-            return False
-            
-        # Check allowed days
-        if rule.allowed_days and now.weekday() not in rule.allowed_days:
-            return False
-            
-        return True
-        
-    async def _combine_rule_results(self, results: List[tuple],
-                                   algorithm: CombiningAlgorithm) -> DecisionResult:
+    def _combine_rule_results(self, results: List[tuple],
+                             algorithm: CombiningAlgorithm) -> DecisionResult:
         """Комбинирование результатов правил"""
         if algorithm == CombiningAlgorithm.DENY_OVERRIDES:
             # Any deny = deny
@@ -797,51 +978,25 @@ class PolicyEngine:
             
         return DecisionResult.NOT_APPLICABLE
         
-    async def _combine_decisions(self, decisions: List[tuple],
-                                algorithm: CombiningAlgorithm) -> tuple:
-        """Комбинирование решений политик"""
-        if not decisions:
-            return (DecisionResult.NOT_APPLICABLE, None, "")
-            
-        if algorithm == CombiningAlgorithm.DENY_OVERRIDES:
-            for policy, result in decisions:
-                if result == DecisionResult.DENY:
-                    return (DecisionResult.DENY, policy, "")
-            for policy, result in decisions:
-                if result == DecisionResult.PERMIT:
-                    return (DecisionResult.PERMIT, policy, "")
-                    
-        elif algorithm == CombiningAlgorithm.ALLOW_OVERRIDES:
-            for policy, result in decisions:
-                if result == DecisionResult.PERMIT:
-                    return (DecisionResult.PERMIT, policy, "")
-            for policy, result in decisions:
-                if result == DecisionResult.DENY:
-                    return (DecisionResult.DENY, policy, "")
-                    
-        elif algorithm == CombiningAlgorithm.FIRST_APPLICABLE:
-            if decisions:
-                return (decisions[0][1], decisions[0][0], "")
-                
-        elif algorithm == CombiningAlgorithm.HIGHEST_PRIORITY:
-            decisions.sort(key=lambda x: x[0].priority, reverse=True)
-            if decisions:
-                return (decisions[0][1], decisions[0][0], "")
-                
-        return (DecisionResult.NOT_APPLICABLE, None, "")
-        
-    def _generate_cache_key(self, context: EvaluationContext) -> str:
+    def _generate_cache_key(self, context: EvaluationContext) -> Any:
         """Генерация ключа кэша"""
-        key_parts = [
-            json.dumps(context.subject_attributes, sort_keys=True),
-            json.dumps(context.resource_attributes, sort_keys=True),
-            json.dumps(context.action_attributes, sort_keys=True)
-        ]
-        return str(hash("|".join(key_parts)))
-        
+        try:
+            return (
+                frozenset(context.subject_attributes.items()),
+                frozenset(context.resource_attributes.items()),
+                frozenset(context.action_attributes.items())
+            )
+        except TypeError:
+            # Unhashable attribute values
+            return "|".join([
+                json.dumps(context.subject_attributes, sort_keys=True, default=str),
+                json.dumps(context.resource_attributes, sort_keys=True, default=str),
+                json.dumps(context.action_attributes, sort_keys=True, default=str)
+            ])
+            
     async def _invalidate_cache(self):
-        """Инвалидация кэша"""
-        self.cache.clear()
+        """Инвалидация кэша (записи прошлых эпох отбрасываются лениво)"""
+        self.policy_epoch += 1
         
     async def _save_version(self, policy: Policy,
                            changed_by: str,
@@ -900,7 +1055,7 @@ class PolicyEngine:
         
         total_policy_sets = len(self.policy_sets)
         
-        cache_size = len(self.cache)
+        cache_size = sum(1 for e in self.cache.values() if e.epoch == self.policy_epoch)
         cache_hit_rate = (self.cache_hits / (self.cache_hits + self.cache_misses) * 100) if (self.cache_hits + self.cache_misses) > 0 else 0
         
         # By combining algorithm
@@ -926,6 +1081,10 @@ class PolicyEngine:
             "cache_hits": self.cache_hits,
             "cache_misses": self.cache_misses,
             "cache_hit_rate": cache_hit_rate,
+            "cache_evictions": self.cache_evictions,
+            "indexed_policies": len(self.index),
+            "unindexed_policies": len(self.index.unindexed),
+            "policy_epoch": self.policy_epoch,
             "policies_by_algorithm": by_algorithm,
             "total_audit_records": total_audits,
             "permitted_decisions": permitted,
@@ -933,6 +1092,98 @@ class PolicyEngine:
         }
 
 
+def benchmark_policy_engine(policy_count: int = 10000,
+                            requests: int = 5000,
+                            batch_size: int = 100) -> Dict[str, Any]:
+    """Бенчмарк латентности решений (p50/p99) на большом наборе политик"""
+    async def run() -> Dict[str, Any]:
+        rnd = random.Random(42)
+        engine = PolicyEngine()
+        
+        resource_types = [f"type_{i}" for i in range(200)]
+        actions = ["read", "write", "delete", "list", "create", "update", "share", "export", "approve", "audit"]
+        roles = [f"role_{i}" for i in range(20)]
+        
+        setup_start = time.perf_counter()
+        for i in range(policy_count):
+            rule = await engine.create_rule(
+                f"rule_{i}",
+                [{"attribute_name": "subject.level", "operator": "greater_or_equal", "value": rnd.randint(1, 5)},
+                 {"attribute_name": "resource.classification", "operator": "not_equals", "value": "secret"}],
+                effect=PolicyEffect.DENY if rnd.random() < 0.2 else PolicyEffect.ALLOW
+            )
+            if rnd.random() < 0.01:
+                # Unindexed policy (pattern-based target)
+                target = [{"attribute_name": "subject.department", "operator": "starts_with", "value": "fin"}]
+            else:
+                target = [
+                    {"attribute_name": "resource.resource_type", "operator": "equals", "value": rnd.choice(resource_types)},
+                    {"attribute_name": "action.action", "operator": "equals", "value": rnd.choice(actions)},
+                    {"attribute_name": "subject.user_role", "operator": "equals", "value": rnd.choice(roles)}
+                ]
+            policy = await engine.create_policy(f"policy_{i}", [rule.rule_id], target,
+                                                priority=rnd.randint(0, 100))
+            await engine.activate_policy(policy.policy_id, "bench")
+        setup_ms = (time.perf_counter() - setup_start) * 1000
+        
+        def make_context(i: int) -> EvaluationContext:
+            return EvaluationContext(
+                context_id=f"ctx_{i}",
+                subject_attributes={"id": f"user-{rnd.randint(1, 500)}", "user_role": rnd.choice(roles),
+                                    "level": rnd.randint(1, 5), "department": rnd.choice(["finance", "it", "hr"])},
+                resource_attributes={"id": f"res-{rnd.randint(1, 50)}", "resource_type": rnd.choice(resource_types),
+                                     "classification": rnd.choice(["public", "internal", "secret"])},
+                action_attributes={"action": rnd.choice(actions)}
+            )
+            
+        contexts = [make_context(i) for i in range(requests)]
+        
+        def percentiles(samples: List[int]) -> Dict[str, float]:
+            samples.sort()
+            return {
+                "p50_us": samples[len(samples) // 2] / 1000,
+                "p99_us": samples[min(len(samples) - 1, int(len(samples) * 0.99))] / 1000,
+                "max_us": samples[-1] / 1000
+            }
+            
+        uncached = []
+        candidates = 0
+        for context in contexts:
+            candidates += len(engine.index.candidates(context))
+            t0 = time.perf_counter_ns()
+            engine._evaluate_sync(context, False)
+            uncached.append(time.perf_counter_ns() - t0)
+            
+        for context in contexts:
+            engine._evaluate_sync(context, True)
+        cached = []
+        for context in contexts:
+            t0 = time.perf_counter_ns()
+            engine._evaluate_sync(context, True)
+            cached.append(time.perf_counter_ns() - t0)
+            
+        engine.cache.clear()
+        batches = [contexts[i:i + batch_size] for i in range(0, len(contexts), batch_size)]
+        t0 = time.perf_counter()
+        for batch in batches:
+            await engine.evaluate_batch(batch, use_cache=False)
+        batch_elapsed = time.perf_counter() - t0
+        
+        return {
+            "policies": policy_count,
+            "unindexed_policies": len(engine.index.unindexed),
+            "requests": requests,
+            "setup_ms": round(setup_ms, 1),
+            "avg_candidates": round(candidates / requests, 2),
+            "uncached": percentiles(uncached),
+            "cached": percentiles(cached),
+            "batch_size": batch_size,
+            "batch_decisions_per_sec": round(requests / batch_elapsed)
+        }
+        
+    return asyncio.run(run())
+
+
 # Demo
 async def main():
     print("=" * 60)
@@ -1139,6 +1390,25 @@ async def main():
         cached_indicator = "(cached)" if "Cached" in result.reason else ""
         print(f"  ↻ {subject['id']} → {resource['id']}: {result.decision.value} {cached_indicator}")
         
+    # Batch evaluation (list endpoint)
+    print("\n📋 Batch Evaluation (listing documents for user-003)...")
+    
+    subject = requests_data[2][0]
+    batch_contexts = [
+        EvaluationContext(
+            context_id=f"ctx_{uuid.uuid4().hex[:8]}",
+            subject_attributes={"id": subject["id"], "type": "user", **{f"user_{k}": v for k, v in subject.items()}},
+            resource_attributes={"id": resource["id"], "type": resource["type"], **{f"resource_{k}": v for k, v in resource.items()}},
+            action_attributes={"action": "read"}
+        )
+        for _, resource, _, _ in requests_data
+    ]
+    
+    batch_results = await engine.evaluate_batch(batch_contexts)
+    visible = [ctx.resource_attributes["id"] for ctx, res in zip(batch_contexts, batch_results)
+               if res.decision == DecisionResult.PERMIT]
+    print(f"  {len(visible)}/{len(batch_contexts)} visible: {', '.join(visible)}")
+        
     # Attributes
     print("\n📋 Attribute Definitions:")
     
@@ -1287,4 +1557,7 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if "--benchmark" in sys.argv:
+        print(json.dumps(benchmark_policy_engine(), indent=2))
+    else:
+        asyncio.run(main())
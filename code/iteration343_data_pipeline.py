@@ -15,14 +15,26 @@ Server Init - Iteration 343: Data Pipeline Orchestrator
 """
 
 import asyncio
+import heapq
+import json
+import os
 import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Set, Callable
+from typing import Dict, List, Optional, Any, Set, Callable, Tuple
 from enum import Enum
 import uuid
 
 
+# Scheduler
+THREAD_POOL_WORKERS = 16
+PROCESS_POOL_WORKERS = os.cpu_count() or 1
+MAX_RETRY_DELAY_SECONDS = 3600
+
+
 class TaskState(Enum):
     """Состояние задачи"""
     PENDING = "pending"
@@ -442,7 +454,8 @@ class Plugin:
 class PipelineOrchestrator:
     """Оркестратор пайплайнов"""
     
-    def __init__(self):
+    def __init__(self, thread_workers: int = THREAD_POOL_WORKERS,
+                 process_workers: int = PROCESS_POOL_WORKERS):
         self.pipelines: Dict[str, Pipeline] = {}
         self.tasks: Dict[str, TaskDefinition] = {}
         self.runs: Dict[str, PipelineRun] = {}
@@ -453,6 +466,23 @@ class PipelineOrchestrator:
         self.sensors: Dict[str, SensorState] = {}
         self.alerts: List[PipelineAlert] = []
         self.plugins: Dict[str, Plugin] = {}
+        self.callables: Dict[str, Callable] = {}
+        
+        # Indexes
+        self.runs_by_pipeline: Dict[str, List[str]] = {}
+        self.active_runs: Dict[str, Set[str]] = {}
+        self.run_instances: Dict[str, Dict[str, str]] = {}
+        self.lineage_by_run: Dict[str, List[str]] = {}
+        
+        # Scheduler
+        self.pool_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.run_slot_events: Dict[str, asyncio.Event] = {}
+        self.running_tasks: Dict[str, Dict[asyncio.Task, str]] = {}
+        
+        # Executors
+        self.thread_executor = ThreadPoolExecutor(max_workers=thread_workers)
+        self.process_workers = process_workers
+        self.process_executor: Optional[ProcessPoolExecutor] = None
         
         # Initialize default pool
         self.pools["default"] = ResourcePool(
@@ -461,6 +491,7 @@ class PipelineOrchestrator:
             total_slots=128,
             description="Default execution pool"
         )
+        self.pool_semaphores["default"] = asyncio.Semaphore(128)
         
     async def create_task(self, name: str,
                          operator_type: OperatorType = OperatorType.PYTHON,
@@ -472,10 +503,12 @@ class PipelineOrchestrator:
                          pool: str = "default",
                          priority: int = 0,
                          owner: str = "",
-                         description: str = "") -> TaskDefinition:
+                         description: str = "",
+                         retry_delay_seconds: int = 60) -> TaskDefinition:
         """Создание задачи"""
         task = TaskDefinition(
-            task_id=f"task_{uuid.uuid4().hex[:8]}",
+            # Полный uuid: усечённый до 8 символов даёт коллизии на DAG из тысяч задач
+            task_id=f"task_{uuid.uuid4().hex}",
             name=name,
             operator_type=operator_type,
             config=config or {},
@@ -483,6 +516,7 @@ class PipelineOrchestrator:
             timeout_seconds=timeout_seconds,
             max_retries=max_retries,
             retry_policy=retry_policy,
+            retry_delay_seconds=retry_delay_seconds,
             pool=pool,
             priority=priority,
             owner=owner,
@@ -563,8 +597,7 @@ class PipelineOrchestrator:
             return None
             
         # Check max active runs
-        active_runs = [r for r in self.runs.values() 
-                      if r.pipeline_id == pipeline_id and r.state == RunState.RUNNING]
+        active_runs = self.active_runs.setdefault(pipeline_id, set())
         if len(active_runs) >= pipeline.max_active_runs:
             return None
             
@@ -581,6 +614,7 @@ class PipelineOrchestrator:
         )
         
         # Create task instances
+        instances = {}
         for task_id in pipeline.task_ids:
             task = self.tasks.get(task_id)
             if not task:
@@ -597,8 +631,12 @@ class PipelineOrchestrator:
             
             run.task_instance_ids.append(instance.instance_id)
             self.task_instances[instance.instance_id] = instance
+            instances[task_id] = instance.instance_id
             
         self.runs[run.run_id] = run
+        self.run_instances[run.run_id] = instances
+        self.runs_by_pipeline.setdefault(pipeline_id, []).append(run.run_id)
+        active_runs.add(run.run_id)
         
         # Update pipeline
         pipeline.last_run = datetime.now()
@@ -606,6 +644,10 @@ class PipelineOrchestrator:
         
         return run
         
+    def register_callable(self, name: str, func: Callable):
+        """Регистрация исполняемой функции задачи"""
+        self.callables[name] = func
+        
     async def execute_task_instance(self, instance_id: str) -> bool:
         """Выполнение экземпляра задачи"""
         instance = self.task_instances.get(instance_id)
@@ -616,49 +658,228 @@ class PipelineOrchestrator:
         if not task:
             return False
             
-        # Check pool availability
-        pool = self.pools.get(task.pool, self.pools["default"])
-        if pool.used_slots >= pool.total_slots:
-            instance.state = TaskState.QUEUED
-            pool.queued_tasks += 1
-            return False
-            
-        # Mark as running
-        instance.state = TaskState.RUNNING
-        instance.started_at = datetime.now()
-        pool.used_slots += 1
-        
-        # Simulate execution
-        success = random.random() > 0.1  # 90% success rate
+        success = await self._run_attempt(instance, task)
         
         if success:
-            instance.state = TaskState.SUCCESS
-            instance.return_value = {"status": "completed", "records": random.randint(100, 10000)}
-            
-            # Record lineage
             await self._record_lineage(instance, task)
+        elif task.retry_policy != RetryPolicy.NONE and instance.try_number < instance.max_tries:
+            instance.state = TaskState.RETRYING
+            instance.try_number += 1
         else:
-            if instance.try_number < instance.max_tries:
-                instance.state = TaskState.RETRYING
-                instance.try_number += 1
+            await self._fail_instance(instance, task)
+            
+        # Update run
+        await self._update_run_state(instance.run_id)
+        
+        return success
+        
+    async def execute_run(self, run_id: str) -> Optional[PipelineRun]:
+        """Выполнение запуска в топологическом порядке"""
+        run = self.runs.get(run_id)
+        if not run or run.state != RunState.RUNNING:
+            return None
+            
+        pipeline = self.pipelines.get(run.pipeline_id)
+        instances = self.run_instances.get(run_id, {})
+        concurrency = max(1, pipeline.concurrency if pipeline else 1)
+        
+        # Upstream counters over tasks of this run
+        positions: Dict[str, int] = {}
+        remaining: Dict[str, int] = {}
+        ready: List[Tuple[int, int, str]] = []
+        failed_roots = []
+        
+        for position, (task_id, instance_id) in enumerate(instances.items()):
+            positions[task_id] = position
+            instance = self.task_instances[instance_id]
+            
+            if instance.state in [TaskState.FAILED, TaskState.UPSTREAM_FAILED, TaskState.CANCELLED]:
+                failed_roots.append(task_id)
+            if instance.state not in [TaskState.PENDING, TaskState.QUEUED, TaskState.RETRYING]:
+                continue
+                
+            task = self.tasks[task_id]
+            pending = sum(
+                1 for upstream_id in task.upstream_task_ids
+                if upstream_id in instances
+                and self.task_instances[instances[upstream_id]].state not in [TaskState.SUCCESS, TaskState.SKIPPED]
+            )
+            
+            if pending:
+                remaining[task_id] = pending
             else:
-                instance.state = TaskState.FAILED
-                instance.exception = "Simulated execution failure"
+                heapq.heappush(ready, (-task.priority, position, task_id))
                 
-                # Create alert
-                await self._create_alert(instance, "task_failed", "error", f"Task {task.name} failed after {instance.try_number} attempts")
+        for task_id in failed_roots:
+            self._mark_upstream_failed(task_id, instances, remaining)
+            
+        # Ready-queue driven execution
+        in_flight: Dict[asyncio.Task, str] = {}
+        self.running_tasks[run_id] = in_flight
+        
+        try:
+            while ready or in_flight:
+                while ready and len(in_flight) < concurrency and run.state == RunState.RUNNING:
+                    _, _, task_id = heapq.heappop(ready)
+                    instance = self.task_instances[instances[task_id]]
+                    job = asyncio.create_task(self._execute_with_retries(instance, self.tasks[task_id]))
+                    in_flight[job] = task_id
+                    
+                if not in_flight:
+                    break
+                    
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
                 
-        instance.ended_at = datetime.now()
-        if instance.started_at:
-            instance.duration_seconds = (instance.ended_at - instance.started_at).total_seconds()
+                for job in done:
+                    task_id = in_flight.pop(job)
+                    instance = self.task_instances[instances[task_id]]
+                    
+                    if job.cancelled():
+                        instance.state = TaskState.CANCELLED
+                    elif job.result():
+                        run.completed_tasks += 1
+                        for downstream_id in self.tasks[task_id].downstream_task_ids:
+                            if downstream_id not in remaining:
+                                continue
+                            remaining[downstream_id] -= 1
+                            if remaining[downstream_id] == 0:
+                                del remaining[downstream_id]
+                                downstream = self.tasks[downstream_id]
+                                heapq.heappush(ready, (-downstream.priority, positions[downstream_id], downstream_id))
+                    else:
+                        run.failed_tasks += 1
+                        self._mark_upstream_failed(task_id, instances, remaining)
+        finally:
+            for job in in_flight:
+                job.cancel()
+            self.running_tasks.pop(run_id, None)
             
-        pool.used_slots -= 1
+        await self._update_run_state(run_id)
+        return run
         
-        # Update run
-        await self._update_run_state(instance.run_id)
+    def _mark_upstream_failed(self, task_id: str,
+                              instances: Dict[str, str],
+                              remaining: Dict[str, int]):
+        """Пометка нижестоящих задач как upstream_failed"""
+        stack = [task_id]
+        
+        while stack:
+            for downstream_id in self.tasks[stack.pop()].downstream_task_ids:
+                if remaining.pop(downstream_id, None) is None:
+                    continue
+                self.task_instances[instances[downstream_id]].state = TaskState.UPSTREAM_FAILED
+                stack.append(downstream_id)
+                
+    async def _execute_with_retries(self, instance: TaskInstance, task: TaskDefinition) -> bool:
+        """Выполнение экземпляра с повторами и задержкой"""
+        while True:
+            if await self._run_attempt(instance, task):
+                await self._record_lineage(instance, task)
+                return True
+                
+            if task.retry_policy == RetryPolicy.NONE or instance.try_number >= instance.max_tries:
+                await self._fail_instance(instance, task)
+                return False
+                
+            instance.state = TaskState.RETRYING
+            delay = self._retry_delay(task, instance.try_number)
+            instance.try_number += 1
+            
+            if delay > 0:
+                await asyncio.sleep(delay)
+                
+    def _retry_delay(self, task: TaskDefinition, try_number: int) -> float:
+        """Задержка перед повтором"""
+        if task.retry_policy == RetryPolicy.LINEAR:
+            delay = task.retry_delay_seconds * try_number
+        elif task.retry_policy == RetryPolicy.EXPONENTIAL:
+            delay = task.retry_delay_seconds * 2 ** (try_number - 1)
+        else:
+            delay = 0
+            
+        return min(delay, MAX_RETRY_DELAY_SECONDS)
         
+    async def _run_attempt(self, instance: TaskInstance, task: TaskDefinition) -> bool:
+        """Одна попытка выполнения в слоте пула"""
+        pool = self.pools.get(task.pool, self.pools["default"])
+        semaphore = self.pool_semaphores[pool.name]
+        
+        # Wait for pool slot
+        instance.state = TaskState.QUEUED
+        instance.queued_at = datetime.now()
+        pool.queued_tasks += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            pool.queued_tasks -= 1
+            
+        pool.used_slots += 1
+        instance.state = TaskState.RUNNING
+        instance.started_at = datetime.now()
+        instance.exception = ""
+        
+        func = self.callables.get(task.config.get("callable", task.name))
+        executor = task.config.get("executor", "thread")
+        instance.worker_id = f"{executor}:{pool.name}" if func else f"inline:{pool.name}"
+        
+        try:
+            if func is None:
+                instance.return_value = {"status": "completed"}
+            else:
+                instance.return_value = await asyncio.wait_for(
+                    self._invoke(func, executor, instance, task),
+                    timeout=task.timeout_seconds
+                )
+            instance.xcom_data["return_value"] = instance.return_value
+            instance.state = TaskState.SUCCESS
+        except asyncio.TimeoutError:
+            instance.state = TaskState.FAILED
+            instance.exception = f"Timeout after {task.timeout_seconds}s"
+        except Exception as e:
+            instance.state = TaskState.FAILED
+            instance.exception = f"{type(e).__name__}: {e}"
+        finally:
+            pool.used_slots -= 1
+            semaphore.release()
+            instance.ended_at = datetime.now()
+            instance.duration_seconds = (instance.ended_at - instance.started_at).total_seconds()
+            
         return instance.state == TaskState.SUCCESS
         
+    async def _invoke(self, func: Callable, executor: str,
+                      instance: TaskInstance, task: TaskDefinition) -> Any:
+        """Вызов функции задачи в исполнителе"""
+        run = self.runs.get(instance.run_id)
+        instances = self.run_instances.get(instance.run_id, {})
+        
+        context = {
+            "task_id": task.task_id,
+            "run_id": instance.run_id,
+            "logical_date": run.logical_date if run else None,
+            "try_number": instance.try_number,
+            "config": {**task.config, **(run.config_override if run else {})},
+            "upstream": {
+                upstream_id: self.task_instances[instances[upstream_id]].xcom_data.get("return_value")
+                for upstream_id in task.upstream_task_ids if upstream_id in instances
+            }
+        }
+        
+        if asyncio.iscoroutinefunction(func):
+            return await func(context)
+            
+        loop = asyncio.get_running_loop()
+        if executor == "process":
+            if self.process_executor is None:
+                self.process_executor = ProcessPoolExecutor(max_workers=self.process_workers)
+            return await loop.run_in_executor(self.process_executor, func, context)
+            
+        return await loop.run_in_executor(self.thread_executor, func, context)
+        
+    async def _fail_instance(self, instance: TaskInstance, task: TaskDefinition):
+        """Окончательная ошибка экземпляра"""
+        instance.state = TaskState.FAILED
+        await self._create_alert(instance, "task_failed", "error", f"Task {task.name} failed after {instance.try_number} attempts: {instance.exception}")
+        
     async def _record_lineage(self, instance: TaskInstance, task: TaskDefinition):
         """Запись происхождения данных"""
         # Simulated lineage data
@@ -676,6 +897,7 @@ class PipelineOrchestrator:
         )
         
         self.lineage[lineage.lineage_id] = lineage
+        self.lineage_by_run.setdefault(lineage.run_id, []).append(lineage.lineage_id)
         
     async def _create_alert(self, instance: TaskInstance,
                            alert_type: str,
@@ -727,7 +949,7 @@ class PipelineOrchestrator:
         run.failed_tasks = failed
         run.skipped_tasks = skipped
         
-        if all_done:
+        if all_done and run.state == RunState.RUNNING:
             run.ended_at = datetime.now()
             if failed == 0:
                 run.state = RunState.SUCCESS
@@ -735,6 +957,17 @@ class PipelineOrchestrator:
                 run.state = RunState.FAILED
             else:
                 run.state = RunState.PARTIAL
+            self._finish_run(run)
+            
+    def _finish_run(self, run: PipelineRun):
+        """Освобождение слота активного запуска"""
+        active_runs = self.active_runs.get(run.pipeline_id)
+        if active_runs:
+            active_runs.discard(run.run_id)
+            
+        event = self.run_slot_events.get(run.pipeline_id)
+        if event:
+            event.set()
                 
     async def pause_pipeline(self, pipeline_id: str) -> bool:
         """Пауза пайплайна"""
@@ -743,6 +976,12 @@ class PipelineOrchestrator:
             return False
             
         pipeline.state = PipelineState.PAUSED
+        
+        # Wake up waiting backfills
+        event = self.run_slot_events.get(pipeline_id)
+        if event:
+            event.set()
+            
         return True
         
     async def resume_pipeline(self, pipeline_id: str) -> bool:
@@ -767,9 +1006,14 @@ class PipelineOrchestrator:
         # Cancel all pending instances
         for instance_id in run.task_instance_ids:
             instance = self.task_instances.get(instance_id)
-            if instance and instance.state in [TaskState.PENDING, TaskState.QUEUED]:
+            if instance and instance.state in [TaskState.PENDING, TaskState.QUEUED, TaskState.RETRYING]:
                 instance.state = TaskState.CANCELLED
                 
+        # Cancel running instances
+        for job in self.running_tasks.get(run_id, {}):
+            job.cancel()
+            
+        self._finish_run(run)
         return True
         
     async def backfill(self, pipeline_id: str,
@@ -781,31 +1025,47 @@ class PipelineOrchestrator:
         if not pipeline:
             return []
             
-        runs = []
+        logical_dates = []
         current_date = start_date
         
         while current_date <= end_date:
-            run = await self.trigger_pipeline(
-                pipeline_id,
-                TriggerType.BACKFILL,
-                triggered_by,
-                current_date
-            )
+            logical_dates.append(current_date)
+            current_date += self._schedule_delta(pipeline)
             
-            if run:
-                runs.append(run)
-                
-            # Increment by schedule interval
-            if pipeline.schedule_interval == ScheduleInterval.HOURLY:
-                current_date += timedelta(hours=1)
-            elif pipeline.schedule_interval == ScheduleInterval.DAILY:
-                current_date += timedelta(days=1)
-            elif pipeline.schedule_interval == ScheduleInterval.WEEKLY:
-                current_date += timedelta(weeks=1)
-            else:
-                current_date += timedelta(days=1)
-                
-        return runs
+        limiter = asyncio.Semaphore(max(1, pipeline.max_active_runs))
+        
+        async def run_logical_date(logical_date: datetime) -> Optional[PipelineRun]:
+            async with limiter:
+                while True:
+                    run = await self.trigger_pipeline(
+                        pipeline_id,
+                        TriggerType.BACKFILL,
+                        triggered_by,
+                        logical_date
+                    )
+                    
+                    if run:
+                        return await self.execute_run(run.run_id)
+                    if pipeline.state != PipelineState.ACTIVE:
+                        return None
+                        
+                    # Wait for an active run of the pipeline to finish
+                    event = self.run_slot_events.setdefault(pipeline_id, asyncio.Event())
+                    event.clear()
+                    await event.wait()
+                    
+        results = await asyncio.gather(*(run_logical_date(d) for d in logical_dates))
+        return [run for run in results if run]
+        
+    def _schedule_delta(self, pipeline: Pipeline) -> timedelta:
+        """Шаг расписания пайплайна"""
+        if pipeline.schedule_interval == ScheduleInterval.HOURLY:
+            return timedelta(hours=1)
+        elif pipeline.schedule_interval == ScheduleInterval.DAILY:
+            return timedelta(days=1)
+        elif pipeline.schedule_interval == ScheduleInterval.WEEKLY:
+            return timedelta(weeks=1)
+        return timedelta(days=1)
         
     async def add_quality_check(self, task_id: str,
                                check_type: DataQualityCheckType,
@@ -862,6 +1122,7 @@ class PipelineOrchestrator:
         )
         
         self.pools[pool.name] = pool
+        self.pool_semaphores[pool.name] = asyncio.Semaphore(total_slots)
         return pool
         
     async def register_plugin(self, name: str,
@@ -895,8 +1156,20 @@ class PipelineOrchestrator:
         
     def get_lineage_for_run(self, run_id: str) -> List[DataLineage]:
         """Получение происхождения данных для запуска"""
-        return [lin for lin in self.lineage.values() if lin.run_id == run_id]
-        
+        return [self.lineage[lid] for lid in self.lineage_by_run.get(run_id, [])]
+        
+    def get_runs_for_pipeline(self, pipeline_id: str) -> List[PipelineRun]:
+        """Получение запусков пайплайна"""
+        return [self.runs[rid] for rid in self.runs_by_pipeline.get(pipeline_id, [])]
+        
+    def shutdown(self):
+        """Остановка исполнителей"""
+        self.thread_executor.shutdown(wait=True)
+        if self.process_executor:
+            self.process_executor.shutdown(wait=True)
+            self.process_executor = None
+            
+
     def get_statistics(self) -> Dict[str, Any]:
         """Статистика"""
         total_pipelines = len(self.pipelines)
@@ -905,7 +1178,7 @@ class PipelineOrchestrator:
         total_tasks = len(self.tasks)
         
         total_runs = len(self.runs)
-        running_runs = sum(1 for r in self.runs.values() if r.state == RunState.RUNNING)
+        running_runs = sum(len(active) for active in self.active_runs.values())
         successful_runs = sum(1 for r in self.runs.values() if r.state == RunState.SUCCESS)
         failed_runs = sum(1 for r in self.runs.values() if r.state == RunState.FAILED)
         
@@ -954,6 +1227,77 @@ class PipelineOrchestrator:
         }
 
 
+def benchmark_data_pipeline(task_count: int = 10000, max_upstream: int = 3,
+                            concurrency: int = 256, seed: int = 42) -> Dict[str, Any]:
+    """Бенчмарк планировщика на DAG из task_count задач"""
+    async def run_benchmark() -> Dict[str, Any]:
+        rng = random.Random(seed)
+        orchestrator = PipelineOrchestrator()
+        task_ids = []
+        
+        for i in range(task_count):
+            candidates = task_ids[-100:]
+            upstream = rng.sample(candidates, min(len(candidates), rng.randint(0, max_upstream)))
+            task = await orchestrator.create_task(
+                f"task_{i}", OperatorType.DUMMY,
+                upstream_task_ids=upstream,
+                priority=rng.randint(0, 10)
+            )
+            task_ids.append(task.task_id)
+            
+        pipeline = await orchestrator.create_pipeline("benchmark", task_ids, concurrency=concurrency)
+        
+        start = time.perf_counter()
+        run = await orchestrator.trigger_pipeline(pipeline.pipeline_id)
+        trigger_seconds = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        await orchestrator.execute_run(run.run_id)
+        execute_seconds = time.perf_counter() - start
+        
+        orchestrator.shutdown()
+        
+        if run.state != RunState.SUCCESS or run.completed_tasks != task_count:
+            raise RuntimeError(f"Benchmark run did not complete: {run.state.value}, "
+                               f"{run.completed_tasks}/{task_count} tasks")
+            
+        return {
+            "tasks": task_count,
+            "edges": sum(len(orchestrator.tasks[t].upstream_task_ids) for t in task_ids),
+            "concurrency": concurrency,
+            "run_state": run.state.value,
+            "completed_tasks": run.completed_tasks,
+            "trigger_seconds": round(trigger_seconds, 4),
+            "execute_seconds": round(execute_seconds, 4),
+            "scheduler_overhead_us_per_task": round(execute_seconds / task_count * 1e6, 2),
+            "tasks_per_second": round(task_count / execute_seconds, 1)
+        }
+        
+    return asyncio.run(run_benchmark())
+
+
+# Demo task callables
+def run_sql_query(context: Dict[str, Any]) -> Dict[str, Any]:
+    """Выполнение SQL запроса"""
+    time.sleep(0.01)
+    return {"status": "completed", "records": 1000 + context["logical_date"].hour * 10}
+
+
+def aggregate_events(context: Dict[str, Any]) -> Dict[str, Any]:
+    """Агрегация событий"""
+    records = sum(value.get("records", 0) for value in context["upstream"].values() if value)
+    checksum = sum(i * i for i in range(records * 10)) % 1000003
+    return {"status": "completed", "records": records, "checksum": checksum}
+
+
+async def deploy_model(context: Dict[str, Any]) -> Dict[str, Any]:
+    """Развертывание модели"""
+    await asyncio.sleep(0.01)
+    if context["try_number"] == 1:
+        raise ConnectionError("model-server unavailable")
+    return {"status": "completed", "endpoint": context["config"]["endpoint"]}
+
+
 # Demo
 async def main():
     print("=" * 60)
@@ -999,7 +1343,7 @@ async def main():
     extract_task = await orchestrator.create_task(
         "Extract Source Data",
         OperatorType.SQL,
-        {"source_table": "raw_events", "query": "SELECT * FROM raw_events"},
+        {"source_table": "raw_events", "query": "SELECT * FROM raw_events", "callable": "run_sql_query"},
         [],
         3600, 3, RetryPolicy.EXPONENTIAL, "sql_pool", 1,
         "data-team", "Extract data from source database"
@@ -1008,7 +1352,7 @@ async def main():
     transform_task = await orchestrator.create_task(
         "Transform Data",
         OperatorType.SPARK,
-        {"transformation": "aggregate_events", "target_table": "agg_events"},
+        {"transformation": "aggregate_events", "target_table": "agg_events", "callable": "aggregate_events", "executor": "process"},
         [extract_task.task_id],
         7200, 2, RetryPolicy.EXPONENTIAL, "spark_pool", 2,
         "data-team", "Transform and aggregate event data"
@@ -1087,14 +1431,20 @@ async def main():
     model_deploy = await orchestrator.create_task(
         "Model Deployment",
         OperatorType.HTTP,
-        {"endpoint": "model-server", "version": "v1"},
+        {"endpoint": "model-server", "version": "v1", "callable": "deploy_model"},
         [model_evaluate.task_id],
         600, 3, RetryPolicy.EXPONENTIAL, "api_pool", 4,
-        "ml-team", "Deploy model to production"
+        "ml-team", "Deploy model to production",
+        retry_delay_seconds=1
     )
     
     ml_tasks = [feature_extract, model_train, model_evaluate, model_deploy]
     
+    # Register task callables
+    orchestrator.register_callable("run_sql_query", run_sql_query)
+    orchestrator.register_callable("aggregate_events", aggregate_events)
+    orchestrator.register_callable("deploy_model", deploy_model)
+    
     # Create Pipelines
     print("\n📊 Creating Pipelines...")
     
@@ -1175,16 +1525,13 @@ async def main():
             runs.append(run)
             print(f"  🚀 {hourly_pipeline.name} - Hour -{i}")
             
-    # Execute Task Instances
-    print("\n⚡ Executing Task Instances...")
+    # Execute Pipeline Runs
+    print("\n⚡ Executing Pipeline Runs...")
     
-    executed = 0
-    for run in runs:
-        for instance_id in run.task_instance_ids:
-            success = await orchestrator.execute_task_instance(instance_id)
-            executed += 1
-            
-    print(f"  ⚡ Executed {executed} task instances")
+    executed_runs = await asyncio.gather(*(orchestrator.execute_run(run.run_id) for run in runs))
+    executed = sum(run.completed_tasks + run.failed_tasks for run in executed_runs if run)
+    
+    print(f"  ⚡ Executed {executed} task instances in {len(executed_runs)} runs")
     
     # Run Backfill
     print("\n📅 Running Backfill...")
@@ -1196,13 +1543,8 @@ async def main():
         "admin"
     )
     
-    print(f"  📅 Created {len(backfill_runs)} backfill runs")
+    print(f"  📅 Completed {len(backfill_runs)} backfill runs")
     
-    # Execute backfill tasks
-    for run in backfill_runs[:1]:  # Execute first backfill
-        for instance_id in run.task_instance_ids:
-            await orchestrator.execute_task_instance(instance_id)
-            
     # Run Quality Checks
     print("\n✅ Running Quality Checks...")
     
@@ -1409,10 +1751,15 @@ async def main():
     print(f"│ Quality Checks Passed:   {stats['passed_quality_checks']:>5} / {stats['total_quality_checks']:<5}                          │")
     print("└────────────────────────────────────────────────────────────────────┘")
     
+    orchestrator.shutdown()
+    
     print("\n" + "=" * 60)
     print("Data Pipeline Orchestrator initialized!")
     print("=" * 60)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if "--benchmark" in sys.argv:
+        print(json.dumps(benchmark_data_pipeline(), indent=2))
+    else:
+        asyncio.run(main())
@@ -15,10 +15,21 @@ Server Init - Iteration 345: Stream Processing Platform
 """
 
 import asyncio
+import bisect
+import heapq
+import math
+import os
+import pickle
 import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Set, Callable, Awaitable
+from typing import Dict, List, Optional, Any, Set, Callable, Awaitable, Tuple
 from enum import Enum
 import uuid
 import json
@@ -386,10 +397,1063 @@ class StreamMetrics:
     collected_at: datetime = field(default_factory=datetime.now)
 
 
+# Runtime
+CHANNEL_CAPACITY = 1024
+PROCESS_POOL_BATCH_SIZE = 256
+CHECKPOINT_TIMEOUT_SECONDS = 30.0
+CHECKPOINTS_RETAINED = 3
+MAX_WINDOW_RESULTS = 10000
+MAX_SIDE_OUTPUT_RECORDS = 10000
+MAX_WATERMARK = sys.maxsize
+END_TO_END_LATENCY_BUCKETS_MS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+def to_epoch_ms(value: Any) -> int:
+    """Перевод времени события в миллисекунды эпохи"""
+    if value is None:
+        return int(time.time() * 1000)
+    if isinstance(value, datetime):
+        return int(value.timestamp() * 1000)
+    return int(value)
+
+
+def from_epoch_ms(value: int) -> datetime:
+    """Перевод миллисекунд эпохи в datetime"""
+    return datetime.fromtimestamp(value / 1000)
+
+
+def estimate_size(value: Any) -> int:
+    """Приблизительный размер записи в байтах"""
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    return len(repr(value))
+
+
+def apply_map_batch(function: Callable[[Any], Any], values: List[Any]) -> List[Any]:
+    """Применение map-функции к пачке значений (выполняется в пуле процессов)"""
+    return [function(value) for value in values]
+
+
+def _min_value(a: Any, b: Any) -> Any:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a if a <= b else b
+
+
+def _max_value(a: Any, b: Any) -> Any:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a if a >= b else b
+
+
+class Aggregator:
+    """Инкрементальный агрегатор окна"""
+    __slots__ = ("create", "add", "merge", "result")
+    
+    def __init__(self, create: Callable[[], Any],
+                 add: Callable[[Any, Any], Any],
+                 merge: Callable[[Any, Any], Any],
+                 result: Callable[[Any], Any] = None):
+        self.create = create
+        self.add = add
+        self.merge = merge
+        self.result = result or (lambda acc: acc)
+
+
+AGGREGATORS: Dict[str, Aggregator] = {
+    "count": Aggregator(lambda: 0, lambda acc, x: acc + 1, lambda a, b: a + b),
+    "sum": Aggregator(lambda: 0, lambda acc, x: acc + x if x is not None else acc, lambda a, b: a + b),
+    "min": Aggregator(lambda: None, _min_value, _min_value),
+    "max": Aggregator(lambda: None, _max_value, _max_value),
+    "avg": Aggregator(
+        lambda: (0, 0),
+        lambda acc, x: (acc[0] + x, acc[1] + 1) if x is not None else acc,
+        lambda a, b: (a[0] + b[0], a[1] + b[1]),
+        lambda acc: acc[0] / acc[1] if acc[1] else 0.0
+    )
+}
+
+
+class LatencyHistogram:
+    """Гистограмма латентности с фиксированными бакетами"""
+    
+    def __init__(self, boundaries: List[float] = None):
+        self.boundaries = boundaries or END_TO_END_LATENCY_BUCKETS_MS
+        self.counts = [0] * (len(self.boundaries) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+        
+    def record(self, value_ms: float):
+        self.counts[bisect.bisect_left(self.boundaries, value_ms)] += 1
+        self.count += 1
+        self.sum_ms += value_ms
+        if value_ms > self.max_ms:
+            self.max_ms = value_ms
+            
+    def percentile(self, q: float) -> float:
+        """Верхняя граница бакета, содержащего перцентиль"""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(self.count * q + 0.5))
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.boundaries[i], self.max_ms) if i < len(self.boundaries) else self.max_ms
+        return self.max_ms
+        
+    @property
+    def avg_ms(self) -> float:
+        return self.sum_ms / self.count if self.count else 0.0
+
+
+class RuntimeRecord:
+    """Запись внутри рантайма"""
+    __slots__ = ("key", "value", "event_time_ms", "ingest_ns")
+    
+    def __init__(self, key: Any, value: Any, event_time_ms: int, ingest_ns: int = 0):
+        self.key = key
+        self.value = value
+        self.event_time_ms = event_time_ms
+        self.ingest_ns = ingest_ns
+
+
+class WatermarkEvent:
+    """Водяной знак внутри рантайма"""
+    __slots__ = ("timestamp_ms",)
+    
+    def __init__(self, timestamp_ms: int):
+        self.timestamp_ms = timestamp_ms
+
+
+class CheckpointBarrier:
+    """Барьер контрольной точки"""
+    __slots__ = ("checkpoint_id", "aligned")
+    
+    def __init__(self, checkpoint_id: str, aligned: bool):
+        self.checkpoint_id = checkpoint_id
+        self.aligned = aligned
+
+
+END_OF_STREAM = object()
+
+
+class Channel:
+    """Ограниченный канал между задачами с учётом backpressure"""
+    __slots__ = ("queue", "blocked_ns")
+    
+    def __init__(self, capacity: int = CHANNEL_CAPACITY):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=capacity)
+        self.blocked_ns = 0
+        
+    async def put(self, item: Any):
+        if self.queue.full():
+            started = time.perf_counter_ns()
+            await self.queue.put(item)
+            self.blocked_ns += time.perf_counter_ns() - started
+        else:
+            self.queue.put_nowait(item)
+
+
+class TaskRuntime:
+    """Базовая задача графа: входные каналы, выравнивание барьеров, водяные знаки"""
+    
+    def __init__(self, runtime: "JobRuntime", task_id: str):
+        self.runtime = runtime
+        self.task_id = task_id
+        self.inputs: List[Channel] = []
+        self.outputs: List[Channel] = []
+        self.watermark = -1
+        self.input_watermarks: List[int] = []
+        
+        # Barrier alignment
+        self.pending_barrier: Optional[CheckpointBarrier] = None
+        self.barrier_inputs: Set[int] = set()
+        self.alignment_started_ns = 0
+        self.released: List[asyncio.Event] = []
+        self.finished_inputs: Set[int] = set()
+        
+    async def emit(self, item: Any):
+        for channel in self.outputs:
+            await channel.put(item)
+            
+    async def run(self):
+        self.input_watermarks = [-1] * len(self.inputs)
+        
+        if len(self.inputs) == 1:
+            get = self.inputs[0].queue.get
+            while True:
+                item = await get()
+                if not await self._dispatch(0, item):
+                    return
+                    
+        # Mailbox: input readers feed one sequential processing loop
+        mailbox: asyncio.Queue = asyncio.Queue(maxsize=CHANNEL_CAPACITY)
+        self.released = [asyncio.Event() for _ in self.inputs]
+        readers = [asyncio.create_task(self._read_input(i, channel, mailbox))
+                   for i, channel in enumerate(self.inputs)]
+        try:
+            while True:
+                index, item = await mailbox.get()
+                if not await self._dispatch(index, item):
+                    return
+        finally:
+            for reader in readers:
+                reader.cancel()
+                
+    async def _read_input(self, index: int, channel: Channel, mailbox: asyncio.Queue):
+        while True:
+            item = await channel.queue.get()
+            await mailbox.put((index, item))
+            if item is END_OF_STREAM:
+                return
+            if isinstance(item, CheckpointBarrier) and item.aligned:
+                # Block this input until every input delivered the barrier
+                await self.released[index].wait()
+                self.released[index].clear()
+                
+    async def _dispatch(self, index: int, item: Any) -> bool:
+        if isinstance(item, RuntimeRecord):
+            await self.process(item, index)
+        elif isinstance(item, WatermarkEvent):
+            self.input_watermarks[index] = item.timestamp_ms
+            await self._advance_watermark()
+        elif isinstance(item, CheckpointBarrier):
+            await self._on_barrier(index, item)
+        elif item is END_OF_STREAM:
+            self.finished_inputs.add(index)
+            self.input_watermarks[index] = MAX_WATERMARK
+            if self.pending_barrier is not None:
+                await self._try_complete_alignment()
+            if len(self.finished_inputs) == len(self.inputs):
+                await self._advance_watermark()
+                await self.finish()
+                await self.emit(END_OF_STREAM)
+                return False
+            await self._advance_watermark()
+        return True
+        
+    async def _advance_watermark(self):
+        watermark = min(self.input_watermarks)
+        if watermark > self.watermark:
+            self.watermark = watermark
+            await self.on_watermark(watermark)
+            if watermark != MAX_WATERMARK:
+                await self.emit(WatermarkEvent(watermark))
+                
+    async def _on_barrier(self, index: int, barrier: CheckpointBarrier):
+        if self.pending_barrier is None:
+            self.pending_barrier = barrier
+            self.alignment_started_ns = time.perf_counter_ns()
+        self.barrier_inputs.add(index)
+        await self._try_complete_alignment()
+        
+    async def _try_complete_alignment(self):
+        barrier = self.pending_barrier
+        if len(self.barrier_inputs | self.finished_inputs) < len(self.inputs):
+            return
+            
+        alignment_ns = time.perf_counter_ns() - self.alignment_started_ns
+        aligned_inputs = self.barrier_inputs
+        self.pending_barrier = None
+        self.barrier_inputs = set()
+        
+        await self.flush()
+        self.runtime.snapshot_task(barrier.checkpoint_id, self, alignment_ns)
+        await self.emit(barrier)
+        
+        if self.released:
+            for index in aligned_inputs:
+                self.released[index].set()
+                
+    # Hooks
+    async def process(self, record: RuntimeRecord, index: int):
+        await self.emit(record)
+        
+    async def on_watermark(self, watermark: int):
+        pass
+        
+    async def flush(self):
+        pass
+        
+    async def finish(self):
+        await self.flush()
+        
+    def snapshot_state(self) -> Dict[str, Any]:
+        return {"watermark": self.watermark}
+
+
+class WindowState:
+    """Инкрементальное оконное состояние (tumbling/sliding/session/global)"""
+    
+    def __init__(self, window: StreamWindow, aggregator: Aggregator):
+        self.window = window
+        self.aggregator = aggregator
+        self.window_type = window.window_type
+        
+        # Tumbling/sliding: panes of gcd(size, slide) -> key -> [acc, record_count]
+        self.size = max(1, window.size_ms)
+        self.slide = window.slide_ms if window.window_type == WindowType.SLIDING and window.slide_ms > 0 else self.size
+        self.pane = math.gcd(self.size, self.slide)
+        self.panes: Dict[int, Dict[Any, list]] = {}
+        self.pane_starts: List[int] = []
+        self.next_fire_start: Optional[int] = None
+        
+        # Session: key -> [[start, end, acc], ...]
+        self.gap = max(1, window.gap_ms)
+        self.sessions: Dict[Any, List[list]] = {}
+        self.session_heap: List[tuple] = []
+        self.session_seq = 0
+        
+        # Global count windows: key -> [count, acc, first_ms, last_ms]
+        self.counters: Dict[Any, list] = {}
+        
+        self.lateness = window.allowed_lateness_ms if window.late_data_policy == LateDataPolicy.ALLOW else 0
+        
+    # Window results are (key, start_ms, end_ms, acc, record_count)
+    def add(self, key: Any, x: Any, ts: int, watermark: int) -> Tuple[bool, List[tuple]]:
+        """Добавление значения; возвращает (принято, результаты поздних перезапусков)"""
+        if self.window_type == WindowType.SESSION:
+            return self._add_session(key, x, ts, watermark)
+        if self.window_type == WindowType.GLOBAL:
+            return True, self._add_global(key, x, ts)
+        return self._add_pane(key, x, ts, watermark)
+        
+    def _first_window_start(self, ts: int) -> int:
+        """Начало самого раннего окна, содержащего момент ts"""
+        return -((self.size - 1 - ts) // self.slide) * self.slide
+        
+    def _add_pane(self, key: Any, x: Any, ts: int, watermark: int) -> Tuple[bool, List[tuple]]:
+        last_end = (ts // self.slide) * self.slide + self.size
+        late = last_end <= watermark
+        if late:
+            self.window.late_records += 1
+            if last_end + self.lateness <= watermark:
+                return False, []
+                
+        pane_start = (ts // self.pane) * self.pane
+        pane = self.panes.get(pane_start)
+        if pane is None:
+            pane = self.panes[pane_start] = {}
+            bisect.insort(self.pane_starts, pane_start)
+        entry = pane.get(key)
+        if entry is None:
+            entry = pane[key] = [self.aggregator.create(), 0]
+            self.window.windows_created += 1
+        entry[0] = self.aggregator.add(entry[0], x)
+        entry[1] += 1
+        
+        if not late:
+            return True, []
+            
+        # Allowed lateness: re-fire already fired windows containing the record
+        refired = []
+        start = self._first_window_start(ts)
+        while start <= ts:
+            if start + self.size <= watermark:
+                refired.extend(r for r in self._window_results(start) if r[0] == key)
+            start += self.slide
+        return True, refired
+        
+    def _window_results(self, start: int) -> List[tuple]:
+        end = start + self.size
+        merged: Dict[Any, Any] = {}
+        counts: Dict[Any, int] = {}
+        merge = self.aggregator.merge
+        lo = bisect.bisect_left(self.pane_starts, start)
+        hi = bisect.bisect_left(self.pane_starts, end)
+        for pane_start in self.pane_starts[lo:hi]:
+            for key, (acc, count) in self.panes[pane_start].items():
+                if key in merged:
+                    merged[key] = merge(merged[key], acc)
+                    counts[key] += count
+                else:
+                    merged[key] = acc
+                    counts[key] = count
+        result = self.aggregator.result
+        return [(key, start, end, result(acc), counts[key]) for key, acc in merged.items()]
+        
+    def advance(self, watermark: int) -> List[tuple]:
+        """Срабатывание окон, закрытых водяным знаком"""
+        if self.window_type == WindowType.SESSION:
+            return self._advance_sessions(watermark)
+        if self.window_type == WindowType.GLOBAL:
+            return self._drain_global() if watermark == MAX_WATERMARK else []
+            
+        fired = []
+        while True:
+            lo = 0
+            if self.next_fire_start is not None:
+                lo = bisect.bisect_left(self.pane_starts, self.next_fire_start)
+            if lo >= len(self.pane_starts):
+                break
+            start = self._first_window_start(self.pane_starts[lo])
+            if self.next_fire_start is not None and start < self.next_fire_start:
+                start = self.next_fire_start
+            if start + self.size > watermark:
+                break
+            fired.extend(self._window_results(start))
+            self.next_fire_start = start + self.slide
+            
+            # Drop panes no later (or allowed-late) window can use
+            while self.pane_starts:
+                pane_start = self.pane_starts[0]
+                last_end = (pane_start // self.slide) * self.slide + self.size
+                if pane_start >= self.next_fire_start or last_end + self.lateness > watermark:
+                    break
+                self.pane_starts.pop(0)
+                del self.panes[pane_start]
+                
+        if watermark == MAX_WATERMARK:
+            self.panes.clear()
+            self.pane_starts.clear()
+        return fired
+        
+    def _add_session(self, key: Any, x: Any, ts: int, watermark: int) -> Tuple[bool, List[tuple]]:
+        end = ts + self.gap
+        if end <= watermark:
+            self.window.late_records += 1
+            if end + self.lateness <= watermark:
+                return False, []
+                
+        aggregator = self.aggregator
+        session = [ts, end, aggregator.add(aggregator.create(), x), 1]
+        sessions = self.sessions.setdefault(key, [])
+        kept = []
+        for other in sessions:
+            if other[0] < session[1] and session[0] < other[1]:
+                session = [min(session[0], other[0]), max(session[1], other[1]),
+                           aggregator.merge(other[2], session[2]), other[3] + session[3]]
+            else:
+                kept.append(other)
+        if len(kept) == len(sessions):
+            self.window.windows_created += 1
+        kept.append(session)
+        self.sessions[key] = kept
+        
+        self.session_seq += 1
+        heapq.heappush(self.session_heap, (session[1], self.session_seq, key))
+        
+        if end <= watermark:
+            return True, self._advance_sessions(watermark)
+        return True, []
+        
+    def _advance_sessions(self, watermark: int) -> List[tuple]:
+        fired = []
+        heap = self.session_heap
+        result = self.aggregator.result
+        while heap and heap[0][0] <= watermark:
+            _, _, key = heapq.heappop(heap)
+            sessions = self.sessions.get(key)
+            if not sessions:
+                continue
+            open_sessions = []
+            for start, end, acc, count in sessions:
+                if end <= watermark:
+                    fired.append((key, start, end, result(acc), count))
+                else:
+                    open_sessions.append([start, end, acc, count])
+            if open_sessions:
+                self.sessions[key] = open_sessions
+            else:
+                del self.sessions[key]
+        return fired
+        
+    def _add_global(self, key: Any, x: Any, ts: int) -> List[tuple]:
+        counter = self.counters.get(key)
+        if counter is None:
+            counter = self.counters[key] = [0, self.aggregator.create(), ts, ts]
+            self.window.windows_created += 1
+        counter[0] += 1
+        counter[1] = self.aggregator.add(counter[1], x)
+        counter[2] = min(counter[2], ts)
+        counter[3] = max(counter[3], ts)
+        
+        threshold = self.window.trigger_threshold
+        if threshold and counter[0] >= threshold:
+            del self.counters[key]
+            return [(key, counter[2], counter[3], self.aggregator.result(counter[1]), counter[0])]
+        return []
+        
+    def _drain_global(self) -> List[tuple]:
+        result = self.aggregator.result
+        fired = [(key, c[2], c[3], result(c[1]), c[0]) for key, c in self.counters.items()]
+        self.counters.clear()
+        return fired
+        
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "panes": self.panes,
+            "next_fire_start": self.next_fire_start,
+            "sessions": self.sessions,
+            "counters": self.counters
+        }
+        
+    def restore(self, state: Dict[str, Any]):
+        self.panes = state.get("panes", {})
+        self.pane_starts = sorted(self.panes)
+        self.next_fire_start = state.get("next_fire_start")
+        self.sessions = state.get("sessions", {})
+        self.session_heap = []
+        for key, sessions in self.sessions.items():
+            for session in sessions:
+                self.session_seq += 1
+                self.session_heap.append((session[1], self.session_seq, key))
+        heapq.heapify(self.session_heap)
+        self.counters = state.get("counters", {})
+
+
+def write_snapshot_file(path: str, data: bytes):
+    """Атомарная запись файла снимка"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class SourceTask(TaskRuntime):
+    """Задача источника"""
+    
+    def __init__(self, runtime: "JobRuntime", source: StreamSource):
+        super().__init__(runtime, source.source_id)
+        self.source = source
+        self.inputs = [Channel()]
+        self.offset = 0
+        
+    async def process(self, record: RuntimeRecord, index: int):
+        size = estimate_size(record.value)
+        self.offset += 1
+        self.source.records_read += 1
+        self.source.bytes_read += size
+        self.runtime.records_in += 1
+        self.runtime.bytes_in += size
+        self.runtime.job.records_processed += 1
+        await self.emit(record)
+        
+    def snapshot_state(self) -> Dict[str, Any]:
+        return {"offset": self.offset, "watermark": self.watermark}
+
+
+class OperatorTask(TaskRuntime):
+    """Задача оператора"""
+    
+    def __init__(self, runtime: "JobRuntime", operator: StreamOperator,
+                 function: Optional[Callable]):
+        super().__init__(runtime, operator.operator_id)
+        self.operator = operator
+        self.function = function
+        self.operator_type = operator.operator_type
+        self.output_targets: List[Tuple[str, str]] = []
+        self.field = operator.config.get("field")
+        self.key_field = operator.config.get("key_field")
+        
+        # Keyed state
+        self.keyed_state: Dict[Any, Any] = {}
+        self.join_state: Dict[Any, list] = {}
+        
+        # Window / aggregation
+        self.window: Optional[StreamWindow] = None
+        self.window_state: Optional[WindowState] = None
+        self.aggregator: Optional[Aggregator] = None
+        if self.operator_type == OperatorType.AGGREGATE:
+            name = operator.config.get("aggregate") or operator.function_name
+            self.aggregator = AGGREGATORS.get(name, AGGREGATORS["count"])
+            self.window = runtime.platform.windows.get(operator.config.get("window_id", ""))
+            if self.window:
+                self.window_state = WindowState(self.window, self.aggregator)
+                
+        # Process pool (CPU-heavy maps)
+        self.use_pool = (self.operator_type == OperatorType.MAP and function is not None
+                         and bool(operator.config.get("process_pool")) and runtime.process_pool is not None)
+        self.batch: List[RuntimeRecord] = []
+        self.in_flight: Optional[asyncio.Queue] = None
+        self.emitter: Optional[asyncio.Task] = None
+        
+    async def emit_record(self, record: RuntimeRecord):
+        self.operator.records_out += 1
+        await self.emit(record)
+        
+    async def process(self, record: RuntimeRecord, index: int):
+        self.operator.records_in += 1
+        operator_type = self.operator_type
+        function = self.function
+        
+        try:
+            if operator_type == OperatorType.MAP:
+                if self.use_pool:
+                    self.batch.append(record)
+                    if len(self.batch) >= PROCESS_POOL_BATCH_SIZE:
+                        await self._submit_batch()
+                    elif all(channel.queue.empty() for channel in self.inputs):
+                        # Idle input: ship the partial batch without waiting for it
+                        await self._submit_batch()
+                    return
+                if function:
+                    record.value = function(record.value)
+                await self.emit_record(record)
+                
+            elif operator_type == OperatorType.FILTER:
+                if function is None or function(record.value):
+                    await self.emit_record(record)
+                    
+            elif operator_type == OperatorType.FLATMAP:
+                values = function(record.value) if function else [record.value]
+                for value in values:
+                    await self.emit_record(RuntimeRecord(record.key, value, record.event_time_ms, record.ingest_ns))
+                    
+            elif operator_type == OperatorType.KEYBY:
+                if function:
+                    record.key = function(record.value)
+                elif self.key_field and isinstance(record.value, dict):
+                    record.key = record.value.get(self.key_field, record.key)
+                await self.emit_record(record)
+                
+            elif operator_type == OperatorType.REDUCE:
+                acc = self.keyed_state.get(record.key)
+                if acc is None or function is None:
+                    acc = record.value
+                else:
+                    acc = function(acc, record.value)
+                self.keyed_state[record.key] = acc
+                await self.emit_record(RuntimeRecord(record.key, acc, record.event_time_ms, record.ingest_ns))
+                
+            elif operator_type == OperatorType.AGGREGATE:
+                value = record.value
+                if self.field and isinstance(value, dict):
+                    value = value.get(self.field)
+                if self.window_state:
+                    accepted, refired = self.window_state.add(record.key, value, record.event_time_ms, self.watermark)
+                    if not accepted:
+                        self.runtime.late_record(self.window, record)
+                    for result in refired:
+                        await self._emit_window_result(result)
+                else:
+                    aggregator = self.aggregator
+                    acc = self.keyed_state.get(record.key)
+                    acc = aggregator.add(aggregator.create() if acc is None else acc, value)
+                    self.keyed_state[record.key] = acc
+                    await self.emit_record(RuntimeRecord(
+                        record.key, {"key": record.key, "result": aggregator.result(acc)},
+                        record.event_time_ms, record.ingest_ns
+                    ))
+                    
+            elif operator_type == OperatorType.JOIN:
+                sides = self.join_state.get(record.key)
+                if sides is None:
+                    sides = self.join_state[record.key] = [None, None]
+                sides[0 if index == 0 else 1] = record.value
+                left, right = sides
+                if left is not None and right is not None:
+                    joined = {**left, **right} if isinstance(left, dict) and isinstance(right, dict) else (left, right)
+                    await self.emit_record(RuntimeRecord(record.key, joined, record.event_time_ms, record.ingest_ns))
+                    
+            elif operator_type == OperatorType.SPLIT:
+                target = function(record.value) if function else None
+                if target is None:
+                    await self.emit_record(record)
+                else:
+                    self.operator.records_out += 1
+                    for channel, names in zip(self.outputs, self.output_targets):
+                        if target in names:
+                            await channel.put(record)
+                            
+            else:
+                await self.emit_record(record)
+                
+        except Exception:
+            self.runtime.job.errors += 1
+            
+    async def _submit_batch(self):
+        records = self.batch
+        self.batch = []
+        if self.in_flight is None:
+            self.in_flight = asyncio.Queue(maxsize=max(1, self.operator.parallelism))
+            self.emitter = asyncio.create_task(self._emit_batches())
+            self.runtime.tasks.append(self.emitter)
+            
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.runtime.process_pool, apply_map_batch,
+                                      self.function, [r.value for r in records])
+        await self.in_flight.put((records, future))
+        
+    async def _emit_batches(self):
+        """Выдача результатов пула процессов в порядке поступления"""
+        while True:
+            records, future = await self.in_flight.get()
+            try:
+                values = await future
+                for record, value in zip(records, values):
+                    record.value = value
+                    await self.emit_record(record)
+            except Exception:
+                self.runtime.job.errors += len(records)
+            finally:
+                self.in_flight.task_done()
+                
+    async def _emit_window_result(self, result: tuple):
+        key, start, end, value, count = result
+        await self.runtime.platform.fire_window(
+            self.window.window_id, key, value, count,
+            from_epoch_ms(start), from_epoch_ms(end)
+        )
+        await self.emit_record(RuntimeRecord(
+            key,
+            {"key": key, "window_start": start, "window_end": end, "result": value, "record_count": count},
+            end - 1
+        ))
+        
+    async def on_watermark(self, watermark: int):
+        await self.flush()
+        if self.window_state:
+            for result in self.window_state.advance(watermark):
+                await self._emit_window_result(result)
+                
+    async def flush(self):
+        if self.batch:
+            await self._submit_batch()
+        if self.in_flight is not None:
+            await self.in_flight.join()
+            
+    async def finish(self):
+        await self.flush()
+        if self.emitter:
+            self.emitter.cancel()
+            
+
+    def snapshot_state(self) -> Dict[str, Any]:
+        return {
+            "watermark": self.watermark,
+            "keyed_state": self.keyed_state,
+            "join_state": self.join_state,
+            "window": self.window_state.snapshot() if self.window_state else None
+        }
+
+
+class SinkTask(TaskRuntime):
+    """Задача приёмника"""
+    
+    def __init__(self, runtime: "JobRuntime", sink: StreamSink,
+                 handler: Optional[Callable]):
+        super().__init__(runtime, sink.sink_id)
+        self.sink = sink
+        self.handler = handler
+        
+    async def process(self, record: RuntimeRecord, index: int):
+        if self.handler:
+            try:
+                self.handler(record.value)
+            except Exception:
+                self.runtime.job.errors += 1
+                return
+        self.sink.records_written += 1
+        self.sink.bytes_written += estimate_size(record.value)
+        self.runtime.records_out += 1
+        if record.ingest_ns:
+            self.runtime.latency.record((time.perf_counter_ns() - record.ingest_ns) / 1e6)
+
+
+class JobRuntime:
+    """Исполнение топологии задания"""
+    
+    def __init__(self, platform: "StreamPlatform", job: StreamJob):
+        self.platform = platform
+        self.job = job
+        self.sources: Dict[str, SourceTask] = {}
+        self.operators: Dict[str, OperatorTask] = {}
+        self.sinks: Dict[str, SinkTask] = {}
+        self.terminal_tasks: Set[str] = set()
+        self.channels: List[Channel] = []
+        self.tasks: List[asyncio.Task] = []
+        self.checkpoint_task: Optional[asyncio.Task] = None
+        self.process_pool: Optional[ProcessPoolExecutor] = None
+        
+        # Checkpoints
+        self.pending_checkpoints: Dict[str, Dict[str, Any]] = {}
+        self.completed_checkpoint_dirs: deque = deque()
+        self.last_state_size_bytes = 0
+        
+        # Side outputs for late data
+        self.side_outputs: Dict[str, deque] = {}
+        
+        # Metrics
+        self.records_in = 0
+        self.bytes_in = 0
+        self.records_out = 0
+        self.latency = LatencyHistogram()
+        self.started_ns = 0
+        self.stopped_ns = 0
+        
+    def _connect(self, upstream: TaskRuntime, downstream: TaskRuntime) -> Channel:
+        channel = Channel()
+        upstream.outputs.append(channel)
+        downstream.inputs.append(channel)
+        self.channels.append(channel)
+        return channel
+        
+    def build(self) -> bool:
+        """Построение графа задач; False при цикле в топологии"""
+        platform = self.platform
+        job_operators = [platform.operators[op_id] for op_id in self.job.operator_ids if op_id in platform.operators]
+        operator_ids = {op.operator_id for op in job_operators}
+        
+        # Cycle check (Kahn)
+        in_degree = {op.operator_id: sum(1 for i in op.input_operators if i in operator_ids) for op in job_operators}
+        ready = [op_id for op_id, degree in in_degree.items() if degree == 0]
+        visited = 0
+        while ready:
+            op_id = ready.pop()
+            visited += 1
+            for out_id in platform.operators[op_id].output_operators:
+                if out_id in in_degree:
+                    in_degree[out_id] -= 1
+                    if in_degree[out_id] == 0:
+                        ready.append(out_id)
+        if visited != len(job_operators):
+            return False
+            
+        if any(op.operator_type == OperatorType.MAP and op.config.get("process_pool")
+               and op.function_name in platform.functions for op in job_operators):
+            workers = max(op.parallelism for op in job_operators if op.config.get("process_pool"))
+            self.process_pool = ProcessPoolExecutor(max_workers=max(1, workers))
+            
+        for src_id in self.job.source_ids:
+            source = platform.sources.get(src_id)
+            if source:
+                self.sources[src_id] = SourceTask(self, source)
+        for op in job_operators:
+            self.operators[op.operator_id] = OperatorTask(self, op, platform.functions.get(op.function_name))
+        for sink_id in self.job.sink_ids:
+            sink = platform.sinks.get(sink_id)
+            if sink:
+                self.sinks[sink_id] = SinkTask(self, sink, platform.functions.get(sink.config.get("function_name", "")))
+                
+        heads = [task for task in self.operators.values()
+                 if not any(i in operator_ids for i in task.operator.input_operators)]
+        tails = [task for task in self.operators.values()
+                 if not any(o in operator_ids for o in task.operator.output_operators)]
+                 
+        for task in self.operators.values():
+            for out_id in task.operator.output_operators:
+                if out_id in self.operators:
+                    self._connect(task, self.operators[out_id])
+                    task.output_targets.append((out_id, platform.operators[out_id].name))
+                    
+        for source in self.sources.values():
+            for head in heads:
+                self._connect(source, head)
+            if not self.operators:
+                for sink in self.sinks.values():
+                    self._connect(source, sink)
+                    
+        for tail in tails:
+            for sink in self.sinks.values():
+                self._connect(tail, sink)
+                tail.output_targets.append((sink.sink.sink_id, sink.sink.name))
+                
+        for task in self._all_tasks():
+            if task.inputs and not task.outputs:
+                self.terminal_tasks.add(task.task_id)
+                
+        return True
+        
+    def _all_tasks(self) -> List[TaskRuntime]:
+        return [*self.sources.values(), *self.operators.values(), *self.sinks.values()]
+        
+    def start(self):
+        self.started_ns = time.perf_counter_ns()
+        for task in self._all_tasks():
+            if task.inputs:
+                self.tasks.append(asyncio.create_task(self._run_task(task)))
+        if self.job.checkpoint_interval_ms > 0:
+            self.checkpoint_task = asyncio.create_task(self._checkpoint_loop())
+            
+    async def _run_task(self, task: TaskRuntime):
+        try:
+            await task.run()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.job.errors += 1
+            self.job.state = StreamState.FAILED
+            
+    async def _checkpoint_loop(self):
+        while True:
+            await asyncio.sleep(self.job.checkpoint_interval_ms / 1000)
+            await self.platform.trigger_checkpoint(self.job.job_id)
+            
+    def to_record(self, source: StreamSource, item: Any) -> RuntimeRecord:
+        """Преобразование входного элемента в запись рантайма"""
+        now_ns = time.perf_counter_ns()
+        if isinstance(item, RuntimeRecord):
+            item.ingest_ns = item.ingest_ns or now_ns
+            return item
+        if isinstance(item, StreamRecord):
+            return RuntimeRecord(item.key, item.value, to_epoch_ms(item.event_time), now_ns)
+            
+        key = ""
+        event_time = None
+        if isinstance(item, dict):
+            key_field = source.config.get("key_field")
+            timestamp_field = source.config.get("timestamp_field")
+            if key_field:
+                key = item.get(key_field, "")
+            if timestamp_field:
+                event_time = item.get(timestamp_field)
+        return RuntimeRecord(key, item, to_epoch_ms(event_time), now_ns)
+        
+    async def ingest(self, source_id: str, items: List[Any]) -> int:
+        task = self.sources.get(source_id)
+        if not task:
+            return 0
+        channel = task.inputs[0]
+        for item in items:
+            await channel.put(self.to_record(task.source, item))
+        return len(items)
+        
+    async def inject(self, source_id: str, item: Any):
+        task = self.sources.get(source_id)
+        if task:
+            await task.inputs[0].put(item)
+            
+    def late_record(self, window: StreamWindow, record: RuntimeRecord):
+        if window.late_data_policy == LateDataPolicy.SIDE_OUTPUT:
+            side_output = self.side_outputs.get(window.window_id)
+            if side_output is None:
+                side_output = self.side_outputs[window.window_id] = deque(maxlen=MAX_SIDE_OUTPUT_RECORDS)
+            side_output.append(record.value)
+            
+    async def checkpoint(self, checkpoint: Checkpoint) -> bool:
+        """Контрольная точка: барьеры от источников, выравнивание, снимки на диск"""
+        started = time.perf_counter_ns()
+        directory = os.path.join(self.platform.checkpoint_dir, self.job.job_id, checkpoint.checkpoint_id)
+        await asyncio.to_thread(os.makedirs, directory, exist_ok=True)
+        
+        entry = {
+            "checkpoint": checkpoint,
+            "directory": directory,
+            "acks": set(),
+            "future": asyncio.get_running_loop().create_future(),
+            "writes": [],
+            "tasks": {},
+            "alignment_ns": 0,
+            "failed": False
+        }
+        self.pending_checkpoints[checkpoint.checkpoint_id] = entry
+        
+        barrier = CheckpointBarrier(checkpoint.checkpoint_id,
+                                    aligned=self.job.checkpoint_mode == CheckpointMode.EXACTLY_ONCE)
+        for task in self.sources.values():
+            await task.inputs[0].put(barrier)
+        if not self.terminal_tasks:
+            entry["future"].set_result(True)
+            
+        try:
+            await asyncio.wait_for(entry["future"], CHECKPOINT_TIMEOUT_SECONDS)
+            await asyncio.gather(*entry["writes"])
+        except (asyncio.TimeoutError, OSError):
+            entry["failed"] = True
+        finally:
+            self.pending_checkpoints.pop(checkpoint.checkpoint_id, None)
+            
+        checkpoint.duration_ms = int((time.perf_counter_ns() - started) / 1e6)
+        checkpoint.alignment_duration_ms = int(entry["alignment_ns"] / 1e6)
+        checkpoint.state_size_bytes = sum(entry["tasks"].values())
+        
+        if entry["failed"]:
+            await asyncio.to_thread(shutil.rmtree, directory, True)
+            return False
+            
+        manifest = {
+            "checkpoint_id": checkpoint.checkpoint_id,
+            "job_id": self.job.job_id,
+            "mode": self.job.checkpoint_mode.value,
+            "tasks": entry["tasks"],
+            "completed_at": datetime.now().isoformat()
+        }
+        await asyncio.to_thread(write_snapshot_file, os.path.join(directory, "_metadata.json"),
+                                json.dumps(manifest, indent=2).encode())
+        self.last_state_size_bytes = checkpoint.state_size_bytes
+        
+        # Retain only the newest checkpoints on disk
+        self.completed_checkpoint_dirs.append(directory)
+        while len(self.completed_checkpoint_dirs) > CHECKPOINTS_RETAINED:
+            await asyncio.to_thread(shutil.rmtree, self.completed_checkpoint_dirs.popleft(), True)
+        return True
+        
+    def snapshot_task(self, checkpoint_id: str, task: TaskRuntime, alignment_ns: int):
+        """Синхронная фаза снимка задачи; запись на диск выполняется асинхронно"""
+        entry = self.pending_checkpoints.get(checkpoint_id)
+        if entry is None:
+            return
+            
+        state = task.snapshot_state()
+        try:
+            data = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            entry["failed"] = True
+            data = b""
+            
+        if data:
+            path = os.path.join(entry["directory"], f"{task.task_id}.state")
+            entry["writes"].append(asyncio.ensure_future(asyncio.to_thread(write_snapshot_file, path, data)))
+        entry["tasks"][task.task_id] = len(data)
+        entry["alignment_ns"] = max(entry["alignment_ns"], alignment_ns)
+        
+        if isinstance(task, OperatorTask) and task.operator.has_state:
+            snapshot = StateSnapshot(
+                snapshot_id=f"snap_{uuid.uuid4().hex[:8]}",
+                operator_id=task.task_id,
+                state_data={"keys": len(task.keyed_state) + len(task.join_state),
+                            "path": os.path.join(entry["directory"], f"{task.task_id}.state")},
+                state_size_bytes=len(data),
+                checkpoint_id=checkpoint_id
+            )
+            self.platform.state_snapshots[snapshot.snapshot_id] = snapshot
+            
+        if task.task_id in self.terminal_tasks:
+            entry["acks"].add(task.task_id)
+            if len(entry["acks"]) == len(self.terminal_tasks) and not entry["future"].done():
+                entry["future"].set_result(True)
+                
+    async def stop(self, drain: bool = True, timeout: float = 10.0):
+        if self.checkpoint_task:
+            self.checkpoint_task.cancel()
+        if drain:
+            for task in self.sources.values():
+                await task.inputs[0].put(END_OF_STREAM)
+            if self.tasks:
+                await asyncio.wait(self.tasks, timeout=timeout)
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        for entry in self.pending_checkpoints.values():
+            if not entry["future"].done():
+                entry["future"].set_result(False)
+        if self.process_pool:
+            self.process_pool.shutdown(wait=False, cancel_futures=True)
+        self.stopped_ns = time.perf_counter_ns()
+        
+    def elapsed_seconds(self) -> float:
+        end = self.stopped_ns or time.perf_counter_ns()
+        return max((end - self.started_ns) / 1e9, 1e-9)
+        
+    def backpressure_ratio(self) -> float:
+        """Доля времени, проведённого производителями в ожидании полного канала"""
+        if not self.channels:
+            return 0.0
+        elapsed_ns = self.elapsed_seconds() * 1e9
+        return min(1.0, max(channel.blocked_ns for channel in self.channels) / elapsed_ns)
+
+
 class StreamPlatform:
     """Платформа потоковой обработки"""
     
-    def __init__(self):
+    def __init__(self, checkpoint_dir: str = None):
         self.sources: Dict[str, StreamSource] = {}
         self.operators: Dict[str, StreamOperator] = {}
         self.windows: Dict[str, StreamWindow] = {}
@@ -401,6 +1465,15 @@ class StreamPlatform:
         self.metrics: Dict[str, StreamMetrics] = {}
         self.window_results: Dict[str, WindowResult] = {}
         
+        # Runtime
+        self.functions: Dict[str, Callable] = {}
+        self.runtimes: Dict[str, JobRuntime] = {}
+        self.checkpoint_dir = checkpoint_dir or os.path.join(tempfile.gettempdir(), "stream_checkpoints")
+        
+    def register_function(self, name: str, function: Callable):
+        """Регистрация пользовательской функции оператора/приёмника"""
+        self.functions[name] = function
+        
     async def create_source(self, name: str,
                            source_type: SourceType,
                            connection_string: str = "",
@@ -525,50 +1598,39 @@ class StreamPlatform:
         if not job or job.state == StreamState.RUNNING:
             return False
             
+        runtime = JobRuntime(self, job)
+        if not runtime.build():
+            job.state = StreamState.FAILED
+            return False
+            
         job.state = StreamState.RUNNING
         job.started_at = datetime.now()
+        job.stopped_at = None
         
-        # Simulate job execution
-        await self._simulate_job_execution(job)
+        self.runtimes[job_id] = runtime
+        runtime.start()
         
         return True
         
-    async def _simulate_job_execution(self, job: StreamJob):
-        """Симуляция выполнения задания"""
-        for _ in range(10):
-            # Simulate records processing
-            records = random.randint(100, 1000)
-            job.records_processed += records
-            
-            # Update sources
-            for src_id in job.source_ids:
-                src = self.sources.get(src_id)
-                if src:
-                    src.records_read += records // len(job.source_ids)
-                    src.bytes_read += records * 100
-                    
-            # Update operators
-            for op_id in job.operator_ids:
-                op = self.operators.get(op_id)
-                if op:
-                    op.records_in += records // len(job.operator_ids)
-                    op.records_out += int(records * 0.9)  # Some filtering
-                    
-            # Update sinks
-            for sink_id in job.sink_ids:
-                sink = self.sinks.get(sink_id)
-                if sink:
-                    sink.records_written += records // len(job.sink_ids)
-                    sink.bytes_written += records * 80
-                    
-        job.uptime_seconds = random.randint(300, 3600)
+    async def ingest(self, source_id: str, records: List[Any]) -> int:
+        """Подача записей в источник всех запущенных заданий"""
+        accepted = 0
+        for runtime in list(self.runtimes.values()):
+            if source_id in runtime.sources:
+                accepted += await runtime.ingest(source_id, records)
+        return accepted
         
-    async def stop_job(self, job_id: str) -> bool:
+    async def stop_job(self, job_id: str, drain: bool = True) -> bool:
         """Остановка задания"""
         job = self.jobs.get(job_id)
         if not job or job.state != StreamState.RUNNING:
             return False
             
+        runtime = self.runtimes.pop(job_id, None)
+        if runtime:
+            await runtime.stop(drain)
+            job.uptime_seconds = int(runtime.elapsed_seconds())
+            
         job.state = StreamState.STOPPED
         job.stopped_at = datetime.now()
         return True
@@ -576,7 +1638,10 @@ class StreamPlatform:
     async def trigger_checkpoint(self, job_id: str) -> Optional[Checkpoint]:
         """Создание контрольной точки"""
         job = self.jobs.get(job_id)
-        if not job or job.state != StreamState.RUNNING:
+        runtime = self.runtimes.get(job_id)
+        if not job or job.state != StreamState.RUNNING or not runtime:
+            return None
+        if runtime.pending_checkpoints:
             return None
             
         checkpoint = Checkpoint(
@@ -584,30 +1649,13 @@ class StreamPlatform:
             job_id=job_id,
             status="in_progress"
         )
+        self.checkpoints[checkpoint.checkpoint_id] = checkpoint
         
-        # Simulate checkpoint
-        await asyncio.sleep(0.01)
+        completed = await runtime.checkpoint(checkpoint)
         
-        checkpoint.status = "completed"
-        checkpoint.state_size_bytes = random.randint(1000000, 10000000)
-        checkpoint.duration_ms = random.randint(100, 2000)
-        checkpoint.alignment_duration_ms = random.randint(10, 200)
+        checkpoint.status = "completed" if completed else "failed"
         checkpoint.completion_timestamp = datetime.now()
         
-        # Create state snapshots
-        for op_id in job.operator_ids:
-            op = self.operators.get(op_id)
-            if op and op.has_state:
-                snapshot = StateSnapshot(
-                    snapshot_id=f"snap_{uuid.uuid4().hex[:8]}",
-                    operator_id=op_id,
-                    state_data={"count": random.randint(1000, 10000)},
-                    state_size_bytes=random.randint(10000, 100000),
-                    checkpoint_id=checkpoint.checkpoint_id
-                )
-                self.state_snapshots[snapshot.snapshot_id] = snapshot
-                
-        self.checkpoints[checkpoint.checkpoint_id] = checkpoint
         return checkpoint
         
     async def emit_watermark(self, source_id: str,
@@ -625,6 +1673,15 @@ class StreamPlatform:
         )
         
         self.watermarks[watermark.watermark_id] = watermark
+        
+        # Propagate into running jobs
+        if source.watermark_strategy != WatermarkStrategy.NO_WATERMARK:
+            timestamp_ms = to_epoch_ms(event_time)
+            if source.watermark_strategy == WatermarkStrategy.BOUNDED:
+                timestamp_ms -= source.max_out_of_orderness_ms
+            for runtime in list(self.runtimes.values()):
+                await runtime.inject(source_id, WatermarkEvent(timestamp_ms))
+                
         return watermark
         
     async def fire_window(self, window_id: str,
@@ -649,6 +1706,8 @@ class StreamPlatform:
         )
         
         self.window_results[win_result.result_id] = win_result
+        if len(self.window_results) > MAX_WINDOW_RESULTS:
+            del self.window_results[next(iter(self.window_results))]
         return win_result
         
     async def collect_metrics(self, job_id: str) -> Optional[StreamMetrics]:
@@ -659,17 +1718,23 @@ class StreamPlatform:
             
         metrics = StreamMetrics(
             metrics_id=f"met_{uuid.uuid4().hex[:8]}",
-            job_id=job_id,
-            records_per_second=random.uniform(1000, 50000),
-            bytes_per_second=random.uniform(100000, 5000000),
-            avg_latency_ms=random.uniform(10, 100),
-            p99_latency_ms=random.uniform(50, 500),
-            backpressure_ratio=random.uniform(0, 0.3),
-            state_size_bytes=random.randint(10000000, 100000000)
+            job_id=job_id
         )
         
+        runtime = self.runtimes.get(job_id)
+        if runtime:
+            elapsed = runtime.elapsed_seconds()
+            job.uptime_seconds = int(elapsed)
+            
+            metrics.records_per_second = runtime.records_in / elapsed
+            metrics.bytes_per_second = runtime.bytes_in / elapsed
+            metrics.avg_latency_ms = runtime.latency.avg_ms
+            metrics.p99_latency_ms = runtime.latency.percentile(0.99)
+            metrics.backpressure_ratio = runtime.backpressure_ratio()
+            metrics.state_size_bytes = runtime.last_state_size_bytes
+            
         # Calculate checkpoint metrics
-        job_checkpoints = [c for c in self.checkpoints.values() if c.job_id == job_id]
+        job_checkpoints = [c for c in self.checkpoints.values() if c.job_id == job_id and c.status == "completed"]
         if job_checkpoints:
             metrics.checkpoint_duration_ms = sum(c.duration_ms for c in job_checkpoints) / len(job_checkpoints)
             
@@ -688,6 +1753,13 @@ class StreamPlatform:
         to_op.input_operators.append(from_op_id)
         return True
         
+    def get_side_output(self, window_id: str) -> List[Any]:
+        """Поздние записи, отправленные в side output окна"""
+        for runtime in self.runtimes.values():
+            if window_id in runtime.side_outputs:
+                return list(runtime.side_outputs[window_id])
+        return []
+        
     def get_job_topology(self, job_id: str) -> Dict[str, List[str]]:
         """Получение топологии задания"""
         job = self.jobs.get(job_id)
@@ -736,6 +1808,7 @@ class StreamPlatform:
         completed_checkpoints = sum(1 for c in self.checkpoints.values() if c.status == "completed")
         
         total_records = sum(j.records_processed for j in self.jobs.values())
+        late_records = sum(w.late_records for w in self.windows.values())
         
         return {
             "total_sources": total_sources,
@@ -749,7 +1822,9 @@ class StreamPlatform:
             "running_jobs": running_jobs,
             "total_checkpoints": total_checkpoints,
             "completed_checkpoints": completed_checkpoints,
-            "total_records": total_records
+            "total_records": total_records,
+            "total_window_results": len(self.window_results),
+            "late_records": late_records
         }
 
 
@@ -868,6 +1943,15 @@ async def main():
         jobs.append(job)
         print(f"  🎯 {name} (parallelism: {par})")
         
+    # Bind window to the aggregation operator and register functions
+    operators[4].config["window_id"] = windows[0].window_id
+    
+    platform.register_function("parse_json", lambda v: json.loads(v) if isinstance(v, str) else v)
+    platform.register_function("is_valid", lambda v: bool(v.get("user_id")))
+    platform.register_function("extract_fields", lambda v: {"user_id": v.get("user_id"), "event_type": v.get("event_type"), "amount": v.get("amount", 0)})
+    platform.register_function("get_user_id", lambda v: v.get("user_id") or v.get("key"))
+    platform.register_function("sum_values", lambda acc, v: {**v, "result": acc.get("result", 0) + v.get("result", 0)})
+    
     # Start Jobs
     print("\n▶️ Starting Jobs...")
     
@@ -875,6 +1959,32 @@ async def main():
         await platform.start_job(job.job_id)
         print(f"  ▶️ {job.name}: {job.state.value}")
         
+    # Stream Records
+    print("\n📨 Streaming Records...")
+    
+    base_time = datetime.now() - timedelta(minutes=10)
+    event_types = ["click", "view", "purchase", "signup"]
+    
+    for job in jobs[:3]:
+        source_id = job.source_ids[0]
+        sent = 0
+        for chunk in range(10):
+            records = []
+            for i in range(200):
+                offset_ms = (chunk * 200 + i) * 150 - random.randint(0, 2000)
+                records.append(StreamRecord(
+                    record_id=f"rec_{uuid.uuid4().hex[:8]}",
+                    value={
+                        "user_id": f"user_{random.randint(1, 50)}",
+                        "event_type": random.choice(event_types),
+                        "amount": round(random.uniform(1, 100), 2)
+                    },
+                    event_time=base_time + timedelta(milliseconds=max(0, offset_ms))
+                ))
+            sent += await platform.ingest(source_id, records)
+            await platform.emit_watermark(source_id, base_time + timedelta(milliseconds=(chunk + 1) * 200 * 150))
+        print(f"  📨 {job.name}: {sent} records")
+        
     # Trigger Checkpoints
     print("\n💾 Triggering Checkpoints...")
     
@@ -886,7 +1996,7 @@ async def main():
                 if ckpt:
                     checkpoints.append(ckpt)
                     
-    print(f"  💾 Created {len(checkpoints)} checkpoints")
+    print(f"  💾 Created {len(checkpoints)} checkpoints in {platform.checkpoint_dir}")
     
     # Emit Watermarks
     print("\n💧 Emitting Watermarks...")
@@ -901,25 +2011,15 @@ async def main():
                 
     print(f"  💧 Emitted {len(watermarks)} watermarks")
     
-    # Fire Windows
-    print("\n🔔 Firing Windows...")
+    # Fired Windows
+    print("\n🔔 Fired Windows...")
     
-    window_results = []
-    for win in windows[:3]:
-        for i in range(5):
-            now = datetime.now()
-            result = await platform.fire_window(
-                win.window_id,
-                f"user_{random.randint(1, 100)}",
-                {"count": random.randint(10, 1000), "sum": random.uniform(100, 10000)},
-                random.randint(50, 500),
-                now - timedelta(minutes=1),
-                now
-            )
-            window_results.append(result)
-            
+    await asyncio.sleep(0.1)
+    window_results = list(platform.window_results.values())
     print(f"  🔔 Fired {len(window_results)} windows")
-    
+    for result in window_results[:3]:
+        print(f"  🔔 {result.key} [{result.window_start:%H:%M:%S} - {result.window_end:%H:%M:%S}): {result.result} events")
+        
     # Collect Metrics
     print("\n📊 Collecting Metrics...")
     
@@ -928,7 +2028,7 @@ async def main():
         met = await platform.collect_metrics(job.job_id)
         if met:
             metrics.append(met)
-            print(f"  📊 {job.name}: {met.records_per_second:.0f} rec/s, {met.avg_latency_ms:.1f}ms avg")
+            print(f"  📊 {job.name}: {met.records_per_second:.0f} rec/s, {met.avg_latency_ms:.1f}ms avg, {met.p99_latency_ms:.1f}ms p99")
             
     # Stream Sources Dashboard
     print("\n📥 Stream Sources:")
@@ -1082,6 +2182,10 @@ async def main():
         
     print("  └────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────┘")
     
+    # Stop Jobs
+    for job in jobs[:3]:
+        await platform.stop_job(job.job_id)
+        
     # Statistics
     stats = platform.get_statistics()
     
@@ -1094,6 +2198,7 @@ async def main():
     print(f"  Jobs: {stats['running_jobs']}/{stats['total_jobs']} running")
     print(f"  Checkpoints: {stats['completed_checkpoints']}/{stats['total_checkpoints']} completed")
     print(f"  Total Records: {stats['total_records']:,}")
+    print(f"  Window Results: {stats['total_window_results']} ({stats['late_records']} late records)")
     
     # Dashboard
     print("\n┌────────────────────────────────────────────────────────────────────┐")
@@ -15,10 +15,15 @@ Server Init - Iteration 346: Message Broker Platform
 """
 
 import asyncio
+import heapq
+import itertools
 import random
+import sys
+import time
+from collections import deque
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Set, Callable
+from typing import Dict, List, Optional, Any, Set, Callable, Iterable, Tuple
 from enum import Enum
 import uuid
 import json
@@ -109,6 +114,9 @@ class Message:
     retry_count: int = 0
     max_retries: int = 3
     
+    # Queues still holding the message
+    pending_deliveries: int = 0
+    
     # Timestamps
     timestamp: datetime = field(default_factory=datetime.now)
     delivered_at: Optional[datetime] = None
@@ -175,6 +183,9 @@ class Exchange:
     # Alternate exchange
     alternate_exchange: str = ""
     
+    # Routing table built from bindings
+    routing_table: Optional["RoutingTable"] = None
+    
     # Stats
     messages_in: int = 0
     messages_out: int = 0
@@ -227,6 +238,10 @@ class Consumer:
     messages_consumed: int = 0
     messages_acknowledged: int = 0
     messages_rejected: int = 0
+    unacked_count: int = 0
+    
+    # Delivered, not yet acked/rejected message ids
+    unacked_ids: Set[str] = field(default_factory=set)
     
     # Timestamps
     created_at: datetime = field(default_factory=datetime.now)
@@ -382,6 +397,143 @@ class VirtualHost:
     created_at: datetime = field(default_factory=datetime.now)
 
 
+class TopicTrie:
+    """Скомпилированное дерево топик-паттернов (* — одно слово, # — ноль и более слов)"""
+    __slots__ = ("children", "destinations")
+    
+    def __init__(self):
+        self.children: Dict[str, "TopicTrie"] = {}
+        self.destinations: Dict[str, None] = {}
+        
+    def insert(self, pattern: str, destination: str):
+        node = self
+        for word in pattern.split(".") if pattern else []:
+            child = node.children.get(word)
+            if child is None:
+                child = node.children[word] = TopicTrie()
+            node = child
+        node.destinations[destination] = None
+        
+    def match(self, words: List[str], i: int, out: Dict[str, None]):
+        hash_node = self.children.get("#")
+        if hash_node is not None:
+            for j in range(i, len(words) + 1):
+                hash_node.match(words, j, out)
+                
+        if i == len(words):
+            out.update(self.destinations)
+            return
+            
+        child = self.children.get(words[i])
+        if child is not None:
+            child.match(words, i + 1, out)
+        star = self.children.get("*")
+        if star is not None:
+            star.match(words, i + 1, out)
+
+
+class RoutingTable:
+    """Таблица маршрутизации обмена
+    
+    direct — хэш routing_key -> очереди, fanout — готовый кортеж очередей,
+    topic — дерево паттернов с кэшем результатов по routing_key,
+    headers — линейная проверка аргументов привязок.
+    """
+    TOPIC_CACHE_SIZE = 4096
+    
+    def __init__(self, exchange_type: ExchangeType):
+        self.exchange_type = exchange_type
+        self.direct: Dict[str, Tuple[str, ...]] = {}
+        self.fanout: Tuple[str, ...] = ()
+        self.topic = TopicTrie()
+        self.headers: List[Binding] = []
+        self.topic_cache: Dict[str, Tuple[str, ...]] = {}
+        
+    def add(self, binding: Binding):
+        """Добавление привязки"""
+        destination = binding.destination
+        if self.exchange_type == ExchangeType.DIRECT:
+            current = self.direct.get(binding.routing_key, ())
+            if destination not in current:
+                self.direct[binding.routing_key] = current + (destination,)
+        elif self.exchange_type == ExchangeType.FANOUT:
+            if destination not in self.fanout:
+                self.fanout = self.fanout + (destination,)
+        elif self.exchange_type == ExchangeType.TOPIC:
+            self.topic.insert(binding.routing_key, destination)
+            self.topic_cache.clear()
+        else:
+            self.headers.append(binding)
+            
+    @staticmethod
+    def match_headers(binding_headers: Dict[str, Any],
+                      message_headers: Dict[str, Any]) -> bool:
+        """Сопоставление заголовков"""
+        x_match = binding_headers.get("x-match", "all")
+        
+        matches = 0
+        required = 0
+        for key, value in binding_headers.items():
+            if key.startswith("x-"):
+                continue
+            required += 1
+            if message_headers.get(key) == value:
+                matches += 1
+                
+        if x_match == "all":
+            return matches == required
+        return matches > 0
+        
+    def route(self, routing_key: str, headers: Dict[str, Any]) -> Tuple[str, ...]:
+        """Очереди назначения для сообщения"""
+        exchange_type = self.exchange_type
+        if exchange_type == ExchangeType.DIRECT:
+            return self.direct.get(routing_key, ())
+        if exchange_type == ExchangeType.FANOUT:
+            return self.fanout
+        if exchange_type == ExchangeType.TOPIC:
+            destinations = self.topic_cache.get(routing_key)
+            if destinations is None:
+                out: Dict[str, None] = {}
+                self.topic.match(routing_key.split(".") if routing_key else [], 0, out)
+                destinations = tuple(out)
+                if len(self.topic_cache) >= self.TOPIC_CACHE_SIZE:
+                    self.topic_cache.clear()
+                self.topic_cache[routing_key] = destinations
+            return destinations
+        return tuple(dict.fromkeys(
+            b.destination for b in self.headers if self.match_headers(b.arguments, headers)
+        ))
+
+
+class QueueBuffer:
+    """Готовые сообщения очереди: deque (FIFO) или heap (priority, затем FIFO)"""
+    __slots__ = ("priority", "items", "seq")
+    
+    def __init__(self, priority: bool = False):
+        self.priority = priority
+        self.items: Any = [] if priority else deque()
+        self.seq = 0
+        
+    def __len__(self) -> int:
+        return len(self.items)
+        
+    def push(self, message: Message, priority: int = 0):
+        if self.priority:
+            self.seq += 1
+            heapq.heappush(self.items, (-priority, self.seq, message))
+        else:
+            self.items.append(message)
+            
+    def pop_many(self, limit: int) -> List[Message]:
+        items = self.items
+        count = min(limit, len(items))
+        if self.priority:
+            return [heapq.heappop(items)[2] for _ in range(count)]
+        popleft = items.popleft
+        return [popleft() for _ in range(count)]
+
+
 class MessageBroker:
     """Брокер сообщений"""
     
@@ -398,8 +550,17 @@ class MessageBroker:
         self.queue_metrics: Dict[str, QueueMetrics] = {}
         self.vhosts: Dict[str, VirtualHost] = {}
         
+        # Name indexes
+        self.exchanges_by_name: Dict[str, Exchange] = {}
+        self.queues_by_name: Dict[str, Queue] = {}
+        self.consumer_groups_by_name: Dict[str, ConsumerGroup] = {}
+        
         # Queue message buffers
-        self.queue_messages: Dict[str, List[str]] = {}
+        self.queue_messages: Dict[str, QueueBuffer] = {}
+        
+        # Message ids: префикс брокера + счётчик вместо uuid4 на каждое сообщение
+        self._message_prefix = uuid.uuid4().hex[:6]
+        self._message_seq = itertools.count(1)
         
         # Stats
         self.total_published = 0
@@ -432,6 +593,10 @@ class MessageBroker:
                               alternate_exchange: str = "",
                               arguments: Dict[str, Any] = None) -> Exchange:
         """Объявление обмена"""
+        existing = self.exchanges_by_name.get(name)
+        if existing:
+            return existing
+            
         exchange = Exchange(
             exchange_id=f"ex_{uuid.uuid4().hex[:8]}",
             name=name,
@@ -440,12 +605,24 @@ class MessageBroker:
             auto_delete=auto_delete,
             internal=internal,
             alternate_exchange=alternate_exchange,
-            arguments=arguments or {}
+            arguments=arguments or {},
+            routing_table=RoutingTable(exchange_type)
         )
         
         self.exchanges[exchange.exchange_id] = exchange
+        self.exchanges_by_name[name] = exchange
+        
+        # Bindings declared before the exchange
+        self._rebuild_routing_table(exchange)
         return exchange
         
+    def _rebuild_routing_table(self, exchange: Exchange):
+        """Пересборка таблицы маршрутизации обмена из его привязок"""
+        exchange.routing_table = RoutingTable(exchange.exchange_type)
+        for binding in self.bindings.values():
+            if binding.source == exchange.name:
+                exchange.routing_table.add(binding)
+        
     async def declare_queue(self, name: str,
                            queue_type: QueueType = QueueType.STANDARD,
                            durable: bool = True,
@@ -458,6 +635,10 @@ class MessageBroker:
                            dead_letter_routing_key: str = "",
                            arguments: Dict[str, Any] = None) -> Queue:
         """Объявление очереди"""
+        existing = self.queues_by_name.get(name)
+        if existing:
+            return existing
+            
         queue = Queue(
             queue_id=f"q_{uuid.uuid4().hex[:8]}",
             name=name,
@@ -474,7 +655,8 @@ class MessageBroker:
         )
         
         self.queues[queue.queue_id] = queue
-        self.queue_messages[name] = []
+        self.queues_by_name[name] = queue
+        self.queue_messages[name] = QueueBuffer(priority=queue_type == QueueType.PRIORITY)
         return queue
         
     async def bind_queue(self, exchange_name: str,
@@ -492,21 +674,35 @@ class MessageBroker:
         )
         
         self.bindings[binding.binding_id] = binding
+        
+        exchange = self.exchanges_by_name.get(exchange_name)
+        if exchange:
+            exchange.routing_table.add(binding)
         return binding
         
-    async def publish_message(self, exchange_name: str,
-                             routing_key: str,
-                             body: bytes,
-                             content_type: str = "application/json",
-                             headers: Dict[str, Any] = None,
-                             priority: int = 0,
-                             delivery_mode: DeliveryMode = DeliveryMode.PERSISTENT,
-                             expiration: int = 0,
-                             correlation_id: str = "",
-                             reply_to: str = "") -> Message:
-        """Публикация сообщения"""
+    async def unbind_queue(self, binding_id: str) -> bool:
+        """Удаление привязки (таблица маршрутизации обмена пересобирается)"""
+        binding = self.bindings.pop(binding_id, None)
+        if not binding:
+            return False
+            
+        exchange = self.exchanges_by_name.get(binding.source)
+        if exchange:
+            self._rebuild_routing_table(exchange)
+        return True
+        
+    def _new_message(self, exchange_name: str,
+                     routing_key: str,
+                     body: bytes,
+                     content_type: str,
+                     headers: Optional[Dict[str, Any]],
+                     priority: int,
+                     delivery_mode: DeliveryMode,
+                     expiration: int = 0,
+                     correlation_id: str = "",
+                     reply_to: str = "") -> Message:
         message = Message(
-            message_id=f"msg_{uuid.uuid4().hex[:12]}",
+            message_id=f"msg_{self._message_prefix}{next(self._message_seq):06x}",
             body=body,
             content_type=content_type,
             routing_key=routing_key,
@@ -518,122 +714,105 @@ class MessageBroker:
             correlation_id=correlation_id,
             reply_to=reply_to
         )
-        
         self.messages[message.message_id] = message
         self.total_published += 1
+        return message
         
-        # Route message to queues
-        await self._route_message(message)
-        
-        # Update exchange stats
-        exchange = self._find_exchange_by_name(exchange_name)
+    def _publish(self, exchange: Optional[Exchange], message: Message,
+                 destinations: Optional[Tuple[str, ...]] = None):
+        """Маршрутизация и доставка без await (путь горячих данных)"""
         if exchange:
             exchange.messages_in += 1
+            if destinations is None:
+                destinations = self._route_message(exchange, message)
+            for queue_name in destinations:
+                self._deliver_to_queue(queue_name, message)
+            exchange.messages_out += 1
             
-        return message
-        
-    def _find_exchange_by_name(self, name: str) -> Optional[Exchange]:
-        """Поиск обмена по имени"""
-        for ex in self.exchanges.values():
-            if ex.name == name:
-                return ex
-        return None
-        
-    def _find_queue_by_name(self, name: str) -> Optional[Queue]:
-        """Поиск очереди по имени"""
-        for q in self.queues.values():
-            if q.name == name:
-                return q
-        return None
-        
-    async def _route_message(self, message: Message):
-        """Маршрутизация сообщения"""
-        exchange = self._find_exchange_by_name(message.exchange)
-        if not exchange:
-            return
+        # Сообщение не попало ни в одну очередь — не держим его в памяти
+        if message.pending_deliveries == 0:
+            self.messages.pop(message.message_id, None)
             
-        # Find matching bindings
-        for binding in self.bindings.values():
-            if binding.source != message.exchange:
-                continue
-                
-            if binding.destination_type != "queue":
-                continue
-                
-            # Check routing based on exchange type
-            if exchange.exchange_type == ExchangeType.FANOUT:
-                await self._deliver_to_queue(binding.destination, message)
-            elif exchange.exchange_type == ExchangeType.DIRECT:
-                if binding.routing_key == message.routing_key:
-                    await self._deliver_to_queue(binding.destination, message)
-            elif exchange.exchange_type == ExchangeType.TOPIC:
-                if self._match_topic(binding.routing_key, message.routing_key):
-                    await self._deliver_to_queue(binding.destination, message)
-            elif exchange.exchange_type == ExchangeType.HEADERS:
-                if self._match_headers(binding.arguments, message.headers):
-                    await self._deliver_to_queue(binding.destination, message)
-                    
-        exchange.messages_out += 1
-        
-    def _match_topic(self, pattern: str, routing_key: str) -> bool:
-        """Сопоставление топика"""
-        pattern_parts = pattern.split(".")
-        key_parts = routing_key.split(".")
-        
-        i, j = 0, 0
-        while i < len(pattern_parts) and j < len(key_parts):
-            if pattern_parts[i] == "#":
-                return True
-            elif pattern_parts[i] == "*":
-                i += 1
-                j += 1
-            elif pattern_parts[i] == key_parts[j]:
-                i += 1
-                j += 1
-            else:
-                return False
-                
-        return i == len(pattern_parts) and j == len(key_parts)
-        
-    def _match_headers(self, binding_headers: Dict[str, Any],
-                      message_headers: Dict[str, Any]) -> bool:
-        """Сопоставление заголовков"""
-        x_match = binding_headers.get("x-match", "all")
+    async def publish_message(self, exchange_name: str,
+                             routing_key: str,
+                             body: bytes,
+                             content_type: str = "application/json",
+                             headers: Dict[str, Any] = None,
+                             priority: int = 0,
+                             delivery_mode: DeliveryMode = DeliveryMode.PERSISTENT,
+                             expiration: int = 0,
+                             correlation_id: str = "",
+                             reply_to: str = "") -> Message:
+        """Публикация сообщения"""
+        message = self._new_message(exchange_name, routing_key, body, content_type, headers,
+                                    priority, delivery_mode, expiration, correlation_id, reply_to)
+        self._publish(self.exchanges_by_name.get(exchange_name), message)
+        return message
         
-        matches = 0
-        for key, value in binding_headers.items():
-            if key.startswith("x-"):
-                continue
-            if message_headers.get(key) == value:
-                matches += 1
-                
-        if x_match == "all":
-            return matches == len([k for k in binding_headers if not k.startswith("x-")])
-        else:  # any
-            return matches > 0
+    async def publish_batch(self, exchange_name: str,
+                            messages: Iterable[Tuple[str, bytes]],
+                            content_type: str = "application/json",
+                            headers: Dict[str, Any] = None,
+                            priority: int = 0,
+                            delivery_mode: DeliveryMode = DeliveryMode.PERSISTENT) -> List[Message]:
+        """Пакетная публикация пар (routing_key, body)
+        
+        Обмен ищется один раз, маршрут вычисляется один раз на routing_key в пакете.
+        """
+        exchange = self.exchanges_by_name.get(exchange_name)
+        routes: Dict[str, Tuple[str, ...]] = {}
+        published = []
+        
+        for routing_key, body in messages:
+            message = self._new_message(exchange_name, routing_key, body, content_type,
+                                        headers, priority, delivery_mode)
+            destinations = None
+            if exchange and exchange.exchange_type != ExchangeType.HEADERS:
+                destinations = routes.get(routing_key)
+                if destinations is None:
+                    destinations = routes[routing_key] = self._route_message(exchange, message)
+            self._publish(exchange, message, destinations)
+            published.append(message)
             
-    async def _deliver_to_queue(self, queue_name: str, message: Message):
+        return published
+        
+    def _route_message(self, exchange: Exchange, message: Message) -> Tuple[str, ...]:
+        """Маршрутизация сообщения по таблице обмена (с alternate exchange)"""
+        destinations = exchange.routing_table.route(message.routing_key, message.headers)
+        if not destinations and exchange.alternate_exchange:
+            alternate = self.exchanges_by_name.get(exchange.alternate_exchange)
+            if alternate and alternate is not exchange:
+                destinations = alternate.routing_table.route(message.routing_key, message.headers)
+        return destinations
+        
+    def _deliver_to_queue(self, queue_name: str, message: Message):
         """Доставка сообщения в очередь"""
-        queue = self._find_queue_by_name(queue_name)
+        queue = self.queues_by_name.get(queue_name)
         if not queue:
             return
             
         # Check queue limits
         if queue.max_length > 0 and queue.message_count >= queue.max_length:
-            await self._dead_letter_message(message, queue, "max_length")
+            self._dead_letter_message(message, queue, "max_length")
             return
             
         # Add to queue
-        if queue_name in self.queue_messages:
-            self.queue_messages[queue_name].append(message.message_id)
-            
+        self.queue_messages[queue_name].push(message, min(message.priority, queue.max_priority))
+        message.pending_deliveries += 1
+        
         queue.message_count += 1
         queue.ready_messages += 1
         message.status = MessageStatus.DELIVERED
         message.delivered_at = datetime.now()
         self.total_delivered += 1
         
-    async def _dead_letter_message(self, message: Message, queue: Queue, reason: str):
+    def _release_message(self, message: Message):
+        """Сообщение обработано одной из очередей; удаляется, когда обработано всеми"""
+        message.pending_deliveries -= 1
+        if message.pending_deliveries <= 0:
+            self.messages.pop(message.message_id, None)
+            
+    def _dead_letter_message(self, message: Message, queue: Queue, reason: str):
         """Перемещение сообщения в очередь недоставленных"""
         entry = DeadLetterEntry(
             entry_id=f"dlq_{uuid.uuid4().hex[:8]}",
@@ -652,57 +831,68 @@ class MessageBroker:
         # Republish to DLX if configured
         if queue.dead_letter_exchange:
             dlx_routing_key = queue.dead_letter_routing_key or message.routing_key
-            await self.publish_message(
-                queue.dead_letter_exchange,
-                dlx_routing_key,
-                message.body,
-                message.content_type,
-                message.headers
-            )
-            
-    async def consume_message(self, consumer_id: str) -> Optional[Message]:
-        """Получение сообщения потребителем"""
-        consumer = self.consumers.get(consumer_id)
-        if not consumer or consumer.state != ConsumerState.ACTIVE:
-            return None
+            dead_letter = self._new_message(queue.dead_letter_exchange, dlx_routing_key, message.body,
+                                            message.content_type, message.headers, message.priority,
+                                            message.delivery_mode)
+            self._publish(self.exchanges_by_name.get(queue.dead_letter_exchange), dead_letter)
             
-        queue = self._find_queue_by_name(consumer.queue_name)
-        if not queue:
-            return None
+    def _take_messages(self, consumer: Consumer, limit: int) -> List[Message]:
+        """Выдача до limit сообщений потребителю с учётом prefetch"""
+        if consumer.state != ConsumerState.ACTIVE:
+            return []
+        queue = self.queues_by_name.get(consumer.queue_name)
+        buffer = self.queue_messages.get(consumer.queue_name)
+        if not queue or not buffer:
+            return []
             
-        # Get message from queue
-        if consumer.queue_name not in self.queue_messages:
-            return None
+        manual = consumer.acknowledge_mode == AcknowledgeMode.MANUAL
+        if manual and consumer.prefetch_count > 0:
+            limit = min(limit, consumer.prefetch_count - consumer.unacked_count)
+        if limit <= 0:
+            return []
             
-        queue_msgs = self.queue_messages[consumer.queue_name]
-        if not queue_msgs:
-            return None
+        messages = buffer.pop_many(limit)
+        count = len(messages)
+        if not count:
+            return messages
             
-        message_id = queue_msgs.pop(0)
-        message = self.messages.get(message_id)
-        
-        if message:
-            queue.ready_messages -= 1
-            queue.unacked_messages += 1
-            consumer.messages_consumed += 1
-            consumer.last_activity = datetime.now()
-            
-            # Auto-acknowledge if configured
-            if consumer.acknowledge_mode == AcknowledgeMode.AUTO:
-                await self.acknowledge_message(message_id, consumer_id)
+        queue.ready_messages -= count
+        queue.unacked_messages += count
+        consumer.unacked_count += count
+        consumer.unacked_ids.update(m.message_id for m in messages)
+        consumer.messages_consumed += count
+        consumer.last_activity = datetime.now()
+        
+        # Auto-acknowledge if configured
+        if not manual:
+            for message in messages:
+                self._acknowledge(message, consumer, queue)
                 
-        return message
+        return messages
         
-    async def acknowledge_message(self, message_id: str,
-                                 consumer_id: str) -> bool:
-        """Подтверждение сообщения"""
-        message = self.messages.get(message_id)
+    async def consume_message(self, consumer_id: str) -> Optional[Message]:
+        """Получение сообщения потребителем"""
         consumer = self.consumers.get(consumer_id)
+        if not consumer:
+            return None
+        messages = self._take_messages(consumer, 1)
+        return messages[0] if messages else None
         
-        if not message or not consumer:
+    async def consume_batch(self, consumer_id: str,
+                            max_messages: int = 0) -> List[Message]:
+        """Пакетное получение сообщений (по умолчанию — до prefetch_count)"""
+        consumer = self.consumers.get(consumer_id)
+        if not consumer:
+            return []
+        limit = max_messages or consumer.prefetch_count or len(self.queue_messages.get(consumer.queue_name, ()))
+        return self._take_messages(consumer, limit)
+        
+    def _acknowledge(self, message: Message, consumer: Consumer, queue: Optional[Queue]) -> bool:
+        # Duplicate acks must not release the message or counters twice
+        if message.message_id not in consumer.unacked_ids:
             return False
-            
-        queue = self._find_queue_by_name(consumer.queue_name)
+        consumer.unacked_ids.remove(message.message_id)
+        
         if queue:
             queue.unacked_messages = max(0, queue.unacked_messages - 1)
             queue.message_count = max(0, queue.message_count - 1)
@@ -710,10 +900,38 @@ class MessageBroker:
         message.status = MessageStatus.ACKNOWLEDGED
         message.acknowledged_at = datetime.now()
         consumer.messages_acknowledged += 1
+        consumer.unacked_count = max(0, consumer.unacked_count - 1)
         self.total_acknowledged += 1
-        
+        self._release_message(message)
         return True
         
+    async def acknowledge_message(self, message_id: str,
+                                 consumer_id: str) -> bool:
+        """Подтверждение сообщения"""
+        message = self.messages.get(message_id)
+        consumer = self.consumers.get(consumer_id)
+        
+        if not message or not consumer:
+            return False
+            
+        return self._acknowledge(message, consumer, self.queues_by_name.get(consumer.queue_name))
+        
+    async def acknowledge_batch(self, message_ids: Iterable[str],
+                                consumer_id: str) -> int:
+        """Пакетное подтверждение, возвращает число подтверждённых"""
+        consumer = self.consumers.get(consumer_id)
+        if not consumer:
+            return 0
+            
+        queue = self.queues_by_name.get(consumer.queue_name)
+        messages = self.messages
+        acknowledged = 0
+        for message_id in message_ids:
+            message = messages.get(message_id)
+            if message and self._acknowledge(message, consumer, queue):
+                acknowledged += 1
+        return acknowledged
+        
     async def reject_message(self, message_id: str,
                             consumer_id: str,
                             requeue: bool = False) -> bool:
@@ -721,26 +939,28 @@ class MessageBroker:
         message = self.messages.get(message_id)
         consumer = self.consumers.get(consumer_id)
         
-        if not message or not consumer:
+        if not message or not consumer or message_id not in consumer.unacked_ids:
             return False
             
-        queue = self._find_queue_by_name(consumer.queue_name)
+        consumer.unacked_ids.remove(message_id)
+        queue = self.queues_by_name.get(consumer.queue_name)
+        consumer.unacked_count = max(0, consumer.unacked_count - 1)
         
         if requeue and queue:
             # Requeue the message
-            if consumer.queue_name in self.queue_messages:
-                self.queue_messages[consumer.queue_name].append(message_id)
+            self.queue_messages[consumer.queue_name].push(message, min(message.priority, queue.max_priority))
             queue.ready_messages += 1
             queue.unacked_messages = max(0, queue.unacked_messages - 1)
         else:
             message.status = MessageStatus.REJECTED
             message.retry_count += 1
             
-            if message.retry_count >= message.max_retries and queue:
-                await self._dead_letter_message(message, queue, "rejected")
-            elif queue:
+            if queue:
                 queue.unacked_messages = max(0, queue.unacked_messages - 1)
                 queue.message_count = max(0, queue.message_count - 1)
+                if message.retry_count >= message.max_retries:
+                    self._dead_letter_message(message, queue, "rejected")
+            self._release_message(message)
                 
         consumer.messages_rejected += 1
         return True
@@ -752,7 +972,7 @@ class MessageBroker:
                              exclusive: bool = False,
                              consumer_group: str = "") -> Optional[Consumer]:
         """Создание потребителя"""
-        queue = self._find_queue_by_name(queue_name)
+        queue = self.queues_by_name.get(queue_name)
         if not queue:
             return None
             
@@ -771,19 +991,12 @@ class MessageBroker:
         
         # Add to consumer group if specified
         if consumer_group:
-            group = self._find_consumer_group_by_name(consumer_group)
+            group = self.consumer_groups_by_name.get(consumer_group)
             if group:
                 group.consumer_ids.append(consumer.consumer_id)
                 
         return consumer
         
-    def _find_consumer_group_by_name(self, name: str) -> Optional[ConsumerGroup]:
-        """Поиск группы потребителей"""
-        for group in self.consumer_groups.values():
-            if group.name == name:
-                return group
-        return None
-        
     async def create_consumer_group(self, name: str,
                                    load_balancing: str = "round_robin") -> ConsumerGroup:
         """Создание группы потребителей"""
@@ -794,6 +1007,7 @@ class MessageBroker:
         )
         
         self.consumer_groups[group.group_id] = group
+        self.consumer_groups_by_name[name] = group
         return group
         
     async def create_connection(self, name: str = "",
@@ -833,7 +1047,7 @@ class MessageBroker:
         
     async def collect_queue_metrics(self, queue_name: str) -> Optional[QueueMetrics]:
         """Сбор метрик очереди"""
-        queue = self._find_queue_by_name(queue_name)
+        queue = self.queues_by_name.get(queue_name)
         if not queue:
             return None
             
@@ -886,6 +1100,66 @@ class MessageBroker:
 
 
 # Demo
+def benchmark_broker(message_count: int = 200_000, batch_size: int = 500) -> Dict[str, Any]:
+    """Бенчмарк пропускной способности publish/consume/ack (msg/s)"""
+    async def run() -> Dict[str, Any]:
+        results: Dict[str, Any] = {"messages": message_count, "batch_size": batch_size}
+        body = b'{"event": "benchmark"}'
+        
+        for exchange_type, routing_key, binding_key in (
+            (ExchangeType.DIRECT, "orders.created", "orders.created"),
+            (ExchangeType.TOPIC, "orders.eu.created", "orders.*.created"),
+            (ExchangeType.FANOUT, "", ""),
+        ):
+            broker = MessageBroker()
+            await broker.declare_exchange("bench", exchange_type)
+            await broker.declare_queue("bench.queue")
+            await broker.bind_queue("bench", "bench.queue", binding_key)
+            consumer = await broker.create_consumer("bench.queue", prefetch_count=batch_size)
+            
+            # Single-message path
+            started = time.perf_counter()
+            for _ in range(message_count):
+                await broker.publish_message("bench", routing_key, body)
+            publish_elapsed = time.perf_counter() - started
+            
+            started = time.perf_counter()
+            while True:
+                message = await broker.consume_message(consumer.consumer_id)
+                if not message:
+                    break
+                await broker.acknowledge_message(message.message_id, consumer.consumer_id)
+            consume_elapsed = time.perf_counter() - started
+            
+            # Batch path
+            batch = [(routing_key, body)] * batch_size
+            started = time.perf_counter()
+            for _ in range(message_count // batch_size):
+                await broker.publish_batch("bench", batch)
+            batch_publish_elapsed = time.perf_counter() - started
+            
+            started = time.perf_counter()
+            while True:
+                messages = await broker.consume_batch(consumer.consumer_id)
+                if not messages:
+                    break
+                await broker.acknowledge_batch([m.message_id for m in messages], consumer.consumer_id)
+            batch_consume_elapsed = time.perf_counter() - started
+            
+            batched = (message_count // batch_size) * batch_size
+            results[exchange_type.value] = {
+                "publish_msg_per_s": round(message_count / publish_elapsed),
+                "consume_ack_msg_per_s": round(message_count / consume_elapsed),
+                "publish_batch_msg_per_s": round(batched / batch_publish_elapsed),
+                "consume_ack_batch_msg_per_s": round(batched / batch_consume_elapsed),
+                "retained_messages": len(broker.messages),
+            }
+            
+        return results
+        
+    return asyncio.run(run())
+
+
 async def main():
     print("=" * 60)
     print("Server Init - Iteration 346: Message Broker Platform")
@@ -1288,4 +1562,7 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if '--benchmark' in sys.argv:
+        print(json.dumps(benchmark_broker(), indent=2))
+    else:
+        asyncio.run(main())
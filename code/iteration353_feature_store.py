@@ -16,13 +16,25 @@ Server Init - Iteration 353: Feature Store Platform
 
 import asyncio
 import random
+import sys
+import time
+from collections import deque
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Set
+from typing import Dict, List, Optional, Any, Set, Tuple
 from enum import Enum
 import uuid
 import json
 
+import numpy as np
+
+
+# Materialization
+DAY_MS = 86400 * 1000
+STATS_CHUNK_ROWS = 65536
+STATS_SAMPLE_SIZE = 10000
+ONLINE_LATENCY_WINDOW = 10000
+
 
 class FeatureType(Enum):
     """Тип признака"""
@@ -82,6 +94,14 @@ class MonitoringAlertType(Enum):
     CARDINALITY = "cardinality"
 
 
+NUMERIC_FEATURE_TYPES = (FeatureType.INT, FeatureType.FLOAT, FeatureType.BOOLEAN)
+
+
+def to_epoch_ms(value: datetime) -> int:
+    """Перевод времени в миллисекунды эпохи"""
+    return int(value.timestamp() * 1000)
+
+
 @dataclass
 class Entity:
     """Сущность"""
@@ -180,6 +200,9 @@ class FeatureGroup:
     # Stats
     feature_count: int = 0
     
+    # Materialization
+    materialized_until: Optional[datetime] = None
+    
     # Timestamps
     created_at: datetime = field(default_factory=datetime.now)
     updated_at: Optional[datetime] = None
@@ -477,6 +500,254 @@ class FeatureStoreMetrics:
     collected_at: datetime = field(default_factory=datetime.now)
 
 
+class OfflineFeatureTable:
+    """Колоночная оффлайн таблица группы признаков"""
+    
+    def __init__(self):
+        self.key_to_code: Dict[str, int] = {}
+        self.entity_keys: List[str] = []
+        self.numeric: Dict[str, bool] = {}
+        
+        # Sorted by entity, event timestamp and write order
+        self.entity_codes = np.empty(0, dtype=np.int64)
+        self.event_ts = np.empty(0, dtype=np.int64)
+        self.write_seq = np.empty(0, dtype=np.int64)
+        self.columns: Dict[str, np.ndarray] = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        
+        # Unsorted appends
+        self.pending: List[Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]] = []
+        self.pending_rows = 0
+        self.next_seq = 0
+        
+    @property
+    def row_count(self) -> int:
+        return len(self.event_ts) + self.pending_rows
+        
+    @property
+    def size_bytes(self) -> int:
+        arrays = [self.entity_codes, self.event_ts, self.write_seq] + list(self.columns.values())
+        for codes, event_ts, columns in self.pending:
+            arrays += [codes, event_ts] + list(columns.values())
+        return sum(a.nbytes for a in arrays)
+        
+    def add_column(self, feature_id: str, numeric: bool):
+        """Добавление колонки признака"""
+        if feature_id in self.columns:
+            return
+        self.numeric[feature_id] = numeric
+        self.columns[feature_id] = self._empty_column(numeric, len(self.event_ts))
+        
+    def _empty_column(self, numeric: bool, size: int) -> np.ndarray:
+        if numeric:
+            return np.full(size, np.nan)
+        return np.full(size, None, dtype=object)
+        
+    def encode_keys(self, entity_keys: List[Optional[str]], create: bool = False) -> np.ndarray:
+        """Коды сущностей (-1 для неизвестных)"""
+        if not create:
+            return np.fromiter((self.key_to_code.get(k, -1) for k in entity_keys),
+                               dtype=np.int64, count=len(entity_keys))
+            
+        codes = np.empty(len(entity_keys), dtype=np.int64)
+        for i, key in enumerate(entity_keys):
+            code = self.key_to_code.get(key)
+            if code is None:
+                code = len(self.entity_keys)
+                self.key_to_code[key] = code
+                self.entity_keys.append(key)
+            codes[i] = code
+        return codes
+        
+    def append(self, entity_keys: List[str], event_ts: np.ndarray,
+               columns: Dict[str, np.ndarray]) -> int:
+        """Добавление строк (сортировка откладывается до чтения)"""
+        codes = self.encode_keys(entity_keys, create=True)
+        self.pending.append((codes, np.asarray(event_ts, dtype=np.int64), columns))
+        self.pending_rows += len(codes)
+        return len(codes)
+        
+    def compact(self):
+        """Слияние добавленных строк в отсортированные колонки"""
+        if not self.pending:
+            return
+            
+        codes = np.concatenate([self.entity_codes] + [c for c, _, _ in self.pending])
+        event_ts = np.concatenate([self.event_ts] + [t for _, t, _ in self.pending])
+        write_seq = np.concatenate([
+            self.write_seq,
+            np.arange(self.next_seq, self.next_seq + self.pending_rows, dtype=np.int64)
+        ])
+        order = np.lexsort((write_seq, event_ts, codes))
+        
+        for feature_id, numeric in self.numeric.items():
+            parts = [self.columns[feature_id]]
+            for chunk_codes, _, chunk_columns in self.pending:
+                column = chunk_columns.get(feature_id)
+                parts.append(column if column is not None else self._empty_column(numeric, len(chunk_codes)))
+            self.columns[feature_id] = np.concatenate(parts)[order]
+            
+        self.entity_codes = codes[order]
+        self.event_ts = event_ts[order]
+        self.write_seq = write_seq[order]
+        self.offsets = np.searchsorted(self.entity_codes, np.arange(len(self.entity_keys) + 1))
+        
+        self.next_seq += self.pending_rows
+        self.pending = []
+        self.pending_rows = 0
+        
+    def as_of(self, query_codes: np.ndarray, query_ts: np.ndarray,
+              ttl_ms: Optional[int] = None) -> np.ndarray:
+        """Последняя строка сущности не позже момента запроса (-1 если нет)"""
+        self.compact()
+        
+        positions = np.full(len(query_codes), -1, dtype=np.int64)
+        if len(self.event_ts) == 0 or len(query_codes) == 0:
+            return positions
+            
+        base = min(int(self.event_ts.min()), int(query_ts.min()))
+        span = max(int(self.event_ts.max()), int(query_ts.max())) - base + 1
+        
+        if len(self.entity_keys) * span < 2 ** 62:
+            # Composite (entity, timestamp) key keeps one global searchsorted
+            data_keys = self.entity_codes * span + (self.event_ts - base)
+            query_keys = query_codes * span + (query_ts - base)
+            found = np.searchsorted(data_keys, query_keys, side="right") - 1
+        else:
+            found = np.full(len(query_codes), -1, dtype=np.int64)
+            order = np.argsort(query_codes, kind="stable")
+            sorted_codes = query_codes[order]
+            codes, starts = np.unique(sorted_codes, return_index=True)
+            ends = np.append(starts[1:], len(sorted_codes))
+            
+            for code, start, end in zip(codes.tolist(), starts.tolist(), ends.tolist()):
+                if code < 0:
+                    continue
+                lo, hi = self.offsets[code], self.offsets[code + 1]
+                idx = order[start:end]
+                found[idx] = lo + np.searchsorted(self.event_ts[lo:hi], query_ts[idx], side="right") - 1
+                
+        valid = (query_codes >= 0) & (found >= 0)
+        safe = np.where(valid, found, 0)
+        valid &= self.entity_codes[safe] == query_codes
+        if ttl_ms is not None:
+            valid &= query_ts - self.event_ts[safe] <= ttl_ms
+            
+        positions[valid] = found[valid]
+        return positions
+        
+    def latest_in_range(self, start_ts: int, end_ts: int) -> np.ndarray:
+        """Последняя строка каждой сущности в интервале (start_ts, end_ts]"""
+        self.compact()
+        
+        rows = np.flatnonzero((self.event_ts > start_ts) & (self.event_ts <= end_ts))
+        if len(rows) == 0:
+            return rows
+            
+        codes = self.entity_codes[rows]
+        last = np.ones(len(rows), dtype=bool)
+        last[:-1] = codes[1:] != codes[:-1]
+        return rows[last]
+        
+    def iter_chunks(self, feature_id: str, chunk_rows: int = STATS_CHUNK_ROWS):
+        """Итерация по колонке блоками"""
+        self.compact()
+        
+        column = self.columns.get(feature_id)
+        if column is None:
+            return
+        for start in range(0, len(column), chunk_rows):
+            yield column[start:start + chunk_rows]
+
+
+class OnlineFeatureTable:
+    """Онлайн таблица ключ-значение группы признаков"""
+    
+    def __init__(self):
+        self.feature_ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+        
+        # entity_key -> (event_ts_ms, values)
+        self.rows: Dict[str, Tuple[int, Tuple[Any, ...]]] = {}
+        
+    def set_features(self, feature_ids: List[str]):
+        """Расширение раскладки значений новыми признаками"""
+        for feature_id in feature_ids:
+            if feature_id not in self.positions:
+                self.positions[feature_id] = len(self.feature_ids)
+                self.feature_ids.append(feature_id)
+                
+    def upsert(self, entity_key: str, event_ts: int, values: Tuple[Any, ...]) -> bool:
+        """Запись значений, если они не старше текущих"""
+        current = self.rows.get(entity_key)
+        if current is not None and current[0] > event_ts:
+            return False
+        self.rows[entity_key] = (event_ts, values)
+        return True
+
+
+class StreamingStatistics:
+    """Потоковая статистика с ограниченной памятью"""
+    
+    def __init__(self, sample_size: int = STATS_SAMPLE_SIZE, seed: Optional[int] = None):
+        self.sample_size = sample_size
+        self.rng = np.random.default_rng(seed)
+        
+        self.count = 0
+        self.null_count = 0
+        self.valid_count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min_value = float("inf")
+        self.max_value = float("-inf")
+        
+        # Bottom-k sample by random priority
+        self.sample = np.empty(0)
+        self.priorities = np.empty(0)
+        
+    def update(self, chunk: np.ndarray):
+        """Учет блока значений"""
+        self.count += len(chunk)
+        
+        if chunk.dtype == object:
+            self.null_count += int(np.equal(chunk, None).sum())
+            return
+            
+        nulls = np.isnan(chunk)
+        self.null_count += int(nulls.sum())
+        values = chunk[~nulls]
+        n = len(values)
+        if n == 0:
+            return
+            
+        # Chan et al. parallel merge of mean/M2
+        chunk_mean = float(values.mean())
+        chunk_m2 = float(((values - chunk_mean) ** 2).sum())
+        total = self.valid_count + n
+        delta = chunk_mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += chunk_m2 + delta * delta * self.valid_count * n / total
+        self.valid_count = total
+        
+        self.min_value = min(self.min_value, float(values.min()))
+        self.max_value = max(self.max_value, float(values.max()))
+        
+        sample = np.concatenate([self.sample, values])
+        priorities = np.concatenate([self.priorities, self.rng.random(n)])
+        if len(sample) > self.sample_size:
+            keep = np.argpartition(priorities, self.sample_size)[:self.sample_size]
+            sample, priorities = sample[keep], priorities[keep]
+        self.sample, self.priorities = sample, priorities
+        
+    @property
+    def std(self) -> float:
+        return (self.m2 / self.valid_count) ** 0.5 if self.valid_count else 0.0
+        
+    def percentile(self, q: float) -> float:
+        """Перцентиль по выборке"""
+        return float(np.percentile(self.sample, q)) if len(self.sample) else 0.0
+
+
 class FeatureStorePlatform:
     """Платформа хранилища признаков"""
     
@@ -498,6 +769,11 @@ class FeatureStorePlatform:
         self.statistics: Dict[str, FeatureStatistics] = {}
         self.metrics: Dict[str, FeatureStoreMetrics] = {}
         
+        # Materialized data
+        self.offline_tables: Dict[str, OfflineFeatureTable] = {}
+        self.online_tables: Dict[str, OnlineFeatureTable] = {}
+        self.online_latencies: Dict[str, deque] = {}
+        
     async def register_entity(self, name: str,
                              join_keys: List[str],
                              value_type: FeatureType = FeatureType.STRING,
@@ -524,7 +800,9 @@ class FeatureStorePlatform:
                                   offline_ttl_days: int = 365,
                                   description: str = "",
                                   owner: str = "",
-                                  team: str = "") -> FeatureGroup:
+                                  team: str = "",
+                                  online_store_id: str = "",
+                                  offline_store_id: str = "") -> FeatureGroup:
         """Создание группы признаков"""
         group = FeatureGroup(
             group_id=f"fg_{uuid.uuid4().hex[:8]}",
@@ -536,12 +814,28 @@ class FeatureStorePlatform:
             offline_ttl_days=offline_ttl_days,
             description=description,
             owner=owner,
-            team=team
+            team=team,
+            online_store_id=online_store_id,
+            offline_store_id=offline_store_id
         )
         
         self.groups[group.group_id] = group
         return group
         
+    async def attach_stores(self, group_id: str,
+                           online_store_id: str = "",
+                           offline_store_id: str = "") -> bool:
+        """Привязка хранилищ к группе признаков"""
+        group = self.groups.get(group_id)
+        if not group:
+            return False
+            
+        if online_store_id:
+            group.online_store_id = online_store_id
+        if offline_store_id:
+            group.offline_store_id = offline_store_id
+        return True
+        
     async def register_feature(self, name: str,
                               group_id: str,
                               feature_type: FeatureType = FeatureType.FLOAT,
@@ -575,6 +869,10 @@ class FeatureStorePlatform:
         group.feature_ids.append(feature.feature_id)
         group.feature_count += 1
         
+        table = self.offline_tables.get(group_id)
+        if table:
+            table.add_column(feature.feature_id, feature_type in NUMERIC_FEATURE_TYPES)
+        
         # Create initial version
         await self._create_version(feature)
         
@@ -677,35 +975,221 @@ class FeatureStorePlatform:
         self.views[view.view_id] = view
         return view
         
+    def _entity_key(self, group: FeatureGroup, row: Dict[str, Any]) -> Optional[str]:
+        """Ключ сущности по join-ключам"""
+        entity = self.entities.get(group.entity_id)
+        join_keys = entity.join_keys if entity else []
+        
+        if len(join_keys) == 1:
+            value = row.get(join_keys[0])
+            return None if value is None else str(value)
+            
+        values = [row.get(key) for key in join_keys]
+        if not values or any(v is None for v in values):
+            return None
+        return "|".join(str(v) for v in values)
+        
+    def _offline_table(self, group: FeatureGroup) -> OfflineFeatureTable:
+        """Оффлайн таблица группы"""
+        table = self.offline_tables.get(group.group_id)
+        if table is None:
+            table = OfflineFeatureTable()
+            for feature_id in group.feature_ids:
+                table.add_column(feature_id, self.features[feature_id].feature_type in NUMERIC_FEATURE_TYPES)
+            self.offline_tables[group.group_id] = table
+        return table
+        
+    def _to_column(self, feature: FeatureDefinition, values: Any) -> np.ndarray:
+        """Колонка значений признака"""
+        if feature.feature_type in NUMERIC_FEATURE_TYPES:
+            if isinstance(values, np.ndarray):
+                return values.astype(np.float64, copy=False)
+            return np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+            
+        column = np.empty(len(values), dtype=object)
+        for i, value in enumerate(values):
+            column[i] = value
+        return column
+        
+    def _column_values(self, feature: FeatureDefinition, column: np.ndarray) -> List[Any]:
+        """Значения колонки как Python-объекты (None для пропусков)"""
+        values = column.tolist()
+        
+        if feature.feature_type == FeatureType.INT:
+            return [None if v != v else int(v) for v in values]
+        elif feature.feature_type == FeatureType.BOOLEAN:
+            return [None if v != v else bool(v) for v in values]
+        elif feature.feature_type == FeatureType.FLOAT:
+            return [None if v != v else v for v in values]
+        return values
+        
+    def _features_by_group(self, feature_ids: List[str]) -> Dict[str, List[str]]:
+        """Группировка признаков по группам"""
+        by_group: Dict[str, List[str]] = {}
+        for fid in feature_ids:
+            feature = self.features.get(fid)
+            if feature and feature.group_id in self.groups:
+                by_group.setdefault(feature.group_id, []).append(fid)
+        return by_group
+        
+    def _update_offline_store(self, group: FeatureGroup):
+        """Обновление метаданных оффлайн хранилища"""
+        store = self.offline_stores.get(group.offline_store_id)
+        if not store:
+            return
+            
+        tables = [self.offline_tables[g.group_id] for g in self.groups.values()
+                  if g.offline_store_id == store.store_id and g.group_id in self.offline_tables]
+        store.row_count = sum(t.row_count for t in tables)
+        store.size_bytes = sum(t.size_bytes for t in tables)
+        
+    async def write_offline_features(self, group_id: str,
+                                    rows: List[Dict[str, Any]],
+                                    timestamp_field: str = "event_timestamp") -> int:
+        """Запись строк признаков в оффлайн хранилище"""
+        group = self.groups.get(group_id)
+        if not group:
+            return 0
+            
+        keyed = [(self._entity_key(group, row), row) for row in rows]
+        keyed = [(key, row) for key, row in keyed if key is not None]
+        if not keyed:
+            return 0
+            
+        now = datetime.now()
+        event_ts = np.fromiter(
+            (to_epoch_ms(row.get(timestamp_field) or now) for _, row in keyed),
+            dtype=np.int64, count=len(keyed)
+        )
+        
+        columns = {}
+        for fid in group.feature_ids:
+            feature = self.features[fid]
+            if any(feature.name in row for _, row in keyed):
+                columns[fid] = self._to_column(feature, [row.get(feature.name) for _, row in keyed])
+                
+        written = self._offline_table(group).append([key for key, _ in keyed], event_ts, columns)
+        self._update_offline_store(group)
+        return written
+        
+    async def write_offline_columns(self, group_id: str,
+                                   entity_keys: List[str],
+                                   event_timestamps_ms: np.ndarray,
+                                   columns: Dict[str, Any]) -> int:
+        """Колоночная запись признаков в оффлайн хранилище"""
+        group = self.groups.get(group_id)
+        if not group or len(entity_keys) != len(event_timestamps_ms):
+            return 0
+            
+        by_name = {self.features[fid].name: fid for fid in group.feature_ids}
+        converted = {}
+        for name, values in columns.items():
+            fid = by_name.get(name)
+            if fid is None or len(values) != len(entity_keys):
+                continue
+            converted[fid] = self._to_column(self.features[fid], values)
+            
+        written = self._offline_table(group).append(list(entity_keys), event_timestamps_ms, converted)
+        self._update_offline_store(group)
+        return written
+        
+    async def materialize_incremental(self, group_id: str,
+                                     end_time: datetime = None) -> int:
+        """Инкрементальная материализация оффлайн -> онлайн"""
+        group = self.groups.get(group_id)
+        table = self.offline_tables.get(group_id)
+        if not group or table is None:
+            return 0
+            
+        end_time = end_time or datetime.now()
+        end_ts = to_epoch_ms(end_time)
+        if group.materialized_until:
+            start_ts = to_epoch_ms(group.materialized_until)
+        else:
+            start_ts = end_ts - group.online_ttl_days * DAY_MS
+            
+        rows = table.latest_in_range(start_ts, end_ts)
+        
+        feature_ids = [fid for fid in group.feature_ids
+                       if self.features[fid].store_type != StoreType.OFFLINE]
+        online = self.online_tables.setdefault(group_id, OnlineFeatureTable())
+        online.set_features(feature_ids)
+        
+        # Column-wise extraction, row-wise upsert
+        layout = [self._column_values(self.features[fid], table.columns[fid][rows])
+                  if fid in table.columns else [None] * len(rows)
+                  for fid in online.feature_ids]
+        keys = [table.entity_keys[code] for code in table.entity_codes[rows].tolist()]
+        
+        pushed = 0
+        for key, event_ts, values in zip(keys, table.event_ts[rows].tolist(), zip(*layout)):
+            if online.upsert(key, event_ts, values):
+                pushed += 1
+                
+        group.materialized_until = end_time
+        group.updated_at = datetime.now()
+        
+        store = self.online_stores.get(group.online_store_id)
+        if store:
+            store.key_count = sum(len(self.online_tables[g.group_id].rows) for g in self.groups.values()
+                                  if g.online_store_id == store.store_id and g.group_id in self.online_tables)
+            
+        return pushed
+        
     async def get_online_features(self, feature_ids: List[str],
                                  entity_keys: Dict[str, Any]) -> Dict[str, Any]:
         """Получение онлайн признаков"""
+        results = await self.get_online_features_batch(feature_ids, [entity_keys])
+        return results[0]
+        
+    async def get_online_features_batch(self, feature_ids: List[str],
+                                       entity_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Пакетное получение онлайн признаков (multi-get)"""
+        started = time.perf_counter()
         request = FeatureRequest(
             request_id=f"req_{uuid.uuid4().hex[:8]}",
             feature_ids=feature_ids,
-            entity_keys=entity_keys,
+            entity_keys=entity_rows[0] if len(entity_rows) == 1 else {"batch_size": len(entity_rows)},
             request_type="online"
         )
         
-        # Simulate fetching features
-        await asyncio.sleep(0.001)  # Simulate latency
+        by_group = self._features_by_group(feature_ids)
+        names = [self.features[fid].name for fids in by_group.values() for fid in fids]
+        results = [dict.fromkeys(names) for _ in entity_rows]
+        now_ms = to_epoch_ms(datetime.now())
         
-        results = {}
-        for fid in feature_ids:
-            feature = self.features.get(fid)
-            if feature:
-                # Generate simulated value based on type
-                if feature.feature_type == FeatureType.FLOAT:
-                    results[feature.name] = round(random.uniform(0, 100), 4)
-                elif feature.feature_type == FeatureType.INT:
-                    results[feature.name] = random.randint(0, 1000)
-                elif feature.feature_type == FeatureType.BOOLEAN:
-                    results[feature.name] = random.choice([True, False])
-                else:
-                    results[feature.name] = feature.default_value
+        for group_id, fids in by_group.items():
+            group = self.groups[group_id]
+            online = self.online_tables.get(group_id)
+            ttl_ms = group.online_ttl_days * DAY_MS
+            
+            columns = [
+                (self.features[fid].name,
+                 online.positions.get(fid) if online else None,
+                 self.features[fid].default_value)
+                for fid in fids
+            ]
+            
+            for result, row in zip(results, entity_rows):
+                record = online.rows.get(self._entity_key(group, row)) if online else None
+                
+                if record is None or now_ms - record[0] > ttl_ms:
+                    for name, _, default in columns:
+                        result[name] = default
+                    continue
                     
+                values = record[1]
+                for name, position, default in columns:
+                    value = values[position] if position is not None and position < len(values) else None
+                    result[name] = default if value is None else value
+                    
+            if group.online_store_id:
+                self.online_latencies.setdefault(
+                    group.online_store_id, deque(maxlen=ONLINE_LATENCY_WINDOW)
+                ).append((time.perf_counter() - started) * 1000)
+                
         request.responded_at = datetime.now()
-        request.latency_ms = random.uniform(1, 10)
+        request.latency_ms = (time.perf_counter() - started) * 1000
         self.requests[request.request_id] = request
         
         return results
@@ -713,8 +1197,10 @@ class FeatureStorePlatform:
     async def get_training_features(self, feature_ids: List[str],
                                    entity_df: List[Dict[str, Any]],
                                    start_time: datetime = None,
-                                   end_time: datetime = None) -> List[Dict[str, Any]]:
-        """Получение признаков для обучения"""
+                                   end_time: datetime = None,
+                                   timestamp_field: str = "event_timestamp") -> List[Dict[str, Any]]:
+        """Получение признаков для обучения (point-in-time join)"""
+        started = time.perf_counter()
         request = FeatureRequest(
             request_id=f"req_{uuid.uuid4().hex[:8]}",
             feature_ids=feature_ids,
@@ -722,22 +1208,51 @@ class FeatureStorePlatform:
             request_type="training"
         )
         
-        results = []
-        for entity in entity_df:
-            row = entity.copy()
-            for fid in feature_ids:
-                feature = self.features.get(fid)
-                if feature:
-                    if feature.feature_type == FeatureType.FLOAT:
-                        row[feature.name] = round(random.uniform(0, 100), 4)
-                    elif feature.feature_type == FeatureType.INT:
-                        row[feature.name] = random.randint(0, 1000)
-                    else:
-                        row[feature.name] = feature.default_value
-            results.append(row)
+        # Label timestamps never look past end_time
+        default_ts = to_epoch_ms(end_time or datetime.now())
+        query_ts = np.fromiter(
+            (to_epoch_ms(row[timestamp_field]) if row.get(timestamp_field) else default_ts for row in entity_df),
+            dtype=np.int64, count=len(entity_df)
+        )
+        if end_time:
+            query_ts = np.minimum(query_ts, default_ts)
+        min_ts = to_epoch_ms(start_time) if start_time else None
+        
+        columns: Dict[str, List[Any]] = {}
+        
+        for group_id, fids in self._features_by_group(feature_ids).items():
+            group = self.groups[group_id]
+            table = self.offline_tables.get(group_id)
             
+            if table is None or table.row_count == 0:
+                for fid in fids:
+                    columns[self.features[fid].name] = [self.features[fid].default_value] * len(entity_df)
+                continue
+                
+            codes = table.encode_keys([self._entity_key(group, row) for row in entity_df])
+            positions = table.as_of(codes, query_ts, group.offline_ttl_days * DAY_MS)
+            found = positions >= 0
+            take = np.where(found, positions, 0)
+            if min_ts is not None:
+                found &= table.event_ts[take] >= min_ts
+            found_list = found.tolist()
+            
+            for fid in fids:
+                feature = self.features[fid]
+                values = self._column_values(feature, table.columns[fid][take])
+                default = feature.default_value
+                columns[feature.name] = [
+                    value if ok and value is not None else default
+                    for value, ok in zip(values, found_list)
+                ]
+                
+        results = [dict(row) for row in entity_df]
+        for name, values in columns.items():
+            for row, value in zip(results, values):
+                row[name] = value
+                
         request.responded_at = datetime.now()
-        request.latency_ms = random.uniform(100, 500)
+        request.latency_ms = (time.perf_counter() - started) * 1000
         self.requests[request.request_id] = request
         
         return results
@@ -861,32 +1376,38 @@ class FeatureStorePlatform:
                 
         return new_alerts
         
-    async def compute_statistics(self, feature_id: str) -> Optional[FeatureStatistics]:
+    async def compute_statistics(self, feature_id: str,
+                                chunk_rows: int = STATS_CHUNK_ROWS) -> Optional[FeatureStatistics]:
         """Вычисление статистики признака"""
         feature = self.features.get(feature_id)
         if not feature:
             return None
             
-        count = random.randint(100000, 1000000)
-        null_count = random.randint(0, int(count * 0.05))
+        running = StreamingStatistics()
+        table = self.offline_tables.get(feature.group_id)
+        if table:
+            for chunk in table.iter_chunks(feature_id, chunk_rows):
+                running.update(chunk)
+                
+        has_values = running.valid_count > 0
         
         stats = FeatureStatistics(
             stats_id=f"stats_{uuid.uuid4().hex[:8]}",
             feature_id=feature_id,
-            count=count,
-            null_count=null_count,
-            null_rate=null_count / count * 100,
-            mean=random.uniform(0, 100),
-            std=random.uniform(1, 20),
-            min_value=random.uniform(-100, 0),
-            max_value=random.uniform(100, 500),
-            median=random.uniform(40, 60),
+            count=running.count,
+            null_count=running.null_count,
+            null_rate=running.null_count / running.count * 100 if running.count else 0.0,
+            mean=running.mean,
+            std=running.std,
+            min_value=running.min_value if has_values else 0.0,
+            max_value=running.max_value if has_values else 0.0,
+            median=running.percentile(50),
             percentiles={
-                "p25": random.uniform(20, 40),
-                "p50": random.uniform(40, 60),
-                "p75": random.uniform(60, 80),
-                "p95": random.uniform(80, 95),
-                "p99": random.uniform(95, 100)
+                "p25": running.percentile(25),
+                "p50": running.percentile(50),
+                "p75": running.percentile(75),
+                "p95": running.percentile(95),
+                "p99": running.percentile(99)
             }
         )
         
@@ -905,6 +1426,13 @@ class FeatureStorePlatform:
         active_groups = sum(1 for g in self.groups.values() if g.status == FeatureStatus.ACTIVE)
         active_alerts = sum(1 for a in self.alerts.values() if not a.is_resolved)
         
+        for store_id, window in self.online_latencies.items():
+            store = self.online_stores.get(store_id)
+            if store and window:
+                ordered = sorted(window)
+                store.avg_latency_ms = sum(ordered) / len(ordered)
+                store.p99_latency_ms = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+                
         metrics = FeatureStoreMetrics(
             metrics_id=f"fsm_{uuid.uuid4().hex[:8]}",
             online_requests=online_requests,
@@ -941,6 +1469,9 @@ class FeatureStorePlatform:
         
         active_alerts = sum(1 for a in self.alerts.values() if not a.is_resolved)
         
+        offline_rows = sum(t.row_count for t in self.offline_tables.values())
+        online_keys = sum(len(t.rows) for t in self.online_tables.values())
+        
         return {
             "total_entities": total_entities,
             "total_groups": total_groups,
@@ -952,10 +1483,88 @@ class FeatureStorePlatform:
             "total_versions": total_versions,
             "total_validation_rules": total_validation_rules,
             "total_monitoring_configs": total_monitoring_configs,
-            "active_alerts": active_alerts
+            "active_alerts": active_alerts,
+            "offline_rows": offline_rows,
+            "online_keys": online_keys
         }
 
 
+def benchmark_feature_store(entities: int = 100000, snapshots: int = 10,
+                            training_rows: int = 100000, batch_size: int = 100,
+                            seed: int = 42) -> Dict[str, Any]:
+    """Бенчмарк материализации, multi-get и point-in-time join"""
+    async def run_benchmark() -> Dict[str, Any]:
+        rng = np.random.default_rng(seed)
+        platform = FeatureStorePlatform(project="benchmark")
+        entity = await platform.register_entity("customer", ["customer_id"])
+        group = await platform.create_feature_group("behavior", entity.entity_id)
+        feature_ids = []
+        for name in ("purchases", "spend", "sessions"):
+            feature = await platform.register_feature(name, group.group_id, FeatureType.FLOAT)
+            feature_ids.append(feature.feature_id)
+            
+        now_ms = to_epoch_ms(datetime.now())
+        keys = [f"cust_{i}" for i in range(entities)]
+        rows = entities * snapshots
+        
+        start = time.perf_counter()
+        for day in range(snapshots, 0, -1):
+            event_ts = now_ms - day * DAY_MS + rng.integers(0, DAY_MS, entities)
+            await platform.write_offline_columns(group.group_id, keys, event_ts, {
+                "purchases": rng.poisson(3, entities).astype(float),
+                "spend": rng.gamma(2.0, 40.0, entities),
+                "sessions": rng.integers(0, 20, entities)
+            })
+        ingest_seconds = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        platform.offline_tables[group.group_id].compact()
+        compact_seconds = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        pushed = await platform.materialize_incremental(group.group_id)
+        materialize_seconds = time.perf_counter() - start
+        
+        latencies = []
+        for _ in range(1000):
+            batch = [{"customer_id": keys[i]} for i in rng.integers(0, entities, batch_size)]
+            start = time.perf_counter()
+            await platform.get_online_features_batch(feature_ids, batch)
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+        
+        entity_df = [
+            {"customer_id": keys[i], "event_timestamp": datetime.fromtimestamp(ts / 1000)}
+            for i, ts in zip(rng.integers(0, entities, training_rows).tolist(),
+                             (now_ms - rng.integers(0, snapshots * DAY_MS, training_rows)).tolist())
+        ]
+        start = time.perf_counter()
+        training = await platform.get_training_features(feature_ids, entity_df)
+        join_seconds = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        stats = await platform.compute_statistics(feature_ids[1])
+        stats_seconds = time.perf_counter() - start
+        
+        return {
+            "offline_rows": rows,
+            "ingest_rows_per_second": round(rows / ingest_seconds),
+            "compact_seconds": round(compact_seconds, 4),
+            "materialize_seconds": round(materialize_seconds, 4),
+            "materialized_entities": pushed,
+            "online_batch_size": batch_size,
+            "online_multi_get_p50_ms": round(latencies[len(latencies) // 2], 3),
+            "online_multi_get_p99_ms": round(latencies[int(len(latencies) * 0.99)], 3),
+            "training_rows": len(training),
+            "point_in_time_join_seconds": round(join_seconds, 4),
+            "point_in_time_join_rows_per_second": round(training_rows / join_seconds),
+            "streaming_stats_seconds": round(stats_seconds, 4),
+            "stats_mean": round(stats.mean, 4)
+        }
+        
+    return asyncio.run(run_benchmark())
+
+
 # Demo
 async def main():
     print("=" * 60)
@@ -1065,9 +1674,6 @@ async def main():
         "redis://localhost:6379/0",
         {"max_connections": 100, "timeout": 5}
     )
-    online_store.key_count = random.randint(100000, 1000000)
-    online_store.avg_latency_ms = random.uniform(1, 5)
-    online_store.p99_latency_ms = random.uniform(5, 20)
     print(f"  💾 Online Store: {online_store.name}")
     
     offline_store = await platform.create_offline_store(
@@ -1076,10 +1682,67 @@ async def main():
         "s3://feature-store/offline/",
         {"partition_by": ["date"]}
     )
-    offline_store.row_count = random.randint(10000000, 100000000)
-    offline_store.size_bytes = random.randint(1024**3, 10 * 1024**3)
     print(f"  💾 Offline Store: {offline_store.name}")
     
+    for g in groups:
+        await platform.attach_stores(g.group_id, online_store.store_id, offline_store.store_id)
+        
+    # Ingest Historical Data
+    print("\n📥 Ingesting Historical Feature Data...")
+    
+    rng = np.random.default_rng(353)
+    now = datetime.now()
+    now_ms = to_epoch_ms(now)
+    customers = [f"cust_{i}" for i in range(1000, 2000)]
+    
+    # Customer profile: one snapshot per customer
+    profile_ts = now_ms - rng.integers(1, 7 * 24, len(customers)) * 3600 * 1000
+    await platform.write_offline_columns(groups[0].group_id, customers, profile_ts, {
+        "customer_age": rng.integers(18, 80, len(customers)),
+        "customer_gender": [random.choice(["F", "M", None]) for _ in customers],
+        "customer_tenure_days": rng.integers(0, 3000, len(customers)),
+        "customer_segment": [random.choice(["premium", "regular", "new"]) for _ in customers]
+    })
+    
+    # Customer behavior: daily snapshots over the last 30 days
+    days = 30
+    behavior_keys = customers * days
+    behavior_ts = np.repeat(now_ms - np.arange(days, 0, -1) * DAY_MS + 3600 * 1000, len(customers))
+    purchases = rng.poisson(3, len(behavior_keys)).astype(float)
+    spend = np.round(purchases * rng.gamma(2.0, 40.0, len(behavior_keys)), 2)
+    spend[rng.random(len(behavior_keys)) < 0.02] = np.nan
+    await platform.write_offline_columns(groups[1].group_id, behavior_keys, behavior_ts, {
+        "last_purchase_days_ago": rng.integers(0, 60, len(behavior_keys)),
+        "purchase_count_30d": purchases,
+        "total_spend_30d": spend,
+        "avg_order_value": np.round(spend / np.maximum(purchases, 1), 2)
+    })
+    
+    # Product catalog rows
+    product_rows = [
+        {
+            "product_id": f"prod_{i}",
+            "event_timestamp": now - timedelta(days=random.randint(1, 20)),
+            "product_price": round(random.uniform(5, 500), 2),
+            "product_category": random.choice(["electronics", "books", "home", "sports"]),
+            "product_rating": round(random.uniform(1, 5), 1),
+            "product_review_count": random.randint(0, 5000)
+        }
+        for i in range(200)
+    ]
+    await platform.write_offline_features(groups[2].group_id, product_rows)
+    
+    print(f"  📥 Offline rows: {offline_store.row_count:,} ({offline_store.size_bytes / 1024:.1f} KB)")
+    
+    # Materialize
+    print("\n🚚 Materializing Offline -> Online...")
+    
+    for g in groups[:3]:
+        pushed = await platform.materialize_incremental(g.group_id)
+        print(f"  🚚 {g.name}: {pushed} entities")
+        
+    print(f"  🚚 Online keys: {online_store.key_count:,}")
+    
     # Create Feature Views
     print("\n👁️ Creating Feature Views...")
     
@@ -1122,16 +1785,25 @@ async def main():
         
     print(f"  📡 Configured monitoring for {len(platform.monitoring_configs)} features")
     
-    # Simulate Feature Requests
-    print("\n🔍 Simulating Feature Requests...")
+    # Serve Feature Requests
+    print("\n🔍 Serving Feature Requests...")
     
     for _ in range(20):
         fids = [f.feature_id for f in random.sample(features[:8], random.randint(3, 6))]
-        await platform.get_online_features(fids, {"customer_id": f"cust_{random.randint(1000, 9999)}"})
+        await platform.get_online_features(fids, {"customer_id": f"cust_{random.randint(1000, 2999)}"})
         
-    # Training features
-    entity_df = [{"customer_id": f"cust_{i}"} for i in range(100)]
-    await platform.get_training_features([f.feature_id for f in features[:8]], entity_df)
+    batch = [{"customer_id": c} for c in random.sample(customers, 100)]
+    online_rows = await platform.get_online_features_batch([f.feature_id for f in features[:8]], batch)
+    print(f"  🔍 Online multi-get: {len(online_rows)} entities, sample: {online_rows[0]}")
+    
+    # Training features (point-in-time)
+    entity_df = [
+        {"customer_id": random.choice(customers), "event_timestamp": now - timedelta(days=random.uniform(0, 35))}
+        for _ in range(500)
+    ]
+    training_rows = await platform.get_training_features([f.feature_id for f in features[:8]], entity_df)
+    filled = sum(1 for row in training_rows if row["purchase_count_30d"] is not None)
+    print(f"  🔍 Training set: {len(training_rows)} rows, {filled} with behavior features as of label time")
     
     print(f"  🔍 Executed {len(platform.requests)} feature requests")
     
@@ -1288,4 +1960,7 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if "--benchmark" in sys.argv:
+        print(json.dumps(benchmark_feature_store(), indent=2))
+    else:
+        asyncio.run(main())
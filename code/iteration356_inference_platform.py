@@ -15,15 +15,36 @@ Server Init - Iteration 356: ML Inference Platform
 """
 
 import asyncio
+import bisect
+import csv
+import hashlib
+import os
 import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Set
+from typing import Dict, List, Optional, Any, Set, Callable, Tuple
 from enum import Enum
 import uuid
 import json
 
 
+# Serving
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_MAX_BATCH_WAIT_MS = 5.0
+BATCH_INVOKE_CONCURRENCY = 64
+REQUEST_LOG_SIZE = 10000
+INFERENCE_LATENCY_BUCKETS_MS = [0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+# Simulated model cost
+SIMULATED_BATCH_OVERHEAD_MS = 2.0
+SIMULATED_ITEM_COST_MS = 0.05
+
+
 class InferenceMode(Enum):
     """Режим вывода"""
     REALTIME = "realtime"
@@ -145,6 +166,10 @@ class InferenceEndpoint:
     # Traffic
     traffic_percent: int = 100
     
+    # Batching
+    max_batch_size: int = DEFAULT_MAX_BATCH_SIZE
+    max_batch_wait_ms: float = DEFAULT_MAX_BATCH_WAIT_MS
+    
     # Timestamps
     created_at: datetime = field(default_factory=datetime.now)
     updated_at: Optional[datetime] = None
@@ -227,6 +252,9 @@ class InferenceRequest:
     # Latency
     latency_ms: float = 0.0
     
+    # Cache
+    cache_hit: bool = False
+    
     # Status
     success: bool = True
     error: str = ""
@@ -277,6 +305,7 @@ class BatchJob:
     
     # Status
     status: str = "pending"  # pending, running, completed, failed
+    error: str = ""
     
     # Timestamps
     created_at: datetime = field(default_factory=datetime.now)
@@ -458,6 +487,259 @@ class InferencePlatformMetrics:
     collected_at: datetime = field(default_factory=datetime.now)
 
 
+def canonical_input_hash(input_data: Any) -> str:
+    """Канонический хэш входных данных"""
+    payload = json.dumps(input_data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+async def simulated_model(inputs: List[Any]) -> List[Dict[str, Any]]:
+    """Имитация пакетного вызова модели"""
+    await asyncio.sleep((SIMULATED_BATCH_OVERHEAD_MS + SIMULATED_ITEM_COST_MS * len(inputs)) / 1000)
+    
+    outputs = []
+    for input_data in inputs:
+        score = int(canonical_input_hash(input_data)[:8], 16) / 0xFFFFFFFF
+        outputs.append({
+            "prediction": int(score > 0.5),
+            "probabilities": [round(1 - score, 4), round(score, 4)]
+        })
+    return outputs
+
+
+class LatencyHistogram:
+    """Гистограмма латентности с фиксированными бакетами"""
+    
+    def __init__(self, boundaries: List[float] = None):
+        self.boundaries = boundaries or INFERENCE_LATENCY_BUCKETS_MS
+        self.counts = [0] * (len(self.boundaries) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+        
+    def record(self, value_ms: float):
+        self.counts[bisect.bisect_left(self.boundaries, value_ms)] += 1
+        self.count += 1
+        self.sum_ms += value_ms
+        if value_ms > self.max_ms:
+            self.max_ms = value_ms
+            
+    def percentile(self, q: float) -> float:
+        """Верхняя граница бакета, содержащего перцентиль"""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(self.count * q + 0.5))
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.boundaries[i], self.max_ms) if i < len(self.boundaries) else self.max_ms
+        return self.max_ms
+        
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg": self.sum_ms / self.count if self.count else 0.0,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": self.max_ms,
+            "buckets": {
+                f"le_{b}": c for b, c in zip(self.boundaries + ["inf"], self.counts)
+            }
+        }
+
+
+class MicroBatcher:
+    """Адаптивный микро-батчер вызовов модели"""
+    
+    def __init__(self, handler: Callable, max_batch_size: int,
+                 max_wait_ms: float, max_inflight: int):
+        self.handler = handler
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max_wait_ms
+        self.max_inflight = max(1, max_inflight)
+        
+        self.pending: deque = deque()
+        self.inflight = 0
+        self.flush_handle: Optional[asyncio.Handle] = None
+        self.tasks: Set[asyncio.Task] = set()
+        
+        # Stats
+        self.batches = 0
+        self.batched_requests = 0
+        self.largest_batch = 0
+        
+    async def submit(self, input_data: Any) -> Any:
+        """Постановка входа в очередь и ожидание результата"""
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((input_data, future))
+        self._schedule()
+        return await future
+        
+    def _schedule(self):
+        """Выбор момента отправки пакета"""
+        if self.inflight >= self.max_inflight:
+            return  # flushed when a running batch completes
+            
+        if len(self.pending) >= self.max_batch_size:
+            self._flush()
+        elif self.flush_handle is None:
+            loop = asyncio.get_running_loop()
+            if self.inflight == 0:
+                # Idle model: only coalesce calls made in the current loop tick
+                self.flush_handle = loop.call_soon(self._flush)
+            else:
+                self.flush_handle = loop.call_later(self.max_wait_ms / 1000, self._flush)
+                
+    def _flush(self):
+        """Отправка накопленных пакетов"""
+        if self.flush_handle:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+            
+        while self.pending and self.inflight < self.max_inflight:
+            size = min(len(self.pending), self.max_batch_size)
+            batch = [self.pending.popleft() for _ in range(size)]
+            batch = [(input_data, future) for input_data, future in batch if not future.done()]
+            if not batch:
+                continue
+                
+            self.inflight += 1
+            task = asyncio.create_task(self._run(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+            
+            if len(self.pending) < self.max_batch_size:
+                break
+                
+        if self.pending:
+            self._schedule()
+            
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        """Один вызов модели на пакет"""
+        try:
+            results = await self.handler([input_data for input_data, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"Model returned {len(results)} outputs for {len(batch)} inputs")
+                
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self.inflight -= 1
+            self.batches += 1
+            self.batched_requests += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            
+            # Requests queued while the model was busy go out right away
+            if self.pending:
+                self._flush()
+                
+    @property
+    def avg_batch_size(self) -> float:
+        return self.batched_requests / self.batches if self.batches else 0.0
+
+
+class ResponseCache:
+    """Кэш ответов модели (LRU / LFU / TTL)"""
+    
+    def __init__(self, config: CacheConfig):
+        self.config = config
+        self.max_bytes = config.max_size_mb * 1024 * 1024
+        self.size_bytes = 0
+        
+        # key -> (value, expires_at, size)
+        self.entries: OrderedDict = OrderedDict()
+        
+        # LFU frequency buckets
+        self.frequencies: Dict[str, int] = {}
+        self.buckets: Dict[int, OrderedDict] = {}
+        self.min_frequency = 0
+        
+        self.evictions = 0
+        self.expirations = 0
+        
+    def get(self, key: str) -> Optional[Any]:
+        """Получение значения"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+            
+        if entry[1] <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            return None
+            
+        if self.config.cache_strategy == CacheStrategy.LRU:
+            self.entries.move_to_end(key)
+        elif self.config.cache_strategy == CacheStrategy.LFU:
+            self._touch(key)
+            
+        return entry[0]
+        
+    def put(self, key: str, value: Any):
+        """Сохранение значения"""
+        size = len(key) + len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+            
+        if key in self.entries:
+            self._remove(key)
+            
+        while self.entries and self.size_bytes + size > self.max_bytes:
+            self._evict()
+            
+        self.entries[key] = (value, time.monotonic() + self.config.ttl_seconds, size)
+        self.size_bytes += size
+        
+        if self.config.cache_strategy == CacheStrategy.LFU:
+            self.frequencies[key] = 1
+            self.buckets.setdefault(1, OrderedDict())[key] = None
+            self.min_frequency = 1
+            
+    def _touch(self, key: str):
+        """Увеличение частоты обращений (LFU)"""
+        frequency = self.frequencies[key]
+        bucket = self.buckets[frequency]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[frequency]
+            if self.min_frequency == frequency:
+                self.min_frequency = frequency + 1
+                
+        self.frequencies[key] = frequency + 1
+        self.buckets.setdefault(frequency + 1, OrderedDict())[key] = None
+        
+    def _evict(self):
+        """Вытеснение одной записи"""
+        if self.config.cache_strategy == CacheStrategy.LFU and self.buckets:
+            if self.min_frequency not in self.buckets:
+                self.min_frequency = min(self.buckets)
+            key = next(iter(self.buckets[self.min_frequency]))
+        else:
+            # LRU order, or insertion (= expiry) order for TTL
+            key = next(iter(self.entries))
+            
+        self._remove(key)
+        self.evictions += 1
+        
+    def _remove(self, key: str):
+        _, _, size = self.entries.pop(key)
+        self.size_bytes -= size
+        
+        frequency = self.frequencies.pop(key, None)
+        if frequency is not None:
+            bucket = self.buckets[frequency]
+            del bucket[key]
+            if not bucket:
+                del self.buckets[frequency]
+
+
 class InferencePlatform:
     """Платформа вывода ML моделей"""
     
@@ -467,8 +749,8 @@ class InferencePlatform:
         self.endpoints: Dict[str, InferenceEndpoint] = {}
         self.deployments: Dict[str, ModelDeployment] = {}
         self.scaling_configs: Dict[str, ScalingConfig] = {}
-        self.requests: Dict[str, InferenceRequest] = {}
-        self.responses: Dict[str, InferenceResponse] = {}
+        self.requests: deque[InferenceRequest] = deque(maxlen=REQUEST_LOG_SIZE)
+        self.responses: deque[InferenceResponse] = deque(maxlen=REQUEST_LOG_SIZE)
         self.batch_jobs: Dict[str, BatchJob] = {}
         self.cache_configs: Dict[str, CacheConfig] = {}
         self.ab_tests: Dict[str, ABTest] = {}
@@ -477,6 +759,15 @@ class InferencePlatform:
         self.endpoint_metrics: Dict[str, EndpointMetrics] = {}
         self.platform_metrics: Dict[str, InferencePlatformMetrics] = {}
         
+        # Serving
+        self.model_handlers: Dict[str, Callable] = {}
+        self.batchers: Dict[str, MicroBatcher] = {}
+        self.caches: Dict[str, ResponseCache] = {}
+        
+        # Request counters and latency per endpoint
+        self.request_counts: Dict[str, Dict[str, int]] = {}
+        self.latency_histograms: Dict[str, LatencyHistogram] = {}
+        
     async def register_model(self, name: str,
                             model_format: ModelFormat,
                             model_path: str,
@@ -584,6 +875,69 @@ class InferencePlatform:
         
         return config
         
+    async def register_model_handler(self, artifact_id: str, handler: Callable) -> bool:
+        """Регистрация пакетного обработчика модели"""
+        if artifact_id not in self.artifacts:
+            return False
+            
+        self.model_handlers[artifact_id] = handler
+        
+        # Rebuild batchers of endpoints serving this artifact
+        for endpoint in self.endpoints.values():
+            if endpoint.model_artifact_id == artifact_id:
+                self.batchers.pop(endpoint.endpoint_id, None)
+                
+        return True
+        
+    async def configure_batching(self, endpoint_id: str,
+                                max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                                max_batch_wait_ms: float = DEFAULT_MAX_BATCH_WAIT_MS) -> bool:
+        """Настройка микро-батчинга эндпоинта"""
+        endpoint = self.endpoints.get(endpoint_id)
+        if not endpoint:
+            return False
+            
+        endpoint.max_batch_size = max_batch_size
+        endpoint.max_batch_wait_ms = max_batch_wait_ms
+        endpoint.updated_at = datetime.now()
+        
+        batcher = self.batchers.get(endpoint_id)
+        if batcher:
+            batcher.max_batch_size = max(1, max_batch_size)
+            batcher.max_wait_ms = max_batch_wait_ms
+            
+        return True
+        
+    def _get_batcher(self, endpoint: InferenceEndpoint) -> MicroBatcher:
+        """Батчер эндпоинта"""
+        batcher = self.batchers.get(endpoint.endpoint_id)
+        if batcher is None:
+            handler = self.model_handlers.get(endpoint.model_artifact_id, simulated_model)
+            
+            if asyncio.iscoroutinefunction(handler):
+                call = handler
+            else:
+                async def call(inputs: List[Any]) -> List[Any]:
+                    return await asyncio.get_running_loop().run_in_executor(None, handler, inputs)
+                    
+            batcher = MicroBatcher(call, endpoint.max_batch_size, endpoint.max_batch_wait_ms,
+                                   endpoint.instance_count)
+            self.batchers[endpoint.endpoint_id] = batcher
+        return batcher
+        
+    def _record_request(self, request: InferenceRequest):
+        """Учет запроса в счетчиках и гистограмме"""
+        counts = self.request_counts.setdefault(request.endpoint_id, {
+            "total": 0, "successful": 0, "failed": 0, "cache_hits": 0
+        })
+        counts["total"] += 1
+        counts["successful" if request.success else "failed"] += 1
+        if request.cache_hit:
+            counts["cache_hits"] += 1
+            
+        self.latency_histograms.setdefault(request.endpoint_id, LatencyHistogram()).record(request.latency_ms)
+        self.requests.append(request)
+        
     async def invoke(self, endpoint_id: str,
                     input_data: Dict[str, Any]) -> Optional[InferenceResponse]:
         """Вызов модели"""
@@ -591,6 +945,7 @@ class InferencePlatform:
         if not endpoint or endpoint.status != EndpointStatus.IN_SERVICE:
             return None
             
+        started = time.perf_counter()
         request = InferenceRequest(
             request_id=f"req_{uuid.uuid4().hex[:12]}",
             endpoint_id=endpoint_id,
@@ -598,34 +953,73 @@ class InferencePlatform:
             batch_size=1
         )
         
-        # Simulate inference
-        await asyncio.sleep(random.uniform(0.001, 0.01))
-        
+        cache = self.caches.get(endpoint_id)
+        if cache and not cache.config.is_enabled:
+            cache = None
+            
+        cache_key = f"{endpoint.model_artifact_id}:{canonical_input_hash(input_data)}" if cache else ""
+        output = cache.get(cache_key) if cache else None
+        
+        if output is not None:
+            request.cache_hit = True
+            cache.config.hit_count += 1
+        else:
+            if cache:
+                cache.config.miss_count += 1
+            try:
+                output = await self._get_batcher(endpoint).submit(input_data)
+            except Exception as e:
+                request.success = False
+                request.error = f"{type(e).__name__}: {e}"
+                request.processed_at = datetime.now()
+                request.latency_ms = (time.perf_counter() - started) * 1000
+                self._record_request(request)
+                return None
+                
+            if cache:
+                cache.put(cache_key, output)
+                
         request.processed_at = datetime.now()
-        request.latency_ms = random.uniform(5, 50)
-        
-        self.requests[request.request_id] = request
-        
-        # Generate response
+        request.latency_ms = (time.perf_counter() - started) * 1000
+        self._record_request(request)
+        
+        artifact = self.artifacts.get(endpoint.model_artifact_id)
+        if isinstance(output, dict):
+            predictions = [output.get("prediction")]
+            probabilities = [output["probabilities"]] if "probabilities" in output else []
+        else:
+            predictions, probabilities = [output], []
+            
         response = InferenceResponse(
             response_id=f"res_{uuid.uuid4().hex[:8]}",
             request_id=request.request_id,
-            predictions=[random.randint(0, 1)],
-            probabilities=[[round(random.uniform(0, 1), 4), round(random.uniform(0, 1), 4)]],
-            model_version=self.artifacts.get(endpoint.model_artifact_id).version if endpoint.model_artifact_id else ""
+            predictions=predictions,
+            probabilities=probabilities,
+            model_version=artifact.version if artifact else ""
         )
         
-        self.responses[response.response_id] = response
+        self.responses.append(response)
         return response
         
     async def batch_invoke(self, endpoint_id: str,
-                          inputs: List[Dict[str, Any]]) -> List[InferenceResponse]:
+                          inputs: List[Dict[str, Any]],
+                          max_concurrency: int = BATCH_INVOKE_CONCURRENCY) -> List[InferenceResponse]:
         """Пакетный вызов"""
-        responses = []
-        for input_data in inputs:
-            response = await self.invoke(endpoint_id, input_data)
-            if response:
-                responses.append(response)
+        responses = await self._invoke_many(endpoint_id, inputs, max_concurrency)
+        return [response for response in responses if response]
+        
+    async def _invoke_many(self, endpoint_id: str,
+                          inputs: List[Dict[str, Any]],
+                          max_concurrency: int) -> List[Optional[InferenceResponse]]:
+        """Вызовы с ограниченной параллельностью (ответы по порядку входов)"""
+        responses: List[Optional[InferenceResponse]] = [None] * len(inputs)
+        indexes = iter(range(len(inputs)))
+        
+        async def worker():
+            for i in indexes:
+                responses[i] = await self.invoke(endpoint_id, inputs[i])
+                
+        await asyncio.gather(*(worker() for _ in range(min(max(1, max_concurrency), len(inputs)))))
         return responses
         
     async def create_batch_job(self, endpoint_id: str,
@@ -650,29 +1044,82 @@ class InferencePlatform:
             input_format=input_format,
             output_format=output_format,
             batch_size=batch_size,
-            max_concurrency=max_concurrency,
-            total_records=random.randint(10000, 100000)
+            max_concurrency=max_concurrency
         )
         
         self.batch_jobs[job.job_id] = job
         return job
         
+    def _read_chunks(self, path: str, input_format: str, chunk_size: int):
+        """Потоковое чтение входного файла блоками"""
+        with open(path, newline="") as f:
+            if input_format == "csv":
+                rows = csv.DictReader(f)
+            elif input_format in ("json", "jsonl"):
+                rows = (json.loads(line) for line in f if line.strip())
+            else:
+                raise ValueError(f"Unsupported input format: {input_format}")
+                
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+                
     async def run_batch_job(self, job_id: str) -> Optional[BatchJob]:
         """Запуск пакетного задания"""
         job = self.batch_jobs.get(job_id)
-        if not job:
+        endpoint = self.endpoints.get(job.endpoint_id) if job else None
+        if not job or not endpoint:
             return None
             
         job.status = "running"
         job.started_at = datetime.now()
-        
-        # Simulate batch processing
-        job.processed_records = job.total_records - random.randint(0, 100)
-        job.failed_records = job.total_records - job.processed_records
-        
-        job.status = "completed"
+        job.total_records = job.processed_records = job.failed_records = 0
+        
+        # max_concurrency = model batches in flight per chunk
+        concurrency = max(1, job.max_concurrency) * max(1, endpoint.max_batch_size)
+        
+        try:
+            if job.output_format not in ("csv", "json", "jsonl"):
+                raise ValueError(f"Unsupported output format: {job.output_format}")
+                
+            with open(job.output_path, "w", newline="") as out:
+                writer = None
+                
+                for chunk in self._read_chunks(job.input_path, job.input_format, max(1, job.batch_size)):
+                    responses = await self._invoke_many(job.endpoint_id, chunk, concurrency)
+                    job.total_records += len(chunk)
+                    
+                    for row, response in zip(chunk, responses):
+                        if response is None:
+                            job.failed_records += 1
+                            continue
+                            
+                        job.processed_records += 1
+                        result = {
+                            "prediction": response.predictions[0] if response.predictions else None,
+                            "probabilities": response.probabilities[0] if response.probabilities else None
+                        }
+                        
+                        if job.output_format == "csv":
+                            record = {**row, **{k: json.dumps(v) if isinstance(v, list) else v for k, v in result.items()}}
+                            if writer is None:
+                                writer = csv.DictWriter(out, fieldnames=list(record.keys()), extrasaction="ignore")
+                                writer.writeheader()
+                            writer.writerow(record)
+                        else:
+                            out.write(json.dumps({"input": row, **result}, default=str) + "\n")
+                            
+            job.status = "completed"
+        except (OSError, ValueError, csv.Error) as e:
+            job.status = "failed"
+            job.error = f"{type(e).__name__}: {e}"
+            
         job.completed_at = datetime.now()
-        
         return job
         
     async def configure_cache(self, endpoint_id: str,
@@ -693,6 +1140,12 @@ class InferencePlatform:
         )
         
         self.cache_configs[config.config_id] = config
+        
+        if cache_strategy == CacheStrategy.NO_CACHE:
+            self.caches.pop(endpoint_id, None)
+        else:
+            self.caches[endpoint_id] = ResponseCache(config)
+            
         return config
         
     async def create_ab_test(self, name: str,
@@ -800,19 +1253,36 @@ class InferencePlatform:
             self.alerts[alert.alert_id] = alert
             alerts.append(alert)
             
-        if monitor.check_performance and random.random() < 0.05:
+        histogram = self.latency_histograms.get(monitor.endpoint_id)
+        p99 = histogram.percentile(0.99) if histogram else 0.0
+        if monitor.check_performance and p99 > monitor.latency_threshold_ms:
             alert = MonitoringAlert(
                 alert_id=f"alr_{uuid.uuid4().hex[:8]}",
                 endpoint_id=monitor.endpoint_id,
                 alert_type="latency",
                 message="High latency detected",
-                metric_value=random.uniform(100, 200),
+                metric_value=p99,
                 threshold=monitor.latency_threshold_ms,
                 severity="critical"
             )
             self.alerts[alert.alert_id] = alert
             alerts.append(alert)
             
+        counts = self.request_counts.get(monitor.endpoint_id)
+        error_rate = counts["failed"] / counts["total"] * 100 if counts and counts["total"] else 0.0
+        if monitor.check_performance and error_rate > monitor.error_rate_threshold:
+            alert = MonitoringAlert(
+                alert_id=f"alr_{uuid.uuid4().hex[:8]}",
+                endpoint_id=monitor.endpoint_id,
+                alert_type="error_rate",
+                message="High error rate detected",
+                metric_value=error_rate,
+                threshold=monitor.error_rate_threshold,
+                severity="critical"
+            )
+            self.alerts[alert.alert_id] = alert
+            alerts.append(alert)
+            
         monitor.last_check = datetime.now()
         return alerts
         
@@ -822,21 +1292,21 @@ class InferencePlatform:
         if not endpoint:
             return None
             
-        endpoint_requests = [r for r in self.requests.values() if r.endpoint_id == endpoint_id]
-        successful = sum(1 for r in endpoint_requests if r.success)
-        latencies = [r.latency_ms for r in endpoint_requests]
+        counts = self.request_counts.get(endpoint_id, {"total": 0, "successful": 0, "failed": 0})
+        histogram = self.latency_histograms.get(endpoint_id, LatencyHistogram())
+        uptime = max((datetime.now() - endpoint.created_at).total_seconds(), 1e-3)
         
         metrics = EndpointMetrics(
             metrics_id=f"em_{uuid.uuid4().hex[:8]}",
             endpoint_id=endpoint_id,
-            total_requests=len(endpoint_requests),
-            successful_requests=successful,
-            failed_requests=len(endpoint_requests) - successful,
-            avg_latency_ms=sum(latencies) / len(latencies) if latencies else 0.0,
-            p50_latency_ms=sorted(latencies)[len(latencies)//2] if latencies else 0.0,
-            p95_latency_ms=sorted(latencies)[int(len(latencies)*0.95)] if len(latencies) > 20 else max(latencies) if latencies else 0.0,
-            p99_latency_ms=sorted(latencies)[int(len(latencies)*0.99)] if len(latencies) > 100 else max(latencies) if latencies else 0.0,
-            requests_per_second=random.uniform(10, 100),
+            total_requests=counts["total"],
+            successful_requests=counts["successful"],
+            failed_requests=counts["failed"],
+            avg_latency_ms=histogram.sum_ms / histogram.count if histogram.count else 0.0,
+            p50_latency_ms=histogram.percentile(0.50),
+            p95_latency_ms=histogram.percentile(0.95),
+            p99_latency_ms=histogram.percentile(0.99),
+            requests_per_second=counts["total"] / uptime,
             cpu_utilization=random.uniform(20, 80),
             memory_utilization=random.uniform(30, 70),
             gpu_utilization=random.uniform(0, 90) if "gpu" in endpoint.instance_type else 0.0
@@ -852,15 +1322,17 @@ class InferencePlatform:
         active_tests = sum(1 for t in self.ab_tests.values() if t.status == "running")
         active_alerts = sum(1 for a in self.alerts.values() if not a.is_resolved)
         
-        latencies = [r.latency_ms for r in self.requests.values()]
+        total_requests = sum(c["total"] for c in self.request_counts.values())
+        latency_count = sum(h.count for h in self.latency_histograms.values())
+        latency_sum = sum(h.sum_ms for h in self.latency_histograms.values())
         
         metrics = InferencePlatformMetrics(
             metrics_id=f"pm_{uuid.uuid4().hex[:8]}",
             total_endpoints=len(self.endpoints),
             active_endpoints=active_endpoints,
             total_deployments=len(self.deployments),
-            total_requests=len(self.requests),
-            avg_latency_ms=sum(latencies) / len(latencies) if latencies else 0.0,
+            total_requests=total_requests,
+            avg_latency_ms=latency_sum / latency_count if latency_count else 0.0,
             total_batch_jobs=len(self.batch_jobs),
             completed_batch_jobs=completed_jobs,
             active_tests=active_tests,
@@ -880,8 +1352,12 @@ class InferencePlatform:
         for mode in InferenceMode:
             endpoints_by_mode[mode.value] = sum(1 for e in self.endpoints.values() if e.inference_mode == mode)
             
-        total_requests = len(self.requests)
-        successful_requests = sum(1 for r in self.requests.values() if r.success)
+        total_requests = sum(c["total"] for c in self.request_counts.values())
+        successful_requests = sum(c["successful"] for c in self.request_counts.values())
+        cache_hits = sum(c["cache_hits"] for c in self.request_counts.values())
+        
+        batches = sum(b.batches for b in self.batchers.values())
+        batched_requests = sum(b.batched_requests for b in self.batchers.values())
         
         total_batch_jobs = len(self.batch_jobs)
         completed_jobs = sum(1 for j in self.batch_jobs.values() if j.status == "completed")
@@ -898,6 +1374,10 @@ class InferencePlatform:
             "endpoints_by_mode": endpoints_by_mode,
             "total_requests": total_requests,
             "successful_requests": successful_requests,
+            "cache_hits": cache_hits,
+            "cache_hit_rate": cache_hits / total_requests * 100 if total_requests else 0.0,
+            "model_batches": batches,
+            "avg_batch_size": batched_requests / batches if batches else 0.0,
             "total_batch_jobs": total_batch_jobs,
             "completed_jobs": completed_jobs,
             "total_ab_tests": total_ab_tests,
@@ -989,18 +1469,46 @@ async def main():
     # Invoke Models (Realtime)
     print("\n🚀 Invoking Models (Realtime)...")
     
-    for _ in range(50):
+    # Concurrent callers are coalesced into model batches; repeated inputs hit the cache
+    feature_pool = [{"features": [round(random.random(), 3) for _ in range(10)]} for _ in range(30)]
+    calls = []
+    for _ in range(200):
         ep = random.choice(endpoints[:7])  # Skip batch endpoint
-        await platform.invoke(ep.endpoint_id, {"features": [random.random() for _ in range(10)]})
+        calls.append(platform.invoke(ep.endpoint_id, random.choice(feature_pool)))
+    await asyncio.gather(*calls)
+    
+    responses = await platform.batch_invoke(endpoints[0].endpoint_id, feature_pool, max_concurrency=16)
         
-    print(f"  🚀 Completed {len(platform.requests)} inference requests")
+    print(f"  🚀 Completed {len(platform.requests)} inference requests ({len(responses)} via batch_invoke)")
+    
+    for ep in endpoints[:4]:
+        batcher = platform.batchers.get(ep.endpoint_id)
+        cache = platform.caches.get(ep.endpoint_id)
+        batch_info = f"{batcher.batches} batches, avg size {batcher.avg_batch_size:.1f}" if batcher else "no batches"
+        cache_info = f"cache {cache.config.hit_count} hits/{cache.config.miss_count} misses" if cache else "no cache"
+        print(f"  📦 {ep.name}: {batch_info}, {cache_info}")
     
     # Batch Inference
     print("\n📊 Creating Batch Jobs...")
     
+    work_dir = tempfile.mkdtemp(prefix="inference_batch_")
+    
+    demand_input = os.path.join(work_dir, "demand.jsonl")
+    with open(demand_input, "w") as f:
+        for i in range(2000):
+            f.write(json.dumps({"store_id": i % 50, "features": [random.random() for _ in range(5)]}) + "\n")
+            
+    churn_input = os.path.join(work_dir, "churn.csv")
+    with open(churn_input, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["customer_id", "tenure", "monthly_charges"])
+        for i in range(5000):
+            writer.writerow([f"cust_{i}", random.randint(1, 72), round(random.uniform(20, 120), 2)])
+            
     batch_data = [
-        (endpoints[7].endpoint_id, "demand_forecast_daily", "s3://data/demand/input/", "s3://data/demand/output/", "parquet", "parquet", 500, 20),
-        (endpoints[0].endpoint_id, "churn_scoring_batch", "s3://data/churn/input/", "s3://data/churn/output/", "csv", "csv", 1000, 10)
+        (endpoints[7].endpoint_id, "demand_forecast_daily", demand_input, os.path.join(work_dir, "demand_out.jsonl"), "jsonl", "jsonl", 500, 20),
+        (endpoints[0].endpoint_id, "churn_scoring_batch", churn_input, os.path.join(work_dir, "churn_out.csv"), "csv", "csv", 1000, 10),
+        (endpoints[7].endpoint_id, "demand_forecast_parquet", "s3://data/demand/input/", "s3://data/demand/output/", "parquet", "parquet", 500, 20)
     ]
     
     batch_jobs = []
@@ -1009,7 +1517,10 @@ async def main():
         if job:
             batch_jobs.append(job)
             await platform.run_batch_job(job.job_id)
-            print(f"  📊 {name}: {job.processed_records:,}/{job.total_records:,} records")
+            detail = f" ({job.error})" if job.error else ""
+            print(f"  📊 {name}: {job.processed_records:,}/{job.total_records:,} records, {job.status}{detail}")
+            
+    shutil.rmtree(work_dir, ignore_errors=True)
             
     # Create A/B Tests
     print("\n🧪 Creating A/B Tests...")
@@ -1145,6 +1656,8 @@ async def main():
     print(f"\n  Model Artifacts: {stats['total_artifacts']}")
     print(f"  Endpoints: {stats['active_endpoints']}/{stats['total_endpoints']} active")
     print(f"  Requests: {stats['successful_requests']:,}/{stats['total_requests']:,} successful")
+    print(f"  Cache Hit Rate: {stats['cache_hit_rate']:.1f}%")
+    print(f"  Model Batches: {stats['model_batches']:,} (avg size {stats['avg_batch_size']:.1f})")
     print(f"  Batch Jobs: {stats['completed_jobs']}/{stats['total_batch_jobs']} completed")
     print(f"  A/B Tests: {stats['active_tests']}/{stats['total_ab_tests']} active")
     print(f"  Active Alerts: {stats['active_alerts']}")
@@ -1170,5 +1683,46 @@ async def main():
     print("=" * 60)
 
 
+def benchmark_inference_platform(requests: int = 5000, concurrency: int = 256) -> Dict[str, Any]:
+    """Бенчмарк: поштучные вызовы против микро-батчинга и кэша"""
+    
+    async def run(max_batch_size: int, with_cache: bool) -> Dict[str, Any]:
+        platform = InferencePlatform()
+        artifact = await platform.register_model("bench", ModelFormat.ONNX, "/models/bench.onnx", 1024, "1.0")
+        endpoint = await platform.create_endpoint("bench-endpoint", artifact.artifact_id)
+        await platform.configure_batching(endpoint.endpoint_id, max_batch_size=max_batch_size)
+        if with_cache:
+            await platform.configure_cache(endpoint.endpoint_id, CacheStrategy.LRU, 64, 3600)
+            
+        rng = random.Random(42)
+        pool = [{"features": [rng.random() for _ in range(8)]} for _ in range(requests // 4)]
+        inputs = [rng.choice(pool) for _ in range(requests)]
+        
+        started = time.perf_counter()
+        responses = await platform.batch_invoke(endpoint.endpoint_id, inputs, max_concurrency=concurrency)
+        elapsed = time.perf_counter() - started
+        
+        histogram = platform.latency_histograms[endpoint.endpoint_id]
+        stats = platform.get_statistics()
+        return {
+            "requests": len(responses),
+            "seconds": round(elapsed, 3),
+            "requests_per_second": round(len(responses) / elapsed, 1),
+            "avg_batch_size": round(stats["avg_batch_size"], 2),
+            "p50_latency_ms": histogram.percentile(0.50),
+            "p99_latency_ms": histogram.percentile(0.99),
+            "cache_hit_rate": round(stats["cache_hit_rate"], 2)
+        }
+        
+    return {
+        "unbatched": asyncio.run(run(1, False)),
+        "batched": asyncio.run(run(DEFAULT_MAX_BATCH_SIZE, False)),
+        "batched_cached": asyncio.run(run(DEFAULT_MAX_BATCH_SIZE, True))
+    }
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    if "--benchmark" in sys.argv:
+        print(json.dumps(benchmark_inference_platform(), indent=2))
+    else:
+        asyncio.run(main())
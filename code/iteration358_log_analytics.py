@@ -15,10 +15,14 @@ Server Init - Iteration 358: Log Analytics Platform
 """
 
 import asyncio
+import bisect
+import dataclasses
+import heapq
 import random
+import time
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Set
+from typing import Dict, List, Optional, Any, Set, Tuple, Iterable
 from enum import Enum
 import uuid
 import json
@@ -267,8 +271,8 @@ class Aggregation:
     # Interval (for date histogram)
     interval: str = ""  # 1m, 5m, 1h, 1d
     
-    # Buckets
-    buckets: List[Dict[str, Any]] = field(default_factory=list)
+    # Buckets (атрибут `field` выше перекрывает dataclasses.field)
+    buckets: List[Dict[str, Any]] = dataclasses.field(default_factory=list)
 
 
 @dataclass
@@ -474,6 +478,372 @@ class LogAnalyticsMetrics:
     collected_at: datetime = field(default_factory=datetime.now)
 
 
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9]+")
+CAMEL_CASE_PATTERN = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+QUERY_TOKEN_PATTERN = re.compile(r'"[^"]*"|\S+')
+KEYWORD_FIELDS = ("level", "service", "host", "source_id")
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def tokenize(text: str) -> List[str]:
+    """Разбиение текста на термы индекса (OutOfMemoryError -> outofmemoryerror, out, of, memory, error)"""
+    terms = []
+    for word in TOKEN_PATTERN.findall(text):
+        lowered = word.lower()
+        terms.append(lowered)
+        if lowered != word and not word.isupper():
+            parts = CAMEL_CASE_PATTERN.findall(word)
+            if len(parts) > 1:
+                terms.extend(part.lower() for part in parts)
+    return terms
+
+
+def parse_duration(value: str) -> Optional[timedelta]:
+    """Разбор длительности вида 5m, 1h, 7d"""
+    match = re.fullmatch(r"(\d+)([smhd])", value.strip()) if value else None
+    if not match:
+        return None
+    return timedelta(seconds=int(match.group(1)) * DURATION_UNITS[match.group(2)])
+
+
+@dataclass
+class QueryClause:
+    """Конъюнкция условий запроса"""
+    # Full-text terms
+    terms: List[str] = field(default_factory=list)
+    phrases: List[str] = field(default_factory=list)
+    
+    # keyword-поля (level, service, host, source_id)
+    keywords: List[Tuple[str, str]] = field(default_factory=list)
+    
+    # Произвольные поля из LogEntry.fields
+    field_terms: List[Tuple[str, str]] = field(default_factory=list)
+    
+    def is_empty(self) -> bool:
+        return not (self.terms or self.phrases or self.keywords or self.field_terms)
+
+
+def parse_query(query_string: str) -> List[QueryClause]:
+    """Разбор запроса: термы, "фразы", field:value, AND/OR"""
+    clauses = [QueryClause()]
+    
+    for token in QUERY_TOKEN_PATTERN.findall(query_string or ""):
+        clause = clauses[-1]
+        
+        if token == "OR":
+            if not clause.is_empty():
+                clauses.append(QueryClause())
+            continue
+        if token in ("AND", "*"):
+            continue
+            
+        if token.startswith('"'):
+            phrase = token.strip('"').lower()
+            if phrase:
+                clause.phrases.append(phrase)
+                clause.terms.extend(tokenize(phrase))
+            continue
+            
+        name, sep, value = token.partition(":")
+        if sep and name and value:
+            name = name.lower()
+            if name in KEYWORD_FIELDS:
+                clause.keywords.append((name, value.lower()))
+            else:
+                clause.field_terms.append((name, value))
+            continue
+            
+        clause.terms.extend(tokenize(token))
+        
+    non_empty = [c for c in clauses if not c.is_empty()]
+    return non_empty or [QueryClause()]
+
+
+class LogSearchIndex:
+    """Инвертированный индекс логов
+    
+    Документы нумеруются монотонно растущими doc_id, поэтому posting-листы
+    остаются отсортированными при простом append. Удаление ленивое: posting-листы
+    чистятся при компактификации, когда удалённых больше, чем живых.
+    """
+    
+    def __init__(self, time_bucket_seconds: int = 60):
+        self.time_bucket_seconds = time_bucket_seconds
+        self.next_doc_id = 0
+        
+        # Documents
+        self.docs: Dict[int, LogEntry] = {}
+        self.doc_ids: Dict[str, int] = {}
+        self.timestamps: Dict[int, float] = {}
+        
+        # Posting lists
+        self.postings: Dict[str, List[int]] = {}
+        self.keyword_postings: Dict[str, Dict[str, List[int]]] = {name: {} for name in KEYWORD_FIELDS}
+        self.keyword_counts: Dict[str, Dict[str, int]] = {name: {} for name in KEYWORD_FIELDS}
+        
+        # Time buckets
+        self.time_buckets: Dict[int, List[int]] = {}
+        self.bucket_keys: List[int] = []
+        
+        self.deleted_count = 0
+        
+    def __len__(self) -> int:
+        return len(self.docs)
+        
+    @staticmethod
+    def _keyword_value(log: LogEntry, name: str) -> str:
+        if name == "level":
+            return log.level.value
+        return getattr(log, name).lower()
+        
+    def add(self, log: LogEntry):
+        """Индексация записи"""
+        doc_id = self.next_doc_id
+        self.next_doc_id += 1
+        
+        ts = log.timestamp.timestamp()
+        self.docs[doc_id] = log
+        self.doc_ids[log.log_id] = doc_id
+        self.timestamps[doc_id] = ts
+        
+        postings = self.postings
+        for term in set(tokenize(log.raw_message)):
+            posting = postings.get(term)
+            if posting is None:
+                postings[term] = [doc_id]
+            else:
+                posting.append(doc_id)
+                
+        for name in KEYWORD_FIELDS:
+            value = self._keyword_value(log, name)
+            if not value:
+                continue
+            self.keyword_postings[name].setdefault(value, []).append(doc_id)
+            counts = self.keyword_counts[name]
+            counts[value] = counts.get(value, 0) + 1
+            
+        bucket = int(ts // self.time_bucket_seconds)
+        bucket_docs = self.time_buckets.get(bucket)
+        if bucket_docs is None:
+            self.time_buckets[bucket] = [doc_id]
+            bisect.insort(self.bucket_keys, bucket)
+        else:
+            bucket_docs.append(doc_id)
+            
+    def _delete(self, doc_id: int) -> LogEntry:
+        log = self.docs.pop(doc_id)
+        del self.timestamps[doc_id]
+        del self.doc_ids[log.log_id]
+        
+        for name in KEYWORD_FIELDS:
+            value = self._keyword_value(log, name)
+            if value:
+                self.keyword_counts[name][value] -= 1
+                
+        self.deleted_count += 1
+        return log
+        
+    def remove(self, log_id: str) -> Optional[LogEntry]:
+        """Удаление записи по log_id"""
+        doc_id = self.doc_ids.get(log_id)
+        if doc_id is None:
+            return None
+        log = self._delete(doc_id)
+        self._maybe_compact()
+        return log
+        
+    def remove_before(self, cutoff: datetime) -> List[LogEntry]:
+        """Удаление записей старше cutoff (обходит только устаревшие бакеты)"""
+        cutoff_ts = cutoff.timestamp()
+        end = bisect.bisect_right(self.bucket_keys, int(cutoff_ts // self.time_bucket_seconds))
+        removed = []
+        
+        for bucket in self.bucket_keys[:end]:
+            remaining = []
+            for doc_id in self.time_buckets[bucket]:
+                ts = self.timestamps.get(doc_id)
+                if ts is None:
+                    continue
+                if ts < cutoff_ts:
+                    removed.append(self._delete(doc_id))
+                else:
+                    remaining.append(doc_id)
+            if remaining:
+                self.time_buckets[bucket] = remaining
+            else:
+                del self.time_buckets[bucket]
+                
+        self.bucket_keys = [b for b in self.bucket_keys[:end] if b in self.time_buckets] + self.bucket_keys[end:]
+        self._maybe_compact()
+        return removed
+        
+    def _maybe_compact(self):
+        if self.deleted_count < 1024 or self.deleted_count < len(self.docs):
+            return
+            
+        docs = self.docs
+        
+        def compact(index: Dict[Any, List[int]]):
+            for key in list(index):
+                alive = [d for d in index[key] if d in docs]
+                if alive:
+                    index[key] = alive
+                else:
+                    del index[key]
+                    
+        compact(self.postings)
+        for name in KEYWORD_FIELDS:
+            compact(self.keyword_postings[name])
+            self.keyword_counts[name] = {k: v for k, v in self.keyword_counts[name].items() if v > 0}
+        compact(self.time_buckets)
+        self.bucket_keys = sorted(self.time_buckets)
+        self.deleted_count = 0
+        
+    @staticmethod
+    def _intersect(lists: List[List[int]]) -> List[int]:
+        """Пересечение отсортированных posting-листов, начиная с самого короткого"""
+        lists = sorted(lists, key=len)
+        result = lists[0]
+        
+        for other in lists[1:]:
+            if not result:
+                break
+            matched = []
+            lo = 0
+            n = len(other)
+            for doc_id in result:
+                lo = bisect.bisect_left(other, doc_id, lo)
+                if lo == n:
+                    break
+                if other[lo] == doc_id:
+                    matched.append(doc_id)
+            result = matched
+            
+        return result
+        
+    def _time_range_docs(self, start: Optional[float], end: Optional[float]) -> Iterable[int]:
+        """Кандидаты по временным бакетам; проверка ts только на граничных бакетах"""
+        if start is None and end is None:
+            return list(self.docs)
+            
+        width = self.time_bucket_seconds
+        keys = self.bucket_keys
+        lo = bisect.bisect_left(keys, int(start // width)) if start is not None else 0
+        hi = bisect.bisect_right(keys, int(end // width)) if end is not None else len(keys)
+        timestamps = self.timestamps
+        docs = []
+        
+        for bucket in keys[lo:hi]:
+            bucket_docs = self.time_buckets[bucket]
+            partial = (start is not None and bucket * width < start) or \
+                      (end is not None and (bucket + 1) * width > end)
+            if not partial:
+                docs.extend(bucket_docs)
+                continue
+            for doc_id in bucket_docs:
+                ts = timestamps.get(doc_id)
+                if ts is not None and (start is None or ts >= start) and (end is None or ts <= end):
+                    docs.append(doc_id)
+                    
+        return docs
+        
+    def _execute_clause(self, clause: QueryClause,
+                        keyword_filters: Dict[str, Set[str]],
+                        start: Optional[float],
+                        end: Optional[float],
+                        field_filters: Dict[str, Any]) -> List[int]:
+        lists = [self.postings.get(term, []) for term in clause.terms]
+        lists.extend(self.keyword_postings[name].get(value, []) for name, value in clause.keywords)
+        if any(not posting for posting in lists):
+            return []
+            
+        # Фильтр по keyword-полям: объединение posting-листов, если оно меньше
+        # самого короткого листа, иначе — предикат на кандидатах
+        predicates = []
+        smallest = min((len(p) for p in lists), default=None)
+        for name, values in keyword_filters.items():
+            counts = self.keyword_counts[name]
+            estimate = sum(counts.get(v, 0) for v in values)
+            if smallest is None or estimate <= smallest:
+                union = list(heapq.merge(*(self.keyword_postings[name].get(v, []) for v in values)))
+                if not union:
+                    return []
+                lists.append(union)
+                smallest = min(smallest or len(union), len(union))
+            else:
+                predicates.append((name, values))
+                
+        if lists:
+            candidates = self._intersect(lists)
+            time_filtered = start is None and end is None
+        else:
+            candidates = self._time_range_docs(start, end)
+            time_filtered = True
+            
+        docs = self.docs
+        timestamps = self.timestamps
+        matched = []
+        
+        for doc_id in candidates:
+            log = docs.get(doc_id)
+            if log is None:
+                continue
+            if not time_filtered:
+                ts = timestamps[doc_id]
+                if (start is not None and ts < start) or (end is not None and ts > end):
+                    continue
+            if predicates and any(self._keyword_value(log, name) not in values for name, values in predicates):
+                continue
+            if clause.phrases:
+                message = log.raw_message.lower()
+                if any(phrase not in message for phrase in clause.phrases):
+                    continue
+            if clause.field_terms and any(str(log.fields.get(name)) != value for name, value in clause.field_terms):
+                continue
+            if field_filters and any(log.fields.get(name) != value for name, value in field_filters.items()):
+                continue
+            matched.append(doc_id)
+            
+        return matched
+        
+    def execute(self, clauses: List[QueryClause],
+                time_range_start: Optional[datetime] = None,
+                time_range_end: Optional[datetime] = None,
+                keyword_filters: Dict[str, List[str]] = None,
+                field_filters: Dict[str, Any] = None) -> List[int]:
+        """Выполнение запроса, возвращает doc_id совпадений"""
+        start = time_range_start.timestamp() if time_range_start else None
+        end = time_range_end.timestamp() if time_range_end else None
+        filters = {
+            name: {str(v).lower() for v in values}
+            for name, values in (keyword_filters or {}).items() if values
+        }
+        
+        if len(clauses) == 1:
+            return self._execute_clause(clauses[0], filters, start, end, field_filters or {})
+            
+        matched: Set[int] = set()
+        for clause in clauses:
+            matched.update(self._execute_clause(clause, filters, start, end, field_filters or {}))
+        return list(matched)
+        
+    def top_k(self, doc_ids: List[int], size: int, offset: int = 0,
+              descending: bool = True) -> List[LogEntry]:
+        """Top-k по timestamp без полной сортировки совпадений"""
+        select = heapq.nlargest if descending else heapq.nsmallest
+        top = select(offset + size, doc_ids, key=self.timestamps.__getitem__)
+        return [self.docs[doc_id] for doc_id in top[offset:]]
+        
+    def get_statistics(self) -> Dict[str, Any]:
+        """Статистика индекса"""
+        return {
+            "documents": len(self.docs),
+            "terms": len(self.postings),
+            "time_buckets": len(self.time_buckets),
+            "pending_deletes": self.deleted_count
+        }
+
+
 class LogAnalyticsPlatform:
     """Платформа аналитики логов"""
     
@@ -491,6 +861,7 @@ class LogAnalyticsPlatform:
         self.anomalies: Dict[str, Anomaly] = {}
         self.dashboards: Dict[str, Dashboard] = {}
         self.alerts: Dict[str, Alert] = {}
+        self.search_index = LogSearchIndex()
         
     async def create_log_source(self, name: str,
                                source_type: str,
@@ -558,6 +929,7 @@ class LogAnalyticsPlatform:
         )
         
         self.logs[log.log_id] = log
+        self.search_index.add(log)
         
         # Update source stats
         source.events_received += 1
@@ -633,52 +1005,28 @@ class LogAnalyticsPlatform:
         )
         
         # Perform search
-        hits = []
-        query_lower = query_string.lower()
-        
-        for log in self.logs.values():
-            # Text search
-            if query_string and query_lower not in log.raw_message.lower():
-                continue
-                
-            # Time range filter
-            if time_range_start and log.timestamp < time_range_start:
-                continue
-            if time_range_end and log.timestamp > time_range_end:
-                continue
-                
-            # Level filter
-            if levels and log.level not in levels:
-                continue
-                
-            # Source filter
-            if sources and log.source_id not in sources:
-                continue
-                
-            # Field filters
-            match = True
-            for field_name, field_value in (field_filters or {}).items():
-                if log.fields.get(field_name) != field_value:
-                    match = False
-                    break
-                    
-            if match:
-                hits.append(log)
-                
-            if len(hits) >= size:
-                break
-                
-        # Sort by timestamp
-        hits.sort(key=lambda x: x.timestamp, reverse=True)
+        started = time.perf_counter()
+        keyword_filters = {
+            "level": [level.value for level in levels or []],
+            "source_id": sources or []
+        }
+        matched = self.search_index.execute(
+            parse_query(query_string),
+            time_range_start=time_range_start,
+            time_range_end=time_range_end,
+            keyword_filters=keyword_filters,
+            field_filters=field_filters
+        )
+        hits = self.search_index.top_k(matched, size)
         
-        query.duration_ms = random.uniform(1, 50)
+        query.duration_ms = (time.perf_counter() - started) * 1000
         self.queries[query.query_id] = query
         
         result = SearchResult(
             result_id=f"res_{uuid.uuid4().hex[:8]}",
             query_id=query.query_id,
-            total_hits=len(hits),
-            hits=hits[:size]
+            total_hits=len(matched),
+            hits=hits
         )
         
         self.results[result.result_id] = result
@@ -731,6 +1079,71 @@ class LogAnalyticsPlatform:
         self.saved_searches[saved.saved_id] = saved
         return saved
         
+    @staticmethod
+    def _split_filters(filters: Dict[str, Any]) -> Tuple[Dict[str, List[str]], Dict[str, Any]]:
+        """Разделение фильтров на keyword-поля индекса и поля LogEntry.fields"""
+        keyword_filters = {}
+        field_filters = {}
+        for name, value in (filters or {}).items():
+            if name in KEYWORD_FIELDS:
+                keyword_filters[name] = value if isinstance(value, list) else [value]
+            else:
+                field_filters[name] = value
+        return keyword_filters, field_filters
+        
+    def _count_matches(self, query_string: str,
+                       filters: Dict[str, Any] = None,
+                       time_range: str = "") -> int:
+        """Подсчёт совпадений без материализации результатов"""
+        keyword_filters, field_filters = self._split_filters(filters)
+        window = parse_duration(time_range)
+        return len(self.search_index.execute(
+            parse_query(query_string),
+            time_range_start=datetime.now() - window if window else None,
+            keyword_filters=keyword_filters,
+            field_filters=field_filters
+        ))
+        
+    async def run_saved_search(self, saved_id: str,
+                               size: int = 100) -> Optional[SearchResult]:
+        """Выполнение сохранённого поиска"""
+        saved = self.saved_searches.get(saved_id)
+        if not saved:
+            return None
+            
+        keyword_filters, field_filters = self._split_filters(saved.filters)
+        window = parse_duration(saved.time_range)
+        time_range_start = datetime.now() - window if window else None
+        
+        started = time.perf_counter()
+        matched = self.search_index.execute(
+            parse_query(saved.query_string),
+            time_range_start=time_range_start,
+            keyword_filters=keyword_filters,
+            field_filters=field_filters
+        )
+        
+        query = SearchQuery(
+            query_id=f"qry_{uuid.uuid4().hex[:8]}",
+            query_string=saved.query_string,
+            time_range_start=time_range_start,
+            field_filters=field_filters,
+            size=size,
+            duration_ms=(time.perf_counter() - started) * 1000
+        )
+        self.queries[query.query_id] = query
+        saved.last_used_at = datetime.now()
+        
+        result = SearchResult(
+            result_id=f"res_{uuid.uuid4().hex[:8]}",
+            query_id=query.query_id,
+            total_hits=len(matched),
+            hits=self.search_index.top_k(matched, size)
+        )
+        
+        self.results[result.result_id] = result
+        return result
+        
     async def create_retention_policy(self, name: str,
                                       index_pattern: str,
                                       max_age_days: int = 30,
@@ -758,15 +1171,12 @@ class LogAnalyticsPlatform:
         # Simulate retention execution
         cutoff_date = datetime.now() - timedelta(days=policy.max_age_days)
         
-        logs_to_remove = [
-            log_id for log_id, log in self.logs.items()
-            if log.timestamp < cutoff_date
-        ]
-        
-        bytes_freed = sum(len(self.logs[log_id].raw_message.encode('utf-8')) for log_id in logs_to_remove)
+        removed = self.search_index.remove_before(cutoff_date)
         
-        for log_id in logs_to_remove:
-            del self.logs[log_id]
+        bytes_freed = 0
+        for log in removed:
+            bytes_freed += len(log.raw_message.encode('utf-8'))
+            del self.logs[log.log_id]
             
         policy.last_executed = datetime.now()
         policy.indices_affected = 1
@@ -898,11 +1308,10 @@ class LogAnalyticsPlatform:
             if not alert.is_enabled:
                 continue
                 
-            # Simulate alert evaluation
-            result = await self.search(alert.query_string, size=1000)
+            hits = self._count_matches(alert.query_string, time_range=alert.time_window)
             
             should_trigger = False
-            if alert.condition_type == "count" and result.total_hits > alert.threshold:
+            if alert.condition_type == "count" and hits > alert.threshold:
                 should_trigger = True
             elif alert.condition_type == "threshold" and random.random() < 0.2:
                 should_trigger = True
@@ -940,9 +1349,8 @@ class LogAnalyticsPlatform:
         """Общая статистика"""
         active_sources = sum(1 for s in self.sources.values() if s.is_active)
         
-        logs_by_level = {}
-        for level in LogLevel:
-            logs_by_level[level.value] = sum(1 for l in self.logs.values() if l.level == level)
+        level_counts = self.search_index.keyword_counts["level"]
+        logs_by_level = {level.value: level_counts.get(level.value, 0) for level in LogLevel}
             
         triggered_alerts = sum(1 for a in self.alerts.values() if a.is_triggered)
         
@@ -953,6 +1361,7 @@ class LogAnalyticsPlatform:
             "total_logs": len(self.logs),
             "logs_by_level": logs_by_level,
             "total_indices": len(self.indices),
+            "search_index": self.search_index.get_statistics(),
             "total_searches": len(self.queries),
             "saved_searches": len(self.saved_searches),
             "retention_policies": len(self.retention_policies),
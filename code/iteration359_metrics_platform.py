@@ -15,10 +15,16 @@ Server Init - Iteration 359: Metrics Platform
 """
 
 import asyncio
+import bisect
+import heapq
+import itertools
 import random
+import re
+import struct
+import time
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Set, Tuple
+from typing import Dict, List, Optional, Any, Set, Tuple, Iterable, Iterator
 from enum import Enum
 import uuid
 import json
@@ -75,6 +81,220 @@ class StorageStatus(Enum):
     COMPACTING = "compacting"
 
 
+CHUNK_MAX_SAMPLES = 120
+BLOCK_CHUNK_MAX_SAMPLES = 480
+COMPACTION_FACTOR = 3
+
+_FLOAT64 = struct.Struct(">d")
+_UINT64 = struct.Struct(">Q")
+_MASK64 = (1 << 64) - 1
+
+# (префикс, длина префикса, бит на значение) для delta-of-delta
+_DOD_ENCODINGS = ((0b10, 2, 14), (0b110, 3, 17), (0b1110, 4, 20))
+
+
+def _float_to_bits(value: float) -> int:
+    return _UINT64.unpack(_FLOAT64.pack(value))[0]
+
+
+def _bits_to_float(bits: int) -> float:
+    return _FLOAT64.unpack(_UINT64.pack(bits))[0]
+
+
+def _to_ms(ts: datetime) -> int:
+    return int(ts.timestamp() * 1000)
+
+
+class _BitReader:
+    """Последовательное чтение битов из буфера"""
+    __slots__ = ("_value", "_remaining")
+    
+    def __init__(self, data: bytes):
+        self._value = int.from_bytes(data, "big")
+        self._remaining = len(data) * 8
+        
+    def read(self, nbits: int) -> int:
+        self._remaining -= nbits
+        return (self._value >> self._remaining) & ((1 << nbits) - 1)
+
+
+class XORChunk:
+    """Чанк временного ряда в формате Gorilla
+    
+    Timestamps (мс) кодируются delta-of-delta, значения — XOR с предыдущим
+    значением. Открытый чанк дописывает биты в bytearray, закрытый хранит bytes.
+    """
+    __slots__ = ("min_time", "max_time", "count", "max_samples",
+                 "_buf", "_acc", "_nbits", "_delta", "_value_bits",
+                 "_leading", "_trailing")
+    
+    def __init__(self, max_samples: int = CHUNK_MAX_SAMPLES):
+        self.min_time = 0
+        self.max_time = 0
+        self.count = 0
+        self.max_samples = max_samples
+        self._buf = bytearray()
+        self._acc = 0
+        self._nbits = 0
+        self._delta = 0
+        self._value_bits = 0
+        self._leading = -1
+        self._trailing = 0
+        
+    @property
+    def is_full(self) -> bool:
+        return self.count >= self.max_samples
+        
+    @property
+    def is_sealed(self) -> bool:
+        return self._acc is None
+        
+    def _write(self, value: int, nbits: int):
+        self._acc = (self._acc << nbits) | value
+        self._nbits += nbits
+        if self._nbits >= 64:
+            extra = self._nbits & 7
+            self._buf += (self._acc >> extra).to_bytes(self._nbits >> 3, "big")
+            self._acc &= (1 << extra) - 1
+            self._nbits = extra
+            
+    def append(self, t: int, value: float):
+        """Добавление сэмпла (t не меньше max_time)"""
+        bits = _float_to_bits(value)
+        
+        if self.count == 0:
+            self.min_time = t
+            self._write(t & _MASK64, 64)
+            self._write(bits, 64)
+        else:
+            delta = t - self.max_time
+            dod = delta - self._delta
+            self._delta = delta
+            
+            if dod == 0:
+                self._write(0, 1)
+            else:
+                for prefix, prefix_len, width in _DOD_ENCODINGS:
+                    bound = 1 << (width - 1)
+                    if -bound <= dod < bound:
+                        self._write(prefix, prefix_len)
+                        self._write(dod & ((1 << width) - 1), width)
+                        break
+                else:
+                    self._write(0b1111, 4)
+                    self._write(dod & _MASK64, 64)
+                    
+            xor = bits ^ self._value_bits
+            if xor == 0:
+                self._write(0, 1)
+            else:
+                leading = min(64 - xor.bit_length(), 31)
+                trailing = (xor & -xor).bit_length() - 1
+                if self._leading >= 0 and leading >= self._leading and trailing >= self._trailing:
+                    self._write(0b10, 2)
+                    self._write(xor >> self._trailing, 64 - self._leading - self._trailing)
+                else:
+                    significant = 64 - leading - trailing
+                    self._write(0b11, 2)
+                    self._write(leading, 5)
+                    self._write(significant & 63, 6)
+                    self._write(xor >> trailing, significant)
+                    self._leading = leading
+                    self._trailing = trailing
+                    
+        self._value_bits = bits
+        self.max_time = t
+        self.count += 1
+        
+    def data(self) -> bytes:
+        """Закодированные байты чанка"""
+        if self._acc is None:
+            return self._buf
+        pad = -self._nbits & 7
+        tail = (self._acc << pad).to_bytes((self._nbits + pad) >> 3, "big")
+        return bytes(self._buf) + tail
+        
+    def seal(self):
+        """Закрытие чанка: буфер становится неизменяемым bytes"""
+        if self._acc is not None:
+            self._buf = self.data()
+            self._acc = None
+            self._nbits = 0
+            
+    @property
+    def size_bytes(self) -> int:
+        return len(self._buf) + ((self._nbits + 7) >> 3 if self._acc is not None else 0)
+        
+    def last_value(self) -> float:
+        return _bits_to_float(self._value_bits)
+        
+    def __iter__(self) -> Iterator[Tuple[int, float]]:
+        count = self.count
+        if count == 0:
+            return
+        reader = _BitReader(self.data())
+        read = reader.read
+        
+        t = read(64)
+        if t >> 63:
+            t -= 1 << 64
+        bits = read(64)
+        yield t, _bits_to_float(bits)
+        
+        delta = 0
+        leading = trailing = 0
+        for _ in range(count - 1):
+            if read(1) == 0:
+                dod = 0
+            else:
+                for width in (14, 17, 20):
+                    if read(1) == 0:
+                        break
+                else:
+                    width = 64
+                dod = read(width)
+                if dod >> (width - 1):
+                    dod -= 1 << width
+            delta += dod
+            t += delta
+            
+            if read(1) == 1:
+                if read(1) == 1:
+                    leading = read(5)
+                    significant = read(6) or 64
+                    trailing = 64 - leading - significant
+                bits ^= read(64 - leading - trailing) << trailing
+                
+            yield t, _bits_to_float(bits)
+            
+    def iter_range(self, start: int, end: int) -> Iterator[Tuple[int, float]]:
+        """Декодирование сэмплов в диапазоне [start, end]"""
+        if self.count == 0 or self.max_time < start or self.min_time > end:
+            return
+        for t, value in self:
+            if t > end:
+                return
+            if t >= start:
+                yield t, value
+
+
+def recode_chunks(samples: Iterable[Tuple[int, float]],
+                  max_samples: int = BLOCK_CHUNK_MAX_SAMPLES) -> List[XORChunk]:
+    """Перекодирование потока сэмплов в полные закрытые чанки"""
+    chunks = []
+    chunk = None
+    for t, value in samples:
+        if chunk is None or chunk.is_full:
+            if chunk is not None:
+                chunk.seal()
+            chunk = XORChunk(max_samples)
+            chunks.append(chunk)
+        chunk.append(t, value)
+    if chunk is not None:
+        chunk.seal()
+    return chunks
+
+
 @dataclass
 class MetricDescriptor:
     """Дескриптор метрики"""
@@ -130,9 +350,12 @@ class TimeSeries:
     
     # Fingerprint (unique identifier)
     fingerprint: str = ""
+    series_ref: int = 0
     
-    # Samples
-    samples: List[Tuple[datetime, float]] = field(default_factory=list)
+    # Head chunks (ещё не перенесённые в блоки)
+    head_chunks: List[XORChunk] = field(default_factory=list)
+    head_chunk: Optional[XORChunk] = None
+    last_value: float = 0.0
     
     # Stats
     sample_count: int = 0
@@ -334,6 +557,9 @@ class QueryResult:
     # Stats
     series_count: int = 0
     sample_count: int = 0
+    
+    # Error (result_type == "error")
+    error: str = ""
 
 
 @dataclass
@@ -409,6 +635,10 @@ class StorageBlock:
     
     # Compaction
     compaction_level: int = 0
+    window_start_ms: int = 0
+    
+    # Chunks by series_id
+    series_chunks: Dict[str, List[XORChunk]] = field(default_factory=dict)
 
 
 @dataclass
@@ -464,23 +694,694 @@ class MetricsPlatformMetrics:
     collected_at: datetime = field(default_factory=datetime.now)
 
 
+LOOKBACK_DELTA_MS = 5 * 60 * 1000
+MAX_QUERY_POINTS = 11000
+QUERY_CACHE_SIZE = 1024
+
+_DURATION_UNITS_MS = {"ms": 1, "s": 1000, "m": 60000, "h": 3600000, "d": 86400000, "w": 604800000, "y": 31536000000}
+_DURATION_RE = re.compile(r"(\d+)(ms|[smhdwy])")
+_PROMQL_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<duration>(?:\d+(?:ms|[smhdwy]))+(?![\w.]))
+  | (?P<number>(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<ident>[a-zA-Z_:][a-zA-Z0-9_:]*)
+  | (?P<op>=~|!~|!=|==|>=|<=|[-+*/%<>=(){}\[\],])
+""", re.VERBOSE)
+
+AGGREGATION_OPS = {AggregationType.SUM, AggregationType.AVG, AggregationType.MIN,
+                   AggregationType.MAX, AggregationType.COUNT}
+RANGE_FUNCTIONS = {"rate", "irate", "increase"}
+COMPARISON_OPS = {"==", "!=", ">", "<", ">=", "<="}
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+class PromQLError(ValueError):
+    """Ошибка разбора или выполнения запроса"""
+
+
+def parse_duration_ms(value: str) -> int:
+    """Разбор длительности PromQL (15s, 5m, 1h30m) в миллисекунды"""
+    parts = _DURATION_RE.findall(value)
+    if not parts or "".join(n + u for n, u in parts) != value:
+        raise PromQLError(f"invalid duration: {value!r}")
+    return sum(int(n) * _DURATION_UNITS_MS[u] for n, u in parts)
+
+
+@dataclass
+class LabelMatcher:
+    """Матчер метки: =, !=, =~, !~"""
+    name: str
+    op: str
+    value: str
+    regex: Optional["re.Pattern"] = None
+    
+    def __post_init__(self):
+        if self.op in ("=~", "!~"):
+            try:
+                self.regex = re.compile(self.value)
+            except re.error as e:
+                raise PromQLError(f"invalid regex {self.value!r}: {e}")
+                
+    def matches(self, value: str) -> bool:
+        if self.op == "=":
+            return value == self.value
+        if self.op == "!=":
+            return value != self.value
+        matched = self.regex.fullmatch(value) is not None
+        return matched if self.op == "=~" else not matched
+
+
+@dataclass
+class NumberLiteral:
+    value: float
+
+
+@dataclass
+class VectorSelector:
+    metric_name: str = ""
+    matchers: List[LabelMatcher] = field(default_factory=list)
+    range_ms: int = 0  # > 0 для range-вектора metric[5m]
+
+
+@dataclass
+class FunctionCall:
+    name: str
+    args: List[Any] = field(default_factory=list)
+
+
+@dataclass
+class AggregateExpr:
+    op: AggregationType
+    expr: Any = None
+    grouping: List[str] = field(default_factory=list)
+    without: bool = False
+
+
+@dataclass
+class BinaryExpr:
+    op: str
+    lhs: Any = None
+    rhs: Any = None
+
+
+class PromQLParser:
+    """Парсер подмножества PromQL
+    
+    Поддерживает селекторы metric{a="x",b=~"re"}[5m], rate/irate/increase,
+    histogram_quantile, sum/avg/min/max/count с by/without, арифметику
+    и сравнения между векторами и скалярами.
+    """
+    
+    def __init__(self, expr: str):
+        self.tokens: List[Tuple[str, str]] = []
+        pos = 0
+        while pos < len(expr):
+            match = _PROMQL_TOKEN_RE.match(expr, pos)
+            if not match:
+                raise PromQLError(f"unexpected character {expr[pos]!r} at {pos}")
+            pos = match.end()
+            if match.lastgroup != "ws":
+                self.tokens.append((match.lastgroup, match.group()))
+        self.pos = 0
+        
+    def _peek(self, offset: int = 0) -> Tuple[str, str]:
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else ("eof", "")
+        
+    def _next(self) -> Tuple[str, str]:
+        token = self._peek()
+        self.pos += 1
+        return token
+        
+    def _expect(self, value: str) -> None:
+        kind, text = self._next()
+        if text != value:
+            raise PromQLError(f"expected {value!r}, got {text or kind!r}")
+            
+    def parse(self) -> Any:
+        if [text for _, text in self.tokens] == ["*"]:
+            return VectorSelector()  # все ряды
+        node = self._parse_binary(0)
+        if self._peek()[0] != "eof":
+            raise PromQLError(f"unexpected token {self._peek()[1]!r}")
+        return node
+        
+    _PRECEDENCE = [COMPARISON_OPS, {"+", "-"}, {"*", "/", "%"}]
+    
+    def _parse_binary(self, level: int) -> Any:
+        if level == len(self._PRECEDENCE):
+            return self._parse_unary()
+        node = self._parse_binary(level + 1)
+        while self._peek()[0] == "op" and self._peek()[1] in self._PRECEDENCE[level]:
+            op = self._next()[1]
+            if self._peek()[1] == "bool":
+                self._next()
+            node = BinaryExpr(op, node, self._parse_binary(level + 1))
+        return node
+        
+    def _parse_unary(self) -> Any:
+        if self._peek()[1] == "-":
+            self._next()
+            operand = self._parse_unary()
+            if isinstance(operand, NumberLiteral):
+                return NumberLiteral(-operand.value)
+            return BinaryExpr("*", NumberLiteral(-1.0), operand)
+        if self._peek()[1] == "+":
+            self._next()
+        return self._parse_primary()
+        
+    def _parse_grouping(self) -> List[str]:
+        self._expect("(")
+        labels = []
+        while self._peek()[1] != ")":
+            kind, text = self._next()
+            if kind != "ident":
+                raise PromQLError(f"expected label name, got {text!r}")
+            labels.append(text)
+            if self._peek()[1] == ",":
+                self._next()
+        self._expect(")")
+        return labels
+        
+    def _parse_primary(self) -> Any:
+        kind, text = self._peek()
+        
+        if kind == "number":
+            self._next()
+            return NumberLiteral(float(text))
+            
+        if text == "(":
+            self._next()
+            node = self._parse_binary(0)
+            self._expect(")")
+            return node
+            
+        if text == "{":
+            return self._parse_selector("")
+            
+        if kind != "ident":
+            raise PromQLError(f"unexpected token {text or kind!r}")
+        self._next()
+        
+        aggregation = next((a for a in AGGREGATION_OPS if a.value == text), None)
+        if aggregation and self._peek()[1] in ("(", "by", "without"):
+            node = AggregateExpr(aggregation)
+            if self._peek()[1] in ("by", "without"):
+                node.without = self._next()[1] == "without"
+                node.grouping = self._parse_grouping()
+            self._expect("(")
+            node.expr = self._parse_binary(0)
+            self._expect(")")
+            if self._peek()[1] in ("by", "without"):
+                node.without = self._next()[1] == "without"
+                node.grouping = self._parse_grouping()
+            return node
+            
+        if self._peek()[1] == "(":
+            if text not in RANGE_FUNCTIONS and text != AggregationType.HISTOGRAM_QUANTILE.value:
+                raise PromQLError(f"unknown function {text!r}")
+            self._next()
+            args = []
+            while self._peek()[1] != ")":
+                args.append(self._parse_binary(0))
+                if self._peek()[1] == ",":
+                    self._next()
+            self._expect(")")
+            return self._check_function(FunctionCall(text, args))
+            
+        return self._parse_selector(text)
+        
+    @staticmethod
+    def _check_function(node: FunctionCall) -> FunctionCall:
+        if node.name in RANGE_FUNCTIONS:
+            if len(node.args) != 1 or not isinstance(node.args[0], VectorSelector) or not node.args[0].range_ms:
+                raise PromQLError(f"{node.name}() expects a range vector")
+        elif len(node.args) != 2 or not isinstance(node.args[0], NumberLiteral):
+            raise PromQLError("histogram_quantile() expects (scalar, vector)")
+        return node
+        
+    def _parse_selector(self, metric_name: str) -> VectorSelector:
+        node = VectorSelector(metric_name=metric_name)
+        
+        if self._peek()[1] == "{":
+            self._next()
+            while self._peek()[1] != "}":
+                kind, name = self._next()
+                if kind != "ident":
+                    raise PromQLError(f"expected label name, got {name!r}")
+                op_kind, op = self._next()
+                if op not in ("=", "!=", "=~", "!~"):
+                    raise PromQLError(f"unexpected matcher operator {op!r}")
+                kind, value = self._next()
+                if kind != "string":
+                    raise PromQLError(f"expected string, got {value!r}")
+                value = re.sub(r"\\(.)", lambda m: {"n": "\n", "t": "\t"}.get(m.group(1), m.group(1)), value[1:-1])
+                if name == "__name__" and op == "=":
+                    node.metric_name = value
+                else:
+                    node.matchers.append(LabelMatcher(name, op, value))
+                if self._peek()[1] == ",":
+                    self._next()
+            self._expect("}")
+            
+        if not node.metric_name and all(m.matches("") for m in node.matchers):
+            raise PromQLError("vector selector must contain at least one non-empty matcher")
+            
+        if self._peek()[1] == "[":
+            self._next()
+            kind, text = self._next()
+            if kind != "duration":
+                raise PromQLError(f"expected duration, got {text!r}")
+            node.range_ms = parse_duration_ms(text)
+            self._expect("]")
+            
+        return node
+
+
+def _intersect_postings(lists: List[List[int]]) -> List[int]:
+    """Пересечение отсортированных posting-листов, начиная с самого короткого"""
+    lists = sorted(lists, key=len)
+    result = lists[0]
+    for other in lists[1:]:
+        if not result:
+            break
+        matched = []
+        lo = 0
+        n = len(other)
+        for ref in result:
+            lo = bisect.bisect_left(other, ref, lo)
+            if lo == n:
+                break
+            if other[lo] == ref:
+                matched.append(ref)
+        result = matched
+    return result
+
+
+class LabelIndex:
+    """Инвертированный индекс (метка, значение) -> отсортированные series_ref
+    
+    series_ref выдаются монотонно, поэтому posting-листы остаются отсортированными
+    при append. Счётчики кардинальности обновляются инкрементально при добавлении
+    и удалении ряда; top-k значений пересчитывается только для изменившихся меток.
+    """
+    
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, List[int]]] = {}
+        self.series_by_label: Dict[str, int] = {}
+        self.series_by_metric: Dict[str, int] = {}
+        self.total_series = 0
+        self.next_ref = 0
+        self.deleted_refs: Set[int] = set()
+        self.version = 0
+        self._regex_cache: Dict[Tuple[str, str], Tuple[int, List[str]]] = {}
+        self._top_values: Dict[str, List[Tuple[str, int]]] = {}
+        self._dirty_labels: Set[str] = set()
+        
+    def add(self, ref: int, metric_name: str, labels: Dict[str, str]):
+        """Индексация нового ряда"""
+        self.postings.setdefault("__name__", {}).setdefault(metric_name, []).append(ref)
+        self.series_by_metric[metric_name] = self.series_by_metric.get(metric_name, 0) + 1
+        for name, value in labels.items():
+            self.postings.setdefault(name, {}).setdefault(value, []).append(ref)
+            self.series_by_label[name] = self.series_by_label.get(name, 0) + 1
+            self._dirty_labels.add(name)
+        self.total_series += 1
+        self.next_ref = max(self.next_ref, ref + 1)
+        self.version += 1
+        
+    def remove(self, ref: int, metric_name: str, labels: Dict[str, str]):
+        """Удаление ряда из posting-листов и счётчиков"""
+        self._discard(ref, "__name__", metric_name)
+        self.series_by_metric[metric_name] -= 1
+        if not self.series_by_metric[metric_name]:
+            del self.series_by_metric[metric_name]
+        for name, value in labels.items():
+            self._discard(ref, name, value)
+            self.series_by_label[name] -= 1
+            if not self.series_by_label[name]:
+                del self.series_by_label[name]
+            self._dirty_labels.add(name)
+        self.deleted_refs.add(ref)
+        self.total_series -= 1
+        self.version += 1
+        
+    def _discard(self, ref: int, name: str, value: str):
+        values = self.postings[name]
+        refs = values[value]
+        del refs[bisect.bisect_left(refs, ref)]
+        if not refs:
+            del values[value]
+            if not values:
+                del self.postings[name]
+                
+    def top_label_values(self, k: int = 10) -> Dict[str, List[Tuple[str, int]]]:
+        """Top-k значений по меткам; пересчёт только для меток, изменившихся с прошлого вызова"""
+        for name in self._dirty_labels:
+            values = self.postings.get(name)
+            if values:
+                self._top_values[name] = heapq.nlargest(
+                    k, ((value, len(refs)) for value, refs in values.items()), key=lambda x: x[1]
+                )
+            else:
+                self._top_values.pop(name, None)
+        self._dirty_labels.clear()
+        return dict(self._top_values)
+        
+    def _matching_values(self, matcher: LabelMatcher) -> List[str]:
+        values = self.postings.get(matcher.name, {})
+        key = (matcher.name, matcher.value)
+        cached = self._regex_cache.get(key)
+        if cached and cached[0] == len(values):
+            return cached[1]
+        matched = [v for v in values if matcher.regex.fullmatch(v)]
+        if len(self._regex_cache) >= QUERY_CACHE_SIZE:
+            self._regex_cache.clear()
+        self._regex_cache[key] = (len(values), matched)
+        return matched
+        
+    def select(self, metric_name: str, matchers: List[LabelMatcher],
+               label_lookup) -> List[int]:
+        """Планирование селектора как пересечения posting-листов"""
+        lists = []
+        filters = []
+        
+        if metric_name:
+            lists.append(self.postings.get("__name__", {}).get(metric_name, []))
+            
+        for matcher in matchers:
+            values = self.postings.get(matcher.name, {})
+            if matcher.op == "=" and matcher.value:
+                lists.append(values.get(matcher.value, []))
+            elif matcher.op == "=~" and not matcher.regex.fullmatch(""):
+                lists.append(list(heapq.merge(*(values[v] for v in self._matching_values(matcher)))))
+            else:
+                filters.append(matcher)
+                
+        if lists:
+            refs = _intersect_postings(lists)
+        else:
+            refs = (ref for ref in range(self.next_ref) if ref not in self.deleted_refs)
+            
+        if not filters:
+            return list(refs)
+        return [
+            ref for ref in refs
+            if all(m.matches(label_lookup(ref).get(m.name, "")) for m in filters)
+        ]
+
+
+def _apply_op(op: str, lhs: float, rhs: float) -> Optional[float]:
+    if op == "+":
+        return lhs + rhs
+    if op == "-":
+        return lhs - rhs
+    if op == "*":
+        return lhs * rhs
+    if op in ("/", "%"):
+        if rhs == 0:
+            if op == "%" or lhs == 0:
+                return math.nan
+            return math.copysign(math.inf, lhs)
+        return lhs / rhs if op == "/" else math.fmod(lhs, rhs)
+    raise PromQLError(f"unsupported operator {op!r}")
+
+
+def _compare(op: str, lhs: float, rhs: float) -> bool:
+    if op == "==":
+        return lhs == rhs
+    if op == "!=":
+        return lhs != rhs
+    if op == ">":
+        return lhs > rhs
+    if op == "<":
+        return lhs < rhs
+    if op == ">=":
+        return lhs >= rhs
+    return lhs <= rhs
+
+
+def _drop_name(labels: LabelSet) -> LabelSet:
+    return tuple(item for item in labels if item[0] != "__name__")
+
+
+def _bucket_quantile(q: float, buckets: List[Tuple[float, float]]) -> Optional[float]:
+    """Квантиль по кумулятивным бакетам (le, count), как в Prometheus"""
+    if not buckets or buckets[-1][0] != math.inf:
+        return None
+    if q < 0:
+        return -math.inf
+    if q > 1:
+        return math.inf
+    total = buckets[-1][1]
+    if total == 0:
+        return None
+    rank = q * total
+    index = next(i for i, (_, count) in enumerate(buckets) if count >= rank)
+    if index == len(buckets) - 1:
+        return buckets[-2][0] if len(buckets) > 1 else None
+    upper, count = buckets[index]
+    lower, prev_count = (0.0, 0.0) if index == 0 else buckets[index - 1]
+    if index == 0 and upper <= 0:
+        return upper
+    bucket_count = count - prev_count
+    if bucket_count == 0:
+        return upper
+    return lower + (upper - lower) * ((rank - prev_count) / bucket_count)
+
+
+class PromQLEvaluator:
+    """Пошаговое (step-aligned) вычисление выражений над чанками рядов
+    
+    Каждый узел возвращает скаляр или вектор {labels: [значение на шаге | None]},
+    так что каждый ряд декодируется один раз на весь диапазон.
+    """
+    
+    def __init__(self, platform: "MetricsPlatform", steps: List[int]):
+        self.platform = platform
+        self.steps = steps
+        self.samples_processed = 0
+        
+    def evaluate(self, node: Any) -> Any:
+        if isinstance(node, NumberLiteral):
+            return node.value
+        if isinstance(node, VectorSelector):
+            if node.range_ms:
+                raise PromQLError("range vector must be wrapped in a function")
+            return self._eval_selector(node)
+        if isinstance(node, FunctionCall):
+            if node.name in RANGE_FUNCTIONS:
+                return self._eval_range_function(node.name, node.args[0])
+            return self._eval_histogram_quantile(node.args[0].value, self.evaluate(node.args[1]))
+        if isinstance(node, AggregateExpr):
+            return self._eval_aggregate(node)
+        if isinstance(node, BinaryExpr):
+            return self._eval_binary(node)
+        raise PromQLError(f"unsupported expression {node!r}")
+        
+    def _load(self, node: VectorSelector, window_ms: int) -> Iterator[Tuple[LabelSet, List[int], List[float]]]:
+        platform = self.platform
+        start = self.steps[0] - window_ms
+        end = self.steps[-1]
+        start_time = datetime.fromtimestamp(start / 1000)
+        end_time = datetime.fromtimestamp(end / 1000)
+        
+        refs = platform.label_index.select(
+            node.metric_name, node.matchers,
+            lambda ref: {"__name__": platform.series_refs[ref].metric_name, **platform.series_refs[ref].labels}
+        )
+        for ref in refs:
+            series = platform.series_refs[ref]
+            if not series.sample_count or series.last_timestamp < start_time or series.first_timestamp > end_time:
+                continue
+            times = []
+            values = []
+            for t, value in platform._iter_samples_ms(series, start, end):
+                times.append(t)
+                values.append(value)
+            if times:
+                self.samples_processed += len(times)
+                labels = (("__name__", series.metric_name),) + tuple(sorted(series.labels.items()))
+                yield labels, times, values
+                
+    def _eval_selector(self, node: VectorSelector) -> Dict[LabelSet, List[Optional[float]]]:
+        result = {}
+        for labels, times, values in self._load(node, LOOKBACK_DELTA_MS):
+            points = []
+            for step in self.steps:
+                i = bisect.bisect_right(times, step) - 1
+                points.append(values[i] if i >= 0 and times[i] > step - LOOKBACK_DELTA_MS else None)
+            result[labels] = points
+        return result
+        
+    def _eval_range_function(self, name: str,
+                             node: VectorSelector) -> Dict[LabelSet, List[Optional[float]]]:
+        result = {}
+        range_ms = node.range_ms
+        
+        for labels, times, values in self._load(node, range_ms):
+            # Кумулятивные значения с учётом сбросов счётчика
+            adjusted = []
+            correction = 0.0
+            previous = values[0]
+            for value in values:
+                if value < previous:
+                    correction += previous
+                adjusted.append(value + correction)
+                previous = value
+                
+            points = []
+            for step in self.steps:
+                first = bisect.bisect_right(times, step - range_ms)
+                last = bisect.bisect_right(times, step) - 1
+                if last - first < 1:
+                    points.append(None)
+                    continue
+                if name == "irate":
+                    first = last - 1
+                increase = adjusted[last] - adjusted[first]
+                if name == "increase":
+                    points.append(increase)
+                elif times[last] == times[first]:
+                    points.append(None)
+                else:
+                    points.append(increase / ((times[last] - times[first]) / 1000))
+            result[_drop_name(labels)] = points
+            
+        return result
+        
+    def _eval_histogram_quantile(self, q: float, vector: Any) -> Dict[LabelSet, List[Optional[float]]]:
+        if not isinstance(vector, dict):
+            raise PromQLError("histogram_quantile() expects a vector")
+            
+        groups: Dict[LabelSet, List[Tuple[float, List[Optional[float]]]]] = {}
+        for labels, points in vector.items():
+            le = dict(labels).get("le")
+            if le is None:
+                continue
+            key = tuple(item for item in _drop_name(labels) if item[0] != "le")
+            groups.setdefault(key, []).append((float(le), points))
+            
+        result = {}
+        for key, buckets in groups.items():
+            buckets.sort(key=lambda b: b[0])
+            points = []
+            for i in range(len(self.steps)):
+                step_buckets = [(le, pts[i]) for le, pts in buckets if pts[i] is not None]
+                points.append(_bucket_quantile(q, step_buckets))
+            result[key] = points
+        return result
+        
+    def _eval_aggregate(self, node: AggregateExpr) -> Dict[LabelSet, List[Optional[float]]]:
+        vector = self.evaluate(node.expr)
+        if not isinstance(vector, dict):
+            raise PromQLError(f"{node.op.value}() expects a vector")
+            
+        grouping = set(node.grouping)
+        groups: Dict[LabelSet, List[List[float]]] = {}
+        for labels, points in vector.items():
+            if node.without:
+                key = tuple(item for item in _drop_name(labels) if item[0] not in grouping)
+            else:
+                key = tuple(item for item in labels if item[0] in grouping)
+            columns = groups.get(key)
+            if columns is None:
+                columns = groups[key] = [[] for _ in self.steps]
+            for column, value in zip(columns, points):
+                if value is not None:
+                    column.append(value)
+                    
+        op = node.op
+        result = {}
+        for key, columns in groups.items():
+            points = []
+            for column in columns:
+                if not column:
+                    points.append(None)
+                elif op == AggregationType.SUM:
+                    points.append(sum(column))
+                elif op == AggregationType.AVG:
+                    points.append(sum(column) / len(column))
+                elif op == AggregationType.MIN:
+                    points.append(min(column))
+                elif op == AggregationType.MAX:
+                    points.append(max(column))
+                else:
+                    points.append(float(len(column)))
+            result[key] = points
+        return result
+        
+    def _eval_binary(self, node: BinaryExpr) -> Any:
+        lhs = self.evaluate(node.lhs)
+        rhs = self.evaluate(node.rhs)
+        op = node.op
+        comparison = op in COMPARISON_OPS
+        
+        if not isinstance(lhs, dict) and not isinstance(rhs, dict):
+            if comparison:
+                return 1.0 if _compare(op, lhs, rhs) else 0.0
+            return _apply_op(op, lhs, rhs)
+            
+        def combine(a: Optional[float], b: Optional[float], keep: Optional[float]) -> Optional[float]:
+            if a is None or b is None:
+                return None
+            if comparison:
+                return keep if _compare(op, a, b) else None
+            return _apply_op(op, a, b)
+            
+        result = {}
+        if isinstance(lhs, dict) and isinstance(rhs, dict):
+            right = {_drop_name(labels): points for labels, points in rhs.items()}
+            for labels, points in lhs.items():
+                key = _drop_name(labels)
+                other = right.get(key)
+                if other is None:
+                    continue
+                result[labels if comparison else key] = [combine(a, b, a) for a, b in zip(points, other)]
+        elif isinstance(lhs, dict):
+            for labels, points in lhs.items():
+                result[labels if comparison else _drop_name(labels)] = [combine(a, rhs, a) for a in points]
+        else:
+            for labels, points in rhs.items():
+                result[labels if comparison else _drop_name(labels)] = [combine(lhs, b, b) for b in points]
+                
+        return {labels: points for labels, points in result.items() if any(p is not None for p in points)}
+
+
 class MetricsPlatform:
     """Платформа метрик"""
     
-    def __init__(self, platform_name: str = "metrics"):
+    def __init__(self, platform_name: str = "metrics",
+                 block_duration: timedelta = timedelta(hours=2),
+                 retention: timedelta = timedelta(days=15)):
         self.platform_name = platform_name
+        self.block_duration_ms = int(block_duration.total_seconds() * 1000)
+        self.retention = retention
         self.descriptors: Dict[str, MetricDescriptor] = {}
-        self.samples: Dict[str, MetricSample] = {}
         self.time_series: Dict[str, TimeSeries] = {}
+        self.series_by_key: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], TimeSeries] = {}
+        self.series_by_id: Dict[str, TimeSeries] = {}
+        self.series_refs: List[TimeSeries] = []
+        self.label_index = LabelIndex()
+        self.query_cache: Dict[str, Any] = {}
         self.targets: Dict[str, ScrapeTarget] = {}
         self.scrape_jobs: Dict[str, ScrapeJob] = {}
         self.recording_rules: Dict[str, RecordingRule] = {}
         self.alert_rules: Dict[str, AlertRule] = {}
         self.alerts: Dict[str, Alert] = {}
+        self.active_alerts: Dict[Tuple[str, LabelSet], Alert] = {}
         self.queries: Dict[str, Query] = {}
         self.dashboards: Dict[str, Dashboard] = {}
         self.panels: Dict[str, Panel] = {}
         self.storage_blocks: Dict[str, StorageBlock] = {}
+        self.block_windows: Dict[Tuple[int, int], StorageBlock] = {}
+        self.sorted_blocks: List[StorageBlock] = []
+        
+        # Stats
+        self.total_samples = 0
+        self.out_of_order_samples = 0
         
     async def register_metric(self, name: str,
                              metric_type: MetricType,
@@ -504,47 +1405,93 @@ class MetricsPlatform:
         self.descriptors[descriptor.descriptor_id] = descriptor
         return descriptor
         
-    async def record_sample(self, metric_name: str,
-                           value: float,
-                           labels: Dict[str, str] = None,
-                           timestamp: Optional[datetime] = None) -> MetricSample:
-        """Запись сэмпла"""
-        sample = MetricSample(
-            sample_id=f"smp_{uuid.uuid4().hex[:12]}",
-            metric_name=metric_name,
-            value=value,
-            labels=labels or {},
-            timestamp=timestamp or datetime.now()
-        )
-        
-        self.samples[sample.sample_id] = sample
-        
-        # Update time series
-        fingerprint = f"{metric_name}_{json.dumps(labels or {}, sort_keys=True)}"
-        
-        if fingerprint not in self.time_series:
-            self.time_series[fingerprint] = TimeSeries(
+    def _get_or_create_series(self, metric_name: str,
+                              labels: Optional[Dict[str, str]]) -> TimeSeries:
+        key = (metric_name, tuple(sorted(labels.items())) if labels else ())
+        series = self.series_by_key.get(key)
+        if series is None:
+            fingerprint = f"{metric_name}_{json.dumps(labels or {}, sort_keys=True)}"
+            series = TimeSeries(
                 series_id=f"ts_{uuid.uuid4().hex[:8]}",
                 metric_name=metric_name,
-                labels=labels or {},
-                fingerprint=fingerprint
+                labels=dict(labels or {}),
+                fingerprint=fingerprint,
+                series_ref=len(self.series_refs)
             )
+            self.series_refs.append(series)
+            self.label_index.add(series.series_ref, metric_name, series.labels)
+            self.time_series[fingerprint] = series
+            self.series_by_key[key] = series
+            self.series_by_id[series.series_id] = series
+        return series
+        
+    def delete_series(self, series_id: str) -> bool:
+        """Удаление ряда: head-чанки освобождаются, чанки в блоках становятся недостижимы"""
+        series = self.series_by_id.pop(series_id, None)
+        if series is None:
+            return False
+        del self.series_by_key[(series.metric_name, tuple(sorted(series.labels.items())))]
+        del self.time_series[series.fingerprint]
+        self.label_index.remove(series.series_ref, series.metric_name, series.labels)
+        self.total_samples -= series.sample_count
+        return True
+        
+    async def record_sample(self, metric_name: str,
+                           value: float,
+                           labels: Dict[str, str] = None,
+                           timestamp: Optional[datetime] = None) -> Optional[TimeSeries]:
+        """Запись сэмпла в head-чанк ряда"""
+        series = self._get_or_create_series(metric_name, labels)
+        timestamp = timestamp or datetime.now()
+        
+        t = _to_ms(timestamp)
+        # Как в Prometheus: сэмпл с тем же или более ранним временем (в мс) отклоняется
+        if series.last_timestamp and t <= _to_ms(series.last_timestamp):
+            self.out_of_order_samples += 1
+            return None
             
-        series = self.time_series[fingerprint]
-        series.samples.append((sample.timestamp, value))
+        chunk = series.head_chunk
+        if chunk is None or chunk.is_full or \
+                t // self.block_duration_ms != chunk.min_time // self.block_duration_ms:
+            # Чанк не пересекает границу блока
+            if chunk is not None:
+                chunk.seal()
+                series.head_chunks.append(chunk)
+            chunk = series.head_chunk = XORChunk()
+        chunk.append(t, value)
+        
+        series.last_value = value
         series.sample_count += 1
+        self.total_samples += 1
+        
+        if not series.first_timestamp:
+            series.first_timestamp = timestamp
+        series.last_timestamp = timestamp
+        
+        return series
+        
+    def iter_samples(self, series: TimeSeries,
+                     start_time: Optional[datetime] = None,
+                     end_time: Optional[datetime] = None) -> Iterator[Tuple[int, float]]:
+        """Декодирование сэмплов ряда (мс, значение) из блоков и head-чанков"""
+        return self._iter_samples_ms(
+            series,
+            _to_ms(start_time) if start_time else -_MASK64,
+            _to_ms(end_time) if end_time else _MASK64
+        )
         
-        if not series.first_timestamp or sample.timestamp < series.first_timestamp:
-            series.first_timestamp = sample.timestamp
-        if not series.last_timestamp or sample.timestamp > series.last_timestamp:
-            series.last_timestamp = sample.timestamp
-            
-        # Keep last 10000 samples per series
-        if len(series.samples) > 10000:
-            series.samples = series.samples[-10000:]
+    def _iter_samples_ms(self, series: TimeSeries, start: int, end: int) -> Iterator[Tuple[int, float]]:
+        for block in self.sorted_blocks:
+            if block.window_start_ms > end:
+                break
+            for chunk in block.series_chunks.get(series.series_id, ()):
+                yield from chunk.iter_range(start, end)
+                
+        for chunk in series.head_chunks:
+            yield from chunk.iter_range(start, end)
+        if series.head_chunk is not None:
+            yield from series.head_chunk.iter_range(start, end)
             
-        return sample
-        
     async def create_scrape_job(self, name: str,
                                static_targets: List[str],
                                scrape_interval: str = "15s",
@@ -643,16 +1590,24 @@ class MetricsPlatform:
             
         start_time = datetime.now()
         
-        # Simulate rule evaluation
-        await asyncio.sleep(0.001)
-        
-        # Record result as new metric
-        value = random.uniform(0, 100)
-        await self.record_sample(rule.name, value, rule.labels)
-        
+        try:
+            value, _ = self._evaluate(rule.expr, [_to_ms(start_time)])
+        except PromQLError:
+            value = {}
+            
+        if isinstance(value, dict):
+            produced = 0
+            for labels, points in value.items():
+                if points[0] is not None:
+                    await self.record_sample(rule.name, points[0], {**dict(_drop_name(labels)), **rule.labels}, start_time)
+                    produced += 1
+        else:
+            await self.record_sample(rule.name, value, rule.labels, start_time)
+            produced = 1
+            
         rule.last_evaluation = datetime.now()
         rule.evaluation_duration_ms = (datetime.now() - start_time).total_seconds() * 1000
-        rule.samples_produced += 1
+        rule.samples_produced += produced
         
         return rule
         
@@ -681,36 +1636,63 @@ class MetricsPlatform:
         return rule
         
     async def evaluate_alert_rule(self, rule_id: str) -> List[Alert]:
-        """Оценка правила алерта"""
+        """Оценка правила алерта: pending -> firing после for_duration"""
         rule = self.alert_rules.get(rule_id)
         if not rule or not rule.is_enabled:
             return []
             
+        now = datetime.now()
+        try:
+            value, _ = self._evaluate(rule.expr, [_to_ms(now)])
+            for_duration = timedelta(milliseconds=parse_duration_ms(rule.for_duration)) if rule.for_duration else timedelta(0)
+        except PromQLError:
+            rule.last_evaluation = now
+            return []
+            
+        if isinstance(value, dict):
+            elements = {labels: points[0] for labels, points in value.items() if points[0] is not None}
+        else:
+            elements = {(): value} if value else {}
+            
+        rule_alerts = self.active_alerts.setdefault(rule_id, {})
         new_alerts = []
         
-        # Simulate alert evaluation
-        if random.random() < 0.15:  # 15% chance of alert
-            alert = Alert(
-                alert_id=f"alt_{uuid.uuid4().hex[:8]}",
-                rule_id=rule_id,
-                name=rule.name,
-                labels={**rule.labels, "alertname": rule.name},
-                summary=rule.summary,
-                description=rule.description,
-                state=AlertState.FIRING,
-                severity=rule.severity,
-                value=random.uniform(80, 100),
-                fired_at=datetime.now()
-            )
-            
-            self.alerts[alert.alert_id] = alert
-            new_alerts.append(alert)
+        for labels, sample_value in elements.items():
+            alert = rule_alerts.get(labels)
+            if alert is None:
+                alert = Alert(
+                    alert_id=f"alt_{uuid.uuid4().hex[:8]}",
+                    rule_id=rule_id,
+                    name=rule.name,
+                    labels={**dict(_drop_name(labels)), **rule.labels, "alertname": rule.name},
+                    summary=rule.summary,
+                    description=rule.description,
+                    state=AlertState.PENDING,
+                    severity=rule.severity,
+                    active_at=now
+                )
+                self.alerts[alert.alert_id] = alert
+                rule_alerts[labels] = alert
+                
+            alert.value = sample_value
+            if alert.state == AlertState.PENDING and now - alert.active_at >= for_duration:
+                alert.state = AlertState.FIRING
+                alert.fired_at = now
+                new_alerts.append(alert)
+                
+        for labels in [labels for labels in rule_alerts if labels not in elements]:
+            alert = rule_alerts.pop(labels)
+            alert.state = AlertState.RESOLVED
+            alert.resolved_at = now
             
+        if any(a.state == AlertState.FIRING for a in rule_alerts.values()):
             rule.state = AlertState.FIRING
+        elif rule_alerts:
+            rule.state = AlertState.PENDING
         else:
             rule.state = AlertState.INACTIVE
             
-        rule.last_evaluation = datetime.now()
+        rule.last_evaluation = now
         return new_alerts
         
     async def resolve_alert(self, alert_id: str) -> Optional[Alert]:
@@ -722,43 +1704,68 @@ class MetricsPlatform:
         alert.state = AlertState.RESOLVED
         alert.resolved_at = datetime.now()
         
+        rule_alerts = self.active_alerts.get(alert.rule_id, {})
+        for labels in [labels for labels, a in rule_alerts.items() if a is alert]:
+            del rule_alerts[labels]
+            
         return alert
         
-    async def query_instant(self, expr: str) -> QueryResult:
-        """Мгновенный запрос"""
-        query = Query(
-            query_id=f"qry_{uuid.uuid4().hex[:8]}",
-            expr=expr,
-            start_time=datetime.now(),
-            end_time=datetime.now()
-        )
-        
-        # Simulate query execution
-        await asyncio.sleep(0.001)
-        
-        # Find matching series
-        results = []
-        for series in self.time_series.values():
-            if expr in series.metric_name or expr == "*":
-                if series.samples:
-                    latest = series.samples[-1]
-                    results.append({
-                        "metric": {"__name__": series.metric_name, **series.labels},
-                        "value": [latest[0].timestamp(), latest[1]]
-                    })
-                    
-        query.duration_ms = random.uniform(1, 50)
-        query.samples_processed = sum(s.sample_count for s in self.time_series.values())
+    def _parse_query(self, expr: str) -> Any:
+        """Разбор выражения с кэшем планов (дашборды повторяют одни и те же запросы)"""
+        node = self.query_cache.get(expr)
+        if node is None:
+            node = PromQLParser(expr).parse()
+            if len(self.query_cache) >= QUERY_CACHE_SIZE:
+                self.query_cache.clear()
+            self.query_cache[expr] = node
+        return node
+        
+    def _evaluate(self, expr: str, steps: List[int]) -> Tuple[Any, int]:
+        evaluator = PromQLEvaluator(self, steps)
+        value = evaluator.evaluate(self._parse_query(expr))
+        return value, evaluator.samples_processed
+        
+    def _finish_query(self, query: Query, started: float,
+                      result_type: str, data: List[Dict[str, Any]],
+                      error: str = "") -> QueryResult:
+        query.duration_ms = (time.perf_counter() - started) * 1000
         self.queries[query.query_id] = query
         
         return QueryResult(
             result_id=f"res_{uuid.uuid4().hex[:8]}",
             query_id=query.query_id,
-            result_type="vector",
-            data=results[:100],
-            series_count=len(results),
-            sample_count=len(results)
+            result_type=result_type,
+            data=data,
+            series_count=len(data),
+            sample_count=sum(len(r.get("values", [r.get("value")])) for r in data),
+            error=error
+        )
+        
+    async def query_instant(self, expr: str, at: Optional[datetime] = None) -> QueryResult:
+        """Мгновенный запрос"""
+        at = at or datetime.now()
+        query = Query(
+            query_id=f"qry_{uuid.uuid4().hex[:8]}",
+            expr=expr,
+            start_time=at,
+            end_time=at
         )
+        started = time.perf_counter()
+        step = _to_ms(at)
+        
+        try:
+            value, query.samples_processed = self._evaluate(expr, [step])
+        except PromQLError as e:
+            return self._finish_query(query, started, "error", [], str(e))
+            
+        if not isinstance(value, dict):
+            return self._finish_query(query, started, "scalar", [{"value": [step / 1000, value]}])
+            
+        results = [
+            {"metric": dict(labels), "value": [step / 1000, points[0]]}
+            for labels, points in value.items() if points[0] is not None
+        ]
+        return self._finish_query(query, started, "vector", results)
         
     async def query_range(self, expr: str,
                          start_time: datetime,
@@ -772,37 +1779,31 @@ class MetricsPlatform:
             end_time=end_time,
             step=step
         )
-        
-        # Simulate query execution
-        await asyncio.sleep(0.005)
-        
-        # Find matching series
+        started = time.perf_counter()
+        
+        try:
+            step_ms = parse_duration_ms(step)
+            start_ms = _to_ms(start_time)
+            end_ms = _to_ms(end_time)
+            if step_ms <= 0 or end_ms < start_ms:
+                raise PromQLError("invalid range or step")
+            if (end_ms - start_ms) // step_ms + 1 > MAX_QUERY_POINTS:
+                raise PromQLError(f"exceeded maximum resolution of {MAX_QUERY_POINTS} points per series")
+            steps = list(range(start_ms, end_ms + 1, step_ms))
+            value, query.samples_processed = self._evaluate(expr, steps)
+        except PromQLError as e:
+            return self._finish_query(query, started, "error", [], str(e))
+            
+        if not isinstance(value, dict):
+            value = {(): [value] * len(steps)}
+            
         results = []
-        for series in self.time_series.values():
-            if expr in series.metric_name or expr == "*":
-                values = [
-                    [s[0].timestamp(), s[1]]
-                    for s in series.samples
-                    if start_time <= s[0] <= end_time
-                ]
-                if values:
-                    results.append({
-                        "metric": {"__name__": series.metric_name, **series.labels},
-                        "values": values[-100:]  # Limit samples
-                    })
-                    
-        query.duration_ms = random.uniform(10, 200)
-        query.samples_processed = sum(len(r.get("values", [])) for r in results)
-        self.queries[query.query_id] = query
-        
-        return QueryResult(
-            result_id=f"res_{uuid.uuid4().hex[:8]}",
-            query_id=query.query_id,
-            result_type="matrix",
-            data=results[:50],
-            series_count=len(results),
-            sample_count=query.samples_processed
-        )
+        for labels, points in value.items():
+            values = [[t / 1000, v] for t, v in zip(steps, points) if v is not None]
+            if values:
+                results.append({"metric": dict(labels), "values": values})
+                
+        return self._finish_query(query, started, "matrix", results)
         
     async def create_dashboard(self, name: str,
                               description: str = "",
@@ -851,63 +1852,126 @@ class MetricsPlatform:
         return panel
         
     async def get_cardinality(self) -> CardinalityInfo:
-        """Получение информации о кардинальности"""
-        series_by_metric = {}
-        series_by_label = {}
-        label_values = {}
+        """Получение информации о кардинальности из инкрементальных счётчиков индекса"""
+        index = self.label_index
+        return CardinalityInfo(
+            info_id=f"card_{uuid.uuid4().hex[:8]}",
+            total_series=index.total_series,
+            series_by_label=dict(index.series_by_label),
+            series_by_metric=dict(index.series_by_metric),
+            top_label_values=index.top_label_values()
+        )
         
-        for series in self.time_series.values():
-            # By metric
-            series_by_metric[series.metric_name] = series_by_metric.get(series.metric_name, 0) + 1
+    def _write_block(self, level: int, window_start_ms: int,
+                     series_chunks: Dict[str, List[XORChunk]]) -> StorageBlock:
+        """Запись чанков в блок окна; существующий блок окна дописывается"""
+        window_ms = self.block_duration_ms * COMPACTION_FACTOR ** (level - 1)
+        block = self.block_windows.get((level, window_start_ms))
+        if block is None:
+            block = StorageBlock(
+                block_id=f"blk_{uuid.uuid4().hex[:8]}",
+                min_time=datetime.fromtimestamp(window_start_ms / 1000),
+                max_time=datetime.fromtimestamp((window_start_ms + window_ms) / 1000),
+                status=StorageStatus.COMPACTING,
+                compaction_level=level,
+                window_start_ms=window_start_ms
+            )
+            self.storage_blocks[block.block_id] = block
+            self.block_windows[(level, window_start_ms)] = block
             
-            # By label
-            for label_name, label_value in series.labels.items():
-                series_by_label[label_name] = series_by_label.get(label_name, 0) + 1
+        for series_id, chunks in series_chunks.items():
+            existing = block.series_chunks.get(series_id, [])
+            merged = existing + chunks
+            if len(merged) > 1 or not merged[0].is_full:
+                merged = recode_chunks(itertools.chain.from_iterable(merged))
+            block.series_chunks[series_id] = merged
+            
+        block.num_series = len(block.series_chunks)
+        block.num_chunks = sum(len(c) for c in block.series_chunks.values())
+        block.num_samples = sum(ch.count for c in block.series_chunks.values() for ch in c)
+        block.size_bytes = sum(ch.size_bytes for c in block.series_chunks.values() for ch in c)
+        block.status = StorageStatus.ACTIVE
+        return block
+        
+    def _drop_block(self, block: StorageBlock):
+        del self.storage_blocks[block.block_id]
+        del self.block_windows[(block.compaction_level, block.window_start_ms)]
+        
+    async def compact_storage(self, flush_head: bool = False) -> Optional[StorageBlock]:
+        """Компактификация: head-чанки закрытых окон -> блоки уровня 1,
+        соседние блоки -> блоки уровня 2, удаление блоков старше retention"""
+        now_ms = _to_ms(datetime.now())
+        block_ms = self.block_duration_ms
+        head_cutoff = now_ms // block_ms * block_ms
+        latest = None
+        
+        # Head -> level 1
+        windows: Dict[int, Dict[str, List[XORChunk]]] = {}
+        for series in self.time_series.values():
+            chunks = series.head_chunks
+            if series.head_chunk is not None and \
+                    (flush_head or series.head_chunk.max_time < head_cutoff):
+                series.head_chunk.seal()
+                chunks.append(series.head_chunk)
+                series.head_chunk = None
                 
-                if label_name not in label_values:
-                    label_values[label_name] = {}
-                label_values[label_name][label_value] = label_values[label_name].get(label_value, 0) + 1
+            remaining = []
+            for chunk in chunks:
+                window = chunk.min_time // block_ms * block_ms
+                if flush_head or window < head_cutoff:
+                    windows.setdefault(window, {}).setdefault(series.series_id, []).append(chunk)
+                else:
+                    remaining.append(chunk)
+            series.head_chunks = remaining
+            
+        for window, series_chunks in sorted(windows.items()):
+            latest = self._write_block(1, window, series_chunks)
+            
+        # Level 1 -> level 2 (окна, полностью лежащие в прошлом)
+        group_ms = block_ms * COMPACTION_FACTOR
+        groups: Dict[int, List[StorageBlock]] = {}
+        for block in list(self.storage_blocks.values()):
+            group = block.window_start_ms // group_ms * group_ms
+            if block.compaction_level == 1 and group + group_ms <= head_cutoff:
+                groups.setdefault(group, []).append(block)
                 
-        # Get top label values
-        top_label_values = {}
-        for label_name, values in label_values.items():
-            sorted_values = sorted(values.items(), key=lambda x: x[1], reverse=True)[:10]
-            top_label_values[label_name] = sorted_values
+        for group, blocks in sorted(groups.items()):
+            series_chunks: Dict[str, List[XORChunk]] = {}
+            for block in sorted(blocks, key=lambda b: b.window_start_ms):
+                for series_id, chunks in block.series_chunks.items():
+                    if series_id in self.series_by_id:
+                        series_chunks.setdefault(series_id, []).extend(chunks)
+                self._drop_block(block)
+            latest = self._write_block(2, group, series_chunks)
             
-        return CardinalityInfo(
-            info_id=f"card_{uuid.uuid4().hex[:8]}",
-            total_series=len(self.time_series),
-            series_by_label=series_by_label,
-            series_by_metric=series_by_metric,
-            top_label_values=top_label_values
-        )
-        
-    async def compact_storage(self) -> StorageBlock:
-        """Компактификация хранилища"""
-        # Simulate compaction
-        total_samples = sum(s.sample_count for s in self.time_series.values())
-        total_series = len(self.time_series)
-        
-        block = StorageBlock(
-            block_id=f"blk_{uuid.uuid4().hex[:8]}",
-            min_time=datetime.now() - timedelta(hours=2),
-            max_time=datetime.now(),
-            num_samples=total_samples,
-            num_series=total_series,
-            num_chunks=total_series * 10,
-            size_bytes=total_samples * 16,  # ~16 bytes per sample
-            status=StorageStatus.ACTIVE,
-            compaction_level=1
-        )
+        # Retention
+        retention_cutoff = datetime.now() - self.retention
+        expired = [b for b in self.storage_blocks.values() if b.max_time < retention_cutoff]
+        for block in expired:
+            for series_id, chunks in block.series_chunks.items():
+                series = self.series_by_id.get(series_id)
+                if series:
+                    dropped = sum(chunk.count for chunk in chunks)
+                    series.sample_count -= dropped
+                    self.total_samples -= dropped
+            self._drop_block(block)
+            
+        self.sorted_blocks = sorted(self.storage_blocks.values(), key=lambda b: b.window_start_ms)
+        return latest
         
-        self.storage_blocks[block.block_id] = block
-        return block
+    def _head_size_bytes(self) -> int:
+        size = 0
+        for series in self.time_series.values():
+            size += sum(chunk.size_bytes for chunk in series.head_chunks)
+            if series.head_chunk is not None:
+                size += series.head_chunk.size_bytes
+        return size
         
     async def collect_metrics(self) -> MetricsPlatformMetrics:
         """Сбор метрик платформы"""
         targets_up = sum(1 for t in self.targets.values() if t.health == TargetHealth.UP)
-        total_samples = sum(s.sample_count for s in self.time_series.values())
-        storage_size = sum(b.size_bytes for b in self.storage_blocks.values())
+        total_samples = self.total_samples
+        storage_size = sum(b.size_bytes for b in self.storage_blocks.values()) + self._head_size_bytes()
         
         query_durations = [q.duration_ms for q in self.queries.values()]
         active_alerts = sum(1 for a in self.alerts.values() if a.state == AlertState.FIRING)
@@ -931,12 +1995,15 @@ class MetricsPlatform:
         """Общая статистика"""
         targets_up = sum(1 for t in self.targets.values() if t.health == TargetHealth.UP)
         active_alerts = sum(1 for a in self.alerts.values() if a.state == AlertState.FIRING)
-        total_samples = sum(s.sample_count for s in self.time_series.values())
+        storage_size = sum(b.size_bytes for b in self.storage_blocks.values()) + self._head_size_bytes()
         
         return {
             "total_descriptors": len(self.descriptors),
             "total_series": len(self.time_series),
-            "total_samples": total_samples,
+            "total_samples": self.total_samples,
+            "out_of_order_samples": self.out_of_order_samples,
+            "storage_bytes": storage_size,
+            "bytes_per_sample": storage_size / self.total_samples if self.total_samples else 0.0,
             "total_targets": len(self.targets),
             "targets_up": targets_up,
             "scrape_jobs": len(self.scrape_jobs),
@@ -1030,7 +2097,7 @@ async def main():
             {"job": service, "method": method}
         )
         
-    print(f"  📈 Recorded {len(platform.samples)} samples in {len(platform.time_series)} series")
+    print(f"  📈 Recorded {platform.total_samples} samples in {len(platform.time_series)} series")
     
     # Create Recording Rules
     print("\n📝 Creating Recording Rules...")
@@ -1134,8 +2201,10 @@ async def main():
     # Compact Storage
     print("\n💾 Compacting Storage...")
     
-    block = await platform.compact_storage()
-    print(f"  💾 Block created: {block.num_samples:,} samples, {block.size_bytes / 1024:.1f} KB")
+    block = await platform.compact_storage(flush_head=True)
+    if block:
+        print(f"  💾 Block created: {block.num_samples:,} samples, {block.size_bytes / 1024:.1f} KB "
+              f"({block.size_bytes / max(block.num_samples, 1):.2f} bytes/sample)")
     
     # Collect Platform Metrics
     platform_metrics = await platform.collect_metrics()
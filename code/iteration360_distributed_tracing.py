@@ -15,7 +15,11 @@ Server Init - Iteration 360: Distributed Tracing Platform
 """
 
 import asyncio
+import bisect
+import heapq
 import random
+import time
+from array import array
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
 from typing import Dict, List, Optional, Any, Set, Tuple
@@ -425,6 +429,102 @@ class TracingMetrics:
     collected_at: datetime = field(default_factory=datetime.now)
 
 
+# Latency sketches / indexes
+SKETCH_SUB_BUCKET_BITS = 6
+SKETCH_MAX_VALUE_BITS = 41  # ~25 days in µs
+HISTOGRAM_BOUNDARIES_US = [100, 500, 1000, 5000, 10000, 50000, 100000, 500000, 1000000]
+TIME_BUCKET_SECONDS = 60
+
+
+class LatencySketch:
+    """HDR-гистограмма латентности: log-linear бакеты, относительная ошибка < 1/32
+    
+    Память фиксирована (около 1200 счётчиков), запись O(1), перцентили читаются
+    одним проходом по бакетам без сортировки сырых значений.
+    """
+    __slots__ = ("counts", "count", "sum_us", "min_index", "max_index", "boundary_counts")
+    
+    SUB_BUCKETS = 1 << SKETCH_SUB_BUCKET_BITS
+    HALF_BUCKETS = SUB_BUCKETS >> 1
+    MAX_VALUE = (1 << SKETCH_MAX_VALUE_BITS) - 1
+    
+    def __init__(self):
+        size = self._index(self.MAX_VALUE) + 1
+        self.counts = array('q', bytes(8 * size))
+        self.count = 0
+        self.sum_us = 0
+        self.min_index = size
+        self.max_index = -1
+        self.boundary_counts = array('q', bytes(8 * (len(HISTOGRAM_BOUNDARIES_US) + 1)))
+        
+    @classmethod
+    def _index(cls, value: int) -> int:
+        if value < cls.SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - SKETCH_SUB_BUCKET_BITS
+        return cls.SUB_BUCKETS + (shift - 1) * cls.HALF_BUCKETS + (value >> shift) - cls.HALF_BUCKETS
+        
+    @classmethod
+    def _value(cls, index: int) -> float:
+        """Середина диапазона бакета"""
+        if index < cls.SUB_BUCKETS:
+            return float(index)
+        shift = (index - cls.SUB_BUCKETS) // cls.HALF_BUCKETS + 1
+        mantissa = (index - cls.SUB_BUCKETS) % cls.HALF_BUCKETS + cls.HALF_BUCKETS
+        return float((mantissa << shift) + ((1 << shift) - 1) / 2)
+        
+    def record(self, value_us: int):
+        value_us = min(max(0, value_us), self.MAX_VALUE)
+        index = self._index(value_us)
+        self.counts[index] += 1
+        if index < self.min_index:
+            self.min_index = index
+        if index > self.max_index:
+            self.max_index = index
+        self.count += 1
+        self.sum_us += value_us
+        self.boundary_counts[bisect.bisect_left(HISTOGRAM_BOUNDARIES_US, value_us)] += 1
+        
+    def merge(self, other: "LatencySketch"):
+        counts = self.counts
+        for index in range(other.min_index, other.max_index + 1):
+            counts[index] += other.counts[index]
+        for i, count in enumerate(other.boundary_counts):
+            self.boundary_counts[i] += count
+        self.min_index = min(self.min_index, other.min_index)
+        self.max_index = max(self.max_index, other.max_index)
+        self.count += other.count
+        self.sum_us += other.sum_us
+        
+    def percentiles(self, quantiles: List[float]) -> List[float]:
+        """Перцентили (nearest-rank) за один проход по бакетам"""
+        if not self.count:
+            return [0.0] * len(quantiles)
+            
+        ranks = sorted((min(int(self.count * q) + 1, self.count), i) for i, q in enumerate(quantiles))
+        results = [0.0] * len(quantiles)
+        seen = 0
+        r = 0
+        counts = self.counts
+        for index in range(self.min_index, self.max_index + 1):
+            seen += counts[index]
+            while r < len(ranks) and ranks[r][0] <= seen:
+                results[ranks[r][1]] = self._value(index)
+                r += 1
+            if r == len(ranks):
+                break
+        return results
+        
+    def cumulative_buckets(self) -> List[Tuple[int, int]]:
+        """(верхняя граница, число значений <= границы)"""
+        buckets = []
+        total = 0
+        for boundary, count in zip(HISTOGRAM_BOUNDARIES_US, self.boundary_counts):
+            total += count
+            buckets.append((boundary, total))
+        return buckets
+
+
 class DistributedTracingPlatform:
     """Платформа распределённой трассировки"""
     
@@ -440,6 +540,22 @@ class DistributedTracingPlatform:
         self.service_maps: Dict[str, ServiceMap] = {}
         self.latency_histograms: Dict[str, LatencyHistogram] = {}
         
+        # Secondary indexes
+        self.services_by_name: Dict[str, Service] = {}
+        self.service_traces: Dict[str, Set[str]] = {}
+        self.operation_traces: Dict[str, Set[str]] = {}  # root operation -> traces
+        self.tag_traces: Dict[Tuple[str, str], Set[str]] = {}
+        self.error_traces: Set[str] = set()
+        self.time_buckets: Dict[int, List[str]] = {}
+        self.time_bucket_keys: List[int] = []
+        
+        # Streaming latency
+        self.operation_sketches: Dict[Tuple[str, str], LatencySketch] = {}
+        self.service_sketches: Dict[str, LatencySketch] = {}
+        self.completed_traces = 0
+        self.completed_duration_us = 0
+        self.total_errors = 0
+        
     async def register_service(self, name: str,
                               version: str = "",
                               environment: str = "production",
@@ -454,6 +570,7 @@ class DistributedTracingPlatform:
         )
         
         self.services[service.service_id] = service
+        self.services_by_name[name] = service
         return service
         
     async def start_trace(self, service_name: str,
@@ -485,8 +602,18 @@ class DistributedTracingPlatform:
         self.traces[trace_id] = trace
         self.spans[span_id] = span
         
+        # Index trace
+        self.service_traces.setdefault(service_name, set()).add(trace_id)
+        self.operation_traces.setdefault(operation_name, set()).add(trace_id)
+        bucket_key = int(trace.start_time.timestamp()) // TIME_BUCKET_SECONDS
+        bucket = self.time_buckets.get(bucket_key)
+        if bucket is None:
+            bucket = self.time_buckets[bucket_key] = []
+            bisect.insort(self.time_bucket_keys, bucket_key)
+        bucket.append(trace_id)
+        
         # Update service stats
-        service = next((s for s in self.services.values() if s.name == service_name), None)
+        service = self.services_by_name.get(service_name)
         if service:
             service.trace_count += 1
             service.span_count += 1
@@ -520,6 +647,7 @@ class DistributedTracingPlatform:
         trace.span_ids.append(span.span_id)
         trace.span_count += 1
         trace.services.add(service_name)
+        self.service_traces.setdefault(service_name, set()).add(trace_id)
         
         # Calculate depth
         depth = 1
@@ -531,7 +659,7 @@ class DistributedTracingPlatform:
         trace.max_depth = max(trace.max_depth, depth)
         
         # Update service stats
-        service = next((s for s in self.services.values() if s.name == service_name), None)
+        service = self.services_by_name.get(service_name)
         if service:
             service.span_count += 1
             service.last_seen = datetime.now()
@@ -575,12 +703,24 @@ class DistributedTracingPlatform:
         if attributes:
             span.attributes.update(attributes)
             
+        # Index tags and record latency
+        trace_id = span.trace_id
+        for key, value in span.attributes.items():
+            self.tag_traces.setdefault((key, str(value)), set()).add(trace_id)
+        if span.duration_us > 0:
+            self._record_latency(span.service_name, span.name, span.duration_us)
+            
         # Update trace
         trace = self.traces.get(span.trace_id)
         if trace:
             if status == SpanStatus.ERROR:
                 trace.has_errors = True
                 trace.error_count += 1
+                self.error_traces.add(trace_id)
+                self.total_errors += 1
+                service = self.services_by_name.get(span.service_name)
+                if service:
+                    service.error_count += 1
                 
                 # Track error group
                 await self._track_error(span.trace_id, status_message, span.service_name)
@@ -590,9 +730,25 @@ class DistributedTracingPlatform:
                 trace.end_time = span.end_time
                 trace.duration_us = span.duration_us
                 trace.state = TraceState.ERROR if trace.has_errors else TraceState.COMPLETE
+                if trace.duration_us > 0:
+                    self.completed_traces += 1
+                    self.completed_duration_us += trace.duration_us
                 
         return span
         
+    def _record_latency(self, service_name: str, operation_name: str, duration_us: int):
+        """Обновление скетчей латентности сервиса и операции"""
+        key = (service_name, operation_name)
+        sketch = self.operation_sketches.get(key)
+        if sketch is None:
+            sketch = self.operation_sketches[key] = LatencySketch()
+        sketch.record(duration_us)
+        
+        sketch = self.service_sketches.get(service_name)
+        if sketch is None:
+            sketch = self.service_sketches[service_name] = LatencySketch()
+        sketch.record(duration_us)
+        
     async def _track_error(self, trace_id: str, error_message: str, service_name: str):
         """Отслеживание ошибки"""
         # Simple grouping by error message prefix
@@ -725,40 +881,65 @@ class DistributedTracingPlatform:
             limit=limit
         )
         
-        # Search traces
-        matching_traces = []
+        started = time.perf_counter()
         
-        for trace in self.traces.values():
-            # Service filter
-            if service_name and service_name not in trace.services:
-                continue
-                
-            # Time filter
+        # Candidate sets from indexes
+        candidate_sets: List[Set[str]] = []
+        if service_name:
+            candidate_sets.append(self.service_traces.get(service_name, set()))
+        if operation_name:
+            operation_sets = [ids for operation, ids in self.operation_traces.items()
+                              if operation_name in operation]
+            if len(operation_sets) == 1:
+                candidate_sets.append(operation_sets[0])
+            else:
+                candidate_sets.append(set().union(*operation_sets))
+        for key, value in query.tags.items():
+            candidate_sets.append(self.tag_traces.get((key, str(value)), set()))
+        if errors_only:
+            candidate_sets.append(self.error_traces)
+            
+        # Time buckets covering the query range
+        lo = bisect.bisect_left(self.time_bucket_keys, int(query.start_time.timestamp()) // TIME_BUCKET_SECONDS)
+        hi = bisect.bisect_right(self.time_bucket_keys, int(query.end_time.timestamp()) // TIME_BUCKET_SECONDS)
+        bucket_keys = self.time_bucket_keys[lo:hi]
+        time_count = sum(len(self.time_buckets[key]) for key in bucket_keys)
+        
+        def matches(trace: Trace) -> bool:
             if trace.start_time < query.start_time or trace.start_time > query.end_time:
-                continue
-                
-            # Duration filter
+                return False
             if min_duration_us and trace.duration_us < min_duration_us:
-                continue
+                return False
             if max_duration_us and trace.duration_us > max_duration_us:
-                continue
-                
-            # Errors only
-            if errors_only and not trace.has_errors:
-                continue
-                
-            # Operation filter (check root span)
-            if operation_name:
-                root_span = self.spans.get(trace.root_span_id)
-                if not root_span or operation_name not in root_span.name:
-                    continue
-                    
-            matching_traces.append(trace)
+                return False
+            return True
             
-            if len(matching_traces) >= limit:
-                break
-                
-        query.duration_ms = random.uniform(1, 50)
+        matching_traces = []
+        candidate_sets.sort(key=len)
+        
+        if candidate_sets and len(candidate_sets[0]) < time_count:
+            # Intersect starting from the smallest set
+            driver, others = candidate_sets[0], candidate_sets[1:]
+            for trace_id in driver:
+                if all(trace_id in ids for ids in others):
+                    trace = self.traces[trace_id]
+                    if matches(trace):
+                        matching_traces.append(trace)
+            matching_traces = heapq.nsmallest(limit, matching_traces, key=lambda t: t.start_time)
+        else:
+            # Scan time buckets in order, probing the other indexes
+            for key in bucket_keys:
+                for trace_id in self.time_buckets[key]:
+                    if all(trace_id in ids for ids in candidate_sets):
+                        trace = self.traces[trace_id]
+                        if matches(trace):
+                            matching_traces.append(trace)
+                            if len(matching_traces) >= limit:
+                                break
+                if len(matching_traces) >= limit:
+                    break
+                    
+        query.duration_ms = (time.perf_counter() - started) * 1000
         self.queries[query.query_id] = query
         
         # Calculate stats
@@ -823,47 +1004,37 @@ class DistributedTracingPlatform:
     async def calculate_latency_histogram(self, service_name: str,
                                          operation_name: str = "*") -> LatencyHistogram:
         """Расчёт гистограммы латентности"""
-        durations = []
-        
-        for span in self.spans.values():
-            if span.service_name != service_name:
-                continue
-            if operation_name != "*" and operation_name not in span.name:
-                continue
-            if span.duration_us > 0:
-                durations.append(span.duration_us)
-                
-        # Create histogram buckets
-        bucket_boundaries = [100, 500, 1000, 5000, 10000, 50000, 100000, 500000, 1000000]
-        buckets = []
+        if operation_name == "*":
+            sketch = self.service_sketches.get(service_name) or LatencySketch()
+        else:
+            sketch = LatencySketch()
+            for (service, operation), operation_sketch in self.operation_sketches.items():
+                if service == service_name and operation_name in operation:
+                    sketch.merge(operation_sketch)
+                    
+        p50, p75, p90, p95, p99 = sketch.percentiles([0.50, 0.75, 0.90, 0.95, 0.99])
         
-        for boundary in bucket_boundaries:
-            count = sum(1 for d in durations if d <= boundary)
-            buckets.append((boundary, count))
-            
-        # Calculate percentiles
-        sorted_durations = sorted(durations)
-        
-        def percentile(p):
-            if not sorted_durations:
-                return 0.0
-            idx = int(len(sorted_durations) * p)
-            return float(sorted_durations[min(idx, len(sorted_durations) - 1)])
-            
         histogram = LatencyHistogram(
             histogram_id=f"hist_{uuid.uuid4().hex[:8]}",
             service_name=service_name,
             operation_name=operation_name,
-            buckets=buckets,
-            total_count=len(durations),
-            sum_us=sum(durations),
-            p50_us=percentile(0.50),
-            p75_us=percentile(0.75),
-            p90_us=percentile(0.90),
-            p95_us=percentile(0.95),
-            p99_us=percentile(0.99)
+            buckets=sketch.cumulative_buckets(),
+            total_count=sketch.count,
+            sum_us=sketch.sum_us,
+            p50_us=p50,
+            p75_us=p75,
+            p90_us=p90,
+            p95_us=p95,
+            p99_us=p99
         )
         
+        service = self.services_by_name.get(service_name)
+        if service and operation_name == "*" and sketch.count:
+            service.avg_latency_us = sketch.sum_us / sketch.count
+            service.p50_latency_us = p50
+            service.p95_latency_us = p95
+            service.p99_latency_us = p99
+            
         self.latency_histograms[histogram.histogram_id] = histogram
         return histogram
         
@@ -888,9 +1059,6 @@ class DistributedTracingPlatform:
         
     async def collect_metrics(self) -> TracingMetrics:
         """Сбор метрик платформы"""
-        traces_with_errors = sum(1 for t in self.traces.values() if t.has_errors)
-        durations = [t.duration_us for t in self.traces.values() if t.duration_us > 0]
-        
         total_sampled = sum(s.sampled_count for s in self.samplers.values())
         total_decisions = sum(s.total_decisions for s in self.samplers.values())
         
@@ -898,9 +1066,9 @@ class DistributedTracingPlatform:
             metrics_id=f"tm_{uuid.uuid4().hex[:8]}",
             total_services=len(self.services),
             total_traces=len(self.traces),
-            traces_with_errors=traces_with_errors,
+            traces_with_errors=len(self.error_traces),
             total_spans=len(self.spans),
-            avg_trace_duration_us=sum(durations) / len(durations) if durations else 0.0,
+            avg_trace_duration_us=self.completed_duration_us / self.completed_traces if self.completed_traces else 0.0,
             sampling_rate=(total_sampled / total_decisions) * 100 if total_decisions > 0 else 100.0,
             error_groups=len(self.error_groups),
             total_dependencies=len(self.dependencies)
@@ -908,18 +1076,13 @@ class DistributedTracingPlatform:
         
     def get_statistics(self) -> Dict[str, Any]:
         """Общая статистика"""
-        traces_with_errors = sum(1 for t in self.traces.values() if t.has_errors)
-        total_errors = sum(t.error_count for t in self.traces.values())
-        
-        durations = [t.duration_us for t in self.traces.values() if t.duration_us > 0]
-        
         return {
             "total_services": len(self.services),
             "total_traces": len(self.traces),
-            "traces_with_errors": traces_with_errors,
+            "traces_with_errors": len(self.error_traces),
             "total_spans": len(self.spans),
-            "total_errors": total_errors,
-            "avg_duration_us": sum(durations) / len(durations) if durations else 0.0,
+            "total_errors": self.total_errors,
+            "avg_duration_us": self.completed_duration_us / self.completed_traces if self.completed_traces else 0.0,
             "total_dependencies": len(self.dependencies),
             "total_samplers": len(self.samplers),
             "error_groups": len(self.error_groups),
@@ -15,16 +15,24 @@ Server Init - Iteration 361: Alert Manager Platform
 """
 
 import asyncio
+import hashlib
 import random
+import sys
+import time
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Set, Tuple
+from typing import Dict, List, Optional, Any, Set, Tuple, Pattern
 from enum import Enum
 import uuid
 import json
 import re
 
 
+# Durations
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, "d": 86400}
+DURATION_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)(ms|s|m|h|d)$")
+
+
 class AlertSeverity(Enum):
     """Критичность алерта"""
     INFO = "info"
@@ -125,6 +133,12 @@ class AlertGroup:
     
     # Receiver
     receiver: str = ""
+    route_id: str = ""
+    
+    # Notification state
+    notified_firing: Set[str] = field(default_factory=set)
+    last_notified_at: Optional[datetime] = None
+    notification_count: int = 0
     
     # Timestamps
     created_at: datetime = field(default_factory=datetime.now)
@@ -237,6 +251,10 @@ class Notification:
     # Status
     status: str = "pending"  # pending, sent, failed
     
+    # Alerts
+    firing_alerts: int = 0
+    resolved_alerts: int = 0
+    
     # Retry
     retry_count: int = 0
     max_retries: int = 3
@@ -426,6 +444,54 @@ class AlertManagerMetrics:
     collected_at: datetime = field(default_factory=datetime.now)
 
 
+def parse_duration(value: str) -> float:
+    """Длительность в секундах ("30s", "5m", "4h")"""
+    match = DURATION_PATTERN.match(value.strip())
+    if not match:
+        raise ValueError(f"Invalid duration: {value}")
+    return float(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+def alert_fingerprint(labels: Dict[str, str]) -> str:
+    """Стабильный отпечаток набора меток"""
+    payload = json.dumps(labels, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+@dataclass
+class LabelMatcher:
+    """Скомпилированный матчер метки"""
+    name: str
+    value: str
+    is_regex: bool = False
+    pattern: Optional[Pattern] = None
+    
+    def matches(self, labels: Dict[str, str]) -> bool:
+        label_value = labels.get(self.name, "")
+        if self.is_regex:
+            return self.pattern.match(label_value) is not None
+        return label_value == self.value
+
+
+def compile_matchers(match: Dict[str, str] = None,
+                     match_re: Dict[str, str] = None) -> List[LabelMatcher]:
+    """Компиляция матчеров"""
+    matchers = [LabelMatcher(name=k, value=v) for k, v in (match or {}).items()]
+    matchers.extend(
+        LabelMatcher(name=k, value=v, is_regex=True, pattern=re.compile(v))
+        for k, v in (match_re or {}).items()
+    )
+    return matchers
+
+
+def matchers_index_key(matchers: List[LabelMatcher]) -> Optional[Tuple[str, str]]:
+    """Пара метка/значение для индексации (первый точный непустой матчер)"""
+    for matcher in matchers:
+        if not matcher.is_regex and matcher.value:
+            return (matcher.name, matcher.value)
+    return None
+
+
 class AlertManagerPlatform:
     """Платформа управления алертами"""
     
@@ -444,14 +510,55 @@ class AlertManagerPlatform:
         self.users: Dict[str, User] = {}
         self.teams: Dict[str, Team] = {}
         
+        # Deduplication: fingerprint -> alert_id
+        self.alerts_by_fingerprint: Dict[str, str] = {}
+        self.alert_group_keys: Dict[str, Set[str]] = {}
+        self.deduplicated_alerts = 0
+        
+        # Compiled matchers
+        self.route_matchers: Dict[str, List[LabelMatcher]] = {}
+        self.silence_matchers: Dict[str, List[LabelMatcher]] = {}
+        self.inhibition_matchers: Dict[str, Tuple[List[LabelMatcher], List[LabelMatcher]]] = {}
+        
+        # Label-value indexes: (name, value) -> ids; unindexed sets hold regex/empty-only matchers
+        self.silence_index: Dict[Tuple[str, str], Set[str]] = {}
+        self.unindexed_silences: Set[str] = set()
+        self.inhibition_target_index: Dict[Tuple[str, str], Set[str]] = {}
+        self.unindexed_inhibitions: Set[str] = set()
+        
+        # Firing source alerts per inhibition rule: rule_id -> equal-label values -> alert_ids
+        self.inhibition_sources: Dict[str, Dict[Tuple, Set[str]]] = {}
+        
+        # Notification batching
+        self.receivers_by_name: Dict[str, Receiver] = {}
+        self.group_flush_tasks: Dict[str, asyncio.Task] = {}
+        
     async def create_alert(self, labels: Dict[str, str],
                           annotations: Dict[str, str] = None,
                           severity: AlertSeverity = AlertSeverity.WARNING,
                           generator_url: str = "") -> Alert:
         """Создание алерта"""
         # Generate fingerprint from labels
-        fingerprint = str(hash(json.dumps(labels, sort_keys=True)))
-        
+        fingerprint = alert_fingerprint(labels)
+        
+        # Re-fired alert: update in place
+        existing = self.alerts.get(self.alerts_by_fingerprint.get(fingerprint, ""))
+        if existing:
+            self.deduplicated_alerts += 1
+            existing.annotations = annotations or existing.annotations
+            existing.severity = severity
+            existing.generator_url = generator_url or existing.generator_url
+            existing.updated_at = datetime.now()
+            
+            if existing.state == AlertState.RESOLVED:
+                existing.state = AlertState.FIRING
+                existing.starts_at = existing.updated_at
+                existing.ends_at = None
+                self._index_source_alert(existing)
+                await self._route_alert(existing)
+                
+            return existing
+            
         alert = Alert(
             alert_id=f"alt_{uuid.uuid4().hex[:8]}",
             fingerprint=fingerprint,
@@ -462,6 +569,8 @@ class AlertManagerPlatform:
         )
         
         self.alerts[alert.alert_id] = alert
+        self.alerts_by_fingerprint[fingerprint] = alert.alert_id
+        self._index_source_alert(alert)
         
         # Route alert
         await self._route_alert(alert)
@@ -480,35 +589,36 @@ class AlertManagerPlatform:
                     
     async def _match_route(self, alert: Alert, route: Route) -> bool:
         """Проверка соответствия алерта маршруту"""
-        # Check exact match
-        for key, value in route.match.items():
-            if alert.labels.get(key) != value:
-                return False
-                
-        # Check regex match
-        for key, pattern in route.match_re.items():
-            label_value = alert.labels.get(key, "")
-            if not re.match(pattern, label_value):
-                return False
-                
-        return True
+        matchers = self.route_matchers.get(route.route_id)
+        if matchers is None:
+            matchers = compile_matchers(route.match, route.match_re)
+            self.route_matchers[route.route_id] = matchers
+            
+        return all(matcher.matches(alert.labels) for matcher in matchers)
         
     async def _add_to_group(self, alert: Alert, route: Route):
         """Добавление алерта в группу"""
         # Generate group key
         group_labels = {k: alert.labels.get(k, "") for k in route.group_by}
-        group_key = json.dumps(group_labels, sort_keys=True)
+        group_key = f"{route.route_id}:{json.dumps(group_labels, sort_keys=True)}"
         
         if group_key not in self.alert_groups:
             self.alert_groups[group_key] = AlertGroup(
                 group_id=f"grp_{uuid.uuid4().hex[:8]}",
                 group_key=group_key,
                 group_labels=group_labels,
-                receiver=route.receiver
+                receiver=route.receiver,
+                route_id=route.route_id
             )
             
         group = self.alert_groups[group_key]
-        group.alerts.append(alert.alert_id)
+        group_keys = self.alert_group_keys.setdefault(alert.alert_id, set())
+        if group_key not in group_keys:
+            group_keys.add(group_key)
+            group.alerts.append(alert.alert_id)
+            
+        group.status = "firing"
+        self._schedule_group(group)
         
     async def resolve_alert(self, alert_id: str) -> Optional[Alert]:
         """Разрешение алерта"""
@@ -516,11 +626,37 @@ class AlertManagerPlatform:
         if not alert:
             return None
             
-        alert.state = AlertState.RESOLVED
-        alert.ends_at = datetime.now()
-        
+        if alert.state != AlertState.RESOLVED:
+            alert.state = AlertState.RESOLVED
+            alert.ends_at = datetime.now()
+            self._unindex_source_alert(alert)
+            
+            # Resolved notifications go out with the group's next batch
+            for group_key in self.alert_group_keys.get(alert_id, set()):
+                group = self.alert_groups.get(group_key)
+                if group and alert_id in group.notified_firing:
+                    self._schedule_group(group)
+                    
         return alert
         
+    def _index_source_alert(self, alert: Alert):
+        """Индексация алерта как источника ингибирования"""
+        for rule_id, (source_matchers, _) in self.inhibition_matchers.items():
+            if all(matcher.matches(alert.labels) for matcher in source_matchers):
+                rule = self.inhibition_rules[rule_id]
+                key = tuple(alert.labels.get(k) for k in rule.equal)
+                self.inhibition_sources[rule_id].setdefault(key, set()).add(alert.alert_id)
+                
+    def _unindex_source_alert(self, alert: Alert):
+        """Удаление алерта из индекса источников"""
+        for rule_id, sources in self.inhibition_sources.items():
+            key = tuple(alert.labels.get(k) for k in self.inhibition_rules[rule_id].equal)
+            alert_ids = sources.get(key)
+            if alert_ids and alert.alert_id in alert_ids:
+                alert_ids.discard(alert.alert_id)
+                if not alert_ids:
+                    del sources[key]
+                    
     async def create_route(self, receiver: str,
                           match: Dict[str, str] = None,
                           match_re: Dict[str, str] = None,
@@ -541,6 +677,7 @@ class AlertManagerPlatform:
         )
         
         self.routes[route.route_id] = route
+        self.route_matchers[route.route_id] = compile_matchers(route.match, route.match_re)
         return route
         
     async def create_receiver(self, name: str,
@@ -559,6 +696,7 @@ class AlertManagerPlatform:
         )
         
         self.receivers[receiver.receiver_id] = receiver
+        self.receivers_by_name[receiver.name] = receiver
         return receiver
         
     async def create_silence(self, matchers: List[Dict[str, str]],
@@ -577,101 +715,253 @@ class AlertManagerPlatform:
         )
         
         self.silences[silence.silence_id] = silence
+        
+        # Compile once and index by an exact label pair
+        matchers = [
+            LabelMatcher(
+                name=m.get("name", ""),
+                value=m.get("value", ""),
+                is_regex=bool(m.get("isRegex", False)),
+                pattern=re.compile(m.get("value", "")) if m.get("isRegex", False) else None
+            )
+            for m in matchers
+        ]
+        self.silence_matchers[silence.silence_id] = matchers
+        
+        key = matchers_index_key(matchers)
+        if key:
+            self.silence_index.setdefault(key, set()).add(silence.silence_id)
+        else:
+            self.unindexed_silences.add(silence.silence_id)
+            
+        return silence
+        
+    async def expire_silence(self, silence_id: str) -> Optional[Silence]:
+        """Снятие подавления"""
+        silence = self.silences.get(silence_id)
+        if not silence:
+            return None
+            
+        silence.status = "expired"
+        silence.ends_at = min(silence.ends_at, datetime.now())
+        silence.updated_at = datetime.now()
+        
+        key = matchers_index_key(self.silence_matchers.get(silence_id, []))
+        if key and key in self.silence_index:
+            self.silence_index[key].discard(silence_id)
+            if not self.silence_index[key]:
+                del self.silence_index[key]
+        self.unindexed_silences.discard(silence_id)
+        
         return silence
         
     async def is_silenced(self, alert: Alert) -> bool:
         """Проверка подавления алерта"""
         now = datetime.now()
         
-        for silence in self.silences.values():
+        candidates = set(self.unindexed_silences)
+        for item in alert.labels.items():
+            candidates |= self.silence_index.get(item, set())
+            
+        for silence_id in candidates:
+            silence = self.silences[silence_id]
             if silence.status != "active":
                 continue
             if now < silence.starts_at or now > silence.ends_at:
                 continue
                 
-            # Check matchers
-            matches = True
-            for matcher in silence.matchers:
-                name = matcher.get("name", "")
-                value = matcher.get("value", "")
-                is_regex = matcher.get("isRegex", False)
-                
-                label_value = alert.labels.get(name, "")
-                
-                if is_regex:
-                    if not re.match(value, label_value):
-                        matches = False
-                        break
-                else:
-                    if label_value != value:
-                        matches = False
-                        break
-                        
-            if matches:
+            if all(matcher.matches(alert.labels) for matcher in self.silence_matchers[silence_id]):
                 return True
                 
         return False
         
     async def create_inhibition_rule(self, source_match: Dict[str, str],
                                     target_match: Dict[str, str],
-                                    equal: List[str] = None) -> InhibitionRule:
+                                    equal: List[str] = None,
+                                    source_match_re: Dict[str, str] = None,
+                                    target_match_re: Dict[str, str] = None) -> InhibitionRule:
         """Создание правила ингибирования"""
         rule = InhibitionRule(
             rule_id=f"inh_{uuid.uuid4().hex[:8]}",
             source_match=source_match,
             target_match=target_match,
+            source_match_re=source_match_re or {},
+            target_match_re=target_match_re or {},
             equal=equal or []
         )
         
         self.inhibition_rules[rule.rule_id] = rule
+        
+        source_matchers = compile_matchers(rule.source_match, rule.source_match_re)
+        target_matchers = compile_matchers(rule.target_match, rule.target_match_re)
+        self.inhibition_matchers[rule.rule_id] = (source_matchers, target_matchers)
+        
+        key = matchers_index_key(target_matchers)
+        if key:
+            self.inhibition_target_index.setdefault(key, set()).add(rule.rule_id)
+        else:
+            self.unindexed_inhibitions.add(rule.rule_id)
+            
+        # Index currently firing source alerts
+        sources: Dict[Tuple, Set[str]] = {}
+        self.inhibition_sources[rule.rule_id] = sources
+        for alert in self.alerts.values():
+            if alert.state == AlertState.FIRING and all(m.matches(alert.labels) for m in source_matchers):
+                sources.setdefault(tuple(alert.labels.get(k) for k in rule.equal), set()).add(alert.alert_id)
+                
         return rule
         
     async def is_inhibited(self, alert: Alert) -> bool:
         """Проверка ингибирования алерта"""
-        for rule in self.inhibition_rules.values():
+        candidates = set(self.unindexed_inhibitions)
+        for item in alert.labels.items():
+            candidates |= self.inhibition_target_index.get(item, set())
+            
+        for rule_id in candidates:
+            _, target_matchers = self.inhibition_matchers[rule_id]
+            
             # Check if alert matches target
-            target_matches = all(
-                alert.labels.get(k) == v
-                for k, v in rule.target_match.items()
-            )
+            if not all(matcher.matches(alert.labels) for matcher in target_matchers):
+                continue
+                
+            # Firing sources with the same equal-label values
+            key = tuple(alert.labels.get(k) for k in self.inhibition_rules[rule_id].equal)
+            sources = self.inhibition_sources[rule_id].get(key)
             
-            if not target_matches:
+            # An alert never inhibits itself
+            if sources and (len(sources) > 1 or alert.alert_id not in sources):
+                return True
+                
+        return False
+        
+    def _receiver_channels(self, receiver_name: str) -> List[NotificationChannel]:
+        """Каналы получателя по его конфигурации"""
+        receiver = self.receivers_by_name.get(receiver_name)
+        if not receiver:
+            return [NotificationChannel.WEBHOOK]
+            
+        channels = []
+        for configs, channel in ((receiver.email_configs, NotificationChannel.EMAIL),
+                                 (receiver.slack_configs, NotificationChannel.SLACK),
+                                 (receiver.pagerduty_configs, NotificationChannel.PAGERDUTY),
+                                 (receiver.webhook_configs, NotificationChannel.WEBHOOK),
+                                 (receiver.opsgenie_configs, NotificationChannel.OPSGENIE)):
+            if configs:
+                channels.append(channel)
+        return channels
+        
+    def _schedule_group(self, group: AlertGroup):
+        """Планирование пакетного уведомления группы"""
+        if group.group_key in self.group_flush_tasks:
+            return  # changes are picked up by the pending flush
+            
+        route = self.routes.get(group.route_id)
+        if group.last_notified_at is None:
+            delay = parse_duration(route.group_wait) if route else 0.0
+        else:
+            interval = parse_duration(route.group_interval) if route else 0.0
+            due = group.last_notified_at + timedelta(seconds=interval)
+            delay = max(0.0, (due - datetime.now()).total_seconds())
+            
+        self.group_flush_tasks[group.group_key] = asyncio.create_task(
+            self._group_timer(group.group_key, delay)
+        )
+        
+    async def _group_timer(self, group_key: str, delay: float):
+        """Таймер group_wait / group_interval"""
+        await asyncio.sleep(delay)
+        if self.group_flush_tasks.get(group_key) is asyncio.current_task():
+            del self.group_flush_tasks[group_key]
+        await self.flush_group(group_key)
+        
+    async def flush_group(self, group_key: str) -> List[Notification]:
+        """Одно уведомление на группу за интервал"""
+        group = self.alert_groups.get(group_key)
+        if not group:
+            return []
+            
+        firing: List[Alert] = []
+        resolved: List[str] = []
+        for alert_id in group.alerts:
+            alert = self.alerts.get(alert_id)
+            if not alert:
                 continue
+            if alert.state == AlertState.FIRING:
+                if not await self.is_silenced(alert) and not await self.is_inhibited(alert):
+                    firing.append(alert)
+            elif alert_id in group.notified_firing:
+                resolved.append(alert_id)
                 
-            # Look for inhibiting source alert
-            for source_alert in self.alerts.values():
-                if source_alert.state != AlertState.FIRING:
-                    continue
-                    
-                # Check source match
-                source_matches = all(
-                    source_alert.labels.get(k) == v
-                    for k, v in rule.source_match.items()
-                )
+        firing_ids = {alert.alert_id for alert in firing}
+        now = datetime.now()
+        route = self.routes.get(group.route_id)
+        
+        repeat_due = bool(firing_ids) and group.last_notified_at is not None and route is not None and \
+            (now - group.last_notified_at).total_seconds() >= parse_duration(route.repeat_interval)
+        changed = firing_ids != group.notified_firing
+        
+        notifications = []
+        if changed or repeat_due:
+            if firing:
+                common = dict(firing[0].labels)
+                for alert in firing[1:]:
+                    common = {k: v for k, v in common.items() if alert.labels.get(k) == v}
+                group.common_labels = common
                 
-                if not source_matches:
-                    continue
-                    
-                # Check equal labels
-                equal_matches = all(
-                    alert.labels.get(k) == source_alert.labels.get(k)
-                    for k in rule.equal
-                )
+            for channel in self._receiver_channels(group.receiver):
+                notifications.append(await self.send_notification(
+                    group.group_id, group.receiver, channel, len(firing), len(resolved)
+                ))
                 
-                if equal_matches:
-                    return True
-                    
-        return False
+            group.notified_firing = firing_ids
+            group.last_notified_at = now
+            group.notification_count += 1
+            
+        # Resolved alerts leave the group once reported
+        kept = []
+        for alert_id in group.alerts:
+            alert = self.alerts.get(alert_id)
+            if alert and alert.state == AlertState.RESOLVED and alert_id not in group.notified_firing:
+                self.alert_group_keys.get(alert_id, set()).discard(group_key)
+            else:
+                kept.append(alert_id)
+        group.alerts = kept
+        group.status = "firing" if firing_ids else "resolved"
+        
+        # Keep ticking every group_interval while anything is firing
+        if group.alerts:
+            self._schedule_group(group)
+            
+        return notifications
+        
+    async def flush_pending_notifications(self) -> List[Notification]:
+        """Немедленная отправка всех отложенных групп"""
+        group_keys = list(self.group_flush_tasks)
+        for group_key in group_keys:
+            self.group_flush_tasks.pop(group_key).cancel()
+            
+        results = await asyncio.gather(*(self.flush_group(key) for key in group_keys))
+        return [n for batch in results for n in batch]
+        
+    async def shutdown(self):
+        """Остановка таймеров групп"""
+        for task in self.group_flush_tasks.values():
+            task.cancel()
+        self.group_flush_tasks.clear()
         
     async def send_notification(self, group_id: str,
                                receiver_name: str,
-                               channel: NotificationChannel) -> Notification:
+                               channel: NotificationChannel,
+                               firing_alerts: int = 0,
+                               resolved_alerts: int = 0) -> Notification:
         """Отправка уведомления"""
         notification = Notification(
             notification_id=f"ntf_{uuid.uuid4().hex[:8]}",
             group_id=group_id,
             receiver=receiver_name,
-            channel=channel
+            channel=channel,
+            firing_alerts=firing_alerts,
+            resolved_alerts=resolved_alerts
         )
         
         # Simulate sending
@@ -902,6 +1192,7 @@ class AlertManagerPlatform:
         return {
             "total_alerts": len(self.alerts),
             "firing_alerts": firing_alerts,
+            "deduplicated_alerts": self.deduplicated_alerts,
             "alerts_by_severity": alerts_by_severity,
             "total_groups": len(self.alert_groups),
             "total_routes": len(self.routes),
@@ -1032,7 +1323,7 @@ async def main():
     ]
     
     for receiver, match, group_by in routes_data:
-        await platform.create_route(receiver, match, group_by=group_by)
+        await platform.create_route(receiver, match, group_by=group_by, group_wait="1s", group_interval="2s")
         severity = match.get("severity", "any")
         print(f"  🛤️ {severity} → {receiver}")
         
@@ -1091,15 +1382,22 @@ async def main():
         
     print(f"  🚨 Generated {len(alerts)} alerts")
     
+    # Alert storm: every alert re-fires while the group waits
+    for _ in range(50):
+        for labels, severity in alerts_data:
+            await platform.create_alert(labels, severity=severity)
+            
+    print(f"  🔁 Deduplicated {platform.deduplicated_alerts} re-fired alerts ({len(platform.alerts)} unique)")
+    
     # Send Notifications
-    print("\n📤 Sending Notifications...")
+    print("\n📤 Sending Notifications (group_wait=1s)...")
+    
+    await asyncio.sleep(1.5)
     
-    for group in list(platform.alert_groups.values())[:5]:
-        for channel in [NotificationChannel.SLACK, NotificationChannel.EMAIL]:
-            await platform.send_notification(group.group_id, group.receiver, channel)
-            
     successful = sum(1 for n in platform.notifications.values() if n.status == "sent")
-    print(f"  📤 Sent {successful}/{len(platform.notifications)} notifications")
+    print(f"  📤 Sent {successful}/{len(platform.notifications)} notifications for {len(platform.alert_groups)} groups")
+    for group in list(platform.alert_groups.values())[:4]:
+        print(f"    {group.receiver}: {group.group_labels} → {len(group.notified_firing)} firing")
     
     # Create Incidents
     print("\n🔥 Creating Incidents...")
@@ -1137,6 +1435,11 @@ async def main():
     for alert in alerts[:3]:
         await platform.resolve_alert(alert.alert_id)
         
+    # Resolved notifications go out with the next group_interval batch
+    resolved_notifications = await platform.flush_pending_notifications()
+    print(f"  📤 Sent {len(resolved_notifications)} resolved notifications")
+    await platform.shutdown()
+        
     # Collect Metrics
     metrics = await platform.collect_metrics()
     
@@ -1230,5 +1533,67 @@ async def main():
     print("=" * 60)
 
 
+def benchmark_alert_manager(unique_alerts: int = 5000, refires: int = 10,
+                            silences: int = 500) -> Dict[str, Any]:
+    """Бенчмарк: шторм алертов с дедупликацией, подавлением и ингибированием"""
+    
+    async def run() -> Dict[str, Any]:
+        platform = AlertManagerPlatform()
+        rng = random.Random(11)
+        
+        await platform.create_receiver("oncall", slack_configs=[{"channel": "#oncall"}])
+        await platform.create_route("oncall", group_by=["alertname", "service"], group_wait="1h", group_interval="1h")
+        await platform.create_inhibition_rule({"severity": "critical"}, {"severity": "warning"}, ["alertname", "service"])
+        
+        now = datetime.now()
+        for i in range(silences):
+            await platform.create_silence([{"name": "instance", "value": f"host-{i}"},
+                                           {"name": "alertname", "value": "Alert.*", "isRegex": True}],
+                                          now, now + timedelta(hours=1))
+            
+        label_sets = [{
+            "alertname": f"Alert{i % 50}",
+            "service": f"svc-{i % 40}",
+            "instance": f"host-{i}",
+            "severity": "critical" if i % 7 == 0 else "warning"
+        } for i in range(unique_alerts)]
+        stream = [labels for labels in label_sets for _ in range(refires)]
+        rng.shuffle(stream)
+        
+        started = time.perf_counter()
+        for labels in stream:
+            await platform.create_alert(labels)
+        ingest_seconds = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        silenced = inhibited = 0
+        for alert in platform.alerts.values():
+            silenced += await platform.is_silenced(alert)
+            inhibited += await platform.is_inhibited(alert)
+        check_seconds = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        notifications = await platform.flush_pending_notifications()
+        flush_seconds = time.perf_counter() - started
+        await platform.shutdown()
+        
+        return {
+            "alerts_received": len(stream),
+            "unique_alerts": len(platform.alerts),
+            "ingest_alerts_per_second": round(len(stream) / ingest_seconds, 1),
+            "silence_inhibit_checks_per_second": round(2 * len(platform.alerts) / check_seconds, 1),
+            "silenced": silenced,
+            "inhibited": inhibited,
+            "groups": len(platform.alert_groups),
+            "notifications": len(notifications),
+            "flush_seconds": round(flush_seconds, 3)
+        }
+        
+    return asyncio.run(run())
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    if "--benchmark" in sys.argv:
+        print(json.dumps(benchmark_alert_manager(), indent=2))
+    else:
+        asyncio.run(main())
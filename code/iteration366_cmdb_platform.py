@@ -15,7 +15,11 @@ Server Init - Iteration 366: CMDB Platform
 """
 
 import asyncio
+import json
+import os
 import random
+import sys
+import time
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
 from typing import Dict, List, Optional, Any, Set, Tuple
@@ -359,6 +363,20 @@ class CMDBPlatform:
         self.violations: Dict[str, ComplianceViolation] = {}
         self.discovery_jobs: Dict[str, DiscoveryJob] = {}
         
+        # Adjacency indexes: ci_id -> relationship type -> {relationship_id: Relationship}
+        self.outgoing: Dict[str, Dict[RelationshipType, Dict[str, Relationship]]] = {}
+        self.incoming: Dict[str, Dict[RelationshipType, Dict[str, Relationship]]] = {}
+        
+        # Identity index for discovery upserts: (ci_type, name) -> ci_id
+        self.ci_keys: Dict[Tuple[CIType, str], str] = {}
+        
+        # Cached DEPENDS_ON closures of tier-1 services
+        self.critical_services: Set[str] = set()
+        self.closure_cache: Dict[str, Set[str]] = {}  # service ci_id -> dependency ci_ids
+        self.closure_members: Dict[str, Set[str]] = {}  # ci_id -> cached services depending on it
+        self.closure_hits = 0
+        self.closure_misses = 0
+        
         # Initialize default classes
         self._init_default_classes()
         
@@ -442,6 +460,8 @@ class CMDBPlatform:
                 )
                 
         self.cis[ci.ci_id] = ci
+        self.ci_keys[(ci.ci_type, ci.name)] = ci.ci_id
+        self._refresh_critical(ci)
         
         # Record change
         await self._record_change(ci.ci_id, ChangeType.CREATE, "ci", None, ci.name, "system")
@@ -456,12 +476,18 @@ class CMDBPlatform:
         if not ci:
             return None
             
+        if self.ci_keys.get((ci.ci_type, ci.name)) == ci_id:
+            del self.ci_keys[(ci.ci_type, ci.name)]
+            
         for field_name, new_value in updates.items():
             old_value = getattr(ci, field_name, None)
             if hasattr(ci, field_name):
                 setattr(ci, field_name, new_value)
                 await self._record_change(ci_id, ChangeType.UPDATE, field_name, old_value, new_value, changed_by)
                 
+        self.ci_keys[(ci.ci_type, ci.name)] = ci_id
+        self._refresh_critical(ci)
+        
         ci.updated_at = datetime.now()
         return ci
         
@@ -484,6 +510,7 @@ class CMDBPlatform:
         )
         
         ci.updated_at = datetime.now()
+        self._refresh_critical(ci)
         
         await self._record_change(ci_id, ChangeType.UPDATE, f"attr:{attr_name}", old_val, attr_value, changed_by)
         
@@ -497,10 +524,20 @@ class CMDBPlatform:
         ci = self.cis[ci_id]
         
         # Remove relationships
-        to_remove = [r_id for r_id, r in self.relationships.items()
-                     if r.source_ci_id == ci_id or r.target_ci_id == ci_id]
-        for r_id in to_remove:
-            del self.relationships[r_id]
+        to_remove = {}
+        for index in (self.outgoing, self.incoming):
+            for by_id in index.get(ci_id, {}).values():
+                to_remove.update(by_id)
+        for rel in to_remove.values():
+            self._unindex_relationship(rel)
+            del self.relationships[rel.relationship_id]
+            
+        self.outgoing.pop(ci_id, None)
+        self.incoming.pop(ci_id, None)
+        self._drop_closure(ci_id)
+        self.critical_services.discard(ci_id)
+        if self.ci_keys.get((ci.ci_type, ci.name)) == ci_id:
+            del self.ci_keys[(ci.ci_type, ci.name)]
             
         # Record change
         await self._record_change(ci_id, ChangeType.DELETE, "ci", ci.name, None, deleted_by)
@@ -527,7 +564,19 @@ class CMDBPlatform:
         )
         
         self.relationships[relationship.relationship_id] = relationship
+        self._index_relationship(relationship)
         
+        # Extend cached closures that reach the new edge
+        if relationship_type == RelationshipType.DEPENDS_ON:
+            roots = self._closure_roots([source_ci_id])
+            if roots:
+                added = self._compute_closure(target_ci_id) | {target_ci_id}
+                for root in roots:
+                    members = added - self.closure_cache[root] - {root}
+                    self.closure_cache[root] |= members
+                    for member in members:
+                        self.closure_members.setdefault(member, set()).add(root)
+                        
         # Record change
         await self._record_change(
             source_ci_id,
@@ -557,8 +606,120 @@ class CMDBPlatform:
         )
         
         del self.relationships[relationship_id]
+        self._unindex_relationship(rel)
         return True
         
+    def _index_relationship(self, rel: Relationship):
+        """Добавление связи в индексы смежности"""
+        self.outgoing.setdefault(rel.source_ci_id, {}).setdefault(rel.relationship_type, {})[rel.relationship_id] = rel
+        self.incoming.setdefault(rel.target_ci_id, {}).setdefault(rel.relationship_type, {})[rel.relationship_id] = rel
+        
+    def _unindex_relationship(self, rel: Relationship):
+        """Удаление связи из индексов смежности"""
+        for index, ci_id in ((self.outgoing, rel.source_ci_id), (self.incoming, rel.target_ci_id)):
+            by_type = index.get(ci_id)
+            if not by_type:
+                continue
+            by_id = by_type.get(rel.relationship_type)
+            if by_id:
+                by_id.pop(rel.relationship_id, None)
+                if not by_id:
+                    del by_type[rel.relationship_type]
+                    
+        # Removing an edge can shrink closures: drop the affected ones only
+        if rel.relationship_type == RelationshipType.DEPENDS_ON:
+            for root in self._closure_roots([rel.source_ci_id]):
+                self._drop_closure(root)
+                
+    def _refresh_critical(self, ci: ConfigurationItem):
+        """Учет tier-1 сервисов"""
+        tier = ci.attributes.get("tier")
+        if ci.ci_type == CIType.SERVICE and tier and tier.value == 1:
+            self.critical_services.add(ci.ci_id)
+        else:
+            self.critical_services.discard(ci.ci_id)
+            self._drop_closure(ci.ci_id)
+            
+    def _closure_roots(self, ci_ids: List[str]) -> Set[str]:
+        """Кэшированные замыкания, содержащие CI"""
+        roots: Set[str] = set()
+        for ci_id in ci_ids:
+            roots |= self.closure_members.get(ci_id, set())
+            if ci_id in self.closure_cache:
+                roots.add(ci_id)
+        return roots
+        
+    def _drop_closure(self, root: str):
+        """Инвалидация замыкания"""
+        members = self.closure_cache.pop(root, None)
+        if members is None:
+            return
+            
+        for member in members:
+            roots = self.closure_members.get(member)
+            if roots:
+                roots.discard(root)
+                if not roots:
+                    del self.closure_members[member]
+                    
+    def _compute_closure(self, ci_id: str) -> Set[str]:
+        """Транзитивные зависимости CI (BFS)"""
+        cached = self.closure_cache.get(ci_id)
+        if cached is not None:
+            return set(cached)
+            
+        visited = {ci_id}
+        closure: Set[str] = set()
+        frontier = [ci_id]
+        
+        while frontier:
+            next_frontier = []
+            for current in frontier:
+                for rel in self.outgoing.get(current, {}).get(RelationshipType.DEPENDS_ON, {}).values():
+                    target = rel.target_ci_id
+                    if target in visited:
+                        continue
+                    visited.add(target)
+                    closure.add(target)
+                    
+                    # A cached closure is exact: reuse it instead of expanding
+                    sub_closure = self.closure_cache.get(target)
+                    if sub_closure is not None:
+                        new = sub_closure - visited
+                        visited |= new
+                        closure |= new
+                    else:
+                        next_frontier.append(target)
+            frontier = next_frontier
+            
+        closure.discard(ci_id)
+        return closure
+        
+    async def get_dependency_closure(self, ci_id: str) -> Set[str]:
+        """Транзитивные зависимости CI (кэш для tier-1 сервисов)"""
+        cached = self.closure_cache.get(ci_id)
+        if cached is not None:
+            self.closure_hits += 1
+            return set(cached)
+            
+        self.closure_misses += 1
+        closure = self._compute_closure(ci_id)
+        
+        if ci_id in self.critical_services:
+            self.closure_cache[ci_id] = set(closure)
+            for member in closure:
+                self.closure_members.setdefault(member, set()).add(ci_id)
+                
+        return closure
+        
+    async def get_impacted_critical_services(self, ci_id: str) -> List[str]:
+        """Tier-1 сервисы, транзитивно зависящие от CI"""
+        for service_id in self.critical_services:
+            if service_id not in self.closure_cache:
+                await self.get_dependency_closure(service_id)
+                
+        return sorted(self.closure_members.get(ci_id, set()) & self.critical_services)
+        
     async def _record_change(self, ci_id: str,
                             change_type: ChangeType,
                             field_name: str,
@@ -582,64 +743,56 @@ class CMDBPlatform:
                                relationship_type: RelationshipType = None,
                                direction: str = "both") -> List[Relationship]:
         """Получение связей CI"""
-        results = []
+        results: Dict[str, Relationship] = {}
         
-        for rel in self.relationships.values():
-            if direction in ["outgoing", "both"] and rel.source_ci_id == ci_id:
-                if relationship_type is None or rel.relationship_type == relationship_type:
-                    results.append(rel)
-                    
-            if direction in ["incoming", "both"] and rel.target_ci_id == ci_id:
-                if relationship_type is None or rel.relationship_type == relationship_type:
-                    results.append(rel)
-                    
-            if rel.is_bidirectional and direction == "both":
-                if rel.target_ci_id == ci_id or rel.source_ci_id == ci_id:
-                    if rel not in results:
-                        if relationship_type is None or rel.relationship_type == relationship_type:
-                            results.append(rel)
-                            
-        return results
+        indexes = []
+        if direction in ["outgoing", "both"]:
+            indexes.append(self.outgoing)
+        if direction in ["incoming", "both"]:
+            indexes.append(self.incoming)
+            
+        for index in indexes:
+            by_type = index.get(ci_id, {})
+            if relationship_type is None:
+                for by_id in by_type.values():
+                    results.update(by_id)
+            else:
+                results.update(by_type.get(relationship_type, {}))
+                
+        return list(results.values())
         
     async def analyze_impact(self, ci_id: str,
                             impact_type: str = "failure",
                             depth: int = 3) -> ImpactReport:
         """Анализ влияния"""
-        directly_affected: Set[str] = set()
-        indirectly_affected: Set[str] = set()
+        directly_affected: List[str] = []
+        indirectly_affected: List[str] = []
         
-        # Find directly dependent CIs
-        for rel in self.relationships.values():
-            if rel.target_ci_id == ci_id and rel.relationship_type == RelationshipType.DEPENDS_ON:
-                directly_affected.add(rel.source_ci_id)
+        # Single BFS over incoming DEPENDS_ON edges, level by level
+        visited = {ci_id}
+        frontier = [ci_id]
+        for level in range(depth):
+            next_level: List[str] = []
+            for current in frontier:
+                for rel in self.incoming.get(current, {}).get(RelationshipType.DEPENDS_ON, {}).values():
+                    if rel.source_ci_id not in visited:
+                        visited.add(rel.source_ci_id)
+                        next_level.append(rel.source_ci_id)
+                        
+            (directly_affected if level == 0 else indirectly_affected).extend(next_level)
+            frontier = next_level
+            if not frontier:
+                break
                 
-        # Find indirectly affected (cascade)
-        current_level = directly_affected.copy()
-        for _ in range(depth - 1):
-            next_level: Set[str] = set()
-            for affected_ci in current_level:
-                for rel in self.relationships.values():
-                    if rel.target_ci_id == affected_ci and rel.relationship_type == RelationshipType.DEPENDS_ON:
-                        if rel.source_ci_id not in directly_affected:
-                            next_level.add(rel.source_ci_id)
-            indirectly_affected.update(next_level)
-            current_level = next_level
-            
         # Count critical services
-        critical_count = 0
-        for ci_id in directly_affected | indirectly_affected:
-            ci = self.cis.get(ci_id)
-            if ci and ci.ci_type == CIType.SERVICE:
-                tier = ci.attributes.get("tier")
-                if tier and tier.value == 1:
-                    critical_count += 1
-                    
+        critical_count = sum(1 for affected in visited if affected != ci_id and affected in self.critical_services)
+        
         return ImpactReport(
             report_id=f"imp_{uuid.uuid4().hex[:8]}",
             source_ci_id=ci_id,
             impact_type=impact_type,
-            directly_affected=list(directly_affected),
-            indirectly_affected=list(indirectly_affected),
+            directly_affected=directly_affected,
+            indirectly_affected=indirectly_affected,
             total_affected=len(directly_affected) + len(indirectly_affected),
             critical_services_affected=critical_count
         )
@@ -723,9 +876,173 @@ class CMDBPlatform:
             
         return violations
         
+    async def bulk_import(self, cis: List[Dict[str, Any]],
+                         relationships: List[Dict[str, Any]] = None,
+                         source: DiscoverySource = DiscoverySource.SCANNER,
+                         changed_by: str = "discovery") -> Dict[str, int]:
+        """Пакетный импорт результатов обнаружения"""
+        now = datetime.now()
+        changes: List[ChangeRecord] = []
+        touched: Dict[str, str] = {}  # name -> ci_id within this batch
+        created = updated = 0
+        
+        ci_ids = iter(self._generate_ids("ci", len(cis), self.cis))
+        rel_ids = iter(self._generate_ids("rel", len(relationships or []), self.relationships))
+        
+        # Upsert CIs by (ci_type, name)
+        for spec in cis:
+            ci_type = spec.get("ci_type", CIType.SERVER)
+            name = spec["name"]
+            attributes = spec.get("attributes") or {}
+            
+            ci_id = self.ci_keys.get((ci_type, name))
+            ci = self.cis.get(ci_id) if ci_id else None
+            
+            if ci is None:
+                ci = ConfigurationItem(
+                    ci_id=next(ci_ids),
+                    name=name,
+                    display_name=name,
+                    description=spec.get("description", ""),
+                    ci_type=ci_type,
+                    ci_class=spec.get("ci_class", ""),
+                    environment=spec.get("environment", "production"),
+                    location=spec.get("location", ""),
+                    owner_team=spec.get("owner_team", ""),
+                    tags=list(spec.get("tags", [])),
+                    discovery_source=source,
+                    last_discovered=now
+                )
+                for attr_name, attr_value in attributes.items():
+                    ci.attributes[attr_name] = Attribute(
+                        attr_id=f"attr_{uuid.uuid4().hex[:8]}",
+                        name=attr_name,
+                        value=attr_value,
+                        source=source,
+                        last_updated=now
+                    )
+                    
+                self.cis[ci.ci_id] = ci
+                self.ci_keys[(ci_type, name)] = ci.ci_id
+                changes.append(ChangeRecord(
+                    change_id="",
+                    ci_id=ci.ci_id,
+                    change_type=ChangeType.CREATE,
+                    field_name="ci",
+                    new_value=name,
+                    changed_by=changed_by
+                ))
+                created += 1
+            else:
+                changed = False
+                for attr_name, attr_value in attributes.items():
+                    old = ci.attributes.get(attr_name)
+                    if old is not None and old.value == attr_value:
+                        continue
+                    ci.attributes[attr_name] = Attribute(
+                        attr_id=f"attr_{uuid.uuid4().hex[:8]}",
+                        name=attr_name,
+                        value=attr_value,
+                        source=source,
+                        last_updated=now
+                    )
+                    changes.append(ChangeRecord(
+                        change_id="",
+                        ci_id=ci.ci_id,
+                        change_type=ChangeType.UPDATE,
+                        field_name=f"attr:{attr_name}",
+                        old_value=old.value if old else None,
+                        new_value=attr_value,
+                        changed_by=changed_by
+                    ))
+                    changed = True
+                    
+                ci.last_discovered = now
+                if changed:
+                    ci.updated_at = now
+                    updated += 1
+                    
+            self._refresh_critical(ci)
+            touched[name] = ci.ci_id
+            
+        # Build relationships first, then apply index updates grouped by CI
+        new_relationships: List[Relationship] = []
+        for spec in relationships or []:
+            source_id = spec["source"] if spec["source"] in self.cis else touched.get(spec["source"])
+            target_id = spec["target"] if spec["target"] in self.cis else touched.get(spec["target"])
+            if not source_id or not target_id:
+                continue
+                
+            rel_type = spec.get("relationship_type", RelationshipType.DEPENDS_ON)
+            existing = self.outgoing.get(source_id, {}).get(rel_type, {})
+            if any(r.target_ci_id == target_id for r in existing.values()):
+                continue
+                
+            rel = Relationship(
+                relationship_id=next(rel_ids),
+                source_ci_id=source_id,
+                target_ci_id=target_id,
+                relationship_type=rel_type,
+                description=spec.get("description", "")
+            )
+            self.relationships[rel.relationship_id] = rel
+            # Index immediately so duplicates inside the batch are caught
+            self.outgoing.setdefault(source_id, {}).setdefault(rel_type, {})[rel.relationship_id] = rel
+            new_relationships.append(rel)
+            
+        incoming_updates: Dict[str, List[Relationship]] = {}
+        depends_sources: List[str] = []
+        for rel in new_relationships:
+            incoming_updates.setdefault(rel.target_ci_id, []).append(rel)
+            if rel.relationship_type == RelationshipType.DEPENDS_ON:
+                depends_sources.append(rel.source_ci_id)
+            changes.append(ChangeRecord(
+                change_id="",
+                ci_id=rel.source_ci_id,
+                change_type=ChangeType.RELATIONSHIP_ADD,
+                field_name=f"relationship:{rel.target_ci_id}",
+                new_value=rel.relationship_type.value,
+                changed_by=changed_by
+            ))
+            
+        for target_id, rels in incoming_updates.items():
+            by_type = self.incoming.setdefault(target_id, {})
+            for rel in rels:
+                by_type.setdefault(rel.relationship_type, {})[rel.relationship_id] = rel
+                
+        # One invalidation pass for all closures reaching new edges
+        for root in self._closure_roots(depends_sources):
+            self._drop_closure(root)
+            
+        for change, change_id in zip(changes, self._generate_ids("chg", len(changes))):
+            change.change_id = change_id
+        self.change_history.extend(changes)
+        
+        return {
+            "created": created,
+            "updated": updated,
+            "relationships": len(new_relationships)
+        }
+        
+    @staticmethod
+    def _generate_ids(prefix: str, count: int, taken: Dict[str, Any] = None) -> List[str]:
+        """Пакетная генерация уникальных идентификаторов"""
+        raw = os.urandom(4 * count).hex()
+        ids = []
+        seen: Set[str] = set()
+        for i in range(0, 8 * count, 8):
+            new_id = f"{prefix}_{raw[i:i + 8]}"
+            # 32-bit suffixes collide in large imports: redraw
+            while new_id in seen or (taken is not None and new_id in taken):
+                new_id = f"{prefix}_{uuid.uuid4().hex[:8]}"
+            seen.add(new_id)
+            ids.append(new_id)
+        return ids
+        
     async def run_discovery(self, name: str,
                            source: DiscoverySource,
-                           targets: List[str] = None) -> DiscoveryJob:
+                           targets: List[str] = None,
+                           results: Dict[str, List[Dict[str, Any]]] = None) -> DiscoveryJob:
         """Запуск обнаружения"""
         job = DiscoveryJob(
             job_id=f"dsc_{uuid.uuid4().hex[:8]}",
@@ -738,12 +1055,17 @@ class CMDBPlatform:
         
         self.discovery_jobs[job.job_id] = job
         
-        # Simulate discovery
-        await asyncio.sleep(0.1)
-        
-        # Simulate discovered CIs
-        job.discovered_cis = random.randint(5, 20)
-        job.updated_cis = random.randint(0, job.discovered_cis // 2)
+        if results is not None:
+            imported = await self.bulk_import(results.get("cis", []), results.get("relationships", []), source)
+            job.discovered_cis = imported["created"]
+            job.updated_cis = imported["updated"]
+        else:
+            # Simulate discovery
+            await asyncio.sleep(0.1)
+            
+            # Simulate discovered CIs
+            job.discovered_cis = random.randint(5, 20)
+            job.updated_cis = random.randint(0, job.discovered_cis // 2)
         job.status = "completed"
         job.completed_at = datetime.now()
         
@@ -804,9 +1126,10 @@ class CMDBPlatform:
             env = ci.environment or "unknown"
             by_environment[env] = by_environment.get(env, 0) + 1
             
-        rel_by_type = {}
-        for rel_type in RelationshipType:
-            rel_by_type[rel_type.value] = sum(1 for r in self.relationships.values() if r.relationship_type == rel_type)
+        rel_by_type = {rel_type.value: 0 for rel_type in RelationshipType}
+        for rels in self.outgoing.values():
+            for rel_type, by_id in rels.items():
+                rel_by_type[rel_type.value] += len(by_id)
             
         open_violations = sum(1 for v in self.violations.values() if v.status == "open")
         
@@ -821,7 +1144,11 @@ class CMDBPlatform:
             "change_history_count": len(self.change_history),
             "policies": len(self.policies),
             "open_violations": open_violations,
-            "discovery_jobs": len(self.discovery_jobs)
+            "discovery_jobs": len(self.discovery_jobs),
+            "critical_services": len(self.critical_services),
+            "cached_closures": len(self.closure_cache),
+            "closure_hits": self.closure_hits,
+            "closure_misses": self.closure_misses
         }
 
 
@@ -982,7 +1309,24 @@ async def main():
     # Run Discovery
     print("\n🔍 Running Discovery...")
     
-    discovery = await platform.run_discovery("Cloud Discovery", DiscoverySource.CLOUD_API, ["us-east-1", "us-west-2"])
+    discovered = {
+        "cis": [
+            {"name": "vm-api-01", "ci_type": CIType.VIRTUAL_MACHINE, "attributes": {"cpu_cores": 8, "memory_gb": 32, "hypervisor": "KVM"}},
+            {"name": "db-primary", "ci_type": CIType.DATABASE, "attributes": {"engine": "PostgreSQL", "version": "15.4", "storage_gb": 500}},
+            {"name": "pgbouncer", "ci_type": CIType.APPLICATION, "ci_class": "application", "location": "us-east-1",
+             "owner_team": "DBA Team", "attributes": {"version": "1.21", "language": "C"}},
+            {"name": "lb-public", "ci_type": CIType.LOAD_BALANCER, "location": "us-east-1",
+             "owner_team": "Network Team", "attributes": {"listeners": 2}}
+        ],
+        "relationships": [
+            {"source": "pgbouncer", "target": databases[0].ci_id, "relationship_type": RelationshipType.DEPENDS_ON},
+            {"source": applications[1].ci_id, "target": "pgbouncer", "relationship_type": RelationshipType.DEPENDS_ON},
+            {"source": "pgbouncer", "target": vms[3].ci_id, "relationship_type": RelationshipType.RUNS_ON},
+            {"source": "lb-public", "target": applications[0].ci_id, "relationship_type": RelationshipType.CONNECTS_TO}
+        ]
+    }
+    
+    discovery = await platform.run_discovery("Cloud Discovery", DiscoverySource.CLOUD_API, ["us-east-1", "us-west-2"], discovered)
     print(f"  🔍 Discovered: {discovery.discovered_cis} CIs")
     print(f"  🔄 Updated: {discovery.updated_cis} CIs")
     
@@ -996,11 +1340,24 @@ async def main():
     
     # Show affected CIs
     print("\n  Affected CIs:")
-    for ci_id in impact.directly_affected:
+    for ci_id in impact.directly_affected + impact.indirectly_affected:
         ci = platform.cis.get(ci_id)
         if ci:
             print(f"    → {ci.name} ({ci.ci_type.value})")
             
+    # Tier-1 dependency closures
+    print("\n🧭 Tier-1 Service Dependencies...")
+    
+    closure = await platform.get_dependency_closure(services[0].ci_id)
+    print(f"  🧭 {services[0].name}: {len(closure)} transitive dependencies")
+    
+    impacted = await platform.get_impacted_critical_services(databases[0].ci_id)
+    print(f"  ⚠️ Tier-1 services depending on {databases[0].name}: {', '.join(platform.cis[s].name for s in impacted)}")
+    
+    await platform.create_relationship(applications[1].ci_id, databases[2].ci_id, RelationshipType.DEPENDS_ON)
+    closure = await platform.get_dependency_closure(services[0].ci_id)
+    print(f"  🧭 After new edge to {databases[2].name}: {len(closure)} dependencies (cache hits: {platform.closure_hits})")
+            
     # Collect Metrics
     metrics = await platform.collect_metrics()
     
@@ -1101,5 +1458,63 @@ async def main():
     print("=" * 60)
 
 
+def benchmark_cmdb(services: int = 500, apps_per_service: int = 20,
+                   cis_total: int = 100000, relationships_total: int = 400000) -> Dict[str, Any]:
+    """Бенчмарк: bulk import, анализ влияния и кэш замыканий"""
+    
+    async def run() -> Dict[str, Any]:
+        platform = CMDBPlatform()
+        rng = random.Random(7)
+        
+        service_specs = [{"name": f"svc-{i}", "ci_type": CIType.SERVICE, "attributes": {"tier": 1 if i % 10 == 0 else 2}}
+                         for i in range(services)]
+        other_specs = [{"name": f"ci-{i}", "ci_type": CIType.APPLICATION} for i in range(cis_total - services)]
+        
+        # Layered DAG: services -> apps -> lower layers
+        relationships = []
+        for i in range(services):
+            for _ in range(apps_per_service):
+                relationships.append({"source": f"svc-{i}", "target": f"ci-{rng.randrange(len(other_specs) // 10)}"})
+        while len(relationships) < relationships_total:
+            a = rng.randrange(len(other_specs) - 1)
+            b = rng.randrange(a + 1, min(len(other_specs), a + 1 + len(other_specs) // 10))
+            relationships.append({"source": f"ci-{a}", "target": f"ci-{b}",
+                                  "relationship_type": RelationshipType.DEPENDS_ON if rng.random() < 0.25 else RelationshipType.CONNECTS_TO})
+            
+        started = time.perf_counter()
+        imported = await platform.bulk_import(service_specs + other_specs, relationships)
+        import_seconds = time.perf_counter() - started
+        
+        targets = [platform.ci_keys[(CIType.APPLICATION, f"ci-{rng.randrange(len(other_specs))}")] for _ in range(200)]
+        started = time.perf_counter()
+        for ci_id in targets:
+            await platform.analyze_impact(ci_id, depth=3)
+        impact_ms = (time.perf_counter() - started) * 1000 / len(targets)
+        
+        started = time.perf_counter()
+        await platform.get_impacted_critical_services(targets[0])
+        warm_seconds = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        for ci_id in targets:
+            await platform.get_impacted_critical_services(ci_id)
+        cached_ms = (time.perf_counter() - started) * 1000 / len(targets)
+        
+        return {
+            "cis": len(platform.cis),
+            "relationships": imported["relationships"],
+            "bulk_import_seconds": round(import_seconds, 3),
+            "impact_analysis_ms": round(impact_ms, 3),
+            "tier1_closure_warmup_seconds": round(warm_seconds, 3),
+            "cached_critical_lookup_ms": round(cached_ms, 4),
+            "cached_closures": len(platform.closure_cache)
+        }
+        
+    return asyncio.run(run())
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    if "--benchmark" in sys.argv:
+        print(json.dumps(benchmark_cmdb(), indent=2))
+    else:
+        asyncio.run(main())
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Tests for alert fingerprint dedup, indexed silences and inhibition rules,
+and batched group notifications
+"""
+
+import unittest
+import asyncio
+import random
+import re
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from iteration361_alert_manager import (
+    AlertManagerPlatform, AlertState, NotificationChannel, parse_duration, alert_fingerprint
+)
+
+
+SERVICES = ["api", "db", "cache"]
+SEVERITIES = ["critical", "warning", "info"]
+CLUSTERS = ["eu", "us"]
+
+
+def random_labels(rng: random.Random) -> dict:
+    return {"alertname": rng.choice(["HighLatency", "Down", "DiskFull"]),
+            "service": rng.choice(SERVICES), "severity": rng.choice(SEVERITIES),
+            "cluster": rng.choice(CLUSTERS)}
+
+
+def matches(labels: dict, match: dict, match_re: dict = None) -> bool:
+    return all(labels.get(k, "") == v for k, v in match.items()) and \
+        all(re.match(v, labels.get(k, "")) for k, v in (match_re or {}).items())
+
+
+class TestHelpers(unittest.TestCase):
+    """Длительности и отпечатки"""
+
+    def test_parse_duration(self):
+        self.assertEqual([parse_duration(v) for v in ("30s", "5m", "4h", "1d", "250ms", "1.5m")],
+                         [30, 300, 14400, 86400, 0.25, 90])
+        with self.assertRaises(ValueError):
+            parse_duration("5 minutes")
+
+    def test_fingerprint_ignores_label_order(self):
+        self.assertEqual(alert_fingerprint({"a": "1", "b": "2"}), alert_fingerprint({"b": "2", "a": "1"}))
+        self.assertNotEqual(alert_fingerprint({"a": "1"}), alert_fingerprint({"a": "2"}))
+        self.assertEqual(len(alert_fingerprint({})), 16)
+
+
+class TestMatchingIndexes(unittest.IsolatedAsyncioTestCase):
+    """Индексированные подавления и ингибирование совпадают с перебором"""
+
+    async def asyncSetUp(self):
+        self.platform = AlertManagerPlatform()
+        self.addAsyncCleanup(self.platform.shutdown)
+
+    async def test_silences_match_brute_force(self):
+        rng = random.Random(6)
+        now = datetime.now()
+        specs = []
+        for n in range(12):
+            matchers = [{"name": "service", "value": rng.choice(SERVICES)}]
+            if rng.random() < 0.6:
+                matchers.append({"name": "severity", "value": rng.choice(["crit.*", "warn.*", "(info|warning)"]),
+                                 "isRegex": True})
+            if rng.random() < 0.5:
+                matchers.append({"name": "cluster", "value": rng.choice(CLUSTERS + [""])})
+            active = rng.random() < 0.7
+            silence = await self.platform.create_silence(
+                matchers, now - timedelta(hours=1), now + timedelta(hours=1 if active else -0.5))
+            specs.append((silence, matchers, active))
+        for silence, _, _ in specs[::5]:
+            await self.platform.expire_silence(silence.silence_id)
+
+        outcomes = set()
+        for _ in range(200):
+            alert = await self.platform.create_alert(random_labels(rng))
+            expected = any(
+                active and silence.status == "active" and all(
+                    re.match(m["value"], alert.labels.get(m["name"], "")) if m.get("isRegex")
+                    else alert.labels.get(m["name"], "") == m["value"] for m in matchers)
+                for silence, matchers, active in specs)
+            self.assertEqual(await self.platform.is_silenced(alert), expected, alert.labels)
+            outcomes.add(expected)
+        self.assertEqual(outcomes, {True, False})
+
+    async def test_inhibition_matches_brute_force(self):
+        rng = random.Random(12)
+        rules = [({"severity": "critical"}, {"severity": "warning"}, ["service"], {}),
+                 ({"alertname": "Down"}, {}, ["cluster"], {"severity": "warn.*|info"}),
+                 ({"severity": "critical", "service": "db"}, {"service": "api"}, [], {})]
+        # Часть правил создаётся после алертов: текущие источники индексируются при создании
+        for source, target, equal, target_re in rules[:2]:
+            await self.platform.create_inhibition_rule(source, target, equal, target_match_re=target_re)
+        alerts = [await self.platform.create_alert(random_labels(rng)) for _ in range(40)]
+        for source, target, equal, target_re in rules[2:]:
+            await self.platform.create_inhibition_rule(source, target, equal, target_match_re=target_re)
+
+        def expected(alert):
+            firing = [a for a in alerts if a.state == AlertState.FIRING]
+            for source, target, equal, target_re in rules:
+                if not matches(alert.labels, target, target_re):
+                    continue
+                if any(a is not alert and matches(a.labels, source)
+                       and all(a.labels.get(k) == alert.labels.get(k) for k in equal) for a in firing):
+                    return True
+            return False
+
+        for step in range(6):
+            for alert in alerts:
+                self.assertEqual(await self.platform.is_inhibited(alert), expected(alert), alert.labels)
+            for alert in rng.sample(alerts, 10):
+                if alert.state == AlertState.FIRING:
+                    await self.platform.resolve_alert(alert.alert_id)
+                else:
+                    await self.platform.create_alert(alert.labels)
+
+    async def test_alert_does_not_inhibit_itself(self):
+        await self.platform.create_inhibition_rule({"service": "db"}, {"service": "db"})
+        first = await self.platform.create_alert({"alertname": "A", "service": "db"})
+        self.assertFalse(await self.platform.is_inhibited(first))
+        second = await self.platform.create_alert({"alertname": "B", "service": "db"})
+        self.assertTrue(await self.platform.is_inhibited(first))
+        await self.platform.resolve_alert(second.alert_id)
+        self.assertFalse(await self.platform.is_inhibited(first))
+
+
+class TestGroupNotifications(unittest.IsolatedAsyncioTestCase):
+    """Дедупликация и пакетные уведомления групп"""
+
+    async def asyncSetUp(self):
+        self.platform = AlertManagerPlatform()
+        self.addAsyncCleanup(self.platform.shutdown)
+        await self.platform.create_receiver("team", email_configs=[{"to": "a@b"}], slack_configs=[{"channel": "#x"}])
+        self.route = await self.platform.create_route("team", group_by=["service"], group_wait="1h",
+                                                      group_interval="1h", repeat_interval="4h")
+
+    async def test_refire_is_deduplicated(self):
+        labels = {"alertname": "Down", "service": "api"}
+        first = await self.platform.create_alert(labels)
+        again = await self.platform.create_alert(dict(reversed(list(labels.items()))), annotations={"n": "2"})
+        self.assertIs(first, again)
+        self.assertEqual((len(self.platform.alerts), self.platform.deduplicated_alerts), (1, 1))
+        self.assertEqual(again.annotations, {"n": "2"})
+        group = next(iter(self.platform.alert_groups.values()))
+        self.assertEqual(group.alerts, [first.alert_id])
+
+    async def test_one_notification_per_channel_per_batch(self):
+        alerts = [await self.platform.create_alert({"alertname": f"A{i}", "service": "api", "env": "prod"})
+                  for i in range(5)]
+        await self.platform.create_alert({"alertname": "B", "service": "db"})
+        self.assertEqual(len(self.platform.group_flush_tasks), 2)
+
+        sent = await self.platform.flush_pending_notifications()
+        by_group = {}
+        for notification in sent:
+            by_group.setdefault(notification.group_id, []).append(notification)
+        self.assertEqual(len(by_group), 2)
+        api_group = next(g for g in self.platform.alert_groups.values() if g.group_labels == {"service": "api"})
+        api_sent = by_group[api_group.group_id]
+        self.assertEqual({n.channel for n in api_sent}, {NotificationChannel.EMAIL, NotificationChannel.SLACK})
+        self.assertTrue(all((n.firing_alerts, n.resolved_alerts) == (5, 0) for n in api_sent))
+        self.assertEqual(api_group.common_labels, {"service": "api", "env": "prod"})
+
+        # Без изменений повторная отправка не выполняется
+        self.assertEqual(await self.platform.flush_group(api_group.group_key), [])
+
+        await self.platform.resolve_alert(alerts[0].alert_id)
+        sent = await self.platform.flush_group(api_group.group_key)
+        self.assertEqual([(n.firing_alerts, n.resolved_alerts) for n in sent], [(4, 1), (4, 1)])
+        self.assertEqual(len(api_group.alerts), 4)
+        self.assertEqual(api_group.notification_count, 2)
+
+    async def test_resolved_alert_refires_into_group(self):
+        alert = await self.platform.create_alert({"alertname": "Down", "service": "api"})
+        group = self.platform.alert_groups[next(iter(self.platform.alert_groups))]
+        await self.platform.flush_pending_notifications()
+        await self.platform.resolve_alert(alert.alert_id)
+        await self.platform.flush_pending_notifications()
+        self.assertEqual((group.alerts, group.status), ([], "resolved"))
+
+        await self.platform.create_alert({"alertname": "Down", "service": "api"})
+        self.assertEqual(alert.state, AlertState.FIRING)
+        self.assertEqual(group.alerts, [alert.alert_id])
+        sent = await self.platform.flush_pending_notifications()
+        self.assertEqual(sent[0].firing_alerts, 1)
+
+    async def test_silenced_alerts_are_not_notified(self):
+        now = datetime.now()
+        await self.platform.create_silence([{"name": "service", "value": "api"}],
+                                           now - timedelta(minutes=1), now + timedelta(hours=1))
+        await self.platform.create_alert({"alertname": "Down", "service": "api"})
+        self.assertEqual(await self.platform.flush_pending_notifications(), [])
+
+    async def test_group_wait_timer_and_routes_do_not_share_groups(self):
+        other = await self.platform.create_route("team", group_by=["service"], group_wait="10ms")
+        self.route.match = {"service": "none"}
+        self.platform.route_matchers.pop(self.route.route_id)
+        await self.platform.create_alert({"alertname": "Down", "service": "api"})
+        self.assertTrue(all(key.startswith(other.route_id) for key in self.platform.alert_groups))
+        await asyncio.sleep(0.1)
+        self.assertEqual(len(self.platform.notifications), 2)
+
+    async def test_repeat_interval_resends(self):
+        self.route.repeat_interval = "0s"
+        await self.platform.create_alert({"alertname": "Down", "service": "api"})
+        first = await self.platform.flush_pending_notifications()
+        group_key = next(iter(self.platform.alert_groups))
+        again = await self.platform.flush_group(group_key)
+        self.assertEqual((len(first), len(again)), (2, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
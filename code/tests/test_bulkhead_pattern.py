@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Tests for Bulkhead priority wait queue, thread-pool bulkheads and adaptive limits
+"""
+
+import unittest
+import asyncio
+import threading
+import time
+import sys
+import os
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from iteration258_bulkhead_pattern import (
+    BulkheadManager, BulkheadConfig, BulkheadType, RejectionPolicy,
+    FairnessPolicy, LimitMode, PriorityWaitQueue, QueuedTask, AdaptiveLimit
+)
+
+
+def task(name: str, priority: int = 0) -> QueuedTask:
+    return QueuedTask(task_id=name, priority=priority)
+
+
+class TestPriorityWaitQueue(unittest.TestCase):
+    """Порядок выдачи по политике справедливости"""
+
+    def drain(self, queue):
+        order = []
+        while True:
+            item = queue.pop()
+            if item is None:
+                return order
+            order.append(item.task_id)
+
+    def test_fifo_and_lifo(self):
+        for fairness, expected in ((FairnessPolicy.FIFO, ["a", "b", "c"]),
+                                   (FairnessPolicy.LIFO, ["c", "b", "a"])):
+            queue = PriorityWaitQueue(fairness)
+            for name in "abc":
+                queue.push(task(name))
+            self.assertEqual(self.drain(queue), expected)
+
+    def test_priority_is_stable_within_level(self):
+        queue = PriorityWaitQueue(FairnessPolicy.PRIORITY)
+        for name, priority in (("a", 0), ("b", 2), ("c", 1), ("d", 2), ("e", 0)):
+            queue.push(task(name, priority))
+        self.assertEqual(self.drain(queue), ["b", "d", "c", "a", "e"])
+
+    def test_weighted_favours_high_priority_without_starvation(self):
+        queue = PriorityWaitQueue(FairnessPolicy.WEIGHTED)
+        for i in range(6):
+            queue.push(task(f"lo{i}", 0))
+            queue.push(task(f"hi{i}", 2))
+        order = self.drain(queue)
+        first_half = order[:6]
+        self.assertGreater(sum(1 for name in first_half if name.startswith("hi")), 3)
+        self.assertIn("lo0", first_half)
+
+    def test_remove_and_pop_oldest(self):
+        queue = PriorityWaitQueue(FairnessPolicy.PRIORITY)
+        items = [task("a", 0), task("b", 1), task("c", 2)]
+        for item in items:
+            queue.push(item)
+        queue.remove(items[0])
+        self.assertEqual(len(queue), 2)
+        self.assertIs(queue.pop_oldest(), items[1])
+        self.assertEqual(self.drain(queue), ["c"])
+        self.assertEqual(len(queue), 0)
+
+
+class TestAdaptiveLimit(unittest.TestCase):
+    """AIMD и градиентный лимит"""
+
+    def test_aimd_backs_off_on_drop_and_grows_under_load(self):
+        config = BulkheadConfig(config_id="c", name="c", max_concurrent=10,
+                                limit_mode=LimitMode.AIMD, max_concurrent_limit=50)
+        limit = AdaptiveLimit(config)
+        for _ in range(10):
+            limit.on_sample(5.0, 10, False)
+        self.assertGreater(limit.limit, 10)
+        grown = limit.limit
+        for _ in range(20):
+            limit.on_sample(5.0, 10, True)
+        self.assertLess(limit.limit, grown)
+
+    def test_gradient_shrinks_when_latency_rises(self):
+        config = BulkheadConfig(config_id="c", name="c", max_concurrent=20,
+                                limit_mode=LimitMode.GRADIENT, min_concurrent=2)
+        limit = AdaptiveLimit(config)
+        limit.on_sample(10.0, 20, False)
+        for _ in range(15):
+            limit.on_sample(60.0, 20, False)
+        self.assertLess(limit.limit, 20)
+        self.assertGreaterEqual(limit.limit, 2)
+
+
+class TestBulkheadExecute(unittest.IsolatedAsyncioTestCase):
+    """Выполнение операций через bulkhead"""
+
+    async def asyncSetUp(self):
+        self.manager = BulkheadManager()
+
+    async def asyncTearDown(self):
+        self.manager.shutdown()
+
+    def create(self, name, bulkhead_type=BulkheadType.SEMAPHORE, max_concurrent=2,
+               rejection=RejectionPolicy.QUEUE, fairness=FairnessPolicy.FIFO, max_wait_ms=2000):
+        self.manager.create_config(name, bulkhead_type, max_concurrent, max_wait_ms, 100,
+                                   rejection, fairness)
+        return self.manager.create_bulkhead(name, name)
+
+    async def test_reject_when_full(self):
+        self.create("api", rejection=RejectionPolicy.REJECT, max_concurrent=1)
+        gate = asyncio.Event()
+
+        async def hold():
+            await gate.wait()
+
+        first = asyncio.create_task(self.manager.execute("api", hold))
+        await asyncio.sleep(0)
+        rejected = await self.manager.execute("api", hold)
+        self.assertTrue(rejected.was_rejected)
+        gate.set()
+        self.assertTrue((await first).success)
+
+    async def test_priority_hand_off(self):
+        self.create("ext", max_concurrent=1, fairness=FairnessPolicy.PRIORITY)
+        gate = asyncio.Event()
+        order = []
+
+        async def call(name):
+            order.append(name)
+            await gate.wait()
+
+        tasks = [asyncio.create_task(self.manager.execute("ext", call, 0, "first"))]
+        await asyncio.sleep(0)
+        for name, priority in (("low", 0), ("high", 2), ("mid", 1)):
+            tasks.append(asyncio.create_task(self.manager.execute("ext", call, priority, name)))
+        await asyncio.sleep(0)
+        gate.set()
+        results = await asyncio.gather(*tasks)
+        self.assertEqual(order, ["first", "high", "mid", "low"])
+        self.assertTrue(all(r.success for r in results))
+        self.assertEqual(self.manager.bulkheads["ext"].current_concurrent, 0)
+
+    async def test_wait_timeout(self):
+        self.create("slow", max_concurrent=1, max_wait_ms=20)
+        gate = asyncio.Event()
+
+        async def hold():
+            await gate.wait()
+
+        first = asyncio.create_task(self.manager.execute("slow", hold))
+        await asyncio.sleep(0)
+        timed_out = await self.manager.execute("slow", hold)
+        self.assertFalse(timed_out.success)
+        self.assertEqual(timed_out.error, "Wait timeout")
+        gate.set()
+        await first
+
+    async def test_blocking_call_runs_on_own_pool(self):
+        self.create("db", BulkheadType.THREAD_POOL, max_concurrent=3)
+
+        def blocking(n):
+            time.sleep(0.01)
+            return threading.current_thread().name
+
+        results = await asyncio.gather(*[self.manager.execute("db", blocking, 0, i) for i in range(6)])
+        self.assertTrue(all(r.success for r in results))
+        self.assertTrue(all(r.result.startswith("bulkhead-db") for r in results))
+
+    async def test_sync_wrapper_returning_coroutine_is_awaited(self):
+        async def work(value):
+            await asyncio.sleep(0)
+            return value * 2
+
+        for name, bulkhead_type in (("sem", BulkheadType.SEMAPHORE), ("pool", BulkheadType.THREAD_POOL)):
+            self.create(name, bulkhead_type)
+            with warnings.catch_warnings():
+                warnings.simplefilter("error", RuntimeWarning)
+                result = await self.manager.execute(name, lambda: work(21))
+            self.assertTrue(result.success, result.error)
+            self.assertEqual(result.result, 42)
+
+    async def test_sync_callable_on_semaphore_bulkhead(self):
+        self.create("sem")
+        result = await self.manager.execute("sem", lambda: "inline")
+        self.assertTrue(result.success)
+        self.assertEqual(result.result, "inline")
+
+    async def test_operation_error_releases_slot(self):
+        self.create("err")
+
+        async def fail():
+            raise RuntimeError("boom")
+
+        result = await self.manager.execute("err", fail)
+        self.assertFalse(result.success)
+        self.assertEqual(result.error, "boom")
+        self.assertEqual(self.manager.bulkheads["err"].current_concurrent, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Tests for CacheStore: O(1) LFU, heap-driven TTL expiry, TinyLFU admission
+and byte accounting
+"""
+
+import unittest
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from iteration286_cache_manager import (
+    CacheStore, CacheConfig, CacheLevel, EvictionPolicy,
+    FrequencyList, CountMinSketch, estimate_size
+)
+
+
+def store(**kwargs) -> CacheStore:
+    return CacheStore(CacheConfig(name="test", level=CacheLevel.L1, **kwargs))
+
+
+class TestFrequencyList(unittest.TestCase):
+    """Список частот LFU"""
+
+    def test_victim_is_least_frequent_then_oldest(self):
+        frequencies = FrequencyList()
+        for key in "abc":
+            frequencies.add(key)
+        frequencies.touch("a")
+        frequencies.touch("a")
+        frequencies.touch("b")
+        self.assertEqual(frequencies.victim(), "c")
+        self.assertEqual(frequencies.frequency("a"), 3)
+        frequencies.remove("c")
+        self.assertEqual(frequencies.victim(), "b")
+        self.assertEqual(frequencies.victim(exclude="b"), "a")
+        frequencies.remove("a")
+        frequencies.remove("b")
+        self.assertIsNone(frequencies.victim())
+        self.assertEqual(len(frequencies), 0)
+
+
+class TestCountMinSketch(unittest.TestCase):
+    """Оценка частот TinyLFU"""
+
+    def test_estimates_never_undercount_and_saturate(self):
+        sketch = CountMinSketch(1024)
+        for _ in range(5):
+            sketch.increment("hot")
+        sketch.increment("cold")
+        self.assertGreaterEqual(sketch.estimate("hot"), 5)
+        self.assertGreaterEqual(sketch.estimate("cold"), 1)
+        for _ in range(100):
+            sketch.increment("hot")
+        self.assertEqual(sketch.estimate("hot"), CountMinSketch.MAX_COUNT)
+
+    def test_aging_halves_counters(self):
+        sketch = CountMinSketch(64)
+        for _ in range(8):
+            sketch.increment("k")
+        for i in range(sketch.sample_size):
+            sketch.increment(f"noise{i}")
+        self.assertLessEqual(sketch.estimate("k"), 8)
+
+
+class TestEstimateSize(unittest.TestCase):
+    """Оценка размера без сериализации"""
+
+    def test_scalars_and_containers(self):
+        self.assertEqual(estimate_size("abcd"), 4)
+        self.assertEqual(estimate_size(3), 8)
+        self.assertEqual(estimate_size({"ab": "cdef"}), 6)
+        self.assertEqual(estimate_size(["a" * 10] * 100), 1000)
+
+
+class TestCacheStore(unittest.IsolatedAsyncioTestCase):
+    """Вытеснение, истечение и учёт байтов"""
+
+    async def test_lru_evicts_least_recently_used(self):
+        cache = store(max_entries=2, eviction_policy=EvictionPolicy.LRU)
+        await cache.set("a", 1)
+        await cache.set("b", 2)
+        await cache.get("a")
+        await cache.set("c", 3)
+        self.assertEqual(set(cache.entries), {"a", "c"})
+        self.assertEqual(cache.stats.evictions, 1)
+
+    async def test_lfu_evicts_least_frequent(self):
+        cache = store(max_entries=2, eviction_policy=EvictionPolicy.LFU)
+        await cache.set("a", 1)
+        await cache.set("b", 2)
+        await cache.get("b")
+        await cache.get("b")
+        await cache.get("a")
+        await cache.set("c", 3)
+        self.assertEqual(set(cache.entries), {"b", "c"})
+
+    async def test_expire_uses_deadline_heap(self):
+        cache = store()
+        await cache.set("short", 1, ttl_seconds=1)
+        await cache.set("long", 2, ttl_seconds=100)
+        await cache.set("short", 3, ttl_seconds=50)
+        self.assertEqual(cache.expire(time.monotonic() + 10), 0)
+        self.assertEqual(cache.expire(time.monotonic() + 60), 1)
+        self.assertEqual(list(cache.entries), ["long"])
+
+    async def test_tinylfu_rejects_one_hit_wonders(self):
+        cache = store(max_entries=2, admission_filter=True)
+        for key in ("a", "b"):
+            await cache.set(key, key)
+            for _ in range(5):
+                await cache.get(key)
+        self.assertIsNone(await cache.set("scan", "x"))
+        self.assertEqual(cache.stats.admissions_rejected, 1)
+        self.assertEqual(set(cache.entries), {"a", "b"})
+
+    async def test_overwrite_respects_max_bytes(self):
+        for policy in (EvictionPolicy.LRU, EvictionPolicy.FIFO, EvictionPolicy.LFU,
+                       EvictionPolicy.TTL, EvictionPolicy.RANDOM):
+            cache = store(max_bytes=100, eviction_policy=policy)
+            await cache.set("grow", "x" * 10, ttl_seconds=1)
+            for i in range(4):
+                await cache.set(f"k{i}", "y" * 20, ttl_seconds=100)
+            # Перезаписываемый ключ — первая жертва любой политики
+            entry = await cache.set("grow", "z" * 60)
+            self.assertIsNotNone(entry)
+            self.assertEqual(entry.version, 2)
+            self.assertLessEqual(cache.current_bytes, 100, policy)
+            self.assertEqual(cache.current_bytes, sum(e.size_bytes for e in cache.entries.values()))
+            self.assertIn("grow", cache.entries)
+
+    async def test_overwrite_keeps_lfu_frequency(self):
+        cache = store(max_entries=2, eviction_policy=EvictionPolicy.LFU)
+        await cache.set("hot", 1)
+        for _ in range(3):
+            await cache.get("hot")
+        await cache.set("cold", 2)
+        await cache.set("hot", 10)
+        self.assertEqual(cache.frequency.frequency("hot"), 4)
+        await cache.set("new", 3)
+        self.assertEqual(set(cache.entries), {"hot", "new"})
+
+
+if __name__ == '__main__':
+    unittest.main()
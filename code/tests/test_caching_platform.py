@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tests for CachePlatform regions: incremental byte accounting, indexed eviction
+and pattern/tag invalidation
+"""
+
+import unittest
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from iteration238_caching_platform import CachePlatform, EvictionPolicy, estimate_size
+
+
+class TestRegionAccounting(unittest.TestCase):
+    """Учёт памяти региона без пересчёта"""
+
+    def setUp(self):
+        self.platform = CachePlatform()
+
+    def test_estimate_size(self):
+        self.assertEqual(estimate_size({"ab": "xyz", "n": [1, None]}), 2 + 3 + 1 + 16)
+        # Большие контейнеры оцениваются по выборке
+        self.assertEqual(estimate_size(["x" * 10] * 1000), 10000)
+        # Глубокая вложенность не рекурсирует дальше SIZE_MAX_DEPTH
+        nested = "leaf"
+        for _ in range(5000):
+            nested = [nested]
+        self.assertGreater(estimate_size(nested), 0)
+
+    def test_usage_follows_put_overwrite_delete(self):
+        region = self.platform.create_region("r")
+        rid = region.region_id
+        self.platform.put(rid, "a", "x" * 100)
+        self.platform.put(rid, "b", "y" * 50)
+        self.assertEqual((region.entry_count, region.memory_used_bytes), (2, 150))
+        self.platform.put(rid, "a", "z" * 10)
+        self.assertEqual(region.memory_used_bytes, 60)
+        self.platform.delete(rid, "b")
+        self.assertEqual((region.entry_count, region.memory_used_bytes), (1, 10))
+        self.assertEqual(self.platform.flush_region(rid), 1)
+        self.assertEqual(region.memory_used_bytes, 0)
+
+
+class TestRegionEviction(unittest.TestCase):
+    """Выбор жертвы по индексам региона"""
+
+    def setUp(self):
+        self.platform = CachePlatform()
+
+    def region(self, policy):
+        return self.platform.create_region(policy.value, eviction_policy=policy, max_entries=2).region_id
+
+    def test_lru(self):
+        rid = self.region(EvictionPolicy.LRU)
+        self.platform.put(rid, "a", 1)
+        self.platform.put(rid, "b", 2)
+        self.platform.get(rid, "a")
+        self.platform.put(rid, "c", 3)
+        self.assertEqual(set(self.platform.entries[rid]), {"a", "c"})
+
+    def test_lfu(self):
+        rid = self.region(EvictionPolicy.LFU)
+        self.platform.put(rid, "a", 1)
+        self.platform.put(rid, "b", 2)
+        self.platform.get(rid, "a")
+        self.platform.get(rid, "a")
+        self.platform.get(rid, "b")
+        self.platform.put(rid, "c", 3)
+        self.assertEqual(set(self.platform.entries[rid]), {"a", "c"})
+
+    def test_ttl_evicts_nearest_deadline(self):
+        rid = self.region(EvictionPolicy.TTL)
+        self.platform.put(rid, "long", 1, ttl_seconds=100)
+        self.platform.put(rid, "short", 2, ttl_seconds=10)
+        self.platform.put(rid, "new", 3, ttl_seconds=50)
+        self.assertEqual(set(self.platform.entries[rid]), {"long", "new"})
+
+    def test_expired_entry_goes_before_policy(self):
+        rid = self.region(EvictionPolicy.LRU)
+        self.platform.put(rid, "old", 1)
+        self.platform.put(rid, "stale", 2)
+        entry = self.platform.entries[rid]["stale"]
+        index = self.platform.region_indexes[rid]
+        index.remove(entry)
+        entry.expires_at = datetime.now() - timedelta(seconds=1)
+        index.add(entry, self.platform.entries[rid])
+        self.platform.put(rid, "new", 3)
+        self.assertEqual(set(self.platform.entries[rid]), {"old", "new"})
+
+    def test_byte_budget(self):
+        region = self.platform.create_region("small", max_memory_mb=1)
+        rid = region.region_id
+        chunk = "x" * (400 * 1024)
+        for key in "abc":
+            self.platform.put(rid, key, chunk)
+        self.assertEqual(set(self.platform.entries[rid]), {"b", "c"})
+        self.assertLessEqual(region.memory_used_bytes, 1024 * 1024)
+
+
+class TestInvalidation(unittest.TestCase):
+    """Инвалидация по шаблону и тегу"""
+
+    def setUp(self):
+        self.platform = CachePlatform()
+        self.rid = self.platform.create_region("r").region_id
+        for key, tags in (("user:1", ["users"]), ("user:2", ["users"]), ("user", []),
+                          ("order:1", ["orders"]), ("usr:9", ["users"])):
+            self.platform.put(self.rid, key, key, tags=tags)
+
+    def test_prefix_and_glob_patterns(self):
+        self.assertEqual(self.platform.invalidate_by_pattern(self.rid, "user:?"), 2)
+        self.assertEqual(self.platform.invalidate_by_pattern(self.rid, "user"), 1)
+        self.assertEqual(self.platform.invalidate_by_pattern(self.rid, "ord*"), 1)
+        self.assertEqual(list(self.platform.entries[self.rid]), ["usr:9"])
+
+    def test_tag_index_is_kept_in_sync(self):
+        self.platform.delete(self.rid, "user:1")
+        self.assertEqual(self.platform.invalidate_by_tag(self.rid, "users"), 2)
+        self.assertNotIn("users", self.platform.region_indexes[self.rid].tag_keys)
+        self.assertEqual(self.platform.invalidate_by_tag(self.rid, "missing"), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
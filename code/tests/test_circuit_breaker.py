@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Tests for ring-buffer sliding windows and circuit breaker state transitions
+"""
+
+import unittest
+import random
+import sys
+import os
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from iteration257_circuit_breaker_advanced import (
+    CircuitBreakerManager, CircuitBreakerConfig, CircuitState, FallbackStrategy,
+    SlidingWindow, WindowType, TransitionReason, FAILED, SLOW, NS_PER_SECOND
+)
+
+
+S = NS_PER_SECOND
+
+
+class TestSlidingWindow(unittest.TestCase):
+    """Инкрементальные счётчики совпадают с пересчётом"""
+
+    def test_count_based_matches_naive_window(self):
+        rng = random.Random(11)
+        window = SlidingWindow(WindowType.COUNT_BASED, 7)
+        recent = deque(maxlen=7)
+        for _ in range(200):
+            outcome = rng.choice((0, FAILED, SLOW, FAILED | SLOW))
+            duration = rng.randint(1, 1000)
+            window.record(outcome, duration, 0)
+            recent.append((outcome, duration))
+            self.assertEqual(window.total_calls, len(recent))
+            self.assertEqual(window.failed_calls, sum(1 for o, _ in recent if o & FAILED))
+            self.assertEqual(window.slow_calls, sum(1 for o, _ in recent if o & SLOW))
+            self.assertEqual(window.total_duration_ns, sum(d for _, d in recent))
+
+    def test_time_based_expires_old_seconds(self):
+        window = SlidingWindow(WindowType.TIME_BASED, 3)
+        start = window.last_second
+        window.record(FAILED, 10, start * S)
+        window.record(0, 10, (start + 1) * S)
+        window.record(SLOW, 10, (start + 2) * S)
+        self.assertEqual((window.total_calls, window.failed_calls, window.slow_calls), (3, 1, 1))
+        window.advance(start + 3)
+        self.assertEqual((window.total_calls, window.failed_calls), (2, 0))
+        window.record(FAILED, 10, (start + 4) * S)
+        self.assertEqual((window.total_calls, window.failed_calls, window.slow_calls), (2, 1, 1))
+        window.advance(start + 100)
+        self.assertEqual((window.total_calls, window.total_duration_ns), (0, 0))
+
+    def test_reset_keeps_buffers(self):
+        window = SlidingWindow(WindowType.COUNT_BASED, 4)
+        outcomes = window.outcomes
+        for _ in range(6):
+            window.record(FAILED, 5, 0)
+        window.reset()
+        self.assertIs(window.outcomes, outcomes)
+        self.assertEqual((window.total_calls, window.failed_calls, window.filled), (0, 0, 0))
+        window.record(0, 5, 0)
+        self.assertEqual((window.total_calls, window.failed_calls), (1, 0))
+
+
+class TestCircuitBreaker(unittest.IsolatedAsyncioTestCase):
+    """Переходы состояний через execute"""
+
+    async def asyncSetUp(self):
+        self.manager = CircuitBreakerManager()
+
+    def breaker(self, **kwargs):
+        config = CircuitBreakerConfig(config_id="c", name="svc", window_size=10, minimum_calls=4,
+                                      fallback_strategy=FallbackStrategy.RETURN_DEFAULT,
+                                      fallback_value="fallback", **kwargs)
+        self.manager.configs["svc"] = config
+        return self.manager.create_breaker("svc")
+
+    async def call(self, fail: bool):
+        async def operation():
+            if fail:
+                raise RuntimeError("down")
+            return "ok"
+        return await self.manager.execute("svc", operation)
+
+    async def test_opens_on_failure_rate(self):
+        breaker = self.breaker(failure_rate_threshold=50.0)
+        for fail in (False, True, False):
+            await self.call(fail)
+        self.assertEqual(breaker.state, CircuitState.CLOSED)
+        # 2 из 4 — порог 50% достигнут
+        self.assertEqual(await self.call(True), "fallback")
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+        self.assertEqual(breaker.state_transitions[-1]["reason"], TransitionReason.FAILURE_RATE_EXCEEDED.value)
+        self.assertEqual(await self.call(False), "fallback")
+        self.assertEqual(breaker.total_rejections, 1)
+
+    async def test_half_open_closes_after_permitted_successes(self):
+        breaker = self.breaker(wait_duration_ms=0, permitted_calls_in_half_open=2)
+        self.manager.force_open("svc")
+        self.assertEqual(await self.call(False), "ok")
+        self.assertEqual(breaker.state, CircuitState.HALF_OPEN)
+        self.assertEqual(await self.call(False), "ok")
+        self.assertEqual(breaker.state, CircuitState.CLOSED)
+        self.assertEqual(breaker.window.total_calls, 0)
+
+    async def test_half_open_failure_reopens(self):
+        breaker = self.breaker(wait_duration_ms=0)
+        self.manager.force_open("svc")
+        await self.call(True)
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+        self.assertEqual(breaker.state_transitions[-1]["reason"], TransitionReason.HALF_OPEN_FAILURE.value)
+
+    async def test_cached_fallback(self):
+        breaker = self.breaker()
+        breaker.config.fallback_strategy = FallbackStrategy.CACHE
+        await self.call(False)
+        self.manager.force_open("svc")
+        breaker.config.wait_duration_ms = 60000
+        self.assertEqual(await self.call(False), "ok")
+        self.assertEqual(breaker.total_rejections, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Tests for CMDB adjacency indexes, cached tier-1 dependency closures, impact
+analysis and bulk discovery imports
+"""
+
+import unittest
+import random
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from iteration366_cmdb_platform import (
+    CMDBPlatform, CIType, RelationshipType, ChangeType, DiscoverySource
+)
+
+
+DEPENDS_ON = RelationshipType.DEPENDS_ON
+
+
+def brute_force_closure(cmdb: CMDBPlatform, ci_id: str) -> set:
+    edges = {}
+    for rel in cmdb.relationships.values():
+        if rel.relationship_type == DEPENDS_ON:
+            edges.setdefault(rel.source_ci_id, []).append(rel.target_ci_id)
+    seen, stack = set(), [ci_id]
+    while stack:
+        for target in edges.get(stack.pop(), []):
+            if target not in seen:
+                seen.add(target)
+                stack.append(target)
+    seen.discard(ci_id)
+    return seen
+
+
+class TestDependencyClosures(unittest.IsolatedAsyncioTestCase):
+    """Кэшированные замыкания совпадают с полным обходом при изменениях графа"""
+
+    async def asyncSetUp(self):
+        self.cmdb = CMDBPlatform()
+
+    async def service(self, name, tier=1):
+        return await self.cmdb.create_ci(name, CIType.SERVICE, attributes={"tier": tier})
+
+    async def check_consistent(self):
+        for ci_id in list(self.cmdb.cis):
+            self.assertEqual(await self.cmdb.get_dependency_closure(ci_id),
+                             brute_force_closure(self.cmdb, ci_id), ci_id)
+        for ci_id in list(self.cmdb.cis):
+            expected = sorted(s for s in self.cmdb.critical_services
+                              if ci_id in brute_force_closure(self.cmdb, s))
+            self.assertEqual(await self.cmdb.get_impacted_critical_services(ci_id), expected, ci_id)
+
+    async def test_random_edits_keep_closures_exact(self):
+        rng = random.Random(8)
+        services = [await self.service(f"svc{i}", tier=1 if i < 4 else 2) for i in range(6)]
+        others = [await self.cmdb.create_ci(f"ci{i}", rng.choice([CIType.DATABASE, CIType.SERVER]))
+                  for i in range(14)]
+        nodes = [ci.ci_id for ci in services + others]
+
+        for step in range(120):
+            action = rng.random()
+            if action < 0.6 or not self.cmdb.relationships:
+                source, target = rng.sample(nodes, 2)
+                rel_type = DEPENDS_ON if rng.random() < 0.85 else RelationshipType.RUNS_ON
+                await self.cmdb.create_relationship(source, target, rel_type)
+            elif action < 0.9:
+                await self.cmdb.delete_relationship(rng.choice(list(self.cmdb.relationships)))
+            else:
+                service = rng.choice(services)
+                tier = service.attributes["tier"].value
+                await self.cmdb.update_attribute(service.ci_id, "tier", 2 if tier == 1 else 1)
+            if step % 10 == 0:
+                await self.check_consistent()
+        await self.check_consistent()
+        self.assertGreater(self.cmdb.closure_hits, 0)
+
+    async def test_cycles_and_cache_hits(self):
+        a = await self.service("a")
+        b = await self.cmdb.create_ci("b", CIType.APPLICATION)
+        c = await self.cmdb.create_ci("c", CIType.DATABASE)
+        for source, target in ((a, b), (b, c), (c, a)):
+            await self.cmdb.create_relationship(source.ci_id, target.ci_id, DEPENDS_ON)
+        self.assertEqual(await self.cmdb.get_dependency_closure(a.ci_id), {b.ci_id, c.ci_id})
+        self.assertEqual(await self.cmdb.get_dependency_closure(a.ci_id), {b.ci_id, c.ci_id})
+        self.assertEqual((self.cmdb.closure_misses, self.cmdb.closure_hits), (1, 1))
+        # Некритичные CI не кэшируются
+        await self.cmdb.get_dependency_closure(b.ci_id)
+        self.assertNotIn(b.ci_id, self.cmdb.closure_cache)
+
+    async def test_delete_ci_cleans_indexes_and_cache(self):
+        svc = await self.service("svc")
+        app = await self.cmdb.create_ci("app", CIType.APPLICATION)
+        db = await self.cmdb.create_ci("db", CIType.DATABASE)
+        await self.cmdb.create_relationship(svc.ci_id, app.ci_id, DEPENDS_ON)
+        await self.cmdb.create_relationship(app.ci_id, db.ci_id, DEPENDS_ON)
+        self.assertEqual(await self.cmdb.get_impacted_critical_services(db.ci_id), [svc.ci_id])
+
+        await self.cmdb.delete_ci(app.ci_id)
+        self.assertEqual(self.cmdb.relationships, {})
+        self.assertFalse(any(self.cmdb.outgoing.get(svc.ci_id, {}).values()))
+        self.assertFalse(any(self.cmdb.incoming.get(db.ci_id, {}).values()))
+        self.assertEqual(await self.cmdb.get_impacted_critical_services(db.ci_id), [])
+        self.assertEqual(await self.cmdb.get_dependency_closure(svc.ci_id), set())
+
+        await self.cmdb.delete_ci(svc.ci_id)
+        self.assertEqual((self.cmdb.critical_services, self.cmdb.closure_cache), (set(), {}))
+
+
+class TestGraphQueries(unittest.IsolatedAsyncioTestCase):
+    """Выборка связей и анализ влияния"""
+
+    async def asyncSetUp(self):
+        self.cmdb = CMDBPlatform()
+        self.ci = {}
+        for name, ci_type in (("db", CIType.DATABASE), ("api", CIType.APPLICATION), ("web", CIType.APPLICATION),
+                              ("checkout", CIType.SERVICE), ("edge", CIType.SERVICE), ("host", CIType.SERVER)):
+            self.ci[name] = await self.cmdb.create_ci(name, ci_type, attributes={"tier": 1})
+        for source, target in (("api", "db"), ("web", "api"), ("checkout", "api"), ("edge", "web"),
+                               ("edge", "checkout")):
+            await self.cmdb.create_relationship(self.ci[source].ci_id, self.ci[target].ci_id, DEPENDS_ON)
+        await self.cmdb.create_relationship(self.ci["db"].ci_id, self.ci["host"].ci_id, RelationshipType.RUNS_ON)
+
+    def names(self, ci_ids):
+        by_id = {ci.ci_id: name for name, ci in self.ci.items()}
+        return [by_id[ci_id] for ci_id in ci_ids]
+
+    async def test_impact_levels_and_depth(self):
+        report = await self.cmdb.analyze_impact(self.ci["db"].ci_id)
+        self.assertEqual(self.names(report.directly_affected), ["api"])
+        self.assertEqual(sorted(self.names(report.indirectly_affected)), ["checkout", "edge", "web"])
+        self.assertEqual(self.names(report.indirectly_affected)[-1], "edge")
+        self.assertEqual((report.total_affected, report.critical_services_affected), (4, 2))
+
+        shallow = await self.cmdb.analyze_impact(self.ci["db"].ci_id, depth=2)
+        self.assertEqual(shallow.total_affected, 3)
+        unrelated = await self.cmdb.analyze_impact(self.ci["host"].ci_id)
+        self.assertEqual(unrelated.total_affected, 0)
+
+    async def test_relationship_directions(self):
+        api = self.ci["api"].ci_id
+        outgoing = await self.cmdb.get_relationships(api, direction="outgoing")
+        incoming = await self.cmdb.get_relationships(api, DEPENDS_ON, direction="incoming")
+        both = await self.cmdb.get_relationships(api)
+        self.assertEqual(self.names(r.target_ci_id for r in outgoing), ["db"])
+        self.assertEqual(sorted(self.names(r.source_ci_id for r in incoming)), ["checkout", "web"])
+        self.assertEqual(len(both), 3)
+        self.assertEqual(await self.cmdb.get_relationships(api, RelationshipType.RUNS_ON), [])
+
+
+class TestBulkImport(unittest.IsolatedAsyncioTestCase):
+    """Пакетный импорт обнаруженных CI"""
+
+    async def asyncSetUp(self):
+        self.cmdb = CMDBPlatform()
+
+    async def test_upsert_and_relationship_dedup(self):
+        cis = [
+            {"name": "svc", "ci_type": CIType.SERVICE, "attributes": {"tier": 1}},
+            {"name": "app", "ci_type": CIType.APPLICATION, "attributes": {"version": "1.0"}},
+            {"name": "db", "ci_type": CIType.DATABASE},
+        ]
+        relationships = [
+            {"source": "svc", "target": "app"},
+            {"source": "app", "target": "db"},
+            {"source": "app", "target": "db"},
+            {"source": "app", "target": "missing"},
+        ]
+        result = await self.cmdb.bulk_import(cis, relationships)
+        self.assertEqual(result, {"created": 3, "updated": 0, "relationships": 2})
+        ids = {ci.name: ci.ci_id for ci in self.cmdb.cis.values()}
+        self.assertEqual(await self.cmdb.get_impacted_critical_services(ids["db"]), [ids["svc"]])
+        self.assertEqual(len({c.change_id for c in self.cmdb.change_history}), len(self.cmdb.change_history))
+
+        # Повторный импорт: обновление по (тип, имя), новые связи сбрасывают замыкание
+        cis[1]["attributes"] = {"version": "1.1"}
+        cis.append({"name": "cache", "ci_type": CIType.DATABASE})
+        result = await self.cmdb.bulk_import(cis, relationships + [{"source": "app", "target": "cache"}])
+        self.assertEqual(result, {"created": 1, "updated": 1, "relationships": 1})
+        self.assertEqual(len(self.cmdb.cis), 4)
+        app = self.cmdb.cis[ids["app"]]
+        self.assertEqual(app.attributes["version"].value, "1.1")
+        self.assertEqual(app.discovery_source, DiscoverySource.SCANNER)
+        cache_id = self.cmdb.ci_keys[(CIType.DATABASE, "cache")]
+        self.assertEqual(await self.cmdb.get_dependency_closure(ids["svc"]), {ids["app"], ids["db"], cache_id})
+        updates = [c for c in self.cmdb.change_history if c.change_type == ChangeType.UPDATE]
+        self.assertEqual([(c.old_value, c.new_value) for c in updates], [("1.0", "1.1")])
+
+    async def test_same_name_different_type_are_distinct(self):
+        await self.cmdb.bulk_import([{"name": "orders", "ci_type": CIType.SERVICE},
+                                     {"name": "orders", "ci_type": CIType.DATABASE}])
+        self.assertEqual(len(self.cmdb.cis), 2)
+
+    async def test_run_discovery_imports_results(self):
+        job = await self.cmdb.run_discovery("scan", DiscoverySource.AGENT, results={
+            "cis": [{"name": "h1"}, {"name": "h2"}],
+            "relationships": [{"source": "h1", "target": "h2", "relationship_type": RelationshipType.CONNECTS_TO}]
+        })
+        self.assertEqual((job.status, job.discovered_cis, job.updated_cis), ("completed", 2, 0))
+        self.assertTrue(all(ci.discovery_source == DiscoverySource.AGENT for ci in self.cmdb.cis.values()))
+        h1 = self.cmdb.ci_keys[(CIType.SERVER, "h1")]
+        self.assertEqual(len(await self.cmdb.get_relationships(h1, RelationshipType.CONNECTS_TO)), 1)
+
+    def test_generated_ids_are_unique(self):
+        taken = {f"ci_{i:08x}": None for i in range(1000)}
+        ids = CMDBPlatform._generate_ids("ci", 5000, taken)
+        self.assertEqual(len(set(ids)), 5000)
+        self.assertFalse(set(ids) & set(taken))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Tests for the ready-queue DAG scheduler: dependency order, concurrency and
+pool limits, retries, failure propagation and backfill
+"""
+
+import unittest
+import asyncio
+import random
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from iteration343_data_pipeline import (
+    PipelineOrchestrator, TaskState, RunState, RetryPolicy, ScheduleInterval, MAX_RETRY_DELAY_SECONDS,
+    benchmark_data_pipeline
+)
+
+
+class Recorder:
+    """Функция задачи, фиксирующая порядок запусков и параллелизм"""
+
+    def __init__(self, fail=(), fail_times: int = 0):
+        self.events = []
+        self.running = 0
+        self.max_running = 0
+        self.fail = set(fail)
+        self.fail_times = fail_times
+        self.attempts = {}
+
+    async def work(self, context):
+        task_id = context["task_id"]
+        self.attempts[task_id] = self.attempts.get(task_id, 0) + 1
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        self.events.append(("start", task_id))
+        await asyncio.sleep(0.001)
+        self.running -= 1
+        self.events.append(("end", task_id))
+        if task_id in self.fail and (not self.fail_times or self.attempts[task_id] <= self.fail_times):
+            raise RuntimeError(f"{task_id} failed")
+        return {"task": task_id, "upstream": sorted(context["upstream"])}
+
+
+class TestDagScheduler(unittest.IsolatedAsyncioTestCase):
+    """Исполнение запуска по готовой очереди"""
+
+    async def asyncSetUp(self):
+        self.orchestrator = PipelineOrchestrator(thread_workers=4)
+        self.addCleanup(self.orchestrator.shutdown)
+
+    async def task(self, name, upstream=(), **kwargs):
+        kwargs.setdefault("max_retries", 0)
+        kwargs.setdefault("retry_policy", RetryPolicy.NONE)
+        return await self.orchestrator.create_task(name, config={"callable": "work"},
+                                                   upstream_task_ids=list(upstream), **kwargs)
+
+    async def execute(self, tasks, recorder, **kwargs):
+        self.orchestrator.register_callable("work", recorder.work)
+        pipeline = await self.orchestrator.create_pipeline("p", [t.task_id for t in tasks], **kwargs)
+        run = await self.orchestrator.trigger_pipeline(pipeline.pipeline_id)
+        return await self.orchestrator.execute_run(run.run_id)
+
+    def states(self, run):
+        return {self.orchestrator.task_instances[i].task_id: self.orchestrator.task_instances[i].state
+                for i in run.task_instance_ids}
+
+    async def test_random_dag_respects_dependencies(self):
+        rng = random.Random(4)
+        tasks = []
+        for n in range(60):
+            upstream = [t.task_id for t in rng.sample(tasks, min(len(tasks), rng.randint(0, 3)))]
+            tasks.append(await self.task(f"t{n}", upstream))
+        recorder = Recorder()
+        # Задачи перечислены в обратном порядке: порядок списка не влияет на исполнение
+        run = await self.execute(tasks[::-1], recorder, concurrency=5)
+
+        self.assertEqual(run.state, RunState.SUCCESS)
+        self.assertEqual(run.completed_tasks, len(tasks))
+        self.assertLessEqual(recorder.max_running, 5)
+        position = {event: i for i, event in enumerate(recorder.events)}
+        for task in tasks:
+            for upstream_id in task.upstream_task_ids:
+                self.assertLess(position[("end", upstream_id)], position[("start", task.task_id)])
+
+    async def test_downstream_receives_upstream_results(self):
+        a = await self.task("a")
+        b = await self.task("b")
+        c = await self.task("c", [a.task_id, b.task_id])
+        run = await self.execute([a, b, c], Recorder())
+        instance_id = self.orchestrator.run_instances[run.run_id][c.task_id]
+        result = self.orchestrator.task_instances[instance_id].xcom_data["return_value"]
+        self.assertEqual(result["upstream"], sorted([a.task_id, b.task_id]))
+
+    async def test_priority_orders_ready_tasks(self):
+        tasks = [await self.task(f"t{p}", priority=p) for p in (1, 5, 3)]
+        recorder = Recorder()
+        await self.execute(tasks, recorder, concurrency=1)
+        started = [task_id for kind, task_id in recorder.events if kind == "start"]
+        self.assertEqual(started, [tasks[1].task_id, tasks[2].task_id, tasks[0].task_id])
+
+    async def test_pool_slots_bound_parallelism(self):
+        await self.orchestrator.create_pool("narrow", 2)
+        tasks = [await self.task(f"t{n}", pool="narrow") for n in range(8)]
+        recorder = Recorder()
+        run = await self.execute(tasks, recorder, concurrency=8)
+        self.assertEqual(run.state, RunState.SUCCESS)
+        self.assertEqual(recorder.max_running, 2)
+        pool = self.orchestrator.pools["narrow"]
+        self.assertEqual((pool.used_slots, pool.queued_tasks), (0, 0))
+
+    async def test_failure_marks_descendants_upstream_failed(self):
+        root = await self.task("root")
+        bad = await self.task("bad", [root.task_id])
+        child = await self.task("child", [bad.task_id])
+        grandchild = await self.task("grandchild", [child.task_id, root.task_id])
+        other = await self.task("other", [root.task_id])
+        run = await self.execute([root, bad, child, grandchild, other], Recorder(fail={bad.task_id}))
+
+        states = self.states(run)
+        self.assertEqual(states[bad.task_id], TaskState.FAILED)
+        self.assertEqual(states[child.task_id], TaskState.UPSTREAM_FAILED)
+        self.assertEqual(states[grandchild.task_id], TaskState.UPSTREAM_FAILED)
+        self.assertEqual(states[other.task_id], TaskState.SUCCESS)
+        self.assertEqual(run.state, RunState.PARTIAL)
+        self.assertEqual([a.task_id for a in self.orchestrator.alerts], [bad.task_id])
+        self.assertFalse(self.orchestrator.active_runs[run.pipeline_id])
+
+    async def test_retries_until_success(self):
+        flaky = await self.task("flaky", max_retries=3, retry_policy=RetryPolicy.EXPONENTIAL,
+                                retry_delay_seconds=0)
+        recorder = Recorder(fail={flaky.task_id}, fail_times=2)
+        run = await self.execute([flaky], recorder)
+        instance = self.orchestrator.task_instances[run.task_instance_ids[0]]
+        self.assertEqual(run.state, RunState.SUCCESS)
+        self.assertEqual(recorder.attempts[flaky.task_id], 3)
+        self.assertEqual(instance.try_number, 3)
+
+    async def test_timeout_fails_attempt(self):
+        async def slow(context):
+            await asyncio.sleep(1)
+
+        self.orchestrator.register_callable("slow", slow)
+        task = await self.orchestrator.create_task("slow", timeout_seconds=0.01,
+                                                   retry_policy=RetryPolicy.NONE)
+        pipeline = await self.orchestrator.create_pipeline("p", [task.task_id])
+        run = await self.orchestrator.trigger_pipeline(pipeline.pipeline_id)
+        await self.orchestrator.execute_run(run.run_id)
+        instance = self.orchestrator.task_instances[run.task_instance_ids[0]]
+        self.assertEqual(instance.state, TaskState.FAILED)
+        self.assertTrue(instance.exception.startswith("Timeout"))
+        self.assertEqual(run.state, RunState.FAILED)
+
+    async def test_sync_callable_runs_on_thread_pool(self):
+        self.orchestrator.register_callable("sync", lambda context: context["try_number"] + 41)
+        task = await self.orchestrator.create_task("sync")
+        pipeline = await self.orchestrator.create_pipeline("p", [task.task_id])
+        run = await self.orchestrator.trigger_pipeline(pipeline.pipeline_id)
+        await self.orchestrator.execute_run(run.run_id)
+        instance = self.orchestrator.task_instances[run.task_instance_ids[0]]
+        self.assertEqual((instance.return_value, instance.worker_id), (42, "thread:default"))
+
+    def test_retry_delay(self):
+        task = type("Task", (), {"retry_delay_seconds": 10, "retry_policy": RetryPolicy.LINEAR})()
+        delays = [self.orchestrator._retry_delay(task, n) for n in (1, 2, 3)]
+        self.assertEqual(delays, [10, 20, 30])
+        task.retry_policy = RetryPolicy.EXPONENTIAL
+        self.assertEqual([self.orchestrator._retry_delay(task, n) for n in (1, 2, 3)], [10, 20, 40])
+        self.assertEqual(self.orchestrator._retry_delay(task, 30), MAX_RETRY_DELAY_SECONDS)
+
+
+class TestRunsAndBackfill(unittest.IsolatedAsyncioTestCase):
+    """Ограничение активных запусков и бэкфилл"""
+
+    async def asyncSetUp(self):
+        self.orchestrator = PipelineOrchestrator(thread_workers=2)
+        self.addCleanup(self.orchestrator.shutdown)
+        self.active = 0
+        self.max_active = 0
+
+        async def work(context):
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            await asyncio.sleep(0.005)
+            self.active -= 1
+            return context["logical_date"]
+
+        self.orchestrator.register_callable("work", work)
+        task = await self.orchestrator.create_task("work")
+        self.pipeline = await self.orchestrator.create_pipeline(
+            "p", [task.task_id], schedule_interval=ScheduleInterval.DAILY, max_active_runs=2)
+
+    async def test_max_active_runs(self):
+        first = await self.orchestrator.trigger_pipeline(self.pipeline.pipeline_id)
+        second = await self.orchestrator.trigger_pipeline(self.pipeline.pipeline_id)
+        self.assertIsNotNone(second)
+        self.assertIsNone(await self.orchestrator.trigger_pipeline(self.pipeline.pipeline_id))
+        await self.orchestrator.execute_run(first.run_id)
+        self.assertIsNotNone(await self.orchestrator.trigger_pipeline(self.pipeline.pipeline_id))
+
+    async def test_backfill_runs_every_date_within_limit(self):
+        start = datetime(2026, 1, 1)
+        runs = await self.orchestrator.backfill(self.pipeline.pipeline_id, start, start + timedelta(days=5))
+        self.assertEqual(sorted(run.logical_date for run in runs),
+                         [start + timedelta(days=n) for n in range(6)])
+        self.assertTrue(all(run.state == RunState.SUCCESS for run in runs))
+        self.assertEqual(self.max_active, 2)
+        self.assertEqual(len(self.orchestrator.get_runs_for_pipeline(self.pipeline.pipeline_id)), 6)
+
+    async def test_cancel_run_cancels_in_flight_tasks(self):
+        run = await self.orchestrator.trigger_pipeline(self.pipeline.pipeline_id)
+        execution = asyncio.create_task(self.orchestrator.execute_run(run.run_id))
+        await asyncio.sleep(0.001)
+        self.assertTrue(await self.orchestrator.cancel_run(run.run_id))
+        await execution
+        instance = self.orchestrator.task_instances[run.task_instance_ids[0]]
+        self.assertEqual((run.state, instance.state), (RunState.CANCELLED, TaskState.CANCELLED))
+        self.assertFalse(self.orchestrator.active_runs[self.pipeline.pipeline_id])
+
+
+class TestBenchmark(unittest.TestCase):
+    """Бенчмарк на большом DAG"""
+
+    def test_every_task_gets_a_distinct_id_and_runs(self):
+        result = benchmark_data_pipeline(task_count=3000)
+        self.assertEqual((result["run_state"], result["completed_tasks"]), ("success", 3000))
+
+
+if __name__ == '__main__':
+    unittest.main()
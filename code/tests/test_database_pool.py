@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Tests for the ConnectionPool FIFO waiter queue, direct hand-off and
+acquire latency histogram
+"""
+
+import unittest
+import asyncio
+import itertools
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from iteration287_database_pool import (
+    ConnectionPool, PoolConfig, DatabaseInstance, ConnectionConfig, Connection,
+    ConnectionState, LatencyHistogram
+)
+
+
+class DeterministicPool(ConnectionPool):
+    """Пул без случайных задержек и отказов при создании соединений"""
+
+    def __init__(self, config: PoolConfig):
+        instance = DatabaseInstance(
+            instance_id="db1", name="db1",
+            config=ConnectionConfig(host="localhost", port=5432, database="app", username="app")
+        )
+        super().__init__(instance, config)
+        self.ids = itertools.count(1)
+        self.fail_creates = 0
+
+    async def _create_connection(self):
+        await asyncio.sleep(0)
+        if self.fail_creates:
+            self.fail_creates -= 1
+            return None
+        self.connections_created += 1
+        return Connection(connection_id=f"c{next(self.ids)}", instance_id="db1")
+
+
+def config(**kwargs) -> PoolConfig:
+    defaults = dict(min_connections=1, max_connections=1, min_idle=0, maintenance_interval_ms=60000)
+    defaults.update(kwargs)
+    return PoolConfig(**defaults)
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    """Перцентили по фиксированным бакетам"""
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram([1, 10, 100])
+        for value in (0.5, 0.7, 5, 50, 500):
+            histogram.record(value)
+        self.assertEqual(histogram.percentile(0.4), 1)
+        self.assertEqual(histogram.percentile(0.6), 10)
+        self.assertEqual(histogram.percentile(1.0), 500)
+        self.assertEqual(histogram.to_dict()["buckets"]["le_inf"], 1)
+        self.assertEqual(LatencyHistogram().percentile(0.5), 0.0)
+
+
+class TestConnectionPool(unittest.IsolatedAsyncioTestCase):
+    """Очередь ожидающих и передача соединений"""
+
+    async def start(self, **kwargs) -> DeterministicPool:
+        pool = DeterministicPool(config(**kwargs))
+        await pool.start()
+        self.addAsyncCleanup(pool.stop)
+        return pool
+
+    async def test_waiters_served_in_fifo_order(self):
+        pool = await self.start()
+        held = await pool.acquire()
+        order = []
+
+        async def worker(name):
+            conn = await pool.acquire(timeout_ms=1000)
+            order.append(name)
+            await asyncio.sleep(0)
+            await pool.release(conn)
+
+        tasks = [asyncio.create_task(worker(n)) for n in range(5)]
+        await asyncio.sleep(0)
+        self.assertEqual(pool.waiting, 5)
+        await pool.release(held)
+        await asyncio.gather(*tasks)
+        self.assertEqual(order, [0, 1, 2, 3, 4])
+        self.assertEqual((pool.waiting, len(pool.idle_connections), len(pool.active_connections)), (0, 1, 0))
+
+    async def test_fair_pool_does_not_let_newcomer_barge(self):
+        pool = await self.start()
+        held = await pool.acquire()
+        waiter = asyncio.create_task(pool.acquire(timeout_ms=1000))
+        await asyncio.sleep(0)
+        await pool.release(held)
+        # Соединение уже передано ожидающему, новый вызов не может его перехватить
+        self.assertFalse(pool.idle_connections)
+        self.assertIsNone(await pool.acquire(timeout_ms=10))
+        self.assertIs(await waiter, held)
+
+    async def test_timeout_leaves_queue_consistent(self):
+        pool = await self.start()
+        held = await pool.acquire()
+        self.assertIsNone(await pool.acquire(timeout_ms=10))
+        self.assertEqual((pool.waiting, pool.timeouts), (0, 1))
+        await pool.release(held)
+        self.assertEqual(list(pool.idle_connections), [held])
+        self.assertEqual(held.state, ConnectionState.IDLE)
+
+    async def test_cancelled_waiter_is_skipped(self):
+        pool = await self.start()
+        held = await pool.acquire()
+        cancelled = asyncio.create_task(pool.acquire(timeout_ms=1000))
+        served = asyncio.create_task(pool.acquire(timeout_ms=1000))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await cancelled
+        await pool.release(held)
+        self.assertIs(await served, held)
+        self.assertEqual(pool.waiting, 0)
+
+    async def test_max_waiters_rejects_immediately(self):
+        pool = await self.start(max_waiters=1)
+        await pool.acquire()
+        queued = asyncio.create_task(pool.acquire(timeout_ms=50))
+        await asyncio.sleep(0)
+        self.assertIsNone(await pool.acquire(timeout_ms=1000))
+        self.assertEqual(pool.rejections, 1)
+        self.assertIsNone(await queued)
+
+    async def test_waiters_get_new_connections_up_to_max(self):
+        pool = await self.start(max_connections=3)
+        pool.fail_creates = 1
+        connections = await asyncio.gather(*(pool.acquire(timeout_ms=1000) for _ in range(3)))
+        self.assertEqual(len({c.connection_id for c in connections}), 3)
+        self.assertEqual(pool.total_connections, 3)
+        self.assertEqual(pool.acquire_latency.count, 3)
+
+    async def test_stop_fails_pending_waiters(self):
+        pool = DeterministicPool(config())
+        await pool.start()
+        await pool.acquire()
+        waiter = asyncio.create_task(pool.acquire(timeout_ms=1000))
+        await asyncio.sleep(0)
+        await pool.stop()
+        self.assertIsNone(await waiter)
+        self.assertIsNone(await pool.acquire())
+
+    async def test_maintenance_skips_connections_acquired_mid_pass(self):
+        pool = await self.start(min_connections=3, max_connections=3, validation_interval_ms=0)
+
+        async def validate(conn):
+            await asyncio.sleep(0.001)
+            return True
+
+        pool._validate_connection = validate
+        maintenance = asyncio.create_task(pool.run_maintenance())
+        await asyncio.sleep(0)
+        # Пока первое соединение валидируется, остальные забирают вызывающие
+        held = [await pool.acquire(), await pool.acquire()]
+        await maintenance
+
+        self.assertTrue(all(conn.state == ConnectionState.ACTIVE for conn in held))
+        self.assertEqual(pool.connections_closed, 0)
+        self.assertEqual((len(pool.idle_connections), len(pool.active_connections)), (1, 2))
+        for conn in held:
+            await pool.release(conn)
+        self.assertEqual(pool.total_connections, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Tests for trace search indexes and streaming latency sketches
+"""
+
+import unittest
+import random
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from iteration360_distributed_tracing import (
+    DistributedTracingPlatform, LatencySketch, SpanStatus, HISTOGRAM_BOUNDARIES_US
+)
+
+
+def nearest_rank(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+class TestLatencySketch(unittest.TestCase):
+    """Точность перцентилей и слияние скетчей"""
+
+    def test_percentiles_within_relative_error(self):
+        rng = random.Random(7)
+        values = [int(rng.lognormvariate(9, 1.5)) for _ in range(20000)]
+        sketch = LatencySketch()
+        for value in values:
+            sketch.record(value)
+        quantiles = [0.5, 0.9, 0.99, 0.999]
+        for q, estimate in zip(quantiles, sketch.percentiles(quantiles)):
+            exact = nearest_rank(values, q)
+            self.assertLessEqual(abs(estimate - exact), exact / 32 + 1, q)
+        self.assertEqual(sketch.count, len(values))
+        self.assertEqual(sketch.sum_us, sum(values))
+
+    def test_small_values_are_exact(self):
+        sketch = LatencySketch()
+        for value in range(1, 11):
+            sketch.record(value)
+        self.assertEqual(sketch.percentiles([0.0, 0.5, 1.0]), [1.0, 6.0, 10.0])
+        self.assertEqual(LatencySketch().percentiles([0.5]), [0.0])
+
+    def test_merge_equals_combined_recording(self):
+        left, right, combined = LatencySketch(), LatencySketch(), LatencySketch()
+        for value in range(0, 100000, 37):
+            (left if value % 2 else right).record(value)
+            combined.record(value)
+        left.merge(right)
+        quantiles = [0.25, 0.5, 0.95]
+        self.assertEqual(left.percentiles(quantiles), combined.percentiles(quantiles))
+        self.assertEqual(left.cumulative_buckets(), combined.cumulative_buckets())
+
+    def test_cumulative_buckets_and_clamping(self):
+        sketch = LatencySketch()
+        for value in (50, 100, 101, 2_000_000, -5, LatencySketch.MAX_VALUE * 2):
+            sketch.record(value)
+        buckets = dict(sketch.cumulative_buckets())
+        self.assertEqual(buckets[100], 3)
+        self.assertEqual(buckets[500], 4)
+        self.assertEqual(buckets[HISTOGRAM_BOUNDARIES_US[-1]], 4)
+        self.assertEqual(sketch.max_index, LatencySketch._index(LatencySketch.MAX_VALUE))
+        self.assertEqual(sketch.percentiles([0.0]), [0.0])
+
+
+class TestTraceSearch(unittest.IsolatedAsyncioTestCase):
+    """Поиск по индексам совпадает с полным перебором"""
+
+    async def asyncSetUp(self):
+        self.platform = DistributedTracingPlatform()
+        rng = random.Random(3)
+        for i in range(60):
+            service = rng.choice(["api", "billing", "search"])
+            operation = rng.choice(["GET /orders", "POST /orders", "GET /users"])
+            trace, root = await self.platform.start_trace(service, operation,
+                                                          attributes={"region": rng.choice(["eu", "us"])})
+            child = await self.platform.start_span(trace.trace_id, root.span_id, "db", "query")
+            child.start_time -= timedelta(milliseconds=1)
+            await self.platform.end_span(child.span_id)
+            root.start_time -= timedelta(milliseconds=rng.randint(1, 500))
+            status = SpanStatus.ERROR if i % 7 == 0 else SpanStatus.OK
+            await self.platform.end_span(root.span_id, status, "timeout" if status == SpanStatus.ERROR else "")
+
+    def brute_force(self, service=None, operation=None, tags=None, errors_only=False, min_duration_us=None):
+        found = set()
+        for trace in self.platform.traces.values():
+            root = self.platform.spans[trace.root_span_id]
+            if service and service not in trace.services:
+                continue
+            if operation and operation not in root.name:
+                continue
+            if tags and any(str(root.attributes.get(k)) != v for k, v in tags.items()):
+                continue
+            if errors_only and not trace.has_errors:
+                continue
+            if min_duration_us and trace.duration_us < min_duration_us:
+                continue
+            found.add(trace.trace_id)
+        return found
+
+    async def test_filters_match_brute_force(self):
+        for kwargs in ({"service": "billing"}, {"operation": "/orders"}, {"tags": {"region": "eu"}},
+                       {"errors_only": True}, {"service": "api", "min_duration_us": 200_000},
+                       {"service": "db"}, {}):
+            search_kwargs = dict(kwargs)
+            if "service" in search_kwargs:
+                search_kwargs["service_name"] = search_kwargs.pop("service")
+            if "operation" in search_kwargs:
+                search_kwargs["operation_name"] = search_kwargs.pop("operation")
+            result = await self.platform.search_traces(limit=1000, **search_kwargs)
+            self.assertEqual({t.trace_id for t in result.traces}, self.brute_force(**kwargs), kwargs)
+
+    async def test_time_range_and_limit(self):
+        future = await self.platform.search_traces(start_time=datetime.now() + timedelta(hours=1),
+                                                   end_time=datetime.now() + timedelta(hours=2))
+        self.assertEqual(future.total_count, 0)
+        limited = await self.platform.search_traces(limit=5)
+        self.assertEqual(limited.total_count, 5)
+
+    async def test_latency_histogram_from_sketches(self):
+        histogram = await self.platform.calculate_latency_histogram("db")
+        self.assertEqual(histogram.total_count, 60)
+        roots = [t.duration_us for t in self.platform.traces.values()]
+        api = await self.platform.calculate_latency_histogram("api", "orders")
+        self.assertLessEqual(api.p50_us, max(roots))
+        metrics = await self.platform.collect_metrics()
+        self.assertAlmostEqual(metrics.avg_trace_duration_us, sum(roots) / len(roots))
+
+
+if __name__ == '__main__':
+    unittest.main()
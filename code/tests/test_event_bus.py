@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Tests for the murmur2 partitioner, per-partition offsets and replay, and
+queued subscription delivery
+"""
+
+import unittest
+import asyncio
+import random
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from iteration251_event_bus import (
+    EventBus, SubscriptionDispatcher, TopicState, AckMode, murmur2, partition_for_key, estimate_size
+)
+
+
+class TestPartitioner(unittest.TestCase):
+    """Совместимость с DefaultPartitioner Kafka"""
+
+    def test_murmur2_matches_kafka_vectors(self):
+        # Значения из UtilsTest Kafka (signed int32)
+        vectors = {
+            "21": -973932308,
+            "foobar": -790332482,
+            "a-little-bit-long-string": -985981536,
+            "a-little-bit-longer-string": -1486304829,
+            "lkjh234lh9fiuh90y23oiuhsafujhadof229phr9h19h89h8": -58897971,
+            "abc": 479470107,
+        }
+        for key, expected in vectors.items():
+            self.assertEqual(murmur2(key), expected & 0xFFFFFFFF, key)
+
+    def test_partition_for_key(self):
+        self.assertEqual(partition_for_key("", 8), 0)
+        self.assertEqual(partition_for_key("foobar", 1), 0)
+        self.assertEqual(partition_for_key("foobar", 6), (-790332482 & 0x7FFFFFFF) % 6)
+        spread = {partition_for_key(f"user-{i}", 4) for i in range(200)}
+        self.assertEqual(spread, {0, 1, 2, 3})
+
+    def test_estimate_size(self):
+        self.assertEqual(estimate_size({"a": "xy", "b": [1, None]}), 2 + (1 + 4 + 4) + (1 + 4 + 2 + 9 + 6))
+        self.assertEqual(estimate_size(b"abc"), 3)
+
+
+class TestPublishAndReplay(unittest.IsolatedAsyncioTestCase):
+    """Смещения партиций и воспроизведение"""
+
+    async def asyncSetUp(self):
+        self.bus = EventBus()
+        self.addAsyncCleanup(self.bus.close)
+        self.topic = self.bus.create_topic("orders", partitions=4)
+
+    async def test_offsets_are_contiguous_per_partition(self):
+        rng = random.Random(3)
+        keys = [f"o{rng.randint(0, 30)}" for _ in range(300)]
+        events = await self.bus.publish_batch("orders", [{"event_type": "created", "value": i, "key": k}
+                                                         for i, k in enumerate(keys)])
+        by_partition = {}
+        for key, event in zip(keys, events):
+            self.assertEqual(event.partition, partition_for_key(key, 4))
+            by_partition.setdefault(event.partition, []).append(event)
+        for number, partition_events in by_partition.items():
+            self.assertEqual([e.offset for e in partition_events], list(range(len(partition_events))))
+            self.assertEqual(self.bus.topic_partitions[self.topic.topic_id][number].high_watermark,
+                             len(partition_events))
+            replayed = await self.bus.replay("orders", 0, partition=number)
+            self.assertEqual([e.event_id for e in replayed], [e.event_id for e in partition_events])
+        self.assertEqual(self.topic.message_count, 300)
+
+    async def test_replay_bounds(self):
+        for i in range(10):
+            await self.bus.publish("orders", "created", i, key="same")
+        partition = partition_for_key("same", 4)
+        self.assertEqual([e.value for e in await self.bus.replay("orders", 3, 5, partition)], [3, 4, 5])
+        self.assertEqual([e.value for e in await self.bus.replay("orders", -2, 1, partition)], [0, 1])
+        self.assertEqual(await self.bus.replay("orders", 8, 100, partition + 1), [])
+        self.assertEqual(len(await self.bus.replay("orders", 8, 100, partition)), 2)
+        self.assertEqual(await self.bus.replay("missing", 0), [])
+
+    async def test_inactive_topic_rejects_publish(self):
+        self.topic.state = TopicState.PAUSED
+        self.assertIsNone(await self.bus.publish("orders", "created", 1))
+        self.assertEqual(await self.bus.publish_batch("missing", [{"value": 1}]), [])
+
+
+class TestDelivery(unittest.IsolatedAsyncioTestCase):
+    """Очереди доставки подписок"""
+
+    async def asyncSetUp(self):
+        self.bus = EventBus()
+        self.addAsyncCleanup(self.bus.close)
+        self.bus.create_topic("users", partitions=3)
+
+    async def test_concurrent_lanes_keep_partition_order(self):
+        rng = random.Random(5)
+        received = []
+        running = 0
+        max_running = 0
+
+        async def handler(event):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(rng.random() / 1000)
+            running -= 1
+            received.append(event)
+
+        sub = self.bus.subscribe("users", "s", handler=handler, concurrency=3)
+        sub.ack_mode = AckMode.AUTO
+        await self.bus.publish_batch("users", [{"event_type": "t", "value": i, "key": f"u{i % 17}"}
+                                               for i in range(120)])
+        await self.bus.drain()
+
+        self.assertEqual(len(received), 120)
+        self.assertGreater(max_running, 1)
+        for number in range(3):
+            offsets = [e.offset for e in received if e.partition == number]
+            self.assertEqual(offsets, sorted(offsets))
+        self.assertEqual(sub.messages_acknowledged, 120)
+        high = {p.partition_number: p.high_watermark for p in self.bus.topic_partitions[sub.topic_id]}
+        self.assertEqual(sub.committed_offsets, high)
+
+    async def test_consumer_group_splits_partitions(self):
+        received = {"a": [], "b": []}
+
+        def collect(name):
+            async def handler(event):
+                received[name].append(event.event_id)
+            return handler
+
+        first = self.bus.subscribe("users", "a", consumer_group="g", handler=collect("a"))
+        second = self.bus.subscribe("users", "b", consumer_group="g", handler=collect("b"))
+        group = self.bus.consumer_groups["g"]
+        self.assertEqual(sorted(sum(group.assignments.values(), [])), [0, 1, 2])
+        self.assertEqual(group.generation, 2)
+
+        events = await self.bus.publish_batch("users", [{"value": i, "key": f"k{i}"} for i in range(60)])
+        await self.bus.drain()
+        self.assertFalse(set(received["a"]) & set(received["b"]))
+        self.assertEqual(sorted(received["a"] + received["b"]), sorted(e.event_id for e in events))
+        self.assertEqual(len(received["a"]),
+                         sum(1 for e in events if e.partition in group.assignments[first.subscription_id]))
+        lag = self.bus.get_consumer_lag("g")
+        self.assertEqual(set(lag), {"p0", "p1", "p2"})
+        self.assertEqual(second.messages_received, len(received["b"]))
+
+    async def test_filters_and_dead_letters(self):
+        async def handler(event):
+            if event.value == "bad":
+                raise ValueError("cannot handle")
+
+        sub = self.bus.subscribe("users", "s", event_type_filter=["created"], handler=handler)
+        for event_type, value in (("created", "ok"), ("deleted", "bad"), ("created", "bad")):
+            await self.bus.publish("users", event_type, value)
+        await self.bus.drain()
+        self.assertEqual((sub.messages_received, sub.messages_rejected), (1, 1))
+        self.assertEqual([(d.error_message, d.original_event.event_type) for d in self.bus.dead_letter_queue],
+                         [("cannot handle", "created")])
+
+    async def test_full_queue_applies_backpressure(self):
+        received = []
+
+        async def slow(event):
+            await asyncio.sleep(0.001)
+            received.append(event.value)
+
+        sub = self.bus.subscribe("users", "s", handler=slow)
+        dispatcher = SubscriptionDispatcher(sub, self.bus._deliver_event, lanes=1, ordered=True, queue_size=2)
+        self.bus.dispatchers[sub.subscription_id] = dispatcher
+
+        await self.bus.publish_batch("users", [{"value": i} for i in range(10)])
+        # Публикация дожидается места в очереди, а не теряет события
+        self.assertLessEqual(dispatcher.pending(), 2)
+        await self.bus.drain()
+        self.assertEqual(received, list(range(10)))
+        self.assertEqual(self.bus.get_statistics()["pending_deliveries"], 0)
+
+    async def test_close_stops_workers(self):
+        self.bus.subscribe("users", "s", handler=None)
+        await self.bus.publish("users", "t", 1)
+        workers = list(self.bus.dispatchers.values())[0].workers
+        await self.bus.close()
+        await asyncio.sleep(0)
+        self.assertTrue(all(w.cancelled() for w in workers))
+        self.assertEqual((self.bus.dispatchers, self.bus.get_statistics()["total_delivered"]), ({}, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
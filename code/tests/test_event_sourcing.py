@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Tests for the Event Sourcing segmented log: group commit, indexed reads,
+snapshots and crash/restart durability
+"""
+
+import unittest
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from iteration246_event_sourcing import EventSourcingPlatform, SegmentedEventLog
+
+CODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def run_and_crash(script: str):
+    """Запуск сценария в отдельном процессе, завершающемся через os._exit"""
+    subprocess.run(
+        [sys.executable, "-c", textwrap.dedent(script)],
+        cwd=CODE_DIR, check=True, timeout=60
+    )
+
+
+class TestSegmentedEventLog(unittest.TestCase):
+    """Group commit и чтение сегментов"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="event_log_test_")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_group_commit_by_count(self):
+        log = SegmentedEventLog(self.directory, group_commit_events=4,
+                                group_commit_interval_ms=60_000)
+        for position in range(1, 9):
+            log.append(position, b"x")
+        self.assertEqual(log.fsyncs, 2)
+        self.assertEqual(log.durable_position, 8)
+        log.close()
+
+    def test_timer_commits_idle_writes(self):
+        log = SegmentedEventLog(self.directory, group_commit_interval_ms=10)
+        for position in range(1, 6):
+            log.append(position, b"payload")
+        deadline = time.monotonic() + 2
+        while log.durable_position < 5 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        self.assertEqual(log.durable_position, 5)
+        self.assertGreaterEqual(log.fsyncs, 1)
+        log.close()
+
+    def test_close_joins_flusher(self):
+        log = SegmentedEventLog(self.directory, group_commit_events=100, group_commit_interval_ms=60_000)
+        log.append(1, b"x")
+        flusher = log._flusher
+        self.assertTrue(flusher.is_alive())
+        log.close()
+        self.assertFalse(flusher.is_alive())
+        self.assertEqual((log._flusher, log.durable_position), (None, 1))
+
+    def test_scan_across_segments(self):
+        log = SegmentedEventLog(self.directory, segment_max_bytes=200)
+        for position in range(1, 101):
+            log.append(position, f"event-{position}".encode())
+        self.assertGreater(len(log.segments), 1)
+        self.assertEqual([bytes(p) for p in log.scan(40, 3)], [b"event-40", b"event-41", b"event-42"])
+        self.assertEqual(len(list(log.scan(1, 1000))), 100)
+        log.close()
+
+    def test_recover_truncates_torn_tail(self):
+        log = SegmentedEventLog(self.directory)
+        for position in range(1, 4):
+            log.append(position, b"abc")
+        path = log.segments[-1].path
+        log.close()
+        with open(path, "ab") as f:
+            f.write(b"\x10\x00\x00")
+        recovered = SegmentedEventLog(self.directory)
+        self.assertEqual([p for p, _, _, _ in recovered.recover()], [1, 2, 3])
+        self.assertEqual(recovered.last_position, 3)
+        recovered.close()
+
+
+class TestEventSourcingPlatform(unittest.TestCase):
+    """Потоки, снапшоты и восстановление после перезапуска"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp(prefix="event_store_test_")
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_read_stream_and_restart(self):
+        platform = EventSourcingPlatform(self.data_dir)
+        stream = platform.create_stream("orders", "Order", "1")
+        platform.append_events(stream.stream_id, [("Created", {"n": i}) for i in range(10)])
+        platform.close()
+
+        reopened = EventSourcingPlatform(self.data_dir)
+        events = reopened.read_stream(stream.stream_id, 3, 4)
+        self.assertEqual([e.data["n"] for e in events], [3, 4, 5, 6])
+        self.assertEqual(reopened.streams[stream.stream_id].current_version, 10)
+        reopened.close()
+
+    def test_optimistic_concurrency(self):
+        platform = EventSourcingPlatform(self.data_dir)
+        stream = platform.create_stream("orders", "Order", "1")
+        platform.append_event(stream.stream_id, "Created", {}, expected_version=0)
+        with self.assertRaises(ValueError):
+            platform.append_event(stream.stream_id, "Paid", {}, expected_version=0)
+        platform.close()
+
+    def test_rebuild_state_leaves_snapshot(self):
+        platform = EventSourcingPlatform(self.data_dir, snapshot_every=5)
+        stream = platform.create_stream("accounts", "Account", "1")
+        for _ in range(12):
+            platform.append_event(stream.stream_id, "Deposited", {"amount": 1})
+
+        def reducer(state, event):
+            return {"balance": state.get("balance", 0) + event.data["amount"]}
+
+        self.assertEqual(platform.rebuild_state(stream.stream_id, reducer), {"balance": 12})
+        self.assertEqual(platform.get_latest_snapshot(stream.stream_id).version, 12)
+        platform.close()
+
+        reopened = EventSourcingPlatform(self.data_dir, snapshot_every=5)
+        reopened.append_event(stream.stream_id, "Deposited", {"amount": 5})
+        self.assertEqual(reopened.rebuild_state(stream.stream_id, reducer), {"balance": 17})
+        reopened.close()
+
+    def test_events_survive_process_crash(self):
+        run_and_crash(f"""
+            import os
+            from iteration246_event_sourcing import EventSourcingPlatform
+            platform = EventSourcingPlatform({self.data_dir!r})
+            stream = platform.create_stream("orders", "Order", "1")
+            for i in range(5):
+                platform.append_event(stream.stream_id, "Created", {{"n": i}})
+            os._exit(0)
+        """)
+        platform = EventSourcingPlatform(self.data_dir)
+        self.assertEqual(len(platform.read_all(0, 100)), 5)
+        platform.close()
+
+    def test_timer_fsyncs_before_crash(self):
+        run_and_crash(f"""
+            import os, time
+            from iteration246_event_sourcing import EventSourcingPlatform
+            platform = EventSourcingPlatform({self.data_dir!r}, group_commit_interval_ms=10)
+            stream = platform.create_stream("orders", "Order", "1")
+            for i in range(5):
+                platform.append_event(stream.stream_id, "Created", {{"n": i}})
+            time.sleep(0.2)
+            assert platform.log.fsyncs >= 1, platform.log.fsyncs
+            assert platform.log.durable_position == 5
+            os._exit(0)
+        """)
+        platform = EventSourcingPlatform(self.data_dir)
+        self.assertEqual([e.data["n"] for e in platform.read_all(0, 100)], [0, 1, 2, 3, 4])
+        platform.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Tests for compiled feature flag evaluation: closure caching, bucketing,
+dependencies and evaluate_all
+"""
+
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from iteration263_feature_flags_advanced import (
+    FeatureFlagManager, EvaluationContext, FlagType, RuleOperator, RolloutStrategy,
+    fnv1a_64, bucket_of
+)
+
+
+class TestHashing(unittest.TestCase):
+    """FNV-1a и распределение по бакетам"""
+
+    def test_fnv1a_known_vectors(self):
+        self.assertEqual(fnv1a_64(""), 0xcbf29ce484222325)
+        self.assertEqual(fnv1a_64("a"), 0xaf63dc4c8601ec8c)
+
+    def test_buckets_are_uniform_enough(self):
+        salt = fnv1a_64("flag")
+        counts = [0] * 10
+        for n in range(10000):
+            counts[bucket_of(fnv1a_64(f"user_{n}"), salt) // 10] += 1
+        self.assertTrue(all(800 < c < 1200 for c in counts), counts)
+
+
+class TestCompiledFlags(unittest.TestCase):
+    """Скомпилированные замыкания и их инвалидация"""
+
+    def setUp(self):
+        self.manager = FeatureFlagManager()
+
+    def flag(self, key, enabled=True, **kwargs):
+        flag = self.manager.create_flag(key, key, **kwargs)
+        if enabled:
+            self.manager.enable_flag(key)
+        return flag
+
+    def test_disabled_and_missing_flags(self):
+        self.flag("off", enabled=False)
+        self.assertEqual(self.manager.evaluate("off").reason, "flag_disabled")
+        self.assertEqual(self.manager.evaluate("nope").reason, "flag_not_found")
+
+    def test_closure_cached_until_flag_changes(self):
+        self.flag("f")
+        self.manager.evaluate("f")
+        compiled = self.manager.compiled["f"]
+        self.manager.evaluate("f")
+        self.assertIs(self.manager.compiled["f"], compiled)
+        self.manager.disable_flag("f")
+        self.assertNotIn("f", self.manager.compiled)
+        self.assertFalse(self.manager.evaluate("f").value)
+
+    def test_percentage_rollout_is_sticky(self):
+        self.flag("beta")
+        self.manager.set_rollout_percentage("beta", 30)
+        contexts = [EvaluationContext(user_id=f"u{n}") for n in range(2000)]
+        first = [self.manager.evaluate("beta", c).value for c in contexts]
+        self.assertEqual(first, [self.manager.evaluate("beta", c).value for c in contexts])
+        self.assertTrue(500 < sum(first) < 700)
+
+    def test_targeting_rules_in_priority_order(self):
+        self.flag("pro")
+        self.manager.add_targeting_rule("pro", "blocked", "country", RuleOperator.EQUALS, "XX",
+                                        enabled=False, priority=0)
+        self.manager.add_targeting_rule("pro", "plan", "plan", RuleOperator.IN, ["pro"], priority=1)
+        self.manager.set_rollout_percentage("pro", 0)
+        result = self.manager.evaluate("pro", EvaluationContext(user_id="u", attributes={"plan": "pro"}))
+        self.assertEqual((result.value, result.reason), (True, "rule_matched:plan"))
+        blocked = self.manager.evaluate("pro", EvaluationContext(
+            user_id="u", attributes={"plan": "pro", "country": "XX"}))
+        self.assertFalse(blocked.value)
+        self.assertEqual(self.manager.evaluate("pro", EvaluationContext(user_id="u")).reason, "rollout_excluded")
+
+    def test_variants_follow_weights(self):
+        self.flag("exp", flag_type=FlagType.STRING, default_value="control")
+        self.manager.add_variant("exp", "a", "a", 20)
+        self.manager.add_variant("exp", "b", "b", 80)
+        values = [self.manager.evaluate("exp", EvaluationContext(user_id=f"u{n}")).value for n in range(2000)]
+        self.assertTrue(300 < values.count("a") < 500)
+
+    def test_set_dependencies_recompiles(self):
+        self.flag("base", enabled=False)
+        self.flag("child")
+        self.assertTrue(self.manager.evaluate("child").value)
+        self.manager.set_dependencies("child", ["base"])
+        self.assertEqual(self.manager.evaluate("child").reason, "dependency_not_met")
+        self.manager.enable_flag("base")
+        self.assertTrue(self.manager.evaluate("child").value)
+        self.assertEqual(self.manager.audit_log[-2].action, "dependencies_changed")
+
+    def test_dependency_cycle_is_reported(self):
+        self.flag("a")
+        self.flag("b")
+        self.manager.set_dependencies("a", ["b"])
+        self.manager.set_dependencies("b", ["a"])
+        self.assertFalse(self.manager.evaluate("a").value)
+
+    def test_set_rollout_targets_recompiles(self):
+        self.flag("vip")
+        self.assertTrue(self.manager.evaluate("vip", EvaluationContext(user_id="u2")).value)
+        self.manager.set_rollout_targets("vip", user_ids=["u1"])
+        self.assertTrue(self.manager.evaluate("vip", EvaluationContext(user_id="u1")).value)
+        self.assertFalse(self.manager.evaluate("vip", EvaluationContext(user_id="u2")).value)
+        self.manager.set_rollout_targets("vip", groups=["staff"])
+        self.assertTrue(self.manager.evaluate("vip", EvaluationContext(user_id="u2", groups=["staff"])).value)
+        self.assertEqual(self.manager.get_snapshot()["flags"]["vip"]["rollout"]["groups"], ["staff"])
+
+    def test_invalidate_flag_after_direct_edit(self):
+        flag = self.flag("edited")
+        self.assertTrue(self.manager.evaluate("edited").value)
+        flag.rollout_strategy = RolloutStrategy.PERCENTAGE
+        flag.rollout_percentage = 0
+        # Замыкание ещё не знает о правке
+        self.assertTrue(self.manager.evaluate("edited").value)
+        self.manager.invalidate_flag("edited")
+        self.assertEqual(self.manager.evaluate("edited").reason, "rollout_excluded")
+
+    def test_evaluate_all_matches_evaluate(self):
+        self.flag("base")
+        self.flag("dep")
+        self.manager.set_dependencies("dep", ["base"])
+        self.flag("pct")
+        self.manager.set_rollout_percentage("pct", 50)
+        self.flag("off", enabled=False)
+        for n in range(200):
+            context = EvaluationContext(user_id=f"u{n}")
+            expected = {key: self.manager.evaluate(key, context).value for key in self.manager.flags}
+            self.assertEqual(self.manager.evaluate_all(context), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Tests for the columnar offline table, as-of joins, online multi-get and
+streaming feature statistics
+"""
+
+import unittest
+import random
+import sys
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from iteration353_feature_store import (
+    FeatureStorePlatform, OfflineFeatureTable, OnlineFeatureTable, StreamingStatistics,
+    FeatureType, StoreType, to_epoch_ms
+)
+
+
+def brute_force_as_of(rows, key, ts, ttl_ms=None):
+    """Последняя запись (по времени, затем порядку записи) не позже ts"""
+    best = None
+    for seq, (row_key, row_ts, value) in enumerate(rows):
+        if row_key == key and row_ts <= ts and (ttl_ms is None or ts - row_ts <= ttl_ms):
+            if best is None or (row_ts, seq) >= (best[0], best[1]):
+                best = (row_ts, seq, value)
+    return None if best is None else best[2]
+
+
+class TestOfflineFeatureTable(unittest.TestCase):
+    """As-of поиск совпадает с полным перебором"""
+
+    def build(self, rows, chunk: int = 37) -> OfflineFeatureTable:
+        table = OfflineFeatureTable()
+        table.add_column("f", True)
+        for start in range(0, len(rows), chunk):
+            part = rows[start:start + chunk]
+            table.append([k for k, _, _ in part], np.array([t for _, t, _ in part]),
+                         {"f": np.array([v for _, _, v in part], dtype=np.float64)})
+        return table
+
+    def check(self, rows, queries, ttl_ms=None):
+        table = self.build(rows)
+        codes = table.encode_keys([k for k, _ in queries])
+        positions = table.as_of(codes, np.array([t for _, t in queries], dtype=np.int64), ttl_ms)
+        column = table.columns["f"]
+        for (key, ts), position in zip(queries, positions.tolist()):
+            expected = brute_force_as_of(rows, key, ts, ttl_ms)
+            actual = None if position < 0 else column[position]
+            self.assertEqual(actual, expected, (key, ts))
+
+    def random_rows(self, rng, base: int, spread: int, n: int = 400):
+        return [(f"e{rng.randint(0, 20)}", base + rng.randint(0, spread), float(i)) for i in range(n)]
+
+    def test_as_of_matches_brute_force(self):
+        rng = random.Random(1)
+        rows = self.random_rows(rng, 1_000, 500)
+        queries = [(f"e{rng.randint(0, 25)}", 1_000 + rng.randint(-50, 600)) for _ in range(500)]
+        self.check(rows, queries)
+        self.check(rows, queries, ttl_ms=40)
+
+    def test_as_of_per_entity_fallback_for_wide_spans(self):
+        rng = random.Random(2)
+        rows = self.random_rows(rng, 0, 100) + [("e1", 2 ** 61, -1.0)]
+        queries = [(f"e{rng.randint(0, 25)}", rng.randint(0, 120)) for _ in range(300)] + [("e1", 2 ** 61)]
+        self.check(rows, queries)
+
+    def test_duplicate_timestamps_take_last_write(self):
+        table = self.build([("a", 10, 1.0), ("a", 10, 2.0), ("a", 5, 3.0)], chunk=1)
+        position = table.as_of(table.encode_keys(["a"]), np.array([10]))[0]
+        self.assertEqual(table.columns["f"][position], 2.0)
+
+    def test_missing_columns_are_null_filled(self):
+        table = OfflineFeatureTable()
+        table.add_column("f", True)
+        table.add_column("s", False)
+        table.append(["a"], np.array([1]), {"f": np.array([1.0])})
+        table.append(["b"], np.array([2]), {"s": np.array(["x"], dtype=object)})
+        self.assertEqual(table.row_count, 2)
+        table.compact()
+        self.assertTrue(np.isnan(table.columns["f"][1]))
+        self.assertEqual(table.columns["s"].tolist(), [None, "x"])
+        self.assertEqual(table.offsets.tolist(), [0, 1, 2])
+
+    def test_latest_in_range(self):
+        table = self.build([("a", 5, 1.0), ("a", 8, 2.0), ("b", 3, 3.0), ("b", 12, 4.0), ("c", 9, 5.0)])
+        rows = table.latest_in_range(4, 10)
+        self.assertEqual(sorted(table.columns["f"][rows].tolist()), [2.0, 5.0])
+
+
+class TestOnlineAndStatistics(unittest.TestCase):
+    """Онлайн таблица и потоковая статистика"""
+
+    def test_upsert_keeps_newest(self):
+        table = OnlineFeatureTable()
+        table.set_features(["a", "b"])
+        table.set_features(["b", "c"])
+        self.assertEqual(table.positions, {"a": 0, "b": 1, "c": 2})
+        self.assertTrue(table.upsert("k", 10, (1,)))
+        self.assertFalse(table.upsert("k", 9, (2,)))
+        self.assertTrue(table.upsert("k", 10, (3,)))
+        self.assertEqual(table.rows["k"], (10, (3,)))
+
+    def test_streaming_statistics_match_numpy(self):
+        rng = np.random.default_rng(3)
+        values = rng.normal(50, 10, 5000)
+        values[::17] = np.nan
+        stats = StreamingStatistics(sample_size=10000, seed=0)
+        for start in range(0, len(values), 333):
+            stats.update(values[start:start + 333])
+        valid = values[~np.isnan(values)]
+        self.assertEqual((stats.count, stats.null_count, stats.valid_count),
+                         (len(values), len(values) - len(valid), len(valid)))
+        self.assertAlmostEqual(stats.mean, valid.mean(), places=9)
+        self.assertAlmostEqual(stats.std, valid.std(), places=9)
+        self.assertAlmostEqual(stats.percentile(75), np.percentile(valid, 75))
+        self.assertEqual((stats.min_value, stats.max_value), (valid.min(), valid.max()))
+
+    def test_sample_is_bounded(self):
+        stats = StreamingStatistics(sample_size=100, seed=0)
+        stats.update(np.arange(10000, dtype=np.float64))
+        self.assertEqual(len(stats.sample), 100)
+        self.assertLess(abs(stats.percentile(50) - 5000), 1500)
+
+    def test_object_columns_count_nulls_only(self):
+        stats = StreamingStatistics()
+        stats.update(np.array(["a", None, "b"], dtype=object))
+        self.assertEqual((stats.count, stats.null_count, stats.valid_count), (3, 1, 0))
+
+
+class TestFeatureStorePlatform(unittest.IsolatedAsyncioTestCase):
+    """Point-in-time join и материализация"""
+
+    async def asyncSetUp(self):
+        self.platform = FeatureStorePlatform()
+        entity = await self.platform.register_entity("user", ["user_id"])
+        self.group = await self.platform.create_feature_group("users", entity.entity_id, online_ttl_days=1,
+                                                              offline_ttl_days=30)
+        self.spend = await self.platform.register_feature("spend", self.group.group_id, FeatureType.FLOAT,
+                                                          default_value=0.0)
+        self.orders = await self.platform.register_feature("orders", self.group.group_id, FeatureType.INT)
+        self.tier = await self.platform.register_feature("tier", self.group.group_id, FeatureType.STRING,
+                                                         default_value="none")
+        self.features = [self.spend.feature_id, self.orders.feature_id, self.tier.feature_id]
+        self.t0 = datetime(2026, 1, 1)
+
+    async def write(self, user, days, spend=None, orders=None, tier=None):
+        row = {"user_id": user, "event_timestamp": self.t0 + timedelta(days=days)}
+        for name, value in (("spend", spend), ("orders", orders), ("tier", tier)):
+            if value is not None:
+                row[name] = value
+        await self.platform.write_offline_features(self.group.group_id, [row])
+
+    async def test_point_in_time_join(self):
+        await self.write("u1", 1, spend=10.0, orders=1, tier="bronze")
+        await self.write("u1", 5, spend=20.0, orders=2)
+        await self.write("u2", 2, spend=7.0)
+        labels = [
+            {"user_id": "u1", "event_timestamp": self.t0},
+            {"user_id": "u1", "event_timestamp": self.t0 + timedelta(days=3)},
+            {"user_id": "u1", "event_timestamp": self.t0 + timedelta(days=5)},
+            {"user_id": "u2", "event_timestamp": self.t0 + timedelta(days=40)},
+            {"user_id": "u3", "event_timestamp": self.t0 + timedelta(days=3)},
+        ]
+        rows = await self.platform.get_training_features(self.features, labels)
+        self.assertEqual([(r["spend"], r["orders"], r["tier"]) for r in rows], [
+            (0.0, None, "none"),
+            (10.0, 1, "bronze"),
+            (20.0, 2, "none"),
+            (0.0, None, "none"),
+            (0.0, None, "none"),
+        ])
+        self.assertEqual(rows[1]["user_id"], "u1")
+
+    async def test_training_window_bounds(self):
+        await self.write("u1", 1, spend=10.0)
+        await self.write("u1", 5, spend=20.0)
+        labels = [{"user_id": "u1", "event_timestamp": self.t0 + timedelta(days=9)}]
+        capped = await self.platform.get_training_features(
+            [self.spend.feature_id], labels, end_time=self.t0 + timedelta(days=2))
+        self.assertEqual(capped[0]["spend"], 10.0)
+        floored = await self.platform.get_training_features(
+            [self.spend.feature_id], labels, start_time=self.t0 + timedelta(days=6))
+        self.assertEqual(floored[0]["spend"], 0.0)
+
+    async def test_materialize_and_online_multi_get(self):
+        now = datetime.now()
+        rows = [
+            {"user_id": "u1", "event_timestamp": now - timedelta(hours=3), "spend": 1.0, "orders": 1},
+            {"user_id": "u1", "event_timestamp": now - timedelta(hours=1), "spend": 2.0, "orders": 2},
+            {"user_id": "u2", "event_timestamp": now - timedelta(hours=2), "spend": 5.0, "tier": "gold"},
+            {"user_id": "u3", "event_timestamp": now - timedelta(days=3), "spend": 9.0},
+        ]
+        await self.platform.write_offline_features(self.group.group_id, rows)
+        self.assertEqual(await self.platform.materialize_incremental(self.group.group_id, now), 2)
+
+        results = await self.platform.get_online_features_batch(
+            self.features, [{"user_id": "u1"}, {"user_id": "u2"}, {"user_id": "u3"}, {}])
+        self.assertEqual(results, [
+            {"spend": 2.0, "orders": 2, "tier": "none"},
+            {"spend": 5.0, "orders": None, "tier": "gold"},
+            {"spend": 0.0, "orders": None, "tier": "none"},
+            {"spend": 0.0, "orders": None, "tier": "none"},
+        ])
+        self.assertEqual(await self.platform.get_online_features(self.features, {"user_id": "u2"}), results[1])
+
+        # Повторная материализация переносит только новые строки
+        later = now + timedelta(minutes=5)
+        await self.platform.write_offline_features(self.group.group_id, [
+            {"user_id": "u2", "event_timestamp": now + timedelta(minutes=1), "spend": 6.0}])
+        self.assertEqual(await self.platform.materialize_incremental(self.group.group_id, later), 1)
+        online = self.platform.online_tables[self.group.group_id]
+        self.assertEqual(online.rows["u2"][0], to_epoch_ms(now + timedelta(minutes=1)))
+        self.assertEqual((await self.platform.get_online_features(self.features, {"user_id": "u2"}))["spend"], 6.0)
+
+    async def test_offline_only_features_are_not_materialized(self):
+        offline = await self.platform.register_feature("history", self.group.group_id, FeatureType.FLOAT,
+                                                       store_type=StoreType.OFFLINE)
+        now = datetime.now()
+        await self.platform.write_offline_features(self.group.group_id, [
+            {"user_id": "u1", "event_timestamp": now - timedelta(hours=1), "history": 3.0, "spend": 1.0}])
+        await self.platform.materialize_incremental(self.group.group_id, now)
+        self.assertNotIn(offline.feature_id, self.platform.online_tables[self.group.group_id].positions)
+
+    async def test_compute_statistics(self):
+        await self.platform.write_offline_columns(
+            self.group.group_id, [f"u{i}" for i in range(100)],
+            np.full(100, to_epoch_ms(self.t0), dtype=np.int64), {"spend": np.arange(100, dtype=np.float64)})
+        stats = await self.platform.compute_statistics(self.spend.feature_id, chunk_rows=7)
+        self.assertEqual((stats.count, stats.null_count, stats.min_value, stats.max_value), (100, 0, 0.0, 99.0))
+        self.assertAlmostEqual(stats.mean, 49.5)
+        self.assertAlmostEqual(stats.percentiles["p50"], 49.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Tests for cached federation query plans, dependency-driven fetch execution
+and batched entity resolution
+"""
+
+import unittest
+import asyncio
+import sys
+import os
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import iteration282_graphql_federation as federation
+from iteration282_graphql_federation import (
+    GraphQLFederationManager, EntityBatchLoader, FieldDefinition, FieldType, FetchNode, QueryRequest
+)
+
+
+def build_manager() -> GraphQLFederationManager:
+    manager = GraphQLFederationManager()
+    for name in ("users", "reviews", "inventory"):
+        manager.register_service(name, f"http://{name}:4000/graphql")
+    manager.add_type_to_service("users", "User", {
+        "id": FieldDefinition("id", FieldType.ID, nullable=False),
+        "username": FieldDefinition("username", FieldType.STRING),
+    }, key_fields=["id"])
+    manager.add_type_to_service("reviews", "User", {
+        "reviews": FieldDefinition("reviews", FieldType.OBJECT, type_name="Review", is_list=True),
+    }, key_fields=["id"], extends=True)
+    manager.add_type_to_service("inventory", "User", {
+        "cart": FieldDefinition("cart", FieldType.STRING),
+    }, key_fields=["id"], extends=True)
+    manager.compose_supergraph()
+    return manager
+
+
+def request(fields, query: str = "query { me { id } }") -> QueryRequest:
+    return QueryRequest(request_id="r", query=query, requested_fields={"User": fields})
+
+
+class TestQueryPlans(unittest.TestCase):
+    """Построение и кэширование планов"""
+
+    def setUp(self):
+        self.manager = build_manager()
+
+    def services(self, plan):
+        return [node.service_name for node in plan.fetch_nodes]
+
+    def test_extensions_depend_on_owner_fetch(self):
+        plan = self.manager.create_query_plan(request(["reviews", "username", "cart"]))
+        self.assertEqual(self.services(plan), ["users", "reviews", "inventory"])
+        self.assertEqual([node.depends_on for node in plan.fetch_nodes], [[], [0], [0]])
+        self.assertEqual([node.requires_entities for node in plan.fetch_nodes], [False, True, True])
+        self.assertEqual(plan.parallel_fetches, [[0], [1, 2]])
+
+    def test_owner_key_fetch_added_for_extension_only_queries(self):
+        plan = self.manager.create_query_plan(request(["reviews"]))
+        self.assertEqual(self.services(plan), ["users", "reviews"])
+        self.assertEqual(plan.fetch_nodes[0].fields, ["id"])
+        self.assertEqual(plan.fetch_nodes[1].depends_on, [0])
+
+        owner_only = self.manager.create_query_plan(request(["username", "id"]))
+        self.assertEqual(self.services(owner_only), ["users"])
+
+    def test_cycles_are_grouped_last(self):
+        nodes = [FetchNode(0, "a"), FetchNode(1, "b", depends_on=[2]), FetchNode(2, "c", depends_on=[1]),
+                 FetchNode(3, "d", depends_on=[0, 99])]
+        self.assertEqual(self.manager._build_parallel_groups(nodes), [[0], [3], [1, 2]])
+
+    def test_plan_cache_normalizes_and_invalidates(self):
+        plan, cached = self.manager.get_query_plan(request(["username", "reviews"], "query {  me { id } }"))
+        self.assertFalse(cached)
+        again, cached = self.manager.get_query_plan(request(["reviews", "username"], "query { me\n { id } }"))
+        self.assertTrue(cached)
+        self.assertIs(plan, again)
+        self.assertFalse(self.manager.get_query_plan(request(["username"]))[1])
+
+        self.manager.compose_supergraph()
+        replanned, cached = self.manager.get_query_plan(request(["username", "reviews"]))
+        self.assertFalse(cached)
+        self.assertEqual(replanned.supergraph_version, plan.supergraph_version + 1)
+        self.assertEqual((self.manager.plan_cache_hits, self.manager.plan_cache_misses), (1, 3))
+
+    def test_plan_cache_is_bounded_lru(self):
+        with patch.object(federation, "PLAN_CACHE_SIZE", 2):
+            for fields in (["id"], ["username"], ["id"], ["cart"]):
+                self.manager.get_query_plan(request(fields))
+        self.assertEqual(len(self.manager.plan_cache), 2)
+        self.assertTrue(self.manager.get_query_plan(request(["id"]))[1])
+        self.assertFalse(self.manager.get_query_plan(request(["username"]))[1])
+
+
+class TestEntityBatchLoader(unittest.IsolatedAsyncioTestCase):
+    """Объединение _entities запросов"""
+
+    async def asyncSetUp(self):
+        self.calls = []
+
+        async def batch_fn(service_name, typename, representations):
+            self.calls.append((service_name, typename, [r["id"] for r in representations]))
+            if typename == "Broken":
+                raise RuntimeError("subgraph down")
+            if typename == "Short":
+                return [{"id": r["id"]} for r in representations[1:]]
+            if typename == "Slow":
+                await asyncio.sleep(10)
+            return [{"id": r["id"], "name": f"n{r['id']}"} for r in representations]
+
+        self.loader = EntityBatchLoader(batch_fn)
+
+    async def test_same_tick_loads_share_one_deduplicated_batch(self):
+        results = await asyncio.gather(
+            self.loader.load_many("users", "User", [{"id": 1}, {"id": 2}]),
+            self.loader.load_many("users", "User", [{"id": 2}, {"id": 3}, {"id": 1}]),
+            self.loader.load_many("orders", "User", [{"id": 1}]),
+        )
+        self.assertEqual([[e["id"] for e in r] for r in results], [[1, 2], [2, 3, 1], [1]])
+        self.assertEqual(sorted(self.calls), [("orders", "User", [1]), ("users", "User", [1, 2, 3])])
+        self.assertEqual((self.loader.loads, self.loader.batches, self.loader.deduplicated), (3, 2, 2))
+        self.assertEqual(self.loader.avg_batch_size, 2)
+
+    async def test_later_ticks_start_new_batches(self):
+        await self.loader.load_many("users", "User", [{"id": 1}])
+        await self.loader.load_many("users", "User", [{"id": 1}])
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(await self.loader.load_many("users", "User", []), [])
+        self.assertEqual(self.loader.loads, 2)
+
+    async def test_batch_error_fails_every_caller(self):
+        results = await asyncio.gather(
+            self.loader.load_many("users", "Broken", [{"id": 1}]),
+            self.loader.load_many("users", "Broken", [{"id": 2}]),
+            return_exceptions=True)
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results), results)
+        self.assertEqual(len(self.calls), 1)
+
+    async def test_short_batch_fails_callers_instead_of_hanging(self):
+        results = await asyncio.wait_for(asyncio.gather(
+            self.loader.load_many("users", "Short", [{"id": 1}, {"id": 2}]),
+            self.loader.load_many("users", "Short", [{"id": 3}]),
+            return_exceptions=True), timeout=1)
+        self.assertEqual(len(results), 2)
+        self.assertTrue(all("expected 3, got 2" in str(r) for r in results), results)
+        await asyncio.sleep(0)
+        self.assertEqual(self.loader.background_tasks, set())
+
+    async def test_cancelled_batch_cancels_callers(self):
+        load = asyncio.create_task(self.loader.load_many("users", "Slow", [{"id": 1}]))
+        await asyncio.sleep(0.01)
+        for task in list(self.loader.background_tasks):
+            task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await asyncio.wait_for(load, timeout=1)
+
+
+class TestQueryExecution(unittest.IsolatedAsyncioTestCase):
+    """Выполнение плана через пул соединений"""
+
+    async def asyncSetUp(self):
+        for name, value in (("SIMULATED_ERROR_RATE", 0.0), ("SIMULATED_LATENCY_MS", (0.1, 0.5)),
+                            ("SIMULATED_CONNECT_MS", 0.1)):
+            patcher = patch.object(federation, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.manager = build_manager()
+
+    async def test_entity_fields_resolved_from_owner_keys(self):
+        result = await self.manager.execute_query(request(["reviews", "username"]))
+        self.assertEqual(result.errors, [])
+        self.assertEqual(result.data["username"]["username"], "value_username")
+        self.assertEqual(result.data["reviews"], [{"reviews": "resolved_reviews"}])
+        fetches = result.extensions["tracing"]["fetches"]
+        self.assertEqual([f["service"] for f in fetches], ["users", "reviews"])
+        self.assertEqual(fetches[1]["entities"], 1)
+        self.assertGreaterEqual(fetches[1]["startMs"], fetches[0]["startMs"] + fetches[0]["durationMs"])
+        self.assertEqual(result.extensions["queryPlan"]["parallelGroups"], 2)
+
+    async def test_repeated_queries_reuse_plans_and_connections(self):
+        for n in range(3):
+            result = await self.manager.execute_query(request(["username", "cart"]))
+            self.assertEqual(result.extensions["queryPlan"]["cached"], n > 0)
+        pool = self.manager.connection_pools["users"]
+        self.assertEqual((pool.opened, pool.reused, pool.calls), (1, 2, 3))
+        health = self.manager.get_service_health()
+        self.assertEqual((health["users"]["connections_opened"], health["users"]["connections_reused"]), (1, 2))
+        stats = self.manager.get_statistics()
+        self.assertEqual((stats["queries_success"], stats["plan_cache_hits"], stats["entity_batches"]), (3, 2, 3))
+
+    async def test_concurrent_resolve_entities_share_one_call(self):
+        results = await asyncio.gather(*(
+            self.manager.resolve_entities("User", [{"__typename": "User", "id": i}], "reviews") for i in range(5)))
+        self.assertEqual([r[0]["id"] for r in results], list(range(5)))
+        self.assertEqual(results[0][0]["reviews"], "resolved_reviews")
+        self.assertEqual(self.manager.services["reviews"].requests_count, 1)
+        self.assertEqual(await self.manager.resolve_entities("Missing", [{"id": 1}]), [])
+
+    async def test_failed_owner_fails_dependent_fetches(self):
+        with patch.object(federation, "SIMULATED_ERROR_RATE", 1.0):
+            result = await self.manager.execute_query(request(["username", "reviews"]))
+        self.assertEqual(len(result.errors), 2)
+        self.assertTrue(result.errors[1]["message"].startswith("Dependency failed for reviews"))
+        self.assertEqual(self.manager.connection_pools["users"].idle, federation.deque())
+        self.assertEqual(self.manager.queries_failed, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
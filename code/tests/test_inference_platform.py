@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Tests for the inference micro-batcher, response cache eviction policies and
+streaming batch jobs
+"""
+
+import unittest
+import asyncio
+import csv
+import json
+import tempfile
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from iteration356_inference_platform import (
+    InferencePlatform, MicroBatcher, ResponseCache, CacheConfig, CacheStrategy, ModelFormat,
+    LatencyHistogram, canonical_input_hash
+)
+
+
+class DoublingModel:
+    """Пакетная модель, запоминающая размеры пакетов"""
+
+    def __init__(self, delay: float = 0.001):
+        self.delay = delay
+        self.batch_sizes = []
+        self.running = 0
+        self.max_running = 0
+
+    async def handle(self, inputs):
+        self.batch_sizes.append(len(inputs))
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(self.delay)
+        self.running -= 1
+        return [x * 2 for x in inputs]
+
+
+class TestMicroBatcher(unittest.IsolatedAsyncioTestCase):
+    """Объединение вызовов в пакеты"""
+
+    async def test_concurrent_calls_share_batches(self):
+        model = DoublingModel()
+        batcher = MicroBatcher(model.handle, max_batch_size=4, max_wait_ms=5, max_inflight=1)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+        self.assertEqual(results, [i * 2 for i in range(10)])
+        self.assertEqual(model.batch_sizes, [4, 4, 2])
+        self.assertEqual(model.max_running, 1)
+        self.assertEqual((batcher.batches, batcher.largest_batch, batcher.inflight), (3, 4, 0))
+        self.assertAlmostEqual(batcher.avg_batch_size, 10 / 3)
+
+    async def test_inflight_limit_allows_parallel_batches(self):
+        model = DoublingModel()
+        batcher = MicroBatcher(model.handle, max_batch_size=2, max_wait_ms=5, max_inflight=3)
+        await asyncio.gather(*(batcher.submit(i) for i in range(12)))
+        self.assertEqual(sum(model.batch_sizes), 12)
+        self.assertEqual(model.max_running, 3)
+
+    async def test_idle_single_call_is_not_delayed(self):
+        model = DoublingModel(delay=0)
+        batcher = MicroBatcher(model.handle, max_batch_size=32, max_wait_ms=10_000, max_inflight=1)
+        self.assertEqual(await asyncio.wait_for(batcher.submit(21), 1), 42)
+
+    async def test_errors_fail_every_caller_in_batch(self):
+        async def broken(inputs):
+            raise RuntimeError("model crashed")
+
+        async def short(inputs):
+            return inputs[:1]
+
+        for handler, error in ((broken, RuntimeError), (short, ValueError)):
+            batcher = MicroBatcher(handler, max_batch_size=8, max_wait_ms=1, max_inflight=1)
+            results = await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+            self.assertTrue(all(isinstance(r, error) for r in results), results)
+            self.assertEqual(batcher.inflight, 0)
+
+    async def test_cancelled_callers_are_skipped(self):
+        model = DoublingModel()
+        batcher = MicroBatcher(model.handle, max_batch_size=4, max_wait_ms=1, max_inflight=1)
+        first = asyncio.create_task(batcher.submit(1))
+        await asyncio.sleep(0)
+        queued = [asyncio.create_task(batcher.submit(i)) for i in range(2, 5)]
+        await asyncio.sleep(0)
+        queued[0].cancel()
+        self.assertEqual(await first, 2)
+        self.assertEqual(await asyncio.gather(*queued[1:]), [6, 8])
+        self.assertEqual(model.batch_sizes, [1, 2])
+
+
+class TestResponseCache(unittest.TestCase):
+    """Вытеснение и срок жизни записей"""
+
+    def cache(self, strategy: CacheStrategy, entries: int, ttl_seconds: int = 3600) -> ResponseCache:
+        cache = ResponseCache(CacheConfig(config_id="c", endpoint_id="e", cache_strategy=strategy,
+                                          ttl_seconds=ttl_seconds))
+        cache.max_bytes = entries * (2 + len(json.dumps(0)))
+        return cache
+
+    def test_lru_evicts_least_recently_used(self):
+        cache = self.cache(CacheStrategy.LRU, 2)
+        cache.put("k1", 1)
+        cache.put("k2", 2)
+        self.assertEqual(cache.get("k1"), 1)
+        cache.put("k3", 3)
+        self.assertIsNone(cache.get("k2"))
+        self.assertEqual((cache.get("k1"), cache.get("k3")), (1, 3))
+        self.assertEqual((cache.evictions, cache.size_bytes), (1, cache.max_bytes))
+
+    def test_lfu_evicts_least_frequently_used(self):
+        cache = self.cache(CacheStrategy.LFU, 2)
+        cache.put("k1", 1)
+        cache.put("k2", 2)
+        for _ in range(3):
+            cache.get("k1")
+        cache.get("k2")
+        cache.put("k3", 3)
+        self.assertEqual(set(cache.entries), {"k1", "k3"})
+        # Новая запись с частотой 1 вытесняется первой
+        cache.put("k4", 4)
+        self.assertEqual(set(cache.entries), {"k1", "k4"})
+        self.assertEqual(set(cache.frequencies), {"k1", "k4"})
+
+    def test_replacing_key_keeps_size_consistent(self):
+        cache = self.cache(CacheStrategy.LFU, 2)
+        cache.put("k1", 1)
+        cache.get("k1")
+        cache.put("k1", 5)
+        self.assertEqual((cache.get("k1"), cache.size_bytes, cache.frequencies["k1"]), (5, 3, 2))
+        self.assertEqual(cache.evictions, 0)
+
+    def test_ttl_expiry_and_oversized_values(self):
+        cache = self.cache(CacheStrategy.TTL, 2, ttl_seconds=0)
+        cache.put("k1", 1)
+        self.assertIsNone(cache.get("k1"))
+        self.assertEqual((cache.expirations, cache.size_bytes), (1, 0))
+        cache.put("big", "x" * 100)
+        self.assertEqual(cache.entries, {})
+
+    def test_canonical_hash_ignores_key_order(self):
+        self.assertEqual(canonical_input_hash({"a": 1, "b": [1, 2]}), canonical_input_hash({"b": [1, 2], "a": 1}))
+        self.assertNotEqual(canonical_input_hash({"a": 1}), canonical_input_hash({"a": 2}))
+
+    def test_latency_histogram(self):
+        histogram = LatencyHistogram([1, 10])
+        for value in (0.5, 5, 5, 50):
+            histogram.record(value)
+        self.assertEqual((histogram.percentile(0.25), histogram.percentile(0.5), histogram.percentile(1.0)),
+                         (1, 10, 50))
+
+
+class TestInferencePlatform(unittest.IsolatedAsyncioTestCase):
+    """Вызовы эндпоинта, кэш и пакетные задания"""
+
+    async def asyncSetUp(self):
+        self.platform = InferencePlatform()
+        self.calls = []
+
+        def score(inputs):
+            self.calls.append(len(inputs))
+            return [{"prediction": int(x["value"]) % 2, "probabilities": [0.5, 0.5]} for x in inputs]
+
+        artifact = await self.platform.register_model("m", ModelFormat.ONNX, "/models/m", version="3")
+        await self.platform.register_model_handler(artifact.artifact_id, score)
+        self.endpoint = await self.platform.create_endpoint("ep", artifact.artifact_id)
+
+    async def test_batch_invoke_keeps_input_order(self):
+        inputs = [{"value": i} for i in range(50)]
+        responses = await self.platform.batch_invoke(self.endpoint.endpoint_id, inputs)
+        self.assertEqual([r.predictions[0] for r in responses], [i % 2 for i in range(50)])
+        self.assertEqual(sum(self.calls), 50)
+        self.assertLess(len(self.calls), 50)
+        self.assertEqual(responses[0].model_version, "3")
+        counts = self.platform.request_counts[self.endpoint.endpoint_id]
+        self.assertEqual((counts["total"], counts["successful"]), (50, 50))
+
+    async def test_cache_hits_skip_model(self):
+        config = await self.platform.configure_cache(self.endpoint.endpoint_id, CacheStrategy.LRU)
+        for _ in range(3):
+            await self.platform.invoke(self.endpoint.endpoint_id, {"value": 7})
+        await self.platform.invoke(self.endpoint.endpoint_id, {"value": 8})
+        self.assertEqual((config.hit_count, config.miss_count), (2, 2))
+        self.assertEqual(sum(self.calls), 2)
+
+        await self.platform.configure_cache(self.endpoint.endpoint_id, CacheStrategy.NO_CACHE)
+        await self.platform.invoke(self.endpoint.endpoint_id, {"value": 7})
+        self.assertEqual(sum(self.calls), 3)
+
+    async def test_failed_model_call_returns_none(self):
+        def broken(inputs):
+            raise RuntimeError("boom")
+
+        await self.platform.register_model_handler(self.endpoint.model_artifact_id, broken)
+        self.assertIsNone(await self.platform.invoke(self.endpoint.endpoint_id, {"value": 1}))
+        self.assertEqual(self.platform.request_counts[self.endpoint.endpoint_id]["failed"], 1)
+        self.assertTrue(self.platform.requests[-1].error.startswith("RuntimeError"))
+
+    async def test_batch_job_streams_csv_and_jsonl(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        csv_in = os.path.join(directory.name, "in.csv")
+        with open(csv_in, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["id", "value"])
+            writer.writeheader()
+            writer.writerows({"id": f"r{i}", "value": i} for i in range(25))
+        jsonl_in = os.path.join(directory.name, "in.jsonl")
+        with open(jsonl_in, "w") as f:
+            f.writelines(json.dumps({"value": i}) + "\n" for i in range(5))
+
+        csv_out = os.path.join(directory.name, "out.csv")
+        job = await self.platform.create_batch_job(self.endpoint.endpoint_id, "csv", csv_in, csv_out, batch_size=10)
+        await self.platform.run_batch_job(job.job_id)
+        self.assertEqual((job.status, job.total_records, job.processed_records), ("completed", 25, 25))
+        with open(csv_out, newline="") as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([r["id"] for r in rows], [f"r{i}" for i in range(25)])
+        self.assertEqual([int(r["prediction"]) for r in rows], [i % 2 for i in range(25)])
+        self.assertEqual(json.loads(rows[0]["probabilities"]), [0.5, 0.5])
+
+        jsonl_out = os.path.join(directory.name, "out.jsonl")
+        job = await self.platform.create_batch_job(self.endpoint.endpoint_id, "jsonl", jsonl_in, jsonl_out,
+                                                   input_format="jsonl", output_format="jsonl")
+        await self.platform.run_batch_job(job.job_id)
+        with open(jsonl_out) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([line["input"]["value"] for line in lines], list(range(5)))
+
+    async def test_batch_job_failures(self):
+        missing = await self.platform.create_batch_job(self.endpoint.endpoint_id, "missing",
+                                                       "/nonexistent/in.csv", os.devnull)
+        await self.platform.run_batch_job(missing.job_id)
+        self.assertEqual(missing.status, "failed")
+        self.assertTrue(missing.error.startswith("FileNotFoundError"))
+
+        parquet = await self.platform.create_batch_job(self.endpoint.endpoint_id, "parquet", os.devnull,
+                                                       os.devnull, input_format="parquet")
+        await self.platform.run_batch_job(parquet.job_id)
+        self.assertEqual((parquet.status, parquet.error), ("failed", "ValueError: Unsupported input format: parquet"))
+
+
+if __name__ == '__main__':
+    unittest.main()
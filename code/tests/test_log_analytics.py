@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Tests for the log inverted index: tokenization, query parsing, posting list
+intersection, time buckets and retention
+"""
+
+import unittest
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from iteration358_log_analytics import (
+    LogAnalyticsPlatform, LogSearchIndex, LogEntry, LogLevel,
+    tokenize, parse_query, parse_duration
+)
+
+
+BASE = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def entry(log_id: str, message: str, seconds: int = 0, level: LogLevel = LogLevel.INFO,
+          service: str = "api", **fields) -> LogEntry:
+    return LogEntry(log_id=log_id, raw_message=message, level=level, service=service,
+                    timestamp=BASE + timedelta(seconds=seconds), fields=fields)
+
+
+class TestQueryParsing(unittest.TestCase):
+    """Токенизация и разбор запросов"""
+
+    def test_tokenize_splits_camel_case(self):
+        self.assertEqual(tokenize("OutOfMemoryError at db-01"),
+                         ["outofmemoryerror", "out", "of", "memory", "error", "at", "db", "01"])
+        self.assertEqual(tokenize("HTTP 500"), ["http", "500"])
+
+    def test_parse_query_clauses(self):
+        clauses = parse_query('timeout level:ERROR OR "connection reset" user:42')
+        self.assertEqual(len(clauses), 2)
+        self.assertEqual(clauses[0].terms, ["timeout"])
+        self.assertEqual(clauses[0].keywords, [("level", "error")])
+        self.assertEqual(clauses[1].phrases, ["connection reset"])
+        self.assertEqual(clauses[1].field_terms, [("user", "42")])
+        self.assertTrue(parse_query("*")[0].is_empty())
+
+    def test_parse_duration(self):
+        self.assertEqual(parse_duration("5m"), timedelta(minutes=5))
+        self.assertIsNone(parse_duration("soon"))
+        self.assertIsNone(parse_duration(""))
+
+
+class TestLogSearchIndex(unittest.TestCase):
+    """Выполнение запросов по индексу"""
+
+    def setUp(self):
+        self.index = LogSearchIndex(time_bucket_seconds=60)
+        self.logs = [
+            entry("l0", "Connection timeout to db", 0, LogLevel.ERROR, "db"),
+            entry("l1", "connection reset by peer", 30, LogLevel.WARN, "api", user=42),
+            entry("l2", "Request served", 90, LogLevel.INFO, "api", user=7),
+            entry("l3", "Timeout waiting for lock", 150, LogLevel.ERROR, "api"),
+            entry("l4", "reset the connection pool", 200, LogLevel.INFO, "db"),
+        ]
+        for log in self.logs:
+            self.index.add(log)
+
+    def search(self, query, **kwargs):
+        return sorted(self.index.docs[d].log_id for d in self.index.execute(parse_query(query), **kwargs))
+
+    def test_terms_keywords_and_or(self):
+        self.assertEqual(self.search("timeout"), ["l0", "l3"])
+        self.assertEqual(self.search("timeout service:api"), ["l3"])
+        self.assertEqual(self.search("served OR lock"), ["l2", "l3"])
+        self.assertEqual(self.search("missing"), [])
+
+    def test_phrase_checks_adjacency(self):
+        self.assertEqual(self.search("connection reset"), ["l1", "l4"])
+        self.assertEqual(self.search('"connection reset"'), ["l1"])
+
+    def test_field_and_keyword_filters(self):
+        self.assertEqual(self.search("user:42"), ["l1"])
+        self.assertEqual(self.search("*", keyword_filters={"level": ["error", "warn"]}), ["l0", "l1", "l3"])
+        self.assertEqual(self.search("connection", field_filters={"user": 42}), ["l1"])
+
+    def test_time_range_uses_bucket_edges(self):
+        self.assertEqual(self.search("*", time_range_start=BASE + timedelta(seconds=30),
+                                     time_range_end=BASE + timedelta(seconds=150)), ["l1", "l2", "l3"])
+        self.assertEqual(self.search("connection", time_range_start=BASE + timedelta(seconds=100)), ["l4"])
+
+    def test_top_k_by_timestamp(self):
+        matched = self.index.execute(parse_query("*"))
+        self.assertEqual([log.log_id for log in self.index.top_k(matched, 2)], ["l4", "l3"])
+        self.assertEqual([log.log_id for log in self.index.top_k(matched, 2, offset=1, descending=False)],
+                         ["l1", "l2"])
+
+    def test_remove_and_retention(self):
+        self.assertIs(self.index.remove("l3"), self.logs[3])
+        self.assertIsNone(self.index.remove("l3"))
+        self.assertEqual(self.search("timeout"), ["l0"])
+        removed = self.index.remove_before(BASE + timedelta(seconds=90))
+        self.assertEqual(sorted(log.log_id for log in removed), ["l0", "l1"])
+        self.assertEqual(self.search("*"), ["l2", "l4"])
+        self.assertEqual(self.index.keyword_counts["level"]["error"], 0)
+
+    def test_compaction_drops_dead_postings(self):
+        index = LogSearchIndex()
+        for i in range(3000):
+            index.add(entry(f"x{i}", f"event {i % 3}", i))
+        index.remove_before(BASE + timedelta(seconds=2500))
+        self.assertEqual(len(index), 500)
+        self.assertEqual(index.deleted_count, 0)
+        self.assertEqual(len(index.postings["event"]), 500)
+        self.assertEqual(len(index.execute(parse_query("event 1"))), 167)
+
+
+class TestPlatformSearch(unittest.IsolatedAsyncioTestCase):
+    """Поиск через платформу"""
+
+    async def test_search_and_saved_search(self):
+        platform = LogAnalyticsPlatform()
+        source = await platform.create_log_source("app", "file")
+        for i in range(20):
+            await platform.ingest_log(source.source_id, f"payment failed code {i % 4}",
+                                      level=LogLevel.ERROR if i % 2 else LogLevel.INFO,
+                                      service="billing")
+        result = await platform.search("payment code 1", levels=[LogLevel.ERROR], size=3)
+        self.assertEqual(result.total_hits, 5)
+        self.assertEqual(len(result.hits), 3)
+
+        saved = await platform.save_search("errors", "failed", filters={"level": "error"})
+        self.assertEqual((await platform.run_saved_search(saved.saved_id)).total_hits, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Tests for MessageBroker routing tables, queue buffers and batch APIs
+"""
+
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from iteration346_message_broker import (
+    MessageBroker, ExchangeType, QueueType, AcknowledgeMode, MessageStatus,
+    RoutingTable, Binding, Message, QueueBuffer
+)
+
+
+def binding(destination: str, routing_key: str = "", **arguments) -> Binding:
+    return Binding(binding_id=destination, source="ex", destination=destination,
+                   routing_key=routing_key, arguments=arguments)
+
+
+class TestRoutingTable(unittest.TestCase):
+    """Таблицы маршрутизации по типам обменов"""
+
+    def test_topic_wildcards(self):
+        table = RoutingTable(ExchangeType.TOPIC)
+        for name, pattern in (("star", "orders.*.created"), ("hash", "orders.#"),
+                              ("exact", "orders.eu.created"), ("all", "#"), ("tail", "#.created")):
+            table.add(binding(name, pattern))
+        self.assertEqual(set(table.route("orders.eu.created", {})), {"star", "hash", "exact", "all", "tail"})
+        self.assertEqual(set(table.route("orders", {})), {"hash", "all"})
+        self.assertEqual(set(table.route("orders.eu.paid.created", {})), {"hash", "all", "tail"})
+        self.assertEqual(set(table.route("users.created", {})), {"all", "tail"})
+
+    def test_topic_cache_invalidated_by_new_binding(self):
+        table = RoutingTable(ExchangeType.TOPIC)
+        table.add(binding("a", "logs.*"))
+        self.assertEqual(table.route("logs.error", {}), ("a",))
+        table.add(binding("b", "logs.error"))
+        self.assertEqual(set(table.route("logs.error", {})), {"a", "b"})
+
+    def test_direct_fanout_and_headers(self):
+        direct = RoutingTable(ExchangeType.DIRECT)
+        direct.add(binding("q1", "k"))
+        direct.add(binding("q1", "k"))
+        direct.add(binding("q2", "k"))
+        self.assertEqual(direct.route("k", {}), ("q1", "q2"))
+        self.assertEqual(direct.route("other", {}), ())
+
+        fanout = RoutingTable(ExchangeType.FANOUT)
+        fanout.add(binding("q1"))
+        fanout.add(binding("q2"))
+        self.assertEqual(fanout.route("anything", {}), ("q1", "q2"))
+
+        headers = RoutingTable(ExchangeType.HEADERS)
+        headers.add(binding("all", format="pdf", type="report"))
+        headers.add(binding("any", **{"x-match": "any", "format": "pdf", "type": "log"}))
+        self.assertEqual(headers.route("", {"format": "pdf", "type": "report"}), ("all", "any"))
+        self.assertEqual(headers.route("", {"format": "csv", "type": "log"}), ("any",))
+
+
+class TestQueueBuffer(unittest.TestCase):
+    """Порядок выдачи буфера очереди"""
+
+    def test_priority_then_fifo(self):
+        buffer = QueueBuffer(priority=True)
+        for message_id, priority in (("a", 1), ("b", 5), ("c", 1), ("d", 5)):
+            buffer.push(Message(message_id=message_id), priority)
+        self.assertEqual([m.message_id for m in buffer.pop_many(10)], ["b", "d", "a", "c"])
+        self.assertEqual(len(buffer), 0)
+
+
+class TestBroker(unittest.IsolatedAsyncioTestCase):
+    """Публикация, потребление и подтверждение"""
+
+    async def asyncSetUp(self):
+        self.broker = MessageBroker()
+        await self.broker.declare_exchange("events", ExchangeType.TOPIC)
+        await self.broker.declare_queue("orders")
+        await self.broker.bind_queue("events", "orders", "orders.#")
+
+    async def test_batch_publish_consume_ack(self):
+        published = await self.broker.publish_batch(
+            "events", [("orders.created", b"1"), ("users.created", b"2"), ("orders.paid", b"3")])
+        self.assertEqual(len(published), 3)
+        # Сообщение без маршрута не удерживается в памяти
+        self.assertNotIn(published[1].message_id, self.broker.messages)
+
+        consumer = await self.broker.create_consumer("orders", prefetch_count=10)
+        batch = await self.broker.consume_batch(consumer.consumer_id)
+        self.assertEqual([m.body for m in batch], [b"1", b"3"])
+        acked = await self.broker.acknowledge_batch([m.message_id for m in batch] + ["missing"],
+                                                   consumer.consumer_id)
+        self.assertEqual(acked, 2)
+        queue = self.broker.queues_by_name["orders"]
+        self.assertEqual((queue.message_count, queue.unacked_messages), (0, 0))
+        self.assertEqual(self.broker.messages, {})
+
+    async def test_prefetch_limits_unacked(self):
+        await self.broker.publish_batch("events", [("orders.x", b"")] * 5)
+        consumer = await self.broker.create_consumer("orders", prefetch_count=2)
+        first = await self.broker.consume_batch(consumer.consumer_id, 10)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(await self.broker.consume_batch(consumer.consumer_id, 10), [])
+        await self.broker.acknowledge_message(first[0].message_id, consumer.consumer_id)
+        self.assertEqual(len(await self.broker.consume_batch(consumer.consumer_id, 10)), 1)
+
+    async def test_auto_ack_releases_messages(self):
+        await self.broker.publish_batch("events", [("orders.x", b"")] * 3)
+        consumer = await self.broker.create_consumer("orders", acknowledge_mode=AcknowledgeMode.AUTO)
+        messages = await self.broker.consume_batch(consumer.consumer_id)
+        self.assertEqual(len(messages), 3)
+        self.assertTrue(all(m.status == MessageStatus.ACKNOWLEDGED for m in messages))
+        self.assertEqual(self.broker.messages, {})
+
+    async def test_fanout_message_released_after_all_queues(self):
+        await self.broker.declare_exchange("fan", ExchangeType.FANOUT)
+        for name in ("q1", "q2"):
+            await self.broker.declare_queue(name)
+            await self.broker.bind_queue("fan", name)
+        message = await self.broker.publish_message("fan", "", b"x")
+        c1 = await self.broker.create_consumer("q1")
+        c2 = await self.broker.create_consumer("q2")
+        await self.broker.acknowledge_message((await self.broker.consume_message(c1.consumer_id)).message_id,
+                                              c1.consumer_id)
+        self.assertIn(message.message_id, self.broker.messages)
+        await self.broker.acknowledge_message((await self.broker.consume_message(c2.consumer_id)).message_id,
+                                              c2.consumer_id)
+        self.assertNotIn(message.message_id, self.broker.messages)
+
+    async def test_max_length_dead_letters_to_dlx(self):
+        await self.broker.declare_exchange("dlx", ExchangeType.FANOUT)
+        await self.broker.declare_queue("parked")
+        await self.broker.bind_queue("dlx", "parked")
+        await self.broker.declare_queue("bounded", max_length=1, dead_letter_exchange="dlx")
+        await self.broker.bind_queue("events", "bounded", "audit.*")
+        await self.broker.publish_batch("events", [("audit.a", b"1"), ("audit.b", b"2")])
+        self.assertEqual(self.broker.queues_by_name["bounded"].message_count, 1)
+        self.assertEqual(self.broker.queues_by_name["parked"].message_count, 1)
+        self.assertEqual(len(self.broker.dead_letters), 1)
+
+    async def test_unbind_rebuilds_routes(self):
+        extra = await self.broker.bind_queue("events", "orders", "users.*")
+        await self.broker.publish_message("events", "users.created", b"")
+        await self.broker.unbind_queue(extra.binding_id)
+        await self.broker.publish_message("events", "users.created", b"")
+        await self.broker.publish_message("events", "orders.created", b"")
+        self.assertEqual(self.broker.queues_by_name["orders"].message_count, 2)
+
+    async def test_binding_before_exchange_declared(self):
+        await self.broker.declare_queue("late")
+        await self.broker.bind_queue("later", "late", "k")
+        await self.broker.declare_exchange("later", ExchangeType.DIRECT)
+        await self.broker.publish_message("later", "k", b"x")
+        self.assertEqual(self.broker.queues_by_name["late"].message_count, 1)
+
+    async def test_duplicate_ack_is_ignored(self):
+        await self.broker.declare_exchange("fan", ExchangeType.FANOUT)
+        for name in ("q1", "q2"):
+            await self.broker.declare_queue(name)
+            await self.broker.bind_queue("fan", name)
+        message = await self.broker.publish_message("fan", "", b"x")
+        c1 = await self.broker.create_consumer("q1")
+        await self.broker.consume_message(c1.consumer_id)
+        self.assertTrue(await self.broker.acknowledge_message(message.message_id, c1.consumer_id))
+        # Повторный ack не снимает доставку, ожидающую во второй очереди
+        self.assertFalse(await self.broker.acknowledge_message(message.message_id, c1.consumer_id))
+        self.assertEqual(await self.broker.acknowledge_batch([message.message_id], c1.consumer_id), 0)
+        self.assertFalse(await self.broker.reject_message(message.message_id, c1.consumer_id))
+        self.assertEqual(message.pending_deliveries, 1)
+        self.assertIn(message.message_id, self.broker.messages)
+        self.assertEqual((c1.messages_acknowledged, c1.unacked_count), (1, 0))
+
+        c2 = await self.broker.create_consumer("q2")
+        # Чужое (не выданное этому потребителю) сообщение подтвердить нельзя
+        self.assertFalse(await self.broker.acknowledge_message(message.message_id, c2.consumer_id))
+        await self.broker.consume_message(c2.consumer_id)
+        self.assertTrue(await self.broker.acknowledge_message(message.message_id, c2.consumer_id))
+        self.assertNotIn(message.message_id, self.broker.messages)
+
+    async def test_priority_queue_capped_by_max_priority(self):
+        await self.broker.declare_queue("prio", QueueType.PRIORITY, max_priority=3)
+        await self.broker.bind_queue("events", "prio", "jobs.*")
+        for body, priority in ((b"low", 1), (b"urgent", 9), (b"high", 3)):
+            await self.broker.publish_message("events", "jobs.run", body, priority=priority)
+        consumer = await self.broker.create_consumer("prio")
+        self.assertEqual([m.body for m in await self.broker.consume_batch(consumer.consumer_id)],
+                         [b"urgent", b"high", b"low"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Tests for the Metrics Platform time series storage and PromQL engine
+"""
+
+import unittest
+import math
+import random
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from iteration359_metrics_platform import (
+    MetricsPlatform, PromQLParser, PromQLError, XORChunk, recode_chunks, LabelIndex
+)
+
+
+class TestXORChunk(unittest.TestCase):
+    """Gorilla delta-of-delta / XOR encoding"""
+
+    def round_trip(self, samples):
+        chunk = XORChunk()
+        for t, value in samples:
+            chunk.append(t, value)
+        self.assertEqual(list(chunk), samples)
+        chunk.seal()
+        self.assertTrue(chunk.is_sealed)
+        self.assertEqual(list(chunk), samples)
+        return chunk
+
+    def test_regular_interval_round_trip(self):
+        base = 1_700_000_000_000
+        samples = [(base + i * 15_000, float(i * 3)) for i in range(120)]
+        chunk = self.round_trip(samples)
+        # Постоянный шаг и близкие значения кодируются компактно
+        self.assertLess(chunk.size_bytes, len(samples) * 16 // 4)
+
+    def test_all_delta_of_delta_widths(self):
+        base = 1_700_000_000_000
+        deltas = [1, 2, 5_000, 70_000, 600_000, 10 ** 12, 3]
+        samples = []
+        t = base
+        for i, delta in enumerate(deltas):
+            t += delta
+            samples.append((t, float(i)))
+        self.round_trip(samples)
+
+    def test_special_float_values(self):
+        values = [0.0, -0.0, 1.5, -1e308, 5e-324, math.inf, -math.inf, 42.0, 42.0]
+        samples = [(i * 1000, v) for i, v in enumerate(values)]
+        self.round_trip(samples)
+
+    def test_nan_round_trip(self):
+        chunk = XORChunk()
+        chunk.append(0, 1.0)
+        chunk.append(1000, math.nan)
+        chunk.append(2000, 2.0)
+        decoded = list(chunk)
+        self.assertEqual(decoded[0], (0, 1.0))
+        self.assertTrue(math.isnan(decoded[1][1]))
+        self.assertEqual(decoded[2], (2000, 2.0))
+
+    def test_iter_range_bounds(self):
+        chunk = XORChunk()
+        for i in range(10):
+            chunk.append(i * 10, float(i))
+        self.assertEqual([t for t, _ in chunk.iter_range(20, 50)], [20, 30, 40, 50])
+        self.assertEqual(list(chunk.iter_range(100, 200)), [])
+
+    def test_recode_chunks_splits_full_chunks(self):
+        samples = [(i, float(i)) for i in range(25)]
+        chunks = recode_chunks(samples, max_samples=10)
+        self.assertEqual([c.count for c in chunks], [10, 10, 5])
+        self.assertTrue(all(c.is_sealed for c in chunks))
+        self.assertEqual([s for c in chunks for s in c], samples)
+
+
+class TestRecordSample(unittest.IsolatedAsyncioTestCase):
+    """Запись сэмплов в head-чанки"""
+
+    async def asyncSetUp(self):
+        self.platform = MetricsPlatform()
+        self.base = datetime(2026, 1, 1, 12, 0, 0)
+
+    async def test_samples_round_trip_through_head_chunks(self):
+        for i in range(300):
+            await self.platform.record_sample(
+                "x_total", float(i), {"job": "a"}, self.base + timedelta(seconds=15 * i))
+        series = self.platform.series_by_key[("x_total", (("job", "a"),))]
+        samples = list(self.platform.iter_samples(series))
+        self.assertEqual(len(samples), 300)
+        self.assertEqual([v for _, v in samples], [float(i) for i in range(300)])
+
+    async def test_duplicate_timestamp_rejected(self):
+        await self.platform.record_sample("x_total", 1.0, {}, self.base)
+        result = await self.platform.record_sample("x_total", 2.0, {}, self.base)
+        self.assertIsNone(result)
+        self.assertEqual(self.platform.out_of_order_samples, 1)
+        series = self.platform.series_by_key[("x_total", ())]
+        self.assertEqual(list(self.platform.iter_samples(series)),
+                         [(int(self.base.timestamp() * 1000), 1.0)])
+
+    async def test_same_millisecond_rejected(self):
+        await self.platform.record_sample("x_total", 1.0, {}, self.base)
+        result = await self.platform.record_sample(
+            "x_total", 2.0, {}, self.base + timedelta(microseconds=300))
+        self.assertIsNone(result)
+        self.assertEqual(self.platform.total_samples, 1)
+
+    async def test_out_of_order_rejected(self):
+        await self.platform.record_sample("x_total", 1.0, {}, self.base)
+        result = await self.platform.record_sample(
+            "x_total", 2.0, {}, self.base - timedelta(seconds=1))
+        self.assertIsNone(result)
+        self.assertEqual(self.platform.out_of_order_samples, 1)
+
+
+class TestPromQL(unittest.IsolatedAsyncioTestCase):
+    """Разбор и вычисление PromQL-подмножества"""
+
+    async def asyncSetUp(self):
+        self.platform = MetricsPlatform()
+        self.base = datetime(2026, 1, 1, 12, 0, 0)
+        for job, step in (("a", 1.0), ("b", 2.0)):
+            for i in range(21):
+                await self.platform.record_sample(
+                    "req_total", step * i, {"job": job}, self.base + timedelta(seconds=15 * i))
+        self.at = self.base + timedelta(minutes=5)
+
+    def values(self, result):
+        return {r["metric"].get("job"): r["value"][1] for r in result.data}
+
+    def test_parser_rejects_garbage(self):
+        with self.assertRaises(PromQLError):
+            PromQLParser("sum(rate(x[5m])").parse()
+
+    async def test_rate_and_increase(self):
+        rate = await self.platform.query_instant("rate(req_total[5m])", self.at)
+        self.assertEqual(rate.result_type, "vector")
+        values = self.values(rate)
+        self.assertAlmostEqual(values["a"], 1 / 15)
+        self.assertAlmostEqual(values["b"], 2 / 15)
+        increase = await self.platform.query_instant("increase(req_total[5m])", self.at)
+        self.assertAlmostEqual(self.values(increase)["a"], 19.0)
+
+    async def test_counter_reset_is_corrected(self):
+        for i, value in enumerate([10.0, 20.0, 5.0, 15.0]):
+            await self.platform.record_sample(
+                "reset_total", value, {"job": "c"}, self.base + timedelta(seconds=10 * i))
+        result = await self.platform.query_instant(
+            "increase(reset_total[1m])", self.base + timedelta(seconds=30))
+        self.assertAlmostEqual(self.values(result)["c"], 25.0)
+
+    async def test_aggregation_by_label(self):
+        result = await self.platform.query_instant("sum(rate(req_total[5m])) by (job)", self.at)
+        self.assertEqual(len(result.data), 2)
+        total = await self.platform.query_instant("sum(rate(req_total[5m]))", self.at)
+        self.assertAlmostEqual(total.data[0]["value"][1], 3 / 15)
+
+    async def test_label_matchers(self):
+        result = await self.platform.query_instant('req_total{job=~"b"}', self.at)
+        self.assertEqual(self.values(result), {"b": 40.0})
+        result = await self.platform.query_instant('req_total{job!="b"}', self.at)
+        self.assertEqual(self.values(result), {"a": 20.0})
+
+    async def test_zero_time_delta_yields_no_point(self):
+        # Чанк, записанный в обход record_sample, может содержать дубли времени
+        await self.platform.record_sample("dup_total", 1.0, {}, self.base)
+        series = self.platform.series_by_key[("dup_total", ())]
+        series.head_chunk.append(int(self.base.timestamp() * 1000), 2.0)
+        series.sample_count += 1
+        for expr in ("rate(dup_total[1m])", "irate(dup_total[1m])"):
+            result = await self.platform.query_instant(expr, self.base + timedelta(seconds=1))
+            self.assertEqual(result.result_type, "vector")
+            self.assertEqual(result.data, [])
+
+    async def test_recording_rule_with_same_timestamp_samples(self):
+        for _ in range(3):
+            await self.platform.record_sample("burst_total", 1.0, {"job": "x"})
+        rule = await self.platform.create_recording_rule(
+            "job:burst:rate1m", "sum(rate(burst_total[1m])) by (job)", {}, "rules")
+        self.assertIsNotNone(await self.platform.evaluate_recording_rule(rule.rule_id))
+
+    async def test_query_range_steps(self):
+        result = await self.platform.query_range(
+            "req_total", self.base, self.base + timedelta(minutes=1), "15s")
+        self.assertEqual(result.result_type, "matrix")
+        by_job = {r["metric"]["job"]: r["values"] for r in result.data}
+        self.assertEqual([v for _, v in by_job["a"]], [0.0, 1.0, 2.0, 3.0, 4.0])
+
+
+class TestCardinality(unittest.IsolatedAsyncioTestCase):
+    """Инкрементальные счётчики кардинальности"""
+
+    async def asyncSetUp(self):
+        self.platform = MetricsPlatform()
+        self.base = datetime(2026, 1, 1, 12, 0, 0)
+
+    def expected(self):
+        by_metric, by_label, values = {}, {}, {}
+        for series in self.platform.series_by_id.values():
+            by_metric[series.metric_name] = by_metric.get(series.metric_name, 0) + 1
+            for name, value in series.labels.items():
+                by_label[name] = by_label.get(name, 0) + 1
+                values.setdefault(name, {})
+                values[name][value] = values[name].get(value, 0) + 1
+        return by_metric, by_label, values
+
+    async def test_counters_follow_series_churn(self):
+        rng = random.Random(11)
+        for step in range(400):
+            if self.platform.series_by_id and rng.random() < 0.4:
+                series_id = rng.choice(sorted(self.platform.series_by_id))
+                self.assertTrue(self.platform.delete_series(series_id))
+            else:
+                labels = {"job": f"j{rng.randint(0, 3)}", "pod": f"p{rng.randint(0, 30)}"}
+                if rng.random() < 0.5:
+                    labels["zone"] = f"z{rng.randint(0, 2)}"
+                await self.platform.record_sample(f"m{rng.randint(0, 2)}", 1.0, labels,
+                                                  self.base + timedelta(seconds=step))
+            if step % 50 == 0:
+                info = await self.platform.get_cardinality()
+                by_metric, by_label, values = self.expected()
+                self.assertEqual(info.total_series, len(self.platform.series_by_id))
+                self.assertEqual((info.series_by_metric, info.series_by_label), (by_metric, by_label))
+                self.assertEqual(set(info.top_label_values), set(values))
+                for name, top in info.top_label_values.items():
+                    counts = sorted(values[name].values(), reverse=True)[:10]
+                    self.assertEqual([count for _, count in top], counts)
+                    self.assertTrue(all(values[name][value] == count for value, count in top))
+
+    async def test_deleted_series_leave_queries(self):
+        for job in ("a", "b"):
+            await self.platform.record_sample("up", 1.0, {"job": job}, self.base)
+        series = self.platform.series_by_key[("up", (("job", "b"),))]
+        self.assertTrue(self.platform.delete_series(series.series_id))
+        self.assertFalse(self.platform.delete_series(series.series_id))
+
+        result = await self.platform.query_instant("up", self.base)
+        self.assertEqual([r["metric"]["job"] for r in result.data], ["a"])
+        index = self.platform.label_index
+        self.assertEqual(index.select("", [], None), [0])
+        self.assertEqual(self.platform.total_samples, 1)
+        # Повторное создание ряда получает новый ref
+        await self.platform.record_sample("up", 2.0, {"job": "b"}, self.base)
+        self.assertEqual(index.postings["job"]["b"], [2])
+
+    def test_top_values_recomputed_only_for_changed_labels(self):
+        index = LabelIndex()
+        index.add(0, "m", {"job": "a", "pod": "p0"})
+        index.add(1, "m", {"job": "a", "pod": "p1"})
+        first = index.top_label_values()
+        index.add(2, "m", {"job": "b"})
+        second = index.top_label_values()
+        self.assertIs(second["pod"], first["pod"])
+        self.assertEqual(second["job"], [("a", 2), ("b", 1)])
+        index.remove(2, "m", {"job": "b"})
+        self.assertEqual(index.top_label_values()["job"], [("a", 2)])
+        self.assertNotIn("b", index.postings["job"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Tests for the Monitoring Hub write-behind metric buffer and rollups
+"""
+
+import unittest
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bots'))
+
+from advanced_monitoring_hub import MonitoringDatabase, Metric, MetricType
+
+
+def make_metric(metric_id: str, value: float, timestamp: datetime) -> Metric:
+    return Metric(
+        metric_id=metric_id,
+        name="cpu_usage",
+        metric_type=MetricType.GAUGE,
+        value=value,
+        timestamp=timestamp,
+        labels={"component": "api", "namespace": "prod"}
+    )
+
+
+class TestMetricFlush(unittest.TestCase):
+    """Пакетная запись и rollup-агрегаты"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="monitoring_test_")
+        self.db = MonitoringDatabase(os.path.join(self.directory, "hub.db"))
+        self.base = datetime(2026, 1, 1, 12, 0, 0)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def rollup(self, resolution: int):
+        return self.db.conn.execute(
+            "SELECT sample_count, sum_value, min_value, max_value FROM metrics_rollups "
+            "WHERE resolution = ? AND metric_name = 'cpu_usage'", (resolution,)
+        ).fetchall()
+
+    def test_flush_writes_rows_and_rollups(self):
+        self.db.save_metrics([make_metric(f"m{i}", float(i), self.base + timedelta(seconds=i)) for i in range(10)])
+        self.assertEqual(self.db.flush_metrics(), 10)
+        self.assertEqual(self.db.conn.execute("SELECT COUNT(*) FROM metrics").fetchone()[0], 10)
+        self.assertEqual(self.rollup(60), [(10, 45.0, 0.0, 9.0)])
+
+    def test_duplicates_are_not_rolled_up_twice(self):
+        metrics = [make_metric(f"m{i}", 1.0, self.base + timedelta(seconds=i)) for i in range(5)]
+        self.db.save_metrics(metrics)
+        self.db.flush_metrics()
+        # Повторная отправка тех же сэмплов плюс дубль внутри пакета
+        self.db.save_metrics(metrics + [make_metric("m5", 2.0, self.base), make_metric("m5", 2.0, self.base)])
+        self.assertEqual(self.db.flush_metrics(), 1)
+        self.assertEqual(self.rollup(60), [(6, 7.0, 1.0, 2.0)])
+
+    def test_failed_flush_keeps_batch(self):
+        first = [make_metric(f"m{i}", 1.0, self.base) for i in range(3)]
+        self.db.save_metrics(first)
+        self.db.conn.execute("ALTER TABLE metrics_rollups RENAME TO rollups_offline")
+        with self.assertRaises(sqlite3.Error):
+            self.db.flush_metrics()
+        self.assertEqual([m.metric_id for m in self.db.pending_metrics], ["m0", "m1", "m2"])
+        self.assertEqual(self.db.conn.execute("SELECT COUNT(*) FROM metrics").fetchone()[0], 0)
+
+        self.db.conn.execute("ALTER TABLE rollups_offline RENAME TO metrics_rollups")
+        self.db.save_metric(make_metric("m3", 1.0, self.base))
+        self.assertEqual(self.db.flush_metrics(), 4)
+        self.assertEqual(self.rollup(60), [(4, 4.0, 1.0, 1.0)])
+        self.assertEqual(self.db.pending_metrics, [])
+
+    def test_get_metrics_reads_rollups_for_long_ranges(self):
+        self.db.save_metrics([make_metric(f"m{i}", float(i % 2), self.base + timedelta(seconds=30 * i)) for i in range(4)])
+        points = self.db.get_metrics("cpu_usage", "api", self.base, self.base + timedelta(minutes=2), resolution=60)
+        self.assertEqual([p.value for p in points], [0.5, 0.5])
+        raw = self.db.get_metrics("cpu_usage", "api", self.base, self.base + timedelta(minutes=2), resolution=0)
+        self.assertEqual(len(raw), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Tests for the Outbox relay: per-aggregate ordering, retries, SQLite durability
+and sequence numbering across restarts
+"""
+
+import unittest
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from iteration253_outbox_pattern import (
+    OutboxManager, AggregateType
+)
+
+
+class TestOutboxRelay(unittest.IsolatedAsyncioTestCase):
+    """Публикация в порядке агрегата"""
+
+    async def test_per_aggregate_order(self):
+        published = []
+
+        async def publisher(entry):
+            published.append((entry.aggregate_id, entry.sequence_number))
+
+        manager = OutboxManager(":memory:", publisher=publisher)
+        for i in range(5):
+            for aggregate_id in ("a", "b", "c"):
+                manager.capture_event(AggregateType.ORDER, aggregate_id, "Updated", {"i": i})
+        while manager.get_pending_count():
+            await manager.process_pending(batch_size=4)
+
+        for aggregate_id in ("a", "b", "c"):
+            sequences = [seq for agg, seq in published if agg == aggregate_id]
+            self.assertEqual(sequences, [1, 2, 3, 4, 5])
+        manager.store.close()
+
+    async def test_failed_head_blocks_its_aggregate_only(self):
+        published = []
+
+        async def publisher(entry):
+            if entry.aggregate_id == "bad" and entry.sequence_number == 1 and entry.attempts == 1:
+                raise RuntimeError("broker down")
+            published.append((entry.aggregate_id, entry.sequence_number))
+
+        manager = OutboxManager(":memory:", publisher=publisher)
+        for aggregate_id in ("bad", "good"):
+            for i in range(3):
+                manager.capture_event(AggregateType.ORDER, aggregate_id, "Updated", {"i": i})
+
+        batch = await manager.process_pending()
+        self.assertEqual(batch.published, 3)
+        self.assertEqual([seq for agg, seq in published if agg == "good"], [1, 2, 3])
+        self.assertNotIn("bad", [agg for agg, _ in published])
+        self.assertEqual(manager.get_pending_count(), 3)
+
+        # Ретрай наступает после backoff
+        manager.retry_heap = [(0.0, seq, key) for _, seq, key in manager.retry_heap]
+        await manager.process_pending()
+        self.assertEqual([seq for agg, seq in published if agg == "bad"], [1, 2, 3])
+        manager.store.close()
+
+    async def test_duplicate_idempotency_key(self):
+        async def publisher(entry):
+            return None
+
+        manager = OutboxManager(":memory:", publisher=publisher)
+        manager.capture_event(AggregateType.ORDER, "a", "Created", {}, idempotency_key="k1")
+        manager.capture_event(AggregateType.ORDER, "a", "Created", {}, idempotency_key="k1")
+        await manager.process_pending()
+        metrics = manager.get_topic_metrics("order-events")
+        self.assertEqual(metrics.total_published, 1)
+        self.assertEqual(metrics.total_duplicates, 1)
+        manager.store.close()
+
+
+class TestOutboxDurability(unittest.IsolatedAsyncioTestCase):
+    """Восстановление после перезапуска"""
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.mkdtemp(prefix="outbox_test_")
+        self.db_path = os.path.join(self.directory, "outbox.db")
+
+    async def asyncTearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    async def test_pending_entries_recovered_in_order(self):
+        manager = OutboxManager(self.db_path)
+        self.assertEqual(manager.store.journal_mode, "wal")
+        for i in range(4):
+            manager.capture_event(AggregateType.PAYMENT, "p1", "Charged", {"i": i})
+        # Процесс «падает» без публикации
+        manager.store.close()
+
+        published = []
+
+        async def publisher(entry):
+            published.append(entry.event_payload["i"])
+
+        recovered = OutboxManager(self.db_path, publisher=publisher)
+        self.assertEqual(recovered.get_pending_count(), 4)
+        await recovered.process_pending()
+        self.assertEqual(published, [0, 1, 2, 3])
+        recovered.store.close()
+
+    async def sequence_after_cleanup(self, archive_enabled: bool) -> int:
+        async def publisher(entry):
+            return None
+
+        manager = OutboxManager(self.db_path, publisher=publisher)
+        manager.cleanup_config.retention_days = 0
+        manager.cleanup_config.archive_enabled = archive_enabled
+        for i in range(3):
+            manager.capture_event(AggregateType.ORDER, "o1", "Updated", {"i": i})
+        await manager.process_pending()
+        await manager.cleanup_old_entries()
+        self.assertEqual(manager.store.count(), 0)
+        manager.store.close()
+
+        restarted = OutboxManager(self.db_path, publisher=publisher)
+        entry = restarted.capture_event(AggregateType.ORDER, "o1", "Updated", {"i": 3})
+        restarted.store.close()
+        return entry.sequence_number
+
+    async def test_sequence_survives_cleanup_with_archive(self):
+        self.assertEqual(await self.sequence_after_cleanup(True), 4)
+
+    async def test_sequence_survives_cleanup_without_archive(self):
+        self.assertEqual(await self.sequence_after_cleanup(False), 4)
+
+    async def test_sequences_seeded_for_existing_store(self):
+        manager = OutboxManager(self.db_path)
+        for i in range(2):
+            manager.capture_event(AggregateType.USER, "u1", "Renamed", {"i": i})
+        manager.store.close()
+
+        # Хранилище, созданное до появления таблицы последовательностей
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("DROP TABLE outbox_sequences")
+        conn.commit()
+        conn.close()
+
+        reopened = OutboxManager(self.db_path)
+        entry = reopened.capture_event(AggregateType.USER, "u1", "Renamed", {"i": 2})
+        self.assertEqual(entry.sequence_number, 3)
+        reopened.store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
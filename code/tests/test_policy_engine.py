@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Tests for PolicyIndex candidate selection, compiled conditions and the
+epoch-invalidated decision cache
+"""
+
+import unittest
+import random
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from iteration341_policy_engine import (
+    PolicyEngine, PolicyIndex, CompiledPolicy, Policy, Condition, Operator,
+    EvaluationContext, DecisionResult, PolicyEffect, compile_condition, MAX_INDEX_FANOUT
+)
+
+
+RESOURCE_TYPES = ["document", "invoice", "report"]
+ACTIONS = ["read", "write", "delete"]
+ROLES = ["admin", "editor", "viewer"]
+
+
+def condition(attribute_name: str, operator: Operator, value=None, values=None, negate=False) -> Condition:
+    return Condition(condition_id="c", attribute_name=attribute_name, operator=operator,
+                     value=value, values=values or [], negate=negate)
+
+
+def context(resource_type=None, action=None, role=None, **subject) -> EvaluationContext:
+    if role is not None:
+        subject["user_role"] = role
+    return EvaluationContext(
+        context_id="ctx",
+        subject_attributes=subject,
+        resource_attributes={"resource_type": resource_type} if resource_type else {},
+        action_attributes={"action": action} if action else {}
+    )
+
+
+class TestCompiledConditions(unittest.TestCase):
+    """Скомпилированные предикаты условий"""
+
+    def test_operators(self):
+        ctx = context("document", "read", "admin", level=5, email="a@corp.io")
+        cases = [
+            (condition("subject.level", Operator.GREATER_THAN, 3), True),
+            (condition("subject.level", Operator.IS_BETWEEN, values=[6, 9]), False),
+            (condition("subject.email", Operator.ENDS_WITH, "@corp.io"), True),
+            (condition("subject.email", Operator.MATCHES, r"^b"), False),
+            (condition("subject.missing", Operator.IS_NULL), True),
+            (condition("action.action", Operator.IN, values=["read", "list"]), True),
+            (condition("action.action", Operator.IN, values=["read"], negate=True), False),
+            (condition("resource.resource_type", Operator.NOT_EQUALS, "invoice"), True),
+        ]
+        for cond, expected in cases:
+            self.assertEqual(compile_condition(cond)(ctx), expected, cond.operator)
+
+
+class TestPolicyIndex(unittest.TestCase):
+    """Кандидаты индекса покрывают все применимые политики"""
+
+    def random_policy(self, rng: random.Random, n: int) -> CompiledPolicy:
+        conditions = []
+        for attribute, pool in (("resource.resource_type", RESOURCE_TYPES),
+                                ("action.action", ACTIONS), ("subject.user_role", ROLES)):
+            kind = rng.random()
+            if kind < 0.4:
+                conditions.append(condition(attribute, Operator.EQUALS, rng.choice(pool)))
+            elif kind < 0.6:
+                conditions.append(condition(attribute, Operator.IN, values=rng.sample(pool, 2)))
+            elif kind < 0.7:
+                conditions.append(condition(attribute, Operator.NOT_EQUALS, rng.choice(pool)))
+        return CompiledPolicy(Policy(policy_id=f"p{n}", name=f"p{n}", target_conditions=conditions), [], n)
+
+    def test_candidates_superset_of_matching_targets(self):
+        rng = random.Random(5)
+        index = PolicyIndex()
+        policies = [self.random_policy(rng, n) for n in range(300)]
+        for compiled in policies:
+            index.add(compiled)
+        for compiled in policies[::3]:
+            index.remove(compiled.policy.policy_id)
+        alive = policies[1::3] + policies[2::3]
+        removed = {c.policy.policy_id for c in policies[::3]}
+        self.assertEqual(len(index), len(alive))
+
+        for _ in range(200):
+            ctx = context(rng.choice(RESOURCE_TYPES + [None]), rng.choice(ACTIONS + [None]),
+                          rng.choice(ROLES + [None]))
+            candidates = {c.policy.policy_id for c in index.candidates(ctx)}
+            expected = {c.policy.policy_id for c in alive if c.target(ctx)}
+            self.assertTrue(expected <= candidates)
+            self.assertFalse(candidates & removed)
+
+    def test_remove_cleans_postings_and_masks(self):
+        index = PolicyIndex()
+        compiled = CompiledPolicy(Policy(policy_id="p", name="p", target_conditions=[
+            condition("resource.resource_type", Operator.IN, values=["document", "invoice"]),
+            condition("action.action", Operator.EQUALS, "read")]), [], 0)
+        index.add(compiled)
+        self.assertEqual(len(index.postings), 2)
+        index.add(compiled)
+        self.assertEqual(len(index.postings), 2)
+        index.remove("p")
+        self.assertEqual((index.postings, index.masks, len(index)), ({}, {}, 0))
+
+    def test_fanout_is_bounded_and_unhashable_values_unindexed(self):
+        index = PolicyIndex()
+        wide = [str(i) for i in range(MAX_INDEX_FANOUT)]
+        index.add(CompiledPolicy(Policy(policy_id="wide", name="wide", target_conditions=[
+            condition("resource.resource_type", Operator.IN, values=wide),
+            condition("action.action", Operator.IN, values=["read", "write"])]), [], 0))
+        self.assertLessEqual(len(index.placement["wide"]), MAX_INDEX_FANOUT)
+        self.assertIn("wide", {c.policy.policy_id for c in index.candidates(context("7", "write"))})
+
+        index.add(CompiledPolicy(Policy(policy_id="list", name="list", target_conditions=[
+            condition("resource.resource_type", Operator.EQUALS, ["a"])]), [], 1))
+        self.assertIn("list", index.unindexed)
+
+
+class TestPolicyEngine(unittest.IsolatedAsyncioTestCase):
+    """Решения движка и кэш"""
+
+    async def asyncSetUp(self):
+        self.engine = PolicyEngine()
+        allow = await self.engine.create_rule("allow", [], PolicyEffect.ALLOW)
+        deny_guest = await self.engine.create_rule("deny", [
+            {"attribute_name": "subject.user_role", "operator": "equals", "value": "guest"}], PolicyEffect.DENY)
+        self.docs = await self.engine.create_policy("docs", [allow.rule_id, deny_guest.rule_id], [
+            {"attribute_name": "resource.resource_type", "operator": "equals", "value": "document"}])
+        await self.engine.activate_policy(self.docs.policy_id, "test")
+
+    async def test_decisions(self):
+        self.assertEqual((await self.engine.evaluate(context("document", "read", "editor"))).decision,
+                         DecisionResult.PERMIT)
+        self.assertEqual((await self.engine.evaluate(context("document", "read", "guest"))).decision,
+                         DecisionResult.DENY)
+        self.assertEqual((await self.engine.evaluate(context("invoice", "read", "editor"))).decision,
+                         DecisionResult.NOT_APPLICABLE)
+
+    async def test_cache_invalidated_by_policy_change(self):
+        ctx = context("document", "read", "editor")
+        await self.engine.evaluate(ctx)
+        self.assertEqual((await self.engine.evaluate(ctx)).reason, "Cached decision")
+        await self.engine.disable_policy(self.docs.policy_id, "test")
+        result = await self.engine.evaluate(ctx)
+        self.assertEqual(result.decision, DecisionResult.NOT_APPLICABLE)
+        self.assertEqual(self.engine.cache_hits, 1)
+
+    async def test_batch_matches_single(self):
+        contexts = [context(r, a, role) for r in RESOURCE_TYPES for a in ACTIONS for role in ("guest", "admin")]
+        batch = await self.engine.evaluate_batch(contexts, use_cache=False)
+        single = [await self.engine.evaluate(c, use_cache=False) for c in contexts]
+        self.assertEqual([r.decision for r in batch], [r.decision for r in single])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Tests for compact rate limiter state: GCRA, window algorithms, idle and
+pressure eviction, batch checks
+"""
+
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from iteration259_rate_limiter_advanced import (
+    RateLimiterManager, RateLimitConfig, RateLimitAlgorithm, RateLimitResponse,
+    LimiterState, NS_PER_SECOND, NS_PER_MS
+)
+
+
+T0 = 1_000 * NS_PER_SECOND
+MS = NS_PER_MS
+
+
+def state(algorithm: RateLimitAlgorithm, **kwargs) -> LimiterState:
+    return LimiterState(RateLimitConfig(config_id="c", name="c", algorithm=algorithm, **kwargs))
+
+
+class TestAlgorithms(unittest.TestCase):
+    """Решения алгоритмов на заданных моментах времени"""
+
+    def test_gcra_burst_then_steady_rate(self):
+        limiter = state(RateLimitAlgorithm.TOKEN_BUCKET, requests_per_second=10, burst_capacity=5)
+        decisions = [limiter.check("u", T0) for _ in range(6)]
+        self.assertEqual(decisions[:5], [0] * 5)
+        self.assertEqual(decisions[5], 100 * MS)
+        self.assertEqual(limiter.peek_remaining("u", T0), 0)
+        self.assertEqual(limiter.check("u", T0 + 100 * MS), 0)
+        self.assertEqual(limiter.reset_after_ns("u", T0 + 100 * MS), 500 * MS)
+        self.assertEqual(limiter.peek_remaining("u", T0 + 600 * MS), 5)
+
+    def test_fixed_window(self):
+        limiter = state(RateLimitAlgorithm.FIXED_WINDOW_COUNTER, requests_per_minute=3, window_size_ms=1000)
+        self.assertEqual([limiter.check("u", T0 + i * MS) for i in range(3)], [0, 0, 0])
+        self.assertEqual(limiter.check("u", T0 + 400 * MS), 600 * MS)
+        self.assertEqual(limiter.check("u", T0 + 1000 * MS), 0)
+        self.assertEqual(limiter.remaining, 2)
+
+    def test_sliding_counter_weights_previous_window(self):
+        limiter = state(RateLimitAlgorithm.SLIDING_WINDOW_COUNTER, requests_per_minute=4, window_size_ms=1000)
+        self.assertEqual([limiter.check("u", T0) for _ in range(5)][-1], 1000 * MS)
+        # Половина прошлого окна ещё учитывается: 4 * 0.5 = 2 запроса
+        later = T0 + 1500 * MS
+        self.assertEqual(limiter.peek_remaining("u", later), 2)
+        self.assertEqual([bool(limiter.check("u", later)) for _ in range(3)], [False, False, True])
+
+    def test_sliding_counter_skips_empty_windows(self):
+        limiter = state(RateLimitAlgorithm.SLIDING_WINDOW_COUNTER, requests_per_minute=2, window_size_ms=1000)
+        limiter.check("u", T0)
+        limiter.check("u", T0)
+        self.assertEqual(limiter.peek_remaining("u", T0 + 2500 * MS), 2)
+
+    def test_sliding_log(self):
+        limiter = state(RateLimitAlgorithm.SLIDING_WINDOW_LOG, requests_per_minute=2, window_size_ms=1000)
+        self.assertEqual(limiter.check("u", T0), 0)
+        self.assertEqual(limiter.check("u", T0 + 100 * MS), 0)
+        self.assertEqual(limiter.check("u", T0 + 500 * MS), 500 * MS)
+        self.assertEqual(limiter.check("u", T0 + 1000 * MS), 0)
+        self.assertEqual(limiter.peek_remaining("u", T0 + 1000 * MS), 0)
+
+    def test_identifiers_are_independent(self):
+        limiter = state(RateLimitAlgorithm.TOKEN_BUCKET, requests_per_second=1, burst_capacity=1)
+        self.assertEqual(limiter.check("a", T0), 0)
+        self.assertNotEqual(limiter.check("a", T0), 0)
+        self.assertEqual(limiter.check("b", T0), 0)
+        self.assertEqual((limiter.total_requests, limiter.total_denied), (3, 1))
+
+
+class TestEviction(unittest.TestCase):
+    """Вытеснение простаивающих идентификаторов и переиспользование слотов"""
+
+    def test_idle_identifiers_evicted_on_allocation(self):
+        limiter = state(RateLimitAlgorithm.FIXED_WINDOW_COUNTER, requests_per_minute=5,
+                        window_size_ms=1000, idle_ttl_ms=2000)
+        limiter.check("old", T0)
+        limiter.check("busy", T0)
+        limiter.check("busy", T0 + 1500 * MS)
+        limiter.check("new", T0 + 2500 * MS)
+        self.assertEqual(list(limiter.slots), ["busy", "new"])
+        self.assertEqual(limiter.idle_evictions, 1)
+        self.assertEqual(len(limiter.clock), 2)
+        limiter.check("reuse", T0 + 5000 * MS)
+        self.assertEqual(len(limiter.clock), 2)
+        self.assertEqual(limiter.peek_remaining("reuse", T0 + 5000 * MS), 4)
+
+    def test_pressure_eviction_drops_least_recent(self):
+        limiter = state(RateLimitAlgorithm.SLIDING_WINDOW_LOG, requests_per_minute=5,
+                        window_size_ms=60000, max_identifiers=2)
+        limiter.check("a", T0)
+        limiter.check("b", T0)
+        limiter.check("a", T0 + MS)
+        limiter.check("c", T0 + 2 * MS)
+        self.assertEqual(list(limiter.slots), ["a", "c"])
+        self.assertEqual(limiter.pressure_evictions, 1)
+        self.assertEqual(limiter.peek_remaining("c", T0 + 2 * MS), 4)
+
+
+class TestManager(unittest.TestCase):
+    """API менеджера"""
+
+    def test_check_many_and_metrics(self):
+        manager = RateLimiterManager()
+        manager.create_config("api", requests_per_second=1, burst_capacity=2)
+        responses = manager.check_many("api", ["u1", "u1", "u1", "u2"])
+        self.assertEqual(responses, [RateLimitResponse.ALLOWED, RateLimitResponse.ALLOWED,
+                                     RateLimitResponse.DENIED, RateLimitResponse.ALLOWED])
+        metrics = manager.get_metrics("api")
+        self.assertEqual((metrics.total_requests, metrics.total_denied, metrics.unique_identifiers), (4, 1, 2))
+        self.assertGreater(metrics.memory_bytes, 0)
+
+        result = manager.check_rate_limit("api", "u1")
+        self.assertEqual(result.response, RateLimitResponse.DENIED)
+        self.assertGreater(result.retry_after_ms, 0)
+        entries = {e.identifier: e for e in manager.get_entries("api")}
+        self.assertEqual(entries["u1"].denied_requests, 2)
+
+        manager.reset("api", "u1")
+        self.assertTrue(manager.allow("api", "u1"))
+        self.assertTrue(manager.allow("unknown", "u1"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Tests for pane-based window state, allowed lateness, snapshot/restore and
+checkpointed stream jobs
+"""
+
+import unittest
+import asyncio
+import pickle
+import random
+import tempfile
+import json
+import sys
+import os
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from iteration345_stream_processing import (
+    StreamPlatform, StreamWindow, WindowState, WindowType, LateDataPolicy, AGGREGATORS,
+    SourceType, SinkType, OperatorType, WatermarkStrategy, CheckpointMode, MAX_WATERMARK,
+    from_epoch_ms
+)
+
+
+def window_state(window_type: WindowType, aggregate: str = "sum", **kwargs) -> WindowState:
+    return WindowState(StreamWindow(window_id="w", name="w", window_type=window_type, **kwargs),
+                       AGGREGATORS[aggregate])
+
+
+def random_records(seed: int, n: int = 400):
+    rng = random.Random(seed)
+    ts = 0
+    records = []
+    for _ in range(n):
+        ts += rng.randint(0, 40)
+        records.append((rng.choice("abc"), rng.randint(1, 9), ts))
+    return records
+
+
+def feed(state: WindowState, records, watermark_lag: int = 1):
+    """Подача упорядоченных записей с водяным знаком ts - lag"""
+    fired = []
+    watermark = -1
+    for key, x, ts in records:
+        accepted, results = state.add(key, x, ts, watermark)
+        assert accepted
+        fired.extend(results)
+        if ts - watermark_lag > watermark:
+            watermark = ts - watermark_lag
+            fired.extend(state.advance(watermark))
+    return fired
+
+
+class TestPaneWindows(unittest.TestCase):
+    """Окна из панелей совпадают с полным перебором"""
+
+    def brute_force(self, records, size: int, slide: int):
+        expected = defaultdict(lambda: [0, 0])
+        for key, x, ts in records:
+            start = (ts // slide) * slide
+            while start > ts - size:
+                expected[(key, start)][0] += x
+                expected[(key, start)][1] += 1
+                start -= slide
+        return {k: tuple(v) for k, v in expected.items()}
+
+    def check(self, window_type: WindowType, size: int, slide: int = 0):
+        records = random_records(size + slide)
+        state = window_state(window_type, size_ms=size, slide_ms=slide)
+        fired = feed(state, records)
+        fired.extend(state.advance(MAX_WATERMARK))
+        actual = {(key, start): (result, count) for key, start, end, result, count in fired}
+        self.assertEqual(len(actual), len(fired), "window fired twice")
+        self.assertTrue(all(end - start == size for _, start, end, _, _ in fired))
+        self.assertEqual(actual, self.brute_force(records, size, slide or size))
+        self.assertEqual((state.panes, state.pane_starts), ({}, []))
+
+    def test_tumbling(self):
+        self.check(WindowType.TUMBLING, 100)
+
+    def test_sliding_with_common_divisor(self):
+        self.check(WindowType.SLIDING, 100, 40)
+        self.check(WindowType.SLIDING, 90, 30)
+
+    def test_fired_panes_are_dropped(self):
+        state = window_state(WindowType.SLIDING, size_ms=100, slide_ms=50)
+        feed(state, random_records(1))
+        self.assertLessEqual(len(state.pane_starts), 3)
+
+    def test_avg_merges_partial_accumulators(self):
+        state = window_state(WindowType.SLIDING, "avg", size_ms=20, slide_ms=10)
+        for ts, x in ((1, 2), (12, 4), (15, 9)):
+            state.add("k", x, ts, 0)
+        fired = sorted(state.advance(MAX_WATERMARK), key=lambda r: r[1])
+        self.assertEqual([(r[1], r[3], r[4]) for r in fired], [(-10, 2.0, 1), (0, 5.0, 3), (10, 6.5, 2)])
+
+
+class TestLateData(unittest.TestCase):
+    """Допустимое опоздание перезапускает окна, более поздние записи отбрасываются"""
+
+    def test_allowed_lateness_refires_then_drops(self):
+        state = window_state(WindowType.TUMBLING, size_ms=10, late_data_policy=LateDataPolicy.ALLOW,
+                             allowed_lateness_ms=5)
+        state.add("a", 3, 3, 0)
+        self.assertEqual(state.advance(10), [("a", 0, 10, 3, 1)])
+
+        accepted, refired = state.add("a", 4, 4, 12)
+        self.assertTrue(accepted)
+        self.assertEqual(refired, [("a", 0, 10, 7, 2)])
+
+        state.advance(15)
+        self.assertEqual(state.add("a", 1, 5, 15), (False, []))
+        self.assertEqual(state.window.late_records, 2)
+        self.assertEqual(state.advance(MAX_WATERMARK), [])
+
+    def test_drop_policy_ignores_lateness(self):
+        state = window_state(WindowType.TUMBLING, size_ms=10, allowed_lateness_ms=5)
+        state.add("a", 1, 1, 0)
+        state.advance(10)
+        self.assertEqual(state.add("a", 1, 2, 11), (False, []))
+
+
+class TestSessionAndGlobalWindows(unittest.TestCase):
+    """Слияние сессий и окна по количеству"""
+
+    def test_sessions_merge_across_gaps(self):
+        state = window_state(WindowType.SESSION, gap_ms=10)
+        for ts in (0, 5, 30, 22):
+            state.add("a", 1, ts, -1)
+        state.add("b", 1, 100, -1)
+        self.assertEqual(len(state.sessions["a"]), 2)
+        # Запись в промежутке соединяет обе сессии
+        state.add("a", 1, 13, -1)
+        self.assertEqual(state.sessions["a"], [[0, 40, 5, 5]])
+        self.assertEqual(state.advance(39), [])
+        self.assertEqual(state.advance(40), [("a", 0, 40, 5, 5)])
+        self.assertEqual(state.advance(MAX_WATERMARK), [("b", 100, 110, 1, 1)])
+        self.assertEqual(state.sessions, {})
+
+    def test_late_session_record_fires_immediately_when_allowed(self):
+        state = window_state(WindowType.SESSION, gap_ms=10, late_data_policy=LateDataPolicy.ALLOW,
+                             allowed_lateness_ms=20)
+        self.assertEqual(state.add("a", 2, 0, 15), (True, [("a", 0, 10, 2, 1)]))
+        self.assertEqual(state.add("a", 2, 0, 30), (False, []))
+
+    def test_global_count_trigger_and_drain(self):
+        state = window_state(WindowType.GLOBAL, "count", trigger_threshold=3)
+        fired = []
+        for ts in range(7):
+            accepted, results = state.add("a", None, ts, 0)
+            fired.extend(results)
+        self.assertEqual(fired, [("a", 0, 2, 3, 3), ("a", 3, 5, 3, 3)])
+        self.assertEqual(state.advance(1000), [])
+        self.assertEqual(state.advance(MAX_WATERMARK), [("a", 6, 6, 1, 1)])
+
+
+class TestSnapshotRestore(unittest.TestCase):
+    """Восстановленное состояние продолжает работу так же, как исходное"""
+
+    def check(self, window_type: WindowType, **kwargs):
+        records = random_records(9)
+        head, tail = records[:200], records[200:]
+        original = window_state(window_type, **kwargs)
+        feed(original, head)
+
+        restored = window_state(window_type, **kwargs)
+        restored.restore(pickle.loads(pickle.dumps(original.snapshot())))
+
+        def finish(state):
+            fired = feed(state, tail) + state.advance(MAX_WATERMARK)
+            return sorted(fired)
+
+        self.assertEqual(finish(restored), finish(original))
+
+    def test_sliding(self):
+        self.check(WindowType.SLIDING, size_ms=100, slide_ms=25)
+
+    def test_session(self):
+        self.check(WindowType.SESSION, gap_ms=15)
+
+    def test_global(self):
+        self.check(WindowType.GLOBAL, trigger_threshold=7)
+
+
+class TestStreamJob(unittest.IsolatedAsyncioTestCase):
+    """Задание с окном, контрольной точкой и остановкой с дренажом"""
+
+    T0 = 1_700_000_000_000
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.platform = StreamPlatform(checkpoint_dir=self.directory.name)
+        self.collected = []
+        self.platform.register_function("collect", self.collected.append)
+
+        self.source = await self.platform.create_source(
+            "events", SourceType.KAFKA, watermark_strategy=WatermarkStrategy.BOUNDED,
+            max_out_of_orderness_ms=0, config={"key_field": "user", "timestamp_field": "ts"})
+        self.window = await self.platform.create_window("10s", WindowType.TUMBLING, 10_000)
+        self.operator = await self.platform.create_operator(
+            "sum", OperatorType.AGGREGATE, has_state=True,
+            config={"window_id": self.window.window_id, "aggregate": "sum", "field": "amount"})
+        sink = await self.platform.create_sink("out", SinkType.STDOUT, config={"function_name": "collect"})
+        self.job = await self.platform.create_job("job", [self.source.source_id], [self.operator.operator_id],
+                                                  [sink.sink_id], CheckpointMode.EXACTLY_ONCE, 0)
+        self.assertTrue(await self.platform.start_job(self.job.job_id))
+
+    async def wait_for(self, count: int):
+        for _ in range(200):
+            if len(self.collected) >= count:
+                return
+            await asyncio.sleep(0.005)
+        self.fail(f"expected {count} results, got {len(self.collected)}")
+
+    async def test_checkpoint_restores_pending_windows(self):
+        T0 = self.T0
+        await self.platform.ingest(self.source.source_id, [
+            {"user": "a", "amount": 1, "ts": T0 + 1000},
+            {"user": "b", "amount": 2, "ts": T0 + 2000},
+            {"user": "a", "amount": 3, "ts": T0 + 9000},
+            {"user": "a", "amount": 5, "ts": T0 + 12000},
+            {"user": "b", "amount": 7, "ts": T0 + 25000},
+        ])
+        await self.platform.emit_watermark(self.source.source_id, from_epoch_ms(T0 + 10_000))
+        await self.wait_for(2)
+        self.assertEqual(sorted((r["key"], r["result"], r["record_count"]) for r in self.collected),
+                         [("a", 4, 2), ("b", 2, 1)])
+
+        checkpoint = await self.platform.trigger_checkpoint(self.job.job_id)
+        self.assertEqual(checkpoint.status, "completed")
+        directory = os.path.join(self.directory.name, self.job.job_id, checkpoint.checkpoint_id)
+        with open(os.path.join(directory, "_metadata.json")) as f:
+            manifest = json.load(f)
+        self.assertIn(self.operator.operator_id, manifest["tasks"])
+        self.assertFalse([name for name in os.listdir(directory) if name.endswith(".tmp")])
+
+        # Перезапуск из снимка: незакрытые окна те же, что выдаст дренаж
+        with open(os.path.join(directory, f"{self.operator.operator_id}.state"), "rb") as f:
+            state = pickle.load(f)
+        restored = WindowState(self.window, AGGREGATORS["sum"])
+        restored.restore(state["window"])
+        recovered = sorted((key, start - T0, result) for key, start, _, result, _ in
+                           restored.advance(MAX_WATERMARK))
+
+        self.assertTrue(await self.platform.stop_job(self.job.job_id))
+        drained = sorted((r["key"], r["window_start"] - T0, r["result"]) for r in self.collected[2:])
+        self.assertEqual(drained, [("a", 10_000, 5), ("b", 20_000, 7)])
+        self.assertEqual(recovered, drained)
+
+    async def test_late_records_go_to_side_output(self):
+        self.window.late_data_policy = LateDataPolicy.SIDE_OUTPUT
+        T0 = self.T0
+        await self.platform.emit_watermark(self.source.source_id, from_epoch_ms(T0 + 20_000))
+        await self.platform.ingest(self.source.source_id, [{"user": "a", "amount": 1, "ts": T0 + 1000}])
+        for _ in range(200):
+            side_output = self.platform.get_side_output(self.window.window_id)
+            if side_output:
+                break
+            await asyncio.sleep(0.005)
+        self.assertEqual(side_output, [{"user": "a", "amount": 1, "ts": T0 + 1000}])
+        self.assertEqual(self.window.late_records, 1)
+        await self.platform.stop_job(self.job.job_id)
+        self.assertEqual(self.collected, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Tests for WebSocket Gateway encode-once fan-out and bounded outbound queues
+"""
+
+import unittest
+import asyncio
+import json
+import sys
+import os
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from iteration283_websocket_gateway import (
+    WebSocketGatewayManager, GatewayConfig, Message, MessageType,
+    SlowConsumerPolicy, ConnectionState, encode_frame
+)
+
+
+def make_message(data, channel: str = "news") -> Message:
+    return Message(message_id=f"msg_{uuid.uuid4().hex[:8]}", data=data, channel=channel)
+
+
+class TestEncodeFrame(unittest.TestCase):
+    """Кодирование кадров RFC 6455"""
+
+    def test_small_text_frame(self):
+        message = make_message({"k": "v"})
+        frame = encode_frame(message)
+        self.assertEqual(frame[0], 0x81)
+        self.assertEqual(frame[1], len(frame) - 2)
+        self.assertEqual(json.loads(frame[2:])["data"], {"k": "v"})
+
+    def test_frame_cached_on_message(self):
+        message = make_message("x")
+        self.assertIs(encode_frame(message), encode_frame(message))
+
+    def test_extended_lengths(self):
+        medium = encode_frame(make_message("a" * 1000))
+        self.assertEqual(medium[1], 126)
+        large = encode_frame(make_message("a" * 70000))
+        self.assertEqual(large[1], 127)
+
+    def test_binary_opcode(self):
+        frame = encode_frame(Message(message_id="m", message_type=MessageType.BINARY, data=b"\x00\x01"))
+        self.assertEqual(frame[0], 0x82)
+        self.assertEqual(frame[2:], b"\x00\x01")
+
+
+class TestFanOut(unittest.IsolatedAsyncioTestCase):
+    """Рассылка и очереди писателей"""
+
+    async def test_broadcast_shares_one_frame(self):
+        gateway = WebSocketGatewayManager()
+        received = []
+
+        async def transport(frame):
+            received.append(frame)
+
+        for i in range(50):
+            connection = await gateway.accept_connection(f"c{i}", transport=transport)
+            await gateway.subscribe(connection.connection_id, "news")
+        delivered = await gateway.broadcast_to_channel("news", make_message("hello"))
+        self.assertEqual(delivered, 50)
+        self.assertTrue(await gateway.flush(1.0))
+        self.assertEqual(len(received), 50)
+        self.assertEqual(len({id(frame) for frame in received}), 1)
+
+    async def test_broadcast_skips_closing_connections(self):
+        gateway = WebSocketGatewayManager()
+        connections = []
+        for i in range(3):
+            connection = await gateway.accept_connection(f"c{i}")
+            await gateway.subscribe(connection.connection_id, "news")
+            connections.append(connection)
+        connections[0].state = ConnectionState.CLOSING
+        self.assertEqual(await gateway.broadcast_to_channel("news", make_message("x")), 2)
+        self.assertEqual(len(gateway.writers[connections[0].connection_id].queue), 0)
+
+    async def test_flush_waits_for_in_flight_write(self):
+        gateway = WebSocketGatewayManager()
+        gate = asyncio.Event()
+
+        async def transport(frame):
+            await gate.wait()
+
+        connection = await gateway.accept_connection("c", transport=transport)
+        await gateway.send_message(connection.connection_id, make_message(1))
+        await asyncio.sleep(0)
+        # Очередь пуста, но кадр ещё пишется
+        self.assertEqual(len(gateway.writers[connection.connection_id].queue), 0)
+        self.assertFalse(await gateway.flush(0.01))
+        gate.set()
+        self.assertTrue(await gateway.flush(1.0))
+        self.assertEqual(connection.messages_sent, 1)
+
+    async def drain_blocked(self, policy):
+        gateway = WebSocketGatewayManager(GatewayConfig(outbound_queue_size=3, slow_consumer_policy=policy))
+        gate = asyncio.Event()
+        sent = []
+
+        async def transport(frame):
+            await gate.wait()
+            sent.append(json.loads(frame[2:])["data"])
+
+        connection = await gateway.accept_connection("slow", transport=transport)
+        # Первый кадр забирает писатель и блокируется на транспорте
+        await gateway.send_message(connection.connection_id, make_message(0))
+        await asyncio.sleep(0)
+        results = [await gateway.send_message(connection.connection_id, make_message(i)) for i in range(1, 6)]
+        await asyncio.sleep(0)
+        gate.set()
+        await gateway.flush(1.0)
+        return gateway, connection, results, sent
+
+    async def test_drop_oldest_keeps_latest(self):
+        _, _, results, sent = await self.drain_blocked(SlowConsumerPolicy.DROP_OLDEST)
+        self.assertEqual(results, [True] * 5)
+        self.assertEqual(sent, [0, 3, 4, 5])
+
+    async def test_drop_newest_rejects_overflow(self):
+        _, _, results, sent = await self.drain_blocked(SlowConsumerPolicy.DROP_NEWEST)
+        self.assertEqual(results, [True, True, True, False, False])
+        self.assertEqual(sent, [0, 1, 2, 3])
+
+    async def test_disconnect_slow_consumer(self):
+        gateway, connection, results, _ = await self.drain_blocked(SlowConsumerPolicy.DISCONNECT)
+        self.assertFalse(results[3])
+        self.assertEqual(gateway.slow_consumer_disconnects, 1)
+        self.assertNotIn(connection.connection_id, gateway.connections)
+        await asyncio.sleep(0)
+        self.assertEqual(gateway.background_tasks, set())
+
+    async def test_transport_error_closes_connection(self):
+        gateway = WebSocketGatewayManager()
+        loop = asyncio.get_running_loop()
+        unhandled = []
+        loop.set_exception_handler(lambda _, context: unhandled.append(context))
+
+        async def broken(frame):
+            raise ConnectionResetError("peer reset")
+
+        connection = await gateway.accept_connection("broken", transport=broken)
+        await gateway.subscribe(connection.connection_id, "news")
+        self.assertTrue(await gateway.send_message(connection.connection_id, make_message(1)))
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+        self.assertEqual(gateway.transport_errors, 1)
+        self.assertEqual(connection.state, ConnectionState.CLOSED)
+        self.assertNotIn(connection.connection_id, gateway.connections)
+        self.assertFalse(await gateway.send_message(connection.connection_id, make_message(2)))
+        self.assertEqual(await gateway.broadcast_to_channel("news", make_message(3)), 0)
+        self.assertTrue(await gateway.flush(0.1))
+        self.assertEqual(unhandled, [])
+        self.assertEqual(gateway.background_tasks, set())
+
+
+if __name__ == '__main__':
+    unittest.main()